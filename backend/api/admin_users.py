@@ -17,6 +17,7 @@ from api.auth_schemas import SuccessResponse, ErrorResponse
 from middleware.auth_middleware import get_current_superadmin, get_client_ip, get_user_agent
 from services.password_service import PasswordService
 from services.audit_service import AuditService
+from services.auth_service import AuthService
 
 
 router = APIRouter(prefix="/admin-users", tags=["Admin Users"])
@@ -340,6 +341,9 @@ async def update_admin_user(
     db.commit()
     db.refresh(admin_user)
     
+    # Rol, empresa o estado pueden haber cambiado: descartar el principal cacheado
+    AuthService.invalidate_cached_sessions(db, admin_user.id)
+    
     # Log audit
     AuditService.log_action(
         db=db,
@@ -400,7 +404,8 @@ async def delete_admin_user(
     # Soft delete (set is_active=False)
     admin_user.is_active = False
     
-    # Invalidate all active sessions
+    # Invalidate all active sessions (cache first, it is looked up by token)
+    AuthService.invalidate_cached_sessions(db, user_id)
     db.query(AdminSession).filter(AdminSession.admin_user_id == user_id).delete()
     
     db.commit()
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from db.database import get_db
-from services.redis_service import cache_result
+from services.redis_service import cache_result, tenant_cache_key
 from datetime import date
 from typing import Optional
 from middleware.auth_middleware import get_current_user
@@ -10,8 +10,10 @@ import os
 
 router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
 
+CACHE_TTL_ANALYTICS = int(os.getenv("CACHE_TTL_ANALYTICS", 3600))
+
 @router.get("/evolution")
-@cache_result("analytics:evolution", ttl=3600)
+@cache_result("analytics:evolution", ttl=CACHE_TTL_ANALYTICS, key=tenant_cache_key("meses"), stale_ttl=CACHE_TTL_ANALYTICS)
 async def get_evolution(
     meses: int = Query(12, ge=1, le=24),
     db: Session = Depends(get_db),
@@ -37,7 +39,12 @@ async def get_evolution(
     ]
 
 @router.get("/comparison")
-@cache_result("analytics:comparison", ttl=3600)
+@cache_result(
+    "analytics:comparison",
+    ttl=CACHE_TTL_ANALYTICS,
+    key=tenant_cache_key("fecha_inicio_a", "fecha_fin_a", "fecha_inicio_b", "fecha_fin_b"),
+    stale_ttl=CACHE_TTL_ANALYTICS
+)
 async def get_comparison(
     fecha_inicio_a: date = Query(...),
     fecha_fin_a: date = Query(...),
@@ -206,6 +206,8 @@ class ReadCounterResponse(BaseModel):
     printer_id: int
     contador_total: Optional[ContadorImpresoraResponse]
     usuarios_count: int
+    filas_escritas: Optional[int] = None  # Filas de ContadorUsuario insertadas en la lectura
+    filas_omitidas: Optional[int] = None  # Usuarios sin cambios (ingesta incremental)
     error: Optional[str]
 
 
@@ -266,6 +268,8 @@ class CierreMensualUsuarioResponse(BaseModel):
     consumo_impresora: int
     consumo_escaner: int
     consumo_fax: int
+    consumo_bn: int = 0
+    consumo_color: int = 0
     
     created_at: datetime
     
@@ -420,6 +424,7 @@ class CierreResult(BaseModel):
     total_paginas: int = 0
     usuarios_count: int = 0
     error: Optional[str] = None
+    elapsed_seconds: Optional[float] = None  # Tiempo del cierre de esta impresora
 
 
 class CloseAllPrintersResponse(BaseModel):
@@ -429,6 +434,7 @@ class CloseAllPrintersResponse(BaseModel):
     successful: int
     failed: int
     total: int
+    elapsed_seconds: Optional[float] = None
     results: List[CierreResult]
 
 
@@ -528,6 +534,7 @@ class PaginatedCierreUsuarioGlobalResponse(BaseModel):
     page: int
     page_size: int
     pages: int
+    next_cursor: Optional[str] = None  # Cursor para pedir la página siguiente (None en la última)
 
 
 # ============================================================================
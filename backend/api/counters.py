@@ -1,10 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy import or_, tuple_
 from typing import List, Optional
 from datetime import datetime, date
+import asyncio
+import base64
+import json
+import logging
+import time
 
-from db.database import get_db
+from db.database import get_db, SessionLocal
 from db.models import User, CierreMensual, CierreMensualUsuario, Printer, ContadorImpresora, ContadorUsuario, ComparacionGuardada, ScheduledClosure
 from .counter_schemas import (
     ContadorImpresoraResponse, ContadorUsuarioResponse, 
@@ -19,10 +25,18 @@ from .counter_schemas import (
 )
 from services.counter_service import CounterService
 from services.close_service import CloseService
-from middleware.auth_middleware import get_current_user
+from services.fleet_read_service import FleetReadService, load_fleet_read_config_from_env
+from services.printer_scheduler import printer_scheduler, PRIORITY_INTERACTIVE
+from services.parsers import ricoh_session_manager, page_fetch_metrics
+from middleware.auth_middleware import get_current_user, get_current_superadmin
 from services.company_filter_service import CompanyFilterService
+from services.job_queue_service import job_queue
+from db.repository import UserRepository
+from .jobs import job_accepted_response
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api/counters",
     tags=["counters"]
@@ -47,7 +61,6 @@ async def get_latest_counter(printer_id: int, db: Session = Depends(get_db), cur
 @router.get("/users/{printer_id}", response_model=List[ContadorUsuarioResponse], status_code=status.HTTP_200_OK)
 async def get_user_counters_latest(printer_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     """Obtener los últimos contadores por usuario de una impresora"""
-    from db.models import User
     # Validar acceso a la impresora
     printer = db.query(Printer).filter(Printer.id == printer_id).first()
     if not printer:
@@ -59,10 +72,11 @@ async def get_user_counters_latest(printer_id: int, db: Session = Depends(get_db
     # Obtener contadores con JOIN de users
     contadores = CounterService.get_user_counters_latest(db, printer_id)
     
-    # Serializar con datos de usuario
+    # Serializar con datos de usuario (una sola consulta para todos)
+    user_map = UserRepository.get_map_by_ids(db, (c.user_id for c in contadores))
     result = []
     for contador in contadores:
-        user = db.query(User).filter(User.id == contador.user_id).first()
+        user = user_map.get(contador.user_id)
         contador_dict = {
             **{k: getattr(contador, k) for k in contador.__dict__ if not k.startswith('_')},
             'codigo_usuario': user.codigo_de_usuario if user else str(contador.user_id),
@@ -93,13 +107,13 @@ async def get_latest_counters_with_printer(printer_id: int, db: Session = Depend
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a esta impresora")
     
     # Get latest user counters
-    from db.models import User
     contadores = CounterService.get_user_counters_latest(db, printer_id)
     
-    # Serializar contadores con datos de usuario
+    # Serializar contadores con datos de usuario (una sola consulta para todos)
+    user_map = UserRepository.get_map_by_ids(db, (c.user_id for c in contadores))
     counters_serialized = []
     for contador in contadores:
-        user = db.query(User).filter(User.id == contador.user_id).first()
+        user = user_map.get(contador.user_id)
         contador_dict = {
             **{k: getattr(contador, k) for k in contador.__dict__ if not k.startswith('_')},
             'codigo_usuario': user.codigo_de_usuario if user else str(contador.user_id),
@@ -163,18 +177,28 @@ async def get_history(printer_id: int, limit: int = Query(100, ge=1, le=1000), d
 
 # IMPORTANTE: /read-all debe estar ANTES de /read/{printer_id} para evitar conflictos de rutas
 @router.post("/read-all", status_code=status.HTTP_200_OK)
-async def read_all_counters(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+async def read_all_counters(
+    stream: bool = Query(False, description="Emitir un resultado NDJSON por impresora a medida que termina"),
+    max_workers: Optional[int] = Query(None, ge=1, le=50, description="Lecturas concurrentes (por defecto FLEET_READ_MAX_WORKERS)"),
+    background: bool = Query(False, description="Encolar la lectura y responder 202 con el id del trabajo"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
     """
     Ejecutar lectura manual de contadores de TODAS las impresoras activas
     
-    Retorna un resumen de lecturas exitosas y fallidas.
+    Las impresoras se leen en paralelo (FleetReadService), fuera del event loop,
+    con tiempo límite por impresora. Retorna un resumen de lecturas exitosas y
+    fallidas con el tiempo de lectura de cada impresora.
     Solo lee impresoras a las que el usuario tiene acceso.
+    
+    - **stream**: si es true, la respuesta es NDJSON con una línea por impresora
+      al terminar su lectura y una línea final de resumen
+    - **max_workers**: límite de impresoras leídas simultáneamente
+    - **background**: si es true, la lectura se ejecuta en la cola de trabajos;
+      el progreso se consulta en GET /jobs/{job_id} y se publica en /ws/logs
     """
     try:
-        print(f"\n{'='*80}")
-        print(f"📖 INICIANDO LECTURA DE TODAS LAS IMPRESORAS")
-        print(f"{'='*80}\n")
-        
         # Obtener todas las impresoras activas con acceso del usuario
         query = db.query(Printer).filter(Printer.status != 'offline')
         
@@ -182,7 +206,6 @@ async def read_all_counters(db: Session = Depends(get_db), current_user = Depend
         query = CompanyFilterService.apply_filter(query, current_user)
         
         printers = query.all()
-        print(f"📊 Total de impresoras a leer: {len(printers)}")
         
         if not printers:
             return {
@@ -191,63 +214,60 @@ async def read_all_counters(db: Session = Depends(get_db), current_user = Depend
                 "successful": 0,
                 "failed": 0,
                 "total": 0,
+                "elapsed_seconds": 0.0,
                 "results": []
             }
         
-        results = []
-        successful = 0
-        failed = 0
+        if background:
+            job = job_queue.enqueue(
+                db, 'counters.read_all',
+                {'printer_ids': [p.id for p in printers], 'max_workers': max_workers},
+                creado_por=current_user.id, empresa_id=current_user.empresa_id
+            )
+            return job_accepted_response(job, f"Lectura de {len(printers)} impresoras encolada")
         
-        for printer in printers:
-            try:
-                print(f"📖 Leyendo impresora {printer.id}: {printer.hostname}")
-                
-                # Leer contador total
-                contador_total = CounterService.read_printer_counters(db, printer.id)
-                print(f"✅ Contador total leído para {printer.hostname}: {contador_total.total if contador_total else 'None'}")
-                
-                # Leer contadores de usuarios si aplica
-                usuarios_count = 0
-                if printer.tiene_contador_usuario or printer.usar_contador_ecologico:
-                    contadores_usuarios = CounterService.read_user_counters(db, printer.id)
-                    usuarios_count = len(contadores_usuarios)
-                    print(f"✅ Contadores de usuarios leídos para {printer.hostname}: {usuarios_count}")
-                
-                results.append({
-                    "printer_id": printer.id,
-                    "printer_name": printer.hostname,
-                    "success": True,
-                    "usuarios_count": usuarios_count,
-                    "error": None
-                })
-                successful += 1
-                print(f"✅ Lectura exitosa para {printer.hostname}")
-                
-            except Exception as e:
-                print(f"❌ Error leyendo {printer.hostname}: {str(e)}")
-                results.append({
-                    "printer_id": printer.id,
-                    "printer_name": printer.hostname,
-                    "success": False,
-                    "usuarios_count": 0,
-                    "error": str(e)
-                })
-                failed += 1
+        config = load_fleet_read_config_from_env()
+        if max_workers:
+            config.max_workers = max_workers
         
-        print(f"\n{'='*80}")
-        print(f"📊 RESUMEN FINAL:")
-        print(f"   Total: {len(printers)}")
-        print(f"   Exitosas: {successful}")
-        print(f"   Fallidas: {failed}")
-        print(f"{'='*80}\n")
+        fleet = FleetReadService(config=config)
+        targets = FleetReadService.build_targets(printers)
+        logger.info(f"📖 Iniciando lectura de {len(targets)} impresoras ({config.max_workers} workers)")
+        
+        if stream:
+            def generate():
+                # StreamingResponse itera generadores síncronos en el threadpool
+                start = time.monotonic()
+                successful = 0
+                for result in fleet.iter_read(targets):
+                    summary = FleetReadService.to_summary(result)
+                    successful += 1 if summary["success"] else 0
+                    yield json.dumps({"type": "printer", **summary}) + "\n"
+                yield json.dumps({
+                    "type": "summary",
+                    "successful": successful,
+                    "failed": len(targets) - successful,
+                    "total": len(targets),
+                    "elapsed_seconds": round(time.monotonic() - start, 3)
+                }) + "\n"
+            
+            return StreamingResponse(generate(), media_type="application/x-ndjson")
+        
+        resultado = await asyncio.to_thread(fleet.read_all, targets)
+        
+        logger.info(
+            f"📊 Lectura completada en {resultado['elapsed_seconds']}s: "
+            f"{resultado['successful']} exitosas, {resultado['failed']} fallidas"
+        )
         
         return {
             "success": True,
-            "message": f"Lectura completada: {successful} exitosas, {failed} fallidas",
-            "successful": successful,
-            "failed": failed,
-            "total": len(printers),
-            "results": results
+            "message": f"Lectura completada: {resultado['successful']} exitosas, {resultado['failed']} fallidas",
+            "successful": resultado["successful"],
+            "failed": resultado["failed"],
+            "total": resultado["total"],
+            "elapsed_seconds": resultado["elapsed_seconds"],
+            "results": [FleetReadService.to_summary(r) for r in resultado["results"]]
         }
         
     except Exception as e:
@@ -256,6 +276,31 @@ async def read_all_counters(db: Session = Depends(get_db), current_user = Depend
             detail=f"Error al leer contadores: {str(e)}"
         )
 
+@router.get("/sessions/stats", status_code=status.HTTP_200_OK)
+async def get_ricoh_session_stats(current_user = Depends(get_current_superadmin)):
+    """
+    Estadísticas del pool de sesiones autenticadas con las impresoras
+    
+    - **hits**: lecturas servidas con una sesión ya autenticada
+    - **misses**: lecturas que necesitaron login
+    - **logins** / **relogins**: logins iniciales y por sesión caducada
+    - **logins_saved**: logins evitados (hits + sesiones compartidas con RicohWebClient)
+    """
+    return ricoh_session_manager.get_stats()
+
+
+@router.get("/paging/stats", status_code=status.HTTP_200_OK)
+async def get_counter_paging_stats(current_user = Depends(get_current_superadmin)):
+    """
+    Última descarga de contadores por usuario de cada impresora (por IP)
+    
+    - **page_size**: usuarios por página usados
+    - **pages** / **seconds** / **pages_per_second**: rendimiento de la descarga
+    - **fetches**: descargas realizadas desde el arranque
+    """
+    return page_fetch_metrics.get_stats()
+
+
 @router.post("/read/{printer_id}", response_model=ReadCounterResponse, status_code=status.HTTP_200_OK)
 async def read_counter(printer_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     """Ejecutar lectura manual de contadores de una impresora (TOTAL + USUARIOS)"""
@@ -268,18 +313,33 @@ async def read_counter(printer_id: int, db: Session = Depends(get_db), current_u
         if not CompanyFilterService.validate_company_access(current_user, printer.empresa_id):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a esta impresora")
         
-        # Leer contador total
-        contador_total = CounterService.read_printer_counters(db, printer_id)
-            
-        contadores_usuarios = []
-        if printer.tiene_contador_usuario or printer.usar_contador_ecologico:
-            contadores_usuarios = CounterService.read_user_counters(db, printer_id)
+        read_users = printer.tiene_contador_usuario or printer.usar_contador_ecologico
+
+        def read():
+            # Sesión propia: la del request no se comparte con el hilo de la impresora
+            read_db = SessionLocal()
+            try:
+                # Leer contador total
+                contador_total = CounterService.read_printer_counters(read_db, printer_id)
+                contadores_usuarios = CounterService.read_user_counters(read_db, printer_id) if read_users else None
+                if contador_total is not None:
+                    contador_total = ContadorImpresoraResponse.model_validate(contador_total)
+                return contador_total, contadores_usuarios
+            finally:
+                read_db.close()
+
+        # En la cola de la impresora, por delante de las lecturas masivas
+        contador_total, contadores_usuarios = await printer_scheduler.run(
+            printer.ip_address, read, priority=PRIORITY_INTERACTIVE
+        )
             
         return ReadCounterResponse(
             success=True,
             printer_id=printer_id,
             contador_total=contador_total,
-            usuarios_count=len(contadores_usuarios),
+            usuarios_count=contadores_usuarios.usuarios_leidos if contadores_usuarios is not None else 0,
+            filas_escritas=contadores_usuarios.filas_escritas if contadores_usuarios is not None else None,
+            filas_omitidas=contadores_usuarios.filas_omitidas if contadores_usuarios is not None else None,
             error=None
         )
     except Exception as e:
@@ -324,7 +384,12 @@ async def create_monthly_close(request: CierreMensualRequest, db: Session = Depe
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.post("/close-all", response_model=CloseAllPrintersResponse, status_code=status.HTTP_200_OK)
-async def create_close_all_printers(request: CierreMasivoRequest, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+async def create_close_all_printers(
+    request: CierreMasivoRequest,
+    background: bool = Query(False, description="Encolar lectura y cierres y responder 202 con el id del trabajo"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
     """
     Crea cierres para TODAS las impresoras activas simultáneamente
     
@@ -338,6 +403,9 @@ async def create_close_all_printers(request: CierreMasivoRequest, db: Session =
     
     Retorna un resumen de cierres exitosos y fallidos.
     Solo crea cierres en impresoras a las que el usuario tiene acceso.
+    
+    - **background**: si es true, lectura y cierres se ejecutan en la cola de
+      trabajos; el progreso se consulta en GET /jobs/{job_id}
     """
     try:
         print(f"\n{'='*80}")
@@ -363,47 +431,41 @@ async def create_close_all_printers(request: CierreMasivoRequest, db: Session =
                 "results": []
             }
         
-        # PASO 1: Leer contadores de todas las impresoras primero
-        print(f"\n📖 PASO 1: Leyendo contadores de todas las impresoras...")
-        lecturas_exitosas = 0
-        lecturas_fallidas = 0
+        # Obtener empresa_id del usuario si aplica
+        empresa_id = None
+        if hasattr(current_user, 'empresa_id') and current_user.empresa_id:
+            empresa_id = current_user.empresa_id
         
-        for printer in printers:
-            try:
-                print(f"📖 Leyendo impresora {printer.id}: {printer.hostname}")
-                
-                # Leer contador total
-                contador_total = CounterService.read_printer_counters(db, printer.id)
-                
-                # Leer contadores de usuarios si aplica
-                if printer.tiene_contador_usuario or printer.usar_contador_ecologico:
-                    contadores_usuarios = CounterService.read_user_counters(db, printer.id)
-                    print(f"✅ Leídos: total + {len(contadores_usuarios)} usuarios")
-                else:
-                    print(f"✅ Leído: total (sin usuarios)")
-                
-                lecturas_exitosas += 1
-                
-            except Exception as e:
-                print(f"❌ Error leyendo {printer.hostname}: {str(e)}")
-                lecturas_fallidas += 1
+        if background:
+            job = job_queue.enqueue(
+                db, 'counters.close_all',
+                {
+                    'printer_ids': [p.id for p in printers],
+                    'fecha_inicio': request.fecha_inicio.isoformat(),
+                    'fecha_fin': request.fecha_fin.isoformat(),
+                    'cerrado_por': request.cerrado_por,
+                    'notas': request.notas,
+                    'empresa_id': empresa_id
+                },
+                creado_por=current_user.id, empresa_id=empresa_id
+            )
+            return job_accepted_response(job, f"Cierre de {len(printers)} impresoras encolado")
         
-        print(f"\n📊 Lecturas completadas: {lecturas_exitosas} exitosas, {lecturas_fallidas} fallidas")
+        # PASO 1: Leer contadores de todas las impresoras primero (en paralelo)
+        print(f"\n📖 PASO 1: Leyendo contadores de todas las impresoras...")
+        fleet = FleetReadService()
+        lecturas = await asyncio.to_thread(fleet.read_all, FleetReadService.build_targets(printers))
         
-        # Hacer commit de todas las lecturas
-        print(f"💾 Guardando lecturas en base de datos...")
-        db.commit()
-        print(f"✅ Lecturas guardadas")
+        print(
+            f"\n📊 Lecturas completadas en {lecturas['elapsed_seconds']}s: "
+            f"{lecturas['successful']} exitosas, {lecturas['failed']} fallidas"
+        )
         
-        # PASO 2: Crear cierres en todas las impresoras
+        # PASO 2: Crear cierres en todas las impresoras (una transacción por impresora)
         print(f"\n🔒 PASO 2: Creando cierres...")
         
-        # Obtener empresa_id del usuario si aplica
-        empresa_id = None
-        if hasattr(current_user, 'empresa_id') and current_user.empresa_id:
-            empresa_id = current_user.empresa_id
-        
-        resultado = CloseService.create_close_all_printers(
+        resultado = await asyncio.to_thread(
+            CloseService.create_close_all_printers,
             db=db,
             fecha_inicio=request.fecha_inicio,
             fecha_fin=request.fecha_fin,
@@ -466,40 +528,52 @@ async def create_close(request: CierreRequest, db: Session = Depends(get_db), cu
         print(f"     - usar_contador_ecologico: {printer.usar_contador_ecologico}")
         print(f"{'='*80}\n")
         
-        # Leer contador total
-        print(f"📊 Leyendo contador total...")
-        contador_total = CounterService.read_printer_counters(db, request.printer_id)
-        if not contador_total:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-                detail=f"Error al leer contador total de la impresora"
-            )
-        print(f"✅ Contador total leído: {contador_total.total} páginas")
+        read_users = printer.tiene_contador_usuario or printer.usar_contador_ecologico
         
-        # Leer contadores por usuario (si está configurado)
-        usuarios_count = 0
-        if printer.tiene_contador_usuario or printer.usar_contador_ecologico:
-            print(f"👥 Leyendo contadores por usuario...")
-            usuarios = CounterService.read_user_counters(db, request.printer_id)
-            usuarios_count = len(usuarios)
-            print(f"✅ Contadores de usuarios leídos: {usuarios_count} usuarios")
+        def read():
+            # Sesión propia: la del request no se comparte con el hilo de la impresora
+            read_db = SessionLocal()
+            try:
+                # Leer contador total
+                print(f"📊 Leyendo contador total...")
+                contador_total = CounterService.read_printer_counters(read_db, request.printer_id)
+                if not contador_total:
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
+                        detail=f"Error al leer contador total de la impresora"
+                    )
+                print(f"✅ Contador total leído: {contador_total.total} páginas")
+        
+                # Leer contadores por usuario (si está configurado)
+                usuarios_count = 0
+                if read_users:
+                    print(f"👥 Leyendo contadores por usuario...")
+                    usuarios = CounterService.read_user_counters(read_db, request.printer_id)
+                    usuarios_count = usuarios.usuarios_leidos
+                    print(f"✅ Contadores de usuarios leídos: {usuarios_count} usuarios "
+                          f"({usuarios.filas_escritas} filas escritas, {usuarios.filas_omitidas} sin cambios)")
             
-            # Mostrar primeros 5 usuarios para debugging
-            if usuarios_count > 0:
-                print(f"   Primeros usuarios:")
-                from db.models import User
-                for u in usuarios[:5]:
-                    user = db.query(User).filter(User.id == u.user_id).first()
-                    codigo = user.codigo_de_usuario if user else str(u.user_id)
-                    nombre = user.name if user else f"Usuario {u.user_id}"
-                    print(f"     - {codigo}: {nombre} ({u.total_paginas} páginas)")
-        else:
-            print(f"⚠️ Impresora NO tiene contador por usuario configurado")
+                    # Mostrar primeros 5 usuarios para debugging
+                    if usuarios_count > 0:
+                        print(f"   Primeros usuarios:")
+                        user_map = UserRepository.get_map_by_ids(read_db, (u.user_id for u in usuarios[:5]))
+                        for u in usuarios[:5]:
+                            user = user_map.get(u.user_id)
+                            codigo = user.codigo_de_usuario if user else str(u.user_id)
+                            nombre = user.name if user else f"Usuario {u.user_id}"
+                            print(f"     - {codigo}: {nombre} ({u.total_paginas} páginas)")
+                else:
+                    print(f"⚠️ Impresora NO tiene contador por usuario configurado")
         
-        # IMPORTANTE: Hacer commit de la lectura antes de crear el cierre
-        print(f"💾 Guardando lecturas en base de datos...")
-        db.commit()
-        print(f"✅ Lecturas guardadas")
+                # IMPORTANTE: Hacer commit de la lectura antes de crear el cierre
+                print(f"💾 Guardando lecturas en base de datos...")
+                read_db.commit()
+                print(f"✅ Lecturas guardadas")
+            finally:
+                read_db.close()
+        
+        # En la cola de la impresora, por delante de las lecturas masivas
+        await printer_scheduler.run(printer.ip_address, read, priority=PRIORITY_INTERACTIVE)
         
         # PASO 2: Crear el cierre con los datos recién leídos
         print(f"🔒 Creando cierre...")
@@ -637,8 +711,6 @@ async def get_close_by_id(cierre_id: int, db: Session = Depends(get_db), current
 @router.get("/monthly/{cierre_id}/users", response_model=List[CierreMensualUsuarioResponse], status_code=status.HTTP_200_OK)
 async def get_close_users(cierre_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     """Obtiene los usuarios de un cierre"""
-    from db.models import User
-    
     cierre = db.query(CierreMensual).filter(CierreMensual.id == cierre_id).first()
     if not cierre:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cierre no encontrado")
@@ -651,10 +723,11 @@ async def get_close_users(cierre_id: int, db: Session = Depends(get_db), current
     if not CompanyFilterService.validate_company_access(current_user, printer.empresa_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a este cierre")
     
-    # Serializar usuarios con datos de user
+    # Serializar usuarios con datos de user (una sola consulta para todos)
+    user_map = UserRepository.get_map_by_ids(db, (u.user_id for u in cierre.usuarios))
     result = []
     for usuario in cierre.usuarios:
-        user = db.query(User).filter(User.id == usuario.user_id).first()
+        user = user_map.get(usuario.user_id)
         usuario_dict = {
             **{k: getattr(usuario, k) for k in usuario.__dict__ if not k.startswith('_')},
             'codigo_usuario': user.codigo_de_usuario if user else str(usuario.user_id),
@@ -729,11 +802,11 @@ async def get_close_detail(
         CierreMensualUsuario.total_paginas.desc()
     ).offset(offset).limit(page_size).all()
     
-    # Serializar usuarios con datos de user
-    from db.models import User
+    # Serializar usuarios con datos de user (una sola consulta para la página)
+    user_map = UserRepository.get_map_by_ids(db, (u.user_id for u in usuarios))
     usuarios_serialized = []
     for usuario in usuarios:
-        user = db.query(User).filter(User.id == usuario.user_id).first()
+        user = user_map.get(usuario.user_id)
         usuario_dict = {
             **{k: getattr(usuario, k) for k in usuario.__dict__ if not k.startswith('_')},
             'codigo_usuario': user.codigo_de_usuario if user else str(usuario.user_id),
@@ -799,11 +872,11 @@ async def verificar_coherencia_comparativo(cierre1_id: int, cierre2_id: int, db:
     diff_total_contador = cierre2.total_paginas - cierre1.total_paginas
     
     # Calcular suma de usuarios usando user_id
-    from db.models import User
     usuarios1 = {u.user_id: u for u in cierre1.usuarios}
     usuarios2 = {u.user_id: u for u in cierre2.usuarios}
     
     user_ids = set(usuarios1.keys()).union(set(usuarios2.keys()))
+    user_map = UserRepository.get_map_by_ids(db, user_ids)
     
     suma_bn = 0
     suma_color = 0
@@ -815,7 +888,7 @@ async def verificar_coherencia_comparativo(cierre1_id: int, cierre2_id: int, db:
         u2 = usuarios2.get(user_id)
         
         # Obtener datos del usuario
-        user = db.query(User).filter(User.id == user_id).first()
+        user = user_map.get(user_id)
         codigo = user.codigo_de_usuario if user else str(user_id)
         nombre = user.name if user else f"Usuario {user_id}"
         
@@ -918,6 +991,22 @@ async def obtener_suma_usuarios(cierre_id: int, db: Session = Depends(get_db), c
     }
 
 
+def _encode_cursor_cierres(snapshot: CierreMensualUsuario) -> str:
+    """Cursor opaco con la clave de orden (fecha_fin, consumo_total, id) de la última fila"""
+    clave = [snapshot.cierre.fecha_fin.isoformat(), snapshot.consumo_total, snapshot.id]
+    return base64.urlsafe_b64encode(json.dumps(clave).encode()).decode().rstrip("=")
+
+
+def _decode_cursor_cierres(cursor: str):
+    """Decodifica un cursor de _encode_cursor_cierres; HTTP 400 si no es válido"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        fecha, consumo_total, snapshot_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return date.fromisoformat(fecha), int(consumo_total), int(snapshot_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido")
+
+
 @router.get("/monthly/users/all", response_model=PaginatedCierreUsuarioGlobalResponse, status_code=status.HTTP_200_OK)
 async def get_all_users_closes(
     page: int = Query(1, ge=1, description="Número de página"),
@@ -928,21 +1017,25 @@ async def get_all_users_closes(
     fecha_inicio: Optional[date] = Query(None, description="Fecha inicio de período"),
     fecha_fin: Optional[date] = Query(None, description="Fecha fin de período"),
     centro_costos: Optional[str] = Query(None, description="Filtrar por centro de costos"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (next_cursor); tiene prioridad sobre page"),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """
     Obtiene un listado paginado y filtrado de consumos de usuario en cierres mensuales.
     Enfuerza multi-tenancy filtrando por la empresa asignada al usuario no-superadmin.
+
+    consumo_bn/consumo_color se leen del snapshot (calculados al crear el cierre).
+    Con `cursor` se pagina por clave (fecha_fin, consumo_total, id) sin OFFSET.
     """
 
-    # Query base con joins y joinedload para evitar N+1 diferidas
-    query = db.query(CierreMensualUsuario).options(
-        joinedload(CierreMensualUsuario.cierre).joinedload(CierreMensual.printer).joinedload(Printer.empresa)
-    ).join(
+    # Query base: los joins de cierre e impresora también cargan las relaciones
+    query = db.query(CierreMensualUsuario).join(
         CierreMensual, CierreMensual.id == CierreMensualUsuario.cierre_mensual_id
     ).join(
         Printer, Printer.id == CierreMensual.printer_id
+    ).options(
+        contains_eager(CierreMensualUsuario.cierre).contains_eager(CierreMensual.printer).joinedload(Printer.empresa)
     )
 
     # Filtrar por empresa si no es superadmin
@@ -998,28 +1091,31 @@ async def get_all_users_closes(
     # Conteo total
     total = query.count()
 
-    # Ordenar por fecha de cierre desc, luego consumo desc
+    # Ordenar por fecha de cierre desc, luego consumo desc (id desempata para un orden estable)
     query = query.order_by(
         CierreMensual.fecha_fin.desc(),
-        CierreMensualUsuario.consumo_total.desc()
+        CierreMensualUsuario.consumo_total.desc(),
+        CierreMensualUsuario.id.desc()
     )
 
-    # Paginación
-    offset = (page - 1) * page_size
-    items = query.offset(offset).limit(page_size).all()
+    # Paginación: por cursor (keyset) o por número de página
+    if cursor:
+        query = query.filter(
+            tuple_(CierreMensual.fecha_fin, CierreMensualUsuario.consumo_total, CierreMensualUsuario.id)
+            < tuple_(*_decode_cursor_cierres(cursor))
+        )
+    else:
+        query = query.offset((page - 1) * page_size)
+    items = query.limit(page_size).all()
 
     # Serializar resultados
     serialized_items = []
     
     # Batch load de usuarios para evitar N+1 queries
-    user_ids = {snapshot.user_id for snapshot in items if snapshot.user_id}
-    user_map = {}
-    if user_ids:
-        users = db.query(User).filter(User.id.in_(user_ids)).all()
-        user_map = {u.id: u for u in users}
+    user_map = UserRepository.get_map_by_ids(db, (snapshot.user_id for snapshot in items))
 
     for snapshot in items:
-        # Cierre e Impresora asociados (ya precargados con joinedload)
+        # Cierre e Impresora asociados (cargados por los joins de la consulta)
         cierre = snapshot.cierre
         printer = cierre.printer
         # Usuario asociado desde el mapa en memoria
@@ -1027,52 +1123,6 @@ async def get_all_users_closes(
         
         # Empresa asociada (ya precargada con joinedload)
         empresa_nombre = printer.empresa.nombre_comercial.upper() if (printer.empresa and printer.empresa.nombre_comercial) else "SIN EMPRESA"
-        
-        # Calcular consumo_bn y consumo_color periódicos del mes
-        consumo_bn = 0
-        consumo_color = 0
-        
-        if not printer.has_color:
-            consumo_bn = snapshot.consumo_total
-            consumo_color = 0
-        else:
-            # Buscar el cierre anterior para el mismo usuario y la misma impresora
-            cierre_anterior = db.query(CierreMensual).filter(
-                CierreMensual.printer_id == printer.id,
-                CierreMensual.fecha_fin < cierre.fecha_inicio
-            ).order_by(CierreMensual.fecha_fin.desc()).first()
-            
-            if cierre_anterior:
-                snapshot_anterior = db.query(CierreMensualUsuario).filter(
-                    CierreMensualUsuario.cierre_mensual_id == cierre_anterior.id,
-                    CierreMensualUsuario.user_id == snapshot.user_id
-                ).first()
-                
-                if snapshot_anterior:
-                    consumo_bn = max(0, snapshot.total_bn - snapshot_anterior.total_bn)
-                    consumo_color = max(0, snapshot.total_color - snapshot_anterior.total_color)
-                    
-                    # Fallback si las diferencias de acumulados son 0 pero consumo_total > 0
-                    if consumo_bn == 0 and consumo_color == 0 and snapshot.consumo_total > 0:
-                        cop_bn_diff = max(0, snapshot.copiadora_bn - snapshot_anterior.copiadora_bn)
-                        cop_col_diff = max(0, snapshot.copiadora_color - snapshot_anterior.copiadora_color)
-                        imp_bn_diff = max(0, snapshot.impresora_bn - snapshot_anterior.impresora_bn)
-                        imp_col_diff = max(0, snapshot.impresora_color - snapshot_anterior.impresora_color)
-                        
-                        consumo_bn = cop_bn_diff + imp_bn_diff
-                        consumo_color = cop_col_diff + imp_col_diff
-            
-            # Si no hay cierre anterior o las diferencias dieron 0 y consumo_total > 0
-            if (not cierre_anterior or (consumo_bn == 0 and consumo_color == 0)) and snapshot.consumo_total > 0:
-                total_acum = snapshot.total_paginas
-                if total_acum > 0:
-                    bn_ratio = (snapshot.total_bn or 0) / total_acum
-                    col_ratio = (snapshot.total_color or 0) / total_acum
-                    consumo_bn = int(snapshot.consumo_total * bn_ratio)
-                    consumo_color = int(snapshot.consumo_total * col_ratio)
-                else:
-                    consumo_bn = snapshot.consumo_total
-                    consumo_color = 0
 
         serialized_items.append(
             CierreUsuarioGlobalResponse(
@@ -1113,8 +1163,8 @@ async def get_all_users_closes(
                 cerrado_por=cierre.cerrado_por,
                 centro_costos=user.centro_costos if user else None,
                 empresa_nombre=empresa_nombre,
-                consumo_bn=consumo_bn,
-                consumo_color=consumo_color
+                consumo_bn=snapshot.consumo_bn,
+                consumo_color=snapshot.consumo_color
             )
         )
 
@@ -1125,7 +1175,8 @@ async def get_all_users_closes(
         "total": total,
         "page": page,
         "page_size": page_size,
-        "pages": pages
+        "pages": pages,
+        "next_cursor": _encode_cursor_cierres(items[-1]) if len(items) == page_size else None
     }
 
 
@@ -1161,9 +1212,10 @@ async def update_cierre_usuario(
     # Actualizar valores
     snapshot.total_paginas = payload.total_paginas
     snapshot.consumo_total = payload.consumo_total
+    CloseService.recalcular_consumo_bn_color(db, snapshot)
 
     # Obtener datos de usuario para el log
-    user = db.query(User).filter(User.id == snapshot.user_id).first()
+    user = UserRepository.get_by_id(db, snapshot.user_id)
     user_name = user.name if user else f"Usuario ID {snapshot.user_id}"
 
     # Guardar en base de datos
@@ -4,14 +4,16 @@ from sqlalchemy import text
 from db.database import get_db
 from db.models import Printer
 from db.models_auth import AdminUser
-from middleware.auth_middleware import get_current_user
-from services.redis_service import cache_result
+from middleware.auth_middleware import get_current_user, get_current_superadmin
+from services.redis_service import cache_result, tenant_cache_key, redis_service
 import os
 
 router = APIRouter(prefix="/api/v1/dashboard", tags=["dashboard"])
 
+CACHE_TTL_DASHBOARD = int(os.getenv("CACHE_TTL_DASHBOARD", 300))
+
 @router.get("/kpis")
-@cache_result("dashboard:kpis", ttl=int(os.getenv("CACHE_TTL_DASHBOARD", 300)))
+@cache_result("dashboard:kpis", ttl=CACHE_TTL_DASHBOARD, key=tenant_cache_key(), stale_ttl=CACHE_TTL_DASHBOARD)
 async def get_dashboard_kpis(
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
@@ -32,7 +34,7 @@ async def get_dashboard_kpis(
     }
 
 @router.get("/top-impresoras")
-@cache_result("dashboard:top_impresoras", ttl=600)
+@cache_result("dashboard:top_impresoras", ttl=600, key=tenant_cache_key("limit"), stale_ttl=600)
 async def get_top_impresoras(
     limit: int = 5,
     db: Session = Depends(get_db),
@@ -105,7 +107,7 @@ async def get_top_impresoras(
 
 
 @router.get("/top-usuarios-consumo")
-@cache_result("dashboard:top_usuarios_consumo", ttl=600)
+@cache_result("dashboard:top_usuarios_consumo", ttl=600, key=tenant_cache_key("limit"), stale_ttl=600)
 async def get_top_usuarios_consumo(
     limit: int = 5,
     db: Session = Depends(get_db),
@@ -160,7 +162,7 @@ async def get_top_usuarios_consumo(
 
 
 @router.get("/actividad-reciente")
-@cache_result("dashboard:actividad", ttl=60)
+@cache_result("dashboard:actividad", ttl=60, key=tenant_cache_key("limit"), stale_ttl=60)
 async def get_actividad_reciente(
     limit: int = 4,
     db: Session = Depends(get_db),
@@ -194,7 +196,7 @@ async def get_actividad_reciente(
 
 
 @router.get("/consumo-resumen")
-@cache_result("dashboard:consumo_resumen", ttl=300)
+@cache_result("dashboard:consumo_resumen", ttl=300, key=tenant_cache_key(), stale_ttl=300)
 async def get_consumo_resumen(
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
@@ -250,7 +252,7 @@ async def get_consumo_resumen(
 
 
 @router.get("/toner-alertas")
-@cache_result("dashboard:toner_alertas", ttl=60)
+@cache_result("dashboard:toner_alertas", ttl=60, key=tenant_cache_key(), stale_ttl=60)
 async def get_toner_alertas(
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
@@ -313,3 +315,15 @@ async def get_toner_alertas(
         })
         
     return response
+
+
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: AdminUser = Depends(get_current_superadmin)):
+    """
+    Estadísticas de la caché (backend y respuestas por prefijo de clave)
+    
+    - **hits** / **stale_hits** / **misses**: respuestas frescas, vencidas y sin caché
+    - **coalesced**: requests que esperaron el cálculo de otro (single-flight)
+    - **recomputes** / **recompute_ms_avg** / **recompute_ms_max**: cálculos reales y su latencia
+    """
+    return redis_service.get_stats()
@@ -1,19 +1,26 @@
 """
 Network discovery API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
+import json
 import os
 import logging
-from typing import Optional
+import time
+from typing import Dict, Optional
 
-from db.database import get_db
+from db.database import SessionLocal, get_db
 from db.repository import PrinterRepository
-from db.models import PrinterStatus, User, UserPrinterAssignment
+from db.models import Printer, PrinterStatus, User, UserPrinterAssignment
+from services.company_filter_service import CompanyFilterService
+from services.job_queue_service import job_queue
 from services.network_scanner import NetworkScanner
 from services.snmp_client import get_snmp_client
+from services.snmp_poller_service import SNMPPollerService, load_snmp_poller_config_from_env
 from middleware.auth_middleware import get_current_user
+from .jobs import job_accepted_response
 from .schemas import ScanRequest, ScanResponse, DiscoveredDevice, MessageResponse
 
 router = APIRouter(prefix="/discovery", tags=["discovery"])
@@ -29,7 +36,9 @@ async def scan_network_endpoint(
     """
     Scan network for Ricoh printers
     
-    Performs real network scan - no demo mode
+    Performs real network scan - no demo mode. ip_range accepts several
+    CIDR ranges separated by commas; hosts fingerprinted recently and with
+    the same open ports are served from the scanner cache
     """
     start_time = datetime.now()
     
@@ -37,11 +46,7 @@ async def scan_network_endpoint(
         # Always perform actual network scan
         scanner = NetworkScanner(timeout=1.0)
         devices_data = await scanner.scan_network(scan_request.ip_range)
-        
-        # Calculate total IPs scanned
-        import ipaddress
-        network = ipaddress.ip_network(scan_request.ip_range, strict=False)
-        total_scanned = network.num_addresses - 2
+        total_scanned = scanner.last_scan_stats['hosts']
         
         # Convert to response schema
         devices = [DiscoveredDevice(**device) for device in devices_data]
@@ -163,6 +168,57 @@ async def check_single_printer(
         )
 
 
+@router.post("/refresh-snmp", status_code=status.HTTP_200_OK)
+async def refresh_fleet_snmp(
+    max_concurrency: Optional[int] = Query(None, ge=1, le=256, description="Impresoras consultadas a la vez (por defecto SNMP_POLL_MAX_CONCURRENCY)"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Sondea por SNMP todas las impresoras del usuario (tóner, estado y contador de páginas)
+
+    Las impresoras se consultan en paralelo con GETBULK sobre el Printer-MIB y
+    las lecturas se guardan con una única actualización en lote. Las que no
+    responden SNMP solo quedan OFFLINE si Web Image Monitor tampoco responde.
+    """
+    if get_snmp_client() is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="SNMP está deshabilitado (SNMP_ENABLED=false)"
+        )
+
+    printers = CompanyFilterService.apply_filter(db.query(Printer), current_user).all()
+    if not printers:
+        return {"success": True, "message": "No hay impresoras para sondear", "total": 0,
+                "elapsed_seconds": 0.0, "stats": {}, "results": []}
+
+    config = load_snmp_poller_config_from_env()
+    if max_concurrency:
+        config.max_concurrency = max_concurrency
+
+    start = time.monotonic()
+    poller = SNMPPollerService(client=get_snmp_client(), config=config)
+    results = await poller.poll_all(SNMPPollerService.build_targets(printers))
+    stats = SNMPPollerService.apply(db, results)
+    elapsed = round(time.monotonic() - start, 3)
+
+    # Invalidate dashboard cache so changes reflect instantly
+    try:
+        from services.redis_service import redis_service
+        redis_service.invalidate_pattern("dashboard:*")
+    except Exception as cache_err:
+        logger.warning(f"Failed to invalidate dashboard cache: {cache_err}")
+
+    return {
+        "success": True,
+        "message": f"✅ {stats['online'] + stats['error']} de {len(results)} impresoras respondieron por SNMP en {elapsed}s",
+        "total": len(results),
+        "elapsed_seconds": elapsed,
+        "stats": stats,
+        "results": [SNMPPollerService.to_summary(r) for r in results]
+    }
+
+
 @router.post("/refresh-snmp/{printer_id}", response_model=MessageResponse, status_code=status.HTTP_200_OK)
 async def refresh_printer_snmp(
     printer_id: int,
@@ -199,6 +255,9 @@ async def refresh_printer_snmp(
             if snmp_info.location:
                 update_data['location'] = snmp_info.location
             
+            if snmp_info.page_count is not None:
+                update_data['page_count'] = snmp_info.page_count
+            
             # Update toner levels
             if snmp_info.toner_black is not None:
                 update_data['toner_black'] = snmp_info.toner_black
@@ -211,6 +270,7 @@ async def refresh_printer_snmp(
             
             # Update in database
             if update_data:
+                update_data['last_seen'] = datetime.utcnow()
                 PrinterRepository.update(db, printer_id, **update_data)
                 
                 # Invalidate dashboard cache so changes reflect instantly
@@ -224,11 +284,7 @@ async def refresh_printer_snmp(
                     success=True,
                     message=f"Printer {printer.hostname} updated via SNMP"
                 )
-            else:
-                return MessageResponse(
-                    success=False,
-                    message="No SNMP data available for this printer"
-                )
+            logger.info(f"No SNMP data for {printer.ip_address}, falling back to Web Image Monitor")
                 
         except Exception as e:
             logger.warning(f"SNMP query failed for {printer.ip_address}, falling back to Web Image Monitor: {e}")
@@ -288,7 +344,7 @@ async def get_user_details_endpoint(
     Obtiene los detalles (permisos) de un usuario específico en una impresora
     Utilizado para Lazy Loading desde el Frontend
     """
-    from services.ricoh_web_client import get_ricoh_web_client
+    from services.ricoh_async_client import get_async_ricoh_web_client
     
     try:
         # Resolve printer password
@@ -297,9 +353,9 @@ async def get_user_details_endpoint(
         # intente primero sin contraseña (fábrica). Si tiene contraseña → usarla primero.
         printer_pwd = printer.admin_password if (printer and printer.admin_password) else ""
 
-        ricoh_client = get_ricoh_web_client()
-        # No reseteamos sesión aquí para aprovechar cookies si ya existen
-        details = ricoh_client._get_user_details(printer_ip, entry_index, fast_sync=False, admin_password=printer_pwd)
+        ricoh_client = get_async_ricoh_web_client()
+        # Sin logout para aprovechar la sesión en las siguientes consultas de detalles
+        details = await ricoh_client.get_user_details(printer_ip, entry_index, admin_password=printer_pwd)
         
         if not details:
             # Scraper no pudo obtener datos (sin contraseña o sesión expirada).
@@ -384,34 +440,90 @@ async def get_user_details_endpoint(
 
 
 
+def _sync_users_response(sync: Dict, mode: str, user_code: Optional[str]) -> Dict:
+    """Respuesta de sync-users-from-printers a partir de PrinterUserSyncService.apply"""
+    users_list = sync['users']
+    printers_scanned = sync['printers_scanned']
+    errors = sync['errors']
+    
+    # Calcular estadísticas
+    total_usuarios_unicos = len(users_list)
+    usuarios_en_db = sum(1 for u in users_list if u['en_db'])
+    usuarios_solo_impresoras = total_usuarios_unicos - usuarios_en_db
+    
+    if mode == "specific":
+        if total_usuarios_unicos > 0:
+            user = users_list[0]
+            message = f"✅ Usuario '{user_code}' encontrado: {user['nombre']}"
+            message += f" | Registrado en {len(user['impresoras'])} impresora(s)"
+            if user['en_db']:
+                message += f" | 💾 Existe en DB"
+            else:
+                message += f" | 🖨️ Solo en impresoras"
+        else:
+            message = f"❌ Usuario '{user_code}' no encontrado en ninguna impresora"
+    else:
+        message = f"✅ Se encontraron {total_usuarios_unicos} usuarios únicos en {len(printers_scanned)} impresora(s)"
+        message += f" | 💾 {usuarios_en_db} en DB | 🖨️ {usuarios_solo_impresoras} solo en impresoras"
+    
+    if errors:
+        message += f" | ⚠️ Errores: {len(errors)}"
+    
+    return {
+        "success": True,
+        "message": message,
+        "users": users_list,
+        "printers_scanned": printers_scanned,
+        "total_printers": len(printers_scanned),
+        "total_usuarios_unicos": total_usuarios_unicos,
+        "usuarios_en_db": usuarios_en_db,
+        "usuarios_solo_impresoras": usuarios_solo_impresoras,
+        "search_mode": mode,
+        "user_code_searched": user_code if mode == "specific" else None,
+        "errors": errors,
+        "db_changes": sync['stats']
+    }
+
+
 @router.post("/sync-users-from-printers", status_code=status.HTTP_200_OK)
 async def sync_users_from_printers(
     user_code: Optional[str] = None,
+    stream: bool = Query(False, description="Emitir una línea NDJSON por impresora a medida que termina"),
+    background: bool = Query(False, description="Encolar la sincronización y responder 202 con el id del trabajo"),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """
     Lee usuarios desde todas las impresoras físicas y los agrupa por código de usuario
     
+    Las libretas se leen de forma concurrente (USER_SYNC_MAX_CONCURRENCY impresoras
+    a la vez); los usuarios existentes se precargan en una consulta y los cambios
+    en la base de datos se guardan en una sola transacción.
+    
     Args:
         user_code: Código de usuario específico a buscar (opcional). Si se proporciona,
                    solo busca ese usuario en todas las impresoras.
+        stream: Si es true, la respuesta es NDJSON con una línea de progreso por
+                impresora y una línea final de resumen (mismo contenido que sin stream)
+        background: Si es true, la sincronización se ejecuta en la cola de trabajos y
+                    la misma respuesta queda en el resultado de GET /jobs/{job_id}
     
     Returns:
         Lista de usuarios únicos con información de en qué impresoras están registrados
     """
-    from services.ricoh_web_client import get_ricoh_web_client
+    from services.printer_user_sync_service import PrinterUserSyncService
     from services.ricoh_selenium_client import close_selenium_client
-    from db.repository import UserRepository
     
     logger.info("=" * 70)
     logger.info("🔄 INICIANDO SINCRONIZACIÓN DE USUARIOS")
     logger.info(f"   User code: {user_code if user_code else 'TODOS'}")
     logger.info("=" * 70)
     
+    mode = "specific" if user_code else "all"
+    search_code = user_code if user_code else None
+    
     try:
         # Obtener todas las impresoras activas
-        logger.info("📋 Obteniendo impresoras de la base de datos...")
         printers = PrinterRepository.get_all(db)
         logger.info(f"   Encontradas {len(printers)} impresoras")
         
@@ -424,222 +536,46 @@ async def sync_users_from_printers(
                 "users_by_printer": []
             }
         
-        # Obtener el cliente web
-        ricoh_client = get_ricoh_web_client()
-        
-        # Determinar modo de búsqueda
-        if user_code:
-            logger.info(f"🔍 Buscando usuario específico: {user_code}")
-            mode = "specific"
-        else:
-            logger.info(f"📋 Sincronizando todos los usuarios")
-            mode = "all"
+        if background:
+            job = job_queue.enqueue(
+                db, 'discovery.sync_users',
+                {'printer_ids': [p.id for p in printers], 'user_code': search_code},
+                creado_por=current_user.id, empresa_id=current_user.empresa_id
+            )
+            return job_accepted_response(job, f"Sincronización de usuarios de {len(printers)} impresoras encolada")
         
-        users_dict = {}  # Diccionario para agrupar usuarios por código
-        errors = []
-        printers_scanned = []
+        service = PrinterUserSyncService()
+        targets = PrinterUserSyncService.build_targets(printers)
         
-        for printer in printers:
-            # Omitir impresoras Kyocera (.248 y .249) - no tienen usuarios registrados
-            if printer.ip_address in ['192.168.91.248', '192.168.91.249']:
-                printers_scanned.append({
-                    'id': printer.id,
-                    'hostname': printer.hostname,
-                    'ip': printer.ip_address,
-                    'users_count': 0,
-                    'skipped': True,
-                    'reason': 'Kyocera - sin usuarios'
-                })
-                continue
-            
-            try:
-                # IMPORTANTE: Resetear sesión ANTES de cada impresora para evitar conflictos de cookies
-                ricoh_client.reset_session()
-                logger.info(f"🔄 Sesión reseteada para impresora {printer.hostname} ({printer.ip_address})")
-                
-                if mode == "specific" and user_code is not None:
-                    # Buscar usuario específico (Incluye detalles/permisos automáticamente)
-                    logger.info(f"🎯 Llamando a find_specific_user para {printer.ip_address}, usuario {user_code}")
-                    user_found = ricoh_client.find_specific_user(printer.ip_address, user_code, admin_password=printer.admin_password)
-                    logger.info(f"📋 Resultado de find_specific_user: {user_found}")
-                    if user_found:
-                        printer_users = [user_found]
-                    else:
-                        printer_users = []
-                else:
-                    # Leer todos los usuarios de la impresora (MODO RÁPIDO - sin permisos)
-                    # Los permisos se cargan bajo demanda cuando se abre el usuario
-                    logger.info(f"📋 Leyendo lista de usuarios de {printer.ip_address}...")
-                    printer_users = ricoh_client.read_users_from_printer(printer.ip_address, fast_list=True, admin_password=printer.admin_password)
+        if stream:
+            async def generate():
+                results = []
+                async for result in service.iter_read(targets, search_code):
+                    results.append(result)
+                    yield json.dumps({"type": "printer", **PrinterUserSyncService.to_summary(result)}) + "\n"
                 
-                printers_scanned.append({
-                    'id': printer.id,
-                    'hostname': printer.hostname,
-                    'ip': printer.ip_address,
-                    'users_count': len(printer_users)
-                })
-                
-                for user in printer_users:
-                    codigo = user['codigo']
-                    
-                    # Si buscamos usuario específico, verificar que coincida
-                    if mode == "specific" and codigo != user_code:
-                        continue
-                    
-                    # Si el usuario no existe en el diccionario, crearlo
-                    if codigo not in users_dict:
-                        # Verificar si ya existe en DB
-                        existing = db.query(User).filter(
-                            User.codigo_de_usuario == codigo
-                        ).first()
-                        
-                        # ACTUALIZACIÓN DE PERSISTENCIA:
-                        # Si ya existe en DB, actualizamos sus permisos reales para esta impresora.
-                        # IMPORTANTE: En modo fast_list los permisos vienen todos en False (no se consultaron
-                        # del hardware). Solo actualizamos permisos cuando hay datos reales del hardware,
-                        # es decir cuando al menos un permiso está en True O cuando es modo specific.
-                        if existing:
-                            from db.repository import AssignmentRepository
-                            permisos_del_usuario = user.get('permisos', {})
-                            tiene_permisos_reales = (
-                                mode == "specific" or
-                                any(permisos_del_usuario.values())
-                            )
-                            if tiene_permisos_reales:
-                                # Permisos reales del hardware → actualizar en BD
-                                AssignmentRepository.update_assignment_state(
-                                    db=db, 
-                                    user_id=existing.id, 
-                                    printer_id=printer.id, 
-                                    entry_index=user.get('entry_index', ''), 
-                                    permissions=permisos_del_usuario
-                                )
-                            else:
-                                # Modo fast_list sin permisos reales → solo crear asignación si no existe,
-                                # preservando los permisos ya guardados en BD
-                                existing_assignment = db.query(UserPrinterAssignment).filter(
-                                    UserPrinterAssignment.user_id == existing.id,
-                                    UserPrinterAssignment.printer_id == printer.id
-                                ).first()
-                                if not existing_assignment:
-                                    # Crear nueva asignación con permisos básicos activos por defecto (usuario descubierto activo físicamente)
-                                    new_assignment = UserPrinterAssignment(
-                                        user_id=existing.id,
-                                        printer_id=printer.id,
-                                        entry_index=user.get('entry_index', ''),
-                                        is_active=True,
-                                        func_copier=True,
-                                        func_printer=True,
-                                        func_scanner=True
-                                    )
-                                    db.add(new_assignment)
-                                    db.commit()
-                                    logger.info(f"   ➕ Nueva asignación creada con permisos activos por defecto para usuario {codigo} en impresora {printer.hostname}")
-                                else:
-                                    # Asignación ya existe: reactivar pero NO tocar los permisos
-                                    if not existing_assignment.is_active:
-                                        existing_assignment.is_active = True
-                                        db.commit()
-                                    logger.debug(f"   🔒 Preservando permisos existentes de {codigo} en {printer.hostname} (modo fast_list)")
-
-                        users_dict[codigo] = {
-                            'nombre': user['nombre'],
-                            'codigo': codigo,
-                            'empresa': user.get('empresa', ''),
-                            'permisos': user['permisos'],
-                            'carpeta': user['carpeta'],
-                            'en_db': existing is not None,
-                            'impresoras': []  # Lista de impresoras donde está registrado
-                        }
-                    
-                    # Agregar esta impresora a la lista del usuario con sus permisos específicos
-                    # IMPORTANTE: Verificar que no esté duplicada (mismo printer_id)
-                    impresora_ya_existe = any(
-                        imp['printer_id'] == printer.id 
-                        for imp in users_dict[codigo]['impresoras']
-                    )
-                    
-                    if not impresora_ya_existe:
-                        logger.debug(f"   ➕ Agregando {codigo} a impresora {printer.hostname} ({printer.ip_address})")
-                        users_dict[codigo]['impresoras'].append({
-                            'printer_id': printer.id,
-                            'printer_name': printer.hostname,
-                            'printer_ip': printer.ip_address,
-                            'entry_index': user.get('entry_index'),
-                            'permisos': user['permisos'],
-                            'carpeta': user['carpeta']
-                        })
-                    else:
-                        logger.debug(f"   🔄 Actualizando {codigo} en impresora {printer.hostname} (ya existía)")
-                        # Si ya existe, actualizar con el entry_index más reciente
-                        for imp in users_dict[codigo]['impresoras']:
-                            if imp['printer_id'] == printer.id:
-                                # Actualizar con datos más recientes
-                                imp['entry_index'] = user.get('entry_index')
-                                imp['permisos'] = user['permisos']
-                                imp['carpeta'] = user['carpeta']
-                                break
-                    
-                    # Actualizar campos globales si aún no están definidos o para reflejar el estado más completo
-                    # (Esto ayuda a pre-poblar el formulario de edición en el front)
-                    if not any(users_dict[codigo]['permisos'].values()):
-                         users_dict[codigo]['permisos'] = user['permisos']
-                    if not users_dict[codigo]['carpeta']:
-                         users_dict[codigo]['carpeta'] = user['carpeta']
-                
-            except Exception as e:
-                errors.append(f"Error en {printer.hostname} ({printer.ip_address}): {str(e)}")
-                printers_scanned.append({
-                    'id': printer.id,
-                    'hostname': printer.hostname,
-                    'ip': printer.ip_address,
-                    'users_count': 0,
-                    'error': str(e)
-                })
-                continue
+                # La sesión del request ya se cerró al empezar el stream: usar una propia
+                order = {t['printer_id']: i for i, t in enumerate(targets)}
+                results.sort(key=lambda r: order[r['printer_id']])
+                stream_db = SessionLocal()
+                try:
+                    sync = PrinterUserSyncService.apply(stream_db, results, search_code)
+                    yield json.dumps({"type": "summary", **_sync_users_response(sync, mode, user_code)}) + "\n"
+                except Exception as e:
+                    logger.error(f"❌ Error aplicando sincronización de usuarios: {e}")
+                    yield json.dumps({"type": "error", "detail": f"Error sincronizando usuarios: {str(e)}"}) + "\n"
+                finally:
+                    stream_db.close()
+            
+            return StreamingResponse(generate(), media_type="application/x-ndjson")
+        
+        results = await service.read_all(targets, search_code)
+        sync = PrinterUserSyncService.apply(db, results, search_code)
         
         # Cerrar el cliente Selenium si se usó
         close_selenium_client()
         
-        # Convertir diccionario a lista
-        users_list = list(users_dict.values())
-        
-        # Calcular estadísticas
-        total_usuarios_unicos = len(users_list)
-        usuarios_en_db = sum(1 for u in users_list if u['en_db'])
-        usuarios_solo_impresoras = total_usuarios_unicos - usuarios_en_db
-        
-        if mode == "specific":
-            if total_usuarios_unicos > 0:
-                user = users_list[0]
-                message = f"✅ Usuario '{user_code}' encontrado: {user['nombre']}"
-                message += f" | Registrado en {len(user['impresoras'])} impresora(s)"
-                if user['en_db']:
-                    message += f" | 💾 Existe en DB"
-                else:
-                    message += f" | 🖨️ Solo en impresoras"
-            else:
-                message = f"❌ Usuario '{user_code}' no encontrado en ninguna impresora"
-        else:
-            message = f"✅ Se encontraron {total_usuarios_unicos} usuarios únicos en {len(printers_scanned)} impresora(s)"
-            message += f" | 💾 {usuarios_en_db} en DB | 🖨️ {usuarios_solo_impresoras} solo en impresoras"
-        
-        if errors:
-            message += f" | ⚠️ Errores: {len(errors)}"
-        
-        return {
-            "success": True,
-            "message": message,
-            "users": users_list,
-            "printers_scanned": printers_scanned,
-            "total_printers": len(printers_scanned),
-            "total_usuarios_unicos": total_usuarios_unicos,
-            "usuarios_en_db": usuarios_en_db,
-            "usuarios_solo_impresoras": usuarios_solo_impresoras,
-            "search_mode": mode,
-            "user_code_searched": user_code if mode == "specific" else None,
-            "errors": errors if errors else []
-        }
+        return _sync_users_response(sync, mode, user_code)
         
     except Exception as e:
         logger.error("=" * 70)
@@ -649,7 +585,6 @@ async def sync_users_from_printers(
         logger.error("=" * 70)
         
         # Asegurar que se cierre Selenium en caso de error
-        from services.ricoh_selenium_client import close_selenium_client
         close_selenium_client()
         
         # Log del traceback completo
@@ -772,11 +707,9 @@ async def get_printer_live_diagnostics(
     try:
         # Solo intentar si el puerto HTTP (80) está abierto
         if ports_status["port_80_http"]["open"]:
-            from services.ricoh_web_client import get_ricoh_web_client
-            ricoh_client = get_ricoh_web_client()
-            # Reset session to avoid conflicts
-            ricoh_client.reset_session()
-            users_list = ricoh_client.read_users_from_printer(ip, fast_list=True, admin_password=printer.admin_password)
+            from services.ricoh_async_client import get_async_ricoh_web_client
+            ricoh_client = get_async_ricoh_web_client()
+            users_list = await ricoh_client.read_users_from_printer(ip, fast_list=True, admin_password=printer.admin_password)
             users_registered_count = len(users_list)
             users_success = True
     except Exception as e:
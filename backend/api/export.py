@@ -5,15 +5,15 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
-import io
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 
 from db.database import get_db
-from db.models import CierreMensual, CierreMensualUsuario, Printer, User
+from db.models import CierreMensual, Printer
 from middleware.auth_middleware import get_current_user
 from services.company_filter_service import CompanyFilterService
+from services.excel_stream_service import xlsx_streaming_response
+from services.export_cierres import obtener_usuarios_cierres, construir_excel_cierre, construir_excel_comparacion
+from services.export_ricoh import construir_comparacion_ricoh
 from services.export_facturacion import exportar_facturacion_excel
 
 router = APIRouter(prefix="/api/export", tags=["export"])
@@ -79,94 +79,23 @@ async def export_cierre_excel(
     if not CompanyFilterService.validate_company_access(current_user, printer.empresa_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a este cierre")
     
-    # Crear workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Cierre"
-    
-    # Estilos
-    header_font = Font(bold=True, size=11)
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Header
-    headers = ['Usuario', 'Nombre', 'B/N', 'COLOR', 'TOTAL IMPRESIONES']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-    
-    # Usuarios ordenados por total de páginas descendente - CONSULTAR TODOS sin límite
-    usuarios = db.query(CierreMensualUsuario).filter(
-        CierreMensualUsuario.cierre_mensual_id == cierre_id
-    ).order_by(
-        CierreMensualUsuario.total_paginas.desc()
-    ).all()
+    # Usuarios del cierre con código y nombre en una sola consulta
+    usuarios = obtener_usuarios_cierres(db, [cierre_id])[cierre_id]
     
     print(f"🔍 [EXPORT EXCEL] Cierre ID: {cierre_id}")
     print(f"🔍 [EXPORT EXCEL] Total usuarios consultados: {len(usuarios)}")
     print(f"🔍 [EXPORT EXCEL] Usuarios con total_paginas > 0: {len([u for u in usuarios if u.total_paginas > 0])}")
     
-    suma_bn = 0
-    suma_color = 0
-    suma_total = 0
-    
-    row = 2
-    for usuario in usuarios:
-        # Obtener datos del usuario desde la tabla users
-        user = db.query(User).filter(User.id == usuario.user_id).first()
-        codigo = user.codigo_de_usuario if user else str(usuario.user_id)
-        nombre = user.name if user else f"Usuario {usuario.user_id}"
-        
-        # EXPORTAR TOTAL ACUMULADO (no consumo del período)
-        bn = usuario.total_bn
-        color = usuario.total_color
-        total = usuario.total_paginas
-        
-        ws.cell(row=row, column=1, value=f'[{codigo}]')
-        ws.cell(row=row, column=2, value=f'[{nombre}]')
-        ws.cell(row=row, column=3, value=bn)
-        ws.cell(row=row, column=4, value=color)
-        ws.cell(row=row, column=5, value=total)
-        
-        suma_bn += bn
-        suma_color += color
-        suma_total += total
-        row += 1
-    
-    # Fila con el total del contador de la impresora
-    ws.cell(row=row, column=8, value=cierre.total_paginas)
-    ws.cell(row=row, column=8).font = Font(bold=True)
-    row += 1
-    
-    # Fila final con suma de usuarios
-    ws.cell(row=row, column=5, value=suma_total)
-    ws.cell(row=row, column=5).font = Font(bold=True, color="0000FF")
-    ws.cell(row=row, column=8, value=suma_total)
-    ws.cell(row=row, column=8).font = Font(bold=True, color="0000FF")
-    
-    # Ajustar anchos de columna
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 30
-    ws.column_dimensions['C'].width = 12
-    ws.column_dimensions['D'].width = 12
-    ws.column_dimensions['E'].width = 18
-    
-    # Guardar en memoria
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
     # Formato: SERIAL DD.MM.YYYY
     fecha_actual = datetime.now().strftime('%d.%m.%Y')
     serial = printer.serial_number if printer and printer.serial_number else printer.hostname if printer else str(cierre.printer_id)
     filename = f"{serial} {fecha_actual}.xlsx"
     
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    # EXPORTAR TOTAL ACUMULADO (no consumo del período); se genera en un hilo y se envía por bloques
+    total_contador = cierre.total_paginas
+    return await xlsx_streaming_response(
+        lambda: construir_excel_cierre(usuarios, total_contador),
+        filename
     )
 
 
@@ -198,126 +127,19 @@ async def export_comparacion_excel(
     if not CompanyFilterService.validate_company_access(current_user, printer.empresa_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tienes acceso a esta impresora")
     
-    # Crear mapa de usuarios por user_id - CONSULTAR TODOS sin límite
-    usuarios_c1_list = db.query(CierreMensualUsuario).filter(
-        CierreMensualUsuario.cierre_mensual_id == cierre1_id
-    ).all()
-    usuarios_c2_list = db.query(CierreMensualUsuario).filter(
-        CierreMensualUsuario.cierre_mensual_id == cierre2_id
-    ).all()
-    
-    usuarios_c1 = {u.user_id: u for u in usuarios_c1_list}
-    usuarios_c2 = {u.user_id: u for u in usuarios_c2_list}
-    
-    # Todos los user_ids únicos
-    user_ids = set(usuarios_c1.keys()).union(set(usuarios_c2.keys()))
-    
-    # Crear workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Comparación"
-    
-    # Estilos
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Header simple con solo diferencias
-    headers = ['Usuario', 'Nombre', 'B/N', 'COLOR', 'TOTAL IMPRESIONES']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-    
-    # Calcular diferencias por usuario
-    usuarios_diff = []
-    suma_bn = 0
-    suma_color = 0
-    suma_total = 0
-    
-    for user_id in user_ids:
-        u1 = usuarios_c1.get(user_id)
-        u2 = usuarios_c2.get(user_id)
-        
-        # Obtener datos del usuario desde la tabla users
-        user = db.query(User).filter(User.id == user_id).first()
-        codigo = user.codigo_de_usuario if user else str(user_id)
-        nombre = user.name if user else f"Usuario {user_id}"
-        
-        # Valores del período 1
-        total_c1 = u1.total_paginas if u1 else 0
-        bn_c1 = u1.total_bn if u1 else 0
-        color_c1 = u1.total_color if u1 else 0
-        
-        # Valores del período 2
-        total_c2 = u2.total_paginas if u2 else 0
-        bn_c2 = u2.total_bn if u2 else 0
-        color_c2 = u2.total_color if u2 else 0
-        
-        # Calcular diferencias (puede ser negativa si hay correcciones)
-        diff_total = total_c2 - total_c1
-        diff_bn = bn_c2 - bn_c1
-        diff_color = color_c2 - color_c1
-        
-        # Incluir todos los usuarios (incluso con diferencia 0 o negativa)
-        usuarios_diff.append({
-            'codigo': codigo,
-            'nombre': nombre,
-            'bn': diff_bn,
-            'color': diff_color,
-            'total': diff_total
-        })
-        
-        suma_bn += diff_bn
-        suma_color += diff_color
-        suma_total += diff_total
-    
-    # Ordenar por diferencia total descendente
-    usuarios_diff.sort(key=lambda x: x['total'], reverse=True)
-    
-    # Escribir usuarios
-    row = 2
-    for u in usuarios_diff:
-        ws.cell(row=row, column=1, value=f'[{u["codigo"]}]')
-        ws.cell(row=row, column=2, value=f'[{u["nombre"]}]')
-        ws.cell(row=row, column=3, value=u['bn'])
-        ws.cell(row=row, column=4, value=u['color'])
-        ws.cell(row=row, column=5, value=u['total'])
-        row += 1
-    
-    # Fila de totales
-    row += 1
-    ws.cell(row=row, column=1, value="TOTALES")
-    ws.cell(row=row, column=1).font = Font(bold=True)
-    ws.cell(row=row, column=3, value=suma_bn)
-    ws.cell(row=row, column=3).font = Font(bold=True)
-    ws.cell(row=row, column=4, value=suma_color)
-    ws.cell(row=row, column=4).font = Font(bold=True)
-    ws.cell(row=row, column=5, value=suma_total)
-    ws.cell(row=row, column=5).font = Font(bold=True, color="0000FF")
-    
-    # Ajustar anchos de columna
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 30
-    ws.column_dimensions['C'].width = 12
-    ws.column_dimensions['D'].width = 12
-    ws.column_dimensions['E'].width = 18
-    
-    # Guardar en memoria
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    # Usuarios de ambos cierres con código y nombre en una sola consulta
+    usuarios = obtener_usuarios_cierres(db, [cierre1_id, cierre2_id])
+    usuarios_c1 = usuarios[cierre1_id]
+    usuarios_c2 = usuarios[cierre2_id]
     
     # Formato: SERIAL DD.MM.YYYY
     fecha_actual = datetime.now().strftime('%d.%m.%Y')
     serial = printer.serial_number if printer and printer.serial_number else str(cierre1.printer_id)
     filename = f"{serial} {fecha_actual}.xlsx"
     
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    return await xlsx_streaming_response(
+        lambda: construir_excel_comparacion(usuarios_c1, usuarios_c2),
+        filename
     )
 
 
@@ -333,8 +155,6 @@ async def export_comparacion_excel_ricoh(
     Formato: 3 hojas con 52 columnas cada una (Período 1, Período 2, Comparativo)
     Compatible con archivos originales de Ricoh
     """
-    from services.export_ricoh import exportar_comparacion_ricoh
-    
     cierre1 = db.query(CierreMensual).filter(CierreMensual.id == cierre1_id).first()
     cierre2 = db.query(CierreMensual).filter(CierreMensual.id == cierre2_id).first()
     
@@ -355,32 +175,24 @@ async def export_comparacion_excel_ricoh(
     if not printer.serial_number:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La impresora debe tener un número de serie")
     
-    # Generar archivo Excel en formato Ricoh
-    wb = exportar_comparacion_ricoh(
-        db=db,
-        serial_number=printer.serial_number,
-        cierre1=cierre1,
-        cierre2=cierre2
-    )
-    
-    # Guardar en memoria
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    # Usuarios de ambos cierres con código y nombre en una sola consulta
+    usuarios = obtener_usuarios_cierres(db, [cierre1_id, cierre2_id])
     
-    # Nombres de meses
-    meses = ['', 'ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO',
-             'JULIO', 'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE']
-    
-    mes1_nombre = meses[cierre1.mes]
-    mes2_nombre = meses[cierre2.mes]
+    # Datos planos para generar el libro en un hilo sin usar la sesión
+    serial_number = printer.serial_number
+    has_color = bool(printer.has_color)
+    meses = (cierre1.mes, cierre2.mes)
+    totales = (cierre1.total_paginas, cierre2.total_paginas)
     
     # Formato: SERIAL DD.MM.YYYY
     fecha_actual = datetime.now().strftime('%d.%m.%Y')
-    filename = f"{printer.serial_number} {fecha_actual}.xlsx"
-    
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    filename = f"{serial_number} {fecha_actual}.xlsx"
+    
+    # Generar archivo Excel en formato Ricoh (write-only, enviado por bloques)
+    return await xlsx_streaming_response(
+        lambda: construir_comparacion_ricoh(
+            serial_number, has_color, *meses, *totales,
+            usuarios[cierre1_id], usuarios[cierre2_id]
+        ),
+        filename
     )
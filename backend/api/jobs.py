@@ -0,0 +1,83 @@
+"""
+Background Jobs API
+Estado y progreso de las operaciones largas encoladas (lecturas y cierres
+masivos, aprovisionamiento, sincronización y desactivación de usuarios)
+"""
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from db.database import get_db
+from db.models_auth import AdminUser
+from middleware.auth_middleware import get_current_user
+from services.job_queue_service import JOB_STATES, job_queue
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def job_accepted_response(job: Dict, message: str) -> JSONResponse:
+    """Respuesta 202 de un endpoint que encoló su trabajo en lugar de ejecutarlo"""
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "success": True,
+            "job_id": job['id'],
+            "status": job['estado'],
+            "status_url": f"/jobs/{job['id']}",
+            "message": message
+        }
+    )
+
+
+def _can_access(job: Dict, user: AdminUser) -> bool:
+    """Superadmin, trabajos de la empresa del usuario o lanzados por él"""
+    if user.is_superadmin():
+        return True
+    return (job['empresa_id'] is not None and job['empresa_id'] == user.empresa_id) or job['creado_por'] == user.id
+
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """
+    Estado de un trabajo
+
+    - **estado**: pending, running, succeeded o failed
+    - **progreso_actual** / **progreso_total**: impresoras procesadas
+    - **items**: resultado de cada impresora en el orden en que terminaron
+      (con el intento en que se obtuvo)
+    - **resultado**: resumen final; **error**: último error (también tras un
+      intento fallido que se reintentará en **disponible_en**)
+    """
+    job = job_queue.get(db, job_id)
+    if job is None or not _can_access(job, current_user):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trabajo {job_id} no encontrado")
+    return job
+
+
+@router.get("")
+async def list_jobs(
+    tipo: Optional[str] = Query(None, description="Tipo de trabajo, ej. counters.read_all"),
+    estado: Optional[str] = Query(None, description="pending, running, succeeded o failed"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """Trabajos más recientes visibles para el usuario (sin items)"""
+    if estado and estado not in JOB_STATES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Estado inválido: {estado}")
+
+    filters = {}
+    if not current_user.is_superadmin():
+        filters = {'empresa_id': current_user.empresa_id, 'creado_por': current_user.id}
+
+    jobs = job_queue.list(db, limit=limit, tipo=tipo, estado=estado, **filters)
+    return {
+        "jobs": [{key: value for key, value in job.items() if key != 'items'} for job in jobs],
+        "total": len(jobs)
+    }
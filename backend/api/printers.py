@@ -1,6 +1,8 @@
 """
 Printer management API routes
 """
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
@@ -20,10 +22,11 @@ from .schemas import (
     CapabilitiesUpdate,
     PrintJobResponse
 )
-from middleware.auth_middleware import get_current_user, get_client_ip, get_user_agent
+from middleware.auth_middleware import get_current_user, get_current_superadmin, get_client_ip, get_user_agent
 from services.company_filter_service import CompanyFilterService
 from services.audit_service import AuditService
 from services.sanitization_service import SanitizationService
+from services.printer_scheduler import printer_scheduler, PRIORITY_INTERACTIVE
 
 router = APIRouter(prefix="/printers", tags=["printers"])
 
@@ -482,6 +485,19 @@ async def update_printer_capabilities(
         )
 
 
+@router.get("/scheduler/stats", status_code=status.HTTP_200_OK)
+async def get_printer_scheduler_stats(current_user: AdminUser = Depends(get_current_superadmin)):
+    """
+    Colas por impresora del planificador (una operación a la vez por equipo)
+    
+    - **queued** / **max_queued**: operaciones en cola ahora y como máximo
+    - **running**: si la impresora tiene una operación en curso
+    - **coalesced**: lecturas duplicadas resueltas con una sola operación
+    - **avg_wait_ms** / **max_wait_ms**: espera en cola; **avg_run_ms** / **max_run_ms**: duración
+    """
+    return printer_scheduler.get_stats()
+
+
 @router.get("/jobs/consolidated", response_model=List[PrintJobResponse])
 async def get_consolidated_jobs(
     current_user: AdminUser = Depends(get_current_user),
@@ -497,31 +513,38 @@ async def get_consolidated_jobs(
     if not printers:
         return []
         
-    from services.ricoh_web_client import get_ricoh_web_client
-    from concurrent.futures import ThreadPoolExecutor
+    from services.ricoh_async_client import get_async_ricoh_web_client
     import logging
     
     logger = logging.getLogger(__name__)
-    client = get_ricoh_web_client()
+    client = get_async_ricoh_web_client()
     
-    def fetch_jobs_for_printer(p):
+    async def fetch_jobs_for_printer(p):
         try:
-            jobs_data = client.get_stored_jobs(p.ip_address, admin_password=p.admin_password)
-            for job in jobs_data:
-                job['printer_id'] = p.id
-                job['printer_ip'] = p.ip_address
-                job['printer_hostname'] = p.hostname or "Sin Hostname"
-                job['printer_serial'] = p.serial_number or "Sin Serial"
-            return jobs_data
+            # Lecturas simultáneas de la misma impresora se unen en una sola
+            jobs_data = await printer_scheduler.run(
+                p.ip_address, client.get_stored_jobs, p.ip_address, admin_password=p.admin_password,
+                priority=PRIORITY_INTERACTIVE, key='stored_jobs'
+            )
+            return [
+                {
+                    **job,
+                    'printer_id': p.id,
+                    'printer_ip': p.ip_address,
+                    'printer_hostname': p.hostname or "Sin Hostname",
+                    'printer_serial': p.serial_number or "Sin Serial"
+                }
+                for job in jobs_data
+            ]
         except Exception as e:
             logger.error(f"Error fetching consolidated jobs from printer {p.ip_address}: {e}")
             return []
 
+    # Impresoras distintas se consultan a la vez; cada una en su propia cola
+    results = await asyncio.gather(*(fetch_jobs_for_printer(p) for p in printers))
     all_jobs = []
-    with ThreadPoolExecutor(max_workers=min(len(printers), 10)) as executor:
-        results = executor.map(fetch_jobs_for_printer, printers)
-        for res in results:
-            all_jobs.extend(res)
+    for res in results:
+        all_jobs.extend(res)
             
     return all_jobs
 
@@ -549,15 +572,18 @@ async def get_printer_jobs(
             detail="Access denied to this printer"
         )
     
-    from services.ricoh_web_client import get_ricoh_web_client
-    client = get_ricoh_web_client()
+    from services.ricoh_async_client import get_async_ricoh_web_client
+    client = get_async_ricoh_web_client()
     
     try:
         # Resolve password
         admin_password = printer.admin_password
         
         # Scrape jobs
-        jobs = client.get_stored_jobs(printer.ip_address, admin_password=admin_password)
+        jobs = await printer_scheduler.run(
+            printer.ip_address, client.get_stored_jobs, printer.ip_address, admin_password=admin_password,
+            priority=PRIORITY_INTERACTIVE, key='stored_jobs'
+        )
         return jobs
     except Exception as e:
         import logging
@@ -596,15 +622,18 @@ async def delete_printer_job(
             detail="Access denied to this printer"
         )
 
-    from services.ricoh_web_client import get_ricoh_web_client
-    client = get_ricoh_web_client()
+    from services.ricoh_async_client import get_async_ricoh_web_client
+    client = get_async_ricoh_web_client()
 
     try:
-        success = client.delete_stored_job(
+        success = await printer_scheduler.run(
+            printer.ip_address,
+            client.delete_stored_job,
             printer.ip_address,
             job_id,
             admin_password=printer.admin_password,
-            job_type=job_type
+            job_type=job_type,
+            priority=PRIORITY_INTERACTIVE
         )
         if not success:
             is_locked = job_type == "locked"
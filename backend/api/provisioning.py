@@ -1,15 +1,24 @@
 """
 Provisioning API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Request
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Request, Query
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from db.database import get_db
+from db.repository import UserRepository
+from db.models import User
+from services.job_queue_service import job_queue
+from services.printer_scheduler import printer_scheduler, PRIORITY_INTERACTIVE
 from services.provisioning import ProvisioningService
+from .jobs import job_accepted_response
 from .schemas import (
     ProvisionRequest,
     ProvisionResponse,
+    BulkProvisionRequest,
+    BulkProvisionResponse,
     UserProvisioningStatus,
     PrinterUsersResponse,
     MessageResponse,
@@ -24,11 +33,15 @@ router = APIRouter(prefix="/provisioning", tags=["provisioning"])
 @router.post("/provision", response_model=ProvisionResponse)
 async def provision_user(
     provision_request: ProvisionRequest,
+    background: bool = Query(False, description="Enqueue the provisioning and return 202 with the job id"),
     db: Session = Depends(get_db)
 ):
     """
     Provision a user to multiple printers
     Creates assignments between user and printers
+    
+    With background=true the provisioning runs in the job queue: busy printers
+    are retried with backoff and per-printer results are available at GET /jobs/{job_id}
     """
     import logging
     logger = logging.getLogger(__name__)
@@ -44,6 +57,22 @@ async def provision_user(
     logger.info(f"   Printer IDs: {provision_request.printer_ids}")
     logger.info(f"   Cantidad de impresoras: {len(provision_request.printer_ids)}")
     
+    if background:
+        user = UserRepository.get_by_id(db, provision_request.user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"User with ID {provision_request.user_id} not found"
+            )
+        job = job_queue.enqueue(
+            db, 'provisioning.provision_user',
+            {'user_id': user.id, 'printer_ids': provision_request.printer_ids, 'reconcile': True},
+            empresa_id=user.empresa_id
+        )
+        return job_accepted_response(
+            job, f"Aprovisionamiento de '{user.name}' en {len(provision_request.printer_ids)} impresora(s) encolado"
+        )
+    
     try:
         result = ProvisioningService.provision_user_to_printers(
             db,
@@ -67,6 +96,67 @@ async def provision_user(
         )
 
 
+@router.post("/provision-bulk", response_model=BulkProvisionResponse)
+async def provision_users_bulk(
+    provision_request: BulkProvisionRequest,
+    background: bool = Query(False, description="Enqueue the provisioning and return 202 with the job id"),
+    db: Session = Depends(get_db)
+):
+    """
+    Provision many users to many printers
+    
+    The work is grouped by printer: one authenticated session and one address
+    book read per printer for the whole batch, printers in parallel. Returns
+    one result per (user, printer) and a user_id -> printer_id -> status matrix.
+    Existing assignments on other printers are not removed.
+    
+    With background=true the provisioning runs in the job queue: users of busy
+    printers are retried with backoff and results are available at GET /jobs/{job_id}
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    user_ids = provision_request.user_ids
+    printer_ids = provision_request.printer_ids
+    logger.info(f"📥 Aprovisionamiento masivo: {len(user_ids)} usuario(s) x {len(printer_ids)} impresora(s)")
+    
+    if background:
+        users = db.query(User.id, User.empresa_id).filter(User.id.in_(user_ids)).all()
+        missing = sorted(set(user_ids) - {u.id for u in users})
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Users with IDs {missing} not found"
+            )
+        empresa_ids = {u.empresa_id for u in users}
+        job = job_queue.enqueue(
+            db, 'provisioning.provision_bulk',
+            {'user_ids': user_ids, 'printer_ids': printer_ids},
+            empresa_id=empresa_ids.pop() if len(empresa_ids) == 1 else None
+        )
+        return job_accepted_response(
+            job, f"Aprovisionamiento de {len(user_ids)} usuario(s) en {len(printer_ids)} impresora(s) encolado"
+        )
+    
+    try:
+        result = await asyncio.to_thread(
+            ProvisioningService.provision_users_to_printers, db, user_ids, printer_ids
+        )
+        return BulkProvisionResponse(**result)
+    except ValueError as e:
+        logger.error(f"❌ Error de validación: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"❌ Error durante aprovisionamiento masivo: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Bulk provisioning failed: {str(e)}"
+        )
+
+
 @router.get("/user/{user_id}", response_model=UserProvisioningStatus)
 async def get_user_provisioning(user_id: int, db: Session = Depends(get_db)):
     """
@@ -167,7 +257,11 @@ async def update_assignment_permissions(
                 # 1. Si no tiene entry_index en DB, intentar buscar al usuario en la impresora por su código
                 if not resolved_entry_index:
                     logger.info(f"   🔍 [{printer.ip_address}] entry_index no registrado en DB para usuario {user.codigo_de_usuario}. Buscando en el equipo...")
-                    user_in_printer = client.find_specific_user(printer.ip_address, user.codigo_de_usuario, admin_password=printer.admin_password)
+                    user_in_printer = await printer_scheduler.run(
+                        printer.ip_address, client.find_specific_user, printer.ip_address,
+                        user.codigo_de_usuario, admin_password=printer.admin_password,
+                        priority=PRIORITY_INTERACTIVE
+                    )
                     if user_in_printer and user_in_printer.get('entry_index'):
                         resolved_entry_index = user_in_printer['entry_index']
                         # Guardar entry_index en DB
@@ -192,7 +286,6 @@ async def update_assignment_permissions(
                 if resolved_entry_index:
                     logger.info(f"   📤 [{printer.ip_address}] Sincronizando funciones en slot {resolved_entry_index}...")
                     
-                    import time
                     attempts = 0
                     max_attempts = 4
                     delay = 5.0
@@ -202,11 +295,15 @@ async def update_assignment_permissions(
                     while attempts < max_attempts:
                         attempts += 1
                         logger.info(f"   [{printer.ip_address}] Intento {attempts} de {max_attempts} para sincronizar permisos...")
-                        res = client.set_user_functions(
-                            printer.ip_address, 
-                            resolved_entry_index, 
-                            permissions, 
-                            admin_password=printer.admin_password
+                        # En la cola de la impresora; la espera entre intentos la libera
+                        res = await printer_scheduler.run(
+                            printer.ip_address,
+                            client.set_user_functions,
+                            printer.ip_address,
+                            resolved_entry_index,
+                            permissions,
+                            admin_password=printer.admin_password,
+                            priority=PRIORITY_INTERACTIVE
                         )
                         
                         if res is True:
@@ -216,7 +313,7 @@ async def update_assignment_permissions(
                             last_res = res
                             logger.warning(f"   [{printer.ip_address}] Impresora ocupada o timeout (intento {attempts}/{max_attempts}). Esperando {delay}s...")
                             if attempts < max_attempts:
-                                time.sleep(delay)
+                                await asyncio.sleep(delay)
                         else:
                             last_res = res
                             break
@@ -343,7 +440,10 @@ async def update_user_functions(
         
         # 5. Actualizar en la impresora física
         client = get_ricoh_web_client()
-        success = client.set_user_functions(printer_ip, assignment.entry_index, permissions)
+        success = await printer_scheduler.run(
+            printer_ip, client.set_user_functions, printer_ip, assignment.entry_index, permissions,
+            priority=PRIORITY_INTERACTIVE
+        )
         
         if not success:
             raise HTTPException(
@@ -512,7 +612,6 @@ async def sync_user_to_all_printers(
     NO modifica los permisos (cada impresora mantiene sus permisos actuales).
     """
     import logging
-    from concurrent.futures import ThreadPoolExecutor
     logger = logging.getLogger(__name__)
     
     try:
@@ -677,10 +776,12 @@ async def sync_user_to_all_printers(
                     'error': f"Excepción de conexión: {str(e)}"
                 }
                 
-        # 4. Disparar el pool de hilos paralelos
-        logger.info(f"🚀 Iniciando ThreadPoolExecutor para {len(printers_to_sync)} impresoras...")
-        with ThreadPoolExecutor(max_workers=min(len(printers_to_sync), 10)) as executor:
-            worker_results = list(executor.map(sync_printer_worker, printers_to_sync))
+        # 4. Encolar en la cola de cada impresora (en paralelo entre impresoras)
+        logger.info(f"🚀 Sincronizando {len(printers_to_sync)} impresoras en sus colas...")
+        worker_results = await asyncio.gather(*(
+            printer_scheduler.run(p['printer_ip'], sync_printer_worker, p, priority=PRIORITY_INTERACTIVE)
+            for p in printers_to_sync
+        ))
             
         # 5. Procesar los resultados y guardar en DB en el hilo principal
         success_count = 0
@@ -2,9 +2,10 @@
 Pydantic schemas for API request/response validation
 """
 from pydantic import BaseModel, Field, validator, EmailStr
-from typing import Optional, List, Literal
+from typing import Optional, List, Literal, Dict
 from datetime import datetime
 import ipaddress
+import re
 
 
 # ============================================================================
@@ -346,6 +347,7 @@ class PrinterResponse(PrinterBase):
     toner_magenta: int
     toner_yellow: int
     toner_black: int
+    page_count: Optional[int] = None
     last_seen: Optional[datetime]
     notes: Optional[str]
     created_at: datetime
@@ -388,7 +390,7 @@ class ScanRequest(BaseModel):
     """Request schema for network scan"""
     ip_range: str = Field(
         ...,
-        description="IP range in CIDR notation (e.g., 192.168.1.0/24)",
+        description="IP range in CIDR notation, or several ranges separated by commas (e.g., 192.168.1.0/24,192.168.2.0/24)",
         example="192.168.1.0/24"
     )
     
@@ -396,7 +398,11 @@ class ScanRequest(BaseModel):
     def validate_ip_range(cls, v):
         """Validate CIDR notation"""
         try:
-            ipaddress.ip_network(v, strict=False)
+            for item in re.split(r'[,\s]+', v):
+                if item:
+                    ipaddress.ip_network(item, strict=False)
+            if not v.strip(' ,'):
+                raise ValueError("empty")
             return v
         except ValueError:
             raise ValueError("Invalid IP range format. Use CIDR notation (e.g., 192.168.1.0/24)")
@@ -455,6 +461,60 @@ class ProvisionResponse(BaseModel):
     message: str
 
 
+class BulkProvisionRequest(BaseModel):
+    """Request schema for bulk provisioning (every user on every printer)"""
+    user_ids: List[int] = Field(..., min_items=1, max_items=1000, description="User IDs to provision")
+    printer_ids: List[int] = Field(..., min_items=1, description="List of printer IDs")
+    
+    @validator('user_ids', 'printer_ids')
+    def validate_ids(cls, v):
+        """Ensure all IDs are positive and unique"""
+        if not all(i > 0 for i in v):
+            raise ValueError("All IDs must be positive integers")
+        if len(set(v)) != len(v):
+            raise ValueError("IDs must not be repeated")
+        return v
+
+
+class BulkProvisionPrinterSummary(BaseModel):
+    """Result of one printer batch"""
+    printer_id: int
+    hostname: str
+    ip_address: str
+    users: int
+    successful: int
+    failed: int
+    elapsed_seconds: float
+
+
+class BulkProvisionResult(BaseModel):
+    """Result of provisioning one user to one printer"""
+    user_id: int
+    codigo_de_usuario: str
+    printer_id: int
+    hostname: str
+    ip_address: str
+    status: Literal['success', 'failed']
+    error_message: Optional[str] = None
+    retry_attempts: int = 0
+    provisioned_at: Optional[str] = None
+    entry_index: Optional[str] = None
+
+
+class BulkProvisionResponse(BaseModel):
+    """Response schema for bulk provisioning"""
+    success: bool
+    total_users: int
+    total_printers: int
+    successful_count: int
+    failed_count: int
+    elapsed_seconds: float
+    message: str
+    matrix: Dict[int, Dict[int, str]] = Field(..., description="user_id -> printer_id -> status")
+    printers: List[BulkProvisionPrinterSummary]
+    results: List[BulkProvisionResult]
+
+
 class UserProvisioningStatus(BaseModel):
     """Schema for user provisioning status"""
     user_id: int
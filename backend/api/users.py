@@ -1,7 +1,7 @@
 """
 User management API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
@@ -12,7 +12,10 @@ import logging
 from db.database import get_db
 from db.repository import UserRepository, PrinterRepository
 from db.models import User, UserPrinterAssignment
+from db.models_auth import AdminUser
+from middleware.auth_middleware import get_current_user
 from services.encryption_service import EncryptionService
+from services.job_queue_service import job_queue
 from services.provisioning import ProvisioningService
 from services.sanitization_service import SanitizationService
 from .schemas import UserCreate, UserUpdate, UserResponse, UserListResponse, MessageResponse, UserCreateResponse
@@ -20,6 +23,10 @@ from .schemas import UserCreate, UserUpdate, UserResponse, UserListResponse, Mes
 router = APIRouter(prefix="/users", tags=["users"])
 logger = logging.getLogger(__name__)
 
+# Intentos del trabajo de desactivación física: con el backoff de la cola cubre
+# impresoras ocupadas durante varios minutos sin bloquear un worker
+USER_DEACTIVATION_MAX_ATTEMPTS = 6
+
 
 @router.post("/debug", status_code=200)
 async def debug_user_creation(request: Request):
@@ -326,154 +333,17 @@ async def update_user(
         )
 
 
-def deactivate_user_printers_task(user_id: int, printers_to_deactivate: List[dict]):
-    """
-    Background task to deactivate permissions on physical printers.
-    Retries multiple times in case the printers are busy.
-    """
-    from db.database import SessionLocal
-    from db.models import UserPrinterAssignment
-    from services.ricoh_web_client import create_ricoh_web_client
-    from concurrent.futures import ThreadPoolExecutor
-    import time
-    
-    logger.info(f"🚀 [BACKGROUND TASK] Starting physical deactivation for user ID {user_id} on {len(printers_to_deactivate)} printers...")
-    
-    def deactivate_printer_worker(p_data):
-        client = create_ricoh_web_client()
-        printer_ip = p_data['printer_ip']
-        entry_index = p_data['entry_index']
-        admin_password = p_data['admin_password']
-        codigo = p_data['codigo_de_usuario']
-        
-        resolved_entry_index = entry_index
-        disabled_permissions = {
-            'copiadora': False,
-            'copiadora_color': False,
-            'escaner': False,
-            'impresora': False,
-            'impresora_color': False,
-            'document_server': False,
-            'fax': False,
-            'navegador': False
-        }
-        
-        try:
-            # If no entry_index is recorded in DB, try to find the user on the printer
-            if not resolved_entry_index:
-                user_in_printer = client.find_specific_user(printer_ip, codigo, admin_password=admin_password)
-                if user_in_printer and user_in_printer.get('entry_index'):
-                    resolved_entry_index = user_in_printer['entry_index']
-            
-            if resolved_entry_index:
-                logger.info(f"   🚫 [{printer_ip}] [BACKGROUND] Deshabilitando funciones para slot {resolved_entry_index}...")
-                
-                attempts = 0
-                max_attempts = 30  # Retry up to 30 times (around 5 minutes total) to handle busy printers!
-                delay = 10.0      # Wait 10 seconds between attempts
-                sync_success = False
-                last_res = None
-                
-                while attempts < max_attempts:
-                    attempts += 1
-                    logger.info(f"   [{printer_ip}] [BACKGROUND] Intento {attempts} de {max_attempts} para deshabilitar funciones...")
-                    res = client.set_user_functions(
-                        printer_ip, 
-                        resolved_entry_index, 
-                        disabled_permissions, 
-                        admin_password=admin_password,
-                        set_password=False
-                    )
-                    
-                    if res is True:
-                        sync_success = True
-                        break
-                    elif res in ["BUSY", "TIMEOUT"]:
-                        last_res = res
-                        logger.warning(f"   [{printer_ip}] [BACKGROUND] Impresora ocupada o timeout (intento {attempts}/{max_attempts}). Esperando {delay}s...")
-                        if attempts < max_attempts:
-                            time.sleep(delay)
-                    else:
-                        last_res = res
-                        break
-                        
-                if sync_success:
-                    return {
-                        'assignment_id': p_data['assignment_id'],
-                        'success': True,
-                        'entry_index': resolved_entry_index,
-                        'error': None
-                    }
-                else:
-                    err_msg = "Error de respuesta de la interfaz web de la impresora"
-                    if last_res == "BUSY":
-                        err_msg = "este dispositivo está siendo utilizado por otras funciones. Inténtelo de nuevo posteriormente."
-                    elif last_res == "TIMEOUT":
-                        err_msg = "tiempo de espera agotado al conectar con la impresora"
-                    return {
-                        'assignment_id': p_data['assignment_id'],
-                        'success': False,
-                        'entry_index': resolved_entry_index,
-                        'error': err_msg
-                    }
-            else:
-                return {
-                    'assignment_id': p_data['assignment_id'],
-                    'success': True,  # Treat as success since they are not on the printer anyway
-                    'entry_index': None,
-                    'error': "Usuario no encontrado en la impresora"
-                }
-        except Exception as e:
-            return {
-                'assignment_id': p_data['assignment_id'],
-                'success': False,
-                'entry_index': resolved_entry_index,
-                'error': f"Excepción de conexión: {str(e)}"
-            }
-
-    with ThreadPoolExecutor(max_workers=min(len(printers_to_deactivate), 10)) as executor:
-        worker_results = list(executor.map(deactivate_printer_worker, printers_to_deactivate))
-        
-    # Update DB records inside the background task using a dedicated session
-    db_bg = SessionLocal()
-    try:
-        for res in worker_results:
-            assignment = db_bg.query(UserPrinterAssignment).filter(
-                UserPrinterAssignment.id == res['assignment_id']
-            ).first()
-            if assignment:
-                # Set all permissions to False in DB to reflect physical printer state
-                assignment.func_copier = False
-                assignment.func_copier_color = False
-                assignment.func_printer = False
-                assignment.func_printer_color = False
-                assignment.func_document_server = False
-                assignment.func_fax = False
-                assignment.func_scanner = False
-                assignment.func_browser = False
-                
-                # Keep assignment active but with no permissions to preserve the list
-                # assignment.is_active = False
-                
-                if res['entry_index']:
-                    assignment.entry_index = res['entry_index']
-                
-                if not res['success']:
-                    logger.warning(f"⚠️ [BACKGROUND] Error deshabilitando permisos en Impresora {assignment.printer.ip_address}: {res['error']}")
-        db_bg.commit()
-        logger.info(f"✅ [BACKGROUND TASK] Finished physical deactivation for user ID {user_id}.")
-    except Exception as e:
-        logger.error(f"❌ [BACKGROUND TASK] Error updating DB assignments: {e}")
-        db_bg.rollback()
-    finally:
-        db_bg.close()
-
-
 @router.delete("/{user_id}", response_model=MessageResponse)
-async def delete_user(user_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def delete_user(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user)
+):
     """
     Delete user (soft delete)
-    Deactivates user in DB instantly and disables all permissions on all assigned printers in parallel in the background.
+    Deactivates user in DB instantly and enqueues a job that disables all permissions
+    on all assigned printers (busy printers are retried with backoff, see GET /jobs/{job_id}).
+    The job runs on a process with ENABLE_JOB_WORKER=true; until then it stays queued.
     """
     from db.models import UserPrinterAssignment
     
@@ -496,8 +366,6 @@ async def delete_user(user_id: int, background_tasks: BackgroundTasks, db: Sessi
             printers_to_deactivate.append({
                 'assignment_id': a.id,
                 'printer_id': printer.id,
-                'printer_ip': printer.ip_address,
-                'admin_password': printer.admin_password,
                 'entry_index': a.entry_index,
                 'codigo_de_usuario': user.codigo_de_usuario
             })
@@ -510,17 +378,27 @@ async def delete_user(user_id: int, background_tasks: BackgroundTasks, db: Sessi
             detail="Failed to delete user in database"
         )
         
-    # 3. Schedule physical deactivation in background
+    # 3. Enqueue physical deactivation (survives restarts, retries busy printers)
+    message = f"Usuario '{user.name}' desactivado del sistema."
     if printers_to_deactivate:
-        background_tasks.add_task(
-            deactivate_user_printers_task,
-            user_id=user_id,
-            printers_to_deactivate=printers_to_deactivate
+        job = job_queue.enqueue(
+            db, 'users.deactivate_printers',
+            {'user_id': user_id, 'printers': printers_to_deactivate},
+            creado_por=current_user.id,
+            empresa_id=user.empresa_id,
+            max_intentos=USER_DEACTIVATION_MAX_ATTEMPTS
         )
+        message += (f" La desactivación en {len(printers_to_deactivate)} equipo(s) quedó en cola "
+                    f"(trabajo {job['id']}, ver GET /jobs/{job['id']}).")
+        if not job_queue.workers_running:
+            logger.warning(
+                f"⚠️ Desactivación física del usuario {user_id} encolada (trabajo {job['id']}) sin workers "
+                f"en este proceso: solo se ejecutará en un proceso con ENABLE_JOB_WORKER=true"
+            )
         
     return MessageResponse(
         success=True,
-        message=f"Usuario '{user.name}' desactivado del sistema. La actualización física en los equipos se está procesando en segundo plano."
+        message=message
     )
 
 
@@ -228,6 +228,7 @@ class Printer(Base):
     tiene_contador_usuario = Column(Boolean, default=True, nullable=False)  # Tiene getUserCounter.cgi
     usar_contador_ecologico = Column(Boolean, default=False, nullable=False)  # Usar getEcoCounter.cgi para usuarios
     formato_contadores = Column(String(50), default='estandar', nullable=False)  # Formato: 'estandar' (18 cols), 'simplificado' (13 cols), 'ecologico'
+    tamano_pagina_contadores = Column(Integer, nullable=True)  # Usuarios por página aceptados (aprendido al leer)
     
     # Capabilities JSON (new field from migration 010)
     capabilities_json = Column(JSONB, nullable=True)
@@ -238,6 +239,7 @@ class Printer(Base):
     toner_magenta = Column(Integer, default=0)
     toner_yellow = Column(Integer, default=0)
     toner_black = Column(Integer, default=0)
+    page_count = Column(Integer, nullable=True)  # prtMarkerLifeCount del último sondeo SNMP
     
     # Metadata
     last_seen = Column(DateTime(timezone=True), nullable=True)
@@ -494,6 +496,31 @@ class ContadorUsuario(Base):
         return f"<ContadorUsuario(printer_id={self.printer_id}, user_id={self.user_id}, total={self.total_paginas})>"
 
 
+class LecturaContadorUsuario(Base):
+    """
+    Registro de cada lectura de contadores por usuario de una impresora
+    En modo incremental solo se guardan las filas de ContadorUsuario que
+    cambiaron; este registro deja constancia de la lectura aunque no cambie nada
+    """
+    __tablename__ = "lecturas_contadores_usuario"
+
+    id = Column(Integer, primary_key=True, index=True)
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), nullable=False, index=True)
+    fecha_lectura = Column(DateTime(timezone=True), nullable=False, index=True)
+    tipo_contador = Column(String(20), nullable=False)  # "usuario" o "ecologico"
+    modo = Column(String(20), nullable=False)  # "incremental" o "full"
+    usuarios_leidos = Column(Integer, default=0, nullable=False)
+    filas_escritas = Column(Integer, default=0, nullable=False)
+    filas_omitidas = Column(Integer, default=0, nullable=False)
+
+    # Relationships
+    printer = relationship("Printer")
+
+    def __repr__(self):
+        return (f"<LecturaContadorUsuario(printer_id={self.printer_id}, escritas={self.filas_escritas}, "
+                f"omitidas={self.filas_omitidas})>")
+
+
 class CierreMensual(Base):
     """
     Cierre de contadores (diario, semanal, mensual, personalizado)
@@ -579,6 +606,10 @@ class CierreMensualUsuario(Base):
     consumo_escaner = Column(Integer, nullable=False)
     consumo_fax = Column(Integer, nullable=False)
     
+    # Consumo del mes separado en B/N y color (calculado al crear el cierre)
+    consumo_bn = Column(Integer, nullable=False, default=0, server_default="0")
+    consumo_color = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # Metadata
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -657,3 +688,42 @@ class ScheduledClosure(Base):
         return f"<ScheduledClosure(id={self.id}, frequency='{self.frequency}', time='{self.scheduled_time}')>"
 
 
+class BackgroundJob(Base):
+    """
+    Operación larga sobre impresoras encolada para el worker de trabajos
+    (lecturas y cierres masivos, aprovisionamiento, sincronización de usuarios)
+    Persistida para sobrevivir a reinicios: un trabajo 'running' cuyo lease
+    vence vuelve a ejecutarse
+    """
+    __tablename__ = "background_jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    tipo = Column(String(50), nullable=False, index=True)  # Handler registrado, ej: "counters.read_all"
+    estado = Column(String(20), nullable=False, default="pending", index=True)  # pending, running, succeeded, failed
+    payload = Column(JSONB, nullable=False)
+    resultado = Column(JSONB, nullable=True)
+    items = Column(JSONB, nullable=True)  # Resultado por impresora, en el orden en que terminan
+
+    # Progreso
+    progreso_actual = Column(Integer, default=0, nullable=False)
+    progreso_total = Column(Integer, nullable=True)
+    mensaje = Column(String(500), nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Reintentos y lease del worker
+    intentos = Column(Integer, default=0, nullable=False)
+    max_intentos = Column(Integer, default=3, nullable=False)
+    disponible_en = Column(DateTime(timezone=True), nullable=False, index=True)  # No se ejecuta antes (backoff)
+    bloqueado_por = Column(String(100), nullable=True)  # Worker que lo ejecuta
+    bloqueado_hasta = Column(DateTime(timezone=True), nullable=True)  # Vencido = worker caído
+
+    # Auditoría y multi-tenancy
+    creado_por = Column(Integer, ForeignKey("admin_users.id", ondelete="SET NULL"), nullable=True, index=True)
+    empresa_id = Column(Integer, ForeignKey("empresas.id", ondelete="CASCADE"), nullable=True, index=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<BackgroundJob(id='{self.id}', tipo='{self.tipo}', estado='{self.estado}')>"
@@ -2,7 +2,7 @@
 Repository pattern for database operations
 Provides abstraction layer between API and database
 """
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterable, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, and_
 from datetime import datetime
@@ -14,17 +14,9 @@ class UserRepository:
     """Repository for User operations"""
     
     @staticmethod
-    def create(db: Session, name: str, codigo_de_usuario: str, 
-               network_username: str, network_password_encrypted: str,
-               smb_server: str, smb_port: int, smb_path: str,
-               func_copier: bool = False, func_copier_color: bool = False,
-               func_printer: bool = False, func_printer_color: bool = False,
-               func_document_server: bool = False, func_fax: bool = False,
-               func_scanner: bool = False, func_browser: bool = False,
-               empresa: Optional[str] = None, centro_costos: Optional[str] = None) -> User:
-        """Create a new user with complete configuration"""
-        
-        # 1. Get or create SMB Server
+    def get_or_create_smb_references(db: Session, smb_server: str, smb_port: int, network_username: str,
+                                     network_password_encrypted: str) -> Tuple[SMBServer, NetworkCredential]:
+        """Get or create the SMB server and network credential a user points to (flushed, with IDs)"""
         smb_server_obj = db.query(SMBServer).filter(
             SMBServer.server_address == smb_server,
             SMBServer.port == smb_port
@@ -40,7 +32,6 @@ class UserRepository:
             db.add(smb_server_obj)
             db.flush()  # Get the ID without committing
         
-        # 2. Get or create Network Credential
         network_cred_obj = db.query(NetworkCredential).filter(
             NetworkCredential.username == network_username
         ).first()
@@ -55,6 +46,24 @@ class UserRepository:
             db.add(network_cred_obj)
             db.flush()  # Get the ID without committing
         
+        return smb_server_obj, network_cred_obj
+    
+    @staticmethod
+    def create(db: Session, name: str, codigo_de_usuario: str, 
+               network_username: str, network_password_encrypted: str,
+               smb_server: str, smb_port: int, smb_path: str,
+               func_copier: bool = False, func_copier_color: bool = False,
+               func_printer: bool = False, func_printer_color: bool = False,
+               func_document_server: bool = False, func_fax: bool = False,
+               func_scanner: bool = False, func_browser: bool = False,
+               empresa: Optional[str] = None, centro_costos: Optional[str] = None) -> User:
+        """Create a new user with complete configuration"""
+        
+        # 1-2. Get or create SMB Server and Network Credential
+        smb_server_obj, network_cred_obj = UserRepository.get_or_create_smb_references(
+            db, smb_server, smb_port, network_username, network_password_encrypted
+        )
+        
         # 3. Resolve empresa_id and centro_costo_id
         empresa_id = None
         if empresa:
@@ -114,7 +123,15 @@ class UserRepository:
     def get_by_id(db: Session, user_id: int) -> Optional[User]:
         """Get user by ID"""
         return db.query(User).filter(User.id == user_id).first()
-    
+
+    @staticmethod
+    def get_map_by_ids(db: Session, user_ids: Iterable[Optional[int]]) -> Dict[int, User]:
+        """Get users by ID in a single IN query, keyed by ID (avoids N+1 lookups)"""
+        ids = {user_id for user_id in user_ids if user_id is not None}
+        if not ids:
+            return {}
+        return {user.id: user for user in db.query(User).filter(User.id.in_(ids)).all()}
+
     @staticmethod
     def get_by_empresa(db: Session, empresa: str) -> Optional[User]:
         """Get user by empresa"""
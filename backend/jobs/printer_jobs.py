@@ -0,0 +1,248 @@
+"""
+Printer Jobs - Operaciones largas sobre impresoras ejecutadas por la cola de trabajos
+Cada handler reporta el resultado de cada impresora con ctx.item() y retorna
+un resumen. Las impresoras ocupadas se reintentan como un nuevo intento del
+trabajo (RetryableJobError con solo las pendientes) en lugar de bloquear un
+worker con esperas
+"""
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Dict
+
+from db.models import CierreMensual, Printer
+from services.job_queue_service import JobContext, RetryableJobError, job_handler
+from services.printer_scheduler import PRIORITY_NORMAL
+
+logger = logging.getLogger(__name__)
+
+
+def _printer_targets(ctx: JobContext, printer_ids, build_targets):
+    """Targets de las impresoras del payload, en el orden del payload"""
+    with ctx.session() as db:
+        printers = {p.id: p for p in db.query(Printer).filter(Printer.id.in_(printer_ids)).all()}
+        return build_targets([printers[pid] for pid in printer_ids if pid in printers])
+
+
+def _read_fleet(ctx: JobContext, printer_ids, max_workers=None, fase=None) -> Dict:
+    from services.fleet_read_service import FleetReadService, load_fleet_read_config_from_env
+
+    config = load_fleet_read_config_from_env()
+    if max_workers:
+        config.max_workers = max_workers
+    fleet = FleetReadService(config=config, session_factory=ctx.session_factory)
+    targets = _printer_targets(ctx, printer_ids, FleetReadService.build_targets)
+
+    start = time.monotonic()
+    successful = 0
+    for result in fleet.iter_read(targets):
+        summary = FleetReadService.to_summary(result)
+        successful += 1 if summary['success'] else 0
+        ctx.item({'fase': fase, **summary} if fase else summary,
+                 message=f"Lectura de {summary['printer_name']}: {'OK' if summary['success'] else summary['error']}")
+
+    return {
+        'successful': successful,
+        'failed': len(targets) - successful,
+        'total': len(targets),
+        'elapsed_seconds': round(time.monotonic() - start, 3)
+    }
+
+
+@job_handler('counters.read_all')
+def read_all_counters(ctx: JobContext, payload: Dict) -> Dict:
+    """Lectura de contadores de flota (POST /api/counters/read-all?background=true)"""
+    printer_ids = payload['printer_ids']
+    ctx.progress(completed=0, total=len(printer_ids), message=f"Leyendo contadores de {len(printer_ids)} impresoras")
+    resultado = _read_fleet(ctx, printer_ids, payload.get('max_workers'))
+    return {
+        'message': f"Lectura completada: {resultado['successful']} exitosas, {resultado['failed']} fallidas",
+        **resultado
+    }
+
+
+@job_handler('counters.close_all')
+def close_all_printers(ctx: JobContext, payload: Dict) -> Dict:
+    """
+    Lectura y cierre masivo (POST /api/counters/close-all?background=true)
+    Idempotente: al re-ejecutarse (reintento o lease vencido) las impresoras
+    que ya tienen el cierre del período no se vuelven a cerrar
+    """
+    from services.close_service import CloseService
+
+    fecha_inicio = date.fromisoformat(payload['fecha_inicio'])
+    fecha_fin = date.fromisoformat(payload['fecha_fin'])
+
+    # Las impresoras ya cerradas en un intento anterior no se vuelven a leer
+    with ctx.session() as db:
+        cerradas = {printer_id for (printer_id,) in db.query(CierreMensual.printer_id).filter(
+            CierreMensual.printer_id.in_(payload['printer_ids']),
+            CierreMensual.fecha_inicio == fecha_inicio,
+            CierreMensual.fecha_fin == fecha_fin
+        )}
+    printer_ids = [printer_id for printer_id in payload['printer_ids'] if printer_id not in cerradas]
+    ctx.progress(completed=0, total=len(printer_ids) + len(payload['printer_ids']),
+                 message=f"Leyendo contadores de {len(printer_ids)} impresoras")
+
+    # PASO 1: Leer contadores para que los snapshots sean actuales
+    lecturas = _read_fleet(ctx, printer_ids, fase='lectura')
+
+    # PASO 2: Cierres (una transacción por impresora)
+    ctx.progress(message=f"Creando cierres de {len(payload['printer_ids'])} impresoras")
+    with ctx.session() as db:
+        resultado = CloseService.create_close_all_printers(
+            db=db,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            cerrado_por=payload.get('cerrado_por'),
+            notas=payload.get('notas'),
+            empresa_id=payload.get('empresa_id'),
+            session_factory=ctx.session_factory,
+            on_result=lambda r: ctx.item(
+                {'fase': 'cierre', **r},
+                message=f"Cierre de {r['printer_name']}: "
+                        f"{'ya existente' if r.get('skipped') else 'OK' if r['success'] else r['error']}"
+            ),
+            skip_existing=True
+        )
+
+    resultado.pop('results', None)  # Ya están en items
+    return {**resultado, 'lecturas': lecturas}
+
+
+@job_handler('provisioning.provision_user')
+def provision_user(ctx: JobContext, payload: Dict) -> Dict:
+    """
+    Aprovisionamiento de un usuario (POST /provisioning/provision?background=true)
+    Las impresoras ocupadas se reintentan en el siguiente intento del trabajo
+    """
+    from services.provisioning import ProvisioningService
+
+    printer_ids = payload['printer_ids']
+    ctx.progress(completed=0, total=len(printer_ids), message=f"Aprovisionando usuario en {len(printer_ids)} impresoras")
+
+    with ctx.session() as db:
+        result = ProvisioningService.provision_user_to_printers(
+            db,
+            payload['user_id'],
+            printer_ids,
+            reconcile=payload.get('reconcile', True),
+            busy_retry_delay=None,
+            priority=PRIORITY_NORMAL,
+            on_result=lambda r: ctx.item(
+                r, message=f"Aprovisionamiento en {r['hostname']}: {r['status']}"
+            )
+        )
+
+    busy = result.pop('busy_printer_ids')
+    if busy:
+        raise RetryableJobError(
+            f"{len(busy)} impresora(s) ocupada(s)",
+            payload={**payload, 'printer_ids': busy, 'reconcile': False}
+        )
+    result.pop('results', None)  # Ya están en items
+    return result
+
+
+@job_handler('provisioning.provision_bulk')
+def provision_bulk(ctx: JobContext, payload: Dict) -> Dict:
+    """
+    Aprovisionamiento masivo (POST /provisioning/provision-bulk?background=true)
+    Los usuarios de impresoras ocupadas se reintentan en el siguiente intento
+    """
+    from services.provisioning import ProvisioningService
+
+    pending = payload.get('pending')
+    if pending is not None:
+        pending = {int(printer_id): user_ids for printer_id, user_ids in pending.items()}
+    total = sum(map(len, pending.values())) if pending else len(payload['user_ids']) * len(payload['printer_ids'])
+    ctx.progress(completed=0, total=total, message=f"Aprovisionando {total} usuario(s) por impresora")
+
+    with ctx.session() as db:
+        result = ProvisioningService.provision_users_to_printers(
+            db,
+            payload['user_ids'],
+            payload['printer_ids'],
+            pending=pending,
+            busy_retry_delay=None,
+            priority=PRIORITY_NORMAL,
+            session_factory=ctx.session_factory,
+            on_result=lambda r: ctx.item(
+                r, message=f"Aprovisionamiento de {r['codigo_de_usuario']} en {r['hostname']}: {r['status']}"
+            )
+        )
+
+    busy = result.pop('busy')
+    if busy:
+        raise RetryableJobError(
+            f"{len(busy)} impresora(s) ocupada(s)",
+            payload={**payload, 'pending': {str(printer_id): user_ids for printer_id, user_ids in busy.items()}}
+        )
+    result.pop('results', None)  # Ya están en items
+    return result
+
+
+@job_handler('discovery.sync_users')
+async def sync_users_from_printers(ctx: JobContext, payload: Dict) -> Dict:
+    """Sincronización de usuarios desde las libretas (POST /discovery/sync-users-from-printers?background=true)"""
+    from api.discovery import _sync_users_response
+    from services.printer_user_sync_service import PrinterUserSyncService
+
+    user_code = payload.get('user_code')
+    targets = await asyncio.to_thread(
+        _printer_targets, ctx, payload['printer_ids'], PrinterUserSyncService.build_targets
+    )
+    await asyncio.to_thread(ctx.progress, 0, len(targets), f"Leyendo usuarios de {len(targets)} impresoras")
+
+    service = PrinterUserSyncService()
+    results = []
+    async for result in service.iter_read(targets, user_code):
+        results.append(result)
+        await asyncio.to_thread(ctx.item, PrinterUserSyncService.to_summary(result))
+
+    order = {t['printer_id']: i for i, t in enumerate(targets)}
+    results.sort(key=lambda r: order[r['printer_id']])
+
+    def apply():
+        with ctx.session() as db:
+            return PrinterUserSyncService.apply(db, results, user_code)
+
+    sync = await asyncio.to_thread(apply)
+    return _sync_users_response(sync, "specific" if user_code else "all", user_code)
+
+
+@job_handler('users.deactivate_printers')
+def deactivate_user_printers(ctx: JobContext, payload: Dict) -> Dict:
+    """
+    Desactivación física de un usuario eliminado (DELETE /users/{id})
+    Unos pocos reintentos por impresora en el intento; las que siguen
+    ocupadas pasan al siguiente intento del trabajo
+    """
+    from services.provisioning import ProvisioningService
+
+    printers = payload['printers']
+    ctx.progress(completed=0, total=len(printers), message=f"Deshabilitando usuario en {len(printers)} impresoras")
+
+    results = ProvisioningService.deactivate_user_on_printers(
+        payload['user_id'],
+        printers,
+        busy_attempts=3,
+        session_factory=ctx.session_factory,
+        on_result=lambda r: ctx.item(r)
+    )
+
+    busy_ids = {r['assignment_id'] for r in results if r['busy']}
+    if busy_ids:
+        raise RetryableJobError(
+            f"{len(busy_ids)} impresora(s) ocupada(s)",
+            payload={**payload, 'printers': [p for p in printers if p['assignment_id'] in busy_ids]}
+        )
+
+    successful = sum(1 for r in results if r['success'])
+    return {
+        'user_id': payload['user_id'],
+        'successful': successful,
+        'failed': len(results) - successful,
+        'total': len(results)
+    }
@@ -14,7 +14,7 @@ import os
 import secrets
 import json
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from typing import List, Dict, Optional
 import asyncio
 from collections import defaultdict
@@ -74,11 +74,17 @@ from api.empresas import router as empresas_router
 from api.admin_users import router as admin_users_router
 from api.ddos_admin import router as ddos_admin_router
 from api.sync import router as sync_router  # ← NUEVO
+from api.jobs import router as jobs_router
 
 # Import middleware
 from middleware.ddos_protection import DDoSProtectionMiddleware
 from middleware.https_redirect import HTTPSRedirectMiddleware
 from middleware.csrf_protection import CSRFProtectionMiddleware
+from middleware.security_headers import SecurityHeadersMiddleware
+from middleware.auth_middleware import get_current_superadmin
+
+from services.ws_broadcast_service import BroadcastHub
+from services.rate_limiter_service import RateLimiterService, SlidingWindowLimiter
 
 
 # ============================================================================
@@ -105,37 +111,39 @@ class ConnectionManager:
     - Max inbound message size (prevents large payload attacks)
     - Safe disconnect with no KeyError on double-remove
     - Audit logging on connect and disconnect
+
+    Outbound messages go through a BroadcastHub: each connection has a bounded
+    send queue and its own writer task, and broadcasts are fanned out to every
+    worker through the broadcast bus (Redis pub/sub when available).
     """
 
     def __init__(self):
-        # {websocket: {user_id, username, rol, ip, connected_at, msg_count, msg_window_start}}
+        # {websocket: {user_id, username, rol, ip, connected_at}}
         self._connections: Dict[WebSocket, dict] = {}
 
-        # {ip: [timestamp, ...]}  — sliding window for connection rate limiting
-        self._conn_attempts: Dict[str, List[datetime]] = defaultdict(list)
+        # Per-session message rate (sliding window, keyed by connection id)
+        self._message_limiter = SlidingWindowLimiter(max_keys=4096, shards=4)
 
         # {ip: count}  — current open connections per IP
         self._connections_by_ip: Dict[str, int] = defaultdict(int)
 
+        # Per-connection send queues + cross-worker bus
+        self._hub = BroadcastHub(on_client_lost=self.disconnect)
+
     # ------------------------------------------------------------------
     # Rate limiting helpers
     # ------------------------------------------------------------------
 
     def _check_connection_rate(self, ip: str) -> bool:
-        """Return True if the IP is allowed to open a new connection."""
-        now = datetime.now(timezone.utc)
-        window_start = now - timedelta(seconds=WS_RATE_LIMIT_WINDOW_SECONDS)
-
-        # Prune old timestamps
-        self._conn_attempts[ip] = [
-            ts for ts in self._conn_attempts[ip] if ts > window_start
-        ]
-
-        if len(self._conn_attempts[ip]) >= WS_RATE_LIMIT_CONNECTIONS:
-            return False
+        """
+        Return True if the IP is allowed to open a new connection.
 
-        self._conn_attempts[ip].append(now)
-        return True
+        Shares the API rate limiter, so the limit holds across workers when
+        Redis is available.
+        """
+        return RateLimiterService.check_rate_limit(
+            f"ws_connect:{ip}", WS_RATE_LIMIT_CONNECTIONS, WS_RATE_LIMIT_WINDOW_SECONDS
+        ).allowed
 
     def _check_concurrent_limit(self, ip: str) -> bool:
         """Return True if the IP has not exceeded the concurrent connection limit."""
@@ -143,42 +151,35 @@ class ConnectionManager:
 
     def _check_message_rate(self, websocket: WebSocket) -> bool:
         """Return True if the session is within the message rate limit."""
-        meta = self._connections.get(websocket)
-        if not meta:
+        if websocket not in self._connections:
             return False
 
-        now = datetime.now(timezone.utc)
-        window_start = now - timedelta(seconds=60)
-
-        if meta["msg_window_start"] < window_start:
-            # Reset window
-            meta["msg_count"] = 0
-            meta["msg_window_start"] = now
-
-        meta["msg_count"] += 1
-        return meta["msg_count"] <= WS_MAX_MESSAGES_PER_MINUTE
+        return self._message_limiter.hit(str(id(websocket)), WS_MAX_MESSAGES_PER_MINUTE, 60).allowed
 
     # ------------------------------------------------------------------
     # Connection lifecycle
     # ------------------------------------------------------------------
 
-    async def connect(self, websocket: WebSocket, user_id: int, username: str, rol: str, ip: str):
+    async def connect(self, websocket: WebSocket, user_id: int, username: str, rol: str, ip: str,
+                      empresa_id: Optional[int] = None):
         """Accept a pre-authenticated WebSocket connection."""
         await websocket.accept()
         self._connections[websocket] = {
             "user_id": user_id,
             "username": username,
             "rol": rol,
+            "empresa_id": empresa_id,
             "ip": ip,
             "connected_at": datetime.now(timezone.utc),
-            "msg_count": 0,
-            "msg_window_start": datetime.now(timezone.utc),
         }
         self._connections_by_ip[ip] = self._connections_by_ip.get(ip, 0) + 1
+        self._hub.register(websocket, self._connections[websocket])
         logger.info(f"[WS] CONNECTED — user={username} ip={ip} total={len(self._connections)}")
 
     def disconnect(self, websocket: WebSocket):
         """Safely remove a connection without raising if already gone."""
+        self._hub.unregister(websocket)
+        self._message_limiter.reset(str(id(websocket)))
         meta = self._connections.pop(websocket, None)
         if meta:
             ip = meta["ip"]
@@ -193,29 +194,37 @@ class ConnectionManager:
     # Broadcast (role-aware)
     # ------------------------------------------------------------------
 
-    async def broadcast(self, message: dict, allowed_roles: Optional[List[str]] = None):
+    async def broadcast(self, message: dict, allowed_roles: Optional[List[str]] = None,
+                        audience: Optional[dict] = None):
         """
-        Broadcast to connected clients.
+        Broadcast to connected clients of every worker.
+
+        Only enqueues: never waits for a client to receive the message.
 
         Args:
             message: JSON-serializable dict
             allowed_roles: If set, only clients with one of these roles receive the message.
                            None = send to all authenticated connections.
+            audience: If set ({'empresa_id', 'user_id'}), only superadmins and clients of
+                      that company or that user receive the message.
         """
-        stale: List[WebSocket] = []
-        for ws, meta in list(self._connections.items()):
-            # Role filter: skip if this client's role is not in allowed_roles
-            if allowed_roles and meta.get("rol") not in allowed_roles:
-                continue
-            try:
-                await ws.send_json(message)
-            except Exception as exc:
-                logger.warning(f"[WS] Failed to send to {meta.get('username')}: {exc}")
-                stale.append(ws)
+        await self._hub.publish(message, allowed_roles, audience)
 
-        # Clean up stale connections
-        for ws in stale:
-            self.disconnect(ws)
+    def send_personal(self, websocket: WebSocket, message: dict) -> bool:
+        """Enqueue a message for a single connection of this worker."""
+        return self._hub.send_to(websocket, message)
+
+    async def start(self):
+        """Subscribe this worker to the broadcast bus."""
+        await self._hub.start()
+
+    async def stop(self):
+        """Unsubscribe from the bus and stop every writer task."""
+        await self._hub.stop()
+
+    def stats(self) -> dict:
+        """Queue depth and dropped-message counts per connection of this worker."""
+        return self._hub.stats()
 
     @property
     def active_count(self) -> int:
@@ -280,6 +289,16 @@ async def lifespan(app: FastAPI):
         from services.scheduler_service import run_scheduler_periodically
         scheduler_task = asyncio.create_task(run_scheduler_periodically())
     
+    # Subscribe to the WebSocket broadcast bus (fan-out across workers)
+    await manager.start()
+    
+    # Start background job workers (long printer operations, progress on /ws/logs)
+    from services.job_queue_service import job_queue
+    job_worker_enabled = os.getenv("ENABLE_JOB_WORKER", "true").lower() == "true"
+    if job_worker_enabled:
+        print(f"🧵 Starting background job workers ({job_queue.config.workers})...")
+        await job_queue.start(publish=manager.broadcast)
+    
     print("🌐 Server ready!")
     
     yield
@@ -287,6 +306,16 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("🛑 Shutting down Ricoh Equipment Management API...")
     
+    # Return in-flight jobs to the queue before closing shared clients
+    if job_worker_enabled:
+        await job_queue.stop()
+    
+    await manager.stop()
+    
+    # Close keep-alive connections of the async printer client
+    from services.ricoh_async_client import close_async_ricoh_web_client
+    await close_async_ricoh_web_client()
+    
     # Cancel scheduler task
     if scheduler_task:
         scheduler_task.cancel()
@@ -303,6 +332,15 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             pass
 
+    # Persist buffered session last_activity before exiting
+    from db.database import SessionLocal
+    from services.session_activity_service import session_activity_buffer
+    db = SessionLocal()
+    try:
+        session_activity_buffer.flush(db)
+    finally:
+        db.close()
+
 
 
 async def run_cleanup_job_periodically():
@@ -407,33 +445,9 @@ else:
     logger.warning(f"⚠️ CSRF Protection disabled (ENVIRONMENT={environment}, not recommended for production)")
 
 
-# Security Headers Middleware
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    """Add security headers to all responses"""
-    
-    # Debug: Print all headers
-    if request.url.path not in ["/", "/docs", "/openapi.json"]:
-        print(f"[HEADERS] Request a {request.url.path}")
-        print(f"[HEADERS] Authorization: {request.headers.get('authorization', 'MISSING')}")
-        print(f"[HEADERS] All headers: {dict(request.headers)}")
-    
-    response = await call_next(request)
-    
-    # Only add HSTS in production
-    if os.getenv("ENVIRONMENT", "development") == "production":
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    
-    # Prevent MIME type sniffing
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    
-    # Prevent clickjacking
-    response.headers["X-Frame-Options"] = "DENY"
-    
-    # XSS Protection (legacy browsers)
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    
-    return response
+# Security Headers Middleware (el más externo: cubre también las respuestas
+# de rechazo de DDoS/CSRF)
+app.add_middleware(SecurityHeadersMiddleware)
 
 
 # Global exception handler for validation errors
@@ -471,6 +485,7 @@ app.include_router(discovery_router)
 app.include_router(counters_router)
 app.include_router(export_router)
 app.include_router(sync_router)  # ← NUEVO
+app.include_router(jobs_router)
 from api.dashboard import router as dashboard_router
 from api.analytics import router as analytics_router
 app.include_router(dashboard_router)
@@ -575,6 +590,7 @@ async def websocket_logs(
         user_id = authenticated_user.id
         username = authenticated_user.username
         rol = authenticated_user.rol
+        empresa_id = authenticated_user.empresa_id
     except (InvalidTokenError, ExpiredTokenError) as exc:
         logger.warning(f"[WS] AUTH FAILED from {client_ip}: {exc}")
         # Reject before handshake — send 403 via plain HTTP upgrade rejection
@@ -612,11 +628,12 @@ async def websocket_logs(
     # ----------------------------------------------------------------
     # All checks passed — accept the connection
     # ----------------------------------------------------------------
-    await manager.connect(websocket, user_id=user_id, username=username, rol=rol, ip=client_ip)
+    await manager.connect(websocket, user_id=user_id, username=username, rol=rol, ip=client_ip,
+                          empresa_id=empresa_id)
 
     try:
         # Send authenticated welcome message
-        await websocket.send_json({
+        manager.send_personal(websocket, {
             "id": "system",
             "timestamp": datetime.now().strftime("%H:%M:%S"),
             "message": f"Connected to Ricoh Equipment Management Console — {username}",
@@ -661,6 +678,12 @@ async def websocket_logs(
         manager.disconnect(websocket)
 
 
+@app.get("/ws/stats")
+async def websocket_stats(current_user = Depends(get_current_superadmin)):
+    """Outbound queue depth and dropped messages per WebSocket connection (this worker)"""
+    return manager.stats()
+
+
 # Helper function to broadcast logs
 async def broadcast_log(message: str, log_type: str = "info", **kwargs):
     """
@@ -12,7 +12,8 @@ import logging
 from db.database import get_db
 from db.models_auth import AdminUser
 from services.auth_service import AuthService, AccountDisabledError
-from services.jwt_service import InvalidTokenError, ExpiredTokenError
+from services.jwt_service import InvalidTokenError, ExpiredTokenError, AUTH_DEBUG
+from middleware.request_context import resolve_client_ip
 
 
 # Configure logging
@@ -21,6 +22,11 @@ logger = logging.getLogger(__name__)
 # Security scheme for Swagger UI
 security = HTTPBearer()
 
+def _trace(message: str) -> None:
+    """Traza de depuración de autenticación, solo con AUTH_DEBUG=true"""
+    if AUTH_DEBUG:
+        print(f"[AUTH] {message}")
+
 
 # Error codes
 AUTH_TOKEN_MISSING = "AUTH_TOKEN_MISSING"
@@ -38,7 +44,7 @@ async def get_current_user(
     """
     Dependency to get current authenticated user with Device Binding
     """
-    print("[AUTH] ===== INICIO DE AUTENTICACIÓN =====")
+    _trace("===== INICIO DE AUTENTICACIÓN =====")
     
     # Extract token
     token = credentials.credentials
@@ -46,12 +52,11 @@ async def get_current_user(
     # Mask token for security - show only first 4 and last 4 characters
     token_preview = f"{token[:4]}...{token[-4:]}" if token and len(token) > 8 else "NONE"
     
-    # Use print for debugging (logger might not be visible)
-    print(f"[AUTH] Autenticación iniciada - Token: {token_preview}")
-    logger.info(f"🔐 Autenticación iniciada - Token: {token_preview}")
+    _trace(f"Autenticación iniciada - Token: {token_preview}")
+    logger.debug(f"🔐 Autenticación iniciada - Token: {token_preview}")
     
     if not token:
-        print("[AUTH] ERROR: Token faltante")
+        _trace("ERROR: Token faltante")
         logger.warning("❌ Token faltante")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -64,16 +69,15 @@ async def get_current_user(
     
     # Validate token
     try:
-        print("[AUTH] Validando token...")
-        logger.info("🔍 Validando token...")
+        _trace("Validando token...")
         client_ip = get_client_ip(request)
         client_ua = get_user_agent(request)
         user = AuthService.validate_token(db, token, client_ip, client_ua)
-        print(f"[AUTH] Usuario validado: {user.username} (rol: {user.rol}, activo: {user.is_active})")
-        logger.info(f"✅ Usuario validado: {user.username} (rol: {user.rol}, activo: {user.is_active})")
+        _trace(f"Usuario validado: {user.username} (rol: {user.rol}, activo: {user.is_active})")
+        logger.debug(f"✅ Usuario validado: {user.username} (rol: {user.rol}, activo: {user.is_active})")
         return user
     except ExpiredTokenError:
-        print("[AUTH] ERROR: Token expirado")
+        _trace("ERROR: Token expirado")
         logger.warning("⏰ Token expirado")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -84,7 +88,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"}
         )
     except InvalidTokenError as e:
-        print(f"[AUTH] ERROR: Token inválido: {str(e)}")
+        _trace(f"ERROR: Token inválido: {str(e)}")
         logger.warning(f"❌ Token inválido: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -95,7 +99,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"}
         )
     except AccountDisabledError:
-        print("[AUTH] ERROR: Cuenta deshabilitada")
+        _trace("ERROR: Cuenta deshabilitada")
         logger.warning("🚫 Cuenta deshabilitada")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -105,9 +109,10 @@ async def get_current_user(
             }
         )
     except Exception as e:
-        print(f"[AUTH] ERROR INESPERADO: {type(e).__name__}: {str(e)}")
-        import traceback
-        print(f"[AUTH] TRACEBACK: {traceback.format_exc()}")
+        if AUTH_DEBUG:
+            import traceback
+            _trace(f"ERROR INESPERADO: {type(e).__name__}: {str(e)}")
+            _trace(f"TRACEBACK: {traceback.format_exc()}")
         logger.error(f"💥 Error inesperado en validación: {type(e).__name__}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -233,22 +238,8 @@ def get_client_ip(request: Request) -> str:
     Returns:
         Client IP address
     """
-    # Check for X-Forwarded-For header (proxy/load balancer)
-    forwarded_for = request.headers.get("X-Forwarded-For")
-    if forwarded_for:
-        # Take first IP in the list
-        return forwarded_for.split(",")[0].strip()
-    
-    # Check for X-Real-IP header
-    real_ip = request.headers.get("X-Real-IP")
-    if real_ip:
-        return real_ip
-    
-    # Fall back to direct client IP
-    if request.client:
-        return request.client.host
-    
-    return "unknown"
+    # Same resolution as the security middlewares: forwarded headers only from trusted proxies
+    return resolve_client_ip(request.client.host if request.client else None, request.headers)
 
 
 def get_user_agent(request: Request) -> str:
@@ -3,22 +3,23 @@ CSRF Protection Middleware
 Middleware para proteger contra ataques CSRF (Cross-Site Request Forgery)
 """
 from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.responses import JSONResponse
+from middleware.request_context import get_request_context, add_response_headers
 import secrets
 import hashlib
 import logging
 import os
 import json
+import time
 from typing import Optional
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
 
-class CSRFProtectionMiddleware(BaseHTTPMiddleware):
+class CSRFProtectionMiddleware:
     """
-    Middleware para protección CSRF
+    Middleware ASGI para protección CSRF
     
     Genera tokens CSRF únicos por sesión y los valida en requests mutables (POST, PUT, DELETE, PATCH)
     """
@@ -38,9 +39,13 @@ class CSRFProtectionMiddleware(BaseHTTPMiddleware):
     # Tiempo de expiración del token CSRF (2 horas)
     TOKEN_EXPIRATION_HOURS = 2
     
+    # Intervalo mínimo entre barridos de tokens expirados en memoria
+    CLEANUP_INTERVAL_SECONDS = 60
+    
     def __init__(self, app, secret_key: str = None, redis_url: str = None):
-        super().__init__(app)
+        self.app = app
         self.secret_key = secret_key or secrets.token_urlsafe(32)
+        self._last_cleanup = time.monotonic()
         
         # Usar Redis si está configurado, memoria en caso contrario
         self.redis_url = redis_url or os.getenv("REDIS_URL")
@@ -101,37 +106,41 @@ class CSRFProtectionMiddleware(BaseHTTPMiddleware):
         else:
             object.__setattr__(self, name, value)
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope, receive, send):
         """Process request and validate CSRF token if needed"""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        ctx = get_request_context(scope)
         
         # 1. Si es método seguro (GET, HEAD, OPTIONS), no validar
-        if request.method not in self.PROTECTED_METHODS:
-            response = await call_next(request)
+        if ctx.method not in self.PROTECTED_METHODS:
             # Agregar token CSRF al response para que el cliente lo use
-            csrf_token = self._generate_csrf_token(request)
-            response.headers["X-CSRF-Token"] = csrf_token
-            return response
+            await self._call_with_new_token(scope, receive, send)
+            return
         
         # 2. Si es ruta excluida, no validar
-        if request.url.path in self.EXCLUDED_PATHS:
-            response = await call_next(request)
-            return response
+        if ctx.path in self.EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
         
         # 3. Validar token CSRF
         try:
-            self._validate_csrf_token(request)
+            self._validate_csrf_token(Request(scope, receive))
         except HTTPException as e:
             logger.warning(f"⚠️ CSRF validation failed: {e.detail}")
-            raise
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            await response(scope, receive, send)
+            return
         
-        # 4. Procesar request
-        response = await call_next(request)
-        
-        # 5. Generar nuevo token para el siguiente request
-        new_csrf_token = self._generate_csrf_token(request)
-        response.headers["X-CSRF-Token"] = new_csrf_token
-        
-        return response
+        # 4. Procesar request y generar nuevo token para el siguiente request
+        await self._call_with_new_token(scope, receive, send)
+    
+    async def _call_with_new_token(self, scope, receive, send):
+        """Llama a la app agregando un token CSRF nuevo en X-CSRF-Token"""
+        csrf_token = self._generate_csrf_token(Request(scope, receive))
+        await self.app(scope, receive, add_response_headers(send, {"X-CSRF-Token": csrf_token}))
     
     def _generate_csrf_token(self, request: Request) -> str:
         """
@@ -176,8 +185,11 @@ class CSRFProtectionMiddleware(BaseHTTPMiddleware):
                 "expires_at": expiration
             }
         
-        # Limpiar tokens expirados (simple cleanup)
-        self._cleanup_expired_tokens()
+        # Limpiar tokens expirados (barrido periódico, no en cada request)
+        now = time.monotonic()
+        if now - self._last_cleanup >= self.CLEANUP_INTERVAL_SECONDS:
+            self._last_cleanup = now
+            self._cleanup_expired_tokens()
         
         return token_hash
     
@@ -1,16 +1,20 @@
 """
 DDoS Protection Middleware
 Protección multicapa contra ataques de denegación de servicio distribuido
+
+Middleware ASGI puro: usa el RequestContext compartido (IP, ruta, headers
+ya decodificados) y resuelve los límites global y por endpoint en una sola
+consulta a RateLimiterService (un round-trip si el backend es Redis)
 """
-from fastapi import Request, HTTPException, status
+from fastapi import status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from services.rate_limiter_service import RateLimiterService
+from services.rate_limiter_service import RateLimiterService, SlidingWindowLimiter
+from middleware.request_context import get_request_context, add_response_headers
 from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+from typing import Optional
+import re
 import threading
 import logging
-import hashlib
 import os
 
 logger = logging.getLogger(__name__)
@@ -78,6 +82,9 @@ class IPBlockList:
     @classmethod
     def is_blocked(cls, ip: str) -> bool:
         """Verificar si IP está bloqueada"""
+        # Camino rápido sin lock: casi siempre no hay IPs bloqueadas
+        if not cls._blocked_ips:
+            return False
         with cls._lock:
             if ip not in cls._blocked_ips:
                 return False
@@ -129,10 +136,15 @@ class IPBlockList:
 
 
 class BurstDetector:
-    """Detector de ráfagas de requests (burst attacks)"""
+    """
+    Detector de ráfagas de requests (burst attacks)
     
-    _request_times = defaultdict(list)  # {ip: [timestamp1, timestamp2, ...]}
-    _lock = threading.Lock()
+    Usa el mismo motor de ventana deslizante que el rate limiter, siempre en
+    memoria del proceso (sin round-trip a Redis): O(1) por IP y número de IPs
+    acotado por LRU
+    """
+    
+    _request_times = SlidingWindowLimiter()
     
     @classmethod
     def record_request(cls, ip: str) -> bool:
@@ -142,98 +154,111 @@ class BurstDetector:
         Returns:
             True si se detecta burst attack, False si es normal
         """
-        with cls._lock:
-            now = datetime.now(timezone.utc)
-            window_start = now - timedelta(seconds=DDoSProtectionConfig.BURST_WINDOW)
-            
-            # Limpiar requests antiguos
-            cls._request_times[ip] = [
-                ts for ts in cls._request_times[ip]
-                if ts > window_start
-            ]
-            
-            # Agregar request actual
-            cls._request_times[ip].append(now)
-            
-            # Verificar si excede threshold
-            request_count = len(cls._request_times[ip])
-            
-            if request_count >= DDoSProtectionConfig.BURST_THRESHOLD:
-                logger.warning(
-                    f"⚠️ Burst attack detectado: {ip} - "
-                    f"{request_count} requests en {DDoSProtectionConfig.BURST_WINDOW}s"
-                )
-                return True
-            
+        decision = cls._request_times.hit(
+            ip, DDoSProtectionConfig.BURST_THRESHOLD, DDoSProtectionConfig.BURST_WINDOW
+        )
+        # El request número BURST_THRESHOLD dentro de la ventana agota el cupo
+        if decision.remaining > 0:
             return False
+        
+        logger.warning(
+            f"⚠️ Burst attack detectado: {ip} - "
+            f"{DDoSProtectionConfig.BURST_THRESHOLD} requests en {DDoSProtectionConfig.BURST_WINDOW}s"
+        )
+        return True
     
     @classmethod
     def cleanup_old_records(cls, max_age_seconds: int = 300):
-        """Limpiar registros antiguos"""
-        with cls._lock:
-            now = datetime.now(timezone.utc)
-            cutoff = now - timedelta(seconds=max_age_seconds)
-            
-            for ip in list(cls._request_times.keys()):
-                cls._request_times[ip] = [
-                    ts for ts in cls._request_times[ip]
-                    if ts > cutoff
-                ]
-                
-                if not cls._request_times[ip]:
-                    del cls._request_times[ip]
+        """Limpiar registros antiguos (cada IP expira tras dos ventanas sin actividad)"""
+        return cls._request_times.cleanup()
 
 
-class DDoSProtectionMiddleware(BaseHTTPMiddleware):
-    """Middleware de protección contra DDoS"""
+class DDoSProtectionMiddleware:
+    """
+    Middleware ASGI de protección contra DDoS
+    
+    Se desactiva con ENABLE_DDOS_PROTECTION=false (o enabled=False)
+    """
     
-    async def dispatch(self, request: Request, call_next):
+    CORS_PRIVATE_NETWORK_REGEX = re.compile(
+        r"^http://(localhost|127\.0\.0\.1|192\.168\.\d{1,3}\.\d{1,3}|10\.\d{1,3}\.\d{1,3}\.\d{1,3}|172\.(1[6-9]|2[0-9]|3[0-1])\.\d{1,3}\.\d{1,3})(:\d+)?$"
+    )
+    
+    def __init__(self, app, enabled: Optional[bool] = None):
+        self.app = app
+        if enabled is None:
+            enabled = os.getenv("ENABLE_DDOS_PROTECTION", "true").lower() != "false"
+        self.enabled = enabled
+        
+        self._whitelist = set(DDoSProtectionConfig.WHITELIST_IPS) | set(DDoSProtectionConfig.EXTRA_WHITELIST_IPS)
+        
+        # Orígenes CORS permitidos (misma configuración que CORSMiddleware en main.py)
+        _default_cors = "http://localhost:5173,http://127.0.0.1:5173,http://localhost:5174,http://127.0.0.1:5174"
+        self._cors_origins = {o.strip() for o in os.getenv("CORS_ORIGINS", _default_cors).split(",") if o.strip()}
+        _environment = os.getenv("ENVIRONMENT", "development")
+        _default_private_cors = "true" if _environment == "development" else "false"
+        self._cors_allow_private = os.getenv("CORS_ALLOW_PRIVATE_NETWORK", _default_private_cors).lower() == "true"
+        
+        if not self.enabled:
+            logger.warning("⚠️ DDoS protection disabled (ENABLE_DDOS_PROTECTION=false)")
+    
+    async def __call__(self, scope, receive, send):
         """Procesar request con protección DDoS"""
-        return await call_next(request)
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        ctx = get_request_context(scope)
         
         # Bypass OPTIONS requests (CORS preflight) to let CORSMiddleware handle them
-        if request.method == "OPTIONS":
-            return await call_next(request)
+        if ctx.method == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
         
         # Obtener IP del cliente
-        client_ip = self._get_client_ip(request)
-        
-        print(f"[DDOS] Request de {client_ip} a {request.url.path}")
+        client_ip = ctx.client_ip
         
         # 1. Verificar si IP está en whitelist
         if self._is_whitelisted(client_ip):
-            print(f"[DDOS] IP {client_ip} en whitelist, permitiendo")
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
         
+        response = self._check(ctx, client_ip)
+        if isinstance(response, JSONResponse):
+            await self._add_cors_headers(ctx, response)(scope, receive, send)
+            return
+        
+        # 7. Agregar headers de rate limit a la respuesta
+        await self.app(scope, receive, add_response_headers(send, response))
+    
+    def _check(self, ctx, client_ip: str):
+        """
+        Ejecuta los controles en orden
+        
+        Returns:
+            JSONResponse de rechazo, o dict con los headers de rate limit
+        """
         # 2. Verificar si IP está bloqueada
         if IPBlockList.is_blocked(client_ip):
-            print(f"[DDOS] IP {client_ip} BLOQUEADA, retornando 403")
             logger.warning(f"🚫 Request bloqueado de IP: {client_ip}")
-            return self._add_cors_headers(
-                request,
-                JSONResponse(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    content={
-                        "error": "IP_BLOCKED",
-                        "message": "Your IP has been temporarily blocked due to suspicious activity",
-                        "blocked_ips": IPBlockList.get_blocked_ips()
-                    }
-                )
+            return JSONResponse(
+                status_code=status.HTTP_403_FORBIDDEN,
+                content={
+                    "error": "IP_BLOCKED",
+                    "message": "Your IP has been temporarily blocked due to suspicious activity"
+                }
             )
         
         # 3. Verificar tamaño del payload
-        content_length = request.headers.get("content-length")
-        if content_length and int(content_length) > DDoSProtectionConfig.MAX_PAYLOAD_SIZE:
+        content_length = ctx.content_length
+        if content_length and content_length > DDoSProtectionConfig.MAX_PAYLOAD_SIZE:
             logger.warning(f"⚠️ Payload demasiado grande de {client_ip}: {content_length} bytes")
-            return self._add_cors_headers(
-                request,
-                JSONResponse(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    content={
-                        "error": "PAYLOAD_TOO_LARGE",
-                        "message": f"Request payload exceeds maximum size of {DDoSProtectionConfig.MAX_PAYLOAD_SIZE} bytes"
-                    }
-                )
+            return JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={
+                    "error": "PAYLOAD_TOO_LARGE",
+                    "message": f"Request payload exceeds maximum size of {DDoSProtectionConfig.MAX_PAYLOAD_SIZE} bytes"
+                }
             )
         
         # 4. Detectar burst attacks
@@ -241,84 +266,50 @@ class DDoSProtectionMiddleware(BaseHTTPMiddleware):
             # Bloquear IP por burst attack
             IPBlockList.block_ip(client_ip)
             logger.error(f"🚨 IP bloqueada por burst attack: {client_ip}")
-            return self._add_cors_headers(
-                request,
-                JSONResponse(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    content={
-                        "error": "BURST_ATTACK_DETECTED",
-                        "message": "Too many requests in short time. IP blocked temporarily."
-                    }
-                )
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={
+                    "error": "BURST_ATTACK_DETECTED",
+                    "message": "Too many requests in short time. IP blocked temporarily."
+                }
             )
         
-        # 5. Rate limiting global por IP
-        global_key = f"global:{client_ip}"
-        global_result = RateLimiterService.check_rate_limit(
-            global_key,
-            DDoSProtectionConfig.GLOBAL_RATE_LIMIT,
-            DDoSProtectionConfig.GLOBAL_RATE_WINDOW
-        )
+        # 5-6. Rate limiting global por IP y por endpoint, en una sola consulta
+        checks = [(f"global:{client_ip}", DDoSProtectionConfig.GLOBAL_RATE_LIMIT, DDoSProtectionConfig.GLOBAL_RATE_WINDOW)]
+        endpoint_limit = DDoSProtectionConfig.ENDPOINT_LIMITS.get(ctx.path)
+        if endpoint_limit:
+            checks.append((f"endpoint:{client_ip}:{ctx.path}", *endpoint_limit))
+        results = RateLimiterService.check_rate_limits(checks)
+        global_result = results[0]
         
         if not global_result.allowed:
             logger.warning(f"⚠️ Rate limit global excedido: {client_ip}")
-            response = self._rate_limit_response(global_result, DDoSProtectionConfig.GLOBAL_RATE_LIMIT)
-            return self._add_cors_headers(request, response)
+            return self._rate_limit_response(global_result, DDoSProtectionConfig.GLOBAL_RATE_LIMIT)
         
-        # 6. Rate limiting por endpoint específico
-        endpoint = request.url.path
-        if endpoint in DDoSProtectionConfig.ENDPOINT_LIMITS:
-            limit, window = DDoSProtectionConfig.ENDPOINT_LIMITS[endpoint]
-            endpoint_key = f"endpoint:{client_ip}:{endpoint}"
-            
-            endpoint_result = RateLimiterService.check_rate_limit(
-                endpoint_key,
-                limit,
-                window
-            )
-            
-            if not endpoint_result.allowed:
-                logger.warning(f"⚠️ Rate limit de endpoint excedido: {client_ip} - {endpoint}")
-                response = self._rate_limit_response(endpoint_result, limit)
-                return self._add_cors_headers(request, response)
+        if endpoint_limit and not results[1].allowed:
+            logger.warning(f"⚠️ Rate limit de endpoint excedido: {client_ip} - {ctx.path}")
+            return self._rate_limit_response(results[1], endpoint_limit[0])
         
-        # 7. Agregar headers de rate limit a la respuesta
-        response = await call_next(request)
-        response.headers["X-RateLimit-Limit"] = str(DDoSProtectionConfig.GLOBAL_RATE_LIMIT)
-        response.headers["X-RateLimit-Remaining"] = str(global_result.remaining)
-        response.headers["X-RateLimit-Reset"] = str(int(global_result.reset_at.timestamp()))
-        
-        return response
+        return {
+            "X-RateLimit-Limit": str(DDoSProtectionConfig.GLOBAL_RATE_LIMIT),
+            "X-RateLimit-Remaining": str(global_result.remaining),
+            "X-RateLimit-Reset": str(int(global_result.reset_at.timestamp())),
+        }
 
     def _is_origin_allowed(self, origin: str) -> bool:
         """Determinar si un origen CORS está permitido"""
         if not origin:
             return False
-            
-        # Leer orígenes explícitos configurados
-        _default_cors = "http://localhost:5173,http://127.0.0.1:5173,http://localhost:5174,http://127.0.0.1:5174"
-        cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", _default_cors).split(",") if o.strip()]
-        
-        if origin in cors_origins:
+        if origin in self._cors_origins:
             return True
-            
         # Validar contra regex de red privada (si está habilitado)
-        _environment = os.getenv("ENVIRONMENT", "development")
-        _default_private_cors = "true" if _environment == "development" else "false"
-        cors_allow_private = os.getenv("CORS_ALLOW_PRIVATE_NETWORK", _default_private_cors).lower() == "true"
-        
-        if cors_allow_private:
-            if not hasattr(self, "_cors_regex_compiled"):
-                import re
-                regex_str = r"^http://(localhost|127\.0\.0\.1|192\.168\.\d{1,3}\.\d{1,3}|10\.\d{1,3}\.\d{1,3}\.\d{1,3}|172\.(1[6-9]|2[0-9]|3[0-1])\.\d{1,3}\.\d{1,3})(:\d+)?$"
-                self._cors_regex_compiled = re.compile(regex_str)
-            return bool(self._cors_regex_compiled.match(origin))
-            
+        if self._cors_allow_private:
+            return bool(self.CORS_PRIVATE_NETWORK_REGEX.match(origin))
         return False
 
-    def _add_cors_headers(self, request: Request, response: JSONResponse) -> JSONResponse:
+    def _add_cors_headers(self, ctx, response: JSONResponse) -> JSONResponse:
         """Agregar headers CORS obligatorios para que el navegador no bloquee el error"""
-        origin = request.headers.get("origin")
+        origin = ctx.headers.get("origin")
         if origin and self._is_origin_allowed(origin):
             response.headers["Access-Control-Allow-Origin"] = origin
             response.headers["Access-Control-Allow-Credentials"] = "true"
@@ -326,24 +317,6 @@ class DDoSProtectionMiddleware(BaseHTTPMiddleware):
             response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, X-CSRF-Token, X-Request-ID"
         return response
     
-    def _get_client_ip(self, request: Request) -> str:
-        """Obtener IP real del cliente (considerando proxies)"""
-        # Verificar headers de proxy
-        forwarded_for = request.headers.get("x-forwarded-for")
-        if forwarded_for:
-            # Tomar la primera IP (cliente original)
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip.strip()
-        
-        # Fallback a IP directa
-        if request.client:
-            return request.client.host
-        
-        return "unknown"
-    
     def _is_whitelisted(self, ip: str) -> bool:
         """
         Verifica si IP está en whitelist.
@@ -354,13 +327,8 @@ class DDoSProtectionMiddleware(BaseHTTPMiddleware):
         - Redes privadas completas SOLO si DDOS_WHITELIST_PRIVATE_NETWORKS=true
           (útil en desarrollo; NUNCA activar en producción)
         """
-        import os
-        # Siempre permitir localhost
-        if ip in DDoSProtectionConfig.WHITELIST_IPS:
-            return True
-
-        # IPs adicionales configuradas explícitamente
-        if ip in DDoSProtectionConfig.EXTRA_WHITELIST_IPS:
+        # Localhost e IPs adicionales configuradas explícitamente
+        if ip in self._whitelist:
             return True
 
         # Whitelist de redes privadas — desactivada por defecto
@@ -2,24 +2,24 @@
 HTTPS Redirect Middleware
 Middleware para forzar HTTPS en producción
 """
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import URL
 from starlette.responses import RedirectResponse
+from middleware.request_context import get_request_context
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-class HTTPSRedirectMiddleware(BaseHTTPMiddleware):
+class HTTPSRedirectMiddleware:
     """
-    Middleware para redirigir HTTP a HTTPS en producción
+    Middleware ASGI para redirigir HTTP a HTTPS en producción
     
     Solo activo cuando ENVIRONMENT=production y FORCE_HTTPS=true
     """
     
     def __init__(self, app, force_https: bool = None):
-        super().__init__(app)
+        self.app = app
         
         # Determinar si forzar HTTPS
         if force_https is None:
@@ -35,25 +35,29 @@ class HTTPSRedirectMiddleware(BaseHTTPMiddleware):
         else:
             logger.info("🔓 HTTPS redirect disabled (development mode)")
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope, receive, send):
         """Redirect HTTP to HTTPS if enabled"""
         
         # Si no está habilitado, continuar normalmente
-        if not self.force_https:
-            return await call_next(request)
+        if not self.force_https or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
         # Verificar si el request es HTTP
-        if request.url.scheme == "http":
+        if get_request_context(scope).scheme == "http":
             # Construir URL HTTPS
-            https_url = request.url.replace(scheme="https")
+            url = URL(scope=scope)
+            https_url = url.replace(scheme="https")
             
-            logger.info(f"🔀 Redirecting HTTP to HTTPS: {request.url} -> {https_url}")
+            logger.info(f"🔀 Redirecting HTTP to HTTPS: {url} -> {https_url}")
             
             # Redirigir con código 301 (Moved Permanently)
-            return RedirectResponse(
+            response = RedirectResponse(
                 url=str(https_url),
                 status_code=301
             )
+            await response(scope, receive, send)
+            return
         
         # Si ya es HTTPS, continuar normalmente
-        return await call_next(request)
+        await self.app(scope, receive, send)
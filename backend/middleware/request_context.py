@@ -0,0 +1,140 @@
+"""
+Request Context
+Vista única del request compartida por los middlewares ASGI
+
+El primer middleware que la pide decodifica método, ruta, headers e IP del
+cliente y la guarda en el scope; los demás reutilizan el mismo objeto en
+lugar de volver a construir un Request de Starlette cada uno
+
+La IP del cliente solo se toma de X-Forwarded-For / X-Real-IP cuando la
+conexión viene de un proxy de confianza (TRUSTED_PROXIES); si no, cualquiera
+podría hacerse pasar por 127.0.0.1 o rotar IPs falsas frente al rate limiting
+"""
+import ipaddress
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+SCOPE_KEY = "ricoh.request_context"
+
+
+class TrustedProxies:
+    """IPs o redes (CIDR) de los proxies cuyos headers de IP reenviada se aceptan"""
+
+    def __init__(self, entries: Iterable[str]):
+        self.networks = []
+        for entry in entries:
+            try:
+                self.networks.append(ipaddress.ip_network(entry.strip(), strict=False))
+            except ValueError:
+                logger.warning(f"Invalid TRUSTED_PROXIES entry ({entry.strip()}), ignored")
+
+    def __contains__(self, host: Optional[str]) -> bool:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+
+def load_trusted_proxies_from_env() -> TrustedProxies:
+    """Carga los proxies de confianza desde TRUSTED_PROXIES (separados por comas)"""
+    entries = os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",")
+    return TrustedProxies(entry for entry in entries if entry.strip())
+
+
+# Singleton instance
+trusted_proxies = load_trusted_proxies_from_env()
+
+
+class RequestContext:
+    """Datos del request ya decodificados (headers en minúsculas)"""
+
+    __slots__ = ("method", "path", "scheme", "headers", "client_host", "client_ip", "query_string")
+
+    def __init__(self, scope: dict):
+        self.method: str = scope.get("method", "GET")
+        self.path: str = scope.get("path", "")
+        self.scheme: str = scope.get("scheme", "http")
+        self.query_string: bytes = scope.get("query_string", b"")
+        self.headers: Dict[str, str] = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope.get("headers", ())
+        }
+        client = scope.get("client")
+        self.client_host: Optional[str] = client[0] if client else None
+        self.client_ip: str = resolve_client_ip(self.client_host, self.headers)
+
+    @property
+    def content_length(self) -> Optional[int]:
+        value = self.headers.get("content-length")
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+
+def resolve_client_ip(client_host: Optional[str], headers) -> str:
+    """
+    IP real del cliente (headers de proxy solo si la conexión viene de un proxy de confianza)
+
+    Args:
+        client_host: IP de la conexión
+        headers: Mapping con get() de los headers (nombres en minúsculas o case-insensitive)
+    """
+    if client_host not in trusted_proxies:
+        return client_host or "unknown"
+
+    forwarded_for = headers.get("x-forwarded-for")
+    if forwarded_for:
+        # De derecha a izquierda: la primera IP que no es un proxy de confianza es el cliente
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if hop not in trusted_proxies:
+                return hop
+        if hops:
+            return hops[0]
+
+    real_ip = headers.get("x-real-ip")
+    if real_ip:
+        return real_ip.strip()
+
+    return client_host
+
+
+def get_request_context(scope: dict) -> RequestContext:
+    """Retorna el contexto del request, creándolo la primera vez"""
+    context = scope.get(SCOPE_KEY)
+    if context is None:
+        context = RequestContext(scope)
+        scope[SCOPE_KEY] = context
+    return context
+
+
+def encode_headers(headers: Dict[str, str]) -> List[Tuple[bytes, bytes]]:
+    """Codifica headers al formato ASGI (nombres en minúsculas)"""
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+
+def add_response_headers(send, headers: Union[Dict[str, str], List[Tuple[bytes, bytes]]]):
+    """
+    Envuelve `send` para agregar headers al inicio de la respuesta HTTP
+
+    Acepta un dict o una lista ya codificada con encode_headers (para
+    headers fijos que no conviene codificar en cada request)
+    """
+    encoded = encode_headers(headers) if isinstance(headers, dict) else headers
+    names = {name for name, _ in encoded}
+
+    async def send_with_headers(message):
+        if message["type"] == "http.response.start" and encoded:
+            message["headers"] = [
+                (name, value) for name, value in message.get("headers", []) if name.lower() not in names
+            ] + encoded
+        await send(message)
+
+    return send_with_headers
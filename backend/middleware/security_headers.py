@@ -0,0 +1,49 @@
+"""
+Security Headers Middleware
+Agrega headers de seguridad a todas las respuestas HTTP
+"""
+from middleware.request_context import get_request_context, add_response_headers, encode_headers
+from services.jwt_service import AUTH_DEBUG
+import os
+
+
+class SecurityHeadersMiddleware:
+    """
+    Middleware ASGI de headers de seguridad
+
+    Los headers se calculan una sola vez al iniciar; HSTS solo en producción
+    """
+
+    # Rutas que no se trazan con AUTH_DEBUG
+    UNTRACED_PATHS = {"/", "/docs", "/openapi.json"}
+
+    def __init__(self, app, environment: str = None):
+        self.app = app
+        environment = environment or os.getenv("ENVIRONMENT", "development")
+
+        self.headers = {
+            # Prevent MIME type sniffing
+            "X-Content-Type-Options": "nosniff",
+            # Prevent clickjacking
+            "X-Frame-Options": "DENY",
+            # XSS Protection (legacy browsers)
+            "X-XSS-Protection": "1; mode=block",
+        }
+        # Only add HSTS in production
+        if environment == "production":
+            self.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+        self._encoded_headers = encode_headers(self.headers)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if AUTH_DEBUG:
+            ctx = get_request_context(scope)
+            if ctx.path not in self.UNTRACED_PATHS:
+                print(f"[HEADERS] Request a {ctx.path}")
+                print(f"[HEADERS] Authorization: {ctx.headers.get('authorization', 'MISSING')}")
+                print(f"[HEADERS] All headers: {ctx.headers}")
+
+        await self.app(scope, receive, add_response_headers(send, self._encoded_headers))
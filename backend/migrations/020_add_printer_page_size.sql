@@ -0,0 +1,7 @@
+-- Migration: 020_add_printer_page_size
+-- Description: Guarda el tamaño de página máximo que acepta cada impresora
+-- en getUserCounter.cgi / getEcoCounter.cgi (aprendido en la primera lectura)
+
+ALTER TABLE printers ADD COLUMN IF NOT EXISTS tamano_pagina_contadores INTEGER NULL;
+
+COMMENT ON COLUMN printers.tamano_pagina_contadores IS 'Máximo de usuarios por página aceptado por la impresora al leer contadores por usuario (NULL = aún no aprendido)';
@@ -0,0 +1,114 @@
+-- Migration: 021_add_consumo_bn_color_cierres_usuarios
+-- Description: Guarda el consumo B/N y color del período en el snapshot de cada
+-- usuario (antes se derivaba en cada lectura de /monthly/users/all con dos
+-- consultas por fila) y agrega índices para la paginación por cursor
+-- (fecha_fin, consumo_total, id)
+
+ALTER TABLE cierres_mensuales_usuarios ADD COLUMN IF NOT EXISTS consumo_bn INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE cierres_mensuales_usuarios ADD COLUMN IF NOT EXISTS consumo_color INTEGER NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN cierres_mensuales_usuarios.consumo_bn IS 'Consumo B/N del período (calculado al crear el cierre)';
+COMMENT ON COLUMN cierres_mensuales_usuarios.consumo_color IS 'Consumo color del período (calculado al crear el cierre)';
+
+-- ============================================================================
+-- BACKFILL DE CIERRES HISTÓRICOS
+-- Misma regla que CloseService.calcular_consumo_bn_color:
+--   1. Impresora monocromática: todo el consumo es B/N
+--   2. Diferencia de total_bn / total_color con el snapshot del usuario en el
+--      cierre anterior de la impresora
+--   3. Si ambas son 0 y hubo consumo: diferencia de copiadora + impresora
+--   4. Si sigue en 0 (o no hay snapshot anterior): reparto de consumo_total
+--      según la proporción B/N / color de los acumulados
+-- ============================================================================
+
+WITH base AS (
+    SELECT
+        cmu.id,
+        COALESCE(p.has_color, FALSE) AS has_color,
+        cmu.consumo_total,
+        cmu.total_paginas,
+        cmu.total_bn,
+        cmu.total_color,
+        cmu.copiadora_bn,
+        cmu.copiadora_color,
+        cmu.impresora_bn,
+        cmu.impresora_color,
+        ant.id AS anterior_id,
+        ant.total_bn AS ant_total_bn,
+        ant.total_color AS ant_total_color,
+        ant.copiadora_bn AS ant_copiadora_bn,
+        ant.copiadora_color AS ant_copiadora_color,
+        ant.impresora_bn AS ant_impresora_bn,
+        ant.impresora_color AS ant_impresora_color
+    FROM cierres_mensuales_usuarios cmu
+    JOIN cierres_mensuales cm ON cm.id = cmu.cierre_mensual_id
+    JOIN printers p ON p.id = cm.printer_id
+    LEFT JOIN LATERAL (
+        SELECT prev.id
+        FROM cierres_mensuales prev
+        WHERE prev.printer_id = cm.printer_id
+          AND prev.fecha_fin < cm.fecha_inicio
+        ORDER BY prev.fecha_fin DESC
+        LIMIT 1
+    ) cierre_anterior ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT u.*
+        FROM cierres_mensuales_usuarios u
+        WHERE u.cierre_mensual_id = cierre_anterior.id
+          AND u.user_id = cmu.user_id
+        ORDER BY u.id
+        LIMIT 1
+    ) ant ON TRUE
+),
+diferencias AS (
+    SELECT
+        b.*,
+        CASE WHEN b.anterior_id IS NULL THEN 0 ELSE GREATEST(0, b.total_bn - b.ant_total_bn) END AS dif_bn,
+        CASE WHEN b.anterior_id IS NULL THEN 0 ELSE GREATEST(0, b.total_color - b.ant_total_color) END AS dif_color
+    FROM base b
+),
+por_funcion AS (
+    SELECT
+        d.id, d.has_color, d.consumo_total, d.total_paginas, d.total_bn, d.total_color,
+        CASE
+            WHEN d.anterior_id IS NOT NULL AND d.dif_bn = 0 AND d.dif_color = 0 AND d.consumo_total > 0
+            THEN GREATEST(0, d.copiadora_bn - d.ant_copiadora_bn) + GREATEST(0, d.impresora_bn - d.ant_impresora_bn)
+            ELSE d.dif_bn
+        END AS bn,
+        CASE
+            WHEN d.anterior_id IS NOT NULL AND d.dif_bn = 0 AND d.dif_color = 0 AND d.consumo_total > 0
+            THEN GREATEST(0, d.copiadora_color - d.ant_copiadora_color) + GREATEST(0, d.impresora_color - d.ant_impresora_color)
+            ELSE d.dif_color
+        END AS color
+    FROM diferencias d
+)
+UPDATE cierres_mensuales_usuarios cmu
+SET
+    consumo_bn = CASE
+        WHEN NOT f.has_color THEN f.consumo_total
+        WHEN f.bn = 0 AND f.color = 0 AND f.consumo_total > 0 THEN
+            CASE WHEN f.total_paginas > 0
+                 THEN (f.consumo_total::BIGINT * f.total_bn / f.total_paginas)::INTEGER
+                 ELSE f.consumo_total
+            END
+        ELSE f.bn
+    END,
+    consumo_color = CASE
+        WHEN NOT f.has_color THEN 0
+        WHEN f.bn = 0 AND f.color = 0 AND f.consumo_total > 0 THEN
+            CASE WHEN f.total_paginas > 0
+                 THEN (f.consumo_total::BIGINT * f.total_color / f.total_paginas)::INTEGER
+                 ELSE 0
+            END
+        ELSE f.color
+    END
+FROM por_funcion f
+WHERE f.id = cmu.id;
+
+-- ============================================================================
+-- ÍNDICES PARA EL LISTADO GLOBAL (orden fecha_fin DESC, consumo_total DESC, id DESC)
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_cierres_mensuales_fecha_fin ON cierres_mensuales(fecha_fin DESC, id);
+CREATE INDEX IF NOT EXISTS idx_cierres_usuarios_cierre_consumo_id
+    ON cierres_mensuales_usuarios(cierre_mensual_id, consumo_total DESC, id DESC);
@@ -0,0 +1,7 @@
+-- Migration: 022_add_printer_page_count
+-- Description: Guarda el contador de páginas total (prtMarkerLifeCount) leído
+-- por el sondeo SNMP de la flota junto con el tóner y el estado
+
+ALTER TABLE printers ADD COLUMN IF NOT EXISTS page_count INTEGER NULL;
+
+COMMENT ON COLUMN printers.page_count IS 'Contador de páginas total leído por SNMP en el último sondeo (NULL = nunca sondeada)';
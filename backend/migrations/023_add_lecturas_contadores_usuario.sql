@@ -0,0 +1,30 @@
+-- Migration: 023_add_lecturas_contadores_usuario
+-- Description: Ingesta incremental de contadores por usuario. Cada lectura
+-- deja un registro con usuarios leídos y filas escritas/omitidas, y en
+-- contadores_usuario solo se insertan las filas que cambiaron (más la primera
+-- lectura del día de cada usuario)
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS lecturas_contadores_usuario (
+    id SERIAL PRIMARY KEY,
+    printer_id INTEGER NOT NULL REFERENCES printers(id) ON DELETE CASCADE,
+    fecha_lectura TIMESTAMP WITH TIME ZONE NOT NULL,
+    tipo_contador VARCHAR(20) NOT NULL,
+    modo VARCHAR(20) NOT NULL,
+    usuarios_leidos INTEGER NOT NULL DEFAULT 0,
+    filas_escritas INTEGER NOT NULL DEFAULT 0,
+    filas_omitidas INTEGER NOT NULL DEFAULT 0
+);
+
+-- Última lectura de una impresora (se consulta junto con la impresora en cada lectura)
+CREATE INDEX IF NOT EXISTS idx_lecturas_contadores_usuario_printer_fecha
+ON lecturas_contadores_usuario(printer_id, fecha_lectura DESC);
+
+-- Filas del día de una impresora (comparación de la ingesta incremental)
+CREATE INDEX IF NOT EXISTS idx_contadores_usuario_printer_fecha
+ON contadores_usuario(printer_id, fecha_lectura DESC);
+
+COMMENT ON TABLE lecturas_contadores_usuario IS 'Una fila por lectura de contadores por usuario: usuarios leídos y filas escritas/omitidas';
+
+COMMIT;
@@ -0,0 +1,43 @@
+-- Migration: 024_add_background_jobs
+-- Description: Cola persistente de trabajos largos sobre impresoras (lectura
+-- y cierre masivo, aprovisionamiento, sincronización y desactivación de
+-- usuarios). Los workers reclaman trabajos con un lease; si el proceso se
+-- reinicia, los trabajos con el lease vencido vuelven a ejecutarse
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pending',
+    payload JSONB NOT NULL,
+    resultado JSONB,
+    items JSONB,
+
+    progreso_actual INTEGER NOT NULL DEFAULT 0,
+    progreso_total INTEGER,
+    mensaje VARCHAR(500),
+    error TEXT,
+
+    intentos INTEGER NOT NULL DEFAULT 0,
+    max_intentos INTEGER NOT NULL DEFAULT 3,
+    disponible_en TIMESTAMP WITH TIME ZONE NOT NULL,
+    bloqueado_por VARCHAR(100),
+    bloqueado_hasta TIMESTAMP WITH TIME ZONE,
+
+    creado_por INTEGER REFERENCES admin_users(id) ON DELETE SET NULL,
+    empresa_id INTEGER REFERENCES empresas(id) ON DELETE CASCADE,
+
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Siguiente trabajo a reclamar: pendientes disponibles y ejecuciones con lease vencido
+CREATE INDEX IF NOT EXISTS idx_background_jobs_cola ON background_jobs(estado, disponible_en);
+CREATE INDEX IF NOT EXISTS idx_background_jobs_tipo ON background_jobs(tipo);
+CREATE INDEX IF NOT EXISTS idx_background_jobs_empresa ON background_jobs(empresa_id);
+CREATE INDEX IF NOT EXISTS idx_background_jobs_creado_por ON background_jobs(creado_por);
+CREATE INDEX IF NOT EXISTS idx_background_jobs_created_at ON background_jobs(created_at DESC);
+
+COMMIT;
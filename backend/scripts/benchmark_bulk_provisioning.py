@@ -0,0 +1,109 @@
+"""
+Benchmark del aprovisionamiento masivo: usuario por usuario frente a lotes por impresora
+Levanta una flota simulada de Web Image Monitor (tests/fixtures/wim_simulator.py)
+con una libreta de direcciones existente y aprovisiona los mismos usuarios nuevos:
+  - Por usuario: RicohWebClient.provision_user con logout (login, lectura de la
+    libreta para buscar al usuario, alta, contraseña y logout por cada usuario),
+    como lo hace provision_user_to_printers
+  - Por lotes: un login y una lectura de la libreta por impresora para todo el
+    lote, como lo hace provision_users_to_printers
+
+Las impresoras se atienden en paralelo en ambos caminos; los usuarios de una
+misma impresora van en serie (WIM solo admite un flujo a la vez)
+
+Uso:
+    python scripts/benchmark_bulk_provisioning.py [--users 100] [--printers 4] [--latency-ms 10] [--existing 200]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+def configuracion(codigo):
+    return {
+        'nombre': f'USUARIO {codigo}',
+        'codigo_de_usuario': str(codigo),
+        'nombre_usuario_inicio_sesion': 'reliteltda\\scaner',
+        'contrasena_inicio_sesion': 'Temporal2021',
+        'funciones_disponibles': {'copiadora': True, 'impresora': True, 'escaner': True},
+        'carpeta_smb': {'ruta': f'\\\\192.168.91.5\\Escaner\\{codigo}'}
+    }
+
+
+def por_usuario(ip, usuarios):
+    from services.ricoh_web_client import create_ricoh_web_client
+
+    client = create_ricoh_web_client()
+    return [client.provision_user(ip, configuracion(codigo)) for codigo in usuarios]
+
+
+def por_lotes(ip, usuarios):
+    from services.ricoh_web_client import create_ricoh_web_client
+
+    client = create_ricoh_web_client()
+    try:
+        libreta = client.read_address_book(ip, logout=False)
+        return [client.provision_user(ip, configuracion(codigo), logout=False, address_book=libreta)
+                for codigo in usuarios]
+    finally:
+        client.logout(ip)
+
+
+def medir(camino, args):
+    from tests.fixtures.wim_simulator import WimPrinter, WimSimulator, address_book
+
+    flota = {f"127.0.0.{i}": WimPrinter(address_book(args.existing), latency=args.latency_ms / 1000)
+             for i in range(2, args.printers + 2)}
+    usuarios = list(range(50000, 50000 + args.users))
+    with WimSimulator(flota) as sim, ThreadPoolExecutor(max_workers=args.printers) as pool:
+        start = time.perf_counter()
+        resultados = list(pool.map(lambda ip: camino(sim.address(ip), usuarios), flota))
+        elapsed = time.perf_counter() - start
+
+    fallidos = sum(1 for lote in resultados for r in lote if not (isinstance(r, tuple) and r[0] is True))
+    assert fallidos == 0, f"{fallidos} aprovisionamientos fallidos"
+    logins = sum(p.logins for p in flota.values()) / args.printers
+    requests = sum(len(p.requests) for p in flota.values()) / (args.printers * args.users)
+    return elapsed, logins, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--printers", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="Latencia por request de cada impresora")
+    parser.add_argument("--existing", type=int, default=200, help="Usuarios ya registrados en cada libreta")
+    args = parser.parse_args()
+
+    if not 0 < args.printers <= 250:
+        parser.error("--printers debe estar entre 1 y 250 (una IP 127.0.0.x por impresora)")
+
+    logging.disable(logging.WARNING)
+    os.chdir(tempfile.mkdtemp(prefix="bench-provisioning-"))  # Páginas de depuración del cliente
+
+    filas = []
+    for nombre, camino in (("Por usuario (login/logout por usuario)", por_usuario),
+                           ("Por lotes (una sesión por impresora)", por_lotes)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            filas.append((nombre, *medir(camino, args)))
+
+    print(f"{args.users} usuarios x {args.printers} impresoras, libreta de {args.existing} entradas, "
+          f"{args.latency_ms:.0f} ms por request\n")
+    print(f"{'Camino':<42}{'Total':>9}{'Por 100 usuarios':>18}{'Logins/impresora':>18}{'Requests/usuario':>18}")
+    for nombre, total, logins, requests in filas:
+        print(f"{nombre:<42}{total:>8.2f}s{total * 100 / args.users:>17.2f}s{logins:>18.0f}{requests:>18.1f}")
+    print(f"\nPor lotes vs por usuario: {filas[0][1] / filas[1][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark de la exportación Excel en formato Ricoh
+Compara el libro completo en memoria (exportar_comparacion_ricoh + BytesIO)
+con el motor write-only (construir_comparacion_ricoh + envío por bloques)
+sobre dos cierres de N usuarios en una base SQLite temporal
+
+Cada variante corre en un proceso aparte para medir su pico de RSS
+
+Uso:
+    python scripts/benchmark_excel_export.py [--users 5000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERIAL = "E174M210096"
+VARIANTES = [
+    ("en_memoria", "Workbook en memoria (anterior)"),
+    ("streaming", "Write-only + bloques"),
+]
+
+
+def _preparar_entorno(db_path):
+    """SQLite no soporta JSONB: se mapea a JSON antes de importar los modelos"""
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-minimum-32-characters")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from sqlalchemy import JSON
+    from sqlalchemy.dialects import postgresql
+    postgresql.JSONB = JSON
+
+
+def _sesion(db_path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    engine = create_engine(f"sqlite:///{db_path}")
+    return engine, sessionmaker(bind=engine)()
+
+
+def _rss_mb():
+    """Pico de RSS del proceso en MB (ru_maxrss está en KB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def sembrar(db_path, num_usuarios):
+    """Crea impresora, N usuarios y dos cierres con todos los usuarios"""
+    _preparar_entorno(db_path)
+    from db.database import Base
+    from db.models import User, Printer, CierreMensual, CierreMensualUsuario
+
+    engine, db = _sesion(db_path)
+    Base.metadata.create_all(bind=engine)
+
+    printer = Printer(hostname="benchmark", ip_address="192.168.91.250", empresa_id=1,
+                      serial_number=SERIAL, has_color=True)
+    db.add(printer)
+    db.flush()
+
+    db.execute(User.__table__.insert(), [
+        {"name": f"Usuario {i}", "codigo_de_usuario": f"{i:04d}", "network_username": "reliteltda\\scaner",
+         "network_password_encrypted": "x", "smb_server": "192.168.91.5", "smb_port": 21,
+         "smb_path": "\\\\192.168.91.5\\Escaner", "smb_server_id": 1, "network_credential_id": 1,
+         "is_active": True}
+        for i in range(1, num_usuarios + 1)
+    ])
+    user_ids = [row[0] for row in db.query(User.id)]
+
+    for mes, factor in ((1, 1), (2, 2)):
+        cierre = CierreMensual(printer_id=printer.id, fecha_inicio=date(2026, mes, 1),
+                               fecha_fin=date(2026, mes, 28), anio=2026, mes=mes,
+                               total_paginas=1000 * num_usuarios * factor)
+        db.add(cierre)
+        db.flush()
+        db.execute(CierreMensualUsuario.__table__.insert(), [
+            {"cierre_mensual_id": cierre.id, "user_id": user_id,
+             "total_paginas": (900 + user_id) * factor, "total_bn": 800 * factor, "total_color": (100 + user_id) * factor,
+             "copiadora_bn": 300 * factor, "copiadora_color": 50 * factor, "impresora_bn": 500 * factor,
+             "impresora_color": (50 + user_id) * factor, "escaner_bn": 10, "escaner_color": 2, "fax_bn": 0,
+             "consumo_total": 0, "consumo_copiadora": 0, "consumo_impresora": 0,
+             "consumo_escaner": 0, "consumo_fax": 0}
+            for user_id in user_ids
+        ])
+    db.commit()
+    db.close()
+
+
+def medir(db_path, variante):
+    """Ejecuta una variante y retorna segundos, bytes y RSS (antes y pico)"""
+    _preparar_entorno(db_path)
+    import io
+    from db.models import CierreMensual, Printer
+    from services.excel_stream_service import excel_stream_config, render_workbook
+    from services.export_cierres import obtener_usuarios_cierres
+    from services.export_ricoh import construir_comparacion_ricoh, exportar_comparacion_ricoh
+
+    _, db = _sesion(db_path)
+    rss_antes = _rss_mb()
+    start = time.perf_counter()
+
+    cierre1, cierre2 = db.query(CierreMensual).order_by(CierreMensual.mes).all()
+    if variante == "en_memoria":
+        output = io.BytesIO()
+        exportar_comparacion_ricoh(db, SERIAL, cierre1, cierre2).save(output)
+        tamano = len(output.getvalue())
+    else:
+        printer = db.query(Printer).filter(Printer.id == cierre1.printer_id).first()
+        usuarios = obtener_usuarios_cierres(db, [cierre1.id, cierre2.id])
+        spool, tamano = render_workbook(
+            lambda: construir_comparacion_ricoh(
+                SERIAL, printer.has_color, cierre1.mes, cierre2.mes,
+                cierre1.total_paginas, cierre2.total_paginas,
+                usuarios[cierre1.id], usuarios[cierre2.id]
+            ),
+            excel_stream_config.spool_max_size
+        )
+        while spool.read(excel_stream_config.chunk_size):
+            pass
+        spool.close()
+
+    return {
+        "segundos": time.perf_counter() - start,
+        "bytes": tamano,
+        "rss_antes_mb": rss_antes,
+        "rss_pico_mb": _rss_mb(),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark de exportación Excel Ricoh")
+    arg_parser.add_argument("--users", type=int, default=5000)
+    arg_parser.add_argument("--variant", choices=[v for v, _ in VARIANTES], help=argparse.SUPPRESS)
+    arg_parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(medir(args.db, args.variant)))
+        return
+
+    print("=" * 80)
+    print("⏱️  BENCHMARK DE EXPORTACIÓN EXCEL RICOH")
+    print("=" * 80)
+    print(f"Usuarios por cierre: {args.users} (2 cierres, 3 hojas)\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "benchmark.db")
+        sembrar(db_path, args.users)
+
+        header = f"{'Variante':<34}{'Tiempo (s)':>12}{'Tamaño (KB)':>14}{'RSS pico (MB)':>16}{'Δ RSS (MB)':>14}"
+        print(header)
+        print("-" * len(header))
+
+        for variante, etiqueta in VARIANTES:
+            salida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--variant", variante, "--db", db_path],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            r = json.loads(salida)
+            print(f"{etiqueta:<34}{r['segundos']:>12.2f}{r['bytes'] / 1024:>14.0f}"
+                  f"{r['rss_pico_mb']:>16.1f}{r['rss_pico_mb'] - r['rss_antes_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark del overhead por request de la pila de middlewares de seguridad
+Llama directamente a la aplicación ASGI (sin servidor ni TestClient) con un
+endpoint mínimo y compara:
+  - la app sin middlewares
+  - la pila de main.py con la protección DDoS desactivada
+  - la pila de main.py con la protección DDoS activa
+
+Las IPs rotan sobre un pool para no disparar los límites; el rate limiter usa
+memoria salvo que se pase --redis (REDIS_URL del entorno)
+
+Uso:
+    python scripts/benchmark_middleware.py [--requests 20000] [--ips 1000] [--redis]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CORS_ORIGINS = ["http://localhost:5173"]
+
+
+async def endpoint(scope, receive, send):
+    """Endpoint ASGI mínimo: el tiempo medido es el de los middlewares"""
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", b"2")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def construir_pila(ddos_enabled):
+    """Mismo orden que main.py (el último agregado es el más externo)"""
+    from fastapi.middleware.cors import CORSMiddleware
+    from middleware.csrf_protection import CSRFProtectionMiddleware
+    from middleware.ddos_protection import DDoSProtectionMiddleware
+    from middleware.https_redirect import HTTPSRedirectMiddleware
+    from middleware.security_headers import SecurityHeadersMiddleware
+
+    app = CORSMiddleware(endpoint, allow_origins=CORS_ORIGINS, allow_credentials=True,
+                         allow_methods=["GET", "POST"], allow_headers=["Content-Type", "Authorization"])
+    app = DDoSProtectionMiddleware(app, enabled=ddos_enabled)
+    app = HTTPSRedirectMiddleware(app, force_https=False)
+    app = CSRFProtectionMiddleware(app)
+    return SecurityHeadersMiddleware(app, environment="development")
+
+
+def _scope(ip):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/printers/", "raw_path": b"/printers/",
+        "query_string": b"", "root_path": "", "server": ("127.0.0.1", 8000), "client": ("10.1.0.1", 50000),
+        "headers": [
+            (b"host", b"127.0.0.1:8000"),
+            (b"user-agent", b"benchmark"),
+            (b"origin", CORS_ORIGINS[0].encode()),
+            (b"authorization", b"Bearer " + b"x" * 180),
+            (b"x-forwarded-for", ip.encode()),
+        ],
+    }
+
+
+async def medir(app, num_requests, ips):
+    """Retorna microsegundos promedio por request"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    scopes = [_scope(ip) for ip in ips]
+    # Calentamiento (imports perezosos, inicialización del rate limiter)
+    for scope in scopes[:50]:
+        await app(dict(scope), receive, send)
+
+    start = time.perf_counter()
+    for i in range(num_requests):
+        await app(dict(scopes[i % len(scopes)]), receive, send)
+    return (time.perf_counter() - start) / num_requests * 1_000_000
+
+
+def _limpiar_estado():
+    from middleware.ddos_protection import BurstDetector, IPBlockList
+    from services.rate_limiter_service import RateLimiterService
+    BurstDetector._request_times.clear()
+    IPBlockList._blocked_ips.clear()
+    RateLimiterService._memory_storage.clear()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark de middlewares de seguridad")
+    arg_parser.add_argument("--requests", type=int, default=20000)
+    arg_parser.add_argument("--ips", type=int, default=1000)
+    arg_parser.add_argument("--redis", action="store_true", help="Usar REDIS_URL para el rate limiter")
+    args = arg_parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-minimum-32-characters")
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    if not args.redis:
+        os.environ.pop("REDIS_URL", None)
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    ips = [f"203.0.{i // 250}.{i % 250 + 1}" for i in range(args.ips)]
+    variantes = [
+        ("Sin middlewares", endpoint),
+        ("Pila completa, DDoS desactivado", construir_pila(ddos_enabled=False)),
+        ("Pila completa, DDoS activo", construir_pila(ddos_enabled=True)),
+    ]
+
+    print("=" * 80)
+    print("⏱️  BENCHMARK DE MIDDLEWARES DE SEGURIDAD")
+    print("=" * 80)
+    print(f"Requests: {args.requests} | IPs: {args.ips} | "
+          f"Rate limiter: {'redis' if args.redis else 'memoria'}\n")
+
+    header = f"{'Variante':<36}{'µs/request':>14}{'Overhead (µs)':>16}"
+    print(header)
+    print("-" * len(header))
+
+    base = None
+    for etiqueta, app in variantes:
+        _limpiar_estado()
+        us = asyncio.run(medir(app, args.requests, ips))
+        base = us if base is None else base
+        print(f"{etiqueta:<36}{us:>14.1f}{us - base:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark de los parsers HTML Ricoh
+Mide el tiempo de parseo por página sobre las capturas de cada formato
+(.250/.251/.252/.253 y contador unificado) con cada backend disponible
+
+Uso:
+    python scripts/benchmark_ricoh_parsers.py [--iterations 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.parsers.counter_parser import parse_counter_html
+from services.parsers.eco_counter_parser import parse_eco_counter_html
+from services.parsers.user_counter_parser import parse_user_counter_html
+from services.parsers.html_parsing import LXML_AVAILABLE, extract_pagination, make_soup
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "ricoh_html"
+
+CASES = [
+    ("unification_counter.html", "Contador unificado", parse_counter_html),
+    ("user_counter_250.html", ".250 estándar (18 col)", parse_user_counter_html),
+    ("user_counter_251.html", ".251 extendido (22 col)", parse_user_counter_html),
+    ("user_counter_252.html", ".252 (13 col)", parse_user_counter_html),
+    ("eco_counter_253.html", ".253 ecológico", parse_eco_counter_html),
+]
+
+
+def _parse_page(html, parse, parser):
+    """Parseo de una página tal como lo hacen los parsers: filas + paginación del mismo árbol"""
+    soup = make_soup(html, parser)
+    parse(soup)
+    extract_pagination(soup)
+
+
+def _ms_per_page(html, parse, parser, iterations):
+    _parse_page(html, parse, parser)  # Calentamiento
+    start = time.perf_counter()
+    for _ in range(iterations):
+        _parse_page(html, parse, parser)
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark de parsers HTML Ricoh")
+    arg_parser.add_argument("--iterations", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    backends = ["html.parser"] + (["lxml"] if LXML_AVAILABLE else [])
+
+    print("=" * 80)
+    print("⏱️  BENCHMARK DE PARSERS RICOH (ms por página)")
+    print("=" * 80)
+    if not LXML_AVAILABLE:
+        print("⚠️  lxml no instalado: solo se mide html.parser")
+    print(f"Iteraciones: {args.iterations}\n")
+
+    header = f"{'Formato':<28}" + "".join(f"{b:>14}" for b in backends)
+    print(header)
+    print("-" * len(header))
+
+    for filename, label, parse in CASES:
+        html = (FIXTURES / filename).read_text(encoding="utf-8")
+        timings = [_ms_per_page(html, parse, b, args.iterations) for b in backends]
+        print(f"{label:<28}" + "".join(f"{t:>14.3f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
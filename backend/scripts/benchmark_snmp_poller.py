@@ -0,0 +1,144 @@
+"""
+Benchmark del sondeo de tóner: SNMP (GETBULK) frente a Web Image Monitor
+Levanta una flota simulada con la misma latencia por request en ambos caminos:
+  - HTML: un servidor HTTP por impresora (authForm, login y getStatus.cgi)
+    leído con get_printer_toner_levels, como /discovery/refresh-snmp/{id},
+    en serie y con un pool de hilos
+  - SNMP: un agente del simulador de tests por impresora (127.0.0.x) sondeado
+    con SNMPPollerService.poll_all
+
+El camino HTML se mide en frío (primer login de cada impresora), que es lo
+que ocurre tras idle_timeout del pool de sesiones
+
+Uso:
+    python scripts/benchmark_snmp_poller.py [--printers 30] [--latency-ms 20] [--workers 8]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+STATUS_PAGE = """<html><body><table>
+<tr><td><img src="/images/deviceStTnBarK.gif" width="102" height="8"></td></tr>
+<tr><td><img src="/images/deviceStTnBarC.gif" width="77" height="8"></td></tr>
+<tr><td><img src="/images/deviceStTnBarM.gif" width="58" height="8"></td></tr>
+<tr><td><img src="/images/deviceStTnBarY.gif" width="13" height="8"></td></tr>
+</table>""" + "<div>" + "estado " * 4000 + "</div></body></html>"
+
+
+def servidor_wim(latencia):
+    """Servidor HTTP que imita el login de WIM y getStatus.cgi"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _responder(self, body, headers=()):
+            time.sleep(latencia)
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if "authForm.cgi" in self.path:
+                self._responder('<input type="hidden" name="wimToken" value="1234">')
+            else:
+                self._responder(STATUS_PAGE)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._responder("ok", [("Set-Cookie", "wimsesid=1; path=/")])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def medir_html(printers, latencia, workers):
+    from services.parsers.ricoh_session import ricoh_session_manager
+    from services.parsers.toner_parser import get_printer_toner_levels
+
+    servidores = [servidor_wim(latencia) for _ in range(printers)]
+    ips = [f"127.0.0.1:{s.server_address[1]}" for s in servidores]
+    try:
+        start = time.perf_counter()
+        serie = [get_printer_toner_levels(ip) for ip in ips]
+        t_serie = time.perf_counter() - start
+        assert all(r['success'] for r in serie), serie[0]
+
+        ricoh_session_manager.close_all()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            paralelo = list(pool.map(get_printer_toner_levels, ips))
+        t_paralelo = time.perf_counter() - start
+        assert all(r['success'] for r in paralelo)
+        return t_serie, t_paralelo
+    finally:
+        for server in servidores:
+            server.shutdown()
+
+
+async def medir_snmp(printers, latencia):
+    from services.snmp_client import RicohSNMPClient
+    from services.snmp_poller_service import SNMPPollerConfig, SNMPPollerService
+    from tests.fixtures.snmp_simulator import SNMPSimulator, ricoh_printer_mib
+
+    agentes = {f"127.0.0.{i}": ricoh_printer_mib() for i in range(2, printers + 2)}
+    async with SNMPSimulator(agentes, latency=latencia) as sim:
+        poller = SNMPPollerService(
+            client=RicohSNMPClient(port=sim.port, timeout=max(1.0, latencia * 10), retries=1),
+            config=SNMPPollerConfig(max_concurrency=64)
+        )
+        targets = [{'printer_id': i, 'hostname': ip, 'ip_address': ip, 'status': None}
+                   for i, ip in enumerate(agentes)]
+        start = time.perf_counter()
+        results = await poller.poll_all(targets)
+        elapsed = time.perf_counter() - start
+        assert all(r['info'] is not None for r in results), results[0]['error']
+        requests = sum(len(a.requests) for a in sim.agents.values())
+    return elapsed, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--printers", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Latencia por request de cada impresora")
+    parser.add_argument("--workers", type=int, default=8, help="Hilos del camino HTML en paralelo")
+    args = parser.parse_args()
+
+    if not 0 < args.printers <= 250:
+        parser.error("--printers debe estar entre 1 y 250 (una IP 127.0.0.x por agente)")
+
+    latencia = args.latency_ms / 1000
+    t_serie, t_paralelo = medir_html(args.printers, latencia, args.workers)
+    t_snmp, snmp_requests = asyncio.run(medir_snmp(args.printers, latencia))
+
+    print(f"Flota de {args.printers} impresoras, {args.latency_ms:.0f} ms por request\n")
+    print(f"{'Camino':<40}{'Total':>10}{'Por impresora':>16}")
+    for nombre, total in (
+        ("HTML getStatus.cgi en serie", t_serie),
+        (f"HTML getStatus.cgi ({args.workers} hilos)", t_paralelo),
+        ("SNMP GETBULK (poll_all)", t_snmp),
+    ):
+        print(f"{nombre:<40}{total * 1000:>8.0f}ms{total * 1000 / args.printers:>14.1f}ms")
+    print(f"\nRequests por impresora: HTML 3 (authForm + login + getStatus), "
+          f"SNMP {snmp_requests / args.printers:.1f} (GET + GETBULK)")
+    print(f"SNMP vs HTML en serie: {t_serie / t_snmp:.1f}x, vs HTML en paralelo: {t_paralelo / t_snmp:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Suite de benchmarks de extremo a extremo contra el simulador de Web Image Monitor
+Levanta una flota simulada (tests/fixtures/wim_simulator.py) que reparte los
+cuatro formatos de contadores (.250, .251, .252 y .253 ecológico) sobre una
+base SQLite temporal y mide los flujos completos, con los mismos servicios
+que usa la API:
+  - lectura_flota: primera lectura de toda la flota (FleetReadService)
+  - lectura_incremental: nueva lectura del día tras simular uso (solo cambios)
+  - cierres: cierre de todas las impresoras con cierre anterior (CloseService)
+  - exportaciones: comparación Ricoh entre los dos cierres de cada impresora
+  - aprovisionamiento: alta masiva de usuarios en todas las impresoras
+
+Cada corrida se agrega a un historial JSON Lines (commit, fecha, parámetros y
+métricas) y se compara con las corridas anteriores con los mismos parámetros:
+una métrica más lenta que la mediana de las últimas --window corridas por
+encima de --threshold se marca como regresión
+
+Uso:
+    python scripts/benchmark_suite.py [--printers 4] [--users 300] [--latency-ms 5] [--provision 20]
+        [--only lectura_flota,cierres] [--history scripts/benchmark_history.jsonl]
+        [--threshold 0.2] [--window 5] [--no-save] [--fail-on-regression]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+ESCENARIOS = ["lectura_flota", "lectura_incremental", "cierres", "exportaciones", "aprovisionamiento"]
+HISTORIAL = os.path.join(BACKEND, "scripts", "benchmark_history.jsonl")
+
+
+def _preparar_entorno(db_path):
+    """Base SQLite temporal (JSONB se mapea a JSON) y clave de cifrado para el aprovisionamiento"""
+    from cryptography.fernet import Fernet
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-minimum-32-characters")
+    os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    os.environ.setdefault("ENABLE_JOB_WORKER", "false")
+    os.environ["RETRY_MAX_ATTEMPTS"] = "1"
+    from sqlalchemy import JSON
+    from sqlalchemy.dialects import postgresql
+    postgresql.JSONB = JSON
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Flota:
+    """Simulador, base de datos e impresoras compartidos por los escenarios (en orden)"""
+
+    def __init__(self, args):
+        from tests.fixtures.wim_simulator import (
+            COUNTER_FORMATS, WimPrinter, WimSimulator, address_book, counter_users
+        )
+
+        self.args = args
+        self.wim = {
+            f"127.0.0.{i + 2}": WimPrinter(address_book(args.existing), latency=args.latency_ms / 1000,
+                                           users=counter_users(args.users, first_code=1 + i * args.users, seed=i),
+                                           counter_format=COUNTER_FORMATS[i % len(COUNTER_FORMATS)])
+            for i in range(args.printers)
+        }
+        self.sim = WimSimulator(self.wim).start()
+
+    def sembrar(self):
+        """
+        Impresoras de la flota, más el servidor SMB y la credencial de red por
+        defecto que ya existen en una instalación (la primera lectura en
+        paralelo sobre una base vacía compite por crearlos). Cada impresora
+        tiene su propio rango de códigos de usuario por el mismo motivo
+        """
+        from db.database import Base, SessionLocal, engine
+        from db.models import NetworkCredential, Printer, SMBServer
+        from services.encryption_service import EncryptionService
+
+        Base.metadata.create_all(bind=engine)
+        self.session_factory = SessionLocal
+        db = SessionLocal()
+        db.add(SMBServer(server_address="192.168.91.5", port=21, description="Servidor SMB 192.168.91.5",
+                         is_default=False))
+        db.add(NetworkCredential(username="reliteltda\\scaner", password_encrypted=EncryptionService.encrypt(""),
+                                 description="Credenciales de red para acceso SMB", is_default=False))
+        printers = [
+            Printer(hostname=f"bench-{ip}", ip_address=self.sim.address(ip), empresa_id=1, status="ONLINE",
+                    serial_number=f"E17BENCH{i:03d}", has_color=True,
+                    tiene_contador_usuario=printer.counter_format != '253',
+                    usar_contador_ecologico=printer.counter_format == '253')
+            for i, (ip, printer) in enumerate(self.wim.items())
+        ]
+        db.add_all(printers)
+        db.commit()
+        self.printer_ids = [p.id for p in printers]
+        db.close()
+
+    def leer(self):
+        from db.models import Printer
+        from services.fleet_read_service import FleetReadService
+
+        db = self.session_factory()
+        try:
+            targets = FleetReadService.build_targets(db.query(Printer).all())
+        finally:
+            db.close()
+        summary = FleetReadService(session_factory=self.session_factory).read_all(targets)
+        assert summary['failed'] == 0, [r['error'] for r in summary['results'] if not r['success']]
+        return sum(getattr(r['contadores_usuarios'], 'filas_escritas', 0) for r in summary['results'])
+
+    def retroceder_un_dia(self):
+        """Las lecturas hechas pasan a ser de ayer: hoy empieza un período nuevo"""
+        from db.models import ContadorImpresora, ContadorUsuario, LecturaContadorUsuario
+
+        db = self.session_factory()
+        for modelo in (ContadorImpresora, ContadorUsuario, LecturaContadorUsuario):
+            for fila in db.query(modelo):  # En Python: SQLite no resta intervalos a un DATETIME
+                fila.fecha_lectura -= timedelta(days=1)
+        db.commit()
+        db.close()
+
+    def cerrar(self, dia):
+        from services.close_service import CloseService
+
+        db = self.session_factory()
+        try:
+            resultado = CloseService.create_close_all_printers(db, dia, dia, cerrado_por="benchmark",
+                                                               session_factory=self.session_factory)
+        finally:
+            db.close()
+        assert resultado['failed'] == 0, [r for r in resultado['results'] if not r['success']]
+        return resultado['successful']
+
+    def avanzar(self):
+        return sum(printer.advance() for printer in self.wim.values())
+
+    def close(self):
+        self.sim.close()
+
+
+def lectura_flota(flota):
+    start = time.perf_counter()
+    filas = flota.leer()
+    segundos = time.perf_counter() - start
+    # Preparación de los escenarios siguientes: esa lectura pasa a ayer y se cierra,
+    # y la primera lectura de hoy guarda a todos los usuarios
+    flota.retroceder_un_dia()
+    flota.cerrar(date.today() - timedelta(days=1))
+    flota.avanzar()
+    flota.leer()
+    return {"segundos": segundos, "filas_escritas": filas}
+
+
+def lectura_incremental(flota):
+    cambiados = flota.avanzar()
+    start = time.perf_counter()
+    filas = flota.leer()
+    return {"segundos": time.perf_counter() - start, "filas_escritas": filas, "usuarios_con_cambios": cambiados}
+
+
+def cierres(flota):
+    return {"impresoras": flota.cerrar(date.today())}
+
+
+def exportaciones(flota):
+    from db.models import CierreMensual, Printer
+    from services.excel_stream_service import render_workbook
+    from services.export_cierres import obtener_usuarios_cierres
+    from services.export_ricoh import construir_comparacion_ricoh
+
+    db = flota.session_factory()
+    total_bytes = 0
+    try:
+        for printer in db.query(Printer).filter(Printer.id.in_(flota.printer_ids)):
+            cierre1, cierre2 = db.query(CierreMensual).filter(
+                CierreMensual.printer_id == printer.id
+            ).order_by(CierreMensual.fecha_fin).all()[-2:]
+            usuarios = obtener_usuarios_cierres(db, [cierre1.id, cierre2.id])
+            spool, tamano = render_workbook(
+                lambda: construir_comparacion_ricoh(
+                    printer.serial_number, printer.has_color, cierre1.mes, cierre2.mes,
+                    cierre1.total_paginas, cierre2.total_paginas, usuarios[cierre1.id], usuarios[cierre2.id]
+                ),
+                16 * 1024 * 1024
+            )
+            spool.close()
+            total_bytes += tamano
+    finally:
+        db.close()
+    return {"kb": round(total_bytes / 1024)}
+
+
+def aprovisionamiento(flota):
+    from db.repository import UserRepository
+    from services.encryption_service import EncryptionService
+    from services.provisioning import ProvisioningService
+
+    db = flota.session_factory()
+    try:
+        usuarios = [
+            UserRepository.create(
+                db=db, name=f"Benchmark {codigo}", codigo_de_usuario=str(codigo),
+                network_username="reliteltda\\scaner", network_password_encrypted=EncryptionService.encrypt("Clave2024"),
+                smb_server="192.168.91.5", smb_port=21, smb_path=f"\\\\192.168.91.5\\Escaner\\{codigo}",
+                func_copier=True, func_printer=True, func_scanner=True
+            ).id
+            for codigo in range(60000, 60000 + flota.args.provision)
+        ]
+        logins = sum(printer.logins for printer in flota.wim.values())
+        start = time.perf_counter()
+        resultado = ProvisioningService.provision_users_to_printers(
+            db, usuarios, flota.printer_ids, busy_retry_delay=None, session_factory=flota.session_factory
+        )
+        segundos = time.perf_counter() - start
+    finally:
+        db.close()
+    assert resultado['failed_count'] == 0, resultado['message']
+    return {"segundos": segundos, "altas": resultado['successful_count'],
+            "logins": sum(printer.logins for printer in flota.wim.values()) - logins}
+
+
+def correr(args, escenarios):
+    """Ejecuta los escenarios en orden; cada uno retorna detalles y opcionalmente sus propios segundos"""
+    funciones = {
+        "lectura_flota": lectura_flota,
+        "lectura_incremental": lectura_incremental,
+        "cierres": cierres,
+        "exportaciones": exportaciones,
+        "aprovisionamiento": aprovisionamiento,
+    }
+    metricas, detalles = {}, {}
+    with tempfile.TemporaryDirectory(prefix="bench-suite-") as tmp:
+        _preparar_entorno(os.path.join(tmp, "benchmark.db"))
+        os.chdir(tmp)  # Páginas de depuración del cliente web
+        flota = Flota(args)
+        try:
+            flota.sembrar()
+            for nombre in ESCENARIOS:
+                # Los escenarios dependen de los anteriores: se corren todos y se reportan los pedidos
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):  # Trazas del cliente web
+                    resultado = funciones[nombre](flota)
+                segundos = resultado.pop("segundos", time.perf_counter() - start)
+                if nombre in escenarios:
+                    metricas[nombre] = round(segundos, 3)
+                    detalles[nombre] = resultado
+        finally:
+            flota.close()
+    return metricas, detalles
+
+
+def leer_historial(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def comparar(metricas, anteriores, threshold, window):
+    """Filas (escenario, actual, anterior, mediana, variación, regresión) frente a las últimas corridas"""
+    filas = []
+    for nombre, actual in metricas.items():
+        previas = [corrida["metricas"][nombre] for corrida in anteriores if nombre in corrida["metricas"]][-window:]
+        if not previas:
+            filas.append((nombre, actual, None, None, None, False))
+            continue
+        mediana = statistics.median(previas)
+        variacion = (actual - mediana) / mediana if mediana else 0.0
+        filas.append((nombre, actual, previas[-1], mediana, variacion, variacion > threshold))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--printers", type=int, default=4, help="Impresoras simuladas (formatos en rotación)")
+    parser.add_argument("--users", type=int, default=300, help="Usuarios con contadores por impresora")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latencia por request de cada impresora")
+    parser.add_argument("--existing", type=int, default=200, help="Entradas en la libreta de cada impresora")
+    parser.add_argument("--provision", type=int, default=20, help="Usuarios del aprovisionamiento masivo")
+    parser.add_argument("--only", help="Escenarios a reportar, separados por comas")
+    parser.add_argument("--history", default=HISTORIAL, help="Historial JSON Lines de corridas")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Variación sobre la mediana que es regresión")
+    parser.add_argument("--window", type=int, default=5, help="Corridas anteriores para la mediana")
+    parser.add_argument("--no-save", action="store_true", help="No agregar esta corrida al historial")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Código de salida 1 si hay regresiones")
+    args = parser.parse_args()
+
+    escenarios = args.only.split(",") if args.only else ESCENARIOS
+    desconocidos = set(escenarios) - set(ESCENARIOS)
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))} (válidos: {', '.join(ESCENARIOS)})")
+    if not 0 < args.printers <= 250:
+        parser.error("--printers debe estar entre 1 y 250 (una IP 127.0.0.x por impresora)")
+
+    logging.disable(logging.WARNING)
+    parametros = {"printers": args.printers, "users": args.users, "latency_ms": args.latency_ms,
+                  "existing": args.existing, "provision": args.provision}
+    history = os.path.abspath(args.history)
+
+    print("=" * 80)
+    print("⏱️  SUITE DE BENCHMARKS (simulador Web Image Monitor)")
+    print("=" * 80)
+    print(f"{args.printers} impresoras x {args.users} usuarios, {args.latency_ms:.0f} ms por request, "
+          f"{args.provision} altas\n")
+
+    metricas, detalles = correr(args, escenarios)
+    anteriores = [c for c in leer_historial(history) if c.get("parametros") == parametros]
+
+    header = f"{'Escenario':<22}{'Actual (s)':>12}{'Anterior':>11}{'Mediana':>11}{'Δ':>9}  Detalles"
+    print(header)
+    print("-" * len(header))
+    regresiones = []
+    for nombre, actual, anterior, mediana, variacion, regresion in comparar(
+            metricas, anteriores, args.threshold, args.window):
+        if regresion:
+            regresiones.append(nombre)
+        previo = f"{anterior:>11.3f}{mediana:>11.3f}{variacion:>+8.0%}" if anterior is not None else f"{'—':>11}{'—':>11}{'':>8}"
+        marca = "⚠️ " if regresion else "  "
+        extra = ", ".join(f"{k}={v}" for k, v in detalles[nombre].items())
+        print(f"{nombre:<22}{actual:>12.3f}{previo} {marca}{extra}")
+
+    if not args.no_save:
+        corrida = {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": _commit(),
+                   "python": platform.python_version(), "parametros": parametros,
+                   "metricas": metricas, "detalles": detalles}
+        with open(history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(corrida, ensure_ascii=False) + "\n")
+        print(f"\n💾 Corrida agregada a {history} ({len(anteriores) + 1} con estos parámetros)")
+
+    if regresiones:
+        print(f"⚠️  Regresiones (> {args.threshold:.0%} sobre la mediana): {', '.join(regresiones)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 Authentication Service
 Servicio para autenticación, gestión de sesiones y tokens
 """
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from typing import Optional, NamedTuple
 from datetime import datetime, timedelta, timezone
 
@@ -52,6 +52,10 @@ class AuthService:
     MAX_FAILED_ATTEMPTS = 999  # Incrementado: no bloquear cuentas en la práctica
     LOCKOUT_DURATION_MINUTES = 1   # Si se llega al límite, bloqueo de solo 1 minuto
     
+    # Sesiones en caché: clave por token y campos del usuario guardados junto a la sesión
+    SESSION_CACHE_PREFIX = "session:"
+    PRINCIPAL_FIELDS = ("id", "username", "nombre_completo", "email", "rol", "empresa_id", "is_active")
+    
     @classmethod
     def login(
         cls,
@@ -308,6 +312,13 @@ class AuthService:
         Example:
             >>> AuthService.logout(db, access_token)
         """
+        from services.redis_service import redis_service
+        from services.session_activity_service import session_activity_buffer
+        
+        # Invalidate cached session/principal and pending activity
+        redis_service.delete(f"{cls.SESSION_CACHE_PREFIX}{token}")
+        session_activity_buffer.discard(token)
+        
         # Find and delete session
         session = db.query(AdminSession).filter(AdminSession.token == token).first()
         
@@ -396,7 +407,12 @@ class AuthService:
             minutes=JWTService.ACCESS_TOKEN_EXPIRE_MINUTES
         )
         
-        # Update session
+        # Update session (the previous access token leaves the cache)
+        from services.redis_service import redis_service
+        from services.session_activity_service import session_activity_buffer
+        redis_service.delete(f"{cls.SESSION_CACHE_PREFIX}{session.token}")
+        session_activity_buffer.discard(session.token)
+        
         session.token = new_access_token
         session.expires_at = new_expires_at
         session.last_activity = datetime.now(timezone.utc)
@@ -427,8 +443,14 @@ class AuthService:
     ) -> AdminUser:
         """
         Validate JWT and return user with Device Binding and Redis caching
+
+        Fast path: la entrada de sesión en caché incluye el principal del
+        usuario (id, rol, empresa_id, is_active...), así que un cache HIT no
+        consulta admin_users ni admin_sessions. last_activity se acumula en
+        session_activity_buffer y se escribe en bloque periódicamente.
         """
         from services.redis_service import redis_service
+        from services.session_activity_service import session_activity_buffer
         
         # Decode token
         try:
@@ -441,12 +463,17 @@ class AuthService:
         user_id = payload.get("user_id")
         if not user_id:
             raise InvalidTokenError("Invalid token payload")
+        
+        # Escribir en bloque la actividad acumulada si venció el intervalo
+        session_activity_buffer.flush_if_due(db)
             
-        # 1. Cache HIT en Redis
-        session_key = f"session:{token}"
+        # 1. Cache HIT en Redis (solo entradas que ya incluyen el principal)
+        session_key = f"{cls.SESSION_CACHE_PREFIX}{token}"
         session_data = redis_service.get(session_key)
+        principal = session_data.get("principal") if session_data else None
+        session = None
         
-        if session_data:
+        if principal:
             saved_ip = session_data.get("ip_address")
             saved_ua = session_data.get("user_agent")
         else:
@@ -466,44 +493,84 @@ class AuthService:
                 
             saved_ip = session.ip_address
             saved_ua = session.user_agent
-            
-            # Registrar en Redis
-            now_dt = datetime.now(timezone.utc) if expires_at.tzinfo is not None else datetime.now()
-            ttl = int((expires_at - now_dt).total_seconds())
-            if ttl > 0:
-                redis_service.set(session_key, {
-                    "user_id": user_id,
-                    "ip_address": saved_ip,
-                    "user_agent": saved_ua
-                }, ttl=ttl)
 
         # 2. Control de Huella Digital (Device Binding)
         if saved_ip != client_ip:
-            redis_service.delete(session_key)
-            db.query(AdminSession).filter(AdminSession.token == token).delete()
-            db.commit()
+            cls._revoke_session(db, token)
             raise InvalidTokenError("Device binding violation: IP mismatch")
             
         if saved_ua != client_ua:
-            redis_service.delete(session_key)
-            db.query(AdminSession).filter(AdminSession.token == token).delete()
-            db.commit()
+            cls._revoke_session(db, token)
             raise InvalidTokenError("Device binding violation: User-Agent mismatch")
 
         # 3. Obtener Usuario
-        user = db.query(AdminUser).filter(AdminUser.id == user_id).first()
-        if not user:
-            raise InvalidTokenError("User not found")
+        if principal:
+            user = cls._user_from_principal(db, principal)
+        else:
+            user = db.query(AdminUser).filter(AdminUser.id == user_id).first()
+            if not user:
+                raise InvalidTokenError("User not found")
         if not user.is_active:
             raise AccountDisabledError("Account is disabled")
+
+        if session is not None:
+            # Registrar sesión y principal en Redis hasta que expire la sesión
+            now_dt = datetime.now(timezone.utc) if session.expires_at.tzinfo is not None else datetime.now()
+            ttl = int((session.expires_at - now_dt).total_seconds())
+            if ttl > 0:
+                redis_service.set(session_key, {
+                    "user_id": user_id,
+                    "ip_address": saved_ip,
+                    "user_agent": saved_ua,
+                    "principal": cls._principal_from_user(user)
+                }, ttl=ttl)
             
-        # Actualizar last_activity en DB relacional
-        session = db.query(AdminSession).filter(AdminSession.token == token).first()
-        if session:
-            session.last_activity = datetime.now(timezone.utc)
-            db.commit()
+        # Actualizar last_activity de forma diferida (escritura en bloque)
+        session_activity_buffer.touch(token)
             
         return user
+
+    @classmethod
+    def _principal_from_user(cls, user: AdminUser) -> dict:
+        return {field: getattr(user, field) for field in cls.PRINCIPAL_FIELDS}
+
+    @classmethod
+    def _user_from_principal(cls, db: Session, principal: dict) -> AdminUser:
+        """
+        Reconstruye el AdminUser desde la caché y lo asocia a la sesión de DB
+        sin consultarla; los atributos no cacheados se cargan solo si se usan
+        """
+        user = AdminUser(**{field: principal.get(field) for field in cls.PRINCIPAL_FIELDS})
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    @classmethod
+    def _revoke_session(cls, db: Session, token: str) -> None:
+        """Elimina la sesión de caché, del buffer de actividad y de la DB"""
+        from services.redis_service import redis_service
+        from services.session_activity_service import session_activity_buffer
+
+        redis_service.delete(f"{cls.SESSION_CACHE_PREFIX}{token}")
+        session_activity_buffer.discard(token)
+        db.query(AdminSession).filter(AdminSession.token == token).delete()
+        db.commit()
+
+    @classmethod
+    def invalidate_cached_sessions(cls, db: Session, user_id: int) -> int:
+        """
+        Borra de caché las sesiones (y su principal) de un usuario, p.ej. tras
+        cambiar su contraseña, rol, empresa o desactivarlo. Llamar antes de
+        eliminar sus sesiones de la DB.
+
+        Returns:
+            Cantidad de sesiones invalidadas
+        """
+        from services.redis_service import redis_service
+
+        tokens = db.query(AdminSession.token).filter(AdminSession.admin_user_id == user_id).all()
+        for (token,) in tokens:
+            redis_service.delete(f"{cls.SESSION_CACHE_PREFIX}{token}")
+        return len(tokens)
     
     @classmethod
     def change_password(
@@ -570,6 +637,9 @@ class AuthService:
         user.password_hash = new_password_hash
         db.commit()
         
+        # Force cached sessions to revalidate against the database
+        cls.invalidate_cached_sessions(db, user.id)
+        
         # Log password change
         AuditService.log_action(
             db=db,
@@ -5,12 +5,13 @@ Soporta cierres diarios, semanales, mensuales y personalizados
 """
 import sys
 import os
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict, List, Tuple
 from datetime import datetime, date, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 import hashlib
 import calendar
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -28,7 +29,8 @@ class CloseService:
         fecha_fin: date,
         cerrado_por: Optional[str] = None,
         notas: Optional[str] = None,
-        validar_secuencia: bool = True
+        validar_secuencia: bool = True,
+        snapshot_por_lotes: bool = False
     ) -> CierreMensual:
         """
         Crea un cierre de contadores para cualquier período
@@ -44,6 +46,9 @@ class CloseService:
             cerrado_por: Usuario que realiza el cierre
             notas: Notas adicionales
             validar_secuencia: Si True, valida que no haya gaps en cierres mensuales
+            snapshot_por_lotes: Si True, calcula el snapshot de todos los usuarios
+                con consultas por conjunto (_calcular_consumos_impresora) en lugar
+                de consultar usuario por usuario
             
         Returns:
             CierreMensual creado con snapshot de usuarios
@@ -203,52 +208,69 @@ class CloseService:
             # CREAR SNAPSHOT DE USUARIOS
             # ====================================================================
             
-            usuarios_snapshot = []
-            
-            # Obtener usuarios únicos por user_id (normalizado)
-            usuarios_ids = db.query(ContadorUsuario.user_id).filter(
-                ContadorUsuario.printer_id == printer_id,
-                ContadorUsuario.user_id.isnot(None)  # Solo usuarios con user_id
-            ).distinct().all()
-            
-            print(f"\n📋 Procesando {len(usuarios_ids)} usuarios únicos...")
-            
-            for (user_id,) in usuarios_ids:
-                consumo = CloseService._calcular_consumo_usuario(
-                    db, printer_id, user_id, fecha_inicio, fecha_fin, cierre_anterior
+            if snapshot_por_lotes:
+                consumos = CloseService._calcular_consumos_impresora(
+                    db, printer_id, fecha_inicio, fecha_fin, cierre_anterior
                 )
+            else:
+                consumos = []
+                
+                # Obtener usuarios únicos por user_id (normalizado)
+                usuarios_ids = db.query(ContadorUsuario.user_id).filter(
+                    ContadorUsuario.printer_id == printer_id,
+                    ContadorUsuario.user_id.isnot(None)  # Solo usuarios con user_id
+                ).distinct().all()
+                
+                print(f"\n📋 Procesando {len(usuarios_ids)} usuarios únicos...")
                 
-                if consumo:
-                    usuario_cierre = CierreMensualUsuario(
-                        cierre_mensual_id=cierre.id,
-                        user_id=consumo['user_id'],  # ← NORMALIZADO
-                        
-                        total_paginas=consumo['contador_actual'],
-                        total_bn=consumo['total_bn'],
-                        total_color=consumo['total_color'],
-                        
-                        copiadora_bn=consumo['copiadora_bn'],
-                        copiadora_color=consumo['copiadora_color'],
-                        impresora_bn=consumo['impresora_bn'],
-                        impresora_color=consumo['impresora_color'],
-                        escaner_bn=consumo['escaner_bn'],
-                        escaner_color=consumo['escaner_color'],
-                        fax_bn=consumo['fax_bn'],
-                        
-                        consumo_total=consumo['consumo_total'],
-                        consumo_copiadora=consumo['consumo_copiadora'],
-                        consumo_impresora=consumo['consumo_impresora'],
-                        consumo_escaner=consumo['consumo_escaner'],
-                        consumo_fax=consumo['consumo_fax']
+                for (user_id,) in usuarios_ids:
+                    consumo = CloseService._calcular_consumo_usuario(
+                        db, printer_id, user_id, fecha_inicio, fecha_fin, cierre_anterior
                     )
-                    usuarios_snapshot.append(usuario_cierre)
+                    if consumo:
+                        consumos.append(consumo)
+            
+            usuarios_snapshot = [
+                {
+                    'cierre_mensual_id': cierre.id,
+                    'user_id': consumo['user_id'],  # ← NORMALIZADO
+                    
+                    'total_paginas': consumo['contador_actual'],
+                    'total_bn': consumo['total_bn'],
+                    'total_color': consumo['total_color'],
+                    
+                    'copiadora_bn': consumo['copiadora_bn'],
+                    'copiadora_color': consumo['copiadora_color'],
+                    'impresora_bn': consumo['impresora_bn'],
+                    'impresora_color': consumo['impresora_color'],
+                    'escaner_bn': consumo['escaner_bn'],
+                    'escaner_color': consumo['escaner_color'],
+                    'fax_bn': consumo['fax_bn'],
+                    
+                    'consumo_total': consumo['consumo_total'],
+                    'consumo_copiadora': consumo['consumo_copiadora'],
+                    'consumo_impresora': consumo['consumo_impresora'],
+                    'consumo_escaner': consumo['consumo_escaner'],
+                    'consumo_fax': consumo['consumo_fax']
+                }
+                for consumo in consumos
+            ]
+            
+            # Consumo B/N y color del período, calculado una sola vez para el snapshot
+            snapshots_anteriores = CloseService._snapshots_por_usuario(
+                db, cierre_anterior.id if (cierre_anterior and printer.has_color) else None
+            )
+            for snapshot in usuarios_snapshot:
+                snapshot['consumo_bn'], snapshot['consumo_color'] = CloseService.calcular_consumo_bn_color(
+                    snapshot, snapshots_anteriores.get(snapshot['user_id']), printer.has_color
+                )
             
             print(f"✅ {len(usuarios_snapshot)} usuarios procesados para snapshot")
             
             if not usuarios_snapshot:
                 raise ValueError("No hay usuarios para guardar en snapshot")
             
-            db.bulk_save_objects(usuarios_snapshot)
+            db.bulk_insert_mappings(CierreMensualUsuario, usuarios_snapshot)
             db.flush()
             
             # ====================================================================
@@ -300,6 +322,91 @@ class CloseService:
             db.rollback()
             raise Exception(f"Error al crear cierre: {e}")
     
+    @staticmethod
+    def _snapshots_por_usuario(db: Session, cierre_id: Optional[int]) -> Dict[int, CierreMensualUsuario]:
+        """Snapshot de cada usuario en un cierre (el primero por id si hay duplicados)"""
+        snapshots: Dict[int, CierreMensualUsuario] = {}
+        if cierre_id is None:
+            return snapshots
+        for u in db.query(CierreMensualUsuario).filter(
+            CierreMensualUsuario.cierre_mensual_id == cierre_id
+        ).order_by(CierreMensualUsuario.id).all():
+            snapshots.setdefault(u.user_id, u)
+        return snapshots
+    
+    @staticmethod
+    def calcular_consumo_bn_color(
+        actual,
+        anterior: Optional[CierreMensualUsuario],
+        has_color: Optional[bool]
+    ) -> Tuple[int, int]:
+        """
+        Separa el consumo del período de un usuario en B/N y color
+        
+        - Impresora monocromática: todo el consumo es B/N
+        - Con snapshot anterior: diferencia de los acumulados total_bn/total_color;
+          si ambas son 0 pero hubo consumo, diferencia de copiadora + impresora
+        - Sin referencia útil: reparte consumo_total según la proporción
+          B/N / color de los acumulados del usuario
+        
+        La migración 021 replica esta misma regla para los cierres históricos.
+        
+        Args:
+            actual: Snapshot del usuario (dict o CierreMensualUsuario)
+            anterior: Snapshot del mismo usuario en el cierre anterior
+            has_color: Si la impresora es a color
+            
+        Returns:
+            Tupla (consumo_bn, consumo_color)
+        """
+        def campo(nombre):
+            valor = actual[nombre] if isinstance(actual, dict) else getattr(actual, nombre)
+            return valor or 0
+        
+        consumo_total = campo('consumo_total')
+        if not has_color:
+            return consumo_total, 0
+        
+        consumo_bn = consumo_color = 0
+        if anterior:
+            consumo_bn = max(0, campo('total_bn') - anterior.total_bn)
+            consumo_color = max(0, campo('total_color') - anterior.total_color)
+            
+            if consumo_bn == 0 and consumo_color == 0 and consumo_total > 0:
+                consumo_bn = max(0, campo('copiadora_bn') - anterior.copiadora_bn) + \
+                    max(0, campo('impresora_bn') - anterior.impresora_bn)
+                consumo_color = max(0, campo('copiadora_color') - anterior.copiadora_color) + \
+                    max(0, campo('impresora_color') - anterior.impresora_color)
+        
+        if consumo_bn == 0 and consumo_color == 0 and consumo_total > 0:
+            total_acumulado = campo('total_paginas')
+            if total_acumulado > 0:
+                consumo_bn = consumo_total * campo('total_bn') // total_acumulado
+                consumo_color = consumo_total * campo('total_color') // total_acumulado
+            else:
+                consumo_bn = consumo_total
+        
+        return consumo_bn, consumo_color
+    
+    @staticmethod
+    def recalcular_consumo_bn_color(db: Session, snapshot: CierreMensualUsuario) -> None:
+        """Recalcula consumo_bn/consumo_color de un snapshot ya guardado (p. ej. tras editarlo)"""
+        cierre = snapshot.cierre
+        anterior = None
+        if cierre.printer.has_color:
+            cierre_anterior = db.query(CierreMensual).filter(
+                CierreMensual.printer_id == cierre.printer_id,
+                CierreMensual.fecha_fin < cierre.fecha_inicio
+            ).order_by(CierreMensual.fecha_fin.desc()).first()
+            if cierre_anterior:
+                anterior = db.query(CierreMensualUsuario).filter(
+                    CierreMensualUsuario.cierre_mensual_id == cierre_anterior.id,
+                    CierreMensualUsuario.user_id == snapshot.user_id
+                ).order_by(CierreMensualUsuario.id).first()
+        snapshot.consumo_bn, snapshot.consumo_color = CloseService.calcular_consumo_bn_color(
+            snapshot, anterior, cierre.printer.has_color
+        )
+    
     @staticmethod
     def _calcular_consumo_usuario(
         db: Session,
@@ -400,6 +507,122 @@ class CloseService:
             'consumo_fax': max(0, consumo_fax)
         }
     
+    @staticmethod
+    def _calcular_consumos_impresora(
+        db: Session,
+        printer_id: int,
+        fecha_inicio: date,
+        fecha_fin: date,
+        cierre_anterior: Optional[CierreMensual]
+    ) -> List[Dict]:
+        """
+        Calcula el consumo de TODOS los usuarios de una impresora en un período
+        
+        Versión por conjuntos de _calcular_consumo_usuario: en lugar de 2-3
+        consultas por usuario, obtiene con ROW_NUMBER() la última lectura de
+        cada usuario hasta fecha_fin y la primera lectura dentro del período,
+        y carga en una sola consulta el snapshot del cierre anterior.
+        Produce exactamente los mismos dicts que _calcular_consumo_usuario.
+        
+        Returns:
+            Lista de dicts de consumo ordenada por user_id
+        """
+        fecha_fin_datetime = datetime.combine(fecha_fin, datetime.max.time())
+        
+        def _lecturas_por_usuario(condiciones, orden):
+            ranking = func.row_number().over(
+                partition_by=ContadorUsuario.user_id,
+                order_by=orden
+            ).label('rn')
+            subq = db.query(ContadorUsuario.id.label('id'), ranking).filter(
+                ContadorUsuario.printer_id == printer_id,
+                ContadorUsuario.user_id.isnot(None),
+                *condiciones
+            ).subquery()
+            lecturas = db.query(ContadorUsuario).join(
+                subq, ContadorUsuario.id == subq.c.id
+            ).filter(subq.c.rn == 1).all()
+            return {c.user_id: c for c in lecturas}
+        
+        # Contador más reciente de cada usuario hasta el fin del período
+        actuales = _lecturas_por_usuario(
+            [ContadorUsuario.fecha_lectura <= fecha_fin_datetime],
+            [ContadorUsuario.fecha_lectura.desc(), ContadorUsuario.id.desc()]
+        )
+        if not actuales:
+            return []
+        
+        # Snapshot de cada usuario en el cierre anterior
+        anteriores = CloseService._snapshots_por_usuario(
+            db, cierre_anterior.id if cierre_anterior else None
+        )
+        
+        # Primer contador dentro del período (solo se usa sin snapshot anterior).
+        # Mismo filtro que _calcular_consumo_usuario: fecha_fin como fecha, no como fin de día
+        inicios = {}
+        if any(user_id not in anteriores for user_id in actuales):
+            inicios = _lecturas_por_usuario(
+                [ContadorUsuario.fecha_lectura >= fecha_inicio,
+                 ContadorUsuario.fecha_lectura <= fecha_fin],
+                [ContadorUsuario.fecha_lectura.asc(), ContadorUsuario.id.asc()]
+            )
+        
+        consumos = []
+        for user_id in sorted(actuales):
+            contador_actual = actuales[user_id]
+            contador_anterior = anteriores.get(user_id)
+            
+            if contador_anterior:
+                referencia = (
+                    contador_anterior.total_paginas,
+                    contador_anterior.copiadora_bn + contador_anterior.copiadora_color,
+                    contador_anterior.impresora_bn + contador_anterior.impresora_color,
+                    contador_anterior.escaner_bn + contador_anterior.escaner_color,
+                    contador_anterior.fax_bn
+                )
+            else:
+                contador_inicio = inicios.get(user_id)
+                if contador_inicio and contador_inicio.id != contador_actual.id:
+                    referencia = (
+                        contador_inicio.total_paginas,
+                        contador_inicio.copiadora_bn + contador_inicio.copiadora_todo_color,
+                        contador_inicio.impresora_bn + contador_inicio.impresora_color,
+                        contador_inicio.escaner_bn + contador_inicio.escaner_todo_color,
+                        contador_inicio.fax_bn
+                    )
+                else:
+                    referencia = None
+            
+            if referencia:
+                consumo_total = contador_actual.total_paginas - referencia[0]
+                consumo_copiadora = (contador_actual.copiadora_bn + contador_actual.copiadora_todo_color) - referencia[1]
+                consumo_impresora = (contador_actual.impresora_bn + contador_actual.impresora_color) - referencia[2]
+                consumo_escaner = (contador_actual.escaner_bn + contador_actual.escaner_todo_color) - referencia[3]
+                consumo_fax = contador_actual.fax_bn - referencia[4]
+            else:
+                consumo_total = consumo_copiadora = consumo_impresora = consumo_escaner = consumo_fax = 0
+            
+            consumos.append({
+                'user_id': user_id,
+                'contador_actual': contador_actual.total_paginas,
+                'total_bn': contador_actual.total_bn,
+                'total_color': contador_actual.total_color,
+                'copiadora_bn': contador_actual.copiadora_bn,
+                'copiadora_color': contador_actual.copiadora_todo_color,
+                'impresora_bn': contador_actual.impresora_bn,
+                'impresora_color': contador_actual.impresora_color,
+                'escaner_bn': contador_actual.escaner_bn,
+                'escaner_color': contador_actual.escaner_todo_color,
+                'fax_bn': contador_actual.fax_bn,
+                'consumo_total': max(0, consumo_total),
+                'consumo_copiadora': max(0, consumo_copiadora),
+                'consumo_impresora': max(0, consumo_impresora),
+                'consumo_escaner': max(0, consumo_escaner),
+                'consumo_fax': max(0, consumo_fax)
+            })
+        
+        return consumos
+    
     @staticmethod
     def close_month_helper(
         db: Session,
@@ -537,6 +760,8 @@ class CloseService:
         usuarios_recientes = {u.user_id: u for u in cierre_reciente.usuarios if u.user_id}
         
         user_ids_unicos = set(usuarios_antiguos.keys()).union(set(usuarios_recientes.keys()))
+        from db.repository import UserRepository
+        user_map = UserRepository.get_map_by_ids(db, user_ids_unicos)
         
         usuarios_comparacion = []
         for user_id in user_ids_unicos:
@@ -544,8 +769,7 @@ class CloseService:
             u_reciente = usuarios_recientes.get(user_id)
             
             # Obtener información del usuario desde la tabla users
-            from db.models import User
-            user = db.query(User).filter(User.id == user_id).first()
+            user = user_map.get(user_id)
             codigo = user.codigo_de_usuario if user else str(user_id)
             nombre = user.name if user else f"Usuario {user_id}"
             
@@ -651,6 +875,83 @@ class CloseService:
             "promedio_consumo_por_usuario": round(promedio, 2)
         }
 
+    @staticmethod
+    def _max_close_workers(max_workers: Optional[int] = None) -> int:
+        """
+        Calcula cuántos cierres pueden ejecutarse en paralelo
+        
+        Cada worker mantiene una conexión durante su transacción, así que el
+        límite se ajusta al tamaño del pool de conexiones (reservando una para
+        el request/scheduler que lanza el cierre masivo). SQLite no admite
+        escrituras concurrentes, por lo que allí se usa un solo worker.
+        """
+        from db.database import engine
+        
+        if max_workers is None:
+            try:
+                max_workers = int(os.getenv('CLOSE_MAX_WORKERS', '8'))
+            except ValueError:
+                max_workers = 8
+        
+        if engine.dialect.name == 'sqlite':
+            return 1
+        
+        pool_size = engine.pool.size() if callable(getattr(engine.pool, 'size', None)) else max_workers + 1
+        return max(1, min(max_workers, pool_size - 1))
+    
+    @staticmethod
+    def _close_printer_isolated(
+        session_factory,
+        printer_id: int,
+        printer_name: str,
+        fecha_inicio: date,
+        fecha_fin: date,
+        cerrado_por: Optional[str],
+        notas: Optional[str]
+    ) -> Dict:
+        """Crea el cierre de una impresora en su propia sesión/transacción"""
+        start = time.monotonic()
+        db = session_factory()
+        try:
+            cierre = CloseService.create_close(
+                db=db,
+                printer_id=printer_id,
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                cerrado_por=cerrado_por,
+                notas=notas,
+                validar_secuencia=False,  # No validar secuencia en cierres masivos
+                snapshot_por_lotes=True
+            )
+            usuarios_count = db.query(func.count(CierreMensualUsuario.id)).filter(
+                CierreMensualUsuario.cierre_mensual_id == cierre.id
+            ).scalar()
+            
+            return {
+                "printer_id": printer_id,
+                "printer_name": printer_name,
+                "success": True,
+                "cierre_id": cierre.id,
+                "total_paginas": cierre.total_paginas,
+                "usuarios_count": usuarios_count,
+                "error": None,
+                "elapsed_seconds": round(time.monotonic() - start, 3)
+            }
+        except Exception as e:
+            db.rollback()
+            return {
+                "printer_id": printer_id,
+                "printer_name": printer_name,
+                "success": False,
+                "cierre_id": None,
+                "total_paginas": 0,
+                "usuarios_count": 0,
+                "error": str(e),
+                "elapsed_seconds": round(time.monotonic() - start, 3)
+            }
+        finally:
+            db.close()
+    
     @staticmethod
     def create_close_all_printers(
         db: Session,
@@ -658,22 +959,43 @@ class CloseService:
         fecha_fin: date,
         cerrado_por: Optional[str] = None,
         notas: Optional[str] = None,
-        empresa_id: Optional[int] = None
+        empresa_id: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        session_factory=None,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        skip_existing: bool = False
     ) -> Dict:
         """
-        Crea cierres para todas las impresoras activas simultáneamente
+        Crea cierres para todas las impresoras activas en paralelo
+        
+        Cada impresora se cierra en su propia sesión y transacción dentro de
+        un pool de workers, de modo que el fallo de una impresora no afecta al
+        resto ni deja la sesión compartida en estado inválido.
         
         Args:
-            db: Sesión de base de datos
+            db: Sesión de base de datos (solo para listar impresoras)
             fecha_inicio: Fecha de inicio del período
             fecha_fin: Fecha de fin del período
             cerrado_por: Usuario que realiza el cierre
             notas: Notas adicionales
             empresa_id: ID de empresa para filtrar impresoras (opcional)
+            max_workers: Cierres simultáneos (por defecto CLOSE_MAX_WORKERS,
+                limitado por el tamaño del pool de conexiones)
+            session_factory: Fábrica de sesiones para los workers (por defecto SessionLocal)
+            on_result: Se llama (desde el worker) con el resultado de cada
+                impresora al terminar su cierre
+            skip_existing: No volver a cerrar las impresoras que ya tienen un
+                cierre de este mismo período (re-ejecuciones de un trabajo)
             
         Returns:
-            Dict con estadísticas de cierres creados
+            Dict con estadísticas de cierres creados y tiempo por impresora
         """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        if session_factory is None:
+            from db.database import SessionLocal
+            session_factory = SessionLocal
+        
         # Obtener todas las impresoras activas
         query = db.query(Printer).filter(Printer.status != 'offline')
         
@@ -681,7 +1003,7 @@ class CloseService:
         if empresa_id:
             query = query.filter(Printer.empresa_id == empresa_id)
         
-        printers = query.all()
+        printers = [(p.id, p.hostname) for p in query.all()]
         
         if not printers:
             return {
@@ -690,54 +1012,70 @@ class CloseService:
                 "successful": 0,
                 "failed": 0,
                 "total": 0,
+                "elapsed_seconds": 0.0,
                 "results": []
             }
         
-        results = []
-        successful = 0
-        failed = 0
+        existing = {}
+        if skip_existing:
+            existing = {
+                printer_id: (cierre_id, total_paginas)
+                for printer_id, cierre_id, total_paginas in db.query(
+                    CierreMensual.printer_id, CierreMensual.id, CierreMensual.total_paginas
+                ).filter(
+                    CierreMensual.printer_id.in_([printer_id for printer_id, _ in printers]),
+                    CierreMensual.fecha_inicio == fecha_inicio,
+                    CierreMensual.fecha_fin == fecha_fin
+                ).all()
+            }
         
-        for printer in printers:
-            try:
-                # Crear cierre para esta impresora
-                cierre = CloseService.create_close(
-                    db=db,
-                    printer_id=printer.id,
-                    fecha_inicio=fecha_inicio,
-                    fecha_fin=fecha_fin,
-                    cerrado_por=cerrado_por,
-                    notas=notas,
-                    validar_secuencia=False  # No validar secuencia en cierres masivos
-                )
-                
-                results.append({
-                    "printer_id": printer.id,
-                    "printer_name": printer.hostname,
+        workers = min(len(printers), CloseService._max_close_workers(max_workers))
+        start = time.monotonic()
+        
+        def close_worker(printer):
+            printer_id, printer_name = printer
+            if printer_id in existing:
+                cierre_id, total_paginas = existing[printer_id]
+                result = {
+                    "printer_id": printer_id,
+                    "printer_name": printer_name,
                     "success": True,
-                    "cierre_id": cierre.id,
-                    "total_paginas": cierre.total_paginas,
-                    "usuarios_count": len(cierre.usuarios),
-                    "error": None
-                })
-                successful += 1
-                
-            except Exception as e:
-                results.append({
-                    "printer_id": printer.id,
-                    "printer_name": printer.hostname,
-                    "success": False,
-                    "cierre_id": None,
-                    "total_paginas": 0,
-                    "usuarios_count": 0,
-                    "error": str(e)
-                })
-                failed += 1
+                    "skipped": True,
+                    "cierre_id": cierre_id,
+                    "total_paginas": total_paginas,
+                    "usuarios_count": None,
+                    "error": None,
+                    "elapsed_seconds": 0.0
+                }
+                if on_result is not None:
+                    on_result(result)
+                return result
+            result = CloseService._close_printer_isolated(
+                session_factory, printer_id, printer_name,
+                fecha_inicio, fecha_fin, cerrado_por, notas
+            )
+            if on_result is not None:
+                on_result(result)
+            return result
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="close-all") as executor:
+            results = list(executor.map(close_worker, printers))
+        
+        successful = sum(1 for r in results if r["success"])
+        failed = len(results) - successful
+        skipped = len(existing)
+        
+        message = f"Cierres completados: {successful} exitosos, {failed} fallidos"
+        if skipped:
+            message += f" ({skipped} ya existentes)"
         
         return {
             "success": True,
-            "message": f"Cierres completados: {successful} exitosos, {failed} fallidos",
+            "message": message,
             "successful": successful,
             "failed": failed,
+            "skipped": skipped,
             "total": len(printers),
+            "elapsed_seconds": round(time.monotonic() - start, 3),
             "results": results
         }
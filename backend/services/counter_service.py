@@ -5,20 +5,25 @@ Integra los parsers con la base de datos
 """
 import sys
 import os
+import threading
+import weakref
+from dataclasses import dataclass
 from typing import List, Dict, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, date, time
 from sqlalchemy.orm import Session
 import logging
 
 # Agregar el directorio backend al path para imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from db.models import Printer, ContadorImpresora, ContadorUsuario, CierreMensual, CierreMensualUsuario
+from db.models import (
+    Printer, ContadorImpresora, ContadorUsuario, LecturaContadorUsuario, CierreMensual, CierreMensualUsuario
+)
 from db.database import get_db
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 # Importar parsers desde services/parsers
-from services.parsers import get_printer_counters, get_all_user_counters, get_all_eco_users
+from services.parsers import get_printer_counters, fetch_all_eco_users
 
 # Importar detector de capacidades
 from services.capabilities_detector import CapabilitiesDetector
@@ -26,9 +31,121 @@ from services.capabilities_detector import CapabilitiesDetector
 # Importar servicio de validación
 from services.validation_service import ValidationService
 
+# Importar sincronización de usuarios detectados en contadores
+from services.user_sync_service import UserSyncService, format_user_code
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+INGESTION_MODES = ('incremental', 'full')
+
+# Columnas de ContadorUsuario que forman la lectura de un usuario
+USER_COUNTER_INT_FIELDS = (
+    'total_paginas', 'total_bn', 'total_color',
+    'copiadora_bn', 'copiadora_mono_color', 'copiadora_dos_colores', 'copiadora_todo_color',
+    'copiadora_hojas_2_caras', 'copiadora_paginas_combinadas',
+    'impresora_bn', 'impresora_mono_color', 'impresora_dos_colores', 'impresora_color',
+    'impresora_hojas_2_caras', 'impresora_paginas_combinadas',
+    'escaner_bn', 'escaner_todo_color', 'fax_bn', 'fax_paginas_transmitidas',
+    'revelado_negro', 'revelado_color_ymc'
+)
+USER_COUNTER_ECO_FIELDS = ('eco_uso_2_caras', 'eco_uso_combinar', 'eco_reduccion_papel')
+
+
+@dataclass
+class CounterIngestionConfig:
+    """Configuración de la ingesta de contadores por usuario"""
+    mode: str = 'incremental'  # 'incremental' (solo filas con cambios) o 'full' (una fila por usuario en cada lectura)
+
+
+def load_counter_ingestion_config_from_env() -> CounterIngestionConfig:
+    """Carga la configuración de la ingesta de contadores desde variables de entorno"""
+    config = CounterIngestionConfig(mode=os.getenv('COUNTER_INGESTION_MODE', 'incremental').strip().lower())
+
+    if config.mode not in INGESTION_MODES:
+        logger.warning(f"Invalid COUNTER_INGESTION_MODE ({config.mode}), using default incremental")
+        config.mode = 'incremental'
+
+    return config
+
+
+def user_counter_signature(contador) -> Tuple:
+    """
+    Valores de una lectura de usuario (ContadorUsuario o fila de consulta)
+    Las columnas numéricas sin asignar cuentan como 0, su valor por defecto en la BD
+    """
+    return (
+        contador.tipo_contador,
+        *(getattr(contador, field) or 0 for field in USER_COUNTER_INT_FIELDS),
+        *(getattr(contador, field) for field in USER_COUNTER_ECO_FIELDS)
+    )
+
+
+def _as_local(value: Optional[datetime]) -> Optional[datetime]:
+    """Fecha naive en hora local (las columnas timezone=True vuelven con zona en PostgreSQL)"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+class UserCounterReading(list):
+    """
+    ContadorUsuario guardados en una lectura, con el resumen de la ingesta
+    En modo incremental la lista solo incluye las filas escritas;
+    usuarios_leidos es el total de usuarios que devolvió la impresora
+    """
+
+    def __init__(self, contadores=(), usuarios_leidos: int = 0, modo: str = 'full'):
+        super().__init__(contadores)
+        self.usuarios_leidos = usuarios_leidos
+        self.modo = modo
+
+    @property
+    def filas_escritas(self) -> int:
+        return len(self)
+
+    @property
+    def filas_omitidas(self) -> int:
+        return self.usuarios_leidos - len(self)
+
+
+class LatestUserCounterCache:
+    """
+    Última lectura guardada hoy de cada usuario, por impresora
+
+    Cada entrada guarda la fecha de la última lectura registrada
+    (LecturaContadorUsuario) con la que se construyó: si otra lectura escribió
+    después, la fecha ya no coincide y se recarga desde la BD. Las entradas se
+    separan por engine para que dos bases de datos no compartan caché
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = weakref.WeakKeyDictionary()
+
+    def get(self, bind, printer_id: int, ultima_lectura: datetime) -> Optional[Dict[int, Tuple]]:
+        with self._lock:
+            entry = self._entries.get(bind, {}).get(printer_id)
+        if entry and entry[0] == ultima_lectura:
+            return entry[1]
+        return None
+
+    def set(self, bind, printer_id: int, ultima_lectura: datetime, firmas: Dict[int, Tuple]) -> None:
+        with self._lock:
+            self._entries.setdefault(bind, {})[printer_id] = (ultima_lectura, firmas)
+
+    def invalidate(self, bind=None, printer_id: Optional[int] = None) -> None:
+        with self._lock:
+            if bind is None:
+                self._entries.clear()
+            elif printer_id is None:
+                self._entries.pop(bind, None)
+            else:
+                self._entries.get(bind, {}).pop(printer_id, None)
+
+
+latest_user_counter_cache = LatestUserCounterCache()
+
 
 class CounterService:
     """Servicio para lectura y almacenamiento de contadores"""
@@ -106,60 +223,125 @@ class CounterService:
             raise Exception(f"Error al leer contadores de impresora {printer_id}: {e}")
     
     @staticmethod
-    def read_user_counters(db: Session, printer_id: int) -> List[ContadorUsuario]:
+    def _remember_page_size(printer: Printer, fetch_stats) -> None:
+        """Cachea en la impresora el tamaño de página aprendido (se guarda con el commit de la lectura)"""
+        learned = fetch_stats.learned_page_size
+        if learned and learned != printer.tamano_pagina_contadores:
+            logger.info(f"📄 {printer.hostname}: tamaño de página de contadores {printer.tamano_pagina_contadores} -> {learned}")
+            printer.tamano_pagina_contadores = learned
+    
+    @staticmethod
+    def _require_complete(printer: Printer, fetch_stats) -> None:
+        """
+        Falla la lectura si faltan páginas: guardarla dejaría a esos usuarios sin
+        fila (la ingesta incremental y los cierres los contarían de menos)
+        """
+        if fetch_stats.incomplete:
+            raise ValueError(
+                f"lectura incompleta de {printer.hostname}: solo {fetch_stats.pages} páginas "
+                f"({fetch_stats.rows} usuarios) antes de una página fallida"
+            )
+    
+    @staticmethod
+    def _stored_signatures(db: Session, printer_id: int, ultima_lectura: Optional[datetime],
+                           fecha_lectura: datetime) -> Dict[int, Tuple]:
+        """
+        Firma de la última fila guardada HOY de cada usuario de la impresora
+
+        Un usuario sin fila hoy no aparece: su lectura se escribe siempre, así
+        la primera lectura de cada día queda guardada y los cierres (primera
+        lectura del período, última hasta la fecha fin) no cambian
+        """
+        if ultima_lectura is None or ultima_lectura.date() != fecha_lectura.date():
+            return {}
+
+        bind = db.get_bind()
+        firmas = latest_user_counter_cache.get(bind, printer_id, ultima_lectura)
+        if firmas is not None:
+            return firmas
+
+        inicio_dia = datetime.combine(fecha_lectura.date(), time.min)
+        rows = db.execute(
+            select(ContadorUsuario.user_id, ContadorUsuario.tipo_contador,
+                   *(getattr(ContadorUsuario, field) for field in USER_COUNTER_INT_FIELDS + USER_COUNTER_ECO_FIELDS))
+            .where(ContadorUsuario.printer_id == printer_id, ContadorUsuario.fecha_lectura >= inicio_dia)
+            .order_by(ContadorUsuario.fecha_lectura, ContadorUsuario.id)
+        ).all()
+        # En orden cronológico: la última fila de cada usuario queda en el dict
+        return {row.user_id: user_counter_signature(row) for row in rows}
+
+    @staticmethod
+    def read_user_counters(db: Session, printer_id: int, mode: Optional[str] = None) -> UserCounterReading:
         """
         Lee y guarda contadores por usuario de una impresora
         Detecta automáticamente si usar getUserCounter o getEcoCounter
         También detecta y actualiza las capacidades de la impresora
         NUEVO: Sincroniza automáticamente usuarios detectados con tabla users
         
+        Modo incremental (COUNTER_INGESTION_MODE, por defecto): solo se
+        insertan los usuarios cuyos contadores cambiaron desde su última fila
+        guardada hoy (o que aún no tienen fila hoy); el resto se omite. Cada
+        lectura deja un registro en LecturaContadorUsuario con las filas
+        escritas y omitidas. Modo full: una fila por usuario en cada lectura
+        
         Args:
             db: Sesión de base de datos
             printer_id: ID de la impresora
+            mode: 'incremental' o 'full' (opcional, por defecto el configurado)
             
         Returns:
-            Lista de ContadorUsuario creados
+            UserCounterReading con los ContadorUsuario creados y el resumen de la ingesta
         """
-        # Obtener impresora
-        printer = db.query(Printer).filter(Printer.id == printer_id).first()
-        if not printer:
+        mode = mode or load_counter_ingestion_config_from_env().mode
+        if mode not in INGESTION_MODES:
+            raise ValueError(f"Modo de ingesta inválido: {mode}")
+        
+        # Obtener impresora junto con la fecha de su última lectura registrada
+        ultima_lectura_subq = select(func.max(LecturaContadorUsuario.fecha_lectura)).where(
+            LecturaContadorUsuario.printer_id == Printer.id
+        ).scalar_subquery()
+        row = db.query(Printer, ultima_lectura_subq).filter(Printer.id == printer_id).first()
+        if not row:
             raise ValueError(f"Impresora con ID {printer_id} no encontrada")
+        printer, ultima_lectura = row[0], _as_local(row[1])
         
         try:
-            # Importar servicio de sincronización
-            from services.user_sync_service import UserSyncService
-            
             contadores_creados = []
             users_data = []
+            fecha_lectura = datetime.now()
             
             # Determinar qué tipo de contador usar
             if printer.tiene_contador_usuario and not printer.usar_contador_ecologico:
                 # Usar contador por usuario estándar
-                from services.parsers import get_all_user_counters
-                users = get_all_user_counters(printer.ip_address)
+                from services.parsers import fetch_all_user_counters
+                users, fetch_stats = fetch_all_user_counters(
+                    printer.ip_address, page_size=printer.tamano_pagina_contadores
+                )
+                CounterService._require_complete(printer, fetch_stats)
+                CounterService._remember_page_size(printer, fetch_stats)
                 tipo_contador = "usuario"
                 
                 # Validar que retornó una lista
                 if not isinstance(users, list):
-                    raise ValueError(f"get_all_user_counters retornó tipo inválido: {type(users)}")
+                    raise ValueError(f"fetch_all_user_counters retornó tipo inválido: {type(users)}")
                 
                 users_data = users
                 
+                # Validar datos de los usuarios usando ValidationService
                 for user in users:
-                    # Validar datos del usuario usando ValidationService
                     ValidationService.validate_user_counter_data(user, tipo_contador)
-                    
-                    # ✓ NUEVO: Sincronizar usuario automáticamente
-                    user_id = UserSyncService.sync_user_from_counter(
-                        codigo_usuario=str(user['codigo_usuario']),
-                        nombre_usuario=user['nombre_usuario'],
-                        db=db,
-                        printer_id=printer_id
-                    )
-                    
+                
+                # ✓ Sincronizar todos los usuarios del lote de una vez
+                user_ids = UserSyncService.sync_users_from_counter_batch(
+                    db,
+                    [(str(user['codigo_usuario']), user['nombre_usuario']) for user in users],
+                    printer_id=printer_id
+                )
+                
+                for user in users:
                     contador = ContadorUsuario(
                         printer_id=printer_id,
-                        user_id=user_id,  # ← FK normalizada
+                        user_id=user_ids[format_user_code(str(user['codigo_usuario']))],  # ← FK normalizada
                         
                         # Totales
                         total_paginas=user['total_paginas'],
@@ -195,41 +377,43 @@ class CounterService:
                         revelado_color_ymc=user['revelado']['color_ymc'],
                         
                         tipo_contador=tipo_contador,
-                        fecha_lectura=datetime.now()
+                        fecha_lectura=fecha_lectura
                     )
-                    
-                    db.add(contador)
                     contadores_creados.append(contador)
                     
             elif printer.usar_contador_ecologico:
                 # Usar contador ecológico
-                data = get_all_eco_users(printer.ip_address)
+                data, fetch_stats = fetch_all_eco_users(
+                    printer.ip_address, page_size=printer.tamano_pagina_contadores
+                )
+                CounterService._require_complete(printer, fetch_stats)
+                CounterService._remember_page_size(printer, fetch_stats)
                 tipo_contador = "ecologico"
                 
                 # Validar estructura de datos
                 if not isinstance(data, dict) or 'users' not in data:
-                    raise ValueError("get_all_eco_users retornó estructura inválida")
+                    raise ValueError("fetch_all_eco_users retornó estructura inválida")
                 
                 users = data['users']
                 
                 if not isinstance(users, list):
                     raise ValueError(f"users no es una lista: {type(users)}")
                 
+                # Validar datos de los usuarios usando ValidationService
                 for user in users:
-                    # Validar datos del usuario usando ValidationService
                     ValidationService.validate_user_counter_data(user, tipo_contador)
-                    
-                    # ✓ NUEVO: Sincronizar usuario automáticamente
-                    user_id = UserSyncService.sync_user_from_counter(
-                        codigo_usuario=str(user['codigo_usuario']),
-                        nombre_usuario=user['nombre_usuario'],
-                        db=db,
-                        printer_id=printer_id
-                    )
-                    
+                
+                # ✓ Sincronizar todos los usuarios del lote de una vez
+                user_ids = UserSyncService.sync_users_from_counter_batch(
+                    db,
+                    [(str(user['codigo_usuario']), user['nombre_usuario']) for user in users],
+                    printer_id=printer_id
+                )
+                
+                for user in users:
                     contador = ContadorUsuario(
                         printer_id=printer_id,
-                        user_id=user_id,  # ← FK normalizada
+                        user_id=user_ids[format_user_code(str(user['codigo_usuario']))],  # ← FK normalizada
                         
                         # Totales (solo tenemos total_paginas_actual)
                         total_paginas=user['total_paginas_actual'],
@@ -242,21 +426,47 @@ class CounterService:
                         eco_reduccion_papel=user['reduccion_papel_actual'],
                         
                         tipo_contador=tipo_contador,
-                        fecha_lectura=datetime.now()
+                        fecha_lectura=fecha_lectura
                     )
-                    
-                    db.add(contador)
                     contadores_creados.append(contador)
             else:
                 raise ValueError(f"Impresora {printer_id} no tiene contador por usuario configurado")
             
-            db.commit()
+            firmas = {}
+            if mode == 'incremental':
+                firmas = CounterService._stored_signatures(db, printer_id, ultima_lectura, fecha_lectura)
             
-            # Refresh todos los contadores
+            # Solo las lecturas que difieren de la última fila guardada del usuario
+            nuevas_firmas = dict(firmas)
+            lectura = UserCounterReading(usuarios_leidos=len(contadores_creados), modo=mode)
             for contador in contadores_creados:
-                db.refresh(contador)
+                firma = user_counter_signature(contador)
+                if mode == 'full' or firmas.get(contador.user_id) != firma:
+                    lectura.append(contador)
+                    nuevas_firmas[contador.user_id] = firma
+            
+            # INSERT en bloque; sin refresh por fila (los atributos se recargan solo si se usan)
+            hostname = printer.hostname  # Antes del commit, que expira la impresora
+            db.add_all(lectura)
+            db.add(LecturaContadorUsuario(
+                printer_id=printer_id,
+                fecha_lectura=fecha_lectura,
+                tipo_contador=tipo_contador,
+                modo=mode,
+                usuarios_leidos=lectura.usuarios_leidos,
+                filas_escritas=lectura.filas_escritas,
+                filas_omitidas=lectura.filas_omitidas
+            ))
+            db.commit()
             
-            return contadores_creados
+            # La caché solo se actualiza con lo que ya está confirmado en la BD
+            latest_user_counter_cache.set(db.get_bind(), printer_id, fecha_lectura, nuevas_firmas)
+            logger.info(
+                f"💾 {hostname}: {lectura.usuarios_leidos} usuarios leídos, "
+                f"{lectura.filas_escritas} filas escritas, {lectura.filas_omitidas} omitidas ({mode})"
+            )
+            
+            return lectura
             
         except Exception as e:
             db.rollback()
@@ -386,52 +596,33 @@ class CounterService:
         }
     
     @staticmethod
-    def read_all_printers(db: Session) -> Dict[int, Dict]:
+    def read_all_printers(db: Session, max_workers: Optional[int] = None) -> Dict[int, Dict]:
         """
-        Lee contadores de todas las impresoras activas
+        Lee contadores de todas las impresoras activas en paralelo
+        
+        La lectura se delega a FleetReadService: cada impresora se lee en un
+        worker con su propia sesión, con tiempo límite por impresora.
         
         Args:
-            db: Sesión de base de datos
+            db: Sesión de base de datos (solo para listar impresoras)
+            max_workers: Límite de lecturas concurrentes (opcional)
             
         Returns:
             Dict con resultados por impresora
         """
+        from services.fleet_read_service import FleetReadService, load_fleet_read_config_from_env
+        
         # Obtener todas las impresoras
         printers = db.query(Printer).all()
         
-        results = {}
+        config = load_fleet_read_config_from_env()
+        if max_workers:
+            config.max_workers = max_workers
         
-        for printer in printers:
-            result = {
-                'printer_id': printer.id,
-                'hostname': printer.hostname,
-                'ip_address': printer.ip_address,
-                'success': False,
-                'contador_total': None,
-                'contadores_usuarios': [],
-                'error': None
-            }
-            
-            try:
-                # Leer contador total
-                contador_total = CounterService.read_printer_counters(db, printer.id)
-                result['contador_total'] = contador_total
-                result['success'] = True
-                
-                # Leer contadores por usuario (si está configurado)
-                if printer.tiene_contador_usuario or printer.usar_contador_ecologico:
-                    try:
-                        contadores_usuarios = CounterService.read_user_counters(db, printer.id)
-                        result['contadores_usuarios'] = contadores_usuarios
-                    except Exception as e:
-                        result['error'] = f"Error al leer usuarios: {e}"
-                        
-            except Exception as e:
-                result['error'] = str(e)
-            
-            results[printer.id] = result
+        fleet = FleetReadService(config=config)
+        summary = fleet.read_all(FleetReadService.build_targets(printers))
         
-        return results
+        return {result['printer_id']: result for result in summary['results']}
     
     @staticmethod
     def get_latest_counter(db: Session, printer_id: int) -> Optional[ContadorImpresora]:
@@ -458,24 +649,36 @@ class CounterService:
             db: Sesión de base de datos
             printer_id: ID de la impresora
             
+        Con la ingesta incremental una lectura solo guarda los usuarios que
+        cambiaron, así que se toma la última fila de cada usuario dentro del
+        día de la lectura más reciente (la primera lectura del día siempre
+        guarda a todos los usuarios)
+        
         Returns:
             Lista de ContadorUsuario más recientes
         """
-        # Obtener el created_at de la última lectura
-        # Usamos created_at en lugar de fecha_lectura porque todos los registros
-        # de una misma sesión de lectura tienen el mismo created_at
-        latest = db.query(ContadorUsuario.created_at).filter(
+        latest = db.query(ContadorUsuario.fecha_lectura).filter(
             ContadorUsuario.printer_id == printer_id
-        ).order_by(ContadorUsuario.created_at.desc()).first()
+        ).order_by(ContadorUsuario.fecha_lectura.desc()).first()
         
         if not latest:
             return []
         
-        # Obtener todos los contadores de esa sesión de lectura
-        return db.query(ContadorUsuario).filter(
+        inicio_dia = datetime.combine(_as_local(latest[0]).date(), time.min)
+        ranked = select(
+            ContadorUsuario.id,
+            func.row_number().over(
+                partition_by=ContadorUsuario.user_id,
+                order_by=(ContadorUsuario.fecha_lectura.desc(), ContadorUsuario.id.desc())
+            ).label('rn')
+        ).where(
             ContadorUsuario.printer_id == printer_id,
-            ContadorUsuario.created_at == latest[0]
-        ).all()
+            ContadorUsuario.fecha_lectura >= inicio_dia
+        ).subquery()
+        
+        return db.query(ContadorUsuario).join(ranked, ranked.c.id == ContadorUsuario.id).filter(
+            ranked.c.rn == 1
+        ).order_by(ContadorUsuario.user_id).all()
     
     @staticmethod
     def get_monthly_closes(db: Session, printer_id: int, year: Optional[int] = None) -> List[CierreMensual]:
@@ -510,7 +713,7 @@ def read_printer_counters(printer_id: int) -> Optional[ContadorImpresora]:
         db.close()
 
 
-def read_user_counters(printer_id: int) -> List[ContadorUsuario]:
+def read_user_counters(printer_id: int) -> UserCounterReading:
     """Función de conveniencia para leer contadores de usuarios"""
     db = next(get_db())
     try:
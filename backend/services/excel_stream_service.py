@@ -0,0 +1,173 @@
+"""
+Excel Stream Service
+Motor de exportación Excel en modo write-only de openpyxl
+
+- Los estilos se registran una sola vez por libro como NamedStyle y cada
+  celda solo referencia el nombre (sin objetos Font/Fill por celda)
+- Las filas se escriben en streaming a disco (write-only), sin mantener la
+  hoja completa en memoria
+- El libro se genera en un hilo de trabajo para no bloquear el event loop y
+  se envía al cliente por bloques desde un archivo temporal
+"""
+import asyncio
+import os
+import logging
+import tempfile
+from copy import copy
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple, Union
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle
+
+logger = logging.getLogger(__name__)
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+@dataclass
+class ExcelStreamConfig:
+    """Configuración del envío de archivos Excel"""
+    chunk_size: int = 64 * 1024  # Bytes por bloque enviado al cliente
+    spool_max_size: int = 8 * 1024 * 1024  # Bytes en memoria antes de pasar el archivo a disco
+
+
+def load_excel_stream_config_from_env() -> ExcelStreamConfig:
+    """Carga la configuración de exportación Excel desde variables de entorno"""
+    try:
+        config = ExcelStreamConfig(
+            chunk_size=int(os.getenv('EXPORT_STREAM_CHUNK_SIZE', str(64 * 1024))),
+            spool_max_size=int(os.getenv('EXPORT_SPOOL_MAX_SIZE', str(8 * 1024 * 1024)))
+        )
+
+        if config.chunk_size < 1024:
+            logger.warning(f"Invalid EXPORT_STREAM_CHUNK_SIZE ({config.chunk_size}), using default 65536")
+            config.chunk_size = 64 * 1024
+
+        if config.spool_max_size < 0:
+            logger.warning(f"Invalid EXPORT_SPOOL_MAX_SIZE ({config.spool_max_size}), using default 8388608")
+            config.spool_max_size = 8 * 1024 * 1024
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading Excel export configuration from environment: {e}, using defaults")
+        return ExcelStreamConfig()
+
+
+excel_stream_config = load_excel_stream_config_from_env()
+
+
+def new_write_only_workbook(named_styles: Iterable[NamedStyle] = ()) -> Workbook:
+    """Crea un libro write-only con los estilos nombrados ya registrados"""
+    wb = Workbook(write_only=True)
+    for style in named_styles:
+        wb.add_named_style(style)
+    return wb
+
+
+class StyledSheet:
+    """
+    Hoja write-only que escribe filas con estilos nombrados
+
+    Cada estilo se resuelve una sola vez por hoja; las celdas siguientes
+    copian el índice de estilo ya resuelto en lugar de buscarlo por nombre
+    """
+
+    def __init__(self, wb: Workbook, title: str, column_widths: Optional[Dict[str, float]] = None):
+        self.ws = wb.create_sheet(title=title)
+        # En write-only los anchos deben definirse antes de la primera fila
+        for column, width in (column_widths or {}).items():
+            self.ws.column_dimensions[column].width = width
+        self._styles: Dict[str, object] = {}
+
+    def _cell(self, value, name: str) -> WriteOnlyCell:
+        cell = WriteOnlyCell(self.ws, value=value)
+        style = self._styles.get(name)
+        if style is None:
+            cell.style = name
+            self._styles[name] = copy(cell._style)
+        else:
+            cell._style = copy(style)
+        return cell
+
+    def append(
+        self,
+        values: Sequence,
+        style: Union[None, str, Callable[[int, object], Optional[str]]] = None
+    ) -> None:
+        """
+        Escribe una fila
+
+        Args:
+            values: Valores de la fila
+            style: Nombre del estilo para todas las celdas, o función
+                (índice de columna, valor) -> nombre de estilo o None
+        """
+        if style is None:
+            self.ws.append(list(values))
+            return
+
+        row = []
+        for index, value in enumerate(values):
+            name = style(index, value) if callable(style) else style
+            row.append(value if name is None else self._cell(value, name))
+        self.ws.append(row)
+
+
+def render_workbook(build: Callable[[], Workbook], spool_max_size: int) -> Tuple[tempfile.SpooledTemporaryFile, int]:
+    """
+    Construye el libro y lo guarda en un archivo temporal (memoria o disco)
+
+    Returns:
+        Tupla (archivo posicionado al inicio, tamaño en bytes)
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_max_size, suffix=".xlsx")
+    try:
+        build().save(spool)
+        size = spool.tell()
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return spool, size
+
+
+async def iter_spool_chunks(spool, chunk_size: int):
+    """Lee el archivo generado por bloques y lo cierra al terminar"""
+    try:
+        while True:
+            chunk = await asyncio.to_thread(spool.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
+
+async def xlsx_streaming_response(
+    build: Callable[[], Workbook],
+    filename: str,
+    config: Optional[ExcelStreamConfig] = None
+) -> StreamingResponse:
+    """
+    Genera el libro en un hilo de trabajo y lo envía por bloques
+
+    `build` no debe usar la sesión de base de datos del request: los datos
+    se consultan antes y se le pasan ya cargados.
+    Los errores de generación se lanzan aquí, antes de enviar cabeceras.
+    """
+    config = config or excel_stream_config
+    spool, size = await asyncio.to_thread(render_workbook, build, config.spool_max_size)
+    logger.debug(f"📊 Excel '{filename}' generado ({size} bytes)")
+
+    return StreamingResponse(
+        iter_spool_chunks(spool, config.chunk_size),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(size)
+        }
+    )
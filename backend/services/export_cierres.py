@@ -0,0 +1,147 @@
+"""
+Servicio para exportar cierres y comparaciones a Excel (formato simple)
+Formato: Usuario, Nombre, B/N, COLOR, TOTAL IMPRESIONES
+
+Los libros se construyen en modo write-only a partir de filas ya
+consultadas (ver obtener_usuarios_cierres), por lo que pueden generarse en
+un hilo de trabajo sin usar la sesión de base de datos
+"""
+from typing import Dict, Iterable, List, Tuple
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill, NamedStyle
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db.models import CierreMensualUsuario, User
+from services.excel_stream_service import StyledSheet, new_write_only_workbook
+
+ANCHOS_COLUMNAS = {'A': 12, 'B': 30, 'C': 12, 'D': 12, 'E': 18}
+ENCABEZADOS = ['Usuario', 'Nombre', 'B/N', 'COLOR', 'TOTAL IMPRESIONES']
+
+
+def obtener_usuarios_cierres(db: Session, cierre_ids: Iterable[int]) -> Dict[int, List]:
+    """
+    Obtiene los usuarios de uno o varios cierres con código y nombre del
+    usuario en una sola consulta (LEFT JOIN con users)
+
+    Returns:
+        Diccionario cierre_id -> lista de filas con las columnas de
+        CierreMensualUsuario más codigo_usuario y nombre_usuario
+    """
+    ids = list(dict.fromkeys(cierre_ids))
+    resultado: Dict[int, List] = {cierre_id: [] for cierre_id in ids}
+    if not ids:
+        return resultado
+
+    tabla = CierreMensualUsuario.__table__
+    stmt = select(
+        tabla,
+        User.codigo_de_usuario.label('codigo_usuario'),
+        User.name.label('nombre_usuario')
+    ).outerjoin(User, User.id == tabla.c.user_id).where(tabla.c.cierre_mensual_id.in_(ids))
+
+    for fila in db.execute(stmt):
+        resultado[fila.cierre_mensual_id].append(fila)
+    return resultado
+
+
+def codigo_y_nombre(fila) -> Tuple[str, str]:
+    """Código y nombre del usuario de una fila, con los mismos valores por defecto de siempre"""
+    codigo = fila.codigo_usuario if fila.codigo_usuario is not None else str(fila.user_id)
+    nombre = fila.nombre_usuario if fila.nombre_usuario is not None else f"Usuario {fila.user_id}"
+    return codigo, nombre
+
+
+def _estilos() -> List[NamedStyle]:
+    """Estilos nombrados del formato simple (nuevos por libro)"""
+    return [
+        NamedStyle(
+            name="encabezado",
+            font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center")
+        ),
+        NamedStyle(name="total", font=Font(bold=True)),
+        NamedStyle(name="total_usuarios", font=Font(bold=True, color="0000FF")),
+    ]
+
+
+def _nueva_hoja(wb: Workbook, titulo: str) -> StyledSheet:
+    hoja = StyledSheet(wb, titulo, ANCHOS_COLUMNAS)
+    hoja.append(ENCABEZADOS, "encabezado")
+    return hoja
+
+
+def _fila_usuario(codigo: str, nombre: str, bn: int, color: int, total: int) -> list:
+    return [f'[{codigo}]', f'[{nombre}]', bn, color, total]
+
+
+def construir_excel_cierre(usuarios: List, total_contador: int) -> Workbook:
+    """
+    Libro de un cierre individual con el total acumulado de cada usuario
+
+    Args:
+        usuarios: Filas de obtener_usuarios_cierres
+        total_contador: Total del contador de la impresora al cierre
+    """
+    wb = new_write_only_workbook(_estilos())
+    ws = _nueva_hoja(wb, "Cierre")
+
+    suma_total = 0
+    # Usuarios ordenados por total de páginas descendente
+    for usuario in sorted(usuarios, key=lambda u: u.total_paginas, reverse=True):
+        ws.append(_fila_usuario(*codigo_y_nombre(usuario), usuario.total_bn, usuario.total_color, usuario.total_paginas))
+        suma_total += usuario.total_paginas
+
+    # Fila con el total del contador de la impresora
+    ws.append([None] * 7 + [total_contador], lambda col, _: "total" if col == 7 else None)
+
+    # Fila final con suma de usuarios
+    ws.append(
+        [None] * 4 + [suma_total, None, None, suma_total],
+        lambda col, _: "total_usuarios" if col in (4, 7) else None
+    )
+    return wb
+
+
+def construir_excel_comparacion(usuarios1: List, usuarios2: List) -> Workbook:
+    """
+    Libro con la diferencia por usuario entre dos cierres (incluye usuarios
+    con diferencia 0 o negativa), ordenado por diferencia total descendente
+
+    Args:
+        usuarios1: Filas del cierre base
+        usuarios2: Filas del cierre comparado
+    """
+    por_usuario1 = {u.user_id: u for u in usuarios1}
+    por_usuario2 = {u.user_id: u for u in usuarios2}
+
+    diferencias = []
+    for user_id in sorted(set(por_usuario1) | set(por_usuario2)):
+        u1 = por_usuario1.get(user_id)
+        u2 = por_usuario2.get(user_id)
+        codigo, nombre = codigo_y_nombre(u2 or u1)
+        diferencias.append((
+            codigo,
+            nombre,
+            (u2.total_bn if u2 else 0) - (u1.total_bn if u1 else 0),
+            (u2.total_color if u2 else 0) - (u1.total_color if u1 else 0),
+            (u2.total_paginas if u2 else 0) - (u1.total_paginas if u1 else 0),
+        ))
+    diferencias.sort(key=lambda d: d[4], reverse=True)
+
+    wb = new_write_only_workbook(_estilos())
+    ws = _nueva_hoja(wb, "Comparación")
+
+    for diferencia in diferencias:
+        ws.append(_fila_usuario(*diferencia))
+
+    # Fila de totales (tras una fila vacía)
+    ws.append([])
+    ws.append(
+        ["TOTALES", None,
+         sum(d[2] for d in diferencias), sum(d[3] for d in diferencias), sum(d[4] for d in diferencias)],
+        lambda col, _: "total_usuarios" if col == 4 else ("total" if col != 1 else None)
+    )
+    return wb
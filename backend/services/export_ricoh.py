@@ -3,11 +3,18 @@ Servicio para exportar cierres en formato Excel de Ricoh (52 columnas)
 Compatible con archivos originales de comparación
 """
 
+from typing import Dict, List, Optional, Tuple
+
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.styles import Font, Alignment, PatternFill, NamedStyle
 from openpyxl.utils import get_column_letter
 from sqlalchemy.orm import Session
 from db.models import CierreMensual, CierreMensualUsuario
+from services.excel_stream_service import StyledSheet, new_write_only_workbook
+from services.export_cierres import codigo_y_nombre
+
+MESES = ['', 'ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO',
+         'JULIO', 'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE']
 
 # Definición de columnas en orden exacto (52 columnas)
 COLUMNAS_PERIODO = [
@@ -65,6 +72,10 @@ COLUMNAS_PERIODO = [
     'Color (YMC)(Revelado)',
 ]
 
+# Anchos de columna de las hojas de período y comparativa
+ANCHOS_PERIODO = {'A': 12, 'B': 35, **{get_column_letter(col): 15 for col in range(3, len(COLUMNAS_PERIODO) + 1)}}
+ANCHOS_COMPARATIVO = {'A': 12, 'B': 35, 'C': 18, 'D': 18, 'E': 18, 'F': 18, 'G': 18}
+
 
 def formatear_codigo(codigo: str) -> str:
     """Formatea el código con corchetes"""
@@ -76,15 +87,28 @@ def formatear_nombre(nombre: str) -> str:
     return f"[{nombre}]"
 
 
-def crear_fila_usuario(usuario: CierreMensualUsuario, db: Session = None) -> list:
-    """Crea una fila de datos para un usuario (52 columnas)"""
+def crear_fila_usuario(usuario: CierreMensualUsuario, db: Session = None, user_map: Optional[Dict] = None) -> list:
+    """
+    Crea una fila de datos para un usuario (52 columnas)
+    
+    user_map (user_id -> User, ver UserRepository.get_map_by_ids) evita una
+    consulta por fila; sin él se consulta el usuario con `db`
+    """
     # Obtener datos del usuario desde la tabla users
-    from db.models import User
-    user = db.query(User).filter(User.id == usuario.user_id).first() if db and usuario.user_id else None
+    if user_map is not None:
+        user = user_map.get(usuario.user_id)
+    else:
+        from db.models import User
+        user = db.query(User).filter(User.id == usuario.user_id).first() if db and usuario.user_id else None
     
     codigo = user.codigo_de_usuario if user else str(usuario.user_id)
     nombre = user.name if user else f"Usuario {usuario.user_id}"
     
+    return crear_fila_periodo(usuario, codigo, nombre)
+
+
+def crear_fila_periodo(usuario, codigo: str, nombre: str) -> list:
+    """Crea la fila de 52 columnas de un usuario ya resuelto (modelo o fila consultada)"""
     fila = [
         formatear_codigo(codigo),
         formatear_nombre(nombre),
@@ -225,6 +249,116 @@ def ajustar_anchos_columnas(ws):
         ws.column_dimensions[get_column_letter(col)].width = 15
 
 
+def calcular_comparativo(
+    usuarios1: list,
+    usuarios2: list,
+    nombres: Dict[int, Tuple[str, str]],
+    has_color: bool,
+    total_cierre1: int,
+    total_cierre2: int
+) -> Tuple[list, List[list], list, list]:
+    """
+    Calcula el contenido de la hoja comparativa (solo diferencias/consumo)
+    adaptado a las capacidades de la impresora
+    
+    Args:
+        usuarios1: Usuarios del primer cierre (período base)
+        usuarios2: Usuarios del segundo cierre (período comparado)
+        nombres: user_id -> (código, nombre) del usuario
+        has_color: Si la impresora tiene color
+        total_cierre1: Contador total de la impresora en el primer cierre
+        total_cierre2: Contador total de la impresora en el segundo cierre
+    
+    Returns:
+        Tupla (encabezados, filas de usuarios, fila con totales de cada período, fila de totales)
+    """
+    # Encabezados adaptativos según capacidades de la impresora
+    if has_color:
+        # Impresora con color: mostrar B/N, Color y Total
+        headers = ['Usuario', 'Nombre', 'B/N', 'COLOR', 'TOTAL IMPRESIONES', '', '']
+    else:
+        # Impresora solo B/N: mostrar solo B/N (que es el total)
+        headers = ['Usuario', 'Nombre', 'TOTAL IMPRESIONES', '', '', '', '']
+    
+    # Crear diccionario de usuarios de ambos períodos por user_id
+    usuarios1_dict = {u.user_id: u for u in usuarios1}
+    usuarios2_dict = {u.user_id: u for u in usuarios2}
+    
+    # Obtener todos los user_ids únicos y ordenarlos
+    todos_user_ids = sorted(set(usuarios1_dict.keys()) | set(usuarios2_dict.keys()))
+    
+    # Variables para sumar el consumo total de usuarios
+    suma_consumo_bn = 0
+    suma_consumo_color = 0
+    suma_consumo_total = 0
+    
+    # Filas de usuarios con DIFERENCIAS (consumo)
+    filas = []
+    for user_id in todos_user_ids:
+        usuario1 = usuarios1_dict.get(user_id)
+        usuario2 = usuarios2_dict.get(user_id)
+        
+        codigo, nombre = nombres.get(user_id) or (str(user_id), f"Usuario {user_id}")
+        
+        # Calcular diferencias (consumo del período)
+        total1 = usuario1.total_paginas if usuario1 else 0
+        total2 = usuario2.total_paginas if usuario2 else 0
+        consumo_total = total2 - total1
+        
+        bn1 = usuario1.total_bn if usuario1 else 0
+        bn2 = usuario2.total_bn if usuario2 else 0
+        consumo_bn = bn2 - bn1
+        
+        color1 = usuario1.total_color if usuario1 else 0
+        color2 = usuario2.total_color if usuario2 else 0
+        consumo_color = color2 - color1
+        
+        # Fila según capacidades
+        if has_color:
+            filas.append([
+                formatear_codigo(codigo),
+                formatear_nombre(nombre),
+                consumo_bn,
+                consumo_color,
+                consumo_total,
+                '',
+                ''
+            ])
+            suma_consumo_bn += consumo_bn
+            suma_consumo_color += consumo_color
+        else:
+            # Solo B/N (que es el total)
+            filas.append([
+                formatear_codigo(codigo),
+                formatear_nombre(nombre),
+                consumo_total,
+                '',
+                '',
+                '',
+                ''
+            ])
+        
+        suma_consumo_total += consumo_total
+    
+    # Diferencia del contador total de la impresora
+    diferencia_contador_total = total_cierre2 - total_cierre1
+    
+    # Fila con totales de cada período
+    fila_periodos = ['', '', '', '', '', total_cierre1, total_cierre2]
+    
+    # Fila con diferencias y validación
+    diferencia_paginas_prueba = diferencia_contador_total - suma_consumo_total
+    
+    if has_color:
+        # Con color: mostrar B/N, Color, Total, Diferencia contador, Páginas prueba
+        fila_totales = ['', '', suma_consumo_bn, suma_consumo_color, suma_consumo_total, diferencia_contador_total, diferencia_paginas_prueba]
+    else:
+        # Solo B/N: mostrar Total, Diferencia contador, Páginas prueba
+        fila_totales = ['', '', suma_consumo_total, diferencia_contador_total, diferencia_paginas_prueba, '', '']
+    
+    return headers, filas, fila_periodos, fila_totales
+
+
 def exportar_comparacion_ricoh(
     db: Session,
     serial_number: str,
@@ -236,6 +370,9 @@ def exportar_comparacion_ricoh(
     3 hojas: Período 1 (completo), Período 2 (completo), Comparativo (solo diferencias)
     La hoja comparativa se adapta a las capacidades de la impresora
     
+    Genera el libro completo en memoria (permite leerlo después); la API
+    usa construir_comparacion_ricoh, que escribe en modo streaming
+    
     Args:
         db: Sesión de base de datos
         serial_number: Serial de la impresora
@@ -245,19 +382,20 @@ def exportar_comparacion_ricoh(
     Returns:
         Workbook de openpyxl con 3 hojas
     """
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
     from db.models import Printer
     
     # Obtener capacidades de la impresora
     printer = db.query(Printer).filter(Printer.id == cierre1.printer_id).first()
     has_color = printer.has_color if printer else False
     
-    # Nombres de meses
-    meses = ['', 'ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO',
-             'JULIO', 'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE']
+    mes1_nombre = MESES[cierre1.mes]
+    mes2_nombre = MESES[cierre2.mes]
     
-    mes1_nombre = meses[cierre1.mes]
-    mes2_nombre = meses[cierre2.mes]
+    # Datos de los usuarios de ambos cierres en una sola consulta
+    from db.repository import UserRepository
+    user_map = UserRepository.get_map_by_ids(
+        db, [u.user_id for u in cierre1.usuarios] + [u.user_id for u in cierre2.usuarios]
+    )
     
     # Crear workbook
     wb = Workbook()
@@ -273,7 +411,7 @@ def exportar_comparacion_ricoh(
     # Usuarios ordenados por user_id
     usuarios1 = sorted(cierre1.usuarios, key=lambda u: u.user_id)
     for usuario in usuarios1:
-        fila = crear_fila_usuario(usuario, db)
+        fila = crear_fila_usuario(usuario, db, user_map)
         ws1.append(fila)
     
     # Fila de totales
@@ -293,7 +431,7 @@ def exportar_comparacion_ricoh(
     # Usuarios ordenados por user_id
     usuarios2 = sorted(cierre2.usuarios, key=lambda u: u.user_id)
     for usuario in usuarios2:
-        fila = crear_fila_usuario(usuario, db)
+        fila = crear_fila_usuario(usuario, db, user_map)
         ws2.append(fila)
     
     # Fila de totales
@@ -306,23 +444,14 @@ def exportar_comparacion_ricoh(
     # ========== HOJA 3: Comparativo (solo diferencias/consumo) ==========
     ws3 = wb.create_sheet(title=f"{serial_number} COMPARATIVO")
     
-    # Encabezados adaptativos según capacidades de la impresora
-    if has_color:
-        # Impresora con color: mostrar B/N, Color y Total
-        headers = ['Usuario', 'Nombre', 'B/N', 'COLOR', 'TOTAL IMPRESIONES', '', '']
-        col_bn = 2  # Columna C (índice 2)
-        col_color = 3  # Columna D (índice 3)
-        col_total = 4  # Columna E (índice 4)
-        col_periodo1 = 5  # Columna F (índice 5)
-        col_periodo2 = 6  # Columna G (índice 6)
-    else:
-        # Impresora solo B/N: mostrar solo B/N (que es el total)
-        headers = ['Usuario', 'Nombre', 'TOTAL IMPRESIONES', '', '', '', '']
-        col_bn = 2  # Columna C (índice 2)
-        col_color = None
-        col_total = 2  # Columna C (índice 2) - mismo que B/N
-        col_periodo1 = 5  # Columna F (índice 5)
-        col_periodo2 = 6  # Columna G (índice 6)
+    headers, filas, fila_periodos, fila_totales = calcular_comparativo(
+        usuarios1,
+        usuarios2,
+        {user_id: (user.codigo_de_usuario, user.name) for user_id, user in user_map.items()},
+        has_color,
+        cierre1.total_paginas,
+        cierre2.total_paginas
+    )
     
     ws3.append(headers)
     
@@ -337,91 +466,13 @@ def exportar_comparacion_ricoh(
         cell.font = header_font
         cell.alignment = Alignment(horizontal='center', vertical='center')
     
-    # Crear diccionario de usuarios de ambos períodos por user_id
-    usuarios1_dict = {u.user_id: u for u in cierre1.usuarios}
-    usuarios2_dict = {u.user_id: u for u in cierre2.usuarios}
-    
-    # Obtener todos los user_ids únicos y ordenarlos
-    todos_user_ids = sorted(set(usuarios1_dict.keys()) | set(usuarios2_dict.keys()))
-    
-    # Variables para sumar el consumo total de usuarios
-    suma_consumo_bn = 0
-    suma_consumo_color = 0
-    suma_consumo_total = 0
-    
-    # Agregar filas de usuarios con DIFERENCIAS (consumo)
-    for user_id in todos_user_ids:
-        usuario1 = usuarios1_dict.get(user_id)
-        usuario2 = usuarios2_dict.get(user_id)
-        
-        # Obtener datos del usuario desde la tabla users
-        from db.models import User
-        user = db.query(User).filter(User.id == user_id).first()
-        codigo = user.codigo_de_usuario if user else str(user_id)
-        nombre = user.name if user else f"Usuario {user_id}"
-        
-        # Calcular diferencias (consumo del período)
-        total1 = usuario1.total_paginas if usuario1 else 0
-        total2 = usuario2.total_paginas if usuario2 else 0
-        consumo_total = total2 - total1
-        
-        bn1 = usuario1.total_bn if usuario1 else 0
-        bn2 = usuario2.total_bn if usuario2 else 0
-        consumo_bn = bn2 - bn1
-        
-        color1 = usuario1.total_color if usuario1 else 0
-        color2 = usuario2.total_color if usuario2 else 0
-        consumo_color = color2 - color1
-        
-        # Agregar fila según capacidades
-        if has_color:
-            ws3.append([
-                formatear_codigo(codigo),
-                formatear_nombre(nombre),
-                consumo_bn,
-                consumo_color,
-                consumo_total,
-                '',
-                ''
-            ])
-            suma_consumo_bn += consumo_bn
-            suma_consumo_color += consumo_color
-        else:
-            # Solo B/N (que es el total)
-            ws3.append([
-                formatear_codigo(codigo),
-                formatear_nombre(nombre),
-                consumo_total,
-                '',
-                '',
-                '',
-                ''
-            ])
-        
-        suma_consumo_total += consumo_total
-    
-    # Calcular diferencia del contador total de la impresora
-    total_cierre1 = cierre1.total_paginas
-    total_cierre2 = cierre2.total_paginas
-    diferencia_contador_total = total_cierre2 - total_cierre1
+    for fila in filas:
+        ws3.append(fila)
     
     # Fila vacía
     ws3.append(['', '', '', '', '', '', ''])
     
-    # Fila con totales de cada período
-    fila_periodos = ['', '', '', '', '', total_cierre1, total_cierre2]
     ws3.append(fila_periodos)
-    
-    # Fila con diferencias y validación
-    diferencia_paginas_prueba = diferencia_contador_total - suma_consumo_total
-    
-    if has_color:
-        # Con color: mostrar B/N, Color, Total, Diferencia contador, Páginas prueba
-        fila_totales = ['', '', suma_consumo_bn, suma_consumo_color, suma_consumo_total, diferencia_contador_total, diferencia_paginas_prueba]
-    else:
-        # Solo B/N: mostrar Total, Diferencia contador, Páginas prueba
-        fila_totales = ['', '', suma_consumo_total, diferencia_contador_total, diferencia_paginas_prueba, '', '']
-    
     ws3.append(fila_totales)
     
     # Aplicar formato a las filas de totales
@@ -435,13 +486,8 @@ def exportar_comparacion_ricoh(
         cell.fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
     
     # Ajustar anchos de columna
-    ws3.column_dimensions['A'].width = 12
-    ws3.column_dimensions['B'].width = 35
-    ws3.column_dimensions['C'].width = 18
-    ws3.column_dimensions['D'].width = 18
-    ws3.column_dimensions['E'].width = 18
-    ws3.column_dimensions['F'].width = 18
-    ws3.column_dimensions['G'].width = 18
+    for col, width in ANCHOS_COMPARATIVO.items():
+        ws3.column_dimensions[col].width = width
     
     # Aplicar formato de números con separador de miles
     # Empezar desde la fila 2 (después del encabezado en fila 1)
@@ -452,3 +498,116 @@ def exportar_comparacion_ricoh(
                 cell.alignment = Alignment(horizontal='right')
     
     return wb
+
+
+def _estilos_ricoh() -> List[NamedStyle]:
+    """Estilos nombrados del formato Ricoh, equivalentes al formato celda a celda"""
+    encabezado_comparativo = NamedStyle(
+        name="comparativo_encabezado",
+        font=Font(bold=True, color="FFFFFF", size=11),
+        fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+        alignment=Alignment(horizontal='center', vertical='center')
+    )
+    total_comparativo = NamedStyle(
+        name="comparativo_total",
+        font=Font(bold=True, size=11),
+        fill=PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
+    )
+    total_numero_comparativo = NamedStyle(
+        name="comparativo_total_numero",
+        font=Font(bold=True, size=11),
+        fill=PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid"),
+        alignment=Alignment(horizontal='right'),
+        number_format='#,##0'
+    )
+    return [
+        NamedStyle(
+            name="ricoh_encabezado",
+            font=Font(bold=True),
+            fill=PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)
+        ),
+        NamedStyle(name="ricoh_numero", alignment=Alignment(horizontal="right")),
+        NamedStyle(name="ricoh_total", font=Font(bold=True)),
+        NamedStyle(name="ricoh_total_numero", font=Font(bold=True), alignment=Alignment(horizontal="right")),
+        encabezado_comparativo,
+        NamedStyle(name="comparativo_numero", alignment=Alignment(horizontal='right'), number_format='#,##0'),
+        total_comparativo,
+        total_numero_comparativo,
+    ]
+
+
+def _es_numero(valor) -> bool:
+    return bool(valor) and isinstance(valor, (int, float))
+
+
+def _escribir_hoja_periodo(wb: Workbook, titulo: str, usuarios: list) -> None:
+    """Hoja de 52 columnas de un período (write-only), usuarios ordenados por user_id"""
+    hoja = StyledSheet(wb, titulo, ANCHOS_PERIODO)
+    hoja.append(COLUMNAS_PERIODO, "ricoh_encabezado")
+    
+    ordenados = sorted(usuarios, key=lambda u: u.user_id)
+    for usuario in ordenados:
+        fila = crear_fila_periodo(usuario, *codigo_y_nombre(usuario))
+        hoja.append(fila, lambda col, _: "ricoh_numero" if col >= 2 else None)
+    
+    hoja.append(crear_fila_totales(ordenados), lambda col, _: "ricoh_total_numero" if col >= 2 else "ricoh_total")
+
+
+def construir_comparacion_ricoh(
+    serial_number: str,
+    has_color: bool,
+    mes1: int,
+    mes2: int,
+    total_cierre1: int,
+    total_cierre2: int,
+    usuarios1: list,
+    usuarios2: list
+) -> Workbook:
+    """
+    Construye la comparación en formato Ricoh en modo write-only
+    Mismo contenido y formato que exportar_comparacion_ricoh, con estilos
+    nombrados y sin consultar la base de datos (puede correr en un hilo)
+    
+    Args:
+        serial_number: Serial de la impresora
+        has_color: Si la impresora tiene color
+        mes1, mes2: Mes de cada cierre (1-12)
+        total_cierre1, total_cierre2: Contador total de la impresora en cada cierre
+        usuarios1, usuarios2: Filas de obtener_usuarios_cierres de cada cierre
+    
+    Returns:
+        Workbook write-only con 3 hojas, listo para guardar
+    """
+    wb = new_write_only_workbook(_estilos_ricoh())
+    
+    # ========== HOJAS 1 y 2: Períodos (completos con 52 columnas) ==========
+    _escribir_hoja_periodo(wb, f"{serial_number} {MESES[mes1]}", usuarios1)
+    _escribir_hoja_periodo(wb, f"{serial_number} {MESES[mes2]}", usuarios2)
+    
+    # ========== HOJA 3: Comparativo (solo diferencias/consumo) ==========
+    ws3 = StyledSheet(wb, f"{serial_number} COMPARATIVO", ANCHOS_COMPARATIVO)
+    
+    nombres = {u.user_id: codigo_y_nombre(u) for u in list(usuarios1) + list(usuarios2)}
+    headers, filas, fila_periodos, fila_totales = calcular_comparativo(
+        usuarios1, usuarios2, nombres, has_color, total_cierre1, total_cierre2
+    )
+    
+    ws3.append(headers, "comparativo_encabezado")
+    
+    def estilo_numero(col, valor):
+        return "comparativo_numero" if col >= 2 and _es_numero(valor) else None
+    
+    def estilo_total(col, valor):
+        return "comparativo_total_numero" if col >= 2 and _es_numero(valor) else "comparativo_total"
+    
+    for fila in filas:
+        ws3.append(fila, estilo_numero)
+    
+    # Fila vacía
+    ws3.append(['', '', '', '', '', '', ''])
+    
+    ws3.append(fila_periodos, estilo_total)
+    ws3.append(fila_totales, estilo_total)
+    
+    return wb
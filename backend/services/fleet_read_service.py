@@ -0,0 +1,230 @@
+"""
+Fleet Read Service - Lectura concurrente de contadores de toda la flota
+Reparte la lectura de cada impresora en un pool acotado de workers, cada uno
+con su propia sesión de base de datos, aplicando un tiempo límite por impresora
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import logging
+import os
+import time
+
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from services.counter_service import CounterService
+from services.printer_scheduler import printer_scheduler, PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FleetReadConfig:
+    """Configuración de la lectura de flota"""
+    max_workers: int = 8  # Impresoras leídas en paralelo
+    printer_timeout: float = 120.0  # Segundos máximos por impresora
+
+
+def load_fleet_read_config_from_env() -> FleetReadConfig:
+    """Carga la configuración de lectura de flota desde variables de entorno"""
+    try:
+        config = FleetReadConfig(
+            max_workers=int(os.getenv('FLEET_READ_MAX_WORKERS', '8')),
+            printer_timeout=float(os.getenv('FLEET_READ_PRINTER_TIMEOUT', '120.0'))
+        )
+
+        if config.max_workers <= 0:
+            logger.warning(f"Invalid FLEET_READ_MAX_WORKERS ({config.max_workers}), using default 8")
+            config.max_workers = 8
+
+        if config.printer_timeout <= 0:
+            logger.warning(f"Invalid FLEET_READ_PRINTER_TIMEOUT ({config.printer_timeout}), using default 120.0")
+            config.printer_timeout = 120.0
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading fleet read configuration from environment: {e}, using defaults")
+        return FleetReadConfig()
+
+
+class FleetReadService:
+    """
+    Motor de lectura concurrente de contadores para varias impresoras
+
+    Cada impresora se lee en un worker del pool con su propia sesión de BD
+    (las sesiones de SQLAlchemy no son thread-safe). Los resultados se
+    entregan a medida que terminan, con el tiempo de lectura de cada equipo.
+    Una impresora que supera `printer_timeout` se reporta como fallida sin
+    bloquear al resto; su hilo termina en segundo plano y cierra su sesión.
+    """
+
+    def __init__(
+        self,
+        config: Optional[FleetReadConfig] = None,
+        session_factory: Callable[[], Session] = SessionLocal
+    ):
+        self.config = config or load_fleet_read_config_from_env()
+        self.session_factory = session_factory
+
+    @staticmethod
+    def build_targets(printers: List) -> List[Dict]:
+        """
+        Extrae de las impresoras ORM los datos que necesitan los workers,
+        para no compartir instancias de la sesión del request entre hilos
+        """
+        return [
+            {
+                'printer_id': p.id,
+                'hostname': p.hostname,
+                'ip_address': p.ip_address,
+                'read_users': bool(p.tiene_contador_usuario or p.usar_contador_ecologico)
+            }
+            for p in printers
+        ]
+
+    def _read_printer(self, target: Dict, started: Dict[int, float]) -> Dict:
+        """Lee contador total y contadores de usuarios de una impresora"""
+        printer_id = target['printer_id']
+        start = time.monotonic()
+        started[printer_id] = start
+
+        result = {
+            'printer_id': printer_id,
+            'hostname': target['hostname'],
+            'ip_address': target['ip_address'],
+            'success': False,
+            'contador_total': None,
+            'contadores_usuarios': [],
+            'error': None,
+            'timed_out': False,
+            'elapsed_seconds': 0.0
+        }
+
+        def read():
+            db = self.session_factory()
+            try:
+                contador_total = CounterService.read_printer_counters(db, printer_id)
+                contadores_usuarios = []
+                if target['read_users']:
+                    contadores_usuarios = CounterService.read_user_counters(db, printer_id)
+                return contador_total, contadores_usuarios
+            finally:
+                db.close()
+
+        try:
+            # En la cola de la impresora, detrás de las acciones interactivas; una
+            # lectura igual ya encolada (otra lectura de flota) se comparte
+            result['contador_total'], result['contadores_usuarios'] = printer_scheduler.submit(
+                target['ip_address'], read, priority=PRIORITY_BULK, key=('counters', target['read_users'])
+            ).result()
+            result['success'] = True
+        except Exception as e:
+            result['error'] = str(e)
+        finally:
+            result['elapsed_seconds'] = round(time.monotonic() - start, 3)
+
+        return result
+
+    def _timeout_result(self, target: Dict, elapsed: float) -> Dict:
+        return {
+            'printer_id': target['printer_id'],
+            'hostname': target['hostname'],
+            'ip_address': target['ip_address'],
+            'success': False,
+            'contador_total': None,
+            'contadores_usuarios': [],
+            'error': f"Tiempo límite de lectura excedido ({self.config.printer_timeout:.0f}s)",
+            'timed_out': True,
+            'elapsed_seconds': round(elapsed, 3)
+        }
+
+    def iter_read(self, targets: List[Dict]) -> Iterator[Dict]:
+        """
+        Lee las impresoras en paralelo y entrega cada resultado al terminar
+
+        Args:
+            targets: Lista generada por build_targets()
+
+        Yields:
+            Dict por impresora con success, error, timed_out y elapsed_seconds
+        """
+        if not targets:
+            return
+
+        started: Dict[int, float] = {}
+        workers = min(len(targets), self.config.max_workers)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fleet-read")
+
+        logger.info(f"📖 Lectura de flota: {len(targets)} impresoras, {workers} workers")
+
+        futures = {
+            executor.submit(self._read_printer, target, started): target
+            for target in targets
+        }
+        pending = set(futures)
+
+        try:
+            while pending:
+                # Despertar a tiempo para el próximo vencimiento de una lectura en curso
+                now = time.monotonic()
+                running = [started[futures[f]['printer_id']] for f in pending if futures[f]['printer_id'] in started]
+                timeout = 1.0
+                if running:
+                    timeout = max(0.05, min(timeout, min(running) + self.config.printer_timeout - now))
+
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    yield future.result()
+
+                now = time.monotonic()
+                for future in list(pending):
+                    start = started.get(futures[future]['printer_id'])
+                    if start is not None and now - start > self.config.printer_timeout:
+                        pending.discard(future)
+                        target = futures[future]
+                        logger.warning(f"⏱️ Lectura de {target['hostname']} excedió {self.config.printer_timeout}s")
+                        yield self._timeout_result(target, now - start)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def read_all(self, targets: List[Dict]) -> Dict:
+        """
+        Lee todas las impresoras y retorna un resumen consolidado
+
+        Returns:
+            Dict con successful, failed, total, elapsed_seconds y results
+            (results en el mismo orden que targets)
+        """
+        start = time.monotonic()
+        by_printer = {r['printer_id']: r for r in self.iter_read(targets)}
+        results = [by_printer[t['printer_id']] for t in targets]
+        successful = sum(1 for r in results if r['success'])
+
+        return {
+            'successful': successful,
+            'failed': len(results) - successful,
+            'total': len(results),
+            'elapsed_seconds': round(time.monotonic() - start, 3),
+            'results': results
+        }
+
+    @staticmethod
+    def to_summary(result: Dict) -> Dict:
+        """Convierte un resultado de impresora en un dict serializable para la API"""
+        contador_total = result.get('contador_total')
+        contadores_usuarios = result.get('contadores_usuarios') or []
+        return {
+            'printer_id': result['printer_id'],
+            'printer_name': result['hostname'],
+            'success': result['success'],
+            'contador_total': contador_total.total if contador_total is not None else None,
+            'usuarios_count': getattr(contadores_usuarios, 'usuarios_leidos', len(contadores_usuarios)),
+            'filas_escritas': getattr(contadores_usuarios, 'filas_escritas', None),
+            'filas_omitidas': getattr(contadores_usuarios, 'filas_omitidas', None),
+            'elapsed_seconds': result['elapsed_seconds'],
+            'timed_out': result['timed_out'],
+            'error': result['error']
+        }
@@ -0,0 +1,815 @@
+"""
+Job Queue Service - Cola persistente de operaciones largas sobre impresoras
+Las lecturas y cierres masivos, el aprovisionamiento y la sincronización o
+desactivación de usuarios se encolan y el request responde con el id del
+trabajo en milisegundos. Un pool de workers en cada proceso los ejecuta:
+
+- Los trabajos se guardan en background_jobs (o en memoria con
+  JOB_QUEUE_BACKEND=memory, sin persistencia, para desarrollo)
+- Un worker reclama un trabajo con un UPDATE condicionado y lo mantiene con
+  un lease que renueva mientras corre; si el proceso muere, el lease vence y
+  otro worker (o el mismo tras reiniciar) lo vuelve a ejecutar
+- RetryableJobError y los errores inesperados se reintentan con backoff
+  exponencial hasta max_intentos; JobError y ValueError fallan sin reintento
+- El progreso y el resultado por impresora se guardan en el trabajo
+  (GET /jobs/{id}) y se publican en /ws/logs
+"""
+import asyncio
+import copy
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from db.models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_STATES = (JOB_PENDING, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED)
+
+
+@dataclass
+class JobQueueConfig:
+    """Configuración de la cola de trabajos"""
+    backend: str = 'database'  # database | memory
+    workers: int = 2  # Trabajos ejecutados a la vez por proceso
+    poll_interval: float = 1.0  # Segundos entre consultas de la cola sin trabajos
+    max_attempts: int = 3  # Intentos por trabajo (incluido el primero)
+    retry_delay: float = 30.0  # Espera antes del primer reintento; se duplica en cada intento
+    max_retry_delay: float = 600.0
+    lease_seconds: float = 300.0  # Sin renovar el lease en este tiempo, el trabajo se da por abandonado
+
+
+def load_job_queue_config_from_env() -> JobQueueConfig:
+    """Carga la configuración de la cola de trabajos desde variables de entorno"""
+    try:
+        config = JobQueueConfig(
+            backend=os.getenv('JOB_QUEUE_BACKEND', 'database').lower(),
+            workers=int(os.getenv('JOB_WORKERS', '2')),
+            poll_interval=float(os.getenv('JOB_POLL_INTERVAL', '1')),
+            max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3')),
+            retry_delay=float(os.getenv('JOB_RETRY_DELAY', '30')),
+            max_retry_delay=float(os.getenv('JOB_MAX_RETRY_DELAY', '600')),
+            lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', '300'))
+        )
+
+        if config.backend not in ('database', 'memory'):
+            logger.warning(f"Invalid JOB_QUEUE_BACKEND ({config.backend}), using default 'database'")
+            config.backend = 'database'
+
+        if config.workers < 1:
+            logger.warning(f"Invalid JOB_WORKERS ({config.workers}), using default 2")
+            config.workers = 2
+
+        if config.poll_interval <= 0:
+            logger.warning(f"Invalid JOB_POLL_INTERVAL ({config.poll_interval}), using default 1")
+            config.poll_interval = 1.0
+
+        if config.max_attempts < 1:
+            logger.warning(f"Invalid JOB_MAX_ATTEMPTS ({config.max_attempts}), using default 3")
+            config.max_attempts = 3
+
+        if config.retry_delay < 0 or config.max_retry_delay < config.retry_delay:
+            logger.warning(
+                f"Invalid JOB_RETRY_DELAY/JOB_MAX_RETRY_DELAY ({config.retry_delay}/{config.max_retry_delay}), "
+                f"using defaults 30/600"
+            )
+            config.retry_delay, config.max_retry_delay = 30.0, 600.0
+
+        if config.lease_seconds < 10:
+            logger.warning(f"Invalid JOB_LEASE_SECONDS ({config.lease_seconds}), using default 300")
+            config.lease_seconds = 300.0
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading job queue configuration from environment: {e}, using defaults")
+        return JobQueueConfig()
+
+
+job_queue_config = load_job_queue_config_from_env()
+
+
+class JobError(Exception):
+    """Fallo definitivo de un trabajo: no se reintenta"""
+    pass
+
+
+class RetryableJobError(JobError):
+    """
+    Fallo transitorio (impresoras ocupadas, sin respuesta): se reintenta con backoff
+
+    Args:
+        payload: Payload para el reintento (ej. solo las impresoras pendientes);
+            None reintenta con el mismo payload
+    """
+
+    def __init__(self, message: str, payload: Optional[Dict] = None):
+        super().__init__(message)
+        self.payload = payload
+
+
+def retry_delay(config: JobQueueConfig, attempt: int) -> float:
+    """Espera antes del siguiente intento tras fallar el intento `attempt` (1 = primero)"""
+    return min(config.retry_delay * (2 ** (attempt - 1)), config.max_retry_delay)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ============================================================================
+# Registro de handlers
+# ============================================================================
+
+JobHandler = Callable[['JobContext', Dict], Any]
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(tipo: str):
+    """
+    Registra la función que ejecuta los trabajos de un tipo
+
+    El handler recibe (ctx, payload) y retorna el resultado (dict serializable).
+    Puede ser síncrono (se ejecuta en un hilo) o una corrutina
+    """
+    def register(func: JobHandler) -> JobHandler:
+        _handlers[tipo] = func
+        return func
+    return register
+
+
+def get_job_handler(tipo: str) -> JobHandler:
+    """Handler de un tipo de trabajo; ValueError si no existe"""
+    if tipo not in _handlers:
+        import jobs.printer_jobs  # noqa: F401  (registra los handlers de impresoras)
+    try:
+        return _handlers[tipo]
+    except KeyError:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+
+
+# ============================================================================
+# Almacenes
+# ============================================================================
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _job_to_dict(job: BackgroundJob) -> Dict:
+    return {
+        'id': job.id,
+        'tipo': job.tipo,
+        'estado': job.estado,
+        'payload': job.payload,
+        'resultado': job.resultado,
+        'items': job.items or [],
+        'progreso_actual': job.progreso_actual,
+        'progreso_total': job.progreso_total,
+        'mensaje': job.mensaje,
+        'error': job.error,
+        'intentos': job.intentos,
+        'max_intentos': job.max_intentos,
+        'disponible_en': _iso(job.disponible_en),
+        'bloqueado_por': job.bloqueado_por,
+        'creado_por': job.creado_por,
+        'empresa_id': job.empresa_id,
+        'created_at': _iso(job.created_at),
+        'started_at': _iso(job.started_at),
+        'finished_at': _iso(job.finished_at),
+    }
+
+
+class DatabaseJobStore:
+    """
+    Trabajos en la tabla background_jobs
+
+    Cada método recibe la sesión: los endpoints usan la del request y los
+    workers una propia por operación
+    """
+
+    name = 'database'
+
+    def create(self, db: Session, values: Dict) -> Dict:
+        job = BackgroundJob(**values)
+        db.add(job)
+        db.commit()
+        return _job_to_dict(job)
+
+    def get(self, db: Session, job_id: str) -> Optional[Dict]:
+        job = db.get(BackgroundJob, job_id)
+        return _job_to_dict(job) if job else None
+
+    def list(self, db: Session, limit: int = 50, tipo: Optional[str] = None, estado: Optional[str] = None,
+             empresa_id: Optional[int] = None, creado_por: Optional[int] = None) -> List[Dict]:
+        query = db.query(BackgroundJob)
+        if tipo:
+            query = query.filter(BackgroundJob.tipo == tipo)
+        if estado:
+            query = query.filter(BackgroundJob.estado == estado)
+        if empresa_id is not None or creado_por is not None:
+            # Trabajos de la empresa o lanzados por el usuario
+            query = query.filter(or_(
+                and_(BackgroundJob.empresa_id.isnot(None), BackgroundJob.empresa_id == empresa_id),
+                and_(BackgroundJob.creado_por.isnot(None), BackgroundJob.creado_por == creado_por)
+            ))
+        jobs = query.order_by(BackgroundJob.created_at.desc(), BackgroundJob.id).limit(limit).all()
+        return [_job_to_dict(job) for job in jobs]
+
+    def claim(self, db: Session, worker_id: str, now: datetime, lease_until: datetime) -> Optional[Dict]:
+        """
+        Reclama el siguiente trabajo: pendiente y disponible, o en ejecución con
+        el lease vencido. El UPDATE condicionado a estado e intentos garantiza
+        que dos workers no reclamen el mismo trabajo
+        """
+        candidates = db.query(BackgroundJob.id, BackgroundJob.estado, BackgroundJob.intentos).filter(or_(
+            and_(BackgroundJob.estado == JOB_PENDING, BackgroundJob.disponible_en <= now),
+            and_(BackgroundJob.estado == JOB_RUNNING, BackgroundJob.bloqueado_hasta < now)
+        )).order_by(BackgroundJob.disponible_en, BackgroundJob.created_at).limit(5).all()
+
+        for job_id, estado, intentos in candidates:
+            claimed = db.query(BackgroundJob).filter(
+                BackgroundJob.id == job_id,
+                BackgroundJob.estado == estado,
+                BackgroundJob.intentos == intentos
+            ).update({
+                BackgroundJob.estado: JOB_RUNNING,
+                BackgroundJob.intentos: intentos + 1,
+                BackgroundJob.bloqueado_por: worker_id,
+                BackgroundJob.bloqueado_hasta: lease_until,
+                BackgroundJob.started_at: now,
+                BackgroundJob.finished_at: None,
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return self.get(db, job_id)
+        return None
+
+    def _owned(self, db: Session, job_id: str, worker_id: str) -> Optional[BackgroundJob]:
+        """El trabajo solo si este worker todavía lo tiene reclamado"""
+        job = db.get(BackgroundJob, job_id)
+        if job is None or job.estado != JOB_RUNNING or job.bloqueado_por != worker_id:
+            return None
+        return job
+
+    def progress(self, db: Session, job_id: str, worker_id: str, lease_until: datetime,
+                 completed: Optional[int] = None, total: Optional[int] = None,
+                 message: Optional[str] = None, item: Optional[Dict] = None) -> bool:
+        job = self._owned(db, job_id, worker_id)
+        if job is None:
+            return False
+        job.bloqueado_hasta = lease_until
+        if completed is not None:
+            job.progreso_actual = completed
+        if total is not None:
+            job.progreso_total = total
+        if message is not None:
+            job.mensaje = message[:500]
+        if item is not None:
+            job.items = [*(job.items or []), item]
+        db.commit()
+        return True
+
+    def finish(self, db: Session, job_id: str, worker_id: str, estado: str, now: datetime,
+               resultado: Optional[Dict] = None, error: Optional[str] = None) -> bool:
+        job = self._owned(db, job_id, worker_id)
+        if job is None:
+            return False
+        job.estado = estado
+        job.resultado = resultado
+        job.error = error
+        job.finished_at = now
+        job.bloqueado_por = None
+        job.bloqueado_hasta = None
+        db.commit()
+        return True
+
+    def retry(self, db: Session, job_id: str, worker_id: str, disponible_en: datetime,
+              error: str, payload: Optional[Dict] = None) -> bool:
+        job = self._owned(db, job_id, worker_id)
+        if job is None:
+            return False
+        job.estado = JOB_PENDING
+        job.error = error
+        job.disponible_en = disponible_en
+        job.bloqueado_por = None
+        job.bloqueado_hasta = None
+        if payload is not None:
+            job.payload = payload
+        db.commit()
+        return True
+
+    def release(self, db: Session, job_id: str, worker_id: str, now: datetime) -> bool:
+        """Devuelve a la cola un trabajo interrumpido por un apagado ordenado, sin gastar el intento"""
+        job = self._owned(db, job_id, worker_id)
+        if job is None:
+            return False
+        job.estado = JOB_PENDING
+        job.intentos = max(0, job.intentos - 1)
+        job.disponible_en = now
+        job.bloqueado_por = None
+        job.bloqueado_hasta = None
+        db.commit()
+        return True
+
+
+class MemoryJobStore:
+    """
+    Trabajos en memoria del proceso (JOB_QUEUE_BACKEND=memory)
+    Misma interfaz que DatabaseJobStore, ignora la sesión. No sobrevive a
+    reinicios ni se comparte entre workers de uvicorn
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+
+    def _snapshot(self, job: Dict) -> Dict:
+        snapshot = copy.deepcopy(job)
+        for field in ('disponible_en', 'created_at', 'started_at', 'finished_at'):
+            snapshot[field] = _iso(snapshot[field])
+        snapshot.pop('bloqueado_hasta')
+        return snapshot
+
+    def create(self, db, values: Dict) -> Dict:
+        job = {
+            'resultado': None, 'items': [], 'progreso_actual': 0, 'progreso_total': None, 'mensaje': None,
+            'error': None, 'intentos': 0, 'bloqueado_por': None, 'bloqueado_hasta': None,
+            'created_at': _utcnow(), 'started_at': None, 'finished_at': None,
+            **copy.deepcopy(values)
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            return self._snapshot(job)
+
+    def get(self, db, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def list(self, db, limit: int = 50, tipo: Optional[str] = None, estado: Optional[str] = None,
+             empresa_id: Optional[int] = None, creado_por: Optional[int] = None) -> List[Dict]:
+        with self._lock:
+            jobs = [
+                job for job in self._jobs.values()
+                if (not tipo or job['tipo'] == tipo) and (not estado or job['estado'] == estado)
+                and ((empresa_id is None and creado_por is None)
+                     or (job['empresa_id'] is not None and job['empresa_id'] == empresa_id)
+                     or (job['creado_por'] is not None and job['creado_por'] == creado_por))
+            ]
+            jobs.sort(key=lambda job: job['created_at'], reverse=True)
+            return [self._snapshot(job) for job in jobs[:limit]]
+
+    def claim(self, db, worker_id: str, now: datetime, lease_until: datetime) -> Optional[Dict]:
+        with self._lock:
+            candidates = [
+                job for job in self._jobs.values()
+                if (job['estado'] == JOB_PENDING and job['disponible_en'] <= now)
+                or (job['estado'] == JOB_RUNNING and job['bloqueado_hasta'] < now)
+            ]
+            if not candidates:
+                return None
+            job = min(candidates, key=lambda job: (job['disponible_en'], job['created_at']))
+            job.update(estado=JOB_RUNNING, intentos=job['intentos'] + 1, bloqueado_por=worker_id,
+                       bloqueado_hasta=lease_until, started_at=now, finished_at=None)
+            return self._snapshot(job)
+
+    def _owned(self, job_id: str, worker_id: str) -> Optional[Dict]:
+        job = self._jobs.get(job_id)
+        if job is None or job['estado'] != JOB_RUNNING or job['bloqueado_por'] != worker_id:
+            return None
+        return job
+
+    def progress(self, db, job_id: str, worker_id: str, lease_until: datetime,
+                 completed: Optional[int] = None, total: Optional[int] = None,
+                 message: Optional[str] = None, item: Optional[Dict] = None) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            if job is None:
+                return False
+            job['bloqueado_hasta'] = lease_until
+            if completed is not None:
+                job['progreso_actual'] = completed
+            if total is not None:
+                job['progreso_total'] = total
+            if message is not None:
+                job['mensaje'] = message[:500]
+            if item is not None:
+                job['items'].append(copy.deepcopy(item))
+            return True
+
+    def finish(self, db, job_id: str, worker_id: str, estado: str, now: datetime,
+               resultado: Optional[Dict] = None, error: Optional[str] = None) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            if job is None:
+                return False
+            job.update(estado=estado, resultado=copy.deepcopy(resultado), error=error, finished_at=now,
+                       bloqueado_por=None, bloqueado_hasta=None)
+            return True
+
+    def retry(self, db, job_id: str, worker_id: str, disponible_en: datetime,
+              error: str, payload: Optional[Dict] = None) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            if job is None:
+                return False
+            job.update(estado=JOB_PENDING, error=error, disponible_en=disponible_en,
+                       bloqueado_por=None, bloqueado_hasta=None)
+            if payload is not None:
+                job['payload'] = copy.deepcopy(payload)
+            return True
+
+    def release(self, db, job_id: str, worker_id: str, now: datetime) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            if job is None:
+                return False
+            job.update(estado=JOB_PENDING, intentos=max(0, job['intentos'] - 1), disponible_en=now,
+                       bloqueado_por=None, bloqueado_hasta=None)
+            return True
+
+
+def create_job_store(config: JobQueueConfig):
+    """Almacén según JOB_QUEUE_BACKEND"""
+    return MemoryJobStore() if config.backend == 'memory' else DatabaseJobStore()
+
+
+# ============================================================================
+# Contexto de ejecución
+# ============================================================================
+
+class JobContext:
+    """
+    Lo que recibe un handler: payload, intento, sesiones y reporte de progreso
+
+    progress() e item() persisten el avance (renovando el lease) y lo publican
+    en /ws/logs. Se pueden llamar desde cualquier hilo
+    """
+
+    def __init__(self, queue: 'JobQueue', job: Dict, worker_id: str):
+        self._queue = queue
+        self._worker_id = worker_id
+        self._lock = threading.Lock()
+        self.job_id = job['id']
+        self.tipo = job['tipo']
+        self.empresa_id = job.get('empresa_id')
+        self.creado_por = job.get('creado_por')
+        self.attempt = job['intentos']
+        self.max_attempts = job['max_intentos']
+        self.completed = 0
+        self.total: Optional[int] = None
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        """Sesión de base de datos propia del handler, cerrada al salir"""
+        with self._queue.db_session() as db:
+            yield db
+
+    @property
+    def session_factory(self) -> Callable[[], Session]:
+        """Fábrica de sesiones para servicios que abren una por hilo"""
+        return self._queue.session_factory
+
+    def progress(self, completed: Optional[int] = None, total: Optional[int] = None,
+                 message: Optional[str] = None, item: Optional[Dict] = None) -> None:
+        with self._lock:
+            if completed is not None:
+                self.completed = completed
+            if total is not None:
+                self.total = total
+            with self._queue.session() as db:
+                self._queue.store.progress(
+                    db, self.job_id, self._worker_id, self._queue.lease_deadline(),
+                    completed=completed, total=total, message=message, item=item
+                )
+            self._queue.notify(
+                {'id': self.job_id, 'tipo': self.tipo, 'estado': JOB_RUNNING,
+                 'empresa_id': self.empresa_id, 'creado_por': self.creado_por},
+                message or f"Trabajo {self.tipo}: {self.completed}/{self.total or '?'}",
+                progreso={'actual': self.completed, 'total': self.total},
+                item=item
+            )
+
+    def item(self, item: Dict, message: Optional[str] = None) -> None:
+        """Resultado de una impresora: se agrega a items y avanza el progreso en uno"""
+        self.progress(completed=self.completed + 1, message=message, item={**item, 'intento': self.attempt})
+
+
+# ============================================================================
+# Cola y workers
+# ============================================================================
+
+class JobQueue:
+    """
+    Cola de trabajos y pool de workers del proceso
+
+    enqueue() es síncrono (una inserción) y se usa desde los endpoints;
+    start() lanza `workers` tareas que reclaman y ejecutan trabajos. Los
+    handlers síncronos corren en hilos (asyncio.to_thread)
+    """
+
+    def __init__(self, config: Optional[JobQueueConfig] = None, store=None, session_factory=None):
+        self.config = config or job_queue_config
+        self.store = store or create_job_store(self.config)
+        self._session_factory = session_factory
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._publish: Optional[Callable[..., Awaitable[Any]]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, str] = {}  # job_id -> worker_id de los trabajos en curso
+        # job_id -> evento que se marca al terminar el hilo de un handler síncrono
+        self._handler_done: Dict[str, threading.Event] = {}
+        self._pending_publish = set()
+        self.stats = {'executed': 0, 'succeeded': 0, 'failed': 0, 'retried': 0}
+
+    # ------------------------------------------------------------------ sesiones
+
+    @property
+    def session_factory(self) -> Callable[[], Session]:
+        if self._session_factory is None:
+            from db.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory
+
+    @contextmanager
+    def db_session(self) -> Iterator[Session]:
+        db = self.session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def session(self) -> Iterator[Optional[Session]]:
+        """Sesión para el almacén (None con el almacén en memoria)"""
+        if self.store.name == 'memory':
+            yield None
+            return
+        with self.db_session() as db:
+            yield db
+
+    def lease_deadline(self) -> datetime:
+        return _utcnow() + timedelta(seconds=self.config.lease_seconds)
+
+    # ------------------------------------------------------------------ API
+
+    def enqueue(self, db: Optional[Session], tipo: str, payload: Dict, creado_por: Optional[int] = None,
+                empresa_id: Optional[int] = None, max_intentos: Optional[int] = None) -> Dict:
+        """
+        Encola un trabajo y despierta a los workers de este proceso
+
+        Args:
+            db: Sesión del request (ignorada con el almacén en memoria)
+            tipo: Tipo registrado con @job_handler
+            payload: Parámetros del handler (serializables a JSON)
+
+        Raises:
+            ValueError: Si el tipo no tiene handler
+        """
+        get_job_handler(tipo)
+        job = self.store.create(db, {
+            'id': uuid.uuid4().hex,
+            'tipo': tipo,
+            'estado': JOB_PENDING,
+            'payload': payload,
+            'max_intentos': max_intentos or self.config.max_attempts,
+            'disponible_en': _utcnow(),
+            'creado_por': creado_por,
+            'empresa_id': empresa_id,
+        })
+        logger.info(f"📥 Trabajo {tipo} encolado ({job['id']})")
+        self.notify(job, f"Trabajo {tipo} encolado")
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return job
+
+    def get(self, db: Optional[Session], job_id: str) -> Optional[Dict]:
+        return self.store.get(db, job_id)
+
+    def list(self, db: Optional[Session], **filters) -> List[Dict]:
+        return self.store.list(db, **filters)
+
+    def notify(self, job: Dict, message: str, log_type: str = 'info', **extra) -> None:
+        """
+        Publica un evento del trabajo en /ws/logs (no bloquea; sin start() no hace nada)
+
+        Solo lo reciben los clientes que pueden ver el trabajo en GET /jobs:
+        superadmins, usuarios de su empresa y quien lo lanzó
+        """
+        if self._publish is None or self._loop is None or self._loop.is_closed():
+            return
+        event = {
+            "id": f"job-{job['id']}-{time.time()}",
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "message": message,
+            "type": log_type,
+            "job_id": job['id'],
+            "job_type": job['tipo'],
+            "job_status": job['estado'],
+            **{key: value for key, value in extra.items() if value is not None}
+        }
+        publish = self._publish(event, audience={'empresa_id': job.get('empresa_id'),
+                                                 'user_id': job.get('creado_por')})
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            task = self._loop.create_task(publish)
+            self._pending_publish.add(task)
+            task.add_done_callback(self._pending_publish.discard)
+        else:
+            asyncio.run_coroutine_threadsafe(publish, self._loop)
+
+    # ------------------------------------------------------------------ workers
+
+    @property
+    def workers_running(self) -> bool:
+        """True si este proceso tiene workers ejecutando la cola (start() con ENABLE_JOB_WORKER)"""
+        return bool(self._workers)
+
+    async def start(self, publish: Optional[Callable[..., Awaitable[Any]]] = None) -> None:
+        """
+        Lanza los workers de este proceso; publish(event, audience=...) recibe los
+        eventos para /ws/logs junto con su audiencia (empresa_id, user_id)
+        """
+        if self._workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._publish = publish
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(f"{self.worker_id}#{n}"))
+            for n in range(self.config.workers)
+        ]
+        logger.info(f"🧵 Cola de trabajos ({self.store.name}): {self.config.workers} workers en {self.worker_id}")
+
+    async def stop(self) -> None:
+        """
+        Detiene los workers y devuelve a la cola los trabajos en curso
+
+        Un handler síncrono no se puede interrumpir: si su hilo sigue corriendo
+        el trabajo no se devuelve (otro worker lo ejecutaría a la vez); se
+        re-ejecuta cuando vence su lease
+        """
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job_id, worker_id in list(self._running.items()):
+            done = self._handler_done.get(job_id)
+            if done is not None and not done.is_set():
+                logger.warning(f"⏳ Trabajo {job_id} sigue en ejecución: se reintentará al vencer su lease")
+                continue
+            with self.session() as db:
+                if self.store.release(db, job_id, worker_id, _utcnow()):
+                    logger.info(f"↩️ Trabajo {job_id} devuelto a la cola por apagado")
+        self._running.clear()
+        self._handler_done.clear()
+        self._publish = None
+
+    async def _worker_loop(self, worker_id: str) -> None:
+        while True:
+            try:
+                ran = await self.run_once(worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error en el worker de trabajos {worker_id}: {e}")
+                ran = False
+            if not ran:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.config.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def _claim(self, worker_id: str) -> Optional[Dict]:
+        now = _utcnow()
+        with self.session() as db:
+            return self.store.claim(db, worker_id, now, now + timedelta(seconds=self.config.lease_seconds))
+
+    async def run_once(self, worker_id: Optional[str] = None) -> bool:
+        """Reclama y ejecuta un trabajo; False si no había ninguno disponible"""
+        worker_id = worker_id or f"{self.worker_id}#0"
+        job = await asyncio.to_thread(self._claim, worker_id)
+        if job is None:
+            return False
+        self._running[job['id']] = worker_id
+        try:
+            await self._execute(job, worker_id)
+        except asyncio.CancelledError:
+            raise  # Sigue en _running: stop() lo devuelve a la cola
+        except Exception:
+            self._running.pop(job['id'], None)
+            self._handler_done.pop(job['id'], None)
+            raise
+        self._running.pop(job['id'], None)
+        self._handler_done.pop(job['id'], None)
+        return True
+
+    def _finish(self, job: Dict, worker_id: str, estado: str, resultado=None, error=None) -> None:
+        with self.session() as db:
+            self.store.finish(db, job['id'], worker_id, estado, _utcnow(), resultado=resultado, error=error)
+
+    def _retry(self, job: Dict, worker_id: str, delay: float, error: str, payload=None) -> None:
+        with self.session() as db:
+            self.store.retry(db, job['id'], worker_id, _utcnow() + timedelta(seconds=delay), error, payload)
+
+    def _renew_lease(self, job: Dict, worker_id: str) -> None:
+        with self.session() as db:
+            self.store.progress(db, job['id'], worker_id, self.lease_deadline())
+
+    async def _run_with_lease(self, work: Awaitable, job: Dict, worker_id: str) -> Any:
+        """Espera al handler renovando el lease cada tercio de su duración"""
+        task = asyncio.ensure_future(work)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.config.lease_seconds / 3)
+                if done:
+                    return task.result()
+                await asyncio.to_thread(self._renew_lease, job, worker_id)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+    async def _execute(self, job: Dict, worker_id: str) -> None:
+        tipo, attempt = job['tipo'], job['intentos']
+        self.stats['executed'] += 1
+
+        if attempt > job['max_intentos']:
+            # Reclamado tras vencer el lease (proceso caído) sin intentos restantes
+            error = "El trabajo se interrumpió y agotó sus intentos"
+            await asyncio.to_thread(self._finish, job, worker_id, JOB_FAILED, None, error)
+            self.stats['failed'] += 1
+            self.notify({**job, 'estado': JOB_FAILED}, f"❌ Trabajo {tipo} fallido: {error}", 'error')
+            return
+
+        logger.info(f"▶️ Trabajo {tipo} ({job['id']}) intento {attempt}/{job['max_intentos']}")
+        self.notify(job, f"▶️ Trabajo {tipo} iniciado (intento {attempt}/{job['max_intentos']})")
+        ctx = JobContext(self, job, worker_id)
+        start = time.monotonic()
+
+        try:
+            handler = get_job_handler(tipo)
+            if asyncio.iscoroutinefunction(handler):
+                work = handler(ctx, job['payload'])
+            else:
+                done = self._handler_done[job['id']] = threading.Event()
+
+                def run_handler():
+                    try:
+                        return handler(ctx, job['payload'])
+                    finally:
+                        done.set()
+
+                work = asyncio.to_thread(run_handler)
+            resultado = await self._run_with_lease(work, job, worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            retryable = isinstance(e, RetryableJobError) or not isinstance(e, (JobError, ValueError))
+            if retryable and attempt < job['max_intentos']:
+                delay = retry_delay(self.config, attempt)
+                payload = e.payload if isinstance(e, RetryableJobError) else None
+                await asyncio.to_thread(self._retry, job, worker_id, delay, error, payload)
+                self.stats['retried'] += 1
+                logger.warning(f"🔄 Trabajo {tipo} ({job['id']}) reintento en {delay:.0f}s: {error}")
+                self.notify({**job, 'estado': JOB_PENDING},
+                            f"🔄 Trabajo {tipo}: {error}. Reintento en {delay:.0f}s", 'warning')
+            else:
+                await asyncio.to_thread(self._finish, job, worker_id, JOB_FAILED, None, error)
+                self.stats['failed'] += 1
+                logger.error(f"❌ Trabajo {tipo} ({job['id']}) fallido tras {attempt} intento(s): {error}")
+                self.notify({**job, 'estado': JOB_FAILED}, f"❌ Trabajo {tipo} fallido: {error}", 'error')
+            return
+
+        await asyncio.to_thread(self._finish, job, worker_id, JOB_SUCCEEDED, resultado, None)
+        self.stats['succeeded'] += 1
+        elapsed = time.monotonic() - start
+        logger.info(f"✅ Trabajo {tipo} ({job['id']}) completado en {elapsed:.1f}s")
+        self.notify({**job, 'estado': JOB_SUCCEEDED}, f"✅ Trabajo {tipo} completado en {elapsed:.1f}s",
+                    'success', resultado=resultado)
+
+
+job_queue = JobQueue()
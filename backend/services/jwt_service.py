@@ -7,6 +7,14 @@ import os
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 
+# Trazas por request de autenticación (print a stdout); solo para depuración
+AUTH_DEBUG = os.getenv("AUTH_DEBUG", "false").lower() == "true"
+
+
+def _trace(message: str) -> None:
+    if AUTH_DEBUG:
+        print(f"[JWT] {message}")
+
 
 class InvalidTokenError(Exception):
     """Raised when JWT token is invalid"""
@@ -75,7 +83,7 @@ class JWTService:
         """
         secret_key = os.getenv("SECRET_KEY")
         
-        print(f"[JWT] SECRET_KEY configurada: {bool(secret_key)}, longitud: {len(secret_key) if secret_key else 0}")
+        _trace(f"SECRET_KEY configurada: {bool(secret_key)}, longitud: {len(secret_key) if secret_key else 0}")
         
         if not secret_key:
             raise ValueError("SECRET_KEY environment variable is not set")
@@ -202,19 +210,19 @@ class JWTService:
         try:
             # Mask token for security - show only first 4 and last 4 characters
             token_preview = f"{token[:4]}...{token[-4:]}" if token and len(token) > 8 else "NONE"
-            print(f"[JWT] Decodificando token: {token_preview}")
+            _trace(f"Decodificando token: {token_preview}")
             secret_key = cls._get_secret_key()
             payload = jwt.decode(token, secret_key, algorithms=[cls.ALGORITHM])
-            print(f"[JWT] Token decodificado exitosamente, user_id: {payload.get('user_id')}")
+            _trace(f"Token decodificado exitosamente, user_id: {payload.get('user_id')}")
             return payload
         except jwt.ExpiredSignatureError:
-            print("[JWT] ERROR: Token expirado")
+            _trace("ERROR: Token expirado")
             raise ExpiredTokenError("Token has expired")
         except jwt.InvalidTokenError as e:
-            print(f"[JWT] ERROR: Token inválido: {str(e)}")
+            _trace(f"ERROR: Token inválido: {str(e)}")
             raise InvalidTokenError("Invalid token")
         except Exception as e:
-            print(f"[JWT] ERROR: Fallo en validación: {type(e).__name__}: {str(e)}")
+            _trace(f"ERROR: Fallo en validación: {type(e).__name__}: {str(e)}")
             raise InvalidTokenError(f"Token validation failed: {str(e)}")
     
     @classmethod
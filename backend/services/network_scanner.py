@@ -1,31 +1,369 @@
 """
 Network scanning service for printer discovery
 Async implementation for concurrent IP scanning with SNMP support
+
+Each host is probed on all printer ports at once with a short liveness
+timeout, so dead hosts cost a single fast round instead of one timeout per
+port. Live hosts are fingerprinted through one shared httpx.AsyncClient and
+the result is cached per IP: repeated scans only re-fingerprint hosts whose
+open ports changed or whose cache entry expired.
 """
 import asyncio
-import socket
-from typing import List, Dict, Optional, Tuple
 import ipaddress
+import logging
+import os
+import re
+import socket
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import httpx
+from bs4 import BeautifulSoup
 
 from .snmp_client import get_snmp_client
 
+logger = logging.getLogger(__name__)
+
+# Web interface, secure web interface, SNMP management, raw printing (JetDirect)
+PRINTER_PORTS = (80, 443, 161, 9100)
+
+RICOH_SERIAL_PATHS = (
+    "/web/guest/es/websys/status/configuration.cgi",
+    "/web/guest/en/websys/status/configuration.cgi",
+    "/web/guest/es/websys/webArch/mainFrame.cgi",
+)
+
+RICOH_TITLE_PATTERN = re.compile(r'<title>\s*([A-Z0-9]+)\s*-\s*Web Image Monitor\s*</title>', re.IGNORECASE)
+KYOCERA_HEADER_PATTERN = re.compile(r'HeaderStatusPC\s*\(\s*"([^"]*)"\s*,\s*"([A-Z0-9]+)"\s*,', re.IGNORECASE)
+KYOCERA_CONFIG_PATTERN = re.compile(r'["\']?hostname["\']?\s*[:=]\s*["\']([A-Z0-9]+)["\']', re.IGNORECASE)
+KYOCERA_KM_PATTERN = re.compile(r'KM[A-F0-9]{6,12}', re.IGNORECASE)
+SERIAL_PATTERNS = (
+    ("ID máquina", re.compile(r'ID\s+m[áa]quina[:\s]+([A-Z0-9]+)', re.IGNORECASE)),
+    ("Machine ID", re.compile(r'Machine\s+ID[:\s]+([A-Z0-9]+)', re.IGNORECASE)),
+    ("Serial Number", re.compile(r'Serial\s+Number[:\s]+([A-Z0-9]+)', re.IGNORECASE)),
+)
+
+PRINTER_KEYWORDS = ('ricoh', 'printer', 'print', 'mfp', 'copier', 'mp', 'sp', 'im', 'laserjet', 'deskjet')
+
+
+@dataclass
+class NetworkScannerConfig:
+    """Configuration for network discovery"""
+    max_concurrency: int = 128  # Hosts probed at once across every subnet of a scan
+    liveness_timeout: float = 0.5  # First probe round; hosts silent on every port are skipped
+    max_addresses: int = 4096  # Addresses per scan (a /20, or several /24 subnets)
+    cache_ttl: float = 600.0  # Seconds a host fingerprint is reused while its open ports don't change
+    http_max_connections: int = 32  # Shared fingerprinting client connection pool
+
+
+def load_network_scanner_config_from_env() -> NetworkScannerConfig:
+    """
+    Load network scanner configuration from environment variables
+
+    Returns:
+        NetworkScannerConfig with values from environment or defaults
+    """
+    defaults = NetworkScannerConfig()
+    try:
+        config = NetworkScannerConfig(
+            max_concurrency=int(os.getenv('NETWORK_SCAN_MAX_CONCURRENCY', str(defaults.max_concurrency))),
+            liveness_timeout=float(os.getenv('NETWORK_SCAN_LIVENESS_TIMEOUT', str(defaults.liveness_timeout))),
+            max_addresses=int(os.getenv('NETWORK_SCAN_MAX_ADDRESSES', str(defaults.max_addresses))),
+            cache_ttl=float(os.getenv('NETWORK_SCAN_CACHE_TTL', str(defaults.cache_ttl))),
+            http_max_connections=int(os.getenv('NETWORK_SCAN_HTTP_MAX_CONNECTIONS', str(defaults.http_max_connections)))
+        )
+
+        if config.max_concurrency <= 0:
+            logger.warning(f"Invalid NETWORK_SCAN_MAX_CONCURRENCY ({config.max_concurrency}), using default {defaults.max_concurrency}")
+            config.max_concurrency = defaults.max_concurrency
+
+        if config.liveness_timeout <= 0:
+            logger.warning(f"Invalid NETWORK_SCAN_LIVENESS_TIMEOUT ({config.liveness_timeout}), using default {defaults.liveness_timeout}")
+            config.liveness_timeout = defaults.liveness_timeout
+
+        if config.max_addresses <= 0:
+            logger.warning(f"Invalid NETWORK_SCAN_MAX_ADDRESSES ({config.max_addresses}), using default {defaults.max_addresses}")
+            config.max_addresses = defaults.max_addresses
+
+        if config.cache_ttl < 0:
+            logger.warning(f"Invalid NETWORK_SCAN_CACHE_TTL ({config.cache_ttl}), using default {defaults.cache_ttl}")
+            config.cache_ttl = defaults.cache_ttl
+
+        if config.http_max_connections <= 0:
+            logger.warning(f"Invalid NETWORK_SCAN_HTTP_MAX_CONNECTIONS ({config.http_max_connections}), using default {defaults.http_max_connections}")
+            config.http_max_connections = defaults.http_max_connections
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading network scanner configuration from environment: {e}, using defaults")
+        return NetworkScannerConfig()
+
+
+network_scanner_config = load_network_scanner_config_from_env()
+
+
+def parse_ip_ranges(ip_range: Union[str, Iterable[str]]) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """
+    Parse one or more CIDR ranges
+
+    Args:
+        ip_range: CIDR string, comma/space separated CIDR list or iterable of CIDRs
+
+    Returns:
+        List of networks in the given order
+
+    Raises:
+        ValueError: If a range is not valid CIDR notation or the list is empty
+    """
+    items = re.split(r'[,\s]+', ip_range) if isinstance(ip_range, str) else list(ip_range)
+    networks = [ipaddress.ip_network(item.strip(), strict=False) for item in items if item and item.strip()]
+    if not networks:
+        raise ValueError("No IP range given")
+    return networks
+
+
+def expand_ip_ranges(ip_range: Union[str, Iterable[str]], max_addresses: int) -> List[str]:
+    """
+    Expand CIDR ranges into the list of host addresses to scan
+
+    Overlapping subnets are scanned once; the total is capped before any
+    address is enumerated.
+
+    Args:
+        ip_range: Ranges accepted by parse_ip_ranges
+        max_addresses: Maximum number of addresses in the whole scan
+
+    Returns:
+        Unique host addresses in range order
+
+    Raises:
+        ValueError: If the ranges are invalid or exceed max_addresses
+    """
+    networks = parse_ip_ranges(ip_range)
+    total = sum(network.num_addresses for network in networks)
+    if total > max_addresses:
+        raise ValueError(f"IP range too large. Maximum {max_addresses} addresses per scan")
+
+    seen = set()
+    hosts = []
+    for network in networks:
+        for ip in network.hosts():
+            address = str(ip)
+            if address not in seen:
+                seen.add(address)
+                hosts.append(address)
+    return hosts
+
+
+def parse_ricoh_serial(html: str) -> Optional[str]:
+    """Extract the machine serial (ID máquina) from a Ricoh status page"""
+    for label, pattern in SERIAL_PATTERNS:
+        match = pattern.search(html)
+        if match:
+            logger.debug(f"Serial found by '{label}' pattern")
+            return match.group(1).strip()
+
+    # Structured fallback: value in the cell next to the label
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup.find_all(['td', 'div', 'span']):
+        text = element.get_text(strip=True)
+        if 'ID máquina' in text or 'Machine ID' in text:
+            next_elem = element.find_next_sibling()
+            if next_elem:
+                match = re.search(r'([A-Z0-9]{10,})', next_elem.get_text(strip=True))
+                if match:
+                    return match.group(1)
+    return None
+
+
+def parse_ricoh_hostname(html: str) -> Optional[str]:
+    """Hostname from the Web Image Monitor title (HOSTNAME - Web Image Monitor)"""
+    match = RICOH_TITLE_PATTERN.search(html)
+    return match.group(1).strip() if match else None
+
+
+def parse_kyocera_header_hostname(html: str) -> Optional[str]:
+    """Hostname from Kyocera HeaderStatusPC(model, hostname, ...) call"""
+    match = KYOCERA_HEADER_PATTERN.search(html)
+    return match.group(2).strip() if match else None
+
+
+def parse_kyocera_config_hostname(text: str) -> Optional[str]:
+    """Hostname from Kyocera Device_Config.model.htm javascript"""
+    match = KYOCERA_CONFIG_PATTERN.search(text)
+    if match:
+        return match.group(1).strip()
+    match = KYOCERA_KM_PATTERN.search(text)
+    return match.group(0) if match else None
+
+
+def parse_kyocera_root_hostname(html: str, ip: str) -> Optional[str]:
+    """Kyocera root page: KM hostname pattern or a descriptive name"""
+    if 'KYOCERA' not in html.upper():
+        return None
+    match = KYOCERA_KM_PATTERN.search(html)
+    return match.group(0) if match else f"Kyocera-{ip.replace('.', '-')}"
+
+
+def port_signature(ports: Dict[int, bool]) -> Tuple[int, ...]:
+    """Open ports of a host, used to tell whether it changed since its fingerprint"""
+    return tuple(port for port, is_open in sorted(ports.items()) if is_open)
+
+
+# (path, timeout, parser) in the order they are tried; Ricoh first (fastest for Ricoh printers)
+HOSTNAME_SOURCES: Tuple[Tuple[str, float, Callable[[str, str], Optional[str]]], ...] = (
+    ("/web/guest/es/websys/webArch/mainFrame.cgi", 3.0, lambda html, ip: parse_ricoh_hostname(html)),
+    ("/startwlm/Start_Wlm.htm", 10.0, lambda html, ip: parse_kyocera_header_hostname(html)),
+    ("/index.html", 10.0, lambda html, ip: parse_kyocera_header_hostname(html)),
+    ("/js/jssrc/model/startwlm/Device_Config.model.htm", 3.0, lambda html, ip: parse_kyocera_config_hostname(html)),
+    ("", 3.0, parse_kyocera_root_hostname),
+)
+
+
+class FingerprintCache:
+    """
+    Per-IP cache of fingerprint results (device info or None for non-printers)
+
+    An entry is reused only while it is younger than the TTL and the host
+    still shows the same open ports.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Tuple[int, ...], Optional[Dict]]] = {}
+
+    def get(self, ip: str, signature: Tuple[int, ...]) -> Tuple[bool, Optional[Dict]]:
+        """
+        Returns:
+            (hit, device_info) - device_info is a copy so callers can modify it
+        """
+        entry = self._entries.get(ip)
+        if entry is None:
+            return False, None
+        stored_at, stored_signature, device_info = entry
+        if stored_signature != signature or time.monotonic() - stored_at > self.ttl:
+            del self._entries[ip]
+            return False, None
+        return True, dict(device_info) if device_info is not None else None
+
+    def set(self, ip: str, signature: Tuple[int, ...], device_info: Optional[Dict]) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries[ip] = (time.monotonic(), signature,
+                             dict(device_info) if device_info is not None else None)
+
+    def invalidate(self, ip: Optional[str] = None) -> None:
+        """Drop one IP, or every entry when ip is None"""
+        if ip is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(ip, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared across scanner instances so repeated scans reuse fingerprints
+fingerprint_cache = FingerprintCache(network_scanner_config.cache_ttl)
+
 
 class NetworkScanner:
     """
     Asynchronous network scanner for Ricoh printer discovery
     """
     
-    def __init__(self, timeout: float = 1.0, enable_snmp: bool = True):
+    def __init__(
+        self,
+        timeout: float = 1.0,
+        enable_snmp: bool = True,
+        config: Optional[NetworkScannerConfig] = None,
+        cache: Optional[FingerprintCache] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
         """
         Initialize scanner
         
         Args:
             timeout: Connection timeout in seconds
             enable_snmp: Enable SNMP queries for detailed printer info
+            config: Discovery limits (defaults from environment)
+            cache: Fingerprint cache (defaults to the shared module cache)
+            transport: Alternative httpx transport for fingerprinting (tests)
         """
         self.timeout = timeout
         self.enable_snmp = enable_snmp
         self.snmp_client = get_snmp_client() if enable_snmp else None
+        self.config = config or network_scanner_config
+        self.cache = cache if cache is not None else fingerprint_cache
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self.last_scan_stats: Dict[str, int] = {}
+    
+    @asynccontextmanager
+    async def _http_session(self) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        Shared HTTP client for web fingerprinting
+
+        Nested calls (scan -> detect -> hostname/serial) reuse the client
+        opened by the outermost one, which closes it.
+        """
+        if self._http is not None:
+            yield self._http
+            return
+
+        self._http = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=httpx.Timeout(3.0, pool=None),
+            limits=httpx.Limits(
+                max_connections=self.config.http_max_connections,
+                max_keepalive_connections=self.config.http_max_connections
+            ),
+            follow_redirects=True
+        )
+        try:
+            yield self._http
+        finally:
+            client, self._http = self._http, None
+            await client.aclose()
+    
+    async def _fetch_text(self, url: str, timeout: float) -> Optional[str]:
+        """GET a page with the shared client; None unless it answers 200"""
+        async with self._http_session() as http:
+            try:
+                response = await http.get(url, timeout=timeout)
+            except httpx.HTTPError as e:
+                logger.debug(f"   ❌ Error en {url}: {e}")
+                return None
+        if response.status_code != 200:
+            logger.debug(f"   ❌ Status {response.status_code} en {url}")
+            return None
+        return response.text
+    
+    async def _probe_port(self, ip: str, port: int, timeout: float) -> Optional[bool]:
+        """
+        Probe a TCP port
+
+        Returns:
+            True if open, False if refused (host is alive), None if no answer
+        """
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, port),
+                timeout=timeout
+            )
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+            return True
+        except ConnectionRefusedError:
+            return False
+        except (asyncio.TimeoutError, OSError):
+            return None
     
     async def check_port(self, ip: str, port: int) -> bool:
         """
@@ -38,16 +376,35 @@ class NetworkScanner:
         Returns:
             True if port is open, False otherwise
         """
-        try:
-            reader, writer = await asyncio.wait_for(
-                asyncio.open_connection(ip, port),
-                timeout=self.timeout
-            )
-            writer.close()
-            await writer.wait_closed()
-            return True
-        except (asyncio.TimeoutError, ConnectionRefusedError, OSError):
-            return False
+        return bool(await self._probe_port(ip, port, self.timeout))
+    
+    async def probe_ports(self, ip: str, ports: Tuple[int, ...] = PRINTER_PORTS) -> Optional[Dict[int, bool]]:
+        """
+        Probe all printer ports of a host concurrently
+
+        A first round uses the short liveness timeout: a host that neither
+        accepts nor refuses on any port is considered dead and skipped. Ports
+        that stayed silent on a live host are retried with the full timeout.
+
+        Args:
+            ip: IP address to probe
+            ports: Ports to probe
+
+        Returns:
+            {port: open} for live hosts, None for dead hosts
+        """
+        fast_timeout = min(self.config.liveness_timeout, self.timeout)
+        first = await asyncio.gather(*(self._probe_port(ip, port, fast_timeout) for port in ports))
+        if all(result is None for result in first):
+            return None
+
+        results = dict(zip(ports, first))
+        silent = [port for port, result in results.items() if result is None]
+        if silent and fast_timeout < self.timeout:
+            retried = await asyncio.gather(*(self._probe_port(ip, port, self.timeout) for port in silent))
+            results.update(zip(silent, retried))
+
+        return {port: bool(result) for port, result in results.items()}
     
     async def resolve_hostname(self, ip: str) -> Optional[str]:
         """
@@ -89,91 +446,22 @@ class NetworkScanner:
             Serial number if found, None otherwise
         """
         try:
-            import requests
-            import re
-            from bs4 import BeautifulSoup
+            logger.debug(f"   Probando {len(RICOH_SERIAL_PATHS)} rutas para obtener serial de {ip}...")
+            for path in RICOH_SERIAL_PATHS:
+                html = await self._fetch_text(f"http://{ip}{path}", timeout=3.0)
+                if html is None:
+                    continue
+                serial = parse_ricoh_serial(html)
+                if serial:
+                    logger.info(f"✅ Found Ricoh serial: {serial} for {ip}")
+                    return serial
+                logger.debug(f"   ⚠️  No se encontró patrón de serial en {path}")
             
-            loop = asyncio.get_event_loop()
-            
-            def fetch_serial():
-                try:
-                    # Try to access device information page
-                    # Common Ricoh paths for device info
-                    paths = [
-                        "/web/guest/es/websys/status/configuration.cgi",
-                        "/web/guest/en/websys/status/configuration.cgi",
-                        "/web/guest/es/websys/webArch/mainFrame.cgi",
-                    ]
-                    
-                    print(f"   Probando {len(paths)} rutas para obtener serial de {ip}...")
-                    
-                    for path in paths:
-                        try:
-                            url = f"http://{ip}{path}"
-                            print(f"   Intentando: {url}")
-                            response = requests.get(url, timeout=3)
-                            
-                            if response.status_code == 200:
-                                print(f"   ✅ Respuesta OK de {path}")
-                                
-                                # Look for "ID máquina" or "Machine ID" patterns
-                                # Pattern 1: ID máquina: E174M210096
-                                match = re.search(r'ID\s+m[áa]quina[:\s]+([A-Z0-9]+)', response.text, re.IGNORECASE)
-                                if match:
-                                    serial = match.group(1).strip()
-                                    print(f"✅ Found Ricoh serial (ID máquina): {serial} for {ip}")
-                                    return serial
-                                
-                                # Pattern 2: Machine ID: E174M210096
-                                match = re.search(r'Machine\s+ID[:\s]+([A-Z0-9]+)', response.text, re.IGNORECASE)
-                                if match:
-                                    serial = match.group(1).strip()
-                                    print(f"✅ Found Ricoh serial (Machine ID): {serial} for {ip}")
-                                    return serial
-                                
-                                # Pattern 3: Serial Number in HTML
-                                match = re.search(r'Serial\s+Number[:\s]+([A-Z0-9]+)', response.text, re.IGNORECASE)
-                                if match:
-                                    serial = match.group(1).strip()
-                                    print(f"✅ Found Ricoh serial (Serial Number): {serial} for {ip}")
-                                    return serial
-                                
-                                # Pattern 4: Try parsing with BeautifulSoup for structured data
-                                soup = BeautifulSoup(response.text, 'html.parser')
-                                
-                                # Look for table cells or divs containing "ID máquina"
-                                for element in soup.find_all(['td', 'div', 'span']):
-                                    text = element.get_text(strip=True)
-                                    if 'ID máquina' in text or 'Machine ID' in text:
-                                        # Try to find the value in next sibling or same element
-                                        next_elem = element.find_next_sibling()
-                                        if next_elem:
-                                            serial_text = next_elem.get_text(strip=True)
-                                            match = re.search(r'([A-Z0-9]{10,})', serial_text)
-                                            if match:
-                                                serial = match.group(1)
-                                                print(f"✅ Found Ricoh serial (parsed): {serial} for {ip}")
-                                                return serial
-                                
-                                print(f"   ⚠️  No se encontró patrón de serial en {path}")
-                            else:
-                                print(f"   ❌ Status {response.status_code} en {path}")
-                        except Exception as e:
-                            print(f"   ❌ Error en {path}: {e}")
-                            continue
-                    
-                    print(f"⚠️  No serial number found for {ip} después de probar todas las rutas")
-                    return None
-                            
-                except Exception as e:
-                    print(f"❌ Error fetching serial from {ip}: {e}")
-                    return None
-            
-            serial = await loop.run_in_executor(None, fetch_serial)
-            return serial
+            logger.info(f"⚠️  No serial number found for {ip} después de probar todas las rutas")
+            return None
             
         except Exception as e:
-            print(f"❌ Error in get_ricoh_serial for {ip}: {e}")
+            logger.error(f"❌ Error in get_ricoh_serial for {ip}: {e}")
             return None
     
     async def get_ricoh_hostname(self, ip: str) -> Optional[str]:
@@ -187,117 +475,41 @@ class NetworkScanner:
             Hostname if found, None otherwise
         """
         try:
-            import requests
-            import re
-            
-            loop = asyncio.get_event_loop()
+            for path, timeout, parser in HOSTNAME_SOURCES:
+                html = await self._fetch_text(f"http://{ip}{path}", timeout=timeout)
+                if html is None:
+                    continue
+                hostname = parser(html, ip)
+                if hostname:
+                    logger.info(f"✅ Found hostname: {hostname} for {ip} ({path or '/'})")
+                    return hostname
             
-            def fetch_hostname():
-                try:
-                    # Try Ricoh mainFrame first (fastest for Ricoh printers)
-                    try:
-                        response = requests.get(f"http://{ip}/web/guest/es/websys/webArch/mainFrame.cgi", timeout=3)
-                        if response.status_code == 200:
-                            match = re.search(r'<title>\s*([A-Z0-9]+)\s*-\s*Web Image Monitor\s*</title>', response.text, re.IGNORECASE)
-                            if match:
-                                hostname = match.group(1).strip()
-                                print(f"✅ Found Ricoh hostname: {hostname} for {ip}")
-                                return hostname
-                    except:
-                        pass
-                    
-                    # Try Kyocera Start_Wlm.htm
-                    try:
-                        response = requests.get(f"http://{ip}/startwlm/Start_Wlm.htm", timeout=10)
-                        if response.status_code == 200:
-                            # Use the same pattern as debug script - group(2) is hostname
-                            match = re.search(r'HeaderStatusPC\s*\(\s*"([^"]*)"\s*,\s*"([A-Z0-9]+)"\s*,', response.text, re.IGNORECASE)
-                            if match:
-                                hostname = match.group(2).strip()
-                                print(f"✅ Found Kyocera hostname: {hostname} for {ip}")
-                                return hostname
-                    except:
-                        pass
-                    
-                    # Try Kyocera index.html (fallback for some models)
-                    try:
-                        response = requests.get(f"http://{ip}/index.html", timeout=10)
-                        if response.status_code == 200:
-                            # Use the same pattern as debug script
-                            match = re.search(r'HeaderStatusPC\s*\(\s*"([^"]*)"\s*,\s*"([A-Z0-9]+)"\s*,', response.text, re.IGNORECASE)
-                            if match:
-                                hostname = match.group(2).strip()  # group(2) is the hostname
-                                print(f"✅ Found Kyocera hostname in index.html: {hostname} for {ip}")
-                                return hostname
-                    except:
-                        pass
-                    
-                    # Try Kyocera Device_Config.model.htm (for newer Kyocera models)
-                    try:
-                        response = requests.get(f"http://{ip}/js/jssrc/model/startwlm/Device_Config.model.htm", timeout=3)
-                        if response.status_code == 200:
-                            # Look for hostname patterns in JavaScript
-                            match = re.search(r'["\']?hostname["\']?\s*[:=]\s*["\']([A-Z0-9]+)["\']', response.text, re.IGNORECASE)
-                            if match:
-                                hostname = match.group(1).strip()
-                                print(f"✅ Found Kyocera hostname in Device_Config: {hostname} for {ip}")
-                                return hostname
-                            # Look for KM pattern
-                            match = re.search(r'KM[A-F0-9]{6,12}', response.text, re.IGNORECASE)
-                            if match:
-                                hostname = match.group(0)
-                                print(f"✅ Found Kyocera pattern in Device_Config: {hostname} for {ip}")
-                                return hostname
-                    except:
-                        pass
-                    
-                    # Fallback: check root page for Kyocera
-                    try:
-                        response = requests.get(f"http://{ip}", timeout=3)
-                        if response.status_code == 200:
-                            # Check if it's Kyocera
-                            if 'KYOCERA' in response.text.upper():
-                                # Try to find KM pattern
-                                match = re.search(r'KM[A-F0-9]{6,12}', response.text, re.IGNORECASE)
-                                if match:
-                                    hostname = match.group(0)
-                                    print(f"✅ Found Kyocera pattern: {hostname} for {ip}")
-                                    return hostname
-                                # If no pattern found, use descriptive name
-                                hostname = f"Kyocera-{ip.replace('.', '-')}"
-                                print(f"✅ Detected Kyocera: {hostname} for {ip}")
-                                return hostname
-                    except:
-                        pass
-                    
-                    print(f"⚠️  No hostname found for {ip}")
-                            
-                except Exception as e:
-                    print(f"❌ Error fetching hostname from {ip}: {e}")
-                return None
-            
-            hostname = await loop.run_in_executor(None, fetch_hostname)
-            return hostname
+            logger.info(f"⚠️  No hostname found for {ip}")
+            return None
             
         except Exception as e:
-            print(f"❌ Error in get_ricoh_hostname for {ip}: {e}")
+            logger.error(f"❌ Error in get_ricoh_hostname for {ip}: {e}")
             return None
     
-    async def detect_printer(self, ip: str) -> Tuple[bool, Optional[Dict]]:
+    async def detect_printer(self, ip: str, ports: Optional[Dict[int, bool]] = None) -> Tuple[bool, Optional[Dict]]:
         """
         Detect if device is a printer by checking printer-specific indicators
         
         Args:
             ip: IP address to check
+            ports: Result of probe_ports when already known
             
         Returns:
             Tuple of (is_printer, device_info)
         """
         # Check common printer ports
-        http_open = await self.check_port(ip, 80)      # Web interface
-        https_open = await self.check_port(ip, 443)    # Secure web interface
-        snmp_open = await self.check_port(ip, 161)     # SNMP management
-        raw_print = await self.check_port(ip, 9100)    # Raw printing (JetDirect) - PRINTER SPECIFIC
+        if ports is None:
+            ports = await self.probe_ports(ip)
+            if ports is None:
+                return False, None
+        http_open = ports.get(80, False)      # Web interface
+        https_open = ports.get(443, False)    # Secure web interface
+        raw_print = ports.get(9100, False)    # Raw printing (JetDirect) - PRINTER SPECIFIC
         
         # Get hostname for identification
         # Try DNS resolution first (most reliable for Windows networks)
@@ -318,8 +530,7 @@ class NetworkScanner:
             hostname_lower = hostname.lower()
             
             # Printer keywords - must match at least one
-            printer_keywords = ['ricoh', 'printer', 'print', 'mfp', 'copier', 'mp', 'sp', 'im', 'laserjet', 'deskjet']
-            has_printer_keyword = any(keyword in hostname_lower for keyword in printer_keywords)
+            has_printer_keyword = any(keyword in hostname_lower for keyword in PRINTER_KEYWORDS)
             
             if has_printer_keyword:
                 is_printer = True
@@ -392,19 +603,12 @@ class NetworkScanner:
                         
                 except Exception as e:
                     # SNMP failed, continue with basic detection
-                    print(f"SNMP query failed for {ip}: {str(e)}")
+                    logger.warning(f"SNMP query failed for {ip}: {str(e)}")
             
             # If SNMP didn't get serial, try web interface (Ricoh only)
             if not serial_number and 'ricoh' in model.lower():
-                try:
-                    print(f"🔍 Intentando obtener serial desde web para {ip}...")
-                    serial_number = await self.get_ricoh_serial(ip)
-                    if serial_number:
-                        print(f"✅ Serial obtenido: {serial_number}")
-                    else:
-                        print(f"⚠️  No se pudo obtener serial desde web para {ip}")
-                except Exception as e:
-                    print(f"❌ Web serial query failed for {ip}: {str(e)}")
+                logger.debug(f"🔍 Intentando obtener serial desde web para {ip}...")
+                serial_number = await self.get_ricoh_serial(ip)
             
             # Use detected hostname, or fallback to generic name only if no hostname found
             final_hostname = hostname if hostname else f"printer-{ip.replace('.', '-')}"
@@ -428,6 +632,28 @@ class NetworkScanner:
         
         return False, None
     
+    async def _scan_host(self, ip: str, use_cache: bool = True) -> Tuple[str, Optional[Dict]]:
+        """
+        Probe a host and fingerprint it unless the cache still matches
+
+        Returns:
+            (outcome, device_info) - outcome is 'dead', 'cached' or 'probed'
+        """
+        ports = await self.probe_ports(ip)
+        if ports is None:
+            return 'dead', None
+
+        signature = port_signature(ports)
+        if use_cache:
+            hit, device_info = self.cache.get(ip, signature)
+            if hit:
+                return 'cached', device_info
+
+        is_printer, device_info = await self.detect_printer(ip, ports)
+        device_info = device_info if is_printer else None
+        self.cache.set(ip, signature, device_info)
+        return 'probed', device_info
+    
     async def scan_single_ip(self, ip: str) -> Optional[Dict]:
         """
         Scan a single IP address
@@ -438,47 +664,65 @@ class NetworkScanner:
         Returns:
             Device info dict if printer found, None otherwise
         """
-        is_printer, device_info = await self.detect_printer(ip)
-        return device_info if is_printer else None
+        _, device_info = await self._scan_host(ip)
+        return device_info
     
-    async def scan_network(self, ip_range: str, max_concurrent: int = 50) -> List[Dict]:
+    async def scan_network(
+        self,
+        ip_range: Union[str, Iterable[str]],
+        max_concurrent: Optional[int] = None
+    ) -> List[Dict]:
         """
-        Scan a network range for printers
+        Scan one or more network ranges for printers
         
         Args:
-            ip_range: CIDR notation IP range (e.g., 192.168.1.0/24)
-            max_concurrent: Maximum concurrent scans
+            ip_range: CIDR range (e.g., 192.168.1.0/24), comma separated list
+                of ranges or iterable of ranges
+            max_concurrent: Hosts probed at once across all ranges
+                (NETWORK_SCAN_MAX_CONCURRENCY by default)
             
         Returns:
-            List of discovered printer devices
+            List of discovered printer devices, in address order
+
+        Raises:
+            ValueError: If the ranges are invalid or exceed the address limit
         """
-        network = ipaddress.ip_network(ip_range, strict=False)
-        
-        # Limit scan to reasonable subnet sizes
-        if network.num_addresses > 256:
-            raise ValueError("IP range too large. Maximum 256 addresses (/24 subnet)")
+        hosts = expand_ip_ranges(ip_range, self.config.max_addresses)
         
-        # Create semaphore to limit concurrent connections
-        semaphore = asyncio.Semaphore(max_concurrent)
+        # One budget for the whole scan, whatever the number of subnets
+        semaphore = asyncio.Semaphore(max_concurrent or self.config.max_concurrency)
         
         async def scan_with_semaphore(ip: str):
             async with semaphore:
-                return await self.scan_single_ip(ip)
-        
-        # Create tasks for all IPs in range
-        tasks = [scan_with_semaphore(str(ip)) for ip in network.hosts()]
+                return await self._scan_host(ip)
         
-        # Execute all scans concurrently
-        results = await asyncio.gather(*tasks)
+        start = time.monotonic()
+        async with self._http_session():
+            results = await asyncio.gather(*(scan_with_semaphore(ip) for ip in hosts))
         
-        # Filter out None results
-        devices = [device for device in results if device is not None]
+        outcomes = [outcome for outcome, _ in results]
+        devices = [device for _, device in results if device is not None]
+        self.last_scan_stats = {
+            'hosts': len(hosts),
+            'alive': len(hosts) - outcomes.count('dead'),
+            'cached': outcomes.count('cached'),
+            'fingerprinted': outcomes.count('probed'),
+            'found': len(devices)
+        }
+        logger.info(
+            f"🔍 Escaneo de {len(hosts)} IPs en {time.monotonic() - start:.1f}s: "
+            f"{self.last_scan_stats['alive']} activas, {self.last_scan_stats['cached']} desde caché, "
+            f"{len(devices)} impresoras"
+        )
         
         return devices
 
     async def check_single_device(self, ip: str, snmp_port: int = 161) -> Optional[Dict]:
         """
         Check a single device by IP and return printer information
+
+        Always fingerprints the device (bypassing the cache) and refreshes
+        its cache entry.
         
         Args:
             ip: IP address to check
@@ -488,14 +732,18 @@ class NetworkScanner:
             Device information dict if it's a printer, None otherwise
         """
         try:
-            # Check if device is reachable on port 80 (web interface)
-            is_reachable = await self.check_port(ip, 80)
-            
-            if not is_reachable:
-                return None
+            async with self._http_session():
+                ports = await self.probe_ports(ip)
+                
+                # Check if device is reachable on port 80 (web interface)
+                if not ports or not ports.get(80):
+                    return None
+                
+                # Try to detect if it's a printer
+                is_printer, device_info = await self.detect_printer(ip, ports)
             
-            # Try to detect if it's a printer
-            is_printer, device_info = await self.detect_printer(ip)
+            signature = port_signature(ports)
+            self.cache.set(ip, signature, device_info if is_printer else None)
             
             if is_printer and device_info:
                 return device_info
@@ -503,5 +751,5 @@ class NetworkScanner:
             return None
             
         except Exception as e:
-            print(f"Error checking device {ip}: {e}")
+            logger.error(f"Error checking device {ip}: {e}")
             return None
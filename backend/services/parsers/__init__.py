@@ -2,17 +2,24 @@
 Parsers para impresoras Ricoh
 """
 from .counter_parser import get_printer_counters
-from .user_counter_parser import get_all_user_counters, get_user_counters
-from .eco_counter_parser import get_all_eco_users, get_eco_counter
+from .user_counter_parser import get_all_user_counters, get_user_counters, fetch_all_user_counters
+from .eco_counter_parser import get_all_eco_users, get_eco_counter, fetch_all_eco_users
+from .page_fetcher import page_fetch_metrics
 from .ricoh_auth import RicohAuthService
+from .ricoh_session import RicohSessionManager, ricoh_session_manager
 from .toner_parser import get_printer_toner_levels
 
 __all__ = [
     'get_printer_counters',
     'get_all_user_counters',
     'get_user_counters',
+    'fetch_all_user_counters',
     'get_all_eco_users',
     'get_eco_counter',
+    'fetch_all_eco_users',
+    'page_fetch_metrics',
     'RicohAuthService',
+    'RicohSessionManager',
+    'ricoh_session_manager',
     'get_printer_toner_levels',
 ]
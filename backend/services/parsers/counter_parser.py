@@ -3,26 +3,37 @@
 Parser de Contadores Ricoh
 Extrae datos estructurados del HTML de contadores
 """
-import requests
-from bs4 import BeautifulSoup
+from collections import deque
+from bs4 import NavigableString, Tag
 import json
 import urllib3
-from .ricoh_auth import RicohAuthService
+from .ricoh_session import ricoh_session_manager
+from .html_parsing import make_soup
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 PRINTER_IP = "192.168.91.251"
 
+# Cantidad de textos previos a cada fila que se revisan para detectar la sección
+SECTION_CONTEXT_WINDOW = 20
+
 
 def parse_counter_html(html_content):
     """
     Parsea el HTML de contadores y extrae datos estructurados
     Usa análisis de contexto para detectar secciones correctamente
     
+    El documento se recorre una sola vez en orden; para cada fila se revisan
+    los últimos SECTION_CONTEXT_WINDOW textos que la preceden (equivalente a
+    find_all_previous(string=True, limit=20) sin recorrer hacia atrás por fila)
+    
+    Args:
+        html_content: HTML de la página o BeautifulSoup ya parseado
+    
     Returns:
         dict con estructura de contadores
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = make_soup(html_content)
     
     counters = {
         'total': 0,
@@ -58,13 +69,10 @@ def parse_counter_html(html_content):
         }
     }
     
-    # Buscar todas las filas staticProp
-    rows = soup.find_all('tr', class_='staticProp')
-    
     # Variable para rastrear la sección actual
     current_section = None
     
-    for row in rows:
+    for row, previous_texts in _iter_static_rows(soup):
         cells = row.find_all('td')
         
         # Las filas tienen 5 celdas: ['', 'Label', ':', 'Value', '']
@@ -91,7 +99,7 @@ def parse_counter_html(html_content):
         # Buscar el elemento de texto inmediatamente anterior que contenga nombre de sección
         # Buscar en los elementos previos cercanos
         prev_strings = []
-        for elem in row.find_all_previous(string=True, limit=20):
+        for elem in reversed(previous_texts):
             text = str(elem).strip()
             if text:
                 prev_strings.append(text)
@@ -172,6 +180,20 @@ def parse_counter_html(html_content):
     return counters
 
 
+def _iter_static_rows(soup):
+    """
+    Recorre el documento una vez y entrega cada fila tr.staticProp junto con
+    los textos que la preceden (ventana acotada, del más lejano al más cercano)
+    """
+    previous_texts = deque(maxlen=SECTION_CONTEXT_WINDOW)
+    
+    for node in soup.descendants:
+        if isinstance(node, NavigableString):
+            previous_texts.append(node)
+        elif isinstance(node, Tag) and node.name == 'tr' and 'staticProp' in (node.get('class') or []):
+            yield node, tuple(previous_texts)
+
+
 def get_printer_counters(printer_ip=PRINTER_IP):
     """
     Obtiene los contadores de la impresora
@@ -179,18 +201,13 @@ def get_printer_counters(printer_ip=PRINTER_IP):
     Returns:
         dict con contadores estructurados
     """
-    session = requests.Session()
-    session.verify = False
-    
-    # Login usando servicio unificado
-    RicohAuthService.login_to_printer(session, printer_ip)
-    
-    # Obtener contadores
+    # Obtener contadores con la sesión autenticada compartida
     counter_url = f"http://{printer_ip}/web/entry/es/websys/status/getUnificationCounter.cgi"
-    resp = session.get(counter_url, timeout=10)
-    
-    if resp.status_code != 200:
-        raise Exception(f"Error al obtener contadores: {resp.status_code}")
+    with ricoh_session_manager.session(printer_ip) as session:
+        resp = session.get(counter_url, timeout=10)
+        
+        if resp.status_code != 200:
+            raise Exception(f"Error al obtener contadores: {resp.status_code}")
     
     # Parsear HTML
     counters = parse_counter_html(resp.text)
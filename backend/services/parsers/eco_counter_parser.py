@@ -4,12 +4,11 @@ Parser de Contador Ecológico - Ricoh
 Extrae datos del contador ecológico (getEcoCounter.cgi)
 Usado en impresoras que no tienen getUserCounter.cgi
 """
-import requests
-import re
-from bs4 import BeautifulSoup
 import json
 import urllib3
-from .ricoh_auth import RicohAuthService
+from .ricoh_session import ricoh_session_manager
+from .html_parsing import make_soup, extract_pagination
+from .page_fetcher import PagedCounterFetcher
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -17,12 +16,15 @@ def parse_eco_counter_html(html_content):
     """
     Parsea el HTML del contador ecológico
     
+    Args:
+        html_content: HTML de la página o BeautifulSoup ya parseado
+    
     Returns:
         dict con:
             - device_total: contadores totales del dispositivo
             - users: lista de usuarios con sus contadores ecológicos
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = make_soup(html_content)
     
     result = {
         'device_total': {},
@@ -105,12 +107,6 @@ def get_eco_counter(printer_ip, offset=0, count=10):
     Returns:
         dict con device_total y users
     """
-    session = requests.Session()
-    session.verify = False
-    
-    # Login usando servicio unificado
-    RicohAuthService.login_to_printer(session, printer_ip)
-    
     # Obtener contador ecológico
     counter_url = f"http://{printer_ip}/web/entry/es/websys/getEcoCounter.cgi"
     
@@ -120,31 +116,21 @@ def get_eco_counter(printer_ip, offset=0, count=10):
         'userCounterListCount': count
     }
     
-    resp = session.post(counter_url, data=data, timeout=10)
-    
-    if resp.status_code != 200:
-        raise Exception(f"Error al obtener contador ecológico: {resp.status_code}")
-    
-    # Parsear HTML
-    result = parse_eco_counter_html(resp.text)
-    
-    # Extraer información de paginación
-    soup = BeautifulSoup(resp.text, 'html.parser')
-    
-    # Total de usuarios
-    total_users_text = soup.find(text=re.compile(r'Usuario\s+\d+'))
-    total_users = 0
-    if total_users_text:
-        match = re.search(r'Usuario\s+(\d+)', total_users_text)
-        if match:
-            total_users = int(match.group(1))
+    # Sesión autenticada compartida (solo hace login si no hay una vigente)
+    with ricoh_session_manager.session(printer_ip) as session:
+        resp = session.post(counter_url, data=data, timeout=10)
+        
+        if resp.status_code != 200:
+            raise Exception(f"Error al obtener contador ecológico: {resp.status_code}")
     
-    # Página actual y total de páginas
-    current_page_span = soup.find('span', id='span_currentPage')
-    total_page_span = soup.find('span', id='span_totalPage')
+    # Parsear HTML una sola vez: filas y paginación salen del mismo árbol
+    soup = make_soup(resp.text)
+    result = parse_eco_counter_html(soup)
+    pagination = extract_pagination(soup)
     
-    current_page = int(current_page_span.get_text(strip=True)) if current_page_span else 1
-    total_pages = int(total_page_span.get_text(strip=True)) if total_page_span else 1
+    total_users = pagination['total_users']
+    current_page = pagination['current_page'] if pagination['current_page'] is not None else 1
+    total_pages = pagination['total_pages'] if pagination['total_pages'] is not None else 1
     
     result['page_info'] = {
         'current_page': current_page,
@@ -157,63 +143,53 @@ def get_eco_counter(printer_ip, offset=0, count=10):
     
     return result
 
-def get_all_eco_users(printer_ip):
-    """
-    Obtiene TODOS los usuarios del contador ecológico (todas las páginas)
-    
-    Returns:
-        dict con device_total y lista completa de users
-    """
-    session = requests.Session()
-    session.verify = False
-    RicohAuthService.login_to_printer(session, printer_ip)
-    
-    all_users = []
-    device_total = {}
-    offset = 0
-    count = 20  # Obtener 20 por página
+def _request_eco_counter_page(printer_ip):
+    counter_url = f"http://{printer_ip}/web/entry/es/websys/getEcoCounter.cgi"
     
-    while True:
-        counter_url = f"http://{printer_ip}/web/entry/es/websys/getEcoCounter.cgi"
+    def request_page(session, offset, count):
         data = {
             'userCounterListOffset': offset,
             'userCounterListCount': count
         }
-        
-        resp = session.post(counter_url, data=data, timeout=10)
-        
-        if resp.status_code != 200:
-            break
-        
-        result = parse_eco_counter_html(resp.text)
-        
-        # Guardar device_total de la primera página
-        if offset == 0:
-            device_total = result['device_total']
-        
-        if not result['users']:
-            break
-        
-        all_users.extend(result['users'])
-        
-        # Verificar si hay más páginas
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        current_page_span = soup.find('span', id='span_currentPage')
-        total_page_span = soup.find('span', id='span_totalPage')
-        
-        if current_page_span and total_page_span:
-            current_page = int(current_page_span.get_text(strip=True))
-            total_pages = int(total_page_span.get_text(strip=True))
-            
-            if current_page >= total_pages:
-                break
-        
-        offset += count
+        return session.post(counter_url, data=data, timeout=10)
+    
+    return request_page
+
+def fetch_all_eco_users(printer_ip, page_size=None):
+    """
+    Obtiene TODOS los usuarios del contador ecológico con paginación adaptativa
+    
+    Args:
+        printer_ip: IP de la impresora
+        page_size: Usuarios por página conocidos para esta impresora (None = sondear)
+    
+    Returns:
+        Tupla (dict con device_total y users, PageFetchStats)
+    """
+    fetcher = PagedCounterFetcher(
+        printer_ip,
+        request_page=_request_eco_counter_page(printer_ip),
+        parse_page=parse_eco_counter_html,
+        count_rows=lambda result: len(result['users']),
+        session_manager=ricoh_session_manager
+    )
+    pages, stats = fetcher.fetch_all(page_size)
     
     return {
-        'device_total': device_total,
-        'users': all_users
-    }
+        # device_total viene en la primera página
+        'device_total': pages[0]['device_total'] if pages else {},
+        'users': [user for page in pages for user in page['users']]
+    }, stats
+
+def get_all_eco_users(printer_ip, page_size=None):
+    """
+    Obtiene TODOS los usuarios del contador ecológico (todas las páginas)
+    
+    Returns:
+        dict con device_total y lista completa de users
+    """
+    data, _ = fetch_all_eco_users(printer_ip, page_size)
+    return data
 
 if __name__ == "__main__":
     PRINTER_IP = "192.168.91.253"  # Impresora que usa contador ecológico
@@ -0,0 +1,77 @@
+"""
+Utilidades de parseo HTML compartidas por los parsers Ricoh
+Cada respuesta se parsea una sola vez con el backend más rápido disponible
+(lxml si está instalado, html.parser en caso contrario) y la paginación se
+extrae del mismo árbol que ya se usó para las filas
+"""
+import os
+import re
+from typing import Dict, Optional
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# RICOH_HTML_PARSER permite forzar un backend concreto (p.ej. html.parser)
+DEFAULT_HTML_PARSER = os.getenv(
+    'RICOH_HTML_PARSER',
+    'lxml' if LXML_AVAILABLE else 'html.parser'
+)
+
+_TOTAL_USERS_RE = re.compile(r'Usuario\s+(\d+)')
+
+
+def make_soup(html_content, parser: Optional[str] = None) -> BeautifulSoup:
+    """
+    Parsea el HTML una única vez
+
+    Args:
+        html_content: HTML en texto o un BeautifulSoup ya parseado (se reutiliza)
+        parser: Backend de BeautifulSoup; por defecto DEFAULT_HTML_PARSER
+
+    Returns:
+        BeautifulSoup listo para consultar
+    """
+    if isinstance(html_content, BeautifulSoup):
+        return html_content
+    return BeautifulSoup(html_content, parser or DEFAULT_HTML_PARSER)
+
+
+def extract_pagination(soup: BeautifulSoup) -> Dict[str, Optional[int]]:
+    """
+    Extrae la información de paginación de una página de contadores
+
+    Returns:
+        dict con:
+            - current_page: página actual (None si no aparece)
+            - total_pages: total de páginas (None si no aparece)
+            - total_users: total de usuarios registrados (0 si no aparece)
+    """
+    total_users = 0
+    total_users_text = soup.find(string=_TOTAL_USERS_RE)
+    if total_users_text:
+        match = _TOTAL_USERS_RE.search(total_users_text)
+        if match:
+            total_users = int(match.group(1))
+
+    current_page_span = soup.find('span', id='span_currentPage')
+    total_page_span = soup.find('span', id='span_totalPage')
+
+    return {
+        'current_page': int(current_page_span.get_text(strip=True)) if current_page_span else None,
+        'total_pages': int(total_page_span.get_text(strip=True)) if total_page_span else None,
+        'total_users': total_users
+    }
+
+
+def is_last_page(pagination: Dict[str, Optional[int]]) -> bool:
+    """Indica si la paginación reporta que no hay más páginas"""
+    current_page = pagination['current_page']
+    total_pages = pagination['total_pages']
+    if current_page is None or total_pages is None:
+        return False
+    return current_page >= total_pages
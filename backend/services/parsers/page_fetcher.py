@@ -0,0 +1,275 @@
+"""
+Descarga paginada de contadores por usuario - Ricoh
+Aprende el tamaño de página máximo que acepta cada impresora, obtiene el
+total de páginas con la primera respuesta y descarga el resto con un
+pipeline acotado de peticiones sobre una sola sesión del pool
+"""
+import itertools
+import os
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .html_parsing import make_soup, extract_pagination, is_last_page
+from .ricoh_session import RicohSessionLease, ricoh_session_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20  # Tamaño que aceptan todos los modelos
+MAX_PAGES = 500  # Salvaguarda cuando la impresora no informa la paginación
+
+
+@dataclass
+class PageFetchConfig:
+    """Configuración de la descarga paginada"""
+    probe_page_size: int = 100  # Tamaño pedido cuando aún no se conoce el de la impresora
+    pipeline_depth: int = 2  # Páginas descargadas en paralelo tras la primera
+
+
+def load_page_fetch_config_from_env() -> PageFetchConfig:
+    """Carga la configuración de descarga paginada desde variables de entorno"""
+    try:
+        config = PageFetchConfig(
+            probe_page_size=int(os.getenv('RICOH_PROBE_PAGE_SIZE', '100')),
+            pipeline_depth=int(os.getenv('RICOH_PAGE_PIPELINE_DEPTH', '2'))
+        )
+
+        if config.probe_page_size < DEFAULT_PAGE_SIZE:
+            logger.warning(f"Invalid RICOH_PROBE_PAGE_SIZE ({config.probe_page_size}), using default 100")
+            config.probe_page_size = 100
+
+        if config.pipeline_depth <= 0:
+            logger.warning(f"Invalid RICOH_PAGE_PIPELINE_DEPTH ({config.pipeline_depth}), using default 2")
+            config.pipeline_depth = 2
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading page fetch configuration from environment: {e}, using defaults")
+        return PageFetchConfig()
+
+
+@dataclass
+class PageFetchStats:
+    """Resultado de una descarga paginada"""
+    printer_ip: str
+    page_size: int  # Tamaño de página efectivo usado
+    learned_page_size: Optional[int] = None  # Tamaño confirmado por la impresora (para cachear)
+    pages: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    # Faltan páginas: una falló (error, no 200 o vacía) antes del total que
+    # informó la impresora; la lista de usuarios no se debe guardar como completa
+    incomplete: bool = False
+
+    @property
+    def pages_per_second(self) -> float:
+        return round(self.pages / self.seconds, 2) if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['pages_per_second'] = self.pages_per_second
+        return data
+
+
+class PageFetchMetrics:
+    """Última descarga paginada por impresora (páginas / segundos)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_printer: Dict[str, Dict] = {}
+
+    def record(self, stats: PageFetchStats) -> None:
+        with self._lock:
+            previous = self._by_printer.get(stats.printer_ip, {})
+            entry = stats.to_dict()
+            entry['fetches'] = previous.get('fetches', 0) + 1
+            self._by_printer[stats.printer_ip] = entry
+
+    def get_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {ip: dict(entry) for ip, entry in self._by_printer.items()}
+
+
+# Singleton instance
+page_fetch_metrics = PageFetchMetrics()
+
+
+class PagedCounterFetcher:
+    """
+    Descarga todas las páginas de un listado de contadores por usuario
+
+    Args:
+        printer_ip: IP de la impresora
+        request_page: Función (lease, offset, count) -> Response que pide una página
+        parse_page: Función (soup) -> resultado parseado de la página
+        count_rows: Función (resultado) -> cantidad de usuarios en la página
+    """
+
+    def __init__(
+        self,
+        printer_ip: str,
+        request_page: Callable[[RicohSessionLease, int, int], Any],
+        parse_page: Callable[[Any], Any],
+        count_rows: Callable[[Any], int] = len,
+        config: Optional[PageFetchConfig] = None,
+        session_manager=None
+    ):
+        self.printer_ip = printer_ip
+        self.request_page = request_page
+        self.parse_page = parse_page
+        self.count_rows = count_rows
+        self.config = config or load_page_fetch_config_from_env()
+        self.session_manager = session_manager or ricoh_session_manager
+
+    def _fetch(self, offset: int, count: int) -> Optional[Tuple[Any, Dict]]:
+        """Descarga y parsea una página; None si la impresora no respondió 200"""
+        with self.session_manager.session(self.printer_ip) as lease:
+            resp = self.request_page(lease, offset, count)
+        return self._parse(resp)
+
+    def _parse(self, resp) -> Optional[Tuple[Any, Dict]]:
+        if resp.status_code != 200:
+            return None
+
+        soup = make_soup(resp.text)
+        return self.parse_page(soup), extract_pagination(soup)
+
+    def _fetch_with_lease(self, lease: RicohSessionLease, offset: int, count: int) -> Optional[Tuple[Any, Dict]]:
+        """Como _fetch pero sobre una sesión ya prestada; None también si la petición falla"""
+        try:
+            return self._parse(self.request_page(lease, offset, count))
+        except Exception as e:
+            logger.warning(f"⚠️ {self.printer_ip}: error en la página con offset {offset}: {e}")
+            return None
+
+    def fetch_all(self, page_size: Optional[int] = None) -> Tuple[List[Any], PageFetchStats]:
+        """
+        Descarga todas las páginas en orden
+
+        Args:
+            page_size: Tamaño de página conocido (cacheado) o None para sondear
+
+        Returns:
+            Tupla (páginas parseadas en orden, PageFetchStats). Si falta alguna
+            página, stats.incomplete es True y las páginas son las anteriores a la falla
+        """
+        start = time.monotonic()
+        requested = page_size or self.config.probe_page_size
+        pages: List[Any] = []
+
+        first = self._fetch(0, requested)
+        if (first is None or self.count_rows(first[0]) == 0) and requested > DEFAULT_PAGE_SIZE:
+            # La impresora no acepta el tamaño pedido: volver al tamaño seguro
+            logger.info(f"📄 {self.printer_ip} no aceptó páginas de {requested}, usando {DEFAULT_PAGE_SIZE}")
+            requested = DEFAULT_PAGE_SIZE
+            first = self._fetch(0, requested)
+
+        stats = PageFetchStats(printer_ip=self.printer_ip, page_size=requested, incomplete=first is None)
+
+        if first is not None:
+            parsed, pagination = first
+            pages.append(parsed)
+            rows = self.count_rows(parsed)
+
+            if rows > 0 and not is_last_page(pagination):
+                # Hay más páginas: las filas recibidas son el máximo que entrega la impresora
+                stats.page_size = rows
+                stats.learned_page_size = rows
+
+                if pagination['current_page'] is not None and pagination['total_pages'] is not None:
+                    remaining = pagination['total_pages'] - pagination['current_page']
+                    rest, complete = self._fetch_pipelined(rows, min(remaining, MAX_PAGES))
+                else:
+                    rest, complete = self._fetch_sequential(rows)
+                pages.extend(rest)
+                stats.incomplete = not complete
+
+        stats.pages = len(pages)
+        stats.rows = sum(self.count_rows(p) for p in pages)
+        stats.seconds = round(time.monotonic() - start, 3)
+        page_fetch_metrics.record(stats)
+
+        logger.info(
+            f"📄 {self.printer_ip}: {stats.pages} páginas ({stats.rows} usuarios, "
+            f"{stats.page_size}/página) en {stats.seconds}s - {stats.pages_per_second} páginas/s"
+        )
+        if stats.incomplete:
+            logger.warning(f"⚠️ {self.printer_ip}: lectura paginada incompleta ({stats.pages} páginas recibidas)")
+        return pages, stats
+
+    def _fetch_pipelined(self, page_size: int, remaining: int) -> Tuple[List[Any], bool]:
+        """
+        Descarga las páginas restantes con una sola sesión (un solo login en la
+        impresora) y hasta pipeline_depth peticiones en curso, conservando el orden.
+        Solo se piden páginas nuevas mientras las anteriores llegan completas, así
+        un total de páginas exagerado por la impresora no genera peticiones de más
+
+        Returns:
+            Tupla (páginas, completa). Una página corta termina la lista; una
+            página fallida o vacía antes del total la deja incompleta
+        """
+        if remaining <= 0:
+            return [], True
+
+        offsets = iter([page_size * k for k in range(1, remaining + 1)])
+        workers = min(self.config.pipeline_depth, remaining)
+        pages = []
+        complete = False
+
+        try:
+            with self.session_manager.session(self.printer_ip) as lease, \
+                    ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ricoh-pages") as executor:
+                pending = deque(
+                    executor.submit(self._fetch_with_lease, lease, offset, page_size)
+                    for offset in itertools.islice(offsets, workers)
+                )
+                while pending:
+                    result = pending.popleft().result()
+                    # Cortar en la primera página fallida o vacía (incompleta) o corta (fin de la lista)
+                    rows = self.count_rows(result[0]) if result is not None else 0
+                    if rows == 0:
+                        break
+                    pages.append(result[0])
+                    if rows < page_size:
+                        complete = True
+                        break
+                    offset = next(offsets, None)
+                    if offset is not None:
+                        pending.append(executor.submit(self._fetch_with_lease, lease, offset, page_size))
+                else:
+                    # Llegaron todas las páginas que informó la impresora
+                    complete = True
+                for future in pending:
+                    future.cancel()
+        except Exception as e:
+            logger.warning(f"⚠️ {self.printer_ip}: lectura paginada interrumpida tras {len(pages)} páginas: {e}")
+            complete = False
+        return pages, complete
+
+    def _fetch_sequential(self, page_size: int) -> Tuple[List[Any], bool]:
+        """
+        Descarga página a página cuando la impresora no informa el total
+
+        Returns:
+            Tupla (páginas, completa); una página que no responde 200 la deja incompleta
+        """
+        pages = []
+        offset = page_size
+        while len(pages) < MAX_PAGES:
+            result = self._fetch(offset, page_size)
+            if result is None:
+                return pages, False
+            parsed, pagination = result
+            rows = self.count_rows(parsed)
+            if rows == 0:
+                break
+            pages.append(parsed)
+            if rows < page_size or is_last_page(pagination):
+                break
+            offset += page_size
+        return pages, True
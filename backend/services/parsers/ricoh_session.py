@@ -0,0 +1,293 @@
+"""
+Ricoh Session Manager
+Mantiene por impresora un pool de sesiones HTTP autenticadas (keep-alive)
+compartido por los parsers y RicohWebClient, para no repetir el login de
+Web Image Monitor en cada lectura
+"""
+import os
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional
+
+import requests
+import urllib3
+
+from .ricoh_auth import RicohAuthService
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8'
+}
+
+
+@dataclass
+class RicohSessionConfig:
+    """Configuración del pool de sesiones Ricoh"""
+    max_sessions_per_printer: int = 2  # WIM solo tolera pocas sesiones simultáneas
+    idle_timeout: float = 300.0  # Segundos sin uso tras los que se re-autentica
+    acquire_timeout: float = 60.0  # Espera máxima por una sesión libre
+
+
+def load_ricoh_session_config_from_env() -> RicohSessionConfig:
+    """Carga la configuración del pool de sesiones Ricoh desde variables de entorno"""
+    try:
+        config = RicohSessionConfig(
+            max_sessions_per_printer=int(os.getenv('RICOH_MAX_SESSIONS_PER_PRINTER', '2')),
+            idle_timeout=float(os.getenv('RICOH_SESSION_IDLE_TIMEOUT', '300.0')),
+            acquire_timeout=float(os.getenv('RICOH_SESSION_ACQUIRE_TIMEOUT', '60.0'))
+        )
+
+        if config.max_sessions_per_printer <= 0:
+            logger.warning(f"Invalid RICOH_MAX_SESSIONS_PER_PRINTER ({config.max_sessions_per_printer}), using default 2")
+            config.max_sessions_per_printer = 2
+
+        if config.idle_timeout <= 0:
+            logger.warning(f"Invalid RICOH_SESSION_IDLE_TIMEOUT ({config.idle_timeout}), using default 300.0")
+            config.idle_timeout = 300.0
+
+        if config.acquire_timeout <= 0:
+            logger.warning(f"Invalid RICOH_SESSION_ACQUIRE_TIMEOUT ({config.acquire_timeout}), using default 60.0")
+            config.acquire_timeout = 60.0
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading Ricoh session configuration from environment: {e}, using defaults")
+        return RicohSessionConfig()
+
+
+def create_http_session() -> requests.Session:
+    """Crea una sesión HTTP con las cabeceras usadas contra Web Image Monitor"""
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    session.verify = False
+    return session
+
+
+def is_session_expired(response) -> bool:
+    """
+    Indica si la respuesta de la impresora corresponde a una sesión caducada
+    (redirección al formulario de login o acceso denegado)
+    """
+    if response.status_code in (401, 403):
+        return True
+    url = response.url if isinstance(getattr(response, 'url', None), str) else ''
+    return 'authForm.cgi' in url or 'login.cgi' in url
+
+
+class RicohSessionExhausted(Exception):
+    """No se obtuvo una sesión libre para la impresora dentro del tiempo límite"""
+    pass
+
+
+class _PooledSession:
+    """Sesión HTTP del pool con su estado de autenticación"""
+
+    __slots__ = ('http', 'authenticated', 'last_used')
+
+    def __init__(self, http: requests.Session):
+        self.http = http
+        self.authenticated = False
+        self.last_used = 0.0
+
+
+class _PrinterPool:
+    """Sesiones de una impresora y semáforo que limita las simultáneas"""
+
+    def __init__(self, max_sessions: int):
+        self.slots = threading.BoundedSemaphore(max_sessions)
+        self.idle: deque = deque()
+        self.in_use = 0
+        self.generation = 0  # Se incrementa al invalidar; descarta sesiones antiguas
+
+
+class RicohSessionLease:
+    """
+    Sesión prestada por el pool para una impresora
+
+    Expone la sesión HTTP (`http`) y helpers get/post que detectan sesiones
+    caducadas y re-autentican una sola vez de forma transparente.
+    """
+
+    def __init__(self, manager: 'RicohSessionManager', printer_ip: str, pooled: _PooledSession):
+        self._manager = manager
+        self._pooled = pooled
+        self.printer_ip = printer_ip
+
+    @property
+    def http(self) -> requests.Session:
+        return self._pooled.http
+
+    def reauthenticate(self) -> None:
+        """Fuerza un nuevo login en esta sesión"""
+        self._manager._login(self.printer_ip, self._pooled, relogin=True)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        response = self.http.request(method, url, **kwargs)
+        if is_session_expired(response):
+            logger.info(f"🔄 Sesión WIM caducada en {self.printer_ip}, re-autenticando...")
+            self.reauthenticate()
+            response = self.http.request(method, url, **kwargs)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+
+class RicohSessionManager:
+    """
+    Pool de sesiones autenticadas por IP de impresora, seguro entre hilos
+
+    - Reutiliza sesiones keep-alive ya autenticadas (hit) y solo hace login
+      cuando no hay ninguna válida (miss)
+    - Re-autentica de forma perezosa tras `idle_timeout` o al detectar que
+      la impresora devolvió el formulario de login
+    - Limita las sesiones simultáneas por impresora
+    """
+
+    def __init__(
+        self,
+        config: Optional[RicohSessionConfig] = None,
+        login: Callable[[requests.Session, str], None] = None,
+        session_factory: Callable[[], requests.Session] = create_http_session
+    ):
+        self.config = config or load_ricoh_session_config_from_env()
+        self._login_func = login
+        self._session_factory = session_factory
+        self._pools: Dict[str, _PrinterPool] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'logins': 0, 'relogins': 0, 'login_errors': 0, 'shared': 0}
+
+    def _pool(self, printer_ip: str) -> _PrinterPool:
+        with self._lock:
+            pool = self._pools.get(printer_ip)
+            if pool is None:
+                pool = _PrinterPool(self.config.max_sessions_per_printer)
+                self._pools[printer_ip] = pool
+            return pool
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _login(self, printer_ip: str, pooled: _PooledSession, relogin: bool = False) -> None:
+        pooled.authenticated = False
+        pooled.http.cookies.clear()
+        login = self._login_func or RicohAuthService.login_to_printer
+        try:
+            login(pooled.http, printer_ip)
+        except Exception:
+            self._count('login_errors')
+            raise
+        pooled.authenticated = True
+        pooled.last_used = time.monotonic()
+        self._count('relogins' if relogin else 'logins')
+
+    @contextmanager
+    def session(self, printer_ip: str) -> Iterator[RicohSessionLease]:
+        """
+        Presta una sesión autenticada para la impresora
+
+        Usage:
+            with ricoh_session_manager.session(ip) as lease:
+                resp = lease.post(url, data=data, timeout=10)
+
+        Raises:
+            RicohSessionExhausted: Si no se libera una sesión a tiempo
+            Exception: Si el login falla
+        """
+        pool = self._pool(printer_ip)
+        if not pool.slots.acquire(timeout=self.config.acquire_timeout):
+            raise RicohSessionExhausted(
+                f"Sin sesiones libres para {printer_ip} "
+                f"(máximo {self.config.max_sessions_per_printer})"
+            )
+
+        with self._lock:
+            pooled = pool.idle.pop() if pool.idle else None
+            pool.in_use += 1
+            generation = pool.generation
+
+        healthy = False
+        try:
+            if pooled is None:
+                pooled = _PooledSession(self._session_factory())
+
+            expired = time.monotonic() - pooled.last_used > self.config.idle_timeout
+            if pooled.authenticated and not expired:
+                self._count('hits')
+            else:
+                self._count('misses')
+                self._login(printer_ip, pooled, relogin=pooled.authenticated)
+
+            yield RicohSessionLease(self, printer_ip, pooled)
+            pooled.last_used = time.monotonic()
+            healthy = True
+        finally:
+            with self._lock:
+                pool.in_use -= 1
+                if healthy and pooled is not None and generation == pool.generation:
+                    pool.idle.append(pooled)
+                elif pooled is not None:
+                    pooled.http.close()
+            pool.slots.release()
+
+    def share_cookies(self, printer_ip: str, target: requests.Session) -> bool:
+        """
+        Copia en `target` las cookies de una sesión autenticada y vigente del pool
+
+        Returns:
+            True si había una sesión reutilizable
+        """
+        pool = self._pool(printer_ip)
+        with self._lock:
+            now = time.monotonic()
+            for pooled in reversed(pool.idle):
+                if pooled.authenticated and now - pooled.last_used <= self.config.idle_timeout:
+                    target.cookies.update(pooled.http.cookies)
+                    self._stats['shared'] += 1
+                    return True
+        return False
+
+    def invalidate(self, printer_ip: str) -> None:
+        """Descarta las sesiones de la impresora (p.ej. tras un logout explícito)"""
+        with self._lock:
+            pool = self._pools.get(printer_ip)
+            if pool is None:
+                return
+            pool.generation += 1
+            while pool.idle:
+                pool.idle.pop().http.close()
+
+    def close_all(self) -> None:
+        """Cierra todas las sesiones del pool"""
+        with self._lock:
+            ips = list(self._pools)
+        for printer_ip in ips:
+            self.invalidate(printer_ip)
+
+    def get_stats(self) -> dict:
+        """Estadísticas de reutilización de sesiones"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['printers'] = len(self._pools)
+            stats['idle_sessions'] = sum(len(p.idle) for p in self._pools.values())
+            stats['active_sessions'] = sum(p.in_use for p in self._pools.values())
+        stats['logins_saved'] = stats['hits'] + stats['shared']
+        return stats
+
+
+# Singleton instance
+ricoh_session_manager = RicohSessionManager()
@@ -3,12 +3,11 @@
 Toner Parser - Scrapes printer status page for toner levels
 Handles cookie session login and parses getStatus.cgi HTML
 """
-import requests
 import re
 from bs4 import BeautifulSoup
 import urllib3
 import logging
-from .ricoh_auth import RicohAuthService
+from .ricoh_session import ricoh_session_manager
 
 # Disable ssl warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -32,29 +31,17 @@ def get_printer_toner_levels(printer_ip: str) -> dict:
             'message': str
         }
     """
-    session = requests.Session()
-    session.verify = False
-    
-    # Standard browser headers to avoid detection or simple drops
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/148.0.0.0 Safari/537.36',
-        'Accept-Language': 'es-ES,es;q=0.9',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8'
-    })
-    
     try:
-        # Step 1: Authenticate with the printer
-        logger.info(f"Authenticating with printer at {printer_ip} to get toner levels...")
-        RicohAuthService.login_to_printer(session, printer_ip)
-        
-        # Step 2: Request the status page (getStatus.cgi)
+        # Step 1: Request the status page (getStatus.cgi) with a pooled
+        # authenticated session (logs in only if none is still valid)
         status_url = f"http://{printer_ip}/web/entry/es/websys/webArch/getStatus.cgi"
         headers = {
             'Referer': f'http://{printer_ip}/web/entry/es/websys/webArch/topPage.cgi'
         }
         
         logger.info(f"Fetching status page: {status_url}")
-        resp = session.get(status_url, headers=headers, timeout=10)
+        with ricoh_session_manager.session(printer_ip) as session:
+            resp = session.get(status_url, headers=headers, timeout=10)
         
         if resp.status_code != 200:
             return {
@@ -63,7 +50,7 @@ def get_printer_toner_levels(printer_ip: str) -> dict:
                 'message': f"Printer returned HTTP status code {resp.status_code}"
             }
             
-        # Step 3: Parse HTML
+        # Step 2: Parse HTML
         soup = BeautifulSoup(resp.text, 'html.parser')
         
         # Map of color to its corresponding image source filename suffix
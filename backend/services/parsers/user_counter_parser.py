@@ -3,12 +3,11 @@
 Parser de Contadores por Usuario - Ricoh
 Extrae datos estructurados del HTML de contadores por usuario
 """
-import requests
-import re
-from bs4 import BeautifulSoup
 import json
 import urllib3
-from .ricoh_auth import RicohAuthService
+from .ricoh_session import ricoh_session_manager
+from .html_parsing import make_soup, extract_pagination
+from .page_fetcher import PagedCounterFetcher
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -28,10 +27,13 @@ def parse_user_counter_html(html_content):
     - Fax (Blanco y negro, Páginas transmitidas)
     - Revelado (Negro, Color YMC)
     
+    Args:
+        html_content: HTML de la página o BeautifulSoup ya parseado
+    
     Returns:
         list de dict con datos de cada usuario
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = make_soup(html_content)
     
     users = []
     
@@ -289,12 +291,6 @@ def get_user_counters(printer_ip=PRINTER_IP, offset=0, count=10):
             - total_users: total de usuarios registrados
             - page_info: información de paginación
     """
-    session = requests.Session()
-    session.verify = False
-    
-    # Login usando servicio unificado
-    RicohAuthService.login_to_printer(session, printer_ip)
-    
     # Obtener contadores por usuario
     counter_url = f"http://{printer_ip}/web/entry/es/websys/status/getUserCounter.cgi"
     
@@ -304,31 +300,21 @@ def get_user_counters(printer_ip=PRINTER_IP, offset=0, count=10):
         'count': count
     }
     
-    resp = session.post(counter_url, data=data, timeout=10)
-    
-    if resp.status_code != 200:
-        raise Exception(f"Error al obtener contadores por usuario: {resp.status_code}")
-    
-    # Parsear HTML
-    users = parse_user_counter_html(resp.text)
-    
-    # Extraer información de paginación
-    soup = BeautifulSoup(resp.text, 'html.parser')
-    
-    # Total de usuarios
-    total_users_text = soup.find(text=re.compile(r'Usuario\s+\d+'))
-    total_users = 0
-    if total_users_text:
-        match = re.search(r'Usuario\s+(\d+)', total_users_text)
-        if match:
-            total_users = int(match.group(1))
+    # Sesión autenticada compartida (solo hace login si no hay una vigente)
+    with ricoh_session_manager.session(printer_ip) as session:
+        resp = session.post(counter_url, data=data, timeout=10)
+        
+        if resp.status_code != 200:
+            raise Exception(f"Error al obtener contadores por usuario: {resp.status_code}")
     
-    # Página actual y total de páginas
-    current_page_span = soup.find('span', id='span_currentPage')
-    total_page_span = soup.find('span', id='span_totalPage')
+    # Parsear HTML una sola vez: filas y paginación salen del mismo árbol
+    soup = make_soup(resp.text)
+    users = parse_user_counter_html(soup)
+    pagination = extract_pagination(soup)
     
-    current_page = int(current_page_span.get_text(strip=True)) if current_page_span else 1
-    total_pages = int(total_page_span.get_text(strip=True)) if total_page_span else 1
+    total_users = pagination['total_users']
+    current_page = pagination['current_page'] if pagination['current_page'] is not None else 1
+    total_pages = pagination['total_pages'] if pagination['total_pages'] is not None else 1
     
     return {
         'users': users,
@@ -342,55 +328,47 @@ def get_user_counters(printer_ip=PRINTER_IP, offset=0, count=10):
         }
     }
 
-def get_all_user_counters(printer_ip=PRINTER_IP):
+def _request_user_counter_page(printer_ip):
+    counter_url = f"http://{printer_ip}/web/entry/es/websys/status/getUserCounter.cgi"
+    
+    def request_page(session, offset, count):
+        return session.post(counter_url, data={'offset': offset, 'count': count}, timeout=10)
+    
+    return request_page
+
+def fetch_all_user_counters(printer_ip=PRINTER_IP, page_size=None):
+    """
+    Obtiene TODOS los contadores de usuarios con paginación adaptativa
+    
+    La primera página se pide con el tamaño cacheado (o uno grande para
+    sondear); con el total de páginas que informa, el resto se descarga
+    en un pipeline acotado.
+    
+    Args:
+        printer_ip: IP de la impresora
+        page_size: Usuarios por página conocidos para esta impresora (None = sondear)
+    
+    Returns:
+        Tupla (lista de usuarios, PageFetchStats)
+    """
+    fetcher = PagedCounterFetcher(
+        printer_ip,
+        request_page=_request_user_counter_page(printer_ip),
+        parse_page=parse_user_counter_html,
+        session_manager=ricoh_session_manager
+    )
+    pages, stats = fetcher.fetch_all(page_size)
+    return [user for page in pages for user in page], stats
+
+def get_all_user_counters(printer_ip=PRINTER_IP, page_size=None):
     """
     Obtiene TODOS los contadores de usuarios (todas las páginas)
     
     Returns:
         list de dict con todos los usuarios
     """
-    all_users = []
-    offset = 0
-    count = 20  # Obtener 20 por página para ser más eficiente
-    
-    session = requests.Session()
-    session.verify = False
-    RicohAuthService.login_to_printer(session, printer_ip)
-    
-    while True:
-        counter_url = f"http://{printer_ip}/web/entry/es/websys/status/getUserCounter.cgi"
-        data = {
-            'offset': offset,
-            'count': count
-        }
-        
-        resp = session.post(counter_url, data=data, timeout=10)
-        
-        if resp.status_code != 200:
-            break
-        
-        users = parse_user_counter_html(resp.text)
-        
-        if not users:
-            break
-        
-        all_users.extend(users)
-        
-        # Verificar si hay más páginas
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        current_page_span = soup.find('span', id='span_currentPage')
-        total_page_span = soup.find('span', id='span_totalPage')
-        
-        if current_page_span and total_page_span:
-            current_page = int(current_page_span.get_text(strip=True))
-            total_pages = int(total_page_span.get_text(strip=True))
-            
-            if current_page >= total_pages:
-                break
-        
-        offset += count
-    
-    return all_users
+    users, _ = fetch_all_user_counters(printer_ip, page_size)
+    return users
 
 if __name__ == "__main__":
     print("=" * 80)
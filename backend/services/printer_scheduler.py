@@ -0,0 +1,299 @@
+"""
+Printer Scheduler - Cola serializada por impresora (un actor por equipo)
+Web Image Monitor solo tolera una sesión de administración a la vez: las
+operaciones sobre una misma impresora se ejecutan de una en una, en orden
+de prioridad, mientras que impresoras distintas se atienden en paralelo
+sobre un pool de hilos compartido
+
+- Prioridades: las acciones interactivas (aprovisionar, borrar un trabajo,
+  leer una impresora) pasan por delante de las masivas (lecturas de flota,
+  sincronización de libretas)
+- Coalescencia: una operación con la misma clave que otra aún en cola de la
+  misma impresora no se repite; ambos llamadores reciben el mismo resultado
+- Métricas por impresora: profundidad de cola, espera y duración
+- Una tarea que encola trabajo para su propia impresora lo ejecuta en línea
+  (evita el interbloqueo del actor consigo mismo)
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # Acción de un usuario sobre una impresora
+PRIORITY_NORMAL = 10  # Aprovisionamiento y desactivación encolados
+PRIORITY_BULK = 20  # Lecturas de flota y sincronización de libretas
+
+
+@dataclass
+class PrinterSchedulerConfig:
+    """Configuración del planificador por impresora"""
+    max_workers: int = 32  # Impresoras atendidas a la vez (una operación por impresora)
+
+
+def load_printer_scheduler_config_from_env() -> PrinterSchedulerConfig:
+    """Carga la configuración del planificador desde variables de entorno"""
+    try:
+        config = PrinterSchedulerConfig(
+            max_workers=int(os.getenv('PRINTER_SCHEDULER_MAX_WORKERS', '32'))
+        )
+
+        if config.max_workers <= 0:
+            logger.warning(f"Invalid PRINTER_SCHEDULER_MAX_WORKERS ({config.max_workers}), using default 32")
+            config.max_workers = 32
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading printer scheduler configuration from environment: {e}, using defaults")
+        return PrinterSchedulerConfig()
+
+
+@dataclass
+class _Task:
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    priority: int
+    key: Optional[Hashable]
+    loop: Optional[asyncio.AbstractEventLoop]
+    enqueued_at: float = field(default_factory=time.monotonic)
+    waiters: List[Future] = field(default_factory=list)
+    started: bool = False
+
+
+@dataclass
+class _PrinterStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    coalesced: int = 0
+    max_depth: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    run_total: float = 0.0
+    run_max: float = 0.0
+    last_run_at: Optional[float] = None
+
+
+class _PrinterQueue:
+    """Cola de prioridad de una impresora; a lo sumo un hilo la atiende"""
+
+    def __init__(self):
+        self.heap = []  # (priority, seq, task); entradas obsoletas se descartan al sacar
+        self.pending: Dict[Hashable, _Task] = {}  # Tareas en cola por clave de coalescencia
+        self.depth = 0
+        self.running = False
+        self.stats = _PrinterStats()
+
+
+class PrinterScheduler:
+    """
+    Planificador con un actor por impresora
+
+    submit() retorna un concurrent.futures.Future propio de cada llamador
+    (cancelarlo no afecta a otros llamadores coalescidos); run() es la
+    variante para corrutinas y código async. Las funciones async se ejecutan
+    en el event loop del llamador y el actor espera a que terminen
+    """
+
+    def __init__(self, config: Optional[PrinterSchedulerConfig] = None):
+        self.config = config or load_printer_scheduler_config_from_env()
+        self._lock = threading.Lock()
+        self._queues: Dict[str, _PrinterQueue] = {}
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=self.config.max_workers, thread_name_prefix="printer-actor")
+        self._local = threading.local()
+
+    def current_printer(self) -> Optional[str]:
+        """Impresora cuya tarea se está ejecutando en este hilo"""
+        return getattr(self._local, 'printer', None)
+
+    # ------------------------------------------------------------------ API
+
+    def submit(self, printer: str, fn: Callable, *args, priority: int = PRIORITY_NORMAL,
+               key: Optional[Hashable] = None, **kwargs) -> Future:
+        """
+        Encola fn(*args, **kwargs) en la cola de la impresora
+
+        Args:
+            printer: Identificador de la impresora (su IP)
+            priority: Menor = antes (PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK)
+            key: Clave de coalescencia; una tarea en cola con la misma clave
+                se reutiliza (y sube de prioridad si la nueva es más urgente)
+
+        Returns:
+            Future con el resultado de fn
+        """
+        waiter = Future()
+
+        if self.current_printer() == printer and not asyncio.iscoroutinefunction(fn):
+            # Tarea de esta impresora encolando para sí misma: ejecutar en línea
+            if waiter.set_running_or_notify_cancel():
+                try:
+                    waiter.set_result(self._call(fn, args, kwargs, None))
+                except BaseException as e:
+                    waiter.set_exception(e)
+            return waiter
+
+        loop = None
+        if asyncio.iscoroutinefunction(fn):
+            loop = asyncio.get_running_loop()
+
+        with self._lock:
+            queue = self._queues.setdefault(printer, _PrinterQueue())
+            queue.stats.submitted += 1
+            task = queue.pending.get(key) if key is not None else None
+            if task is not None:
+                queue.stats.coalesced += 1
+                task.waiters.append(waiter)
+                if priority < task.priority:
+                    task.priority = priority
+                    heapq.heappush(queue.heap, (priority, next(self._seq), task))
+                return waiter
+
+            task = _Task(fn, args, kwargs, priority, key, loop, waiters=[waiter])
+            heapq.heappush(queue.heap, (priority, next(self._seq), task))
+            if key is not None:
+                queue.pending[key] = task
+            queue.depth += 1
+            queue.stats.max_depth = max(queue.stats.max_depth, queue.depth)
+            if not queue.running:
+                queue.running = True
+                self._executor.submit(self._drain, printer, queue)
+        return waiter
+
+    async def run(self, printer: str, fn: Callable, *args, priority: int = PRIORITY_NORMAL,
+                  key: Optional[Hashable] = None, **kwargs) -> Any:
+        """Como submit(), esperando el resultado sin bloquear el event loop"""
+        return await asyncio.wrap_future(self.submit(printer, fn, *args, priority=priority, key=key, **kwargs))
+
+    def map(self, printers: Iterable[str], fn: Callable, items: Iterable, priority: int = PRIORITY_NORMAL) -> List:
+        """
+        fn(item) en la cola de la impresora de cada item (printers e items en
+        paralelo, como zip); resultados en el orden de items
+        """
+        futures = [self.submit(printer, fn, item, priority=priority) for printer, item in zip(printers, items)]
+        return [future.result() for future in futures]
+
+    def get_stats(self) -> Dict:
+        """Métricas por impresora: cola actual, máxima, espera y duración de las operaciones"""
+        with self._lock:
+            printers = {}
+            for printer, queue in self._queues.items():
+                stats = queue.stats
+                finished = stats.completed + stats.failed
+                printers[printer] = {
+                    'queued': queue.depth,
+                    'running': queue.running,
+                    'max_queued': stats.max_depth,
+                    'submitted': stats.submitted,
+                    'completed': stats.completed,
+                    'failed': stats.failed,
+                    'cancelled': stats.cancelled,
+                    'coalesced': stats.coalesced,
+                    'avg_wait_ms': round(stats.wait_total / finished * 1000, 1) if finished else 0.0,
+                    'max_wait_ms': round(stats.wait_max * 1000, 1),
+                    'avg_run_ms': round(stats.run_total / finished * 1000, 1) if finished else 0.0,
+                    'max_run_ms': round(stats.run_max * 1000, 1),
+                    'idle_seconds': round(time.monotonic() - stats.last_run_at, 1) if stats.last_run_at else None
+                }
+            return {
+                'max_workers': self.config.max_workers,
+                'printers': printers,
+                'queued': sum(p['queued'] for p in printers.values()),
+                'running': sum(1 for p in printers.values() if p['running'])
+            }
+
+    # ------------------------------------------------------------------ actor
+
+    def _call(self, fn: Callable, args: tuple, kwargs: dict, loop: Optional[asyncio.AbstractEventLoop]) -> Any:
+        if loop is None:
+            return fn(*args, **kwargs)
+        # Corrutina: se ejecuta en el loop del llamador; el actor espera sin
+        # quedar bloqueado para siempre si ese loop se cierra
+        future = asyncio.run_coroutine_threadsafe(fn(*args, **kwargs), loop)
+        while not wait([future], timeout=0.5).done:
+            if loop.is_closed():
+                future.cancel()
+                raise RuntimeError("El event loop de la operación se cerró antes de terminar")
+        return future.result()
+
+    def _next_task(self, queue: _PrinterQueue) -> Optional[_Task]:
+        """Saca la tarea más prioritaria o marca la cola como ociosa (con el lock tomado)"""
+        while queue.heap:
+            priority, _, task = heapq.heappop(queue.heap)
+            if task.started or priority != task.priority:
+                continue  # Entrada obsoleta de una tarea que subió de prioridad
+            task.started = True
+            queue.depth -= 1
+            if task.key is not None:
+                queue.pending.pop(task.key, None)
+            return task
+        queue.running = False
+        return None
+
+    def _drain(self, printer: str, queue: _PrinterQueue) -> None:
+        """Ejecuta una tarea de la impresora y se vuelve a encolar en el pool si quedan más"""
+        with self._lock:
+            task = self._next_task(queue)
+        if task is None:
+            return
+
+        waiters = [w for w in task.waiters if w.set_running_or_notify_cancel()]
+        start = time.monotonic()
+        waited = start - task.enqueued_at
+        error = None
+        result = None
+
+        if not waiters:
+            outcome = 'cancelled'
+        else:
+            self._local.printer = printer
+            try:
+                result = self._call(task.fn, task.args, task.kwargs, task.loop)
+                outcome = 'completed'
+            except BaseException as e:
+                error = e
+                outcome = 'failed'
+            finally:
+                self._local.printer = None
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            stats = queue.stats
+            if outcome == 'cancelled':
+                stats.cancelled += 1
+            else:
+                setattr(stats, outcome, getattr(stats, outcome) + 1)
+                stats.wait_total += waited
+                stats.wait_max = max(stats.wait_max, waited)
+                stats.run_total += elapsed
+                stats.run_max = max(stats.run_max, elapsed)
+                stats.last_run_at = time.monotonic()
+            more = bool(queue.heap)
+            if not more:
+                queue.running = False
+
+        # Métricas antes de despertar a los llamadores: ya reflejan esta tarea
+        for waiter in waiters:
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(result)
+        if not more:
+            return
+
+        # Otra pasada por el pool: las demás impresoras no esperan a que esta vacíe su cola
+        self._executor.submit(self._drain, printer, queue)
+
+
+printer_scheduler = PrinterScheduler()
@@ -0,0 +1,361 @@
+"""
+Printer User Sync Service - Sincronización de usuarios de las libretas de la flota
+Lee las libretas de direcciones de todas las impresoras de forma concurrente
+(acotada), agrupa los usuarios por código en memoria y aplica los cambios en
+la base de datos en una sola transacción
+"""
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy.orm import Session
+
+from db.models import User, UserPrinterAssignment
+from services.printer_scheduler import printer_scheduler, PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+# Impresoras Kyocera (.248 y .249): no tienen usuarios registrados
+SKIPPED_PRINTER_IPS = frozenset({'192.168.91.248', '192.168.91.249'})
+
+# Campos de la asignación para cada permiso leído del equipo
+PERMISSION_FIELDS = {
+    'copiadora': 'func_copier',
+    'copiadora_color': 'func_copier_color',
+    'impresora': 'func_printer',
+    'impresora_color': 'func_printer_color',
+    'document_server': 'func_document_server',
+    'fax': 'func_fax',
+    'escaner': 'func_scanner',
+    'navegador': 'func_browser',
+}
+
+
+@dataclass
+class PrinterUserSyncConfig:
+    """Configuración de la sincronización de usuarios de la flota"""
+    max_concurrency: int = 8  # Impresoras leídas a la vez
+    printer_timeout: float = 120.0  # Segundos máximos por impresora
+
+
+def load_printer_user_sync_config_from_env() -> PrinterUserSyncConfig:
+    """Carga la configuración de sincronización de usuarios desde variables de entorno"""
+    try:
+        config = PrinterUserSyncConfig(
+            max_concurrency=int(os.getenv('USER_SYNC_MAX_CONCURRENCY', '8')),
+            printer_timeout=float(os.getenv('USER_SYNC_PRINTER_TIMEOUT', '120.0'))
+        )
+
+        if config.max_concurrency <= 0:
+            logger.warning(f"Invalid USER_SYNC_MAX_CONCURRENCY ({config.max_concurrency}), using default 8")
+            config.max_concurrency = 8
+
+        if config.printer_timeout <= 0:
+            logger.warning(f"Invalid USER_SYNC_PRINTER_TIMEOUT ({config.printer_timeout}), using default 120.0")
+            config.printer_timeout = 120.0
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading user sync configuration from environment: {e}, using defaults")
+        return PrinterUserSyncConfig()
+
+
+class PrinterUserSyncService:
+    """
+    Sincronización de usuarios desde las libretas de direcciones de la flota
+
+    1. iter_read: lee las impresoras con AsyncRicohWebClient, como máximo
+       `max_concurrency` a la vez, y entrega cada resultado al terminar
+    2. apply: precarga en una consulta los usuarios existentes (código → usuario)
+       y sus asignaciones, agrupa los usuarios por código y aplica los cambios
+       con un único commit
+    """
+
+    def __init__(self, client=None, config: Optional[PrinterUserSyncConfig] = None):
+        if client is None:
+            from services.ricoh_async_client import get_async_ricoh_web_client
+            client = get_async_ricoh_web_client()
+        self.client = client
+        self.config = config or load_printer_user_sync_config_from_env()
+
+    @staticmethod
+    def build_targets(printers: List) -> List[Dict]:
+        """
+        Extrae de las impresoras ORM los datos necesarios para leerlas, para no
+        depender de la sesión del request durante la lectura
+        """
+        return [
+            {
+                'printer_id': p.id,
+                'hostname': p.hostname,
+                'ip_address': p.ip_address,
+                'admin_password': p.admin_password,
+                'skipped': p.ip_address in SKIPPED_PRINTER_IPS
+            }
+            for p in printers
+        ]
+
+    async def _read_printer(self, target: Dict, user_code: Optional[str]) -> List[Dict]:
+        ip = target['ip_address']
+        if user_code is not None:
+            # Buscar usuario específico (incluye detalles/permisos)
+            user_found = await self.client.find_specific_user(ip, user_code, admin_password=target['admin_password'])
+            return [user_found] if user_found else []
+        # Lista rápida sin permisos: se cargan bajo demanda al abrir el usuario
+        return await self.client.read_users_from_printer(ip, fast_list=True, admin_password=target['admin_password'])
+
+    async def _read_with_limit(self, target: Dict, user_code: Optional[str], semaphore: asyncio.Semaphore) -> Dict:
+        result = {
+            'printer_id': target['printer_id'],
+            'hostname': target['hostname'],
+            'ip_address': target['ip_address'],
+            'users': [],
+            'skipped': target['skipped'],
+            'error': None,
+            'elapsed_seconds': 0.0
+        }
+        if target['skipped']:
+            return result
+
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                result['users'] = await asyncio.wait_for(
+                    printer_scheduler.run(
+                        target['ip_address'], self._read_printer, target, user_code,
+                        priority=PRIORITY_BULK, key=('users', user_code)
+                    ),
+                    timeout=self.config.printer_timeout
+                )
+            except asyncio.TimeoutError:
+                result['error'] = f"Tiempo límite de lectura excedido ({self.config.printer_timeout:.0f}s)"
+            except Exception as e:
+                result['error'] = str(e)
+            result['elapsed_seconds'] = round(time.monotonic() - start, 3)
+
+        if result['error']:
+            logger.warning(f"⚠️ No se leyeron usuarios de {target['hostname']} ({target['ip_address']}): {result['error']}")
+        return result
+
+    async def iter_read(self, targets: List[Dict], user_code: Optional[str] = None) -> AsyncIterator[Dict]:
+        """
+        Lee las libretas de las impresoras y entrega cada resultado al terminar
+
+        Args:
+            targets: Lista generada por build_targets()
+            user_code: Si se indica, solo se busca ese usuario (con permisos)
+
+        Yields:
+            Dict por impresora con users, skipped, error y elapsed_seconds
+        """
+        semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        tasks = [asyncio.ensure_future(self._read_with_limit(t, user_code, semaphore)) for t in targets]
+        logger.info(f"📋 Leyendo libretas de {len(targets)} impresoras ({self.config.max_concurrency} simultáneas)")
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # El cliente puede abandonar el stream antes de terminar
+            for task in tasks:
+                task.cancel()
+
+    async def read_all(self, targets: List[Dict], user_code: Optional[str] = None) -> List[Dict]:
+        """Lee todas las impresoras; resultados en el mismo orden que targets"""
+        by_printer = {r['printer_id']: r async for r in self.iter_read(targets, user_code)}
+        return [by_printer[t['printer_id']] for t in targets]
+
+    @staticmethod
+    def _apply_permissions(assignment: UserPrinterAssignment, permissions: Dict) -> bool:
+        """Copia los permisos del equipo en la asignación; True si alguno está activo"""
+        for key, field in PERMISSION_FIELDS.items():
+            setattr(assignment, field, permissions.get(key, False))
+        return any(getattr(assignment, field) for field in PERMISSION_FIELDS.values())
+
+    @staticmethod
+    def _sync_assignment(
+        db: Session,
+        user: User,
+        printer_id: int,
+        printer_user: Dict,
+        real_permissions: bool,
+        assignments: Dict[Tuple[int, int], UserPrinterAssignment],
+        stats: Dict[str, int]
+    ) -> None:
+        """Mismo criterio que AssignmentRepository.update_assignment_state, sin commit"""
+        key = (user.id, printer_id)
+        assignment = assignments.get(key)
+        entry_index = printer_user.get('entry_index', '')
+
+        if real_permissions:
+            # Permisos reales del hardware → actualizar en BD (crear si no existe)
+            if assignment is None:
+                assignment = UserPrinterAssignment(user_id=user.id, printer_id=printer_id, entry_index=entry_index)
+                db.add(assignment)
+                assignments[key] = assignment
+                stats['assignments_created'] += 1
+            else:
+                if entry_index:
+                    assignment.entry_index = entry_index
+                stats['assignments_updated'] += 1
+            if PrinterUserSyncService._apply_permissions(assignment, printer_user.get('permisos', {})):
+                assignment.is_active = True
+                if not user.is_active:
+                    user.is_active = True
+                    stats['users_reactivated'] += 1
+        elif assignment is None:
+            # Modo lista rápida: usuario descubierto activo físicamente, permisos básicos por defecto
+            assignment = UserPrinterAssignment(
+                user_id=user.id,
+                printer_id=printer_id,
+                entry_index=entry_index,
+                is_active=True,
+                func_copier=True,
+                func_printer=True,
+                func_scanner=True
+            )
+            db.add(assignment)
+            assignments[key] = assignment
+            stats['assignments_created'] += 1
+        elif not assignment.is_active:
+            # Asignación existente: reactivar pero NO tocar los permisos
+            assignment.is_active = True
+            stats['assignments_updated'] += 1
+
+    @staticmethod
+    def apply(db: Session, results: List[Dict], user_code: Optional[str] = None) -> Dict:
+        """
+        Agrupa por código los usuarios leídos y actualiza sus asignaciones
+
+        Los usuarios existentes y sus asignaciones se cargan con una consulta
+        cada uno; todos los cambios se guardan con un único commit (rollback
+        completo si algo falla)
+
+        Args:
+            db: Sesión de base de datos
+            results: Resultados de read_all()/iter_read() en orden de impresoras
+            user_code: Código buscado (modo específico) o None (todos)
+
+        Returns:
+            Dict con users (lista agrupada por código), printers_scanned, errors y stats
+        """
+        specific = user_code is not None
+        codes = {u['codigo'] for r in results for u in r['users']}
+
+        existing_users: Dict[str, User] = {}
+        if codes:
+            for user in db.query(User).filter(User.codigo_de_usuario.in_(codes)).order_by(User.id):
+                # Con códigos duplicados se usa el primero, como hacía .first()
+                existing_users.setdefault(user.codigo_de_usuario, user)
+
+        assignments: Dict[Tuple[int, int], UserPrinterAssignment] = {}
+        printer_ids = [r['printer_id'] for r in results if r['users']]
+        if existing_users and printer_ids:
+            user_ids = [u.id for u in existing_users.values()]
+            for assignment in db.query(UserPrinterAssignment).filter(
+                UserPrinterAssignment.user_id.in_(user_ids),
+                UserPrinterAssignment.printer_id.in_(printer_ids)
+            ):
+                assignments.setdefault((assignment.user_id, assignment.printer_id), assignment)
+
+        stats = {'assignments_created': 0, 'assignments_updated': 0, 'users_reactivated': 0}
+        users_dict: Dict[str, Dict] = {}
+        printers_scanned = []
+        errors = []
+
+        try:
+            for result in results:
+                scanned = {
+                    'id': result['printer_id'],
+                    'hostname': result['hostname'],
+                    'ip': result['ip_address'],
+                    'users_count': len(result['users'])
+                }
+                if result['skipped']:
+                    scanned.update(skipped=True, reason='Kyocera - sin usuarios')
+                elif result['error']:
+                    scanned['error'] = result['error']
+                    errors.append(f"Error en {result['hostname']} ({result['ip_address']}): {result['error']}")
+                printers_scanned.append(scanned)
+
+                for printer_user in result['users']:
+                    codigo = printer_user['codigo']
+                    if specific and codigo != user_code:
+                        continue
+
+                    existing = existing_users.get(codigo)
+                    if existing is not None:
+                        # En modo lista rápida los permisos vienen en False (no se consultaron):
+                        # solo se sobrescriben con datos reales del hardware
+                        real_permissions = specific or any(printer_user.get('permisos', {}).values())
+                        PrinterUserSyncService._sync_assignment(
+                            db, existing, result['printer_id'], printer_user, real_permissions, assignments, stats
+                        )
+
+                    merged = users_dict.get(codigo)
+                    if merged is None:
+                        merged = users_dict[codigo] = {
+                            'nombre': printer_user['nombre'],
+                            'codigo': codigo,
+                            'empresa': printer_user.get('empresa', ''),
+                            'permisos': printer_user['permisos'],
+                            'carpeta': printer_user['carpeta'],
+                            'en_db': existing is not None,
+                            'impresoras': []
+                        }
+
+                    impresora = next((i for i in merged['impresoras'] if i['printer_id'] == result['printer_id']), None)
+                    if impresora is None:
+                        merged['impresoras'].append({
+                            'printer_id': result['printer_id'],
+                            'printer_name': result['hostname'],
+                            'printer_ip': result['ip_address'],
+                            'entry_index': printer_user.get('entry_index'),
+                            'permisos': printer_user['permisos'],
+                            'carpeta': printer_user['carpeta']
+                        })
+                    else:
+                        # Entrada repetida en la misma impresora: conservar la más reciente
+                        impresora.update(
+                            entry_index=printer_user.get('entry_index'),
+                            permisos=printer_user['permisos'],
+                            carpeta=printer_user['carpeta']
+                        )
+
+                    # Campos globales con el estado más completo (pre-llenan la edición en el front)
+                    if not any(merged['permisos'].values()):
+                        merged['permisos'] = printer_user['permisos']
+                    if not merged['carpeta']:
+                        merged['carpeta'] = printer_user['carpeta']
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        logger.info(
+            f"💾 Sincronización aplicada: {stats['assignments_created']} asignaciones creadas, "
+            f"{stats['assignments_updated']} actualizadas, {stats['users_reactivated']} usuarios reactivados"
+        )
+        return {
+            'users': list(users_dict.values()),
+            'printers_scanned': printers_scanned,
+            'errors': errors,
+            'stats': stats
+        }
+
+    @staticmethod
+    def to_summary(result: Dict) -> Dict:
+        """Convierte el resultado de una impresora en un dict serializable (progreso)"""
+        return {
+            'printer_id': result['printer_id'],
+            'printer_name': result['hostname'],
+            'ip': result['ip_address'],
+            'users_count': len(result['users']),
+            'skipped': result['skipped'],
+            'elapsed_seconds': result['elapsed_seconds'],
+            'error': result['error']
+        }
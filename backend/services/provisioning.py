@@ -2,7 +2,7 @@
 Provisioning service for user-printer assignments
 Handles bulk provisioning operations and communication with Ricoh printers
 """
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 from sqlalchemy.orm import Session
 from datetime import datetime
 import logging
@@ -14,6 +14,7 @@ from sqlalchemy import and_
 from services.encryption_service import EncryptionService
 from services.ricoh_web_client import get_ricoh_web_client
 from services.retry_strategy import RetryStrategy, load_retry_config_from_env, ErrorType
+from services.printer_scheduler import printer_scheduler, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +29,10 @@ class ProvisioningService:
         db: Session,
         user_id: int,
         printer_ids: List[int],
-        reconcile: bool = True
+        reconcile: bool = True,
+        busy_retry_delay: Optional[float] = 10.0,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        priority: int = PRIORITY_INTERACTIVE
     ) -> Dict:
         """
         Provision a user to multiple printers with intelligent retry logic.
@@ -38,6 +42,11 @@ class ProvisioningService:
             user_id: User ID to provision
             printer_ids: List of printer IDs to assign
             reconcile: If True, de-provisions the user from printers not in printer_ids
+            busy_retry_delay: Seconds to wait before a second pass over busy printers;
+                None skips the second pass and reports them in busy_printer_ids
+                (the job queue retries them later instead of blocking a worker)
+            on_result: Called with each printer result as soon as it is final
+            priority: Priority in each printer's queue (printer_scheduler)
             
         Returns:
             Dict with provisioning results including overall_success, total_printers,
@@ -75,37 +84,9 @@ class ProvisioningService:
         retry_config = load_retry_config_from_env()
         retry_strategy = RetryStrategy(retry_config)
         
-        # Decrypt password for provisioning
-        network_password = EncryptionService.decrypt(user.network_password_encrypted)
-        if not network_password:
-            network_password = "Temporal2021"
+        ricoh_payload = ProvisioningService._build_ricoh_payload(user)
         
-        # Build Ricoh payload
-        ricoh_payload = {
-            "nombre": user.name,
-            "codigo_de_usuario": user.codigo_de_usuario,
-            "nombre_usuario_inicio_sesion": user.network_username,
-            "contrasena_inicio_sesion": network_password,
-            "funciones_disponibles": {
-                "copiadora": user.func_copier,
-                "copiadora_color": user.func_copier_color,
-                "impresora": user.func_printer,
-                "impresora_color": user.func_printer_color,
-                "document_server": user.func_document_server,
-                "fax": user.func_fax,
-                "escaner": user.func_scanner,
-                "navegador": user.func_browser
-            },
-            "carpeta_smb": {
-                "protocolo": "SMB",
-                "servidor": user.smb_server,
-                "puerto": user.smb_port,
-                "ruta": user.smb_path
-            }
-        }
-        
-        # Provision to each printer in parallel using a ThreadPoolExecutor
-        from concurrent.futures import ThreadPoolExecutor
+        # Provision to each printer in parallel, one operation at a time per printer
         from db.database import SessionLocal
         
         results = []
@@ -144,33 +125,40 @@ class ProvisioningService:
                 thread_db.close()
 
         # Primera pasada: intentar todas las impresoras en paralelo
-        with ThreadPoolExecutor(max_workers=min(len(printers), 10)) as executor:
-            worker_results = list(executor.map(provision_worker, printers))
+        worker_results = printer_scheduler.map(
+            [p.ip_address for p in printers], provision_worker, printers, priority=priority
+        )
             
         for result in worker_results:
             # Si está BUSY, guardar para reintentar después
-            if result['status'] == 'failed' and 'ocupada' in result.get('error_message', '').lower():
+            if ProvisioningService._is_busy_result(result):
                 # Encontrar la impresora correspondiente
                 printer_obj = next((pr for pr in printers if pr.id == result['printer_id']), None)
                 if printer_obj:
                     logger.info(f"⏸️  Impresora {printer_obj.hostname} está BUSY, se reintentará después")
                     busy_printers.append((printer_obj, result))
-            else:
-                results.append(result)
+                    continue
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
         
         # Segunda pasada: reintentar impresoras BUSY en paralelo
-        if busy_printers:
+        if busy_printers and busy_retry_delay is not None:
             logger.info(f"🔄 Reintentando {len(busy_printers)} impresora(s) que estaban ocupadas...")
-            time.sleep(10)  # Esperar 10 segundos antes de reintentar
+            time.sleep(busy_retry_delay)  # Esperar antes de reintentar
             
-            def busy_worker(p_and_res):
-                p, _ = p_and_res
-                return provision_worker(p)
-                
-            with ThreadPoolExecutor(max_workers=min(len(busy_printers), 10)) as executor:
-                busy_results = list(executor.map(busy_worker, busy_printers))
+            busy_results = printer_scheduler.map(
+                [p.ip_address for p, _ in busy_printers], provision_worker,
+                [p for p, _ in busy_printers], priority=priority
+            )
                 
             results.extend(busy_results)
+            if on_result is not None:
+                for result in busy_results:
+                    on_result(result)
+            busy_printers = []
+        elif busy_printers:
+            results.extend(result for _, result in busy_printers)
         
         # Calculate summary
         successful = [r for r in results if r['status'] == 'success']
@@ -185,7 +173,242 @@ class ProvisioningService:
             "printers_provisioned": len(successful),
             "printer_ids": [r['printer_id'] for r in successful],
             "provisioned_at": datetime.now().isoformat(),
-            "message": f"Usuario '{user.name}' provisionado exitosamente a {len(successful)}/{len(printers)} impresora(s)"
+            "message": f"Usuario '{user.name}' provisionado exitosamente a {len(successful)}/{len(printers)} impresora(s)",
+            "results": results,
+            "busy_printer_ids": [p.id for p, _ in busy_printers]
+        }
+    
+    @staticmethod
+    def provision_users_to_printers(
+        db: Session,
+        user_ids: List[int],
+        printer_ids: List[int],
+        pending: Optional[Dict[int, List[int]]] = None,
+        busy_retry_delay: Optional[float] = 10.0,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        priority: int = PRIORITY_NORMAL,
+        session_factory=None
+    ) -> Dict:
+        """
+        Provision many users to many printers, grouped by printer.
+        
+        Each printer gets a single task in its printer_scheduler queue that logs
+        in once, reads the address book once (existing users are updated and new
+        ones created without a per-user lookup) and provisions the whole batch
+        over that session before logging out. Printers run in parallel.
+        Assignments on printers outside printer_ids are left untouched.
+        
+        Args:
+            db: Database session
+            user_ids: Users to provision, in batch order
+            printer_ids: Printers to provision them to
+            pending: Printer ID -> user IDs still to provision (job queue retries
+                of busy printers); defaults to every user on every printer
+            busy_retry_delay: Seconds to wait before a second pass over the users
+                of busy printers; None skips it and reports them in busy
+            on_result: Called with each (user, printer) result as soon as its printer finishes
+            priority: Priority in each printer's queue (printer_scheduler)
+            session_factory: Session factory for the printer workers (defaults to SessionLocal)
+            
+        Returns:
+            Dict with counts, results (one per user and printer), matrix
+            (user_id -> printer_id -> status), per-printer summaries and busy
+            (printer ID -> user IDs left pending because the printer was busy)
+        """
+        from concurrent.futures import as_completed
+        from services.ricoh_web_client import create_ricoh_web_client
+        
+        start = time.monotonic()
+        
+        users = {u.id: u for u in db.query(User).filter(User.id.in_(user_ids)).all()}
+        missing_users = [uid for uid in user_ids if uid not in users]
+        if missing_users:
+            raise ValueError(f"Users with IDs {missing_users} not found")
+        
+        printers = {p.id: p for p in db.query(Printer).filter(Printer.id.in_(printer_ids)).all()}
+        missing_printers = [pid for pid in printer_ids if pid not in printers]
+        if missing_printers:
+            raise ValueError(f"Printers with IDs {missing_printers} not found")
+        
+        if session_factory is None:
+            from db.database import SessionLocal
+            session_factory = SessionLocal
+        
+        batches = pending if pending is not None else {pid: list(user_ids) for pid in printer_ids}
+        payloads = {uid: ProvisioningService._build_ricoh_payload(users[uid]) for uid in user_ids}
+        retry_strategy = RetryStrategy(load_retry_config_from_env())
+        unreachable = ProvisioningService._format_error_message('CONNECTION')
+        
+        def skipped(user, printer, error_message):
+            return {
+                "user_id": user.id,
+                "codigo_de_usuario": user.codigo_de_usuario,
+                "printer_id": printer.id,
+                "hostname": printer.hostname,
+                "ip_address": printer.ip_address,
+                "status": "failed",
+                "error_message": error_message,
+                "retry_attempts": 0,
+                "provisioned_at": None,
+                "entry_index": None
+            }
+        
+        def provision_batch(printer_id, batch_user_ids):
+            ricoh_client = create_ricoh_web_client()
+            thread_db = session_factory()
+            batch_start = time.monotonic()
+            results, busy_user_ids = [], []
+            try:
+                printer = thread_db.query(Printer).filter(Printer.id == printer_id).first()
+                batch_users = {u.id: u for u in thread_db.query(User).filter(User.id.in_(batch_user_ids)).all()}
+                try:
+                    # Una sola lectura de la libreta para todo el lote; si no se pudo leer
+                    # entera (None) cada usuario se busca en la impresora antes de crearlo
+                    address_book = ricoh_client.read_address_book(
+                        printer.ip_address, admin_password=printer.admin_password, logout=False
+                    )
+                    if address_book is None:
+                        logger.warning(f"⚠️  Libreta de {printer.hostname} no leída: búsqueda por usuario")
+                    for position, user_id in enumerate(batch_user_ids):
+                        user = batch_users[user_id]
+                        result = ProvisioningService._provision_to_single_printer(
+                            db=thread_db,
+                            user=user,
+                            printer=printer,
+                            ricoh_payload=payloads[user_id],
+                            ricoh_client=ricoh_client,
+                            retry_strategy=retry_strategy,
+                            logout=False,
+                            address_book=address_book
+                        )
+                        results.append({"user_id": user_id, "codigo_de_usuario": user.codigo_de_usuario, **result})
+                        
+                        if ProvisioningService._is_busy_result(result):
+                            # La impresora está en uso: el resto del lote queda pendiente
+                            busy_user_ids = batch_user_ids[position:]
+                            results.extend(skipped(batch_users[uid], printer, result['error_message'])
+                                           for uid in busy_user_ids[1:])
+                            break
+                        if result['error_message'] == unreachable:
+                            results.extend(skipped(batch_users[uid], printer, unreachable)
+                                           for uid in batch_user_ids[position + 1:])
+                            break
+                finally:
+                    ricoh_client.logout(printer.ip_address)
+                
+                successful = sum(1 for r in results if r['status'] == 'success')
+                logger.info(
+                    f"📦 Lote de {len(batch_user_ids)} usuario(s) en {printer.hostname}: "
+                    f"{successful} exitosos en {time.monotonic() - batch_start:.1f}s"
+                )
+                return {
+                    "printer_id": printer.id,
+                    "hostname": printer.hostname,
+                    "ip_address": printer.ip_address,
+                    "users": len(batch_user_ids),
+                    "successful": successful,
+                    "failed": len(results) - successful,
+                    "busy_user_ids": busy_user_ids,
+                    "elapsed_seconds": round(time.monotonic() - batch_start, 3),
+                    "results": results
+                }
+            finally:
+                thread_db.close()
+        
+        def run_pass(pass_batches, report_busy):
+            # Los usuarios de impresoras ocupadas se reportan cuando su resultado es final
+            futures = [
+                printer_scheduler.submit(printers[pid].ip_address, provision_batch, pid, uids, priority=priority)
+                for pid, uids in pass_batches.items() if uids
+            ]
+            summaries = []
+            for future in as_completed(futures):
+                summary = future.result()
+                summaries.append(summary)
+                if on_result is not None:
+                    busy_ids = set(summary['busy_user_ids']) if not report_busy else set()
+                    for result in summary['results']:
+                        if result['user_id'] not in busy_ids:
+                            on_result(result)
+            return summaries
+        
+        logger.info(f"Starting bulk provisioning of {len(user_ids)} user(s) to {len(batches)} printer(s)...")
+        summaries = {s['printer_id']: s for s in run_pass(batches, report_busy=False)}
+        
+        busy = {pid: s['busy_user_ids'] for pid, s in summaries.items() if s['busy_user_ids']}
+        if busy and busy_retry_delay is not None:
+            logger.info(f"🔄 Reintentando {len(busy)} impresora(s) que estaban ocupadas...")
+            time.sleep(busy_retry_delay)
+            for summary in run_pass(busy, report_busy=True):
+                previous = summaries[summary['printer_id']]
+                retried = set(busy[summary['printer_id']])
+                summary['results'] = [r for r in previous['results'] if r['user_id'] not in retried] + summary['results']
+                summary['users'] = previous['users']
+                summary['successful'] = sum(1 for r in summary['results'] if r['status'] == 'success')
+                summary['failed'] = len(summary['results']) - summary['successful']
+                summary['elapsed_seconds'] = round(previous['elapsed_seconds'] + summary['elapsed_seconds'], 3)
+                summaries[summary['printer_id']] = summary
+            busy = {pid: s['busy_user_ids'] for pid, s in summaries.items() if s['busy_user_ids']}
+        
+        ordered = [summaries[pid] for pid in batches if pid in summaries]
+        results = [r for s in ordered for r in s.pop('results')]
+        for summary in ordered:
+            summary.pop('busy_user_ids')
+        
+        matrix: Dict[int, Dict[int, str]] = {}
+        for result in results:
+            matrix.setdefault(result['user_id'], {})[result['printer_id']] = result['status']
+        successful = sum(1 for r in results if r['status'] == 'success')
+        
+        return {
+            "success": bool(results) and successful == len(results),
+            "total_users": len(user_ids),
+            "total_printers": len(batches),
+            "successful_count": successful,
+            "failed_count": len(results) - successful,
+            "elapsed_seconds": round(time.monotonic() - start, 3),
+            "message": f"{successful}/{len(results)} aprovisionamientos exitosos "
+                       f"({len(user_ids)} usuario(s) en {len(batches)} impresora(s))",
+            "matrix": matrix,
+            "printers": ordered,
+            "results": results,
+            "busy": busy
+        }
+    
+    @staticmethod
+    def _is_busy_result(result: Dict) -> bool:
+        """Printer result that failed because the printer was busy"""
+        return result['status'] == 'failed' and 'ocupada' in (result.get('error_message') or '').lower()
+    
+    @staticmethod
+    def _build_ricoh_payload(user) -> Dict:
+        """User configuration sent to the printer (RicohWebClient.provision_user)"""
+        # Decrypt password for provisioning
+        network_password = EncryptionService.decrypt(user.network_password_encrypted)
+        if not network_password:
+            network_password = "Temporal2021"
+        
+        return {
+            "nombre": user.name,
+            "codigo_de_usuario": user.codigo_de_usuario,
+            "nombre_usuario_inicio_sesion": user.network_username,
+            "contrasena_inicio_sesion": network_password,
+            "funciones_disponibles": {
+                "copiadora": user.func_copier,
+                "copiadora_color": user.func_copier_color,
+                "impresora": user.func_printer,
+                "impresora_color": user.func_printer_color,
+                "document_server": user.func_document_server,
+                "fax": user.func_fax,
+                "escaner": user.func_scanner,
+                "navegador": user.func_browser
+            },
+            "carpeta_smb": {
+                "protocolo": "SMB",
+                "servidor": user.smb_server,
+                "puerto": user.smb_port,
+                "ruta": user.smb_path
+            }
         }
     
     @staticmethod
@@ -231,13 +454,20 @@ class ProvisioningService:
         printer,
         ricoh_payload: Dict,
         ricoh_client,
-        retry_strategy: RetryStrategy
+        retry_strategy: RetryStrategy,
+        logout: bool = True,
+        address_book: Optional[Dict[str, str]] = None
     ) -> Dict:
         """
         Provision user to a single printer with retry logic.
         
+        Args:
+            logout: Close the printer session afterwards (False inside a per-printer batch)
+            address_book: User code -> entry_index already read in this session
+        
         Returns:
-            Dict with printer_id, hostname, ip_address, status, error_message, retry_attempts, provisioned_at
+            Dict with printer_id, hostname, ip_address, status, error_message, retry_attempts,
+            provisioned_at and entry_index
         """
         logger.info(f"Provisioning user {user.name} to printer {printer.hostname} ({printer.ip_address})")
         
@@ -250,7 +480,10 @@ class ProvisioningService:
             logger.info(f"Attempt {attempt} for printer {printer.ip_address}")
             
             # Attempt provisioning
-            result = ricoh_client.provision_user(printer.ip_address, ricoh_payload, admin_password=printer.admin_password)
+            result = ricoh_client.provision_user(
+                printer.ip_address, ricoh_payload, admin_password=printer.admin_password,
+                logout=logout, address_book=address_book
+            )
             
             # Classify error
             error_type = ProvisioningService._classify_provisioning_result(result)
@@ -319,7 +552,8 @@ class ProvisioningService:
                     "status": "success",
                     "error_message": None,
                     "retry_attempts": attempt - 1,
-                    "provisioned_at": datetime.utcnow().isoformat()
+                    "provisioned_at": datetime.utcnow().isoformat(),
+                    "entry_index": entry_index
                 }
             
             # Handle BADFLOW with session reset
@@ -342,7 +576,8 @@ class ProvisioningService:
                     "status": "failed",
                     "error_message": error_msg,
                     "retry_attempts": attempt - 1,
-                    "provisioned_at": None
+                    "provisioned_at": None,
+                    "entry_index": None
                 }
             
             # Wait before retry
@@ -432,8 +667,7 @@ class ProvisioningService:
         Returns:
             Dict with removal results
         """
-        # Remove user from specified printers in parallel
-        from concurrent.futures import ThreadPoolExecutor
+        # Remove user from specified printers in parallel, one operation at a time per printer
         from db.database import SessionLocal
         
         removed_count = 0
@@ -486,8 +720,11 @@ class ProvisioningService:
             finally:
                 thread_db.close()
 
-        with ThreadPoolExecutor(max_workers=min(len(printer_ids), 10)) as executor:
-            worker_results = list(executor.map(remove_worker, printer_ids))
+        printer_ips = dict(db.query(Printer.id, Printer.ip_address).filter(Printer.id.in_(printer_ids)).all())
+        worker_results = printer_scheduler.map(
+            [printer_ips.get(pid, f"printer-{pid}") for pid in printer_ids], remove_worker, printer_ids,
+            priority=PRIORITY_INTERACTIVE
+        )
             
         removed_count = sum(1 for r in worker_results if r)
         
@@ -498,6 +735,176 @@ class ProvisioningService:
             "message": f"Deshabilitados permisos de usuario en {removed_count} impresora(s)"
         }
 
+    @staticmethod
+    def deactivate_user_on_printers(
+        user_id: int,
+        printers_to_deactivate: List[Dict],
+        busy_attempts: int = 30,
+        busy_delay: float = 10.0,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        session_factory=None
+    ) -> List[Dict]:
+        """
+        Disable every function of a deleted user on the physical printers and
+        clear the permissions of the assignments in the database.
+        
+        Args:
+            user_id: User ID (for logging)
+            printers_to_deactivate: Dicts with assignment_id, printer_id,
+                entry_index and codigo_de_usuario; printer IP and admin password
+                are read from the database
+            busy_attempts: Attempts per printer while it answers BUSY or TIMEOUT
+            busy_delay: Seconds between those attempts
+            on_result: Called with each printer result as soon as it is final
+            session_factory: Session factory (defaults to SessionLocal)
+            
+        Returns:
+            One dict per printer with assignment_id, printer_id, success,
+            busy (still BUSY/TIMEOUT after busy_attempts), entry_index and error
+        """
+        from services.ricoh_web_client import create_ricoh_web_client
+        
+        if not printers_to_deactivate:
+            return []
+        
+        if session_factory is None:
+            from db.database import SessionLocal
+            session_factory = SessionLocal
+        
+        disabled_permissions = {k: False for k in ['copiadora', 'copiadora_color', 'escaner', 'impresora', 'impresora_color', 'document_server', 'fax', 'navegador']}
+        
+        db = session_factory()
+        try:
+            printer_ids = {p['printer_id'] for p in printers_to_deactivate}
+            printers = {
+                p.id: (p.ip_address, p.admin_password)
+                for p in db.query(Printer).filter(Printer.id.in_(printer_ids)).all()
+            }
+        finally:
+            db.close()
+        
+        logger.info(f"🚀 Starting physical deactivation for user ID {user_id} on {len(printers_to_deactivate)} printers...")
+        
+        def deactivate_printer_worker(p_data):
+            result = {
+                'assignment_id': p_data['assignment_id'],
+                'printer_id': p_data['printer_id'],
+                'success': False,
+                'busy': False,
+                'entry_index': p_data.get('entry_index'),
+                'error': None
+            }
+            if p_data['printer_id'] not in printers:
+                result['error'] = "Impresora no encontrada"
+            else:
+                printer_ip, admin_password = printers[p_data['printer_id']]
+                result.update(ProvisioningService._deactivate_on_printer(
+                    create_ricoh_web_client(), printer_ip, admin_password, p_data,
+                    disabled_permissions, busy_attempts, busy_delay
+                ))
+            if on_result is not None:
+                on_result(result)
+            return result
+        
+        worker_results = printer_scheduler.map(
+            [printers.get(p['printer_id'], (f"printer-{p['printer_id']}",))[0] for p in printers_to_deactivate],
+            deactivate_printer_worker, printers_to_deactivate, priority=PRIORITY_NORMAL
+        )
+        
+        # Set all permissions to False in DB to reflect physical printer state
+        db = session_factory()
+        try:
+            for res in worker_results:
+                assignment = db.query(UserPrinterAssignment).filter(
+                    UserPrinterAssignment.id == res['assignment_id']
+                ).first()
+                if assignment:
+                    assignment.func_copier = False
+                    assignment.func_copier_color = False
+                    assignment.func_printer = False
+                    assignment.func_printer_color = False
+                    assignment.func_document_server = False
+                    assignment.func_fax = False
+                    assignment.func_scanner = False
+                    assignment.func_browser = False
+                    
+                    # Keep assignment active but with no permissions to preserve the list
+                    if res['entry_index']:
+                        assignment.entry_index = res['entry_index']
+                    
+                    if not res['success']:
+                        logger.warning(f"⚠️ Error deshabilitando permisos en impresora {res['printer_id']}: {res['error']}")
+            db.commit()
+            logger.info(f"✅ Finished physical deactivation for user ID {user_id}.")
+        except Exception as e:
+            logger.error(f"❌ Error updating DB assignments: {e}")
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        
+        return worker_results
+    
+    @staticmethod
+    def _deactivate_on_printer(
+        client,
+        printer_ip: str,
+        admin_password: Optional[str],
+        p_data: Dict,
+        disabled_permissions: Dict,
+        busy_attempts: int,
+        busy_delay: float
+    ) -> Dict:
+        """Disable the functions of one address book entry, retrying while the printer is busy"""
+        resolved_entry_index = p_data.get('entry_index')
+        try:
+            # If no entry_index is recorded in DB, try to find the user on the printer
+            if not resolved_entry_index:
+                user_in_printer = client.find_specific_user(printer_ip, p_data['codigo_de_usuario'], admin_password=admin_password)
+                if user_in_printer and user_in_printer.get('entry_index'):
+                    resolved_entry_index = user_in_printer['entry_index']
+            
+            if not resolved_entry_index:
+                # Treat as success since they are not on the printer anyway
+                return {'success': True, 'entry_index': None, 'error': "Usuario no encontrado en la impresora"}
+            
+            logger.info(f"   🚫 [{printer_ip}] Deshabilitando funciones para slot {resolved_entry_index}...")
+            last_res = None
+            for attempt in range(1, busy_attempts + 1):
+                res = client.set_user_functions(
+                    printer_ip,
+                    resolved_entry_index,
+                    disabled_permissions,
+                    admin_password=admin_password,
+                    set_password=False
+                )
+                if res is True:
+                    return {'success': True, 'entry_index': resolved_entry_index, 'error': None}
+                last_res = res
+                if res not in ("BUSY", "TIMEOUT"):
+                    break
+                logger.warning(f"   [{printer_ip}] Impresora ocupada o timeout (intento {attempt}/{busy_attempts})")
+                if attempt < busy_attempts:
+                    time.sleep(busy_delay)
+            
+            err_msg = "Error de respuesta de la interfaz web de la impresora"
+            if last_res == "BUSY":
+                err_msg = "este dispositivo está siendo utilizado por otras funciones. Inténtelo de nuevo posteriormente."
+            elif last_res == "TIMEOUT":
+                err_msg = "tiempo de espera agotado al conectar con la impresora"
+            return {
+                'success': False,
+                'busy': last_res in ("BUSY", "TIMEOUT"),
+                'entry_index': resolved_entry_index,
+                'error': err_msg
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'entry_index': resolved_entry_index,
+                'error': f"Excepción de conexión: {str(e)}"
+            }
+
     
     @staticmethod
     def get_printer_users(db: Session, printer_id: int) -> Dict:
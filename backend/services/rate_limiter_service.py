@@ -1,16 +1,63 @@
 """
 Rate Limiter Service
 Servicio para limitar requests y prevenir ataques
+
+Algoritmo: contador de ventana deslizante (sliding window counter). Cada
+clave guarda solo el inicio de su ventana actual y los contadores de la
+ventana actual y la anterior; la anterior se pondera por la fracción que
+aún se solapa con la ventana deslizante. Memoria O(1) por clave y tiempos
+en enteros del reloj monótono.
+
+El mismo motor lo usan el rate limiter de la API, el BurstDetector del
+middleware DDoS y los límites de conexión del WebSocket. Con Redis, todas
+las claves de una consulta se evalúan en un único script Lua atómico.
 """
-from typing import Dict, NamedTuple, Optional
-from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
 import threading
+import time
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+NS_PER_SECOND = 1_000_000_000
+
+
+@dataclass
+class RateLimiterConfig:
+    """Configuración del motor de rate limiting en memoria"""
+    max_keys: int = 50000  # Claves en memoria antes de desalojar las menos usadas (LRU)
+    shards: int = 16  # Particiones con lock propio
+
+
+def load_rate_limiter_config_from_env() -> RateLimiterConfig:
+    """Carga la configuración del rate limiter desde variables de entorno"""
+    try:
+        config = RateLimiterConfig(
+            max_keys=int(os.getenv('RATE_LIMIT_MAX_KEYS', '50000')),
+            shards=int(os.getenv('RATE_LIMIT_SHARDS', '16'))
+        )
+
+        if config.max_keys < 1:
+            logger.warning(f"Invalid RATE_LIMIT_MAX_KEYS ({config.max_keys}), using default 50000")
+            config.max_keys = 50000
+
+        if config.shards < 1:
+            logger.warning(f"Invalid RATE_LIMIT_SHARDS ({config.shards}), using default 16")
+            config.shards = 16
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading rate limiter configuration from environment: {e}, using defaults")
+        return RateLimiterConfig()
+
+
+rate_limiter_config = load_rate_limiter_config_from_env()
+
 
 class RateLimitResult(NamedTuple):
     """Result of rate limit check"""
@@ -19,82 +66,247 @@ class RateLimitResult(NamedTuple):
     reset_at: datetime
 
 
+class LimitDecision(NamedTuple):
+    """Resultado del motor, sin objetos datetime"""
+    allowed: bool
+    remaining: int
+    reset_after: float  # Segundos hasta el fin de la ventana actual
+
+
+def _sliding_window(state: list, now: int, limit: int, window: int, cost: int) -> LimitDecision:
+    """
+    Aplica un hit (cost=1) o una consulta (cost=0) sobre state = [inicio, ventana, anterior, actual]
+
+    Misma regla que SLIDING_WINDOW_LUA; modifica state en el lugar
+    """
+    start, _, previous, current = state
+    elapsed = now - start
+    if elapsed >= window:
+        # La ventana avanza: si pasó exactamente una, la actual pasa a ser la anterior
+        passed = elapsed // window
+        previous = current if passed == 1 else 0
+        current = 0
+        start += passed * window
+        elapsed = now - start
+
+    estimated = previous * (window - elapsed) // window + current
+    allowed = estimated + cost <= limit if cost else estimated < limit
+    if allowed and cost:
+        current += cost
+        estimated += cost
+
+    state[0], state[1], state[2], state[3] = start, window, previous, current
+    return LimitDecision(allowed, max(0, limit - estimated), (start + window - now) / NS_PER_SECOND)
+
+
+class SlidingWindowLimiter:
+    """
+    Motor de ventana deslizante en memoria
+
+    Las claves se reparten en particiones con su propio lock y OrderedDict;
+    cada partición desaloja la clave usada hace más tiempo al llenarse, así
+    que la memoria queda acotada a max_keys sin depender de limpiezas
+    """
+
+    def __init__(self, max_keys: Optional[int] = None, shards: Optional[int] = None,
+                 clock: Callable[[], int] = time.monotonic_ns):
+        max_keys = max_keys or rate_limiter_config.max_keys
+        shards = shards or rate_limiter_config.shards
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._shard_capacity = max(1, max_keys // shards)
+        self._clock = clock
+        self.evictions = 0
+
+    def _shard(self, key: str) -> int:
+        return hash(key) % len(self._shards)
+
+    def hit(self, key: str, limit: int, window_seconds: float, cost: int = 1) -> LimitDecision:
+        """Registra un hit si cabe en el límite (cost=0 solo consulta)"""
+        window = int(window_seconds * NS_PER_SECOND)
+        index = self._shard(key)
+        entries = self._shards[index]
+        with self._locks[index]:
+            now = self._clock()
+            state = entries.get(key)
+            if state is None:
+                if not cost:
+                    return LimitDecision(True, limit, window_seconds)
+                state = [now, window, 0, 0]
+                entries[key] = state
+                if len(entries) > self._shard_capacity:
+                    entries.popitem(last=False)
+                    self.evictions += 1
+            else:
+                entries.move_to_end(key)
+            return _sliding_window(state, now, limit, window, cost)
+
+    def peek(self, key: str, limit: int, window_seconds: float) -> LimitDecision:
+        """Consulta el estado de una clave sin contar un hit"""
+        return self.hit(key, limit, window_seconds, cost=0)
+
+    def reset(self, key: str) -> None:
+        index = self._shard(key)
+        with self._locks[index]:
+            self._shards[index].pop(key, None)
+
+    def cleanup(self) -> int:
+        """Elimina las claves cuya ventana anterior ya no cuenta (inactivas por 2 ventanas)"""
+        removed = 0
+        for entries, lock in zip(self._shards, self._locks):
+            with lock:
+                now = self._clock()
+                expired = [key for key, (start, window, _, _) in entries.items() if now - start >= 2 * window]
+                for key in expired:
+                    del entries[key]
+                removed += len(expired)
+        return removed
+
+    def clear(self) -> None:
+        for entries, lock in zip(self._shards, self._locks):
+            with lock:
+                entries.clear()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._shards)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._shards[self._shard(key)]
+
+
+# KEYS: claves hash {start, prev, curr}; ARGV: cost, y luego (limit, window_ms) por clave
+# Retorna (allowed, remaining, reset_after_ms) por clave. Usa el reloj de Redis para
+# que todas las instancias compartan la misma referencia de tiempo. La expiración
+# se fija desde el inicio de la ventana (no se renueva con cada hit)
+SLIDING_WINDOW_LUA = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local out = {}
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2])
+    local window = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'start', 'prev', 'curr')
+    local start = tonumber(state[1])
+    local prev = tonumber(state[2]) or 0
+    local curr = tonumber(state[3]) or 0
+    if not start then
+        start = now
+    elseif now - start >= window then
+        local passed = math.floor((now - start) / window)
+        if passed == 1 then prev = curr else prev = 0 end
+        curr = 0
+        start = start + passed * window
+    end
+    local estimated = math.floor(prev * (window - (now - start)) / window) + curr
+    local allowed = 0
+    if (cost > 0 and estimated + cost <= limit) or (cost == 0 and estimated < limit) then
+        allowed = 1
+        if cost > 0 then
+            curr = curr + cost
+            estimated = estimated + cost
+        end
+    end
+    if cost > 0 then
+        redis.call('HSET', key, 'start', start, 'prev', prev, 'curr', curr)
+        redis.call('PEXPIRE', key, start + 2 * window - now)
+    end
+    out[#out + 1] = allowed
+    out[#out + 1] = math.max(0, limit - estimated)
+    out[#out + 1] = start + window - now
+end
+return out
+"""
+
+
 class RateLimiterService:
     """Service for rate limiting using Redis or in-memory storage"""
-    
+
+    # Prefijo de las claves hash del script (distinto del contador INCR anterior)
+    REDIS_PREFIX = "ratelimit:sw:"
+
     # Configuración de backend
     _redis_client: Optional[object] = None
+    _redis_script: Optional[object] = None
     _storage_backend: Optional[str] = None
     _initialized: bool = False
-    
-    # Storage: {key: {window_start: datetime, count: int}}
-    _memory_storage: Dict[str, Dict] = defaultdict(dict)
-    _lock = threading.Lock()
-    
+
+    # Storage: motor de ventana deslizante en memoria (acotado por LRU)
+    _memory_storage = SlidingWindowLimiter()
+
     @classmethod
     def initialize(cls):
         """Initialize rate limiter with Redis or memory backend"""
         if cls._initialized:
             return
-        
+
         redis_url = os.getenv("REDIS_URL")
-        
+
         if redis_url:
             try:
                 import redis
                 cls._redis_client = redis.from_url(redis_url, decode_responses=True)
                 # Test connection
                 cls._redis_client.ping()
+                cls._redis_script = cls._redis_client.register_script(SLIDING_WINDOW_LUA)
                 cls._storage_backend = "redis"
                 logger.info("🔴 Rate Limiter usando Redis para almacenamiento distribuido")
             except Exception as e:
                 logger.warning(f"⚠️ No se pudo conectar a Redis: {e}. Usando memoria como fallback.")
                 cls._redis_client = None
+                cls._redis_script = None
                 cls._storage_backend = "memory"
                 logger.warning("⚠️ Rate Limiter usando memoria (no recomendado para producción multi-instancia)")
         else:
             cls._storage_backend = "memory"
             logger.warning("⚠️ Rate Limiter usando memoria (no recomendado para producción multi-instancia)")
-        
+
         cls._initialized = True
-    
+
+    @classmethod
+    def _use_redis(cls) -> bool:
+        if not cls._initialized:
+            cls.initialize()
+        return cls._storage_backend == "redis" and cls._redis_client is not None
+
     @classmethod
     def check_rate_limit_redis(cls, key: str, max_requests: int, window_seconds: int) -> RateLimitResult:
         """
         Check rate limit using Redis with atomic operations
-        
+
         Args:
             key: Unique key (e.g., IP address, user ID)
             max_requests: Maximum requests allowed
             window_seconds: Time window in seconds
-            
+
         Returns:
             RateLimitResult with allowed status, remaining count, and reset time
         """
-        redis_key = f"ratelimit:{key}"
-        
-        # Usar pipeline para operaciones atómicas
-        pipe = cls._redis_client.pipeline()
-        pipe.incr(redis_key)
-        pipe.expire(redis_key, window_seconds)
-        pipe.ttl(redis_key)
-        results = pipe.execute()
-        
-        current_count = results[0]
-        ttl = results[2]
-        
-        # Calcular reset_at basado en TTL
-        if ttl > 0:
-            reset_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
-        else:
-            reset_at = datetime.now(timezone.utc) + timedelta(seconds=window_seconds)
-        
-        if current_count > max_requests:
-            return RateLimitResult(allowed=False, remaining=0, reset_at=reset_at)
-        
-        remaining = max_requests - current_count
-        return RateLimitResult(allowed=True, remaining=remaining, reset_at=reset_at)
-    
+        return cls._to_result(cls._run_redis_script([(key, max_requests, window_seconds)])[0])
+
+    @classmethod
+    def _run_redis_script(cls, checks: Sequence[Tuple[str, int, float]], cost: int = 1) -> List[LimitDecision]:
+        """Evalúa varios límites con una sola ejecución del script Lua (un round-trip)"""
+        if cls._redis_script is None:
+            cls._redis_script = cls._redis_client.register_script(SLIDING_WINDOW_LUA)
+
+        keys = [cls.REDIS_PREFIX + key for key, _, _ in checks]
+        args = [cost]
+        for _, max_requests, window_seconds in checks:
+            args.extend((max_requests, int(window_seconds * 1000)))
+        raw = cls._redis_script(keys=keys, args=args)
+
+        return [
+            LimitDecision(bool(int(raw[i])), int(raw[i + 1]), int(raw[i + 2]) / 1000)
+            for i in range(0, len(raw), 3)
+        ]
+
+    @staticmethod
+    def _to_result(decision: LimitDecision) -> RateLimitResult:
+        reset_at = datetime.fromtimestamp(time.time() + decision.reset_after, timezone.utc)
+        return RateLimitResult(allowed=decision.allowed, remaining=decision.remaining, reset_at=reset_at)
+
     @classmethod
     def check_rate_limit(
         cls,
@@ -104,15 +316,15 @@ class RateLimiterService:
     ) -> RateLimitResult:
         """
         Check if request is within rate limit
-        
+
         Args:
             key: Unique key (e.g., IP address, user ID)
             max_requests: Maximum requests allowed
             window_seconds: Time window in seconds
-            
+
         Returns:
             RateLimitResult with allowed status, remaining count, and reset time
-            
+
         Example:
             >>> result = RateLimiterService.check_rate_limit("192.168.1.100", 5, 60)
             >>> result.allowed
@@ -120,221 +332,116 @@ class RateLimiterService:
             >>> result.remaining
             4
         """
-        # Initialize if not already done
-        if not cls._initialized:
-            cls.initialize()
-        
         # Delegar a Redis o memoria según configuración
-        if cls._storage_backend == "redis" and cls._redis_client:
+        if cls._use_redis():
             return cls.check_rate_limit_redis(key, max_requests, window_seconds)
-        
+
         # Fallback a memoria
-        with cls._lock:
-            now = datetime.now(timezone.utc)
-            
-            # Get or initialize counter for this key
-            if key not in cls._memory_storage:
-                cls._memory_storage[key] = {
-                    'window_start': now,
-                    'count': 0
-                }
-            
-            counter = cls._memory_storage[key]
-            window_start = counter['window_start']
-            count = counter['count']
-            
-            # Check if window has expired
-            window_end = window_start + timedelta(seconds=window_seconds)
-            if now >= window_end:
-                # Reset window
-                cls._memory_storage[key] = {
-                    'window_start': now,
-                    'count': 0
-                }
-                counter = cls._memory_storage[key]
-                count = 0
-                window_start = now
-                window_end = now + timedelta(seconds=window_seconds)
-            
-            # Check if limit exceeded
-            if count >= max_requests:
-                return RateLimitResult(
-                    allowed=False,
-                    remaining=0,
-                    reset_at=window_end
-                )
-            
-            # Increment counter
-            cls._memory_storage[key]['count'] += 1
-            
-            return RateLimitResult(
-                allowed=True,
-                remaining=max_requests - count - 1,
-                reset_at=window_end
-            )
-    
+        return cls._to_result(cls._memory_storage.hit(key, max_requests, window_seconds))
+
+    @classmethod
+    def check_rate_limits(cls, checks: Sequence[Tuple[str, int, int]]) -> List[RateLimitResult]:
+        """
+        Evalúa varios límites (key, max_requests, window_seconds) a la vez
+
+        Con Redis usa un solo round-trip (script Lua atómico). Cada límite
+        cuenta el hit de forma independiente, aunque otro ya esté excedido.
+
+        Returns:
+            Un RateLimitResult por cada límite, en el mismo orden
+        """
+        if cls._use_redis():
+            decisions = cls._run_redis_script(checks)
+        else:
+            decisions = [
+                cls._memory_storage.hit(key, max_requests, window_seconds)
+                for key, max_requests, window_seconds in checks
+            ]
+        return [cls._to_result(decision) for decision in decisions]
+
     @classmethod
     def increment_counter(cls, key: str, window_seconds: int) -> int:
         """
         Increment request counter
-        
+
         Args:
             key: Unique key
             window_seconds: Time window in seconds
-            
+
         Returns:
-            Current count after increment
-            
+            Current count after increment (ponderado por la ventana deslizante)
+
         Example:
             >>> count = RateLimiterService.increment_counter("192.168.1.100", 60)
             >>> count
             1
         """
-        # Initialize if not already done
-        if not cls._initialized:
-            cls.initialize()
-        
-        # Use Redis if available
-        if cls._storage_backend == "redis" and cls._redis_client:
-            redis_key = f"ratelimit:{key}"
-            pipe = cls._redis_client.pipeline()
-            pipe.incr(redis_key)
-            pipe.expire(redis_key, window_seconds)
-            results = pipe.execute()
-            return results[0]
-        
-        # Fallback to memory
-        with cls._lock:
-            now = datetime.now(timezone.utc)
-            
-            if key not in cls._memory_storage:
-                cls._memory_storage[key] = {
-                    'window_start': now,
-                    'count': 1
-                }
-                return 1
-            
-            counter = cls._memory_storage[key]
-            window_start = counter['window_start']
-            window_end = window_start + timedelta(seconds=window_seconds)
-            
-            # Check if window has expired
-            if now >= window_end:
-                cls._memory_storage[key] = {
-                    'window_start': now,
-                    'count': 1
-                }
-                return 1
-            
-            # Increment counter
-            cls._memory_storage[key]['count'] += 1
-            return cls._memory_storage[key]['count']
-    
+        unlimited = 2 ** 31 - 1
+        if cls._use_redis():
+            decision = cls._run_redis_script([(key, unlimited, window_seconds)])[0]
+        else:
+            decision = cls._memory_storage.hit(key, unlimited, window_seconds)
+        return unlimited - decision.remaining
+
     @classmethod
     def reset_counter(cls, key: str) -> None:
         """
         Reset request counter
-        
+
         Args:
             key: Unique key
-            
+
         Example:
             >>> RateLimiterService.reset_counter("192.168.1.100")
         """
-        # Initialize if not already done
-        if not cls._initialized:
-            cls.initialize()
-        
         # Use Redis if available
-        if cls._storage_backend == "redis" and cls._redis_client:
-            redis_key = f"ratelimit:{key}"
-            cls._redis_client.delete(redis_key)
+        if cls._use_redis():
+            cls._redis_client.delete(cls.REDIS_PREFIX + key)
             return
-        
+
         # Fallback to memory
-        with cls._lock:
-            if key in cls._memory_storage:
-                del cls._memory_storage[key]
-    
+        cls._memory_storage.reset(key)
+
     @classmethod
-    def cleanup_expired(cls, window_seconds: int) -> int:
+    def cleanup_expired(cls, window_seconds: Optional[int] = None) -> int:
         """
         Clean up expired counters
-        
-        Args:
-            window_seconds: Time window in seconds
-            
+
+        Cada contador guarda su propia ventana, así que se eliminan los que
+        llevan dos ventanas completas sin actividad; window_seconds se
+        conserva por compatibilidad. En Redis las claves expiran solas.
+
         Returns:
             Number of expired counters removed
-            
+
         Example:
             >>> removed = RateLimiterService.cleanup_expired(60)
             >>> removed >= 0
             True
         """
-        with cls._lock:
-            now = datetime.now(timezone.utc)
-            expired_keys = []
-            
-            for key, counter in cls._memory_storage.items():
-                window_start = counter['window_start']
-                window_end = window_start + timedelta(seconds=window_seconds)
-                
-                if now >= window_end:
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del cls._memory_storage[key]
-            
-            return len(expired_keys)
-    
+        return cls._memory_storage.cleanup()
+
     @classmethod
     def get_remaining(cls, key: str, max_requests: int, window_seconds: int) -> int:
         """
         Get remaining requests for key
-        
+
         Args:
             key: Unique key
             max_requests: Maximum requests allowed
             window_seconds: Time window in seconds
-            
+
         Returns:
             Number of remaining requests
-            
+
         Example:
             >>> remaining = RateLimiterService.get_remaining("192.168.1.100", 5, 60)
             >>> remaining >= 0
             True
         """
-        # Initialize if not already done
-        if not cls._initialized:
-            cls.initialize()
-        
         # Use Redis if available
-        if cls._storage_backend == "redis" and cls._redis_client:
-            redis_key = f"ratelimit:{key}"
-            current_count = cls._redis_client.get(redis_key)
-            if current_count is None:
-                return max_requests
-            current_count = int(current_count)
-            remaining = max_requests - current_count
-            return max(0, remaining)
-        
+        if cls._use_redis():
+            return cls._run_redis_script([(key, max_requests, window_seconds)], cost=0)[0].remaining
+
         # Fallback to memory
-        with cls._lock:
-            if key not in cls._memory_storage:
-                return max_requests
-            
-            now = datetime.now(timezone.utc)
-            counter = cls._memory_storage[key]
-            window_start = counter['window_start']
-            window_end = window_start + timedelta(seconds=window_seconds)
-            
-            # Check if window has expired
-            if now >= window_end:
-                return max_requests
-            
-            count = counter['count']
-            remaining = max_requests - count
-            
-            return max(0, remaining)
+        return cls._memory_storage.peek(key, max_requests, window_seconds).remaining
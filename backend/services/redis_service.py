@@ -1,12 +1,80 @@
 import os
 import json
+import time
+import uuid
+import asyncio
+import inspect
 import logging
-from typing import Optional, Any, Dict
+import threading
+from typing import Optional, Any, Callable, Dict, Awaitable
 from functools import wraps
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+# Libera el lock solo si sigue perteneciendo a quien lo tomó
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class CacheStats:
+    """
+    Contadores de la caché de respuestas por prefijo de clave (por proceso)
+    
+    - hits: respuestas frescas servidas desde caché
+    - stale_hits: respuestas vencidas servidas mientras otro request recalcula
+    - misses: claves sin entrada utilizable
+    - coalesced: requests que esperaron el cálculo de otro en lugar de recalcular
+    - recomputes: ejecuciones reales de la función cacheada
+    """
+    
+    EVENTS = ('hits', 'stale_hits', 'misses', 'coalesced', 'recomputes')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prefixes: Dict[str, Dict[str, float]] = {}
+    
+    def _entry(self, prefix: str) -> Dict[str, float]:
+        entry = self._prefixes.get(prefix)
+        if entry is None:
+            entry = dict.fromkeys(self.EVENTS, 0)
+            entry.update(recompute_ms_total=0.0, recompute_ms_max=0.0)
+            self._prefixes[prefix] = entry
+        return entry
+    
+    def record(self, prefix: str, event: str) -> None:
+        with self._lock:
+            self._entry(prefix)[event] += 1
+    
+    def record_recompute(self, prefix: str, elapsed_ms: float) -> None:
+        with self._lock:
+            entry = self._entry(prefix)
+            entry['recomputes'] += 1
+            entry['recompute_ms_total'] += elapsed_ms
+            entry['recompute_ms_max'] = max(entry['recompute_ms_max'], elapsed_ms)
+    
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            result = {}
+            for prefix, entry in self._prefixes.items():
+                served = entry['hits'] + entry['stale_hits'] + entry['misses']
+                result[prefix] = {
+                    **{event: int(entry[event]) for event in self.EVENTS},
+                    'hit_rate': round((entry['hits'] + entry['stale_hits']) / served, 3) if served else 0.0,
+                    'recompute_ms_avg': round(entry['recompute_ms_total'] / entry['recomputes'], 2) if entry['recomputes'] else 0.0,
+                    'recompute_ms_max': round(entry['recompute_ms_max'], 2),
+                }
+            return result
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._prefixes.clear()
+
 
 class RedisService:
     """
@@ -18,6 +86,9 @@ class RedisService:
         self.enabled = False
         self.client = None
         self._memory_cache: Dict[str, tuple] = {}  # {key: (value, expiry_time)}
+        self._memory_locks: Dict[str, tuple] = {}  # {key: (token, expiry_monotonic)}
+        self._memory_locks_guard = threading.Lock()
+        self.cache_stats = CacheStats()
         
         # Try to connect to Redis
         try:
@@ -149,6 +220,46 @@ class RedisService:
         except Exception as e:
             logger.error(f"❌ Error invalidando patrón en Redis: {e}")
     
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        """
+        Toma un lock con expiración (SET NX en Redis)
+        
+        Returns:
+            Token para liberarlo, o None si otro proceso lo tiene
+        """
+        token = uuid.uuid4().hex
+        if not self.enabled:
+            now = time.monotonic()
+            with self._memory_locks_guard:
+                current = self._memory_locks.get(key)
+                if current and current[1] > now:
+                    return None
+                self._memory_locks[key] = (token, now + ttl)
+            return token
+        
+        try:
+            if self.client.set(key, token, nx=True, px=int(ttl * 1000)):
+                return token
+            return None
+        except Exception as e:
+            # Sin lock distribuido se calcula localmente (mejor que no responder)
+            logger.error(f"❌ Error tomando lock en Redis: {e}")
+            return token
+    
+    def release_lock(self, key: str, token: str):
+        """Libera un lock tomado con acquire_lock (solo si el token coincide)"""
+        if not self.enabled:
+            with self._memory_locks_guard:
+                current = self._memory_locks.get(key)
+                if current and current[0] == token:
+                    del self._memory_locks[key]
+            return
+        
+        try:
+            self.client.eval(RELEASE_LOCK_SCRIPT, 1, key, token)
+        except Exception as e:
+            logger.error(f"❌ Error liberando lock en Redis: {e}")
+    
     def is_enabled(self) -> bool:
         """Check if Redis is enabled and working"""
         return self.enabled
@@ -161,7 +272,8 @@ class RedisService:
                 "backend": "memory",
                 "enabled": False,
                 "keys_count": len(self._memory_cache),
-                "warning": "Usando caché en memoria (no recomendado para producción)"
+                "warning": "Usando caché en memoria (no recomendado para producción)",
+                "response_cache": self.cache_stats.snapshot()
             }
         
         try:
@@ -172,71 +284,221 @@ class RedisService:
                 "keys_count": self.client.dbsize(),
                 "used_memory": info.get("used_memory_human", "N/A"),
                 "connected_clients": info.get("connected_clients", 0),
-                "uptime_seconds": info.get("uptime_in_seconds", 0)
+                "uptime_seconds": info.get("uptime_in_seconds", 0),
+                "response_cache": self.cache_stats.snapshot()
             }
         except Exception as e:
             return {
                 "backend": "redis",
                 "enabled": False,
-                "error": str(e)
+                "error": str(e),
+                "response_cache": self.cache_stats.snapshot()
             }
 
 # Singleton instance
 redis_service = RedisService()
 
+class ResponseCache:
+    """
+    Caché de respuestas sobre RedisService
+    
+    - Single-flight: ante una clave fría solo un request recalcula; los demás
+      del mismo proceso esperan su resultado y los de otros procesos esperan
+      a que aparezca la entrada (lock distribuido "lock:<clave>")
+    - Stale-while-revalidate: durante `stale_ttl` segundos tras vencer el TTL
+      se sigue sirviendo la entrada anterior; el request que obtiene el lock
+      la recalcula y el resto recibe la versión anterior sin esperar
+    """
+    
+    VALUE_FIELD = "_cached_value"
+    STORED_AT_FIELD = "_cached_at"
+    LOCK_PREFIX = "lock:"
+    
+    def __init__(self, backend: RedisService, lock_timeout: float = 30.0, poll_interval: float = 0.05):
+        self.backend = backend
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+    
+    def _read(self, key: str) -> Optional[dict]:
+        entry = self.backend.get(key)
+        if isinstance(entry, dict) and self.VALUE_FIELD in entry and self.STORED_AT_FIELD in entry:
+            return entry
+        return None  # Vacía o con formato anterior
+    
+    async def get_or_compute(
+        self,
+        prefix: str,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int,
+        stale_ttl: int = 0
+    ) -> Any:
+        stats = self.backend.cache_stats
+        entry = self._read(key)
+        
+        if entry is not None:
+            age = time.time() - entry[self.STORED_AT_FIELD]
+            if age < ttl:
+                stats.record(prefix, 'hits')
+                return entry[self.VALUE_FIELD]
+            
+            if age < ttl + stale_ttl:
+                token = None if key in self._inflight else self.backend.acquire_lock(self.LOCK_PREFIX + key, self.lock_timeout)
+                if token is None:
+                    stats.record(prefix, 'stale_hits')
+                    return entry[self.VALUE_FIELD]
+                logger.debug(f"Cache REVALIDATE: {key}")
+                return await self._compute(prefix, key, compute, ttl, stale_ttl, token)
+        
+        stats.record(prefix, 'misses')
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            stats.record(prefix, 'coalesced')
+            return await asyncio.shield(inflight)
+        
+        token = self.backend.acquire_lock(self.LOCK_PREFIX + key, self.lock_timeout)
+        if token is None:
+            # Otro proceso está calculando: esperar su entrada hasta el timeout del lock
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                entry = self._read(key)
+                if entry is not None:
+                    stats.record(prefix, 'coalesced')
+                    return entry[self.VALUE_FIELD]
+            logger.warning(f"⚠️  Lock de caché vencido sin resultado, recalculando: {key}")
+        
+        logger.debug(f"Cache MISS: {key}")
+        return await self._compute(prefix, key, compute, ttl, stale_ttl, token)
+    
+    async def _compute(self, prefix, key, compute, ttl, stale_ttl, token: Optional[str]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        start = time.perf_counter()
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Marcar como consultada si no hay nadie esperando
+            raise
+        else:
+            self.backend.set(key, {self.VALUE_FIELD: value, self.STORED_AT_FIELD: time.time()}, ttl + stale_ttl)
+            future.set_result(value)
+            self.backend.cache_stats.record_recompute(prefix, (time.perf_counter() - start) * 1000)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+            if token:
+                self.backend.release_lock(self.LOCK_PREFIX + key, token)
+
+
+response_cache = ResponseCache(redis_service)
+
+
+def _normalize_key_value(value: Any) -> str:
+    """Representación estable de un parámetro para la clave de caché"""
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set)):
+        return ",".join(sorted(_normalize_key_value(v) for v in value))
+    return str(value).strip()
+
+
+def tenant_cache_key(*params: str) -> Callable[[Dict[str, Any]], str]:
+    """
+    Función de clave por tenant: empresa del usuario ('all' para superadmin
+    sin empresa), rol y los parámetros indicados normalizados
+    
+    Example:
+        @cache_result("dashboard:top_impresoras", ttl=600, key=tenant_cache_key("limit"))
+        -> "dashboard:top_impresoras:empresa=3:rol=admin:limit=5"
+    """
+    def build(arguments: Dict[str, Any]) -> str:
+        user = arguments.get('current_user')
+        empresa_id = getattr(user, 'empresa_id', None)
+        parts = [
+            f"empresa={empresa_id if empresa_id is not None else 'all'}",
+            f"rol={getattr(user, 'rol', None) or 'anon'}",
+        ]
+        parts.extend(f"{name}={_normalize_key_value(arguments.get(name))}" for name in params)
+        return ":".join(parts)
+    
+    return build
+
+
 # Decorator for caching
-def cache_result(key_prefix: str, ttl: int = 300):
+def cache_result(
+    key_prefix: str,
+    ttl: int = 300,
+    key: Optional[Callable[[Dict[str, Any]], str]] = None,
+    stale_ttl: int = 0
+):
     """
     Decorator to cache function results
     
     Args:
         key_prefix: Prefix for cache key (e.g., 'dashboard:kpis')
         ttl: Time to live in seconds (default: 300 = 5 minutes)
+        key: Función que recibe los argumentos (por nombre) y retorna el resto
+            de la clave; por defecto tenant_cache_key() (empresa y rol)
+        stale_ttl: Segundos tras el TTL en que se sirve la entrada anterior
+            mientras un único request la recalcula (0 = desactivado)
     
     Example:
-        @cache_result("dashboard:kpis", ttl=300)
-        async def get_dashboard_kpis(db: Session):
+        @cache_result("dashboard:kpis", ttl=300, key=tenant_cache_key(), stale_ttl=300)
+        async def get_dashboard_kpis(db: Session, current_user: AdminUser):
             # This result will be cached for 5 minutes
             return expensive_query(db)
     """
+    key_func = key or tenant_cache_key()
+    
     def decorator(func):
+        signature = inspect.signature(func)
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Generate cache key from function arguments
-            key_parts = [key_prefix]
-            
-            # Add positional args (skip 'self' and 'db' Session objects)
-            for arg in args:
-                if not hasattr(arg, '__class__') or arg.__class__.__name__ not in ['Session', 'Request']:
-                    key_parts.append(str(arg))
-            
-            # Add keyword args (skip 'db' Session objects)
-            for k, v in sorted(kwargs.items()):
-                if k != 'db' and not (hasattr(v, '__class__') and v.__class__.__name__ == 'Session'):
-                    key_parts.append(f"{k}={v}")
-            
-            cache_key = ":".join(key_parts)
-            
-            # Try to get from cache
-            cached = redis_service.get(cache_key)
-            if cached is not None:
-                logger.debug(f"Cache HIT: {cache_key}")
-                return cached
-            
-            logger.debug(f"Cache MISS: {cache_key}")
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            cache_key = f"{key_prefix}:{key_func(arguments)}"
             
-            # Execute function
-            result = await func(*args, **kwargs)
-            
-            # Store in cache
-            redis_service.set(cache_key, result, ttl)
-            
-            return result
+            return await response_cache.get_or_compute(
+                key_prefix, cache_key, lambda: func(*args, **kwargs), ttl, stale_ttl
+            )
         
         return wrapper
     return decorator
 
 
+def create_async_redis_client():
+    """
+    Cliente redis.asyncio con la misma configuración que RedisService
+    (REDIS_URL o REDIS_HOST/REDIS_PORT/REDIS_DB/REDIS_PASSWORD)
+    
+    Sin socket_timeout: las suscripciones pub/sub esperan mensajes indefinidamente
+    """
+    import redis.asyncio as aioredis
+    
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        return aioredis.from_url(redis_url, decode_responses=True)
+    return aioredis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=int(os.getenv("REDIS_DB", 0)),
+        password=os.getenv("REDIS_PASSWORD", None) or None,
+        decode_responses=True,
+        socket_connect_timeout=2
+    )
+
+
 # Health check function
 def check_redis_health() -> dict:
     """
@@ -0,0 +1,640 @@
+"""
+Ricoh Async Web Client
+Variante asyncio de RicohWebClient sobre httpx para los endpoints async:
+las lecturas (usuarios, detalles, trabajos) se hacen con await y se reparten
+por la flota con asyncio.gather, sin hilos ni bloquear el event loop
+
+Cada impresora tiene su propio httpx.AsyncClient: cookies de WIM aisladas,
+conexiones keep-alive reutilizadas entre llamadas y un máximo de conexiones
+simultáneas por equipo
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+from bs4 import BeautifulSoup
+
+from services.parsers.ricoh_session import DEFAULT_HEADERS, ricoh_session_manager
+from services.ricoh_web_client import (
+    ADDRESS_BOOK_BATCH_SIZE,
+    ADDRESS_BOOK_MAX_ENTRIES,
+    LIST_EMPTY_PERMISSIONS,
+    RicohWebClient,
+    build_login_form,
+    build_user_list,
+    extract_wim_token,
+    find_function_checkboxes,
+    is_address_list_page,
+    login_password_candidates,
+    mask_token,
+    parse_address_book_batch,
+    parse_stored_jobs,
+    parse_user_details,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RicohAsyncClientConfig:
+    """Configuración de las conexiones del cliente asíncrono"""
+    max_connections_per_printer: int = 2  # WIM solo tolera pocas conexiones simultáneas
+    keepalive_expiry: float = 30.0  # Segundos que una conexión ociosa sigue abierta
+    connect_timeout: float = 3.05
+    read_timeout: float = 30.0
+
+
+def load_ricoh_async_client_config_from_env() -> RicohAsyncClientConfig:
+    """Carga la configuración del cliente asíncrono desde variables de entorno"""
+    try:
+        config = RicohAsyncClientConfig(
+            max_connections_per_printer=int(os.getenv('RICOH_ASYNC_MAX_CONNECTIONS_PER_PRINTER', '2')),
+            keepalive_expiry=float(os.getenv('RICOH_ASYNC_KEEPALIVE_EXPIRY', '30.0'))
+        )
+
+        if config.max_connections_per_printer <= 0:
+            logger.warning(f"Invalid RICOH_ASYNC_MAX_CONNECTIONS_PER_PRINTER ({config.max_connections_per_printer}), using default 2")
+            config.max_connections_per_printer = 2
+
+        if config.keepalive_expiry <= 0:
+            logger.warning(f"Invalid RICOH_ASYNC_KEEPALIVE_EXPIRY ({config.keepalive_expiry}), using default 30.0")
+            config.keepalive_expiry = 30.0
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading Ricoh async client configuration from environment: {e}, using defaults")
+        return RicohAsyncClientConfig()
+
+
+class _PrinterState:
+    """Cliente HTTP de una impresora y estado de su sesión WIM"""
+
+    __slots__ = ('http', 'lock', 'loop', 'authenticated', 'shared', 'wim_token', 'loaded_batches')
+
+    def __init__(self, http: httpx.AsyncClient, loop: asyncio.AbstractEventLoop):
+        self.http = http
+        # WIM no soporta flujos concurrentes en la misma sesión (BADFLOW)
+        self.lock = asyncio.Lock()
+        self.loop = loop
+        self.authenticated = False
+        self.shared = False  # La sesión usa cookies del pool compartido
+        self.wim_token = ""
+        self.loaded_batches: Dict[int, str] = {}  # lote -> wimToken con el que se cargó
+
+    def reset(self) -> None:
+        self.http.cookies.clear()
+        self.authenticated = False
+        self.shared = False
+        self.wim_token = ""
+        self.loaded_batches.clear()
+
+
+class AsyncRicohWebClient:
+    """
+    Cliente asíncrono de Web Image Monitor con los mismos métodos públicos
+    que RicohWebClient
+
+    - Lecturas (read_users_from_printer, find_specific_user, get_user_details,
+      get_stored_jobs, test_connection) nativas sobre httpx
+    - Escrituras (provision_user, update_user_in_printer, set_user_functions,
+      delete_user_from_printer, delete_stored_job) delegadas en los flujos de
+      RicohWebClient en un hilo, serializadas con las lecturas de la impresora
+    """
+
+    def __init__(
+        self,
+        admin_user: str = "admin",
+        admin_password: Optional[str] = None,
+        config: Optional[RicohAsyncClientConfig] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            admin_user: Administrator username (default: "admin")
+            admin_password: Administrator password (RICOH_ADMIN_PASSWORD si no se indica)
+            config: Límites de conexión (por defecto desde el entorno)
+            transport: Transporte httpx alternativo (tests)
+        """
+        if admin_password is None:
+            admin_password = os.getenv("RICOH_ADMIN_PASSWORD", None)
+        if admin_password is None:
+            raise ValueError(
+                "RICOH_ADMIN_PASSWORD must be set. "
+                "Provide admin_password parameter or set RICOH_ADMIN_PASSWORD environment variable."
+            )
+
+        self.admin_user = admin_user
+        self.admin_password = admin_password
+        self.config = config or load_ricoh_async_client_config_from_env()
+        self._transport = transport
+        self._printers: Dict[str, _PrinterState] = {}
+        self._sync_client: Optional[RicohWebClient] = None
+
+    # ------------------------------------------------------------------
+    # Conexiones y sesión
+    # ------------------------------------------------------------------
+
+    def _create_http(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.config.max_connections_per_printer,
+            max_keepalive_connections=self.config.max_connections_per_printer,
+            keepalive_expiry=self.config.keepalive_expiry
+        )
+        return httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            verify=False,
+            timeout=httpx.Timeout(self.config.read_timeout, connect=self.config.connect_timeout),
+            limits=limits,
+            follow_redirects=True,
+            transport=self._transport
+        )
+
+    def _state(self, printer_ip: str) -> _PrinterState:
+        """
+        Estado de la impresora; se recrea si cambió el event loop (las
+        conexiones y el lock de httpx/asyncio pertenecen a su loop)
+        """
+        loop = asyncio.get_running_loop()
+        state = self._printers.get(printer_ip)
+        if state is None or state.loop is not loop:
+            state = _PrinterState(self._create_http(), loop)
+            self._printers[printer_ip] = state
+        return state
+
+    @asynccontextmanager
+    async def _printer_session(self, printer_ip: str) -> AsyncIterator[_PrinterState]:
+        """Reserva la sesión WIM de la impresora durante un flujo completo"""
+        state = self._state(printer_ip)
+        async with state.lock:
+            yield state
+
+    @property
+    def sync_client(self) -> RicohWebClient:
+        """Cliente síncrono usado para los flujos de escritura"""
+        if self._sync_client is None:
+            self._sync_client = RicohWebClient(
+                timeout=self.config.read_timeout,
+                admin_user=self.admin_user,
+                admin_password=self.admin_password
+            )
+        return self._sync_client
+
+    async def _run_sync(self, printer_ip: str, method_name: str, *args, **kwargs):
+        async with self._printer_session(printer_ip):
+            method = getattr(self.sync_client, method_name)
+            return await asyncio.to_thread(method, printer_ip, *args, **kwargs)
+
+    async def aclose(self) -> None:
+        """Cierra las conexiones abiertas en el event loop actual"""
+        loop = asyncio.get_running_loop()
+        printers, self._printers = self._printers, {}
+        for state in printers.values():
+            if state.loop is loop:
+                await state.http.aclose()
+
+    # ------------------------------------------------------------------
+    # Autenticación
+    # ------------------------------------------------------------------
+
+    async def _verify_session(self, state: _PrinterState, printer_ip: str) -> bool:
+        """Comprueba con la libreta de direcciones que las cookies actuales son válidas"""
+        test_url = f"http://{printer_ip}/web/entry/es/address/adrsList.cgi"
+        response = await state.http.get(test_url, follow_redirects=False)
+        if not is_address_list_page(response.status_code, response.text):
+            return False
+        state.wim_token = extract_wim_token(response.text) or state.wim_token
+        state.authenticated = True
+        return True
+
+    async def _adopt_pooled_session(self, state: _PrinterState, printer_ip: str) -> bool:
+        """Reutiliza las cookies de una sesión autenticada del pool compartido (parsers)"""
+        try:
+            if not ricoh_session_manager.share_cookies(printer_ip, state.http):
+                return False
+            if await self._verify_session(state, printer_ip):
+                logger.info(f"🔄 Reutilizando sesión WIM del pool compartido para {printer_ip}")
+                state.shared = True
+                return True
+            state.http.cookies.clear()
+        except Exception as e:
+            logger.debug(f"Error reutilizando sesión del pool: {e}")
+        return False
+
+    async def _load_session_cookies(self, state: _PrinterState, printer_ip: str) -> bool:
+        """Carga las cookies de WIM guardadas en Redis y verifica la sesión"""
+        try:
+            from services.redis_service import redis_service
+            if not redis_service.is_enabled():
+                return False
+            cookies_dict = redis_service.get(f"wim:cookies:{printer_ip}")
+            if not cookies_dict:
+                return False
+            state.http.cookies.update(cookies_dict)
+            if await self._verify_session(state, printer_ip):
+                logger.info(f"🔄 Reutilizando sesión WIM activa de Redis para {printer_ip}")
+                return True
+            state.http.cookies.clear()
+        except Exception as e:
+            logger.debug(f"Error cargando cookies de Redis: {e}")
+        return False
+
+    def _save_session_cookies(self, state: _PrinterState, printer_ip: str) -> None:
+        """Guarda las cookies de WIM en Redis durante 15 minutos"""
+        try:
+            from services.redis_service import redis_service
+            if redis_service.is_enabled():
+                cookies_dict = {cookie.name: cookie.value for cookie in state.http.cookies.jar}
+                if cookies_dict:
+                    redis_service.set(f"wim:cookies:{printer_ip}", cookies_dict, ttl=900)
+        except Exception as e:
+            logger.debug(f"Error guardando cookies en Redis: {e}")
+
+    async def _authenticate(self, state: _PrinterState, printer_ip: str, admin_password: Optional[str] = None) -> bool:
+        """Autentica la sesión de la impresora (mismo flujo que RicohWebClient._authenticate)"""
+        if state.authenticated:
+            return True
+
+        if await self._adopt_pooled_session(state, printer_ip):
+            return True
+        if await self._load_session_cookies(state, printer_ip):
+            return True
+
+        # Cookie para evitar la redirección del cookie checker de WIM
+        state.http.cookies.set('cookieOnOffChecker', 'on', path='/')
+        logger.info(f"🔒 Autenticando con impresora {printer_ip}...")
+
+        try:
+            if await self._verify_session(state, printer_ip):
+                logger.debug("Sesión ya activa")
+                self._save_session_cookies(state, printer_ip)
+                return True
+
+            logger.info(f"🔑 Realizando login con usuario: {self.admin_user}")
+            passwords_to_try = login_password_candidates(admin_password, self.admin_password)
+            login_form_url = f"http://{printer_ip}/web/guest/es/websys/webArch/authForm.cgi"
+            login_url = f"http://{printer_ip}/web/guest/es/websys/webArch/login.cgi"
+
+            for current_pwd in passwords_to_try:
+                if current_pwd != passwords_to_try[0]:
+                    logger.info(f"🔑 Reintentando login con contraseña alternativa para {printer_ip}...")
+
+                form_response = await state.http.get(login_form_url)
+                login_token = extract_wim_token(form_response.text)
+                if not login_token:
+                    logger.error("❌ No se pudo obtener wimToken para el login")
+                    continue
+
+                await state.http.post(login_url, data=build_login_form(login_token, self.admin_user, current_pwd))
+
+                if await self._verify_session(state, printer_ip):
+                    logger.info(f"✅ Autenticación exitosa")
+                    self._save_session_cookies(state, printer_ip)
+                    return True
+
+            logger.error(f"❌ Autenticación fallida")
+            return False
+
+        except httpx.HTTPError as e:
+            logger.error(f"❌ Error durante autenticación: {e}")
+            return False
+
+    async def _logout(self, state: _PrinterState, printer_ip: str) -> None:
+        """
+        Cierra la sesión WIM para liberar el bloqueo del equipo; las conexiones
+        keep-alive se conservan para la siguiente llamada
+        """
+        try:
+            logout_url = f"http://{printer_ip}/web/guest/es/websys/webArch/logout.cgi"
+            logger.info(f"🔓 Cerrando sesión WIM en la impresora {printer_ip}...")
+            await state.http.get(logout_url, timeout=httpx.Timeout(5.0, connect=self.config.connect_timeout))
+        except httpx.HTTPError as e:
+            logger.debug(f"Error durante logout en {printer_ip}: {e}")
+        finally:
+            if state.shared:
+                # La sesión WIM era del pool compartido: ya no es válida
+                ricoh_session_manager.invalidate(printer_ip)
+            state.reset()
+            try:
+                from services.redis_service import redis_service
+                if redis_service.is_enabled():
+                    redis_service.delete(f"wim:cookies:{printer_ip}")
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # Libreta de direcciones
+    # ------------------------------------------------------------------
+
+    async def read_users_from_printer(self, printer_ip: str, fast_list: bool = False, admin_password: Optional[str] = None, logout: bool = True) -> list:
+        """
+        Lee todos los usuarios de la libreta de direcciones de la impresora
+
+        Args:
+            printer_ip: IP de la impresora
+            fast_list: Solo la lista (permisos vacíos, 'lazy': True) sin pedir detalles
+            admin_password: Contraseña de la impresora (DB)
+            logout: Cerrar la sesión WIM al terminar
+        """
+        async with self._printer_session(printer_ip) as state:
+            try:
+                return await self._read_users(state, printer_ip, fast_list, admin_password)
+            finally:
+                if logout:
+                    await self._logout(state, printer_ip)
+
+    async def find_specific_user(self, printer_ip: str, user_code: str, admin_password: Optional[str] = None, logout: bool = True) -> Optional[Dict]:
+        """Busca un usuario por código y lee sus permisos reales"""
+        async with self._printer_session(printer_ip) as state:
+            try:
+                return await self._find_specific_user(state, printer_ip, user_code, admin_password)
+            finally:
+                if logout:
+                    await self._logout(state, printer_ip)
+
+    async def get_user_details(self, printer_ip: str, entry_index: str, admin_password: Optional[str] = None, logout: bool = False) -> Optional[Dict]:
+        """Permisos y carpeta SMB de un usuario (None si no se pudieron leer)"""
+        async with self._printer_session(printer_ip) as state:
+            try:
+                if not await self._authenticate(state, printer_ip, admin_password):
+                    logger.error(f"❌ No se pudo autenticar con {printer_ip}")
+                    return None
+                return await self._get_user_details(state, printer_ip, entry_index, admin_password)
+            finally:
+                if logout:
+                    await self._logout(state, printer_ip)
+
+    async def _read_users(self, state: _PrinterState, printer_ip: str, fast_list: bool, admin_password: Optional[str]) -> list:
+        logger.info(f"📋 Leyendo usuarios de {printer_ip} vía AJAX (CGI)... {'(Modo Rápido)' if fast_list else ''}")
+
+        try:
+            if not await self._authenticate(state, printer_ip, admin_password):
+                logger.error(f"❌ No se pudo autenticar con {printer_ip}")
+                return []
+
+            ajax_url = f"http://{printer_ip}/web/entry/es/address/adrsListLoadEntry.cgi"
+            headers = {
+                'X-Requested-With': 'XMLHttpRequest',
+                'Referer': f'http://{printer_ip}/web/entry/es/address/adrsList.cgi'
+            }
+
+            # Lotes de 50 usuarios hasta recibir un lote incompleto
+            all_users = []
+            for batch in range(1, ADDRESS_BOOK_MAX_ENTRIES // ADDRESS_BOOK_BATCH_SIZE + 2):
+                payload = {'listCountIn': str(ADDRESS_BOOK_BATCH_SIZE), 'getCountIn': str(batch)}
+                try:
+                    response = await state.http.post(ajax_url, data=payload, headers=headers)
+                except httpx.HTTPError as batch_error:
+                    logger.error(f"   Error en lote {batch}: {batch_error}")
+                    break
+
+                response_text = response.text.strip()
+                if response.status_code != 200 or not response_text:
+                    break
+
+                entries, batch_count = parse_address_book_batch(response_text)
+                all_users.extend(entries)
+                if batch_count is not None and batch_count < ADDRESS_BOOK_BATCH_SIZE:
+                    break
+
+            unique_user_data = build_user_list(all_users)
+
+            if fast_list:
+                logger.info(f"✅ Lista básica obtenida: {len(unique_user_data)} usuarios (Saltando detalles)")
+                return [
+                    {
+                        'nombre': nombre,
+                        'codigo': codigo,
+                        'entry_index': entry_index,
+                        'empresa': '',
+                        'permisos': LIST_EMPTY_PERMISSIONS.copy(),
+                        'carpeta': carpeta,
+                        'lazy': True
+                    }
+                    for nombre, codigo, entry_index, carpeta in unique_user_data
+                ]
+
+            # Secuencial: Ricoh no soporta flujos concurrentes en la misma sesión (BADFLOW)
+            final_users = []
+            for count, (nombre, codigo, entry_index, carpeta) in enumerate(unique_user_data, 1):
+                details = await self._get_user_details(state, printer_ip, entry_index, admin_password)
+                final_users.append({
+                    'nombre': nombre,
+                    'codigo': codigo,
+                    'entry_index': entry_index,
+                    'empresa': '',
+                    'permisos': details.get('permisos', {}) if details else LIST_EMPTY_PERMISSIONS.copy(),
+                    'carpeta': carpeta or (details.get('carpeta', '') if details else ''),
+                    'lazy': False
+                })
+                if count % 50 == 0:
+                    logger.info(f"   ... {count}/{len(unique_user_data)} usuarios procesados")
+
+            logger.info(f"✅ Sincronización completa: {len(final_users)} usuarios leídos de {printer_ip}")
+            return final_users
+        except Exception as e:
+            logger.error(f"❌ Error leyendo usuarios vía AJAX: {e}")
+            return []
+
+    async def _find_specific_user(self, state: _PrinterState, printer_ip: str, user_code: str, admin_password: Optional[str]) -> Optional[Dict]:
+        logger.info(f"🔍 Buscando usuario {user_code} en {printer_ip}...")
+
+        all_users = await self._read_users(state, printer_ip, True, admin_password)
+        user_code_str = str(user_code).strip()
+        target_user = next(
+            (user for user in all_users if str(user.get('codigo', '')).strip() == user_code_str),
+            None
+        )
+        if not target_user:
+            logger.warning(f"❌ Usuario {user_code} no encontrado en {printer_ip}")
+            return None
+
+        details = await self._get_user_details(state, printer_ip, target_user['entry_index'], admin_password)
+        if not details:
+            logger.error(f"❌ No se pudieron recuperar los detalles reales del usuario {user_code}")
+            return None
+
+        target_user['permisos'] = details.get('permisos', {})
+        target_user['carpeta'] = details.get('carpeta', '')
+        target_user['lazy'] = False
+        logger.info(f"✅ Usuario {user_code} encontrado: {target_user.get('nombre')} (entry_index: {target_user.get('entry_index')})")
+        return target_user
+
+    async def _load_user_form(self, state: _PrinterState, printer_ip: str, entry_index: str, batch: int) -> httpx.Response:
+        """
+        Flujo de lectura del formulario de un usuario: wimToken fresco, carga del
+        lote que contiene la entrada (evita BADFLOW) y adrsGetUser MODUSER/PROGRAMMED
+        """
+        list_url = f"http://{printer_ip}/web/entry/es/address/adrsList.cgi"
+        list_resp = await state.http.get(list_url)
+        state.wim_token = extract_wim_token(list_resp.text) or state.wim_token
+
+        if state.loaded_batches.get(batch) != state.wim_token:
+            await state.http.post(
+                f"http://{printer_ip}/web/entry/es/address/adrsListLoadEntry.cgi",
+                data={'wimToken': state.wim_token, 'listCountIn': str(ADDRESS_BOOK_BATCH_SIZE), 'getCountIn': str(batch)},
+                headers={'X-Requested-With': 'XMLHttpRequest', 'Referer': list_url}
+            )
+            state.loaded_batches[batch] = state.wim_token
+            logger.debug(f"🔄 Loaded batch {batch} for {printer_ip} (WIM token: {mask_token(state.wim_token)})")
+
+        return await state.http.post(
+            f"http://{printer_ip}/web/entry/es/address/adrsGetUser.cgi",
+            data={
+                'wimToken': state.wim_token,
+                'mode': 'MODUSER',
+                'outputSpecifyModeIn': 'PROGRAMMED',
+                'entryIndexIn': entry_index
+            },
+            headers={'Referer': list_url},
+            follow_redirects=False
+        )
+
+    async def _get_user_details(self, state: _PrinterState, printer_ip: str, entry_index: str, admin_password: Optional[str] = None) -> Optional[Dict]:
+        """Lee permisos y carpeta de un usuario (mismo flujo que RicohWebClient._get_user_details)"""
+        if not entry_index or not entry_index.strip():
+            logger.error(f"❌ entry_index vacío o inválido: '{entry_index}'")
+            return None
+        try:
+            batch = (int(entry_index) // ADDRESS_BOOK_BATCH_SIZE) + 1
+        except ValueError:
+            logger.error(f"❌ entry_index no es numérico: '{entry_index}'")
+            return None
+
+        try:
+            response = await self._load_user_form(state, printer_ip, entry_index, batch)
+
+            # Sesión expirada: re-autenticar y repetir el flujo completo
+            if "authForm.cgi" in response.text or response.is_redirect:
+                logger.warning(f"⚠️  Sesión expirada, re-autenticando...")
+                state.reset()
+                if not await self._authenticate(state, printer_ip, admin_password):
+                    logger.error(f"❌ No se pudo re-autenticar")
+                    return None
+                response = await self._load_user_form(state, printer_ip, entry_index, batch)
+
+            if "BADFLOW" in response.text:
+                logger.warning(f"⚠️  BADFLOW inesperado con flujo correcto")
+                return None
+            if response.status_code != 200:
+                logger.warning(f"⚠️  HTTP falló (Status {response.status_code})")
+                return None
+
+            soup = BeautifulSoup(response.text, 'html.parser')
+            checkboxes = find_function_checkboxes(soup)
+
+            # Sin checkboxes puede ser un error temporal del equipo: un reintento
+            if not checkboxes:
+                logger.warning(f"⚠️  No se encontraron checkboxes en primer intento, reintentando...")
+                if "authForm.cgi" in response.text or "<form name='form1'" in response.text:
+                    state.reset()
+                    if not await self._authenticate(state, printer_ip, admin_password):
+                        logger.error(f"❌ No se pudo re-autenticar")
+                        return None
+                await asyncio.sleep(2)
+                state.loaded_batches.pop(batch, None)
+                response = await self._load_user_form(state, printer_ip, entry_index, batch)
+                soup = BeautifulSoup(response.text, 'html.parser')
+                checkboxes = find_function_checkboxes(soup)
+
+            if not checkboxes:
+                logger.error(f"❌ No se encontraron checkboxes en el HTML")
+                return None
+
+            return parse_user_details(soup, checkboxes)
+
+        except httpx.HTTPError as e:
+            logger.error(f"❌ Error leyendo detalles: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Trabajos de impresión
+    # ------------------------------------------------------------------
+
+    async def get_stored_jobs(self, printer_ip: str, admin_password: Optional[str] = None) -> list:
+        """Trabajos almacenados/bloqueados de storedJob.cgi"""
+        logger.info(f"Scraping stored jobs from printer {printer_ip}...")
+
+        async with self._printer_session(printer_ip) as state:
+            if not await self._authenticate(state, printer_ip, admin_password):
+                logger.error(f"❌ Cannot proceed with get_stored_jobs without authentication for {printer_ip}")
+                return []
+
+            try:
+                response = await state.http.get(
+                    f"http://{printer_ip}/web/entry/es/webprinter/storedJob.cgi",
+                    headers={'Referer': f'http://{printer_ip}/web/entry/es/websys/webArch/topPage.cgi'}
+                )
+            except httpx.HTTPError as e:
+                logger.error(f"❌ Error fetching stored jobs from printer {printer_ip}: {e}")
+                return []
+
+        if response.status_code != 200:
+            logger.error(f"❌ Failed to fetch stored jobs page (Status {response.status_code})")
+            return []
+
+        jobs = parse_stored_jobs(response.text)
+        if jobs is None:
+            logger.warning("⚠️ Table reportListCommon not found in WIM stored jobs page")
+            return []
+        return jobs
+
+    async def test_connection(self, printer_ip: str) -> bool:
+        """True si la interfaz web de la impresora responde"""
+        try:
+            response = await self._state(printer_ip).http.get(f"http://{printer_ip}")
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    # ------------------------------------------------------------------
+    # Escrituras (flujos de RicohWebClient)
+    # ------------------------------------------------------------------
+
+    async def provision_user(self, printer_ip: str, user_config: Dict, admin_password: Optional[str] = None, logout: bool = True):
+        return await self._run_sync(printer_ip, 'provision_user', user_config, admin_password=admin_password, logout=logout)
+
+    async def update_user_in_printer(self, printer_ip: str, user_data: Dict, admin_password: Optional[str] = None, logout: bool = True) -> bool:
+        return await self._run_sync(printer_ip, 'update_user_in_printer', user_data, admin_password=admin_password, logout=logout)
+
+    async def set_user_functions(self, printer_ip: str, entry_index: str, permissions: Dict, admin_password: Optional[str] = None, set_password: bool = True, logout: bool = True) -> bool:
+        return await self._run_sync(
+            printer_ip, 'set_user_functions', entry_index, permissions,
+            admin_password=admin_password, set_password=set_password, logout=logout
+        )
+
+    async def delete_user_from_printer(self, printer_ip: str, entry_index: str, admin_password: Optional[str] = None, logout: bool = True) -> bool:
+        return await self._run_sync(printer_ip, 'delete_user_from_printer', entry_index, admin_password=admin_password, logout=logout)
+
+    async def delete_stored_job(self, printer_ip: str, job_id: str, admin_password: Optional[str] = None, job_type: str = "stored") -> bool:
+        return await self._run_sync(printer_ip, 'delete_stored_job', job_id, admin_password=admin_password, job_type=job_type)
+
+
+# Singleton instance
+_async_ricoh_web_client: Optional[AsyncRicohWebClient] = None
+
+
+def get_async_ricoh_web_client() -> AsyncRicohWebClient:
+    """
+    Get or create singleton async Ricoh web client instance
+
+    Returns:
+        AsyncRicohWebClient instance
+    """
+    global _async_ricoh_web_client
+    if _async_ricoh_web_client is None:
+        _async_ricoh_web_client = AsyncRicohWebClient(
+            admin_user=os.getenv('RICOH_ADMIN_USER', 'admin'),
+            admin_password=os.getenv('RICOH_ADMIN_PASSWORD', '')
+        )
+    return _async_ricoh_web_client
+
+
+async def close_async_ricoh_web_client() -> None:
+    """Cierra las conexiones del singleton (shutdown de la aplicación)"""
+    if _async_ricoh_web_client is not None:
+        await _async_ricoh_web_client.aclose()
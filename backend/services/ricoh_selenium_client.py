@@ -1,19 +1,38 @@
+"""
+Ricoh Selenium Client
+Lectura y escritura de permisos de usuario. Se hacen por HTTP repitiendo el flujo
+de formularios de Web Image Monitor (RicohWebClient), en paralelo entre
+impresoras; el navegador headless solo se usa como fallback opcional
+(RICOH_SELENIUM_FALLBACK=true) cuando el flujo HTTP falla
+"""
 import os
 import time
 import re
 import logging
+import threading
 import requests
+from dataclasses import dataclass
 from typing import Dict, Optional, List
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class SeleniumFallbackConfig:
+    """Configuración del fallback con navegador"""
+    enabled: bool = False  # Usar Selenium cuando el flujo HTTP falla (BADFLOW persistente)
+
+
+def load_selenium_fallback_config_from_env() -> SeleniumFallbackConfig:
+    """Carga la configuración del fallback con navegador desde variables de entorno"""
+    value = os.getenv('RICOH_SELENIUM_FALLBACK', 'false').lower()
+    if value not in ('true', '1', 'yes', 'false', '0', 'no', ''):
+        logger.warning(f"Invalid RICOH_SELENIUM_FALLBACK ({value}), using default false")
+    return SeleniumFallbackConfig(enabled=value in ('true', '1', 'yes'))
+
+
+selenium_fallback_config = load_selenium_fallback_config_from_env()
+
 # Mapa global de funciones para consistencia
 FUNC_MAP = {
     'COPY': 'copiadora',
@@ -30,9 +49,15 @@ FUNC_MAP = {
 class RicohSeleniumClient:
     def __init__(self):
         self.driver = None
+        self._lock = threading.Lock()  # Un solo navegador: una operación a la vez
 
     def _init_driver(self):
         if self.driver is None:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.options import Options
+            from selenium.webdriver.chrome.service import Service
+            from webdriver_manager.chrome import ChromeDriverManager
+
             logger.info("   🌐 Iniciando Driver Selenium...")
             chrome_options = Options()
             chrome_options.add_argument("--headless")
@@ -106,6 +131,10 @@ class RicohSeleniumClient:
 
     def _navigate_to_user_edit(self, printer_ip: str, entry_index: str, admin_user: str, admin_password: str, http_session: requests.Session = None) -> bool:
         """Navega a la página de edición de un usuario, manejando login y cookies."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
         try:
             self._init_driver()
             wait = WebDriverWait(self.driver, 15)
@@ -175,6 +204,44 @@ class RicohSeleniumClient:
             return False
 
     def get_user_permissions(self, printer_ip: str, entry_index: str, admin_user: str = "admin", admin_password: str = "", http_session: requests.Session = None) -> Optional[Dict]:
+        """
+        Lee los permisos de un usuario por HTTP (flujo MODUSER/PROGRAMMED de
+        RicohWebClient); el navegador solo se usa si falla y el fallback está activo
+        """
+        from services.ricoh_web_client import RicohWebClient
+
+        client = RicohWebClient(admin_user=admin_user, admin_password=admin_password)
+        permisos = client.get_user_permissions(printer_ip, entry_index, admin_password=admin_password)
+        if permisos is not None or not selenium_fallback_config.enabled:
+            return permisos
+
+        logger.warning(f"⚠️  Lectura HTTP de permisos falló para {entry_index} en {printer_ip}, usando Selenium...")
+        return self.get_user_permissions_with_browser(printer_ip, entry_index, admin_user, admin_password, http_session)
+
+    def set_user_permissions(self, printer_ip: str, entry_index: str, permissions: Dict, admin_user: str = "admin", admin_password: str = "", http_session: requests.Session = None) -> bool:
+        """
+        Actualiza los permisos de un usuario por HTTP (RicohWebClient.set_user_functions,
+        que recurre al navegador solo si el fallback está activo)
+        """
+        from services.ricoh_web_client import RicohWebClient
+
+        client = RicohWebClient(admin_user=admin_user, admin_password=admin_password)
+        return client.set_user_functions(printer_ip, entry_index, permissions, admin_password=admin_password,
+                                         set_password=False) is True
+
+    def get_user_permissions_with_browser(self, printer_ip: str, entry_index: str, admin_user: str = "admin", admin_password: str = "", http_session: requests.Session = None) -> Optional[Dict]:
+        with self._lock:
+            return self._get_user_permissions_with_browser(printer_ip, entry_index, admin_user, admin_password,
+                                                           http_session)
+
+    def set_user_permissions_with_browser(self, printer_ip: str, entry_index: str, permissions: Dict, admin_user: str = "admin", admin_password: str = "", http_session: requests.Session = None) -> bool:
+        with self._lock:
+            return self._set_user_permissions_with_browser(printer_ip, entry_index, permissions, admin_user,
+                                                           admin_password, http_session)
+
+    def _get_user_permissions_with_browser(self, printer_ip: str, entry_index: str, admin_user: str, admin_password: str, http_session: requests.Session) -> Optional[Dict]:
+        from selenium.webdriver.common.by import By
+
         logger.info(f"🚀 SELENIUM: Reading permissions for index={entry_index} on {printer_ip}")
         try:
             if not self._navigate_to_user_edit(printer_ip, entry_index, admin_user, admin_password, http_session):
@@ -218,7 +285,9 @@ class RicohSeleniumClient:
             logger.error(f"❌ Error en get_user_permissions: {e}")
             return None
 
-    def set_user_permissions(self, printer_ip: str, entry_index: str, permissions: Dict, admin_user: str = "admin", admin_password: str = "", http_session: requests.Session = None) -> bool:
+    def _set_user_permissions_with_browser(self, printer_ip: str, entry_index: str, permissions: Dict, admin_user: str, admin_password: str, http_session: requests.Session) -> bool:
+        from selenium.webdriver.common.by import By
+
         logger.info(f"🚀 SELENIUM: Setting permissions for index={entry_index} on {printer_ip}")
         try:
             if not self._navigate_to_user_edit(printer_ip, entry_index, admin_user, admin_password, http_session):
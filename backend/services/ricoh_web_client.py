@@ -15,8 +15,286 @@ from typing import List, Tuple
 import threading
 from functools import wraps
 
+from services.parsers.ricoh_session import create_http_session, ricoh_session_manager
+
 logger = logging.getLogger(__name__)
 
+# Libreta de direcciones: entradas por lote AJAX (el resto del cliente calcula
+# el lote de un entry_index con este tamaño) y máximo de entradas de un equipo
+ADDRESS_BOOK_BATCH_SIZE = 50
+ADDRESS_BOOK_MAX_ENTRIES = 2000
+
+WIM_TOKEN_PATTERN = re.compile(r'name="wimToken"\s+value="(\d+)"')
+
+# Permisos de los usuarios de la lista rápida (no se consultan al equipo)
+LIST_EMPTY_PERMISSIONS = {
+    'copiadora': False, 'escaner': False, 'impresora': False,
+    'document_server': False, 'fax': False, 'navegador': False
+}
+
+
+# ---------------------------------------------------------------------------
+# Parsing de Web Image Monitor (compartido con AsyncRicohWebClient)
+# ---------------------------------------------------------------------------
+
+def extract_wim_token(html: str) -> Optional[str]:
+    """Extrae el wimToken de una página de WIM"""
+    match = WIM_TOKEN_PATTERN.search(html)
+    return match.group(1) if match else None
+
+
+def mask_token(token: str) -> str:
+    """Muestra solo los primeros y últimos 4 caracteres del token"""
+    return f"{token[:4]}...{token[-4:]}" if len(token) > 8 else token
+
+
+def is_address_list_page(status_code: int, html: str) -> bool:
+    """Indica si la respuesta es la libreta de direcciones (sesión autenticada)"""
+    return (status_code == 200
+            and 'wimToken' in html
+            and 'authForm.cgi' not in html
+            and 'login.cgi' not in html)
+
+
+def login_password_candidates(admin_password: Optional[str], default_password: str) -> List[str]:
+    """
+    Contraseñas a intentar en orden de prioridad: la de la impresora (DB),
+    la global de la variable de entorno y la vacía de fábrica
+    """
+    candidates = []
+    if admin_password is not None:
+        candidates.append(admin_password)
+    if default_password not in candidates:
+        candidates.append(default_password)
+    if "" not in candidates:
+        candidates.append("")
+    return candidates
+
+
+def build_login_form(login_token: str, admin_user: str, password: str) -> Dict[str, str]:
+    """Formulario de login.cgi con las credenciales en Base64"""
+    return {
+        'wimToken': login_token,
+        'userid_work': '',
+        'userid': base64.b64encode(admin_user.encode()).decode(),
+        'password_work': '',
+        'password': base64.b64encode(password.encode()).decode() if password else "",
+        'open': '',
+    }
+
+
+def parse_address_book_batch(response_text: str) -> Tuple[List[Tuple[str, str, str, str]], Optional[int]]:
+    """
+    Parsea un lote de adrsListLoadEntry.cgi
+
+    Returns:
+        (entradas (entry_index, nombre, código, carpeta), cantidad de entradas del lote).
+        La cantidad es None si se usó el fallback por regex (lote ilegible)
+    """
+    import ast
+    import json
+
+    entries = []
+    try:
+        # Ricoh responses often use single quotes, which json.loads hates but literal_eval loves
+        try:
+            data = ast.literal_eval(response_text)
+        except (ValueError, SyntaxError):
+            # Fallback to json.loads after replacing single quotes
+            data = json.loads(response_text.replace("'", '"'))
+
+        for entry in data:
+            if len(entry) < 5:
+                continue
+            # Detectar formato basado en cantidad de campos y primer elemento
+            # Formato .253: ['',1,'00001','YESICA GARCIA',1,'AB','','','1717','','\\\\SERVER\\path'] (11 campos)
+            # Formato .252 (9 campos): [231,1,'00001','YESICA GARCIA','1717',...,'\\\\SERVER\\path']
+            # Formato .252 (8 campos): [167,1,'00001','JULIAN','0116',...,'\\\\SERVER\\path']
+            if entry[0] == '' and len(entry) >= 11:
+                # Formato .253: código en posición 8, carpeta SMB en posición 10
+                entries.append((str(entry[2]), str(entry[3]), str(entry[8]), str(entry[10])))
+            elif len(entry) == 9:
+                # Formato .252 con 9 campos: carpeta SMB en posición 8
+                entries.append((str(entry[2]), str(entry[3]), str(entry[4]), str(entry[8])))
+            elif len(entry) == 8:
+                # Formato .252 con 8 campos (impresoras .250, .251): carpeta SMB en posición 7
+                entries.append((str(entry[2]), str(entry[3]), str(entry[4]), str(entry[7])))
+            else:
+                # Formato desconocido, usar valores por defecto
+                entries.append((str(entry[2]), str(entry[3]), str(entry[4]), ""))
+        return entries, len(data)
+    except Exception as parse_error:
+        logger.debug(f"      Parse error: {parse_error}. Trying regex fallback...")
+        pattern = r"\[\d+,\d+,'([^']*)','([^']*)','([^']*)'(?:,'[^']*')?(?:,'[^']*')?(?:,'([^']*)')?"
+        for idx, name, code, folder in re.findall(pattern, response_text):
+            entries.append((idx, name, code, folder or ""))
+        return entries, None
+
+
+def build_user_list(entries: List[Tuple[str, str, str, str]]) -> List[Tuple[str, str, str, str]]:
+    """
+    Descarta entradas duplicadas y normaliza nombre/código
+
+    Returns:
+        Lista de (nombre, código, entry_index, carpeta); se omiten las entradas
+        sin código numérico
+    """
+    unique_user_data = []
+    seen_indices = set()
+
+    for entry_index, nombre, codigo, carpeta_ajax in entries:
+        if entry_index in seen_indices:
+            continue
+        seen_indices.add(entry_index)
+
+        nombre = nombre.strip() if nombre else ""
+        codigo = codigo.strip() if codigo else ""
+
+        # Si el código está vacío o no es numérico, intentar intercambiar con nombre
+        if not codigo or not codigo.isdigit():
+            if nombre and nombre.isdigit():
+                nombre, codigo = codigo, nombre
+                logger.debug(f"   Intercambiado nombre/código para entry {entry_index}: código={codigo}, nombre={nombre}")
+
+        # Si después del intercambio el código sigue sin ser numérico, intentar extraer números
+        if not codigo or not codigo.isdigit():
+            digits = re.sub(r'\D', '', codigo)
+            if not digits:
+                logger.debug(f"   Saltando entry {entry_index}: no se pudo obtener código numérico (nombre={nombre}, codigo_original={codigo})")
+                continue
+            codigo = digits
+            logger.debug(f"   Extraídos dígitos del código para entry {entry_index}: {codigo}")
+
+        unique_user_data.append((nombre, codigo, entry_index, carpeta_ajax))
+
+    return unique_user_data
+
+
+def _is_checked(checkbox) -> bool:
+    return (
+        checkbox.has_attr('checked') or
+        checkbox.get('checked') in ('checked', 'true', '1')
+    )
+
+
+def find_function_checkboxes(soup: BeautifulSoup) -> list:
+    """Checkboxes de funciones disponibles del formulario adrsGetUser.cgi"""
+    return soup.find_all('input', {'name': 'availableFuncIn', 'type': 'checkbox'})
+
+
+def parse_user_details(soup: BeautifulSoup, checkboxes: list) -> Dict:
+    """
+    Traduce los checkboxes marcados del formulario del usuario a permisos
+
+    Returns:
+        Dict con permisos, carpeta SMB y el wimToken del formulario
+    """
+    permisos = {
+        'copiadora': False, 'copiadora_color': False,
+        'impresora': False, 'impresora_color': False,
+        'escaner': False, 'document_server': False,
+        'fax': False, 'navegador': False
+    }
+
+    logger.debug(f"   📋 Total checkboxes encontrados: {len(checkboxes)}")
+    for checkbox in checkboxes:
+        val = checkbox.get('value', '').upper()
+        if not _is_checked(checkbox):
+            continue
+        # Mapeo de valores reales de Ricoh
+        if 'COPY' in val:
+            if any(x in val for x in ['FC', 'FULL']):
+                permisos['copiadora_color'] = True
+            elif any(x in val for x in ['BW', 'TC', 'MC']):
+                permisos['copiadora'] = True
+            elif val == 'COPY':  # Valor simple sin sufijo
+                permisos['copiadora'] = True
+        elif 'PRT' in val or 'PRINT' in val:
+            if any(x in val for x in ['FC', 'FULL']):
+                permisos['impresora_color'] = True
+            elif 'BW' in val:
+                permisos['impresora'] = True
+            elif val == 'PRT' or val == 'PRINT':  # Valor simple sin sufijo
+                permisos['impresora'] = True
+        elif 'SCAN' in val:
+            permisos['escaner'] = True
+        elif any(x in val for x in ['DBX', 'DOC_SERVER', 'DOCSERVER', 'DOC']):
+            permisos['document_server'] = True
+        elif 'FAX' in val:
+            permisos['fax'] = True
+        elif 'BROWSER' in val or 'MFPBROWSER' in val:
+            permisos['navegador'] = True
+
+    logger.debug(f"   ✅ Permisos leídos del hardware: {permisos}")
+
+    token_input = soup.find('input', {'name': 'wimToken'})
+    carpeta_input = soup.find('input', {'name': 'folderPathNameIn'})
+    return {
+        'permisos': permisos,
+        'carpeta': carpeta_input.get('value', '') if carpeta_input else '',
+        '_new_token': token_input.get('value', '') if token_input else ''
+    }
+
+
+def parse_stored_jobs(html: str) -> Optional[List[Dict]]:
+    """
+    Parsea la tabla de trabajos de storedJob.cgi
+
+    Returns:
+        Lista de trabajos, o None si la página no contiene la tabla
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', class_='reportListCommon')
+    if not table:
+        return None
+
+    jobs = []
+    for row in table.find_all('tr'):
+        cells = row.find_all('td', class_='listData')
+        if len(cells) < 8:
+            continue
+
+        try:
+            # Job ID
+            checkbox = cells[0].find('input', type='checkbox')
+            job_id = checkbox.get('value') if checkbox else None
+            if not job_id:
+                hidden = cells[0].find('input', type='hidden')
+                job_id = hidden.get('value') if hidden else None
+
+            # Created date
+            fecha = " ".join(t.strip() for t in cells[5].stripped_strings)
+
+            # Page count
+            try:
+                paginas = int(cells[7].get_text(strip=True))
+            except ValueError:
+                paginas = 0
+
+            # Copies
+            copias = None
+            if len(cells) >= 9:
+                copias_str = cells[8].get_text(strip=True)
+                if copias_str != "---":
+                    try:
+                        copias = int(copias_str)
+                    except ValueError:
+                        pass
+
+            jobs.append({
+                "job_id": job_id,
+                "tipo": cells[1].get_text(strip=True),
+                "usuario": cells[3].get_text(strip=True),
+                "documento": cells[4].get_text(strip=True),
+                "fecha": fecha,
+                "paginas": paginas,
+                "copias": copias
+            })
+        except Exception as row_err:
+            logger.debug(f"Error parsing job row: {row_err}")
+
+    return jobs
+
 
 def with_printer_session(func):
     """
@@ -84,6 +362,13 @@ class RicohWebClient:
     def _wim_tokens(self, value: dict):
         self._thread_local.wim_tokens = value
 
+    @property
+    def _shared_session_printers(self) -> set:
+        """Impresoras cuya sesión actual usa cookies del pool compartido"""
+        if not hasattr(self._thread_local, 'shared_session_printers'):
+            self._thread_local.shared_session_printers = set()
+        return self._thread_local.shared_session_printers
+
 
     @property
     def session(self) -> requests.Session:
@@ -99,28 +384,14 @@ class RicohWebClient:
         if not current_ip:
             # Fallback to a default thread-local session if no current IP is active
             if not hasattr(self._thread_local, 'default_session'):
-                s = requests.Session()
-                s.headers.update({
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-                    'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8'
-                })
-                s.verify = False
-                self._thread_local.default_session = s
+                self._thread_local.default_session = create_http_session()
             return self._thread_local.default_session
             
         if not hasattr(self._thread_local, 'sessions'):
             self._thread_local.sessions = {}
             
         if current_ip not in self._thread_local.sessions:
-            s = requests.Session()
-            s.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-                'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8'
-            })
-            s.verify = False
-            self._thread_local.sessions[current_ip] = s
+            self._thread_local.sessions[current_ip] = create_http_session()
             
         return self._thread_local.sessions[current_ip]
     
@@ -229,6 +500,26 @@ class RicohWebClient:
         except Exception as e:
             logger.debug(f"Error guardando cookies en Redis: {e}")
 
+    def _adopt_pooled_session(self, printer_ip: str, session: requests.Session) -> bool:
+        """Reuse cookies of an authenticated session from the shared pool (parsers)."""
+        try:
+            if not ricoh_session_manager.share_cookies(printer_ip, session):
+                return False
+            test_url = f"http://{printer_ip}/web/entry/es/address/adrsList.cgi"
+            resp = session.get(test_url, timeout=5, allow_redirects=False)
+            if is_address_list_page(resp.status_code, resp.text):
+                logger.info(f"🔄 Reutilizando sesión WIM del pool compartido para {printer_ip}")
+                token = extract_wim_token(resp.text)
+                if token:
+                    self._wim_tokens[printer_ip] = token
+                self._authenticated_printers.add(printer_ip)
+                self._shared_session_printers.add(printer_ip)
+                return True
+            session.cookies.clear()
+        except Exception as e:
+            logger.debug(f"Error reutilizando sesión del pool: {e}")
+        return False
+
     def _load_session_cookies(self, printer_ip: str, session: requests.Session) -> bool:
         """Load WIM cookies from Redis if available and verify connection."""
         try:
@@ -243,11 +534,11 @@ class RicohWebClient:
                     # Verify by making a fast request to a cheap page to ensure session is valid
                     test_url = f"http://{printer_ip}/web/entry/es/address/adrsList.cgi"
                     resp = session.get(test_url, timeout=5, allow_redirects=False)
-                    if resp.status_code == 200 and 'wimToken' in resp.text and 'authForm.cgi' not in resp.text and 'login.cgi' not in resp.text:
+                    if is_address_list_page(resp.status_code, resp.text):
                         logger.info(f"🔄 Reutilizando sesión WIM activa de Redis para {printer_ip}")
-                        match = re.search(r'name="wimToken"\s+value="(\d+)"', resp.text)
-                        if match:
-                            self._wim_tokens[printer_ip] = match.group(1)
+                        token = extract_wim_token(resp.text)
+                        if token:
+                            self._wim_tokens[printer_ip] = token
                         self._authenticated_printers.add(printer_ip)
                         return True
                     else:
@@ -266,7 +557,11 @@ class RicohWebClient:
 
         session = self.session
 
-        # Try to load cookies from Redis cache first
+        # Try an authenticated session already open in this process first
+        if self._adopt_pooled_session(printer_ip, session):
+            return True
+
+        # Then try to load cookies from Redis cache
         if self._load_session_cookies(printer_ip, session):
             return True
 
@@ -284,35 +579,20 @@ class RicohWebClient:
             test_response = session.get(test_url, timeout=self.timeout, allow_redirects=False)
             
             # Si recibimos 200 y el token sin login page, ya estamos dentro
-            if (test_response.status_code == 200 
-                    and 'wimToken' in test_response.text 
-                    and 'authForm.cgi' not in test_response.text 
-                    and 'login.cgi' not in test_response.text):
+            if is_address_list_page(test_response.status_code, test_response.text):
                 logger.debug("Sesión ya activa")
                 self._authenticated_printers.add(printer_ip)
-                match = re.search(r'name="wimToken"\s+value="(\d+)"', test_response.text)
-                if match:
-                    self._wim_tokens[printer_ip] = match.group(1)
+                token = extract_wim_token(test_response.text)
+                if token:
+                    self._wim_tokens[printer_ip] = token
                 self._save_session_cookies(printer_ip, session)
                 return True
             
             # 2. Si nos redirige o devuelve algo diferente, ir a login
             logger.info(f"🔑 Realizando login con usuario: {self.admin_user}")
             
-            # Construir la lista de contraseñas a intentar en orden de prioridad
-            passwords_to_try = []
-            
-            # 1. Contraseña de la base de datos (si está definida)
-            if admin_password is not None:
-                passwords_to_try.append(admin_password)
-                
-            # 2. Contraseña global de la variable de entorno (si no está ya en la lista)
-            if self.admin_password not in passwords_to_try:
-                passwords_to_try.append(self.admin_password)
-                
-            # 3. Contraseña vacía de fábrica (si no está ya en la lista)
-            if "" not in passwords_to_try:
-                passwords_to_try.append("")
+            # Contraseña de la DB, la global del entorno y la vacía de fábrica
+            passwords_to_try = login_password_candidates(admin_password, self.admin_password)
                 
             login_success = False
             for current_pwd in passwords_to_try:
@@ -323,27 +603,14 @@ class RicohWebClient:
                 login_form_url = f"http://{printer_ip}/web/guest/es/websys/webArch/authForm.cgi"
                 form_response = session.get(login_form_url, timeout=self.timeout)
                 
-                token_match = re.search(r'name="wimToken"\s+value="(\d+)"', form_response.text)
-                login_token = token_match.group(1) if token_match else ""
+                login_token = extract_wim_token(form_response.text) or ""
                 
                 if not login_token:
                     logger.error("❌ No se pudo obtener wimToken para el login")
                     continue
                 
-                # Step 3: Encode credentials in Base64
-                userid_b64 = base64.b64encode(self.admin_user.encode()).decode()
-                password_b64 = base64.b64encode(current_pwd.encode()).decode() if current_pwd else ""
-                
-                # Step 4: Perform login
                 login_url = f"http://{printer_ip}/web/guest/es/websys/webArch/login.cgi"
-                login_data = {
-                    'wimToken': login_token,
-                    'userid_work': '',
-                    'userid': userid_b64,
-                    'password_work': '',
-                    'password': password_b64,
-                    'open': '',
-                }
+                login_data = build_login_form(login_token, self.admin_user, current_pwd)
                 
                 login_response = session.post(
                     login_url,
@@ -354,15 +621,12 @@ class RicohWebClient:
                 
                 # Step 5: Verify authentication by accessing protected page
                 verify_response = session.get(test_url, timeout=self.timeout)
-                if (verify_response.status_code == 200 
-                        and 'wimToken' in verify_response.text
-                        and 'authForm.cgi' not in verify_response.text
-                        and 'login.cgi' not in verify_response.text):
+                if is_address_list_page(verify_response.status_code, verify_response.text):
                     logger.info(f"✅ Autenticación exitosa")
                     # Extract current wimToken for future requests
-                    token_match = re.search(r'name="wimToken"\s+value="(\d+)"', verify_response.text)
-                    if token_match:
-                        self._wim_tokens[printer_ip] = token_match.group(1)
+                    token = extract_wim_token(verify_response.text)
+                    if token:
+                        self._wim_tokens[printer_ip] = token
                     
                     self._authenticated_printers.add(printer_ip)
                     self._save_session_cookies(printer_ip, session)
@@ -380,18 +644,76 @@ class RicohWebClient:
             return False
     
     @with_printer_session
-    def provision_user(self, printer_ip: str, user_config: Dict, admin_password: Optional[str] = None, logout: bool = True):
+    def provision_user(self, printer_ip: str, user_config: Dict, admin_password: Optional[str] = None, logout: bool = True,
+                       address_book: Optional[Dict[str, str]] = None):
         """
         Provision a user to a Ricoh printer via web interface
+
+        Args:
+            address_book: Código -> entry_index de la libreta ya leída en esta
+                sesión (read_address_book); evita releer la libreta por usuario
+                en los aprovisionamientos por lotes y se actualiza con el
+                entry_index de los usuarios creados. Los códigos que no
+                aparecen se confirman con find_specific_user antes de crearlos
         """
         try:
-            return self._provision_user_internal(printer_ip, user_config, admin_password)
+            return self._provision_user_internal(printer_ip, user_config, admin_password, address_book)
         finally:
             if logout:
                 self._logout(printer_ip)
 
     @with_printer_session
-    def _provision_user_internal(self, printer_ip: str, user_config: Dict, admin_password: Optional[str] = None):
+    def read_address_book(self, printer_ip: str, admin_password: Optional[str] = None,
+                          logout: bool = True) -> Optional[Dict[str, str]]:
+        """
+        Código de usuario -> entry_index de la libreta de direcciones (lista rápida)
+
+        Returns:
+            La libreta completa, o None si no se pudo leer entera (autenticación
+            fallida o un lote con error): una libreta parcial haría crear de nuevo
+            usuarios que ya existen
+        """
+        try:
+            if not self._authenticate(printer_ip, admin_password):
+                logger.error(f"❌ No se pudo autenticar con {printer_ip}")
+                return None
+            entries, complete = self._load_address_book_entries(printer_ip)
+            if not complete:
+                logger.warning(f"⚠️  Libreta de {printer_ip} incompleta ({len(entries)} entradas leídas)")
+                return None
+            return {codigo: entry_index for _, codigo, entry_index, _ in build_user_list(entries)}
+        finally:
+            if logout:
+                self._logout(printer_ip)
+
+    @with_printer_session
+    def get_user_permissions(self, printer_ip: str, entry_index: str, admin_password: Optional[str] = None,
+                             logout: bool = True) -> Optional[Dict]:
+        """
+        Permisos de funciones de un usuario leídos por HTTP (adrsList, lote de la
+        entrada y formulario MODUSER/PROGRAMMED), sin navegador
+
+        Returns:
+            Dict de permisos (copiadora, impresora, escaner, ...) o None si no se pudo leer
+        """
+        try:
+            if not self._authenticate(printer_ip, admin_password):
+                logger.error(f"❌ Fallo autenticacion con {printer_ip}")
+                return None
+            details = self._get_user_details(printer_ip, entry_index, admin_password=admin_password)
+            return details['permisos'] if details else None
+        finally:
+            if logout:
+                self._logout(printer_ip)
+
+    @with_printer_session
+    def logout(self, printer_ip: str):
+        """Cierra la sesión WIM abierta con logout=False"""
+        self._logout(printer_ip)
+
+    @with_printer_session
+    def _provision_user_internal(self, printer_ip: str, user_config: Dict, admin_password: Optional[str] = None,
+                                 address_book: Optional[Dict[str, str]] = None):
         try:
             print(f"\n{'='*70}")
             print(f"🔄 ricoh_web_client.provision_user() INICIADO")
@@ -409,7 +731,14 @@ class RicohWebClient:
                 return False
 
             # Check if user already exists on printer
-            existing_user = self.find_specific_user(printer_ip, user_config.get('codigo_de_usuario'), admin_password=admin_password, logout=False)
+            # Un código que no está en la libreta leída se confirma en la impresora antes de crearlo
+            known_index = None
+            if address_book is not None:
+                known_index = address_book.get(str(user_config.get('codigo_de_usuario', '')).strip())
+            if known_index:
+                existing_user = {'entry_index': known_index}
+            else:
+                existing_user = self.find_specific_user(printer_ip, user_config.get('codigo_de_usuario'), admin_password=admin_password, logout=False)
             if existing_user:
                 entry_index = existing_user.get('entry_index')
                 logger.info(f"🔄 User already exists on printer {printer_ip} at entry_index {entry_index}. Updating instead of creating.")
@@ -686,6 +1015,9 @@ class RicohWebClient:
                 wim_token=next_wim_token
             )
             
+            if address_book is not None:
+                address_book[str(user_config.get('codigo_de_usuario', '')).strip()] = entry_index
+
             if password_result is True:
                 logger.info(f"✅ Usuario aprovisionado completamente en {printer_ip}")
                 logger.info(f"   Usuario: {user_config.get('nombre')}")
@@ -876,6 +1208,7 @@ class RicohWebClient:
             delattr(self._thread_local, 'default_session')
             
         self._authenticated_printers = set()
+        self._shared_session_printers.clear()
         self._wim_tokens = {}  # Limpiar tokens cacheados
         logger.debug("Session reset - cleared cookies and tokens")
     
@@ -893,6 +1226,10 @@ class RicohWebClient:
         finally:
             if printer_ip in self._authenticated_printers:
                 self._authenticated_printers.remove(printer_ip)
+            if printer_ip in self._shared_session_printers:
+                # The WIM session was shared with the pool: it is no longer valid
+                self._shared_session_printers.discard(printer_ip)
+                ricoh_session_manager.invalidate(printer_ip)
             if hasattr(self._thread_local, 'sessions') and printer_ip in self._thread_local.sessions:
                 self._thread_local.sessions[printer_ip].cookies.clear()
             try:
@@ -966,6 +1303,63 @@ class RicohWebClient:
             logger.error(traceback.format_exc())
             return None
     
+    def _load_address_book_entries(self, printer_ip: str) -> Tuple[List[Tuple[str, str, str, str]], bool]:
+        """
+        Carga la libreta (sesión ya autenticada) en lotes de ADDRESS_BOOK_BATCH_SIZE
+        hasta recibir un lote incompleto
+
+        Returns:
+            (entradas, completa). completa es False si un lote falló (error HTTP,
+            excepción o respuesta sin lista, p. ej. sesión vencida); las entradas
+            son entonces solo las de los lotes anteriores
+        """
+        all_users = []
+        ajax_url = f"http://{printer_ip}/web/entry/es/address/adrsListLoadEntry.cgi"
+        headers = {
+            'X-Requested-With': 'XMLHttpRequest',
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Referer': f'http://{printer_ip}/web/entry/es/address/adrsList.cgi'
+        }
+
+        for batch in range(1, ADDRESS_BOOK_MAX_ENTRIES // ADDRESS_BOOK_BATCH_SIZE + 2):
+            logger.debug(f"   Solicitando lote {batch} de usuarios...")
+            payload = {
+                'listCountIn': str(ADDRESS_BOOK_BATCH_SIZE),
+                'getCountIn': str(batch)
+            }
+            try:
+                response = self.session.post(ajax_url, data=payload, headers=headers, timeout=self.timeout)
+            except Exception as batch_error:
+                logger.error(f"   Error en lote {batch}: {batch_error}")
+                return all_users, False
+
+            logger.debug(f"      Batch {batch} status: {response.status_code}, Length: {len(response.text)}")
+            if response.status_code != 200:
+                logger.error(f"   Lote {batch} de {printer_ip} respondió HTTP {response.status_code}")
+                return all_users, False
+
+            responseText = response.text.strip()
+            if not responseText:
+                # Respuesta vacía tras un lote completo: no hay más usuarios
+                return all_users, batch > 1
+            if batch == 1:
+                logger.debug(f"   [DEBUG] Batch 1 sample: {responseText[:200]}...")
+
+            entries, batch_count = parse_address_book_batch(responseText)
+            all_users.extend(entries)
+
+            if batch_count is None:
+                if not entries:
+                    logger.error(f"   Lote {batch} de {printer_ip} sin lista de usuarios")
+                    return all_users, False
+                continue
+            logger.debug(f"      Parsed {batch_count} entries from batch {batch}")
+            if batch_count < ADDRESS_BOOK_BATCH_SIZE:
+                # Lote incompleto: no hay más usuarios en la libreta
+                return all_users, True
+
+        return all_users, True
+
     @with_printer_session
     def read_users_from_printer(self, printer_ip: str, fast_list: bool = False, admin_password: Optional[str] = None, logout: bool = True) -> list:
         try:
@@ -987,145 +1381,13 @@ class RicohWebClient:
                 logger.error(f"❌ No se pudo autenticar con {printer_ip}")
                 return []
             
-            all_users = []
-            ajax_url = f"http://{printer_ip}/web/entry/es/address/adrsListLoadEntry.cgi"
-            
-            headers = {
-                'X-Requested-With': 'XMLHttpRequest',
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'Referer': f'http://{printer_ip}/web/entry/es/address/adrsList.cgi'
-            }
-            
-            # 2. Consultar lotes de 50 usuarios
-            for batch in range(1, 25):
-                logger.debug(f"   Solicitando lote {batch} de usuarios...")
-                payload = {
-                    'listCountIn': '50',
-                    'getCountIn': str(batch)
-                }
-                
-                try:
-                    response = self.session.post(
-                        ajax_url, 
-                        data=payload, 
-                        headers=headers, 
-                        timeout=self.timeout
-                    )
-                    
-                    logger.debug(f"      Batch {batch} status: {response.status_code}, Length: {len(response.text)}")
-                    
-                    if response.status_code != 200 or not response.text.strip():
-                        break
-                    
-                    responseText = response.text.strip()
-                    if batch == 1:
-                        logger.debug(f"   [DEBUG] Batch 1 sample: {responseText[:200]}...")
-                    
-                    import ast
-                    import json
-                    # Ricoh responses often use single quotes, which json.loads hates but literal_eval loves
-                    try:
-                        data = ast.literal_eval(responseText)
-                    except (ValueError, SyntaxError):
-                        # Fallback to json.loads after replacing single quotes
-                        data = json.loads(responseText.replace("'", '"'))
-                        
-                    for entry in data:
-                        if len(entry) >= 5:
-                            # Detectar formato basado en cantidad de campos y primer elemento
-                            # Formato .253: ['',1,'00001','YESICA GARCIA',1,'AB','','','1717','','\\\\SERVER\\path'] (11 campos)
-                            # Formato .252 (9 campos): [231,1,'00001','YESICA GARCIA','1717',...,'\\\\SERVER\\path'] 
-                            # Formato .252 (8 campos): [167,1,'00001','JULIAN','0116',...,'\\\\SERVER\\path']
-                            
-                            if entry[0] == '' and len(entry) >= 11:
-                                # Formato .253 (impresora .253)
-                                idx = str(entry[2])      # entry_index
-                                name = str(entry[3])     # nombre
-                                code = str(entry[8])     # código de usuario
-                                folder = str(entry[10]) if len(entry) >= 11 else ""  # carpeta SMB en posición 10
-                            elif len(entry) == 9:
-                                # Formato .252 con 9 campos (impresora .252)
-                                idx = str(entry[2])      # entry_index
-                                name = str(entry[3])     # nombre
-                                code = str(entry[4])     # código
-                                folder = str(entry[8]) if len(entry) >= 9 else ""  # carpeta SMB en posición 8
-                            elif len(entry) == 8:
-                                # Formato .252 con 8 campos (impresoras .250, .251, .250 en 110)
-                                idx = str(entry[2])      # entry_index
-                                name = str(entry[3])     # nombre
-                                code = str(entry[4])     # código
-                                folder = str(entry[7]) if len(entry) >= 8 else ""  # carpeta SMB en posición 7
-                            else:
-                                # Formato desconocido, usar valores por defecto
-                                idx = str(entry[2]) if len(entry) > 2 else ""
-                                name = str(entry[3]) if len(entry) > 3 else ""
-                                code = str(entry[4]) if len(entry) > 4 else ""
-                                folder = ""
-                            
-                            # Debug: mostrar primeros 3 usuarios del primer batch
-                            if batch == 1 and len(all_users) < 3:
-                                logger.debug(f"      Usuario {len(all_users)+1}: idx={idx}, name={name}, code={code}, folder={folder}")
-                            
-                            all_users.append((idx, name, code, folder))
-                    
-                    logger.debug(f"      Parsed {len(data)} entries from batch {batch}")
-                except Exception as parse_error:
-                    logger.debug(f"      Parse error on batch {batch}: {parse_error}. Trying regex fallback...")
-                    # Revised regex to capture more reliably
-                    pattern = r"\[\d+,\d+,'([^']*)','([^']*)','([^']*)'(?:,'[^']*')?(?:,'[^']*')?(?:,'([^']*)')?"
-                    matches = re.findall(pattern, responseText)
-                    if matches:
-                        for match in matches:
-                            idx, name, code, folder = match
-                            all_users.append((idx, name, code, folder if folder else ""))
-                        logger.debug(f"      Regex found {len(matches)} matches in batch {batch}")
-                    else:
-                        logger.warning(f"      No users found in batch {batch} response")
-                         
-                except Exception as batch_error:
-                    logger.error(f"   Error en lote {batch}: {batch_error}")
-                    break
+            all_users, complete = self._load_address_book_entries(printer_ip)
+            if not complete:
+                logger.warning(f"⚠️  Libreta de {printer_ip} leída de forma incompleta")
             
             logger.info(f"   Total de {len(all_users)} usuarios encontrados antes de filtrar duplicados.")
             # 3. Procesar lista única
-            unique_user_data = []
-            seen_indices = set()
-            
-            for entry_index, nombre, codigo, carpeta_ajax in all_users:
-                if entry_index in seen_indices: continue
-                seen_indices.add(entry_index)
-                
-                # Limpiar espacios
-                nombre = nombre.strip() if nombre else ""
-                codigo = codigo.strip() if codigo else ""
-                
-                # Si el código está vacío o no es numérico, intentar intercambiar con nombre
-                if not codigo or not codigo.isdigit():
-                    if nombre and nombre.isdigit():
-                        # Intercambiar: el nombre es el código y viceversa
-                        nombre, codigo = codigo, nombre
-                        logger.debug(f"   Intercambiado nombre/código para entry {entry_index}: código={codigo}, nombre={nombre}")
-                
-                # Si después del intercambio el código sigue sin ser numérico, intentar extraer números
-                if not codigo or not codigo.isdigit():
-                    # Intentar extraer solo los dígitos del código
-                    import re
-                    digits = re.sub(r'\D', '', codigo)
-                    if digits:
-                        codigo = digits
-                        logger.debug(f"   Extraídos dígitos del código para entry {entry_index}: {codigo}")
-                    else:
-                        # Si definitivamente no hay código numérico, saltar este usuario
-                        logger.debug(f"   Saltando entry {entry_index}: no se pudo obtener código numérico (nombre={nombre}, codigo_original={codigo})")
-                        continue
-                
-                unique_user_data.append((nombre, codigo, entry_index, carpeta_ajax))
-
-            # Permisos vacíos por defecto - se llenan al leer desde la impresora
-            empty_permissions = {
-                'copiadora': False, 'escaner': False, 'impresora': False,
-                'document_server': False, 'fax': False, 'navegador': False
-            }
+            unique_user_data = build_user_list(all_users)
 
             # 4. Obtener detalles si no es fast_list
             final_users = []
@@ -1138,7 +1400,7 @@ class RicohWebClient:
                         'codigo': u_codigo,
                         'entry_index': u_index,
                         'empresa': '',
-                        'permisos': empty_permissions.copy(),
+                        'permisos': LIST_EMPTY_PERMISSIONS.copy(),
                         'carpeta': u_carpeta_ajax,
                         'lazy': True
                     })
@@ -1163,7 +1425,7 @@ class RicohWebClient:
                             'codigo': u_codigo,
                             'entry_index': u_index,
                             'empresa': '',
-                            'permisos': user_details.get('permisos', {}) if user_details else empty_permissions.copy(),
+                            'permisos': user_details.get('permisos', {}) if user_details else LIST_EMPTY_PERMISSIONS.copy(),
                             'carpeta': u_carpeta_ajax or (user_details.get('carpeta', '') if user_details else ''),
                             'lazy': False
                         })
@@ -1179,6 +1441,58 @@ class RicohWebClient:
         except Exception as e:
             logger.error(f"❌ Error leyendo usuarios vía AJAX: {e}")
             return []
+
+    def _replay_user_form(self, printer_ip: str, entry_index: str, form_data: Dict,
+                          headers: Dict) -> Optional[requests.Response]:
+        """
+        Repite el flujo de la lista tras un BADFLOW: wimToken nuevo, carga de lotes
+        (primero el estimado por entry_index, luego los anteriores y los siguientes,
+        sin pasar del último lote posible de la libreta) hasta el que contiene la
+        entrada, y de nuevo el formulario de adrsGetUser.cgi.
+        Es lo que hacía Selenium al abrir la lista antes de editar el usuario
+
+        Returns:
+            Respuesta del formulario o None si la entrada no aparece en la libreta
+        """
+        list_url = f"http://{printer_ip}/web/entry/es/address/adrsList.cgi"
+        ajax_url = f"http://{printer_ip}/web/entry/es/address/adrsListLoadEntry.cgi"
+        edit_url = f"http://{printer_ip}/web/entry/es/address/adrsGetUser.cgi"
+        ajax_headers = {
+            'X-Requested-With': 'XMLHttpRequest',
+            'Referer': list_url,
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+
+        list_resp = self.session.get(list_url, timeout=self.timeout)
+        wim_token = extract_wim_token(list_resp.text) or self._wim_tokens.get(printer_ip, "")
+        self._wim_tokens[printer_ip] = wim_token
+
+        # El lote cargado en la sesión cambia: invalidar la caché de lotes de esta impresora
+        last_batch = getattr(self._thread_local, 'last_batch', {})
+        self._thread_local.last_batch = {key: token for key, token in last_batch.items() if key[0] != printer_ip}
+
+        estimated = (int(entry_index) // ADDRESS_BOOK_BATCH_SIZE) + 1
+        max_batch = ADDRESS_BOOK_MAX_ENTRIES // ADDRESS_BOOK_BATCH_SIZE
+        batch, step = estimated, -1
+        while batch >= 1 and (step < 0 or batch <= max_batch):
+            ajax_data = {'wimToken': wim_token, 'listCountIn': str(ADDRESS_BOOK_BATCH_SIZE),
+                         'getCountIn': str(batch)}
+            batch_resp = self.session.post(ajax_url, data=ajax_data, headers=ajax_headers, timeout=self.timeout)
+            entries, count = parse_address_book_batch(batch_resp.text)
+            if any(index == entry_index for index, _, _, _ in entries):
+                logger.debug(f"🔄 Entrada {entry_index} en el lote {batch} de {printer_ip} (estimado: {estimated})")
+                self._thread_local.last_batch[(printer_ip, batch)] = wim_token
+                return self.session.post(edit_url, data={**form_data, 'wimToken': wim_token}, headers=headers,
+                                         timeout=self.timeout)
+            if step > 0 and not count:
+                break
+            batch += step
+            if batch < 1 and step < 0:
+                batch, step = estimated + 1, 1
+
+        logger.warning(f"⚠️  La entrada {entry_index} no aparece en la libreta de {printer_ip}")
+        return None
+
     @with_printer_session
     def _get_user_details(self, printer_ip: str, entry_index: str, fast_sync: bool = False, admin_password: Optional[str] = None) -> Optional[Dict]:
         """
@@ -1288,10 +1602,13 @@ class RicohWebClient:
                 self.session.post(ajax_url, data=ajax_data, headers=ajax_headers, timeout=self.timeout)
                 response = self.session.post(edit_url, data=form_data, headers=headers, timeout=self.timeout)
             
-            # Verificar si hay BADFLOW (no debería haberlo con este flujo)
+            # BADFLOW: el lote cargado no contiene la entrada; repetir el flujo de la lista
             if "BADFLOW" in response.text:
-                logger.warning(f"⚠️  BADFLOW inesperado con flujo correcto")
-                return None
+                logger.warning(f"⚠️  BADFLOW leyendo {entry_index}, repitiendo el flujo de la lista...")
+                response = self._replay_user_form(printer_ip, entry_index, form_data, headers)
+                if response is None or "BADFLOW" in response.text:
+                    logger.warning(f"⚠️  BADFLOW persistente para {entry_index}")
+                    return None
             
             if response.status_code != 200:
                 logger.warning(f"⚠️  HTTP falló (Status {response.status_code})")
@@ -1300,16 +1617,7 @@ class RicohWebClient:
             # Parsear HTML para extraer funciones
             soup = BeautifulSoup(response.text, 'html.parser')
             
-            # Inicializar permisos vacíos
-            permisos = {
-                'copiadora': False, 'copiadora_color': False,
-                'impresora': False, 'impresora_color': False,
-                'escaner': False, 'document_server': False,
-                'fax': False, 'navegador': False
-            }
-            
-            # Buscar checkboxes de funciones disponibles
-            checkboxes = soup.find_all('input', {'name': 'availableFuncIn', 'type': 'checkbox'})
+            checkboxes = find_function_checkboxes(soup)
             
             # Si no encontramos checkboxes, puede ser error temporal - reintentar
             if not checkboxes:
@@ -1335,66 +1643,12 @@ class RicohWebClient:
                 self.session.post(ajax_url, data=ajax_data, headers=ajax_headers, timeout=self.timeout)
                 response = self.session.post(edit_url, data=form_data, headers=headers, timeout=self.timeout)
                 soup = BeautifulSoup(response.text, 'html.parser')
-                checkboxes = soup.find_all('input', {'name': 'availableFuncIn', 'type': 'checkbox'})
+                checkboxes = find_function_checkboxes(soup)
                 
                 if checkboxes:
                     logger.info(f"   ✅ Checkboxes encontrados en segundo intento")
             
-            if checkboxes:
-                # Log de TODOS los checkboxes encontrados para debug
-                logger.debug(f"   📋 Total checkboxes encontrados: {len(checkboxes)}")
-                for i, cb in enumerate(checkboxes, 1):
-                    val = cb.get('value', '')
-                    # Verificar diferentes formas de "checked"
-                    is_checked = (
-                        cb.has_attr('checked') or 
-                        cb.get('checked') == 'checked' or 
-                        cb.get('checked') == 'true' or
-                        cb.get('checked') == '1'
-                    )
-                    checked_str = '✅' if is_checked else '❌'
-                    # Mostrar todos los atributos del checkbox para debug
-                    attrs = {k: v for k, v in cb.attrs.items() if k != 'type'}
-                    logger.debug(f"      {checked_str} {i}. value='{val}' attrs={attrs}")
-                
-                # Si encontramos checkboxes, marcar solo los que tienen 'checked'
-                for checkbox in checkboxes:
-                    val = checkbox.get('value', '').upper()
-                    # Verificar diferentes formas de "checked"
-                    is_checked = (
-                        checkbox.has_attr('checked') or 
-                        checkbox.get('checked') == 'checked' or 
-                        checkbox.get('checked') == 'true' or
-                        checkbox.get('checked') == '1'
-                    )
-                    
-                    if is_checked:
-                        # Mapeo de valores reales de Ricoh
-                        if 'COPY' in val:
-                            if any(x in val for x in ['FC', 'FULL']):
-                                permisos['copiadora_color'] = True
-                            elif any(x in val for x in ['BW', 'TC', 'MC']):
-                                permisos['copiadora'] = True
-                            elif val == 'COPY':  # Valor simple sin sufijo
-                                permisos['copiadora'] = True
-                        elif 'PRT' in val or 'PRINT' in val:
-                            if any(x in val for x in ['FC', 'FULL']):
-                                permisos['impresora_color'] = True
-                            elif 'BW' in val:
-                                permisos['impresora'] = True
-                            elif val == 'PRT' or val == 'PRINT':  # Valor simple sin sufijo
-                                permisos['impresora'] = True
-                        elif 'SCAN' in val:
-                            permisos['escaner'] = True
-                        elif any(x in val for x in ['DBX', 'DOC_SERVER', 'DOCSERVER', 'DOC']):
-                            permisos['document_server'] = True
-                        elif 'FAX' in val:
-                            permisos['fax'] = True
-                        elif 'BROWSER' in val or 'MFPBROWSER' in val:
-                            permisos['navegador'] = True
-                
-                logger.debug(f"   ✅ Permisos leídos del hardware: {permisos}")
-            else:
+            if not checkboxes:
                 logger.error(f"❌ No se encontraron checkboxes en el HTML")
                 # Guardar HTML para debug
                 debug_file = f"/tmp/debug_no_checkboxes_{entry_index}.html"
@@ -1407,23 +1661,7 @@ class RicohWebClient:
                 # NO usar defaults - devolver None para indicar error
                 return None
             
-            # Extraer wimToken
-            wim_token = ''
-            token_input = soup.find('input', {'name': 'wimToken'})
-            if token_input:
-                wim_token = token_input.get('value', '')
-            
-            # Extraer carpeta SMB
-            carpeta = ''
-            carpeta_input = soup.find('input', {'name': 'folderPathNameIn'})
-            if carpeta_input:
-                carpeta = carpeta_input.get('value', '')
-            
-            return {
-                'permisos': permisos,
-                'carpeta': carpeta,
-                '_new_token': wim_token
-            }
+            return parse_user_details(soup, checkboxes)
             
         except Exception as e:
             logger.error(f"❌ Error leyendo detalles: {e}")
@@ -1511,13 +1749,22 @@ class RicohWebClient:
                 return False
 
             if "BADFLOW" in response.text:
-                logger.warning("⚠️  BADFLOW detectado, usando Selenium...")
+                logger.warning(f"⚠️  BADFLOW leyendo {entry_index}, repitiendo el flujo de la lista...")
+                response = self._replay_user_form(printer_ip, entry_index, form_data, headers) or response
+
+            if "BADFLOW" in response.text:
+                from services.ricoh_selenium_client import selenium_fallback_config
+                if not selenium_fallback_config.enabled:
+                    logger.error(f"❌ BADFLOW persistente para {entry_index} (fallback Selenium desactivado)")
+                    return False
+
+                logger.warning("⚠️  BADFLOW persistente, usando Selenium...")
                 try:
                     from services.ricoh_selenium_client import get_selenium_client
                     selenium_client = get_selenium_client()
 
                     pwd = admin_password if admin_password is not None else self.admin_password
-                    return selenium_client.set_user_permissions(
+                    return selenium_client.set_user_permissions_with_browser(
                         printer_ip,
                         entry_index,
                         permissions,
@@ -2034,71 +2281,11 @@ class RicohWebClient:
                 logger.error(f"❌ Failed to fetch stored jobs page (Status {response.status_code})")
                 return []
                 
-            # 3. Parse with BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
-            jobs = []
-            
-            table = soup.find('table', class_='reportListCommon')
-            if not table:
+            # 3. Parse the jobs table
+            jobs = parse_stored_jobs(response.text)
+            if jobs is None:
                 logger.warning("⚠️ Table reportListCommon not found in WIM stored jobs page")
                 return []
-                
-            rows = table.find_all('tr')
-            for row in rows:
-                cells = row.find_all('td', class_='listData')
-                if len(cells) < 8:
-                    continue
-                    
-                try:
-                    # Job ID
-                    checkbox = cells[0].find('input', type='checkbox')
-                    job_id = checkbox.get('value') if checkbox else None
-                    if not job_id:
-                        hidden = cells[0].find('input', type='hidden')
-                        job_id = hidden.get('value') if hidden else None
-                        
-                    # Type
-                    tipo = cells[1].get_text(strip=True)
-                    
-                    # User ID
-                    usuario = cells[3].get_text(strip=True)
-                    
-                    # File Name
-                    documento = cells[4].get_text(strip=True)
-                    
-                    # Created date
-                    fecha_parts = [t.strip() for t in cells[5].stripped_strings]
-                    fecha = " ".join(fecha_parts)
-                    
-                    # Page count
-                    paginas_str = cells[7].get_text(strip=True)
-                    try:
-                        paginas = int(paginas_str)
-                    except ValueError:
-                        paginas = 0
-                        
-                    # Copies
-                    copias = None
-                    if len(cells) >= 9:
-                        copias_str = cells[8].get_text(strip=True)
-                        if copias_str != "---":
-                            try:
-                                copias = int(copias_str)
-                            except ValueError:
-                                pass
-                                
-                    jobs.append({
-                        "job_id": job_id,
-                        "tipo": tipo,
-                        "usuario": usuario,
-                        "documento": documento,
-                        "fecha": fecha,
-                        "paginas": paginas,
-                        "copias": copias
-                    })
-                except Exception as row_err:
-                    logger.debug(f"Error parsing job row: {row_err}")
-                    
             return jobs
             
         except Exception as e:
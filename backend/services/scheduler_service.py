@@ -141,7 +141,9 @@ async def check_and_run_schedules():
                 
                 # Ejecutamos el cierre masivo de contadores
                 # Para un scheduler automático, indicamos cerrado_por='Sistema (Programado)'
-                results = CloseService.create_close_all_printers(
+                # Los cierres por impresora corren en un pool de workers fuera del event loop
+                results = await asyncio.to_thread(
+                    CloseService.create_close_all_printers,
                     db=db,
                     fecha_inicio=fecha_actual,
                     fecha_fin=fecha_actual,
@@ -0,0 +1,135 @@
+"""
+Session Activity Service
+Agrupa las actualizaciones de last_activity de las sesiones admin y las
+escribe en bloque cada cierto intervalo, en lugar de un UPDATE + commit
+por cada request autenticado
+"""
+import os
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Session
+
+from db.models_auth import AdminSession
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionActivityConfig:
+    """Configuración de la escritura diferida de last_activity"""
+    flush_interval: float = 60.0  # Segundos entre escrituras en bloque
+
+
+def load_session_activity_config_from_env() -> SessionActivityConfig:
+    """Carga la configuración de actividad de sesiones desde variables de entorno"""
+    try:
+        config = SessionActivityConfig(
+            flush_interval=float(os.getenv('AUTH_ACTIVITY_FLUSH_INTERVAL', '60.0'))
+        )
+
+        if config.flush_interval < 0:
+            logger.warning(f"Invalid AUTH_ACTIVITY_FLUSH_INTERVAL ({config.flush_interval}), using default 60.0")
+            config.flush_interval = 60.0
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading session activity configuration from environment: {e}, using defaults")
+        return SessionActivityConfig()
+
+
+class SessionActivityBuffer:
+    """
+    Buffer en memoria de la última actividad por token, seguro entre hilos
+
+    - touch() solo registra la hora en memoria (sin tocar la base de datos)
+    - flush_if_due() escribe todo lo pendiente en un único UPDATE ejecutado
+      en bloque cuando vence el intervalo configurado
+    """
+
+    def __init__(self, config: Optional[SessionActivityConfig] = None):
+        self.config = config or load_session_activity_config_from_env()
+        self._pending: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stats = {'touches': 0, 'flushes': 0, 'rows_written': 0, 'flush_errors': 0}
+
+    def touch(self, token: str, when: Optional[datetime] = None) -> None:
+        """Registra actividad de la sesión; se guardará en el próximo flush"""
+        with self._lock:
+            self._pending[token] = when or datetime.now(timezone.utc)
+            self._stats['touches'] += 1
+
+    def discard(self, token: str) -> None:
+        """Olvida la actividad pendiente de una sesión (logout o revocación)"""
+        with self._lock:
+            self._pending.pop(token, None)
+
+    def is_due(self) -> bool:
+        with self._lock:
+            return bool(self._pending) and time.monotonic() - self._last_flush >= self.config.flush_interval
+
+    def flush_if_due(self, db: Session) -> int:
+        """Escribe lo pendiente si venció el intervalo; retorna filas enviadas"""
+        if not self.is_due():
+            return 0
+        return self.flush(db)
+
+    def flush(self, db: Session) -> int:
+        """
+        Escribe en bloque toda la actividad pendiente
+
+        Returns:
+            Cantidad de sesiones enviadas en el UPDATE
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return 0
+
+        table = AdminSession.__table__
+        stmt = table.update().where(
+            table.c.token == bindparam('b_token')
+        ).values(last_activity=bindparam('b_last_activity'))
+
+        try:
+            db.execute(stmt, [
+                {'b_token': token, 'b_last_activity': when}
+                for token, when in pending.items()
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # Reintentar en el próximo flush sin pisar actividad más reciente
+            with self._lock:
+                for token, when in pending.items():
+                    self._pending.setdefault(token, when)
+                self._stats['flush_errors'] += 1
+            logger.error(f"❌ Error guardando last_activity de {len(pending)} sesiones: {e}")
+            return 0
+
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['rows_written'] += len(pending)
+        logger.debug(f"🕒 last_activity actualizado para {len(pending)} sesiones")
+        return len(pending)
+
+    def get_stats(self) -> dict:
+        """Estadísticas del buffer"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['writes_saved'] = max(stats['touches'] - stats['rows_written'] - stats['pending'], 0)
+        return stats
+
+
+# Singleton instance
+session_activity_buffer = SessionActivityBuffer()
@@ -2,17 +2,95 @@
 SNMP Client for Ricoh Printer Management
 Handles SNMP queries to retrieve printer information, status, and consumables levels
 
-Note: SNMP functionality is currently disabled due to library compatibility issues.
-This is a placeholder implementation that returns empty data.
+SNMPv2c over asyncio UDP (services/snmp_codec): scalars in a single GET and
+the Printer-MIB supplies, colorant and marker tables with GETBULK, with a
+timeout and retries per request.
 """
-from typing import Optional, Dict
+from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
 from enum import Enum
 import asyncio
+import itertools
+import logging
+import os
+import random
 
+from services.snmp_codec import (
+    GET_BULK_REQUEST,
+    GET_NEXT_REQUEST,
+    GET_REQUEST,
+    GET_RESPONSE,
+    SNMPDecodeError,
+    SNMPException,
+    SNMPMessage,
+    SNMPPdu,
+    decode_message,
+    encode_message,
+    oid_startswith,
+    oid_to_tuple,
+    value_to_text,
+)
 
-# SNMP is disabled for now
-SNMP_AVAILABLE = False
+logger = logging.getLogger(__name__)
+
+
+SNMP_AVAILABLE = True
+
+# MIB-II system group
+OID_SYS_DESCR = '1.3.6.1.2.1.1.1.0'
+OID_SYS_UPTIME = '1.3.6.1.2.1.1.3.0'
+OID_SYS_CONTACT = '1.3.6.1.2.1.1.4.0'
+OID_SYS_NAME = '1.3.6.1.2.1.1.5.0'
+OID_SYS_LOCATION = '1.3.6.1.2.1.1.6.0'
+
+# Host Resources MIB (device 1 is the printer on Ricoh)
+OID_HR_DEVICE_DESCR = '1.3.6.1.2.1.25.3.2.1.3.1'
+OID_HR_DEVICE_STATUS = '1.3.6.1.2.1.25.3.2.1.5.1'
+OID_HR_PRINTER_STATUS = '1.3.6.1.2.1.25.3.5.1.1.1'
+OID_HR_PRINTER_ERROR_STATE = '1.3.6.1.2.1.25.3.5.1.2.1'
+
+# Printer-MIB (RFC 3805)
+OID_PRT_SERIAL_NUMBER = '1.3.6.1.2.1.43.5.1.1.17.1'
+OID_PRT_MARKER_LIFE_COUNT = '1.3.6.1.2.1.43.10.2.1.4'
+OID_PRT_SUPPLIES_COLORANT_INDEX = '1.3.6.1.2.1.43.11.1.1.3'
+OID_PRT_SUPPLIES_TYPE = '1.3.6.1.2.1.43.11.1.1.5'
+OID_PRT_SUPPLIES_DESCRIPTION = '1.3.6.1.2.1.43.11.1.1.6'
+OID_PRT_SUPPLIES_MAX_CAPACITY = '1.3.6.1.2.1.43.11.1.1.8'
+OID_PRT_SUPPLIES_LEVEL = '1.3.6.1.2.1.43.11.1.1.9'
+OID_PRT_COLORANT_VALUE = '1.3.6.1.2.1.43.12.1.1.4'
+
+PRINTER_INFO_SCALARS = (
+    OID_SYS_DESCR, OID_SYS_UPTIME, OID_SYS_CONTACT, OID_SYS_LOCATION,
+    OID_HR_DEVICE_DESCR, OID_HR_DEVICE_STATUS, OID_HR_PRINTER_STATUS,
+    OID_HR_PRINTER_ERROR_STATE, OID_PRT_SERIAL_NUMBER,
+)
+PRINTER_INFO_TABLES = (
+    OID_PRT_SUPPLIES_COLORANT_INDEX, OID_PRT_SUPPLIES_TYPE, OID_PRT_SUPPLIES_DESCRIPTION,
+    OID_PRT_SUPPLIES_MAX_CAPACITY, OID_PRT_SUPPLIES_LEVEL, OID_PRT_COLORANT_VALUE,
+    OID_PRT_MARKER_LIFE_COUNT,
+)
+
+# prtMarkerSuppliesType: toner(3), tonerCartridge(21)
+TONER_SUPPLY_TYPES = (3, 21)
+
+# hrPrinterStatus
+HR_PRINTER_STATUS = {1: 'other', 2: 'unknown', 3: 'idle', 4: 'printing', 5: 'warmup'}
+# hrDeviceStatus down(5): el equipo no funciona
+HR_DEVICE_DOWN = 5
+
+# hrPrinterDetectedErrorState: bit 0 es el bit alto del primer octeto
+HR_PRINTER_ERROR_BITS = (
+    'lowPaper', 'noPaper', 'lowToner', 'noToner', 'doorOpen', 'jammed', 'offline', 'serviceRequested',
+    'inputTrayMissing', 'outputTrayMissing', 'markerSupplyMissing', 'outputNearFull', 'outputFull',
+    'inputTrayEmpty', 'overduePreventMaint',
+)
+
+COLOR_KEYWORDS = {
+    'black': ('black', 'negro', 'schwarz', 'noir'),
+    'cyan': ('cyan', 'cian'),
+    'magenta': ('magenta',),
+    'yellow': ('yellow', 'amarillo', 'gelb', 'jaune'),
+}
 
 
 class SNMPVersion(Enum):
@@ -21,6 +99,70 @@ class SNMPVersion(Enum):
     V2C = 1
 
 
+class SNMPTimeout(Exception):
+    """La impresora no respondió a la consulta SNMP tras todos los reintentos"""
+    pass
+
+
+class SNMPError(Exception):
+    """La impresora respondió con error-status distinto de 0"""
+    pass
+
+
+@dataclass
+class SNMPConfig:
+    """Configuración del cliente SNMP"""
+    enabled: bool = True
+    community: str = 'public'
+    port: int = 161
+    timeout: float = 1.5  # Segundos por intento
+    retries: int = 2  # Reintentos tras el primer intento
+    max_repetitions: int = 25  # Filas por GETBULK
+
+
+def load_snmp_config_from_env() -> SNMPConfig:
+    """
+    Load SNMP configuration from environment variables
+
+    Returns:
+        SNMPConfig with values from environment or defaults
+    """
+    try:
+        config = SNMPConfig(
+            enabled=os.getenv('SNMP_ENABLED', 'true').lower() in ('true', '1', 'yes'),
+            community=os.getenv('SNMP_COMMUNITY', 'public'),
+            port=int(os.getenv('SNMP_PORT', '161')),
+            timeout=float(os.getenv('SNMP_TIMEOUT', '1.5')),
+            retries=int(os.getenv('SNMP_RETRIES', '2')),
+            max_repetitions=int(os.getenv('SNMP_MAX_REPETITIONS', '25'))
+        )
+
+        if not 0 < config.port < 65536:
+            logger.warning(f"Invalid SNMP_PORT ({config.port}), using default 161")
+            config.port = 161
+
+        if config.timeout <= 0:
+            logger.warning(f"Invalid SNMP_TIMEOUT ({config.timeout}), using default 1.5")
+            config.timeout = 1.5
+
+        if config.retries < 0:
+            logger.warning(f"Invalid SNMP_RETRIES ({config.retries}), using default 2")
+            config.retries = 2
+
+        if not 0 < config.max_repetitions <= 100:
+            logger.warning(f"Invalid SNMP_MAX_REPETITIONS ({config.max_repetitions}), using default 25")
+            config.max_repetitions = 25
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading SNMP configuration from environment: {e}, using defaults")
+        return SNMPConfig()
+
+
+snmp_config = load_snmp_config_from_env()
+
+
 @dataclass
 class PrinterSNMPInfo:
     """Data class for printer SNMP information"""
@@ -36,6 +178,7 @@ class PrinterSNMPInfo:
     toner_yellow: Optional[int] = None
     status: Optional[str] = None
     error_state: Optional[str] = None
+    device_down: bool = False
 
 
 class SNMPClient:
@@ -61,42 +204,197 @@ class SNMPClient:
         return True
 
 
+class _SNMPProtocol(asyncio.DatagramProtocol):
+    """Entrega cada respuesta al future que espera su request-id"""
+
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            message = decode_message(data)
+        except SNMPDecodeError as e:
+            logger.debug(f"Datagrama SNMP inválido de {addr}: {e}")
+            return
+        future = self.pending.pop(message.pdu.request_id, None)
+        if future is not None and not future.done():
+            future.set_result(message.pdu)
+
+    def error_received(self, exc):
+        # ICMP port unreachable: el host no escucha SNMP, no sirve reintentar
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.pending.clear()
+
+    def connection_lost(self, exc):
+        self.error_received(exc or ConnectionError("Socket SNMP cerrado"))
+
+
 class RicohSNMPClient:
     """
     SNMP client specifically designed for Ricoh printers
-    
-    Note: Currently disabled - returns empty data
-    Future implementation will use SNMP to query real printer data
+
+    Cada consulta abre un socket UDP hacia la impresora, por lo que muchas
+    impresoras se consultan en paralelo desde el mismo event loop. Los
+    escalares van en un solo GET y las tablas del Printer-MIB se recorren
+    en conjunto con GETBULK (GETNEXT en SNMPv1).
     """
     
     def __init__(
         self,
-        community: str = 'public',
+        community: Optional[str] = None,
         version: SNMPVersion = SNMPVersion.V2C,
-        timeout: float = 2.0,
-        retries: int = 1
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        port: Optional[int] = None,
+        max_repetitions: Optional[int] = None
     ):
-        """Initialize SNMP client (currently disabled)"""
-        self.community = community
+        """
+        Initialize SNMP client (valores no indicados se toman de SNMPConfig)
+        """
+        self.community = community if community is not None else snmp_config.community
         self.version = version
-        self.timeout = timeout
-        self.retries = retries
+        self.timeout = timeout if timeout is not None else snmp_config.timeout
+        self.retries = retries if retries is not None else snmp_config.retries
+        self.port = port if port is not None else snmp_config.port
+        self.max_repetitions = max_repetitions if max_repetitions is not None else snmp_config.max_repetitions
+        self._request_ids = itertools.count(random.randint(1, 0x3FFFFFFF))
+    
+    async def _open(self, ip: str) -> _SNMPProtocol:
+        loop = asyncio.get_running_loop()
+        _, protocol = await loop.create_datagram_endpoint(_SNMPProtocol, remote_addr=(ip, self.port))
+        return protocol
+    
+    async def _request(
+        self,
+        protocol: _SNMPProtocol,
+        pdu_type: int,
+        oids: List[str],
+        max_repetitions: int = 0
+    ) -> List[tuple]:
+        """
+        Envía un PDU y espera la respuesta, reenviándolo si vence el timeout
+
+        Raises:
+            SNMPTimeout: Sin respuesta tras todos los reintentos
+            SNMPError: La impresora respondió con error-status
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            request_id = next(self._request_ids) & 0x7FFFFFFF
+            future = loop.create_future()
+            protocol.pending[request_id] = future
+            message = SNMPMessage(
+                version=self.version.value,
+                community=self.community.encode(),
+                pdu=SNMPPdu(pdu_type, request_id, 0, max_repetitions, [(oid, None) for oid in oids])
+            )
+            protocol.transport.sendto(encode_message(message))
+            try:
+                response = await asyncio.wait_for(future, timeout=self.timeout)
+            except asyncio.TimeoutError:
+                protocol.pending.pop(request_id, None)
+                continue
+
+            if response.pdu_type != GET_RESPONSE:
+                raise SNMPError(f"PDU de respuesta inesperado {response.pdu_type:#x}")
+            if response.error_status:
+                raise SNMPError(f"error-status {response.error_status} (índice {response.error_index})")
+            return response.varbinds
+
+        raise SNMPTimeout(f"Sin respuesta SNMP tras {self.retries + 1} intentos")
+    
+    async def _get(self, protocol: _SNMPProtocol, oids: List[str]) -> Dict[str, Any]:
+        varbinds = await self._request(protocol, GET_REQUEST, list(oids))
+        return {oid: value for oid, value in varbinds if not isinstance(value, SNMPException)}
+    
+    async def _walk(self, protocol: _SNMPProtocol, columns: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Recorre varias columnas de tabla a la vez
+
+        Cada GETBULK pide max_repetitions filas de todas las columnas que
+        siguen abiertas; la respuesta viene ordenada fila a fila.
+
+        Returns:
+            {columna: {índice: valor}}
+        """
+        result: Dict[str, Dict[str, Any]] = {column: {} for column in columns}
+        cursors = {column: column for column in columns}
+        bulk = self.version != SNMPVersion.V1
+
+        while cursors:
+            active = list(cursors)
+            varbinds = await self._request(
+                protocol,
+                GET_BULK_REQUEST if bulk else GET_NEXT_REQUEST,
+                [cursors[column] for column in active],
+                max_repetitions=self.max_repetitions if bulk else 0
+            )
+            finished = set()
+            for position, (oid, value) in enumerate(varbinds):
+                column = active[position % len(active)]
+                if column in finished:
+                    continue
+                if isinstance(value, SNMPException) or not oid_startswith(oid, column) \
+                        or oid_to_tuple(oid) <= oid_to_tuple(cursors[column]):
+                    finished.add(column)
+                    continue
+                result[column][oid[len(column) + 1:]] = value
+                cursors[column] = oid
+            for column in active:
+                # Sin avance en esta vuelta (respuesta vacía): se da por terminada
+                if column in finished or not varbinds:
+                    cursors.pop(column, None)
+
+        return result
     
     async def get_oid(self, ip: str, oid: str) -> Optional[str]:
-        """Get a single OID value from device (currently disabled)"""
-        return None
+        """Get a single OID value from device"""
+        protocol = await self._open(ip)
+        try:
+            values = await self._get(protocol, [oid])
+        finally:
+            protocol.transport.close()
+        return value_to_text(values.get(oid))
+    
+    async def bulk_walk(self, ip: str, columns: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Recorre columnas de tabla con GETBULK ({columna: {índice: valor}})"""
+        protocol = await self._open(ip)
+        try:
+            return await self._walk(protocol, columns)
+        finally:
+            protocol.transport.close()
     
     async def get_printer_info(self, ip: str) -> PrinterSNMPInfo:
         """
         Get comprehensive printer information via SNMP
-        
-        Currently returns empty data - SNMP disabled
+
+        Un GET con los escalares y un recorrido GETBULK de las tablas de
+        consumibles, colorantes y contadores del Printer-MIB
+
+        Raises:
+            SNMPTimeout: Si la impresora no responde
+            SNMPError: Si la impresora responde con error
         """
-        return PrinterSNMPInfo()
+        protocol = await self._open(ip)
+        try:
+            scalars = await self._get(protocol, list(PRINTER_INFO_SCALARS))
+            tables = await self._walk(protocol, list(PRINTER_INFO_TABLES))
+        finally:
+            protocol.transport.close()
+        return build_printer_info(scalars, tables)
     
     async def test_connection(self, ip: str) -> bool:
-        """Test if SNMP is available (currently always returns False)"""
-        return False
+        """Test if SNMP is available"""
+        try:
+            return await self.get_oid(ip, OID_SYS_DESCR) is not None
+        except (SNMPTimeout, SNMPError, OSError):
+            return False
     
     def provision_user(self, ip: str, user_config: Dict) -> bool:
         """
@@ -134,6 +432,83 @@ class RicohSNMPClient:
         return True  # Mock success
 
 
+def _int_value(value: Any) -> Optional[int]:
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def decode_error_state(value: Any) -> List[str]:
+    """hrPrinterDetectedErrorState (bits) -> nombres de las condiciones activas"""
+    if not isinstance(value, bytes):
+        return []
+    return [
+        name for bit, name in enumerate(HR_PRINTER_ERROR_BITS)
+        if bit // 8 < len(value) and value[bit // 8] & (0x80 >> (bit % 8))
+    ]
+
+
+def supply_color(colorant: Optional[str], description: Optional[str]) -> Optional[str]:
+    """Color de un consumible por su colorante o, si no hay, por la descripción"""
+    for text in (colorant, description):
+        if not text:
+            continue
+        lowered = text.lower()
+        for color, keywords in COLOR_KEYWORDS.items():
+            if any(keyword in lowered for keyword in keywords):
+                return color
+    return None
+
+
+def supply_percent(level: Optional[int], max_capacity: Optional[int]) -> Optional[int]:
+    """
+    Nivel en porcentaje; None si la impresora no informa cantidad
+    (-1 other, -2 unknown, -3 "queda algo")
+    """
+    if level is None or level < 0:
+        return None
+    if max_capacity is None or max_capacity <= 0:
+        return min(100, level)
+    return min(100, max(0, round(level * 100 / max_capacity)))
+
+
+def build_printer_info(scalars: Dict[str, Any], tables: Dict[str, Dict[str, Any]]) -> PrinterSNMPInfo:
+    """Arma PrinterSNMPInfo a partir del GET de escalares y las tablas del Printer-MIB"""
+    info = PrinterSNMPInfo(
+        model=value_to_text(scalars.get(OID_HR_DEVICE_DESCR)) or value_to_text(scalars.get(OID_SYS_DESCR)),
+        serial_number=value_to_text(scalars.get(OID_PRT_SERIAL_NUMBER)),
+        location=value_to_text(scalars.get(OID_SYS_LOCATION)),
+        contact=value_to_text(scalars.get(OID_SYS_CONTACT)),
+        uptime=_int_value(scalars.get(OID_SYS_UPTIME)),
+        status=HR_PRINTER_STATUS.get(_int_value(scalars.get(OID_HR_PRINTER_STATUS))),
+        device_down=_int_value(scalars.get(OID_HR_DEVICE_STATUS)) == HR_DEVICE_DOWN,
+    )
+
+    errors = decode_error_state(scalars.get(OID_HR_PRINTER_ERROR_STATE))
+    info.error_state = ','.join(errors) or None
+
+    life_counts = [v for v in map(_int_value, tables.get(OID_PRT_MARKER_LIFE_COUNT, {}).values()) if v is not None]
+    info.page_count = max(life_counts) if life_counts else None
+
+    colorants = tables.get(OID_PRT_COLORANT_VALUE, {})
+    types = tables.get(OID_PRT_SUPPLIES_TYPE, {})
+    for index, level in tables.get(OID_PRT_SUPPLIES_LEVEL, {}).items():
+        description = value_to_text(tables.get(OID_PRT_SUPPLIES_DESCRIPTION, {}).get(index))
+        supply_type = _int_value(types.get(index))
+        if supply_type not in TONER_SUPPLY_TYPES and 'toner' not in (description or '').lower():
+            continue
+
+        # El colorante se indexa por hrDeviceIndex.prtMarkerColorantIndex
+        device_index = index.split('.')[0]
+        colorant_index = _int_value(tables.get(OID_PRT_SUPPLIES_COLORANT_INDEX, {}).get(index))
+        colorant = value_to_text(colorants.get(f"{device_index}.{colorant_index}")) if colorant_index else None
+
+        color = supply_color(colorant, description)
+        percent = supply_percent(_int_value(level), _int_value(tables.get(OID_PRT_SUPPLIES_MAX_CAPACITY, {}).get(index)))
+        if color and percent is not None and getattr(info, f"toner_{color}") is None:
+            setattr(info, f"toner_{color}", percent)
+
+    return info
+
+
 # Singleton instance
 _snmp_client: Optional[RicohSNMPClient] = None
 
@@ -142,7 +517,11 @@ def get_snmp_client() -> Optional[RicohSNMPClient]:
     """
     Get or create singleton SNMP client instance
     
-    Returns None since SNMP is currently disabled
+    Returns None when SNMP is disabled (SNMP_ENABLED=false)
     """
-    return None
-
+    global _snmp_client
+    if not snmp_config.enabled:
+        return None
+    if _snmp_client is None:
+        _snmp_client = RicohSNMPClient()
+    return _snmp_client
@@ -0,0 +1,296 @@
+"""
+SNMP Codec - Codificación BER de mensajes SNMPv1/v2c
+Implementa solo lo que usa el poller (GET, GETNEXT, GETBULK y sus respuestas)
+para no depender de una librería SNMP externa
+"""
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+
+# Tipos universales ASN.1
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+
+# Tipos de aplicación SNMP (RFC 2578)
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+
+# Excepciones de varbind SNMPv2 (RFC 3416)
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+# PDUs
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+GET_RESPONSE = 0xA2
+SET_REQUEST = 0xA3
+GET_BULK_REQUEST = 0xA5
+
+_UNSIGNED_TYPES = (COUNTER32, GAUGE32, TIMETICKS, COUNTER64)
+
+
+class SNMPDecodeError(ValueError):
+    """Datagrama que no es un mensaje SNMP válido"""
+    pass
+
+
+@dataclass(frozen=True)
+class SNMPValue:
+    """Valor con tipo de aplicación explícito (Counter32, Gauge32, TimeTicks...)"""
+    tag: int
+    value: Any = None
+
+
+@dataclass(frozen=True)
+class SNMPException:
+    """noSuchObject / noSuchInstance / endOfMibView en lugar de un valor"""
+    tag: int
+
+    @property
+    def name(self) -> str:
+        return {NO_SUCH_OBJECT: 'noSuchObject', NO_SUCH_INSTANCE: 'noSuchInstance',
+                END_OF_MIB_VIEW: 'endOfMibView'}.get(self.tag, hex(self.tag))
+
+
+NO_SUCH_OBJECT_VALUE = SNMPException(NO_SUCH_OBJECT)
+NO_SUCH_INSTANCE_VALUE = SNMPException(NO_SUCH_INSTANCE)
+END_OF_MIB_VIEW_VALUE = SNMPException(END_OF_MIB_VIEW)
+
+
+@dataclass
+class SNMPPdu:
+    """
+    PDU SNMP. En GETBULK, error_status/error_index transportan
+    non-repeaters/max-repetitions
+    """
+    pdu_type: int
+    request_id: int
+    error_status: int = 0
+    error_index: int = 0
+    varbinds: List[Tuple[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class SNMPMessage:
+    version: int  # 0 = v1, 1 = v2c
+    community: bytes
+    pdu: SNMPPdu
+
+
+def oid_to_tuple(oid: str) -> Tuple[int, ...]:
+    """'1.3.6.1' o '.1.3.6.1' -> (1, 3, 6, 1), para comparar OIDs en orden lexicográfico"""
+    return tuple(int(part) for part in oid.strip('.').split('.') if part)
+
+
+def oid_startswith(oid: str, prefix: str) -> bool:
+    """True si oid está dentro del subárbol prefix (sin incluir al propio prefix)"""
+    oid_t, prefix_t = oid_to_tuple(oid), oid_to_tuple(prefix)
+    return len(oid_t) > len(prefix_t) and oid_t[:len(prefix_t)] == prefix_t
+
+
+# ============================================================================
+# Codificación
+# ============================================================================
+
+def _encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes([length])
+    body = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(body)]) + body
+
+
+def _tlv(tag: int, content: bytes) -> bytes:
+    return bytes([tag]) + _encode_length(len(content)) + content
+
+
+def _encode_signed(value: int) -> bytes:
+    return value.to_bytes(max(1, (value + (value < 0)).bit_length() // 8 + 1), 'big', signed=True)
+
+
+def _encode_unsigned(value: int) -> bytes:
+    # Un 0 inicial evita que el bit alto se lea como signo
+    return value.to_bytes(value.bit_length() // 8 + 1, 'big')
+
+
+def _encode_oid(oid: str) -> bytes:
+    parts = oid_to_tuple(oid)
+    if len(parts) < 2:
+        raise ValueError(f"OID inválido: {oid}")
+    body = bytearray([parts[0] * 40 + parts[1]])
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        body.extend(reversed(chunk))
+    return bytes(body)
+
+
+def encode_value(value: Any) -> bytes:
+    """Codifica un valor de varbind en BER"""
+    if value is None:
+        return _tlv(NULL, b'')
+    if isinstance(value, SNMPException):
+        return _tlv(value.tag, b'')
+    if isinstance(value, SNMPValue):
+        if value.tag in _UNSIGNED_TYPES:
+            return _tlv(value.tag, _encode_unsigned(int(value.value)))
+        if value.tag == IP_ADDRESS:
+            return _tlv(IP_ADDRESS, bytes(int(part) for part in str(value.value).split('.')))
+        if value.tag == OBJECT_IDENTIFIER:
+            return _tlv(OBJECT_IDENTIFIER, _encode_oid(value.value))
+        return _tlv(value.tag, bytes(value.value))
+    if isinstance(value, bool):
+        return _tlv(INTEGER, _encode_signed(int(value)))
+    if isinstance(value, int):
+        return _tlv(INTEGER, _encode_signed(value))
+    if isinstance(value, str):
+        return _tlv(OCTET_STRING, value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return _tlv(OCTET_STRING, bytes(value))
+    raise TypeError(f"Tipo de valor SNMP no soportado: {type(value).__name__}")
+
+
+def encode_message(message: SNMPMessage) -> bytes:
+    """Codifica un mensaje SNMP completo listo para enviar por UDP"""
+    pdu = message.pdu
+    varbinds = b''.join(
+        _tlv(SEQUENCE, _tlv(OBJECT_IDENTIFIER, _encode_oid(oid)) + encode_value(value))
+        for oid, value in pdu.varbinds
+    )
+    pdu_body = (
+        _tlv(INTEGER, _encode_signed(pdu.request_id))
+        + _tlv(INTEGER, _encode_signed(pdu.error_status))
+        + _tlv(INTEGER, _encode_signed(pdu.error_index))
+        + _tlv(SEQUENCE, varbinds)
+    )
+    return _tlv(SEQUENCE, (
+        _tlv(INTEGER, _encode_signed(message.version))
+        + _tlv(OCTET_STRING, message.community)
+        + _tlv(pdu.pdu_type, pdu_body)
+    ))
+
+
+# ============================================================================
+# Decodificación
+# ============================================================================
+
+def _read_tlv(data: bytes, offset: int) -> Tuple[int, bytes, int]:
+    """Retorna (tag, contenido, offset siguiente)"""
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+        offset += 2
+        if length & 0x80:
+            size = length & 0x7F
+            if size == 0 or size > 4:
+                raise SNMPDecodeError("Longitud BER no soportada")
+            length = int.from_bytes(data[offset:offset + size], 'big')
+            offset += size
+    except IndexError:
+        raise SNMPDecodeError("Mensaje truncado")
+    end = offset + length
+    if end > len(data):
+        raise SNMPDecodeError("Mensaje truncado")
+    return tag, data[offset:end], end
+
+
+def _expect(data: bytes, offset: int, tag: int) -> Tuple[bytes, int]:
+    found, content, offset = _read_tlv(data, offset)
+    if found != tag:
+        raise SNMPDecodeError(f"Se esperaba tag {tag:#x} y llegó {found:#x}")
+    return content, offset
+
+
+def _decode_oid(content: bytes) -> str:
+    if not content:
+        raise SNMPDecodeError("OID vacío")
+    first = content[0]
+    parts = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    value = 0
+    for byte in content[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return '.'.join(str(part) for part in parts)
+
+
+def decode_value(tag: int, content: bytes) -> Any:
+    """
+    Decodifica un valor: INTEGER y tipos numéricos -> int, OCTET STRING ->
+    bytes, OID/IpAddress -> str, NULL -> None, excepciones -> SNMPException
+    """
+    if tag == INTEGER:
+        return int.from_bytes(content, 'big', signed=True) if content else 0
+    if tag in _UNSIGNED_TYPES:
+        return int.from_bytes(content, 'big') if content else 0
+    if tag in (OCTET_STRING, OPAQUE):
+        return bytes(content)
+    if tag == NULL:
+        return None
+    if tag == OBJECT_IDENTIFIER:
+        return _decode_oid(content)
+    if tag == IP_ADDRESS:
+        return '.'.join(str(byte) for byte in content)
+    if tag in (NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW):
+        return SNMPException(tag)
+    raise SNMPDecodeError(f"Tipo de valor desconocido {tag:#x}")
+
+
+def decode_message(data: bytes) -> SNMPMessage:
+    """
+    Decodifica un datagrama SNMP
+
+    Raises:
+        SNMPDecodeError: Si el datagrama no es un mensaje SNMP válido
+    """
+    body, _ = _expect(data, 0, SEQUENCE)
+    version_raw, offset = _expect(body, 0, INTEGER)
+    community, offset = _expect(body, offset, OCTET_STRING)
+    pdu_type, pdu_body, _ = _read_tlv(body, offset)
+    if pdu_type not in (GET_REQUEST, GET_NEXT_REQUEST, GET_RESPONSE, SET_REQUEST, GET_BULK_REQUEST):
+        raise SNMPDecodeError(f"PDU no soportado {pdu_type:#x}")
+
+    request_id, offset = _expect(pdu_body, 0, INTEGER)
+    error_status, offset = _expect(pdu_body, offset, INTEGER)
+    error_index, offset = _expect(pdu_body, offset, INTEGER)
+    varbind_list, _ = _expect(pdu_body, offset, SEQUENCE)
+
+    varbinds = []
+    offset = 0
+    while offset < len(varbind_list):
+        varbind, offset = _expect(varbind_list, offset, SEQUENCE)
+        oid_raw, inner = _expect(varbind, 0, OBJECT_IDENTIFIER)
+        tag, content, _ = _read_tlv(varbind, inner)
+        varbinds.append((_decode_oid(oid_raw), decode_value(tag, content)))
+
+    return SNMPMessage(
+        version=decode_value(INTEGER, version_raw),
+        community=bytes(community),
+        pdu=SNMPPdu(
+            pdu_type=pdu_type,
+            request_id=decode_value(INTEGER, request_id),
+            error_status=decode_value(INTEGER, error_status),
+            error_index=decode_value(INTEGER, error_index),
+            varbinds=varbinds
+        )
+    )
+
+
+def value_to_text(value: Any) -> Optional[str]:
+    """Valor SNMP como texto (OCTET STRING decodificado), None si no hay dato"""
+    if value is None or isinstance(value, SNMPException):
+        return None
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace').strip('\x00 ').strip() or None
+    return str(value)
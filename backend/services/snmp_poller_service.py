@@ -0,0 +1,229 @@
+"""
+SNMP Poller Service - Estado, tóner y contador de páginas de toda la flota
+Consulta las impresoras por SNMP (GETBULK sobre el Printer-MIB) de forma
+concurrente y guarda las lecturas con una única actualización en lote, en
+lugar de iniciar sesión en Web Image Monitor y parsear getStatus.cgi por equipo
+
+Una impresora sin respuesta SNMP (SNMP deshabilitado, otra comunidad) puede
+seguir funcionando por HTTP: solo pasa a OFFLINE si Web Image Monitor tampoco
+responde, porque OFFLINE la deja fuera de las lecturas y los cierres masivos
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from db.models import Printer, PrinterStatus
+from services.snmp_client import PrinterSNMPInfo, RicohSNMPClient
+
+logger = logging.getLogger(__name__)
+
+# Condiciones de hrPrinterDetectedErrorState que dejan la impresora fuera de servicio
+BLOCKING_ERRORS = frozenset({'noToner', 'doorOpen', 'jammed', 'offline', 'serviceRequested'})
+
+TONER_FIELDS = ('toner_black', 'toner_cyan', 'toner_magenta', 'toner_yellow')
+
+
+@dataclass
+class SNMPPollerConfig:
+    """Configuración del sondeo SNMP de la flota"""
+    max_concurrency: int = 64  # Impresoras consultadas a la vez
+    http_timeout: float = 3.0  # Segundos de la comprobación HTTP de las que no responden SNMP
+
+
+def load_snmp_poller_config_from_env() -> SNMPPollerConfig:
+    """Carga la configuración del sondeo SNMP desde variables de entorno"""
+    try:
+        config = SNMPPollerConfig(
+            max_concurrency=int(os.getenv('SNMP_POLL_MAX_CONCURRENCY', '64')),
+            http_timeout=float(os.getenv('SNMP_POLL_HTTP_TIMEOUT', '3.0'))
+        )
+
+        if config.max_concurrency <= 0:
+            logger.warning(f"Invalid SNMP_POLL_MAX_CONCURRENCY ({config.max_concurrency}), using default 64")
+            config.max_concurrency = 64
+
+        if config.http_timeout <= 0:
+            logger.warning(f"Invalid SNMP_POLL_HTTP_TIMEOUT ({config.http_timeout}), using default 3.0")
+            config.http_timeout = 3.0
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading SNMP poller configuration from environment: {e}, using defaults")
+        return SNMPPollerConfig()
+
+
+def printer_status_from_snmp(info: PrinterSNMPInfo) -> PrinterStatus:
+    """ERROR si el equipo está caído o con una condición bloqueante, ONLINE en otro caso"""
+    errors = set((info.error_state or '').split(','))
+    if info.device_down or errors & BLOCKING_ERRORS:
+        return PrinterStatus.ERROR
+    return PrinterStatus.ONLINE
+
+
+class SNMPPollerService:
+    """
+    Sondeo SNMP de la flota
+
+    1. poll_all: consulta las impresoras con RicohSNMPClient, como máximo
+       `max_concurrency` a la vez (cada consulta ya aplica timeout y reintentos);
+       a las que no responden SNMP se les comprueba Web Image Monitor por HTTP
+    2. apply: escribe tóner, estado, contador de páginas y last_seen de todas
+       las impresoras con un UPDATE en lote y un único commit
+    """
+
+    def __init__(self, client: Optional[RicohSNMPClient] = None, config: Optional[SNMPPollerConfig] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.client = client or RicohSNMPClient()
+        self.config = config or load_snmp_poller_config_from_env()
+        self._transport = transport  # Transporte HTTP alternativo (tests)
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @staticmethod
+    def build_targets(printers: List) -> List[Dict]:
+        """Datos de las impresoras ORM necesarios para el sondeo"""
+        return [
+            {
+                'printer_id': p.id,
+                'hostname': p.hostname,
+                'ip_address': p.ip_address,
+                'status': p.status
+            }
+            for p in printers
+        ]
+
+    async def _http_reachable(self, ip_address: str) -> bool:
+        """True si Web Image Monitor responde (cualquier status HTTP)"""
+        try:
+            await self._http.get(f"http://{ip_address}/", timeout=self.config.http_timeout)
+            return True
+        except httpx.HTTPError:
+            return False
+
+    async def _poll_with_limit(self, target: Dict, semaphore: asyncio.Semaphore) -> Dict:
+        result = {**target, 'info': None, 'error': None, 'http_reachable': None, 'elapsed_seconds': 0.0}
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                result['info'] = await self.client.get_printer_info(target['ip_address'])
+            except Exception as e:
+                result['error'] = str(e) or type(e).__name__
+                result['http_reachable'] = await self._http_reachable(target['ip_address'])
+            result['elapsed_seconds'] = round(time.monotonic() - start, 3)
+
+        if result['error']:
+            http_info = "responde por HTTP" if result['http_reachable'] else "tampoco responde por HTTP"
+            logger.warning(f"⚠️ Sin respuesta SNMP de {target['hostname']} ({target['ip_address']}), "
+                           f"{http_info}: {result['error']}")
+        return result
+
+    async def poll_all(self, targets: List[Dict]) -> List[Dict]:
+        """
+        Consulta todas las impresoras
+
+        Returns:
+            Un dict por impresora (mismo orden que targets) con info
+            (PrinterSNMPInfo o None), error, http_reachable (None si
+            respondió SNMP) y elapsed_seconds
+        """
+        semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        logger.info(f"📡 Sondeo SNMP de {len(targets)} impresoras ({self.config.max_concurrency} simultáneas)")
+        async with httpx.AsyncClient(transport=self._transport, follow_redirects=False,
+                                     limits=httpx.Limits(max_connections=self.config.max_concurrency)) as http:
+            self._http = http
+            try:
+                return list(await asyncio.gather(*(self._poll_with_limit(t, semaphore) for t in targets)))
+            finally:
+                self._http = None
+
+    @staticmethod
+    def apply(db: Session, results: List[Dict]) -> Dict:
+        """
+        Guarda las lecturas con un único UPDATE en lote
+
+        - Impresoras que responden: tóner (solo los colores informados),
+          contador de páginas, last_seen y estado ONLINE/ERROR
+        - Sin respuesta SNMP pero con Web Image Monitor accesible: solo
+          last_seen, el estado no cambia
+        - Sin respuesta SNMP ni HTTP: estado OFFLINE, sin tocar el resto
+        - Las impresoras en MAINTENANCE conservan su estado
+
+        Returns:
+            Conteo de impresoras actualizadas por estado
+        """
+        now = datetime.now(timezone.utc)
+        rows = []
+        stats = {'updated': 0, 'online': 0, 'error': 0, 'offline': 0, 'http_only': 0}
+
+        for result in results:
+            info: Optional[PrinterSNMPInfo] = result['info']
+            row = {'id': result['printer_id']}
+            if info is None and result.get('http_reachable'):
+                # Sin SNMP pero accesible por HTTP: no sacarla de lecturas y cierres
+                row['last_seen'] = now
+                stats['http_only'] += 1
+                rows.append(row)
+                continue
+            if info is None:
+                new_status = PrinterStatus.OFFLINE
+            else:
+                new_status = printer_status_from_snmp(info)
+                row['last_seen'] = now
+                if info.page_count is not None:
+                    row['page_count'] = info.page_count
+                for field in TONER_FIELDS:
+                    level = getattr(info, field)
+                    if level is not None:
+                        row[field] = level
+
+            if result.get('status') != PrinterStatus.MAINTENANCE:
+                row['status'] = new_status
+            stats[new_status.value] += 1
+            if len(row) > 1:
+                rows.append(row)
+
+        try:
+            if rows:
+                db.execute(update(Printer), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        stats['updated'] = len(rows)
+        logger.info(
+            f"💾 Sondeo SNMP aplicado: {stats['online']} en línea, {stats['error']} con error, "
+            f"{stats['http_only']} solo por HTTP, {stats['offline']} sin respuesta"
+        )
+        return stats
+
+    @staticmethod
+    def to_summary(result: Dict) -> Dict:
+        """Resultado de una impresora como dict serializable"""
+        info: Optional[PrinterSNMPInfo] = result['info']
+        summary = {
+            'printer_id': result['printer_id'],
+            'printer_name': result['hostname'],
+            'ip': result['ip_address'],
+            'success': info is not None,
+            'http_reachable': result.get('http_reachable'),
+            'elapsed_seconds': result['elapsed_seconds'],
+            'error': result['error']
+        }
+        if info is not None:
+            summary.update({
+                'status': printer_status_from_snmp(info).value,
+                'printer_status': info.status,
+                'error_state': info.error_state,
+                'page_count': info.page_count,
+                **{field: getattr(info, field) for field in TONER_FIELDS}
+            })
+        return summary
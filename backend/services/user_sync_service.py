@@ -9,11 +9,17 @@ NO se deben eliminar ceros a la izquierda. Ejemplo: "0547" es el código correct
 from sqlalchemy.orm import Session
 from db.models import User, ContadorUsuario
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Valores por defecto de los usuarios auto-creados desde equipos
+DEFAULT_SMB_SERVER = "192.168.91.5"
+DEFAULT_SMB_PORT = 21
+DEFAULT_SMB_PATH = "\\\\192.168.91.5\\Escaner"
+DEFAULT_NETWORK_USERNAME = "reliteltda\\scaner"
+
 
 def format_user_code(code: str) -> str:
     """
@@ -109,7 +115,7 @@ class UserSyncService:
             final_smb_path = smb_path.strip()
         else:
             # Usar carpeta compartida genérica como fallback
-            final_smb_path = "\\\\192.168.91.5\\Escaner"
+            final_smb_path = DEFAULT_SMB_PATH
         
         # Usuario no existe, crear automáticamente con código FORMATEADO usando UserRepository
         from db.repository import UserRepository
@@ -119,10 +125,10 @@ class UserSyncService:
             db=db,
             name=nombre_usuario,
             codigo_de_usuario=codigo_formateado,  # ← Código formateado a 4 dígitos (ej: "0547")
-            network_username="reliteltda\\scaner",  # Valor por defecto del sistema
+            network_username=DEFAULT_NETWORK_USERNAME,  # Valor por defecto del sistema
             network_password_encrypted=EncryptionService.encrypt(""),  # Sin password inicial
-            smb_server="192.168.91.5",  # Servidor SMB por defecto
-            smb_port=21,
+            smb_server=DEFAULT_SMB_SERVER,  # Servidor SMB por defecto
+            smb_port=DEFAULT_SMB_PORT,
             smb_path=final_smb_path,  # Ruta desde libreta o genérica
             func_copier=False,  # Permisos deshabilitados por defecto
             func_printer=False,  # Se habilitan manualmente según necesidad
@@ -137,7 +143,95 @@ class UserSyncService:
         )
         
         return new_user.id
-    
+
+    @staticmethod
+    def sync_users_from_counter_batch(
+        db: Session,
+        usuarios: Iterable[Tuple[str, str]],
+        printer_id: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Sincroniza en bloque los usuarios detectados en una lectura de contadores.
+        Equivale a llamar sync_user_from_counter por cada fila, pero con una sola
+        consulta IN para los existentes, una sola UPDATE para reactivar inactivos
+        y un solo INSERT para los nuevos.
+
+        No hace commit: los cambios quedan en la transacción del llamador para
+        guardarse junto con los contadores.
+
+        Args:
+            db: Sesión de base de datos
+            usuarios: Pares (codigo_usuario, nombre_usuario) tal como vienen del contador
+            printer_id: ID de la impresora donde se detectaron (opcional, para logging)
+
+        Returns:
+            dict código formateado → user_id para todos los usuarios del lote
+        """
+        # Formatear códigos; ante códigos repetidos se conserva el primer nombre (igual que por fila)
+        nombres: Dict[str, str] = {}
+        for codigo_usuario, nombre_usuario in usuarios:
+            nombres.setdefault(format_user_code(codigo_usuario), nombre_usuario)
+
+        if not nombres:
+            return {}
+
+        existentes = db.query(User.id, User.codigo_de_usuario, User.is_active).filter(
+            User.codigo_de_usuario.in_(list(nombres))
+        ).all()
+
+        user_ids: Dict[str, int] = {}
+        inactivos = []
+        for user_id, codigo, is_active in existentes:
+            # Si hubiera códigos duplicados en users, usar el primero como hace .first()
+            if codigo in user_ids:
+                continue
+            user_ids[codigo] = user_id
+            if not is_active:
+                inactivos.append(user_id)
+
+        if inactivos:
+            db.query(User).filter(User.id.in_(inactivos)).update({User.is_active: True})
+            logger.info(f"✓ {len(inactivos)} usuarios reactivados desde contadores")
+
+        faltantes = [codigo for codigo in nombres if codigo not in user_ids]
+        if faltantes:
+            from db.repository import UserRepository
+            from services.encryption_service import EncryptionService
+
+            # Mismos valores por defecto que el alta usuario por usuario, resueltos una sola vez
+            network_password_encrypted = EncryptionService.encrypt("")
+            smb_server_obj, network_cred_obj = UserRepository.get_or_create_smb_references(
+                db, DEFAULT_SMB_SERVER, DEFAULT_SMB_PORT, DEFAULT_NETWORK_USERNAME, network_password_encrypted
+            )
+
+            nuevos = [
+                User(
+                    name=nombres[codigo],
+                    codigo_de_usuario=codigo,
+                    network_username=DEFAULT_NETWORK_USERNAME,
+                    network_password_encrypted=network_password_encrypted,
+                    smb_server=DEFAULT_SMB_SERVER,
+                    smb_port=DEFAULT_SMB_PORT,
+                    smb_path=DEFAULT_SMB_PATH,
+                    smb_server_id=smb_server_obj.id,
+                    network_credential_id=network_cred_obj.id,
+                    func_copier=False,  # Permisos deshabilitados por defecto
+                    func_printer=False,
+                    func_scanner=False
+                )
+                for codigo in faltantes
+            ]
+            db.add_all(nuevos)
+            db.flush()  # INSERT en bloque, obtiene los IDs
+
+            for user in nuevos:
+                user_ids[user.codigo_de_usuario] = user.id
+
+            printer_info = f" en impresora {printer_id}" if printer_id else ""
+            logger.info(f"✓ {len(nuevos)} usuarios auto-creados{printer_info} (SMB: {DEFAULT_SMB_PATH})")
+
+        return user_ids
+
     @staticmethod
     def sync_all_users_from_counters(db: Session, days: int = 30) -> Dict[str, int]:
         """
@@ -191,10 +285,10 @@ class UserSyncService:
                         db=db,
                         name=nombre,
                         codigo_de_usuario=codigo,
-                        network_username="reliteltda\\scaner",
+                        network_username=DEFAULT_NETWORK_USERNAME,
                         network_password_encrypted=EncryptionService.encrypt(""),
-                        smb_server="192.168.91.5",
-                        smb_port=21,
+                        smb_server=DEFAULT_SMB_SERVER,
+                        smb_port=DEFAULT_SMB_PORT,
                         smb_path="\\\\PENDIENTE\\Escaner",  # Placeholder - configurar manualmente
                         func_copier=False,
                         func_printer=False,
@@ -358,11 +452,11 @@ class UserSyncService:
                         db=db,
                         name=nombre,
                         codigo_de_usuario=codigo_formateado,  # ← Código formateado a 4 dígitos
-                        network_username="reliteltda\\scaner",
+                        network_username=DEFAULT_NETWORK_USERNAME,
                         network_password_encrypted=EncryptionService.encrypt(""),
-                        smb_server="192.168.91.5",
-                        smb_port=21,
-                        smb_path=carpeta if carpeta else "\\\\192.168.91.5\\Escaner",
+                        smb_server=DEFAULT_SMB_SERVER,
+                        smb_port=DEFAULT_SMB_PORT,
+                        smb_path=carpeta if carpeta else DEFAULT_SMB_PATH,
                         func_copier=False,
                         func_printer=False,
                         func_scanner=False
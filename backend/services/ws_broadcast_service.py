@@ -0,0 +1,393 @@
+"""
+WebSocket Broadcast Service
+Difusión no bloqueante de eventos a los clientes WebSocket (/ws/logs)
+
+- Cada conexión tiene una cola de salida acotada y su propia tarea de envío:
+  un navegador lento solo retrasa sus propios mensajes
+- Si la cola de un cliente se llena se descartan sus mensajes más antiguos y,
+  cuando se pone al día, recibe un único aviso con el número de omitidos
+- Un envío que supera send_timeout cierra la conexión del cliente
+- Los eventos se publican en un bus: Redis pub/sub reparte cada evento entre
+  todos los workers de uvicorn; sin Redis se usa un bus en proceso
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Envelope = Dict[str, Any]
+
+
+def _in_audience(meta: dict, audience: Dict[str, Optional[int]]) -> bool:
+    """Superadmin, cliente de la empresa del evento o el usuario que lo originó"""
+    if meta.get("rol") == "superadmin":
+        return True
+    empresa_id = audience.get("empresa_id")
+    if empresa_id is not None and meta.get("empresa_id") == empresa_id:
+        return True
+    return audience.get("user_id") is not None and meta.get("user_id") == audience.get("user_id")
+
+
+@dataclass
+class WSBroadcastConfig:
+    """Configuración de la difusión WebSocket"""
+    queue_size: int = 256  # Mensajes pendientes por conexión antes de descartar
+    send_timeout: float = 5.0  # Segundos máximos por envío antes de cerrar la conexión
+    bus: str = "auto"  # auto | redis | local
+    channel: str = "ricoh:ws:logs"  # Canal pub/sub compartido por los workers
+
+
+def load_ws_broadcast_config_from_env() -> WSBroadcastConfig:
+    """Carga la configuración de difusión WebSocket desde variables de entorno"""
+    try:
+        config = WSBroadcastConfig(
+            queue_size=int(os.getenv('WS_SEND_QUEUE_SIZE', '256')),
+            send_timeout=float(os.getenv('WS_SEND_TIMEOUT', '5')),
+            bus=os.getenv('WS_BROADCAST_BUS', 'auto').lower(),
+            channel=os.getenv('WS_BROADCAST_CHANNEL', 'ricoh:ws:logs')
+        )
+
+        if config.queue_size < 1:
+            logger.warning(f"Invalid WS_SEND_QUEUE_SIZE ({config.queue_size}), using default 256")
+            config.queue_size = 256
+
+        if config.send_timeout <= 0:
+            logger.warning(f"Invalid WS_SEND_TIMEOUT ({config.send_timeout}), using default 5")
+            config.send_timeout = 5.0
+
+        if config.bus not in ('auto', 'redis', 'local'):
+            logger.warning(f"Invalid WS_BROADCAST_BUS ({config.bus}), using default 'auto'")
+            config.bus = 'auto'
+
+        return config
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error loading WebSocket broadcast configuration from environment: {e}, using defaults")
+        return WSBroadcastConfig()
+
+
+ws_broadcast_config = load_ws_broadcast_config_from_env()
+
+
+# ============================================================================
+# Cola de salida por conexión
+# ============================================================================
+
+class ClientChannel:
+    """
+    Cola de salida acotada y tarea de envío de una conexión WebSocket
+
+    offer() nunca espera: si la cola está llena descarta el mensaje más
+    antiguo. Los descartes se notifican al cliente con un solo aviso antes
+    del siguiente mensaje entregado.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        meta: dict,
+        config: WSBroadcastConfig,
+        on_lost: Optional[Callable[[Any], None]] = None
+    ):
+        self.websocket = websocket
+        self.meta = meta
+        self._config = config
+        self._on_lost = on_lost
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=config.queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._pending_dropped = 0
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._writer())
+
+    def offer(self, message: dict) -> bool:
+        """Encola un mensaje sin bloquear; retorna False si la conexión ya está cerrada"""
+        if self.closed:
+            return False
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+            self._pending_dropped += 1
+        self._queue.put_nowait(message)
+        return True
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """Detiene la tarea de envío (idempotente)"""
+        self.closed = True
+        if self._task and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    async def _send(self, message: dict) -> None:
+        await asyncio.wait_for(self.websocket.send_json(message), self._config.send_timeout)
+
+    async def _writer(self) -> None:
+        try:
+            while True:
+                message = await self._queue.get()
+                if self._pending_dropped:
+                    omitidos, self._pending_dropped = self._pending_dropped, 0
+                    await self._send(_dropped_notice(omitidos))
+                await self._send(message)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"[WS] Send timeout ({self._config.send_timeout}s) for {self.meta.get('username')} — closing"
+            )
+            await self._abort(code=1013, reason="Client too slow")
+        except Exception as exc:
+            logger.warning(f"[WS] Failed to send to {self.meta.get('username')}: {exc}")
+            await self._abort()
+
+    async def _abort(self, code: int = 1011, reason: str = "") -> None:
+        self.closed = True
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), 1.0)
+        except Exception:
+            pass
+        if self._on_lost:
+            self._on_lost(self.websocket)
+
+    def stats(self) -> dict:
+        connected_at = self.meta.get("connected_at")
+        return {
+            "user_id": self.meta.get("user_id"),
+            "username": self.meta.get("username"),
+            "rol": self.meta.get("rol"),
+            "ip": self.meta.get("ip"),
+            "connected_at": connected_at.isoformat() if connected_at else None,
+            "queue_depth": self.queue_depth,
+            "queue_size": self._config.queue_size,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
+
+def _dropped_notice(count: int) -> dict:
+    return {
+        "id": f"dropped-{datetime.now(timezone.utc).timestamp()}",
+        "timestamp": datetime.now().strftime("%H:%M:%S"),
+        "message": f"{count} mensajes omitidos: la conexión no recibía a tiempo",
+        "type": "warning",
+        "dropped": count,
+    }
+
+
+# ============================================================================
+# Buses de difusión
+# ============================================================================
+
+class LocalBroadcastBus:
+    """
+    Bus en proceso: entrega cada evento a los suscriptores del mismo proceso
+
+    Serializa a JSON igual que el bus Redis, para que ambos entreguen lo mismo
+    """
+
+    name = "local"
+
+    def __init__(self):
+        self._subscribers: List[Callable[[Envelope], Any]] = []
+
+    async def subscribe(self, callback: Callable[[Envelope], Any]) -> None:
+        self._subscribers.append(callback)
+
+    async def unsubscribe(self, callback: Callable[[Envelope], Any]) -> None:
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    async def publish(self, envelope: Envelope) -> None:
+        payload = json.dumps(envelope, default=str)
+        for callback in list(self._subscribers):
+            callback(json.loads(payload))
+
+
+class RedisBroadcastBus:
+    """
+    Bus Redis pub/sub: cada worker se suscribe al canal y entrega a sus propios
+    clientes todo lo publicado por cualquier worker (incluido él mismo)
+    """
+
+    name = "redis"
+
+    def __init__(self, client_factory: Callable[[], Any], channel: str, reconnect_delay: float = 1.0):
+        self._client_factory = client_factory
+        self.channel = channel
+        self._reconnect_delay = reconnect_delay
+        self._client = None
+        self._callback: Optional[Callable[[Envelope], Any]] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def subscribe(self, callback: Callable[[Envelope], Any]) -> None:
+        self._client = self._client_factory()
+        self._callback = callback
+        self._listener = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, callback: Callable[[Envelope], Any]) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def publish(self, envelope: Envelope) -> None:
+        await self._client.publish(self.channel, json.dumps(envelope, default=str))
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        envelope = json.loads(item["data"])
+                    except (TypeError, ValueError):
+                        logger.warning(f"[WS] Invalid broadcast payload on {self.channel} — ignored")
+                        continue
+                    self._callback(envelope)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"[WS] Redis subscription lost ({exc}), retrying in {self._reconnect_delay}s")
+                await asyncio.sleep(self._reconnect_delay)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+def create_broadcast_bus(config: WSBroadcastConfig):
+    """Bus según WS_BROADCAST_BUS: 'auto' usa Redis solo si RedisService está conectado"""
+    from services.redis_service import redis_service, create_async_redis_client
+
+    if config.bus == "redis" or (config.bus == "auto" and redis_service.is_enabled()):
+        return RedisBroadcastBus(create_async_redis_client, config.channel)
+    return LocalBroadcastBus()
+
+
+# ============================================================================
+# Hub de conexiones
+# ============================================================================
+
+class BroadcastHub:
+    """
+    Conexiones WebSocket de este worker y su suscripción al bus
+
+    publish() envía el evento al bus; cada worker lo recibe y lo encola en
+    sus conexiones (sin esperar a ningún cliente). Antes de start(), o si el
+    bus falla al publicar, el evento se entrega solo a los clientes locales.
+    """
+
+    def __init__(
+        self,
+        config: Optional[WSBroadcastConfig] = None,
+        bus=None,
+        on_client_lost: Optional[Callable[[Any], None]] = None
+    ):
+        self.config = config or ws_broadcast_config
+        self._bus = bus
+        self._on_client_lost = on_client_lost
+        self._channels: Dict[Any, ClientChannel] = {}
+        self._started = False
+
+    async def start(self) -> None:
+        if self._started:
+            return
+        if self._bus is None:
+            self._bus = create_broadcast_bus(self.config)
+        await self._bus.subscribe(self._deliver)
+        self._started = True
+        logger.info(f"📡 WebSocket broadcast bus: {self._bus.name}")
+
+    async def stop(self) -> None:
+        if self._started:
+            self._started = False
+            await self._bus.unsubscribe(self._deliver)
+        for channel in list(self._channels.values()):
+            channel.close()
+        self._channels.clear()
+
+    def register(self, websocket, meta: dict) -> ClientChannel:
+        channel = ClientChannel(websocket, meta, self.config, on_lost=self._client_lost)
+        self._channels[websocket] = channel
+        channel.start()
+        return channel
+
+    def unregister(self, websocket) -> None:
+        channel = self._channels.pop(websocket, None)
+        if channel:
+            channel.close()
+
+    def _client_lost(self, websocket) -> None:
+        self.unregister(websocket)
+        if self._on_client_lost:
+            self._on_client_lost(websocket)
+
+    def send_to(self, websocket, message: dict) -> bool:
+        """Encola un mensaje para una sola conexión de este worker"""
+        channel = self._channels.get(websocket)
+        return channel.offer(message) if channel else False
+
+    async def publish(self, message: dict, allowed_roles: Optional[List[str]] = None,
+                      audience: Optional[Dict[str, Optional[int]]] = None) -> None:
+        """
+        Args:
+            allowed_roles: Solo clientes con uno de estos roles (None = todos)
+            audience: {'empresa_id', 'user_id'}: solo superadmins, clientes de esa
+                empresa o ese usuario (None = todos)
+        """
+        envelope = {"message": message, "allowed_roles": allowed_roles, "audience": audience}
+        if self._started:
+            try:
+                await self._bus.publish(envelope)
+                return
+            except Exception as exc:
+                logger.warning(f"[WS] Broadcast bus publish failed ({exc}) — delivering locally only")
+        self._deliver(json.loads(json.dumps(envelope, default=str)))
+
+    def _deliver(self, envelope: Envelope) -> int:
+        """Encola el evento en cada conexión local autorizada; retorna cuántas lo recibieron"""
+        message = envelope.get("message")
+        allowed_roles = envelope.get("allowed_roles")
+        audience = envelope.get("audience")
+        delivered = 0
+        for channel in list(self._channels.values()):
+            # Role filter: skip if this client's role is not in allowed_roles
+            if allowed_roles and channel.meta.get("rol") not in allowed_roles:
+                continue
+            if audience and not _in_audience(channel.meta, audience):
+                continue
+            if channel.offer(message):
+                delivered += 1
+        return delivered
+
+    def stats(self) -> dict:
+        connections = [channel.stats() for channel in self._channels.values()]
+        return {
+            "bus": self._bus.name if (self._started and self._bus) else "local",
+            "worker_pid": os.getpid(),
+            "connections": connections,
+            "total_queued": sum(c["queue_depth"] for c in connections),
+            "total_dropped": sum(c["dropped"] for c in connections),
+        }
@@ -11,6 +11,8 @@ import os
 os.environ["ENVIRONMENT"] = "test"
 os.environ["SECRET_KEY"] = "test-secret-key-minimum-32-characters-long"
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+# Job workers would poll the module-level in-memory engine; tests drive the queue explicitly
+os.environ.setdefault("ENABLE_JOB_WORKER", "false")
 
 # Monkey-patch JSONB to use JSON for SQLite BEFORE importing models
 from sqlalchemy.dialects import postgresql
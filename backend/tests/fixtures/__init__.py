@@ -0,0 +1 @@
+"""Test fixtures: captured printer HTML and simulated printer agents"""
@@ -0,0 +1,187 @@
+"""
+Local SNMP agent simulator for tests and benchmarks
+
+Serves GET, GETNEXT and GETBULK over UDP for one or more printers, each bound
+to its own loopback address (127.0.0.x) on a shared port, so the real
+RicohSNMPClient talks to it unchanged. Latency and dropped requests can be
+injected per agent.
+"""
+import asyncio
+import bisect
+from typing import Any, Dict, List, Optional
+
+from services.snmp_codec import (
+    COUNTER32,
+    END_OF_MIB_VIEW_VALUE,
+    GAUGE32,
+    GET_BULK_REQUEST,
+    GET_NEXT_REQUEST,
+    GET_REQUEST,
+    GET_RESPONSE,
+    NO_SUCH_OBJECT_VALUE,
+    TIMETICKS,
+    SNMPDecodeError,
+    SNMPMessage,
+    SNMPPdu,
+    SNMPValue,
+    decode_message,
+    encode_message,
+    oid_to_tuple,
+)
+
+
+def ricoh_printer_mib(
+    black: int = 80,
+    cyan: Optional[int] = 60,
+    magenta: Optional[int] = 45,
+    yellow: Optional[int] = 10,
+    page_count: int = 123456,
+    serial: str = "E174M210096",
+    model: str = "RICOH IM C3000",
+    error_bits: bytes = b"\x00\x00",
+    device_status: int = 2,
+    printer_status: int = 3,
+) -> Dict[str, Any]:
+    """
+    Printer-MIB of a Ricoh MFP: system group, hrPrinter status and the
+    supplies table (toner with maxCapacity 100, plus a waste toner bottle)
+
+    Monochrome printers pass cyan/magenta/yellow as None
+    """
+    mib: Dict[str, Any] = {
+        '1.3.6.1.2.1.1.1.0': f"{model} 1.02 / RICOH Network Printer C model",
+        '1.3.6.1.2.1.1.3.0': SNMPValue(TIMETICKS, 8640000),
+        '1.3.6.1.2.1.1.4.0': "soporte@example.com",
+        '1.3.6.1.2.1.1.5.0': "RNP0026737FE8D1",
+        '1.3.6.1.2.1.1.6.0': "Piso 2",
+        '1.3.6.1.2.1.25.3.2.1.3.1': model,
+        '1.3.6.1.2.1.25.3.2.1.5.1': device_status,
+        '1.3.6.1.2.1.25.3.5.1.1.1': printer_status,
+        '1.3.6.1.2.1.25.3.5.1.2.1': error_bits,
+        '1.3.6.1.2.1.43.5.1.1.17.1': serial,
+        '1.3.6.1.2.1.43.10.2.1.4.1.1': SNMPValue(COUNTER32, page_count),
+    }
+
+    supplies = [("black", "Black Toner", black)]
+    supplies += [(color, f"{color.capitalize()} Toner", level)
+                 for color, level in (("cyan", cyan), ("magenta", magenta), ("yellow", yellow))
+                 if level is not None]
+    for index, (color, description, level) in enumerate(supplies, start=1):
+        mib[f'1.3.6.1.2.1.43.11.1.1.3.1.{index}'] = index
+        mib[f'1.3.6.1.2.1.43.11.1.1.5.1.{index}'] = 3
+        mib[f'1.3.6.1.2.1.43.11.1.1.6.1.{index}'] = description
+        mib[f'1.3.6.1.2.1.43.11.1.1.8.1.{index}'] = 100
+        mib[f'1.3.6.1.2.1.43.11.1.1.9.1.{index}'] = level
+        mib[f'1.3.6.1.2.1.43.12.1.1.4.1.{index}'] = color
+
+    waste = len(supplies) + 1
+    mib[f'1.3.6.1.2.1.43.11.1.1.3.1.{waste}'] = 0
+    mib[f'1.3.6.1.2.1.43.11.1.1.5.1.{waste}'] = 4  # wasteToner
+    mib[f'1.3.6.1.2.1.43.11.1.1.6.1.{waste}'] = "Waste Toner"
+    mib[f'1.3.6.1.2.1.43.11.1.1.8.1.{waste}'] = SNMPValue(GAUGE32, 100)
+    mib[f'1.3.6.1.2.1.43.11.1.1.9.1.{waste}'] = -3
+    return mib
+
+
+class _Agent(asyncio.DatagramProtocol):
+
+    def __init__(self, mib: Dict[str, Any], community: bytes, latency: float, drop: int):
+        self.oids = sorted(mib, key=oid_to_tuple)
+        self.keys = [oid_to_tuple(oid) for oid in self.oids]
+        self.mib = mib
+        self.community = community
+        self.latency = latency
+        self.drop = drop
+        self.requests: List[int] = []  # Tipo de PDU de cada request recibido
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        asyncio.get_running_loop().create_task(self._answer(data, addr))
+
+    async def _answer(self, data, addr):
+        try:
+            message = decode_message(data)
+        except SNMPDecodeError:
+            return
+        self.requests.append(message.pdu.pdu_type)
+        if message.community != self.community:
+            return
+        if self.drop > 0:
+            self.drop -= 1
+            return
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.transport is None or self.transport.is_closing():
+            return
+        pdu = message.pdu
+        response = SNMPMessage(message.version, message.community,
+                               SNMPPdu(GET_RESPONSE, pdu.request_id, 0, 0, self._varbinds(pdu)))
+        self.transport.sendto(encode_message(response), addr)
+
+    def _next(self, oid: str):
+        position = bisect.bisect_right(self.keys, oid_to_tuple(oid))
+        if position >= len(self.oids):
+            return oid, END_OF_MIB_VIEW_VALUE
+        found = self.oids[position]
+        return found, self.mib[found]
+
+    def _varbinds(self, pdu: SNMPPdu):
+        oids = [oid for oid, _ in pdu.varbinds]
+        if pdu.pdu_type == GET_REQUEST:
+            return [(oid, self.mib.get(oid, NO_SUCH_OBJECT_VALUE)) for oid in oids]
+        if pdu.pdu_type == GET_NEXT_REQUEST:
+            return [self._next(oid) for oid in oids]
+        if pdu.pdu_type == GET_BULK_REQUEST:
+            non_repeaters, max_repetitions = pdu.error_status, pdu.error_index
+            varbinds = [self._next(oid) for oid in oids[:non_repeaters]]
+            cursors = oids[non_repeaters:]
+            for _ in range(max_repetitions):
+                row = [self._next(oid) for oid in cursors]
+                varbinds.extend(row)
+                cursors = [oid for oid, _ in row]
+                if all(value is END_OF_MIB_VIEW_VALUE for _, value in row):
+                    break
+            return varbinds
+        return []
+
+
+class SNMPSimulator:
+    """
+    Usage:
+        async with SNMPSimulator({"127.0.0.2": ricoh_printer_mib()}) as sim:
+            client = RicohSNMPClient(port=sim.port)
+            info = await client.get_printer_info("127.0.0.2")
+    """
+
+    def __init__(self, agents: Dict[str, Dict[str, Any]], community: str = "public",
+                 latency: float = 0.0, drop: Optional[Dict[str, int]] = None):
+        self.specs = agents
+        self.community = community.encode()
+        self.latency = latency
+        self.drop = drop or {}
+        self.port = 0
+        self.agents: Dict[str, _Agent] = {}
+
+    async def start(self) -> "SNMPSimulator":
+        loop = asyncio.get_running_loop()
+        for ip, mib in self.specs.items():
+            agent = _Agent(mib, self.community, self.latency, self.drop.get(ip, 0))
+            transport, _ = await loop.create_datagram_endpoint(lambda: agent, local_addr=(ip, self.port))
+            if not self.port:
+                self.port = transport.get_extra_info('sockname')[1]
+            self.agents[ip] = agent
+        return self
+
+    def close(self) -> None:
+        for agent in self.agents.values():
+            if agent.transport is not None:
+                agent.transport.close()
+
+    async def __aenter__(self) -> "SNMPSimulator":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
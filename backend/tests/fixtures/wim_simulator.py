@@ -0,0 +1,493 @@
+"""
+Local Web Image Monitor simulator for tests and benchmarks
+
+Serves the address book flow RicohWebClient uses to provision users (login,
+adrsList, adrsListLoadEntry, adrsGetUser, adrsSetUser, adrsEditPassword and
+logout) from an in-memory address book, and the pages the parsers read:
+getUnificationCounter, getUserCounter in the .250 (18 columns), .251 (22
+columns) and .252 (13 columns) table formats, getEcoCounter (.253),
+getStatus (toner bars) and storedJob. Each printer is an HTTP server bound
+to its own loopback address (127.0.0.x) on a shared port, so the real
+clients talk to it unchanged through "127.0.0.x:port". Latency, the rows a
+counter page returns and "busy" answers to reads and writes can be set per
+printer; with strict_flow a user form is only served for entries of the
+address book batch last loaded in the session (BADFLOW otherwise), as the
+real Web Image Monitor does; failing_list_batches and failing_counter_pages
+make given address book batches and counter pages fail once.
+"""
+import base64
+import binascii
+import itertools
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+FUNCTIONS = ['COPY_BW', 'COPY_TC', 'COPY_MC', 'PRT_BW', 'PRT_FC', 'SCAN', 'DOC_SERVER', 'FAX', 'BROWSER']
+
+SESSION_COOKIE = 'wimsession'
+
+COUNTER_FORMATS = ('250', '251', '252', '253')
+
+# Per-user counters kept by the simulator; each table format shows a subset
+COUNTER_FIELDS = [
+    'copy_bw', 'copy_mono', 'copy_two', 'copy_full', 'copy_duplex', 'copy_combined',
+    'print_bw', 'print_mono', 'print_two', 'print_color', 'print_duplex', 'print_combined',
+    'scan_bw', 'scan_color', 'fax_bw', 'fax_sent', 'dev_black', 'dev_color'
+]
+
+TONER_IMAGES = {'cyan': 'C', 'magenta': 'M', 'yellow': 'Y', 'black': 'K'}
+
+COUNTER_CGIS = ('getUnificationCounter.cgi', 'getUserCounter.cgi', 'getEcoCounter.cgi', 'getStatus.cgi',
+                'storedJob.cgi')
+
+_NAMES = ['ALVAREZ JUAN', 'BERNAL MARIA', 'CASTRO LUIS', 'DIAZ ANA', 'ESPINOSA CARLOS', 'FONSECA LAURA',
+          'GARCIA PEDRO', 'HERRERA SOFIA', 'IBARRA JORGE', 'JIMENEZ PAOLA', 'LOPEZ ANDRES', 'MARTINEZ DIANA']
+
+
+def address_book(count: int, first_code: int = 1000) -> List[Dict]:
+    """Address book entries with consecutive user codes"""
+    return [
+        {'name': f'USUARIO {i}', 'code': str(first_code + i), 'folder': f'\\\\server\\scan\\{first_code + i}',
+         'functions': ['COPY_BW', 'PRT_BW', 'SCAN']}
+        for i in range(count)
+    ]
+
+
+def counter_users(count: int, first_code: int = 1, seed: int = 0) -> List[Dict]:
+    """Users with consecutive 4-digit codes and reproducible counters"""
+    rng = random.Random(seed)
+    users = []
+    for i in range(count):
+        counters = {name: 0 for name in COUNTER_FIELDS}
+        for name in ('copy_bw', 'print_bw', 'scan_bw'):
+            counters[name] = rng.randint(0, 50000)
+        for name in ('copy_full', 'print_color', 'copy_duplex', 'print_duplex', 'scan_color', 'fax_bw'):
+            counters[name] = rng.choice([0, rng.randint(0, 20000)])
+        users.append({'code': str(first_code + i).zfill(4), 'name': f'{_NAMES[i % len(_NAMES)]} {first_code + i}',
+                      'counters': counters})
+    return users
+
+
+def stored_jobs(count: int) -> List[Dict]:
+    """Stored print jobs as listed by storedJob.cgi"""
+    return [
+        {'id': str(100 + i), 'type': 'Impresión almacenada', 'user': f'{i:04d}', 'document': f'documento_{i}.pdf',
+         'date': '18/10/2026 09:30', 'pages': 1 + i % 12, 'copies': 1 + i % 3}
+        for i in range(count)
+    ]
+
+
+class WimPrinter:
+    """Address book, counters and WIM session state of one simulated printer"""
+
+    def __init__(self, entries: Optional[List[Dict]] = None, latency: float = 0.0,
+                 busy_writes: int = 0, admin_password: Optional[str] = None,
+                 users: Optional[List[Dict]] = None, counter_format: str = '251', page_size: int = 20,
+                 busy_reads: int = 0, toner: Optional[Dict[str, int]] = None, jobs: Optional[List[Dict]] = None,
+                 strict_flow: bool = False, failing_list_batches: Optional[List[int]] = None,
+                 failing_counter_pages: Optional[List[int]] = None):
+        if counter_format not in COUNTER_FORMATS:
+            raise ValueError(f"counter_format must be one of {COUNTER_FORMATS}")
+        self.entries: Dict[str, Dict] = {}
+        for entry in entries or []:
+            self._store(self._next_index(), entry)
+        self.latency = latency
+        self.busy_writes = busy_writes  # Escrituras (adrsSetUser) respondidas con BUSY
+        self.admin_password = admin_password  # None acepta cualquier contraseña
+        self.users = users or []  # Contadores por usuario (counter_users)
+        self.counter_format = counter_format
+        self.page_size = page_size  # Máximo de filas por página de contadores
+        self.busy_reads = busy_reads  # Lecturas de contadores respondidas con 503 BUSY
+        self.toner = toner or {'cyan': 80, 'magenta': 60, 'yellow': 40, 'black': 20}
+        self.jobs = jobs or []
+        self.strict_flow = strict_flow  # BADFLOW si la entrada no está en el último lote cargado
+        self.failing_list_batches = list(failing_list_batches or [])  # Lotes de la libreta que fallan una vez (500)
+        self.failing_counter_pages = list(failing_counter_pages or [])  # Páginas de contadores que fallan una vez (500)
+        self._random = random.Random(len(self.users))
+        self.sessions: Dict[str, Dict] = {}
+        self.requests: List[str] = []  # CGI de cada request recibido
+        self.logins = 0
+        self.lock = threading.Lock()
+        self._tokens = itertools.count(10000001)
+        self._session_ids = itertools.count(1)
+
+    def _next_index(self) -> str:
+        return str(max((int(index) for index in self.entries), default=0) + 1).zfill(5)
+
+    def _store(self, index: str, entry: Dict) -> None:
+        self.entries[index] = {
+            'name': entry.get('name', ''),
+            'code': entry.get('code', ''),
+            'folder': entry.get('folder', ''),
+            'folder_user': entry.get('folder_user', ''),
+            'functions': list(entry.get('functions', [])),
+            'password': entry.get('password')
+        }
+
+    def by_code(self, code: str) -> Optional[Dict]:
+        return next((entry for entry in self.entries.values() if entry['code'] == code), None)
+
+    def token(self) -> str:
+        return str(next(self._tokens))
+
+    def advance(self, fraction: float = 0.3, max_pages: int = 200) -> int:
+        """Prints on a random share of the users (usage between two reads); returns users changed"""
+        changed = self._random.sample(self.users, int(len(self.users) * fraction))
+        for user in changed:
+            user['counters']['print_bw'] += self._random.randint(1, max_pages)
+            user['counters']['copy_bw'] += self._random.randint(0, max_pages)
+        return len(changed)
+
+    def login(self, password: str) -> Optional[str]:
+        if self.admin_password is not None and password != self.admin_password:
+            return None
+        self.logins += 1
+        session_id = str(next(self._session_ids))
+        self.sessions[session_id] = {'editing': None, 'loaded': set()}
+        return session_id
+
+
+def _decode(value: str) -> str:
+    """Login fields arrive base64 encoded, except the password of the parsers' standard login"""
+    try:
+        return base64.b64decode(value, validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        return value
+
+
+def _token_input(token: str) -> str:
+    return f'<input type="hidden" name="wimToken" value="{token}">'
+
+
+def _list_page(printer: WimPrinter) -> str:
+    return f'<html><body><form name="adrsList">{_token_input(printer.token())}</form></body></html>'
+
+
+def _user_form(printer: WimPrinter, index: str) -> str:
+    entry = printer.entries[index]
+    checkboxes = ''.join(
+        f'<input type="checkbox" name="availableFuncIn" value="{function}"'
+        f'{" checked" if function in entry["functions"] else ""}>'
+        for function in FUNCTIONS
+    )
+    return (
+        '<html><body><form name="adrsGetUser">'
+        f'{_token_input(printer.token())}'
+        f'<input name="entryIndexIn" value="{index}">'
+        f'<input name="entryNameIn" value="{entry["name"]}">'
+        f'<input name="entryDisplayNameIn" value="{entry["name"]}">'
+        f'<input name="userCodeIn" value="{entry["code"]}">'
+        f'<input name="folderPathNameIn" value="{entry["folder"]}">'
+        f'<input name="folderAuthUserNameIn" value="{entry["folder_user"]}">'
+        f'{checkboxes}</form></body></html>'
+    )
+
+
+def _totals(counters: Dict[str, int]):
+    bw = counters['copy_bw'] + counters['print_bw']
+    color = sum(counters[name] for name in ('copy_mono', 'copy_two', 'copy_full', 'print_mono', 'print_two',
+                                            'print_color'))
+    return bw, color
+
+
+def _user_row(user: Dict, counter_format: str) -> List:
+    c = user['counters']
+    bw, color = _totals(c)
+    if counter_format == '252':
+        return [user['code'], user['name'], bw, c['copy_bw'], c['copy_duplex'], c['copy_combined'], c['print_bw'],
+                c['print_duplex'], c['print_combined'], c['scan_bw'], c['scan_color'], c['fax_bw'], c['fax_sent']]
+    copy = [c['copy_bw'], c['copy_mono'], c['copy_two'], c['copy_full']]
+    printer = [c['print_bw'], c['print_mono'], c['print_two'], c['print_color']]
+    if counter_format == '251':
+        copy += [c['copy_duplex'], c['copy_combined']]
+        printer += [c['print_duplex'], c['print_combined']]
+    return [user['code'], user['name'], bw, color, *copy, *printer, c['scan_bw'], c['scan_color'],
+            c['fax_bw'], c['fax_sent'], c['dev_black'], c['dev_color']]
+
+
+def _eco_row(number: int, user: Dict) -> List:
+    bw, color = _totals(user['counters'])
+    duplex = min(100, (user['counters']['copy_duplex'] + user['counters']['print_duplex']) * 100 // max(1, bw + color))
+    return [number, user['code'], user['name'], bw + color, 0, f'{duplex}%', '0%', '0%', '0%', f'{duplex // 2}%', '0%']
+
+
+def _table(rows: List[List], cell: str = '<td class="listData" nowrap>') -> str:
+    columns = len(rows[0]) if rows else 0
+    header = ''.join(f'<th class="listTitle">Col {i}</th>' for i in range(columns))
+    body = ''.join(
+        f'<tr class="{"listEven" if i % 2 == 0 else "listOdd"}">{"".join(f"{cell}{value}</td>" for value in row)}</tr>\n'
+        for i, row in enumerate(rows)
+    )
+    return f'<table class="adTable" cellspacing="1" cellpadding="2">\n<tr>{header}</tr>\n{body}</table>\n'
+
+
+def _counter_page(printer: WimPrinter, cgi: str, offset: int, count: int) -> str:
+    """One page of getUserCounter (.250/.251/.252) or getEcoCounter (.253), as the printer paginates it"""
+    rows_per_page = max(1, min(count or 10, printer.page_size))
+    users = printer.users[offset:offset + rows_per_page]
+    pages = max(1, math.ceil(len(printer.users) / rows_per_page))
+    navi = (
+        '<table class="pageNavi" cellspacing="0" cellpadding="0"><tr>'
+        f'<td class="naviText">Usuario {len(printer.users)}</td>'
+        f'<td class="naviPage"><span id="span_currentPage">{offset // rows_per_page + 1}</span>&nbsp;/&nbsp;'
+        f'<span id="span_totalPage">{pages}</span></td></tr></table>\n'
+    )
+    if cgi == 'getEcoCounter.cgi':
+        total = sum(sum(_totals(user['counters'])) for user in printer.users)
+        device = _table([[total, 0, '0%', '0%', '0%', '0%', '0%', '0%']])
+        rows = [_eco_row(offset + i + 1, user) for i, user in enumerate(users)]
+        return f'<html><body><div class="title">Contador ecológico</div>{device}{navi}{_table(rows)}</body></html>'
+    rows = [_user_row(user, printer.counter_format) for user in users]
+    cell = '<td nowrap>' if printer.counter_format == '252' else '<td class="listData" nowrap>'
+    return f'<html><body><div class="title">Contador por usuario</div>{navi}{_table(rows, cell)}</body></html>'
+
+
+def _unification_page(printer: WimPrinter) -> str:
+    """Device counter (getUnificationCounter.cgi) with the sums of the user counters"""
+    def total(*names):
+        return sum(user['counters'][name] for user in printer.users for name in names)
+
+    sections = [
+        ('Total', [('Total', total('copy_bw', 'copy_mono', 'copy_two', 'copy_full',
+                                   'print_bw', 'print_mono', 'print_two', 'print_color'))]),
+        ('Copiadora', [('Blanco y Negro', total('copy_bw')), ('A todo color', total('copy_full')),
+                       ('Color personalizado', total('copy_mono')), ('Dos colores', total('copy_two'))]),
+        ('Impresora', [('Blanco y Negro', total('print_bw')), ('A todo color', total('print_color')),
+                       ('Color personalizado', total('print_mono')), ('Dos colores', total('print_two'))]),
+        ('Fax', [('Blanco y Negro', total('fax_bw'))]),
+        ('Enviar/TX Total', [('Blanco y Negro', total('scan_bw', 'fax_sent')), ('Color', total('scan_color'))]),
+        ('Transmisión por fax', [('Total', total('fax_sent'))]),
+        ('Envío por escáner', [('Blanco y Negro', total('scan_bw')), ('Color', total('scan_color'))]),
+        ('Otra función', [('A3/DLT', 0), ('Dúplex', total('copy_duplex', 'print_duplex'))]),
+    ]
+    rows = ''.join(
+        f'<tr><td colspan="5" class="sectionTitle"><div class="subtitle">{section}</div></td></tr>\n' + ''.join(
+            f'<tr class="staticProp"><td class="staticPropIndent"></td><td nowrap>{label}</td><td>:</td>'
+            f'<td nowrap>{value:,}</td><td></td></tr>\n'
+            for label, value in values
+        )
+        for section, values in sections
+    )
+    return f'<html><body><div class="title">Contador</div><table class="propTable">\n{rows}</table></body></html>'
+
+
+def _status_page(printer: WimPrinter) -> str:
+    """Toner bars of getStatus.cgi (a 128px wide bar is 100%)"""
+    bars = ''.join(
+        f'<img src="/images/deviceStTnBar{TONER_IMAGES[color]}.gif" width="{round(level * 128 / 100)}" height="8">'
+        for color, level in printer.toner.items()
+    )
+    return f'<html><body><div class="title">Estado</div>{bars}</body></html>'
+
+
+def _stored_jobs_page(printer: WimPrinter) -> str:
+    rows = ''.join(
+        '<tr>'
+        f'<td class="listData"><input type="checkbox" name="selectedJobs" value="{job["id"]}"></td>'
+        f'<td class="listData">{job["type"]}</td><td class="listData"></td>'
+        f'<td class="listData">{job["user"]}</td><td class="listData">{job["document"]}</td>'
+        f'<td class="listData">{job["date"]}</td><td class="listData"></td>'
+        f'<td class="listData">{job["pages"]}</td><td class="listData">{job["copies"]}</td>'
+        '</tr>'
+        for job in printer.jobs
+    )
+    return (f'<html><body><form name="storedJob">{_token_input(printer.token())}'
+            f'<table class="reportListCommon">{rows}</table></form></body></html>')
+
+
+def _handler(printers: Dict[str, WimPrinter]):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        wbufsize = 1 << 16  # Cabeceras y cuerpo en un solo envío (sin esperas de delayed ACK)
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        @property
+        def printer(self) -> WimPrinter:
+            return printers[self.server.server_address[0]]
+
+        def _session(self) -> Optional[Dict]:
+            for cookie in self.headers.get('Cookie', '').split(';'):
+                name, _, value = cookie.strip().partition('=')
+                if name == SESSION_COOKIE and value in self.printer.sessions:
+                    return self.printer.sessions[value]
+            return None
+
+        def _send(self, body: str, status: int = 200, headers=()):
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self, method: str):
+            printer = self.printer
+            cgi = urlsplit(self.path).path.rsplit('/', 1)[-1]
+            length = int(self.headers.get("Content-Length", 0))
+            fields = parse_qsl(self.rfile.read(length).decode(), keep_blank_values=True) if length else []
+            form = dict(fields)
+            if printer.latency:
+                time.sleep(printer.latency)
+
+            with printer.lock:
+                printer.requests.append(cgi)
+                if cgi == 'authForm.cgi':
+                    return self._send(f'<html><form name="form1">{_token_input(printer.token())}</form></html>')
+                if cgi == 'login.cgi':
+                    password = _decode(form.get('password', ''))
+                    session_id = printer.login(password)
+                    headers = [('Set-Cookie', f'{SESSION_COOKIE}={session_id}; Path=/')] if session_id else []
+                    return self._send('<html><body>mainFrame</body></html>', headers=headers)
+                if cgi == 'logout.cgi':
+                    for cookie in self.headers.get('Cookie', '').split(';'):
+                        printer.sessions.pop(cookie.strip().partition('=')[2], None)
+                    return self._send('<html><body>logout</body></html>')
+
+                session = self._session()
+                if session is None:
+                    return self._send('<html><body>authForm.cgi</body></html>', status=302,
+                                      headers=[('Location', '/web/guest/es/websys/webArch/authForm.cgi')])
+
+                if cgi in COUNTER_CGIS:
+                    return self._read(printer, cgi, form)
+                if cgi == 'adrsList.cgi':
+                    return self._send(_list_page(printer))
+                if cgi == 'adrsListLoadEntry.cgi':
+                    batch = int(form.get('getCountIn') or 1)
+                    if batch in printer.failing_list_batches:
+                        printer.failing_list_batches.remove(batch)
+                        return self._send('<html><body>error</body></html>', status=500)
+                    return self._send(self._batch(printer, session, form))
+                if cgi == 'adrsGetUser.cgi':
+                    return self._send(self._get_user(printer, session, form))
+                if cgi == 'adrsEditPassword.cgi':
+                    if session['editing'] in printer.entries and form.get('passwordIn'):
+                        printer.entries[session['editing']]['password'] = base64.b64decode(form['passwordIn']).decode()
+                    return self._send(f'<html><body>{_token_input(printer.token())}</body></html>')
+                if cgi == 'adrsSetUser.cgi':
+                    return self._send(self._set_user(printer, session, form, fields))
+                return self._send('<html><body>not found</body></html>', status=404)
+
+        def _read(self, printer: WimPrinter, cgi: str, form: Dict):
+            if printer.busy_reads > 0:
+                printer.busy_reads -= 1
+                return self._send('<html><body>BUSY</body></html>', status=503)
+            if cgi == 'getUnificationCounter.cgi':
+                return self._send(_unification_page(printer))
+            if cgi == 'getStatus.cgi':
+                return self._send(_status_page(printer))
+            if cgi == 'storedJob.cgi':
+                return self._send(_stored_jobs_page(printer))
+            if cgi == 'getEcoCounter.cgi':
+                offset, count = form.get('userCounterListOffset'), form.get('userCounterListCount')
+            else:
+                offset, count = form.get('offset'), form.get('count')
+            offset, count = int(offset or 0), int(count or 0)
+            page = offset // max(1, min(count or 10, printer.page_size)) + 1
+            if page in printer.failing_counter_pages:
+                printer.failing_counter_pages.remove(page)
+                return self._send('<html><body>error</body></html>', status=500)
+            return self._send(_counter_page(printer, cgi, offset, count))
+
+        def _batch(self, printer: WimPrinter, session: Dict, form: Dict) -> str:
+            size = int(form.get('listCountIn') or 50)
+            batch = int(form.get('getCountIn') or 1)
+            indices = sorted(printer.entries)[(batch - 1) * size:batch * size]
+            session['loaded'] = set(indices)
+            rows = [
+                ['', 1, index, printer.entries[index]['name'], 1, 'AB', '', '',
+                 printer.entries[index]['code'], '', printer.entries[index]['folder']]
+                for index in indices
+            ]
+            return repr(rows)
+
+        def _get_user(self, printer: WimPrinter, session: Dict, form: Dict) -> str:
+            if form.get('mode') == 'ADDUSER':
+                session['editing'] = None
+                return (f'<html><body>{_token_input(printer.token())}'
+                        f'<input name="entryIndexIn" value="{printer._next_index()}"></body></html>')
+            index = form.get('entryIndexIn') or session['editing']
+            if index not in printer.entries:
+                return _list_page(printer)
+            if printer.strict_flow and form.get('mode') == 'MODUSER' and index not in session['loaded']:
+                return '<html><body>BADFLOW</body></html>'
+            session['editing'] = index
+            return _user_form(printer, index)
+
+        def _set_user(self, printer: WimPrinter, session: Dict, form: Dict, fields) -> str:
+            if printer.busy_writes > 0:
+                printer.busy_writes -= 1
+                return '<html><body>BUSY</body></html>'
+            index = form.get('entryIndexIn') or printer._next_index()
+            entry = {
+                'name': form.get('entryNameIn', ''),
+                'code': form.get('userCodeIn', ''),
+                'folder': form.get('folderPathNameIn', ''),
+                'folder_user': form.get('folderAuthUserNameIn', ''),
+                'functions': [value for name, value in fields if name == 'availableFuncIn'],
+                'password': printer.entries.get(index, {}).get('password')
+            }
+            printer._store(index, entry)
+            session['editing'] = None
+            return _list_page(printer)
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+    return Handler
+
+
+class WimSimulator:
+    """
+    Usage:
+        with WimSimulator({"127.0.0.2": WimPrinter(address_book(20))}) as sim:
+            client = RicohWebClient(admin_password="")
+            client.provision_user(sim.address("127.0.0.2"), user_config)
+
+        with WimSimulator({"127.0.0.2": WimPrinter(users=counter_users(300), counter_format='252')}) as sim:
+            users, stats = fetch_all_user_counters(sim.address("127.0.0.2"))
+    """
+
+    def __init__(self, printers: Dict[str, WimPrinter]):
+        self.printers = printers
+        self.port = 0
+        self._servers: List[ThreadingHTTPServer] = []
+
+    def address(self, ip: str) -> str:
+        """Printer address as used by the client (host:port)"""
+        return f"{ip}:{self.port}"
+
+    def start(self) -> "WimSimulator":
+        handler = _handler(self.printers)
+        for ip in self.printers:
+            server = ThreadingHTTPServer((ip, self.port), handler)
+            server.daemon_threads = True
+            if not self.port:
+                self.port = server.server_address[1]
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        return self
+
+    def close(self) -> None:
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self) -> "WimSimulator":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,157 @@
+"""
+Tests for the pure-ASGI security middleware stack
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware import request_context
+from middleware.csrf_protection import CSRFProtectionMiddleware
+from middleware.ddos_protection import DDoSProtectionConfig, DDoSProtectionMiddleware, IPBlockList
+from middleware.security_headers import SecurityHeadersMiddleware
+from services.rate_limiter_service import RateLimiterService
+
+
+def _app(ddos_enabled=True, csrf=False):
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.post("/auth/login")
+    def login():
+        return {"ok": True}
+
+    @app.post("/items")
+    def create_item():
+        return {"ok": True}
+
+    if csrf:
+        app.add_middleware(CSRFProtectionMiddleware)
+    app.add_middleware(DDoSProtectionMiddleware, enabled=ddos_enabled)
+    app.add_middleware(SecurityHeadersMiddleware)
+    return app
+
+
+def _ip(ip):
+    return {"X-Forwarded-For": ip}
+
+
+@pytest.fixture(autouse=True)
+def trusted_test_client(monkeypatch):
+    """TestClient requests carry no client address: trust them as the proxy that sets X-Forwarded-For"""
+    monkeypatch.setattr(request_context, "trusted_proxies", {None})
+
+
+@pytest.mark.unit
+class TestRequestContext:
+
+    def test_context_is_built_once_per_request(self, monkeypatch):
+        built = []
+        original = request_context.RequestContext.__init__
+
+        def counting_init(self, scope):
+            built.append(scope["path"])
+            original(self, scope)
+
+        monkeypatch.setattr(request_context.RequestContext, "__init__", counting_init)
+        monkeypatch.delenv("REDIS_URL", raising=False)
+        client = TestClient(_app(csrf=True))
+
+        response = client.get("/ping", headers=_ip("203.0.113.10"))
+
+        assert response.status_code == 200
+        assert built == ["/ping"]
+
+    def test_client_ip_resolution(self, monkeypatch):
+        monkeypatch.setattr(request_context, "trusted_proxies", request_context.TrustedProxies(["10.0.0.0/8"]))
+
+        def client_ip(headers, client):
+            scope = {"type": "http", "headers": headers, "client": (client, 1234)}
+            context = request_context.get_request_context(scope)
+            assert context is request_context.get_request_context(scope) is scope[request_context.SCOPE_KEY]
+            return context.client_ip
+
+        assert client_ip([(b"x-real-ip", b" 198.51.100.7 ")], "10.0.0.1") == "198.51.100.7"
+        # Cadena de proxies: la IP más a la derecha que no es de confianza
+        assert client_ip([(b"x-forwarded-for", b"127.0.0.1, 198.51.100.8, 10.0.0.2")], "10.0.0.1") == "198.51.100.8"
+        # Headers de un cliente que no es un proxy de confianza: se ignoran
+        assert client_ip([(b"x-forwarded-for", b"127.0.0.1"), (b"x-real-ip", b"127.0.0.1")], "203.0.113.9") == "203.0.113.9"
+
+
+@pytest.mark.unit
+class TestDDoSMiddleware:
+
+    def test_rate_limit_and_security_headers(self):
+        response = TestClient(_app()).get("/ping", headers=_ip("203.0.113.20"))
+
+        assert response.headers["X-RateLimit-Limit"] == str(DDoSProtectionConfig.GLOBAL_RATE_LIMIT)
+        assert response.headers["X-RateLimit-Remaining"] == str(DDoSProtectionConfig.GLOBAL_RATE_LIMIT - 1)
+        assert response.headers["X-Frame-Options"] == "DENY"
+
+    def test_endpoint_limit_rejects_with_retry_after(self):
+        client = TestClient(_app())
+        limit = DDoSProtectionConfig.ENDPOINT_LIMITS["/auth/login"][0]
+
+        statuses = [client.post("/auth/login", headers=_ip("203.0.113.30")).status_code for _ in range(limit + 1)]
+
+        assert statuses[:limit] == [200] * limit
+        rejected = client.post("/auth/login", headers=_ip("203.0.113.30"))
+        assert rejected.status_code == 429
+        assert rejected.json()["error"] == "RATE_LIMIT_EXCEEDED"
+        assert "Retry-After" in rejected.headers
+        # El límite global se contó en la misma consulta
+        assert RateLimiterService.get_remaining("global:203.0.113.30", DDoSProtectionConfig.GLOBAL_RATE_LIMIT,
+                                                DDoSProtectionConfig.GLOBAL_RATE_WINDOW) < DDoSProtectionConfig.GLOBAL_RATE_LIMIT
+
+    def test_burst_blocks_ip_and_payload_limit(self):
+        client = TestClient(_app())
+        for _ in range(DDoSProtectionConfig.BURST_THRESHOLD - 1):
+            assert client.get("/ping", headers=_ip("203.0.113.40")).status_code == 200
+
+        burst = client.get("/ping", headers=_ip("203.0.113.40"))
+        assert burst.status_code == 429
+        assert burst.json()["error"] == "BURST_ATTACK_DETECTED"
+        assert IPBlockList.is_blocked("203.0.113.40")
+        blocked = client.get("/ping", headers=_ip("203.0.113.40"))
+        assert blocked.status_code == 403
+        assert "blocked_ips" not in blocked.json()
+
+        oversized = client.post("/items", headers={
+            **_ip("203.0.113.41"), "Content-Length": str(DDoSProtectionConfig.MAX_PAYLOAD_SIZE + 1)
+        })
+        assert oversized.status_code == 413
+
+    def test_disabled_and_whitelisted_requests_pass_untouched(self):
+        disabled = TestClient(_app(ddos_enabled=False)).get("/ping", headers=_ip("203.0.113.50"))
+        whitelisted = TestClient(_app()).get("/ping", headers=_ip("127.0.0.1"))
+
+        for response in (disabled, whitelisted):
+            assert response.status_code == 200
+            assert "X-RateLimit-Limit" not in response.headers
+
+    def test_forwarded_localhost_from_untrusted_client_is_rate_limited(self, monkeypatch):
+        monkeypatch.setattr(request_context, "trusted_proxies", request_context.TrustedProxies(["127.0.0.1"]))
+
+        response = TestClient(_app()).get("/ping", headers=_ip("127.0.0.1"))
+
+        assert response.status_code == 200
+        assert "X-RateLimit-Limit" in response.headers
+
+
+@pytest.mark.unit
+class TestCSRFMiddleware:
+
+    def test_missing_token_is_403_json_and_token_round_trips(self, monkeypatch):
+        monkeypatch.delenv("REDIS_URL", raising=False)
+        client = TestClient(_app(csrf=True))
+
+        rejected = client.post("/items", headers=_ip("203.0.113.60"))
+        assert rejected.status_code == 403
+        assert rejected.json()["detail"]["error"] == "CSRF_TOKEN_MISSING"
+
+        token = client.get("/ping", headers=_ip("203.0.113.60")).headers["X-CSRF-Token"]
+        accepted = client.post("/items", headers={**_ip("203.0.113.60"), "X-CSRF-Token": token})
+        assert accepted.status_code == 200
+        assert accepted.headers["X-CSRF-Token"] != token
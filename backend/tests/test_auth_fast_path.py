@@ -0,0 +1,132 @@
+"""
+Tests for the cached-principal fast path of token validation
+"""
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import event
+
+from db.models_auth import AdminSession
+from services.auth_service import AuthService, AccountDisabledError
+from services.jwt_service import InvalidTokenError
+from services.redis_service import redis_service
+from services.session_activity_service import (
+    SessionActivityBuffer, SessionActivityConfig, session_activity_buffer
+)
+
+CLIENT = ("testclient", "testclient")
+
+
+@pytest.fixture(autouse=True)
+def clean_session_cache(test_admin_session):
+    redis_service.delete(f"session:{test_admin_session.token}")
+    session_activity_buffer.discard(test_admin_session.token)
+    yield
+    redis_service.delete(f"session:{test_admin_session.token}")
+    session_activity_buffer.discard(test_admin_session.token)
+
+
+def _count_statements(engine):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", count)
+
+
+@pytest.mark.unit
+class TestValidateTokenFastPath:
+    """Cache hits resolve the user without touching the database"""
+
+    def test_cache_hit_issues_no_queries(self, db_engine, db_session, test_admin_user, test_admin_session):
+        token = test_admin_session.token
+        AuthService.validate_token(db_session, token, *CLIENT)  # MISS: llena la caché
+
+        statements, stop = _count_statements(db_engine)
+        try:
+            user = AuthService.validate_token(db_session, token, *CLIENT)
+            assert (user.id, user.rol, user.empresa_id) == (test_admin_user.id, "admin", test_admin_user.empresa_id)
+            assert not user.is_superadmin()
+        finally:
+            stop()
+
+        assert statements == []
+        assert redis_service.get(f"session:{token}")["principal"]["rol"] == "admin"
+
+    def test_last_activity_is_written_in_batches(self, db_engine, db_session, test_admin_session):
+        token = test_admin_session.token
+        buffer = SessionActivityBuffer(SessionActivityConfig(flush_interval=3600))
+        before = test_admin_session.last_activity
+
+        for _ in range(5):
+            buffer.touch(token)
+        statements, stop = _count_statements(db_engine)
+        try:
+            assert buffer.flush_if_due(db_session) == 0
+            assert statements == []
+            assert buffer.flush(db_session) == 1
+        finally:
+            stop()
+
+        assert len([s for s in statements if s.startswith("UPDATE")]) == 1
+        db_session.expire_all()
+        assert db_session.get(AdminSession, test_admin_session.id).last_activity.replace(tzinfo=None) > before
+        assert buffer.get_stats()['writes_saved'] == 4
+
+    def test_logout_invalidates_cached_session(self, db_session, test_admin_session):
+        token = test_admin_session.token
+        AuthService.validate_token(db_session, token, *CLIENT)
+
+        AuthService.logout(db_session, token)
+
+        assert redis_service.get(f"session:{token}") is None
+        with pytest.raises(InvalidTokenError):
+            AuthService.validate_token(db_session, token, *CLIENT)
+
+    def test_deactivation_invalidates_cached_principal(self, db_session, test_admin_user, test_admin_session):
+        token = test_admin_session.token
+        AuthService.validate_token(db_session, token, *CLIENT)
+
+        test_admin_user.is_active = False
+        db_session.commit()
+        AuthService.invalidate_cached_sessions(db_session, test_admin_user.id)
+
+        with pytest.raises(AccountDisabledError):
+            AuthService.validate_token(db_session, token, *CLIENT)
+
+    def test_password_change_invalidates_cached_principal(self, db_session, test_admin_user, test_admin_session):
+        token = test_admin_session.token
+        AuthService.validate_token(db_session, token, *CLIENT)
+
+        AuthService.change_password(db_session, test_admin_user.id, "TestPass123!", "NuevaClave456!")
+
+        assert redis_service.get(f"session:{token}") is None
+
+    def test_device_binding_still_enforced_on_cache_hit(self, db_session, test_admin_session):
+        token = test_admin_session.token
+        AuthService.validate_token(db_session, token, *CLIENT)
+
+        with pytest.raises(InvalidTokenError, match="IP mismatch"):
+            AuthService.validate_token(db_session, token, "10.0.0.99", "testclient")
+
+        assert redis_service.get(f"session:{token}") is None
+        assert db_session.query(AdminSession).filter(AdminSession.token == token).first() is None
+
+
+@pytest.mark.unit
+def test_get_current_user_is_quiet_without_debug_flag(capsys, db_session, test_admin_session):
+    from middleware.auth_middleware import get_current_user
+
+    request = Mock()
+    request.headers = {"User-Agent": "testclient"}
+    request.client.host = "testclient"
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=test_admin_session.token)
+
+    user = asyncio.run(get_current_user(request, credentials, db_session))
+
+    assert user.id == test_admin_session.admin_user_id
+    assert capsys.readouterr().out == ""
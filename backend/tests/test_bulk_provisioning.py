@@ -0,0 +1,146 @@
+"""
+Tests for bulk provisioning against the WIM simulator (tests/fixtures/wim_simulator.py):
+one login and one address book read per printer for the whole batch, the
+per-(user, printer) result matrix, busy printers left pending and no
+duplicate users when the address book cannot be read entirely
+"""
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db.models import Printer, UserPrinterAssignment
+from db.repository import UserRepository
+from services.encryption_service import EncryptionService
+from services.provisioning import ProvisioningService
+from tests.fixtures.wim_simulator import WimPrinter, WimSimulator, address_book
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """File database: each printer worker gets its own connection (the in-memory StaticPool shares one)"""
+    from db.database import Base
+    import db.models  # noqa: F401
+    import db.models_auth  # noqa: F401
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'provisioning.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch, tmp_path):
+    """Encrypted user passwords, no retry waits and debug pages written to tmp_path"""
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    monkeypatch.setenv("RETRY_MAX_ATTEMPTS", "1")
+    monkeypatch.chdir(tmp_path)
+    EncryptionService._initialized = False
+    EncryptionService._cipher = None
+    yield
+    EncryptionService._initialized = False
+    EncryptionService._cipher = None
+
+
+def _users(db, codes):
+    return [
+        UserRepository.create(
+            db=db,
+            name=f"Usuario {code}",
+            codigo_de_usuario=code,
+            network_username="reliteltda\\scaner",
+            network_password_encrypted=EncryptionService.encrypt("Clave2024"),
+            smb_server="192.168.91.5",
+            smb_port=21,
+            smb_path=f"\\\\192.168.91.5\\Escaner\\{code}",
+            func_copier=True,
+            func_scanner=True
+        )
+        for code in codes
+    ]
+
+
+def _printers(db, empresa, sim):
+    printers = [
+        Printer(hostname=f"printer-{ip}", ip_address=sim.address(ip), empresa_id=empresa.id, status="ONLINE",
+                tiene_contador_usuario=False, usar_contador_ecologico=False)
+        for ip in sim.printers
+    ]
+    db.add_all(printers)
+    db.commit()
+    return printers
+
+
+def _provision(db, db_engine, users, printers, **kwargs):
+    return ProvisioningService.provision_users_to_printers(
+        db, [u.id for u in users], [p.id for p in printers],
+        session_factory=sessionmaker(autocommit=False, autoflush=False, bind=db_engine), **kwargs
+    )
+
+
+@pytest.mark.unit
+class TestBulkProvisioning:
+
+    def test_each_printer_provisions_the_whole_batch_in_one_session(self, db_session, db_engine, test_empresa):
+        existing = address_book(5, first_code=2000)
+        wim = {"127.0.0.2": WimPrinter(), "127.0.0.3": WimPrinter(existing)}
+        with WimSimulator(wim) as sim:
+            printers = _printers(db_session, test_empresa, sim)
+            users = _users(db_session, ["9001", "9002", existing[3]['code']])
+
+            result = _provision(db_session, db_engine, users, printers)
+
+        assert result['success'] is True
+        assert (result['successful_count'], result['failed_count']) == (6, 0)
+        assert result['matrix'] == {u.id: {p.id: 'success' for p in printers} for u in users}
+        assert [p['users'] for p in result['printers']] == [3, 3]
+        assert [printer.logins for printer in wim.values()] == [1, 1]
+
+        # El usuario que ya existía se actualiza en su entrada, sin duplicarlo
+        book = wim["127.0.0.3"]
+        assert sorted(entry['code'] for entry in book.entries.values()) == sorted(
+            [e['code'] for e in existing] + ["9001", "9002"])
+        assert book.by_code(existing[3]['code'])['password'] == "Clave2024"
+        assert wim["127.0.0.2"].by_code("9002")['functions'] == ['COPY_BW', 'SCAN']
+
+        assignments = db_session.query(UserPrinterAssignment).filter(UserPrinterAssignment.is_active == True).all()
+        assert len(assignments) == 6
+        assert {a.entry_index for a in assignments if a.printer_id == printers[1].id} >= {"00004"}
+
+    def test_busy_printer_leaves_the_rest_of_its_batch_pending(self, db_session, db_engine, test_empresa):
+        wim = {"127.0.0.2": WimPrinter(), "127.0.0.3": WimPrinter(busy_writes=1)}
+        with WimSimulator(wim) as sim:
+            printers = _printers(db_session, test_empresa, sim)
+            users = _users(db_session, ["9001", "9002", "9003"])
+            reported = []
+
+            result = _provision(db_session, db_engine, users, printers, busy_retry_delay=None,
+                                on_result=reported.append)
+
+            assert result['busy'] == {printers[1].id: [u.id for u in users]}
+            assert result['matrix'][users[2].id] == {printers[0].id: 'success', printers[1].id: 'failed'}
+            assert {(r['user_id'], r['printer_id']) for r in reported} == {(u.id, printers[0].id) for u in users}
+            assert wim["127.0.0.3"].entries == {}
+
+            # Reintento de solo lo pendiente (lo que hace la cola de trabajos)
+            retry = _provision(db_session, db_engine, users, printers, pending=result['busy'], busy_retry_delay=None)
+
+        assert retry['busy'] == {}
+        assert retry['matrix'] == {u.id: {printers[1].id: 'success'} for u in users}
+        assert len(wim["127.0.0.3"].entries) == 3
+
+    def test_partial_address_book_read_does_not_duplicate_existing_users(self, db_session, db_engine, test_empresa):
+        existing = address_book(60, first_code=2000)
+        printer = WimPrinter(existing, failing_list_batches=[2])
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            printers = _printers(db_session, test_empresa, sim)
+            # El usuario existente está en el lote 2, el que falla en la lectura de la libreta
+            users = _users(db_session, ["9001", existing[55]['code']])
+
+            result = _provision(db_session, db_engine, users, printers)
+
+        assert result['matrix'] == {u.id: {printers[0].id: 'success'} for u in users}
+        codes = [entry['code'] for entry in printer.entries.values()]
+        assert len(codes) == 61
+        assert codes.count(existing[55]['code']) == 1
+        assert printer.by_code(existing[55]['code'])['password'] == "Clave2024"
@@ -0,0 +1,130 @@
+"""
+Tests for the parallel multi-printer close (CloseService.create_close_all_printers)
+"""
+from datetime import date, datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from db.models import Printer, ContadorImpresora, ContadorUsuario, CierreMensual
+from db.repository import UserRepository
+from services.close_service import CloseService
+
+
+@pytest.fixture
+def fleet(db_session, test_empresa):
+    """Two printers with readings and one printer without any counters"""
+    user = UserRepository.create(
+        db=db_session,
+        name="Usuario Cierre",
+        codigo_de_usuario="0001",
+        network_username="reliteltda\\scaner",
+        network_password_encrypted="encrypted",
+        smb_server="server",
+        smb_port=21,
+        smb_path="path"
+    )
+
+    printers = []
+    for i, con_lecturas in enumerate([True, True, False], start=1):
+        printer = Printer(
+            hostname=f"close-{i}",
+            ip_address=f"192.168.91.{i}",
+            empresa_id=test_empresa.id,
+            status="ONLINE"
+        )
+        db_session.add(printer)
+        db_session.flush()
+        if con_lecturas:
+            for dia, total in [(2, 100), (20, 180)]:
+                fecha = datetime(2026, 3, dia, 9, 0)
+                db_session.add(ContadorImpresora(printer_id=printer.id, total=total * 10, fecha_lectura=fecha))
+                db_session.add(ContadorUsuario(
+                    printer_id=printer.id, user_id=user.id, total_paginas=total,
+                    total_bn=total, copiadora_bn=total, tipo_contador="usuario", fecha_lectura=fecha
+                ))
+        printers.append(printer)
+    db_session.commit()
+    return printers
+
+
+@pytest.mark.unit
+class TestCloseAllPrinters:
+
+    def test_each_printer_closes_in_its_own_transaction(self, db_engine, db_session, fleet):
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+
+        resultado = CloseService.create_close_all_printers(
+            db=db_session,
+            fecha_inicio=date(2026, 3, 1),
+            fecha_fin=date(2026, 3, 31),
+            cerrado_por="test",
+            session_factory=session_factory
+        )
+
+        assert resultado["total"] == 3
+        assert resultado["successful"] == 2
+        assert resultado["failed"] == 1
+        assert resultado["elapsed_seconds"] >= 0
+
+        por_impresora = {r["printer_id"]: r for r in resultado["results"]}
+        assert por_impresora[fleet[0].id]["success"] is True
+        assert por_impresora[fleet[0].id]["usuarios_count"] == 1
+        assert por_impresora[fleet[2].id]["success"] is False
+        assert "No hay contadores" in por_impresora[fleet[2].id]["error"]
+        assert all(r["elapsed_seconds"] is not None for r in resultado["results"])
+
+        # La sesión compartida sigue siendo utilizable tras el fallo de una impresora
+        assert db_session.query(CierreMensual).count() == 2
+
+    def test_rerun_skips_printers_already_closed_for_the_period(self, db_engine, db_session, fleet):
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+
+        def close_all():
+            return CloseService.create_close_all_printers(
+                db=db_session, fecha_inicio=date(2026, 3, 1), fecha_fin=date(2026, 3, 31),
+                session_factory=session_factory, skip_existing=True
+            )
+
+        primero = close_all()
+        segundo = close_all()
+
+        assert (primero["successful"], primero["skipped"]) == (2, 0)
+        assert (segundo["successful"], segundo["failed"], segundo["skipped"]) == (2, 1, 2)
+        assert db_session.query(CierreMensual).count() == 2
+
+        cierres = {r["printer_id"]: r["cierre_id"] for r in primero["results"] if r["success"]}
+        assert {r["printer_id"]: r["cierre_id"] for r in segundo["results"] if r.get("skipped")} == cierres
+
+    def test_closes_run_in_parallel(self, db_session, fleet):
+        import threading
+
+        # Los tres cierres deben coincidir en el tiempo; en serie la barrera expira
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_isolated(session_factory, printer_id, printer_name, *args):
+            barrier.wait()
+            return {"printer_id": printer_id, "printer_name": printer_name, "success": True,
+                    "cierre_id": printer_id, "total_paginas": 0, "usuarios_count": 0,
+                    "error": None, "elapsed_seconds": 0.1}
+
+        with patch.object(CloseService, "_close_printer_isolated", side_effect=fake_isolated), \
+             patch.object(CloseService, "_max_close_workers", return_value=3):
+            resultado = CloseService.create_close_all_printers(
+                db=db_session, fecha_inicio=date(2026, 3, 1), fecha_fin=date(2026, 3, 31)
+            )
+
+        assert resultado["successful"] == 3
+        assert [r["printer_id"] for r in resultado["results"]] == [p.id for p in fleet]
+
+    def test_worker_limit_follows_connection_pool(self):
+        postgres = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), pool=SimpleNamespace(size=lambda: 10))
+        sqlite = SimpleNamespace(dialect=SimpleNamespace(name="sqlite"), pool=SimpleNamespace(size=lambda: 5))
+
+        with patch("db.database.engine", postgres):
+            assert CloseService._max_close_workers(32) == 9
+            assert CloseService._max_close_workers(4) == 4
+        with patch("db.database.engine", sqlite):
+            assert CloseService._max_close_workers(8) == 1
@@ -0,0 +1,229 @@
+"""
+Parity tests: set-based close snapshot vs per-user snapshot
+"""
+import random
+from datetime import date, datetime
+
+import pytest
+
+from db.models import (
+    Printer, ContadorImpresora, ContadorUsuario, CierreMensual, CierreMensualUsuario
+)
+from db.repository import UserRepository
+from services.close_service import CloseService
+
+
+SNAPSHOT_FIELDS = [
+    'user_id', 'total_paginas', 'total_bn', 'total_color',
+    'copiadora_bn', 'copiadora_color', 'impresora_bn', 'impresora_color',
+    'escaner_bn', 'escaner_color', 'fax_bn',
+    'consumo_total', 'consumo_copiadora', 'consumo_impresora', 'consumo_escaner', 'consumo_fax',
+    'consumo_bn', 'consumo_color'
+]
+
+
+@pytest.fixture
+def printer_with_history(db_session, test_empresa):
+    """Printer with several users and irregular reading history"""
+    rng = random.Random(20260301)
+
+    printer = Printer(
+        hostname="parity-printer",
+        ip_address="192.168.91.250",
+        empresa_id=test_empresa.id,
+        status="ONLINE",
+        has_color=True
+    )
+    db_session.add(printer)
+    db_session.commit()
+
+    users = [
+        UserRepository.create(
+            db=db_session,
+            name=f"Usuario {i}",
+            codigo_de_usuario=f"{i:04d}",
+            network_username="reliteltda\\scaner",
+            network_password_encrypted="encrypted",
+            smb_server="server",
+            smb_port=21,
+            smb_path="path"
+        )
+        for i in range(1, 9)
+    ]
+
+    # Lecturas diarias en enero-marzo; algunos usuarios aparecen tarde o se leen
+    # solo una vez, y hay lecturas posteriores al período (no deben contar)
+    lecturas = [datetime(2026, 1, d, 8, 0) for d in (2, 15, 31)] + \
+               [datetime(2026, 2, d, 8, 0) for d in (1, 14, 28)] + \
+               [datetime(2026, 3, d, 8, 0) for d in (1, 2, 20, 31)] + \
+               [datetime(2026, 4, 5, 8, 0)]
+    acumulados = {u.id: [rng.randint(0, 500) for _ in range(9)] for u in users}
+
+    for fecha in lecturas:
+        db_session.add(ContadorImpresora(printer_id=printer.id, total=10000 + fecha.toordinal() % 1000, fecha_lectura=fecha))
+        for idx, user in enumerate(users):
+            if idx == 5 and fecha < datetime(2026, 3, 1):
+                continue  # Usuario nuevo en marzo
+            if idx == 6 and fecha != datetime(2026, 2, 14, 8, 0):
+                continue  # Una sola lectura en todo el historial
+            valores = acumulados[user.id]
+            for i in range(len(valores)):
+                valores[i] += rng.randint(0, 40)
+            db_session.add(ContadorUsuario(
+                printer_id=printer.id,
+                user_id=user.id,
+                total_paginas=sum(valores[:6]),
+                total_bn=valores[0] + valores[2],
+                total_color=valores[1] + valores[3],
+                copiadora_bn=valores[0],
+                copiadora_todo_color=valores[1],
+                impresora_bn=valores[2],
+                impresora_color=valores[3],
+                escaner_bn=valores[4],
+                escaner_todo_color=valores[5],
+                fax_bn=valores[6],
+                tipo_contador="usuario",
+                fecha_lectura=fecha
+            ))
+    db_session.commit()
+    return printer
+
+
+def _legacy_consumos(db, printer_id, fecha_inicio, fecha_fin, cierre_anterior):
+    user_ids = db.query(ContadorUsuario.user_id).filter(
+        ContadorUsuario.printer_id == printer_id
+    ).distinct().all()
+    consumos = [
+        CloseService._calcular_consumo_usuario(db, printer_id, uid, fecha_inicio, fecha_fin, cierre_anterior)
+        for (uid,) in user_ids
+    ]
+    return sorted([c for c in consumos if c], key=lambda c: c['user_id'])
+
+
+def _read_time_bn_color(db, snapshot):
+    """Cálculo que hacía /monthly/users/all en cada lectura (referencia)"""
+    cierre = snapshot.cierre
+    if not cierre.printer.has_color:
+        return snapshot.consumo_total, 0
+    consumo_bn = consumo_color = 0
+    cierre_anterior = db.query(CierreMensual).filter(
+        CierreMensual.printer_id == cierre.printer_id,
+        CierreMensual.fecha_fin < cierre.fecha_inicio
+    ).order_by(CierreMensual.fecha_fin.desc()).first()
+    if cierre_anterior:
+        anterior = db.query(CierreMensualUsuario).filter(
+            CierreMensualUsuario.cierre_mensual_id == cierre_anterior.id,
+            CierreMensualUsuario.user_id == snapshot.user_id
+        ).first()
+        if anterior:
+            consumo_bn = max(0, snapshot.total_bn - anterior.total_bn)
+            consumo_color = max(0, snapshot.total_color - anterior.total_color)
+            if consumo_bn == 0 and consumo_color == 0 and snapshot.consumo_total > 0:
+                consumo_bn = max(0, snapshot.copiadora_bn - anterior.copiadora_bn) + max(0, snapshot.impresora_bn - anterior.impresora_bn)
+                consumo_color = max(0, snapshot.copiadora_color - anterior.copiadora_color) + max(0, snapshot.impresora_color - anterior.impresora_color)
+    if (not cierre_anterior or (consumo_bn == 0 and consumo_color == 0)) and snapshot.consumo_total > 0:
+        if snapshot.total_paginas > 0:
+            consumo_bn = int(snapshot.consumo_total * (snapshot.total_bn / snapshot.total_paginas))
+            consumo_color = int(snapshot.consumo_total * (snapshot.total_color / snapshot.total_paginas))
+        else:
+            consumo_bn, consumo_color = snapshot.consumo_total, 0
+    return consumo_bn, consumo_color
+
+
+def _snapshot_rows(db, cierre_id):
+    rows = db.query(CierreMensualUsuario).filter(
+        CierreMensualUsuario.cierre_mensual_id == cierre_id
+    ).order_by(CierreMensualUsuario.user_id).all()
+    return [{f: getattr(r, f) for f in SNAPSHOT_FIELDS} for r in rows]
+
+
+@pytest.mark.unit
+class TestCloseSnapshotParity:
+
+    @pytest.mark.parametrize("fecha_inicio,fecha_fin", [
+        (date(2026, 1, 1), date(2026, 1, 31)),
+        (date(2026, 2, 1), date(2026, 2, 28)),
+        (date(2026, 3, 1), date(2026, 3, 31)),
+        (date(2026, 3, 2), date(2026, 3, 2)),
+    ])
+    def test_first_close_matches_per_user_path(self, db_session, printer_with_history, fecha_inicio, fecha_fin):
+        printer_id = printer_with_history.id
+
+        esperado = _legacy_consumos(db_session, printer_id, fecha_inicio, fecha_fin, None)
+        obtenido = CloseService._calcular_consumos_impresora(db_session, printer_id, fecha_inicio, fecha_fin, None)
+
+        assert esperado
+        assert obtenido == esperado
+
+    def test_close_with_previous_snapshot_matches_per_user_path(self, db_session, printer_with_history):
+        printer_id = printer_with_history.id
+        cierre_enero = CloseService.create_close(db_session, printer_id, date(2026, 1, 1), date(2026, 1, 31))
+
+        for fecha_inicio, fecha_fin in [(date(2026, 2, 1), date(2026, 2, 28)), (date(2026, 2, 1), date(2026, 3, 31))]:
+            esperado = _legacy_consumos(db_session, printer_id, fecha_inicio, fecha_fin, cierre_enero)
+            obtenido = CloseService._calcular_consumos_impresora(
+                db_session, printer_id, fecha_inicio, fecha_fin, cierre_enero
+            )
+            assert obtenido == esperado
+
+    def test_create_close_snapshots_are_identical(self, db_session, printer_with_history):
+        printer_id = printer_with_history.id
+        CloseService.create_close(db_session, printer_id, date(2026, 1, 1), date(2026, 1, 31))
+
+        legacy = CloseService.create_close(db_session, printer_id, date(2026, 2, 1), date(2026, 3, 31))
+        legacy_rows = _snapshot_rows(db_session, legacy.id)
+        legacy_totals = (legacy.total_paginas, legacy.diferencia_total, legacy.notas, legacy.hash_verificacion)
+
+        db_session.delete(legacy)
+        db_session.commit()
+
+        por_lotes = CloseService.create_close(
+            db_session, printer_id, date(2026, 2, 1), date(2026, 3, 31), snapshot_por_lotes=True
+        )
+
+        assert _snapshot_rows(db_session, por_lotes.id) == legacy_rows
+        assert (por_lotes.total_paginas, por_lotes.diferencia_total, por_lotes.notas, por_lotes.hash_verificacion) == legacy_totals
+
+    def test_set_based_path_uses_constant_queries(self, db_engine, db_session, printer_with_history):
+        from sqlalchemy import event
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db_engine, "before_cursor_execute", count)
+        try:
+            CloseService._calcular_consumos_impresora(
+                db_session, printer_with_history.id, date(2026, 3, 1), date(2026, 3, 31), None
+            )
+        finally:
+            event.remove(db_engine, "before_cursor_execute", count)
+
+        assert len(statements) <= 3
+
+    def test_create_close_stores_bn_color_consumption(self, db_session, printer_with_history):
+        printer_id = printer_with_history.id
+        cierres = [
+            CloseService.create_close(db_session, printer_id, date(2026, 1, 1), date(2026, 1, 31)),
+            CloseService.create_close(db_session, printer_id, date(2026, 2, 1), date(2026, 2, 28)),
+            CloseService.create_close(db_session, printer_id, date(2026, 3, 1), date(2026, 3, 31), snapshot_por_lotes=True),
+        ]
+
+        snapshots = db_session.query(CierreMensualUsuario).filter(
+            CierreMensualUsuario.cierre_mensual_id.in_([c.id for c in cierres])
+        ).all()
+        assert any(s.consumo_color > 0 for s in snapshots)
+        for snapshot in snapshots:
+            assert (snapshot.consumo_bn, snapshot.consumo_color) == _read_time_bn_color(db_session, snapshot), snapshot
+
+    def test_bn_color_split_rules(self):
+        actual = {'consumo_total': 90, 'total_paginas': 300, 'total_bn': 200, 'total_color': 100,
+                  'copiadora_bn': 120, 'copiadora_color': 60, 'impresora_bn': 80, 'impresora_color': 40}
+        sin_cambios = CierreMensualUsuario(total_bn=200, total_color=100, copiadora_bn=100, copiadora_color=60,
+                                           impresora_bn=80, impresora_color=30)
+
+        assert CloseService.calcular_consumo_bn_color(actual, None, False) == (90, 0)
+        assert CloseService.calcular_consumo_bn_color(actual, None, True) == (60, 30)
+        assert CloseService.calcular_consumo_bn_color(actual, sin_cambios, True) == (20, 10)
+        assert CloseService.calcular_consumo_bn_color({**actual, 'total_paginas': 0}, None, True) == (90, 0)
@@ -0,0 +1,151 @@
+"""
+Tests for incremental per-user counter ingestion: only changed rows are
+stored, every read leaves a LecturaContadorUsuario record and closes see the
+same consumption as with full ingestion
+"""
+from datetime import date, datetime
+from unittest.mock import patch
+
+import pytest
+from cryptography.fernet import Fernet
+
+from db.models import Printer, ContadorUsuario, LecturaContadorUsuario
+from services import counter_service
+from services.close_service import CloseService
+from services.counter_service import CounterService, latest_user_counter_cache
+from services.encryption_service import EncryptionService
+
+
+@pytest.fixture(autouse=True)
+def encryption_key(monkeypatch):
+    """Auto-created users store an encrypted empty password"""
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    EncryptionService._initialized = False
+    EncryptionService._cipher = None
+    yield
+    EncryptionService._initialized = False
+    EncryptionService._cipher = None
+
+
+def _user_counter(codigo, total):
+    return {
+        'codigo_usuario': codigo,
+        'nombre_usuario': f"Usuario {codigo}",
+        'total_paginas': total,
+        'total_impresiones': {'bn': total, 'color': 0},
+        'copiadora': {'blanco_negro': total, 'mono_color': 0, 'dos_colores': 0, 'todo_color': 0},
+        'impresora': {'blanco_negro': 0, 'mono_color': 0, 'dos_colores': 0, 'color': 0},
+        'escaner': {'blanco_negro': 0, 'todo_color': 0},
+        'fax': {'blanco_negro': 0, 'paginas_transmitidas': 0},
+        'revelado': {'negro': total, 'color_ymc': 0},
+    }
+
+
+class _NoPageSize:
+    learned_page_size = None
+    incomplete = False
+
+
+class _Clock(datetime):
+    current = datetime(2026, 3, 2, 8, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+def _read(db, printer_id, at, totals, mode=None):
+    """Lectura simulada en la fecha `at` con {codigo: total_paginas}"""
+    users = [_user_counter(codigo, total) for codigo, total in totals.items()]
+    _Clock.current = at
+    with patch("services.parsers.fetch_all_user_counters", return_value=(users, _NoPageSize())), \
+            patch.object(counter_service, "datetime", _Clock):
+        return CounterService.read_user_counters(db, printer_id, mode=mode)
+
+
+def _printer(db, empresa_id, octet):
+    printer = Printer(hostname=f"printer-{octet}", ip_address=f"192.168.92.{octet}", empresa_id=empresa_id,
+                      status="ONLINE", tiene_contador_usuario=True, usar_contador_ecologico=False)
+    db.add(printer)
+    db.commit()
+    return printer.id
+
+
+def _rows(db, printer_id):
+    return db.query(ContadorUsuario).filter(ContadorUsuario.printer_id == printer_id).count()
+
+
+@pytest.mark.unit
+class TestIncrementalIngestion:
+
+    def test_unchanged_users_are_skipped_and_every_read_is_recorded(self, db_session, test_empresa):
+        printer_id = _printer(db_session, test_empresa.id, 10)
+
+        first = _read(db_session, printer_id, datetime(2026, 3, 2, 8, 0), {"1": 10, "2": 20, "3": 30})
+        second = _read(db_session, printer_id, datetime(2026, 3, 2, 9, 0), {"1": 10, "2": 25, "3": 30})
+
+        assert (first.usuarios_leidos, first.filas_escritas, first.filas_omitidas) == (3, 3, 0)
+        assert (second.usuarios_leidos, second.filas_escritas, second.filas_omitidas) == (3, 1, 2)
+        assert [c.total_paginas for c in second] == [25]
+        assert _rows(db_session, printer_id) == 4
+
+        lecturas = db_session.query(LecturaContadorUsuario).order_by(LecturaContadorUsuario.id).all()
+        assert [(l.filas_escritas, l.filas_omitidas, l.modo) for l in lecturas] == [
+            (3, 0, 'incremental'), (1, 2, 'incremental')
+        ]
+
+    def test_cold_cache_compares_against_the_database(self, db_session, test_empresa):
+        printer_id = _printer(db_session, test_empresa.id, 11)
+        _read(db_session, printer_id, datetime(2026, 3, 2, 8, 0), {"1": 10, "2": 20})
+        _read(db_session, printer_id, datetime(2026, 3, 2, 9, 0), {"1": 15, "2": 20})
+
+        latest_user_counter_cache.invalidate()
+        third = _read(db_session, printer_id, datetime(2026, 3, 2, 10, 0), {"1": 15, "2": 20})
+
+        assert (third.filas_escritas, third.filas_omitidas) == (0, 2)
+
+    def test_first_read_of_a_day_stores_every_user(self, db_session, test_empresa):
+        printer_id = _printer(db_session, test_empresa.id, 12)
+        _read(db_session, printer_id, datetime(2026, 3, 2, 8, 0), {"1": 10, "2": 20})
+
+        next_day = _read(db_session, printer_id, datetime(2026, 3, 3, 8, 0), {"1": 10, "2": 20})
+
+        assert (next_day.filas_escritas, next_day.filas_omitidas) == (2, 0)
+
+    def test_full_mode_stores_every_user(self, db_session, test_empresa):
+        printer_id = _printer(db_session, test_empresa.id, 13)
+        _read(db_session, printer_id, datetime(2026, 3, 2, 8, 0), {"1": 10}, mode='full')
+        full = _read(db_session, printer_id, datetime(2026, 3, 2, 9, 0), {"1": 10}, mode='full')
+
+        assert (full.filas_escritas, full.filas_omitidas, full.modo) == (1, 0, 'full')
+        assert _rows(db_session, printer_id) == 2
+
+    def test_latest_counters_include_users_skipped_by_the_last_read(self, db_session, test_empresa):
+        printer_id = _printer(db_session, test_empresa.id, 14)
+        _read(db_session, printer_id, datetime(2026, 3, 2, 8, 0), {"1": 10, "2": 20})
+        _read(db_session, printer_id, datetime(2026, 3, 2, 9, 0), {"1": 12, "2": 20})
+
+        latest = CounterService.get_user_counters_latest(db_session, printer_id)
+
+        assert sorted(c.total_paginas for c in latest) == [12, 20]
+
+    def test_close_consumption_matches_full_ingestion(self, db_session, test_empresa):
+        full_id = _printer(db_session, test_empresa.id, 15)
+        incremental_id = _printer(db_session, test_empresa.id, 16)
+        lecturas = [
+            (datetime(2026, 2, 27, 18, 0), {"1": 100, "2": 200, "3": 300}),
+            (datetime(2026, 3, 2, 8, 0), {"1": 100, "2": 200, "3": 300}),
+            (datetime(2026, 3, 2, 12, 0), {"1": 110, "2": 200, "3": 300}),
+            (datetime(2026, 3, 2, 16, 0), {"1": 110, "2": 200, "3": 300}),
+            (datetime(2026, 3, 15, 8, 0), {"1": 110, "2": 260, "3": 300}),
+            (datetime(2026, 3, 31, 9, 0), {"1": 150, "2": 260, "3": 300, "4": 5}),
+            (datetime(2026, 4, 1, 9, 0), {"1": 170, "2": 290, "3": 300, "4": 5}),
+        ]
+        for at, totals in lecturas:
+            _read(db_session, full_id, at, totals, mode='full')
+            _read(db_session, incremental_id, at, totals, mode='incremental')
+
+        assert _rows(db_session, incremental_id) < _rows(db_session, full_id)
+        for inicio, fin in ((date(2026, 3, 1), date(2026, 3, 31)), (date(2026, 2, 1), date(2026, 4, 30))):
+            assert CloseService._calcular_consumos_impresora(db_session, incremental_id, inicio, fin, None) == \
+                CloseService._calcular_consumos_impresora(db_session, full_id, inicio, fin, None)
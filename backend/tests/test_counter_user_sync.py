@@ -0,0 +1,148 @@
+"""
+Tests for batch user resolution when ingesting per-user counters
+"""
+from unittest.mock import patch
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import event
+
+from db.models import Printer, User, ContadorUsuario
+from db.repository import UserRepository
+from services.counter_service import CounterService
+from services.encryption_service import EncryptionService
+from services.user_sync_service import UserSyncService
+
+
+@pytest.fixture(autouse=True)
+def encryption_key(monkeypatch):
+    """Auto-created users store an encrypted empty password"""
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    EncryptionService._initialized = False
+    EncryptionService._cipher = None
+    yield
+    EncryptionService._initialized = False
+    EncryptionService._cipher = None
+
+
+def _user_counter(codigo, nombre, total):
+    return {
+        'codigo_usuario': codigo,
+        'nombre_usuario': nombre,
+        'total_paginas': total,
+        'total_impresiones': {'bn': total, 'color': 0},
+        'copiadora': {'blanco_negro': total, 'mono_color': 0, 'dos_colores': 0, 'todo_color': 0},
+        'impresora': {'blanco_negro': 0, 'mono_color': 0, 'dos_colores': 0, 'color': 0},
+        'escaner': {'blanco_negro': 0, 'todo_color': 0},
+        'fax': {'blanco_negro': 0, 'paginas_transmitidas': 0},
+        'revelado': {'negro': total, 'color_ymc': 0},
+    }
+
+
+def _create_user(db, codigo, nombre, is_active=True):
+    user = UserRepository.create(
+        db=db,
+        name=nombre,
+        codigo_de_usuario=codigo,
+        network_username="reliteltda\\scaner",
+        network_password_encrypted="encrypted",
+        smb_server="192.168.91.5",
+        smb_port=21,
+        smb_path="\\\\192.168.91.5\\Escaner"
+    )
+    if not is_active:
+        user.is_active = False
+        db.commit()
+    return user
+
+
+@pytest.fixture
+def counter_printer(db_session, test_empresa):
+    printer = Printer(
+        hostname="printer-250",
+        ip_address="192.168.91.250",
+        empresa_id=test_empresa.id,
+        status="ONLINE",
+        tiene_contador_usuario=True,
+        usar_contador_ecologico=False
+    )
+    db_session.add(printer)
+    db_session.commit()
+    return printer
+
+
+@pytest.mark.unit
+class TestSyncUsersFromCounterBatch:
+    """Bulk resolver matches the per-row sync"""
+
+    def test_matches_per_row_sync(self, db_session):
+        existing = _create_user(db_session, "0547", "Usuario Existente")
+        inactive = _create_user(db_session, "0037", "Usuario Inactivo", is_active=False)
+
+        user_ids = UserSyncService.sync_users_from_counter_batch(
+            db_session,
+            [("547", "Usuario Existente"), ("37", "Usuario Inactivo"), ("8599", "Usuario Nuevo"),
+             ("08599", "Código largo"), ("8599", "Nombre repetido")],
+            printer_id=1
+        )
+        db_session.commit()
+
+        assert user_ids["0547"] == existing.id
+        assert user_ids["0037"] == inactive.id
+        assert set(user_ids) == {"0547", "0037", "8599", "08599"}
+
+        db_session.expire_all()
+        assert db_session.get(User, inactive.id).is_active is True
+
+        nuevo = db_session.get(User, user_ids["8599"])
+        per_row = UserSyncService.sync_user_from_counter("8599", "Otro nombre", db_session)
+        assert per_row == nuevo.id
+        assert nuevo.name == "Usuario Nuevo"
+        assert nuevo.smb_path == "\\\\192.168.91.5\\Escaner"
+        assert nuevo.network_username == "reliteltda\\scaner"
+        assert (nuevo.func_copier, nuevo.func_printer, nuevo.func_scanner) == (False, False, False)
+        assert nuevo.smb_server_id == existing.smb_server_id
+        assert nuevo.network_credential_id == existing.network_credential_id
+
+    def test_empty_batch(self, db_session):
+        assert UserSyncService.sync_users_from_counter_batch(db_session, []) == {}
+
+
+@pytest.mark.unit
+class TestReadUserCountersBatch:
+    """Counter ingestion resolves users once per read"""
+
+    def test_query_count_does_not_grow_with_users(self, db_engine, db_session, counter_printer):
+        _create_user(db_session, "0001", "Usuario 1", is_active=False)
+        users = [_user_counter(str(i), f"Usuario {i}", i * 10) for i in range(1, 201)]
+        printer_id = counter_printer.id
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with patch("services.parsers.fetch_all_user_counters", return_value=(users, _NoPageSize())):
+            event.listen(db_engine, "before_cursor_execute", count)
+            try:
+                contadores = CounterService.read_user_counters(db_session, printer_id)
+            finally:
+                event.remove(db_engine, "before_cursor_execute", count)
+
+        selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+        updates = [s for s in statements if s.lstrip().upper().startswith("UPDATE")]
+        assert len(contadores) == 200
+        assert len(selects) <= 4  # impresora, usuarios (IN), servidor SMB, credencial
+        assert len(updates) == 1  # reactivación en bloque
+
+        rows = db_session.query(ContadorUsuario).filter(ContadorUsuario.printer_id == printer_id).all()
+        codigos = {c.user.codigo_de_usuario: c.total_paginas for c in rows}
+        assert len(codigos) == 200
+        assert codigos["0001"] == 10
+        assert codigos["0200"] == 2000
+        assert db_session.query(User).count() == 200
+
+
+class _NoPageSize:
+    learned_page_size = None
+    incomplete = False
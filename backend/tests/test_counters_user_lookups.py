@@ -0,0 +1,184 @@
+"""
+Query-count regression tests: counter/close endpoints resolve users in bulk
+"""
+import asyncio
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from api import counters as counters_api
+from api import export as export_api
+from db.models import Printer, ContadorUsuario, CierreMensual, CierreMensualUsuario
+from db.repository import UserRepository
+
+
+def _create_dataset(db, empresa_id, octet, n_users, has_color=False):
+    """Impresora con N usuarios: una lectura de contadores y dos cierres"""
+    printer = Printer(
+        hostname=f"printer-{octet}",
+        ip_address=f"192.168.91.{octet}",
+        empresa_id=empresa_id,
+        serial_number=f"SN-{octet}",
+        has_color=has_color,
+        status="ONLINE"
+    )
+    db.add(printer)
+    db.flush()
+
+    users = [
+        UserRepository.create(
+            db=db,
+            name=f"Usuario {octet}-{i}",
+            codigo_de_usuario=f"{octet}{i:02d}",
+            network_username="reliteltda\\scaner",
+            network_password_encrypted="encrypted",
+            smb_server="192.168.91.5",
+            smb_port=21,
+            smb_path="\\\\192.168.91.5\\Escaner"
+        )
+        for i in range(n_users)
+    ]
+
+    cierres = []
+    for mes, base in ((1, 100), (2, 200)):
+        cierre = CierreMensual(
+            printer_id=printer.id,
+            fecha_inicio=date(2026, mes, 1),
+            fecha_fin=date(2026, mes, 28),
+            anio=2026,
+            mes=mes,
+            total_paginas=base * n_users
+        )
+        cierre.usuarios = [
+            CierreMensualUsuario(
+                user_id=user.id, total_paginas=base, total_bn=base, total_color=0,
+                copiadora_bn=base, copiadora_color=0, impresora_bn=0, impresora_color=0,
+                escaner_bn=0, escaner_color=0, fax_bn=0,
+                consumo_total=100 + i, consumo_copiadora=100, consumo_impresora=0,
+                consumo_escaner=0, consumo_fax=0, consumo_bn=100 + i, consumo_color=0
+            )
+            for i, user in enumerate(users)
+        ]
+        db.add(cierre)
+        cierres.append(cierre)
+
+    db.add_all([
+        ContadorUsuario(printer_id=printer.id, user_id=user.id, total_paginas=10, total_bn=10)
+        for user in users
+    ])
+    db.commit()
+    return printer.id, cierres[0].id, cierres[1].id
+
+
+def _count_statements(engine, db, call):
+    db.expire_all()
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        asyncio.run(call())
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return len(statements)
+
+
+ENDPOINTS = {
+    "get_user_counters_latest": lambda db, user, p, c1, c2: counters_api.get_user_counters_latest(p, db, user),
+    "get_latest_counters_with_printer": lambda db, user, p, c1, c2: counters_api.get_latest_counters_with_printer(p, db, user),
+    "get_close_users": lambda db, user, p, c1, c2: counters_api.get_close_users(c1, db, user),
+    "get_close_detail": lambda db, user, p, c1, c2: counters_api.get_close_detail(c1, 1, 500, None, db, user),
+    "verificar_coherencia_comparativo": lambda db, user, p, c1, c2: counters_api.verificar_coherencia_comparativo(c1, c2, db, user),
+    "export_cierre_excel": lambda db, user, p, c1, c2: export_api.export_cierre_excel(c1, db, user),
+    "export_comparacion_excel": lambda db, user, p, c1, c2: export_api.export_comparacion_excel(c1, c2, db, user),
+    "export_comparacion_excel_ricoh": lambda db, user, p, c1, c2: export_api.export_comparacion_excel_ricoh(c1, c2, db, user),
+}
+
+
+@pytest.mark.unit
+class TestBatchedUserLookups:
+    """The number of SQL statements does not grow with the number of users"""
+
+    @pytest.mark.parametrize("endpoint", sorted(ENDPOINTS))
+    def test_statement_count_is_independent_of_user_count(
+        self, endpoint, db_engine, db_session, test_empresa, test_admin_user
+    ):
+        small = _create_dataset(db_session, test_empresa.id, 10, n_users=2)
+        large = _create_dataset(db_session, test_empresa.id, 20, n_users=25)
+        call = ENDPOINTS[endpoint]
+
+        small_count = _count_statements(db_engine, db_session, lambda: call(db_session, test_admin_user, *small))
+        large_count = _count_statements(db_engine, db_session, lambda: call(db_session, test_admin_user, *large))
+
+        assert large_count == small_count
+        assert small_count <= 10
+
+
+def _list_closes(db, user, page=1, page_size=50, cursor=None, printer_id=None):
+    return counters_api.get_all_users_closes(
+        page=page, page_size=page_size, search=None, printer_id=printer_id, user_id=None,
+        fecha_inicio=None, fecha_fin=None, centro_costos=None, cursor=cursor,
+        db=db, current_user=user
+    )
+
+
+@pytest.mark.unit
+class TestGlobalUserClosesListing:
+
+    def test_color_rows_do_not_add_queries(self, db_engine, db_session, test_empresa, test_admin_user):
+        small, _, _ = _create_dataset(db_session, test_empresa.id, 40, n_users=2, has_color=True)
+        large, _, _ = _create_dataset(db_session, test_empresa.id, 50, n_users=25, has_color=True)
+
+        small_count = _count_statements(db_engine, db_session, lambda: _list_closes(db_session, test_admin_user, printer_id=small))
+        large_count = _count_statements(db_engine, db_session, lambda: _list_closes(db_session, test_admin_user, printer_id=large))
+
+        # Usuario autenticado (expirado por _count_statements), conteo, página y usuarios
+        assert large_count == small_count <= 4
+
+    def test_cursor_pages_match_offset_order(self, db_session, test_empresa, test_admin_user):
+        _create_dataset(db_session, test_empresa.id, 60, n_users=7, has_color=True)
+        _create_dataset(db_session, test_empresa.id, 61, n_users=4)
+
+        todos = asyncio.run(_list_closes(db_session, test_admin_user, page_size=100))
+        esperado = [item.id for item in todos["items"]]
+        assert todos["next_cursor"] is None
+
+        obtenido, cursor = [], None
+        while True:
+            pagina = asyncio.run(_list_closes(db_session, test_admin_user, page_size=4, cursor=cursor))
+            obtenido += [item.id for item in pagina["items"]]
+            cursor = pagina["next_cursor"]
+            if cursor is None:
+                break
+            assert pagina["total"] == len(esperado)
+
+        assert obtenido == esperado
+        por_offset = asyncio.run(_list_closes(db_session, test_admin_user, page=3, page_size=4))
+        assert [item.id for item in por_offset["items"]] == esperado[8:12]
+        assert todos["items"][0].consumo_bn == todos["items"][0].consumo_total
+
+    def test_invalid_cursor_is_rejected(self, db_session, test_admin_user):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(_list_closes(db_session, test_admin_user, cursor="no-es-un-cursor"))
+        assert exc_info.value.status_code == 400
+
+
+@pytest.mark.unit
+class TestGetMapByIds:
+
+    def test_single_query_and_ignores_missing_ids(self, db_engine, db_session, test_empresa):
+        printer_id, _, _ = _create_dataset(db_session, test_empresa.id, 30, n_users=3)
+        user_ids = [u.user_id for u in db_session.query(ContadorUsuario).filter(ContadorUsuario.printer_id == printer_id)]
+
+        user_map = {}
+
+        async def call():
+            user_map.update(UserRepository.get_map_by_ids(db_session, user_ids + [None, 999999]))
+
+        assert _count_statements(db_engine, db_session, call) == 1
+        assert sorted(user_map) == sorted(user_ids)
+        assert UserRepository.get_map_by_ids(db_session, [None]) == {}
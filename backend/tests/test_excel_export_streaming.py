@@ -0,0 +1,161 @@
+"""
+Tests for the write-only Excel export engine
+"""
+import asyncio
+import io
+from datetime import date
+
+import pytest
+from openpyxl import load_workbook
+
+from api import export as export_api
+from db.models import Printer, CierreMensual, CierreMensualUsuario
+from db.repository import UserRepository
+from services.excel_stream_service import ExcelStreamConfig, xlsx_streaming_response, new_write_only_workbook
+from services.export_ricoh import exportar_comparacion_ricoh
+
+
+@pytest.fixture
+def cierres(db_session, test_empresa):
+    """Impresora color con dos cierres; un usuario solo aparece en el segundo"""
+    printer = Printer(
+        hostname="printer-251",
+        ip_address="192.168.91.251",
+        empresa_id=test_empresa.id,
+        serial_number="E174M210096",
+        has_color=True,
+        status="ONLINE"
+    )
+    db_session.add(printer)
+    db_session.flush()
+
+    users = [
+        UserRepository.create(
+            db=db_session,
+            name=f"Usuario {i}",
+            codigo_de_usuario=f"{i:04d}",
+            network_username="reliteltda\\scaner",
+            network_password_encrypted="encrypted",
+            smb_server="192.168.91.5",
+            smb_port=21,
+            smb_path="\\\\192.168.91.5\\Escaner"
+        )
+        for i in range(1, 5)
+    ]
+
+    result = []
+    for mes, factor, miembros in ((1, 1, users[:3]), (2, 3, users)):
+        cierre = CierreMensual(
+            printer_id=printer.id,
+            fecha_inicio=date(2026, mes, 1),
+            fecha_fin=date(2026, mes, 28),
+            anio=2026,
+            mes=mes,
+            total_paginas=5000 * factor
+        )
+        cierre.usuarios = [
+            CierreMensualUsuario(
+                user_id=user.id, total_paginas=(150 + i * 1000) * factor,
+                total_bn=(100 + i * 1000) * factor, total_color=50 * factor,
+                copiadora_bn=100 * factor, copiadora_color=0, impresora_bn=i * 1000 * factor,
+                impresora_color=50 * factor, escaner_bn=3, escaner_color=1, fax_bn=0,
+                consumo_total=0, consumo_copiadora=0, consumo_impresora=0,
+                consumo_escaner=0, consumo_fax=0
+            )
+            for i, user in enumerate(miembros)
+        ]
+        db_session.add(cierre)
+        result.append(cierre)
+    db_session.commit()
+    return result
+
+
+def _download(response):
+    async def collect():
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(collect())
+    body = b"".join(chunks)
+    assert int(response.headers["content-length"]) == len(body)
+    return load_workbook(io.BytesIO(body)), chunks
+
+
+def _values(ws):
+    return [[cell.value for cell in row] for row in ws.iter_rows()]
+
+
+@pytest.mark.unit
+class TestStreamingExports:
+
+    def test_cierre_export_rows_and_styles(self, db_session, test_admin_user, cierres):
+        response = asyncio.run(export_api.export_cierre_excel(cierres[1].id, db_session, test_admin_user))
+        wb, _ = _download(response)
+        ws = wb["Cierre"]
+
+        rows = _values(ws)
+        assert rows[0][:5] == ['Usuario', 'Nombre', 'B/N', 'COLOR', 'TOTAL IMPRESIONES']
+        assert [r[0] for r in rows[1:5]] == ['[0004]', '[0003]', '[0002]', '[0001]']
+        assert rows[5][7] == 15000
+        assert rows[6][4] == rows[6][7] == sum(r[4] for r in rows[1:5])
+        assert ws["A1"].style == "encabezado" and ws["A1"].font.color.rgb == "00FFFFFF"
+        assert ws["E7"].font.b and ws["E7"].font.color.rgb == "000000FF"
+        assert ws.column_dimensions["B"].width == 30
+
+    def test_comparison_export_totals(self, db_session, test_admin_user, cierres):
+        response = asyncio.run(export_api.export_comparacion_excel(cierres[0].id, cierres[1].id, db_session, test_admin_user))
+        wb, _ = _download(response)
+        rows = _values(wb["Comparación"])
+
+        data = rows[1:5]
+        assert [r[4] for r in data] == sorted((r[4] for r in data), reverse=True)
+        assert data[0][:2] == ['[0004]', '[Usuario 4]']
+        assert rows[6][0] == "TOTALES"
+        assert rows[6][4] == sum(r[4] for r in data)
+
+    def test_ricoh_export_matches_in_memory_workbook(self, db_session, test_admin_user, cierres):
+        response = asyncio.run(export_api.export_comparacion_excel_ricoh(cierres[0].id, cierres[1].id, db_session, test_admin_user))
+        streamed, _ = _download(response)
+
+        legacy_output = io.BytesIO()
+        exportar_comparacion_ricoh(db_session, "E174M210096", cierres[0], cierres[1]).save(legacy_output)
+        legacy = load_workbook(io.BytesIO(legacy_output.getvalue()))
+
+        assert streamed.sheetnames == legacy.sheetnames == [
+            "E174M210096 ENERO", "E174M210096 FEBRERO", "E174M210096 COMPARATIVO"
+        ]
+        for name in legacy.sheetnames:
+            expected, actual = legacy[name], streamed[name]
+            assert _values(actual) == _values(expected)
+            for expected_row, actual_row in zip(expected.iter_rows(), actual.iter_rows()):
+                for e, a in zip(expected_row, actual_row):
+                    assert (a.font.b, a.fill.fgColor.rgb, a.alignment.horizontal, a.number_format) == \
+                        (e.font.b, e.fill.fgColor.rgb, e.alignment.horizontal, e.number_format), a.coordinate
+            assert actual.column_dimensions["B"].width == expected.column_dimensions["B"].width
+
+
+@pytest.mark.unit
+class TestXlsxStreamingResponse:
+
+    def test_body_is_sent_in_chunks(self):
+        def build():
+            wb = new_write_only_workbook()
+            ws = wb.create_sheet("Datos")
+            for i in range(2000):
+                ws.append([f"usuario-{i}", i, i * 7])
+            return wb
+
+        config = ExcelStreamConfig(chunk_size=4096, spool_max_size=1024)
+        response = asyncio.run(xlsx_streaming_response(build, "datos.xlsx", config))
+        wb, chunks = _download(response)
+
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 4096 for chunk in chunks)
+        assert wb["Datos"].max_row == 2000
+        assert response.headers["content-disposition"] == 'attachment; filename="datos.xlsx"'
+
+    def test_build_errors_are_raised_before_streaming(self):
+        def build():
+            raise ValueError("sin datos")
+
+        with pytest.raises(ValueError, match="sin datos"):
+            asyncio.run(xlsx_streaming_response(build, "x.xlsx"))
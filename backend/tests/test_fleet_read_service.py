@@ -0,0 +1,141 @@
+"""
+Tests for FleetReadService concurrent counter collection
+"""
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.fleet_read_service import (
+    FleetReadConfig, FleetReadService, load_fleet_read_config_from_env
+)
+
+
+def _targets(n, read_users=True):
+    return [
+        {
+            'printer_id': i,
+            'hostname': f"printer-{i}",
+            'ip_address': f"192.168.91.{i}",
+            'read_users': read_users
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+@pytest.mark.unit
+class TestFleetReadService:
+    """Concurrency, deadlines and result reporting of the fleet read engine"""
+
+    def test_reads_printers_concurrently_with_bounded_workers(self):
+        active = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def fake_read(db, printer_id):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.1)
+            with lock:
+                active -= 1
+            return SimpleNamespace(total=printer_id * 100)
+
+        service = FleetReadService(
+            config=FleetReadConfig(max_workers=3, printer_timeout=5),
+            session_factory=MagicMock
+        )
+
+        with patch("services.fleet_read_service.CounterService.read_printer_counters", side_effect=fake_read):
+            start = time.monotonic()
+            summary = service.read_all(_targets(6, read_users=False))
+            elapsed = time.monotonic() - start
+
+        assert summary['successful'] == 6
+        assert summary['failed'] == 0
+        assert peak == 3
+        assert elapsed < 0.5
+        assert [r['printer_id'] for r in summary['results']] == [1, 2, 3, 4, 5, 6]
+        assert all(r['elapsed_seconds'] >= 0.1 for r in summary['results'])
+
+    def test_each_worker_uses_its_own_session(self):
+        sessions = []
+
+        def factory():
+            session = MagicMock()
+            sessions.append(session)
+            return session
+
+        seen = []
+
+        def fake_read(db, printer_id):
+            seen.append(db)
+            return SimpleNamespace(total=1)
+
+        service = FleetReadService(config=FleetReadConfig(max_workers=4), session_factory=factory)
+
+        with patch("services.fleet_read_service.CounterService.read_printer_counters", side_effect=fake_read), \
+             patch("services.fleet_read_service.CounterService.read_user_counters", return_value=[1, 2]):
+            summary = service.read_all(_targets(4))
+
+        assert len(sessions) == 4
+        assert len(set(map(id, seen))) == 4
+        assert all(s.close.called for s in sessions)
+        assert all(len(r['contadores_usuarios']) == 2 for r in summary['results'])
+
+    def test_slow_printer_times_out_without_blocking_others(self):
+        def fake_read(db, printer_id):
+            if printer_id == 1:
+                time.sleep(1.0)
+            return SimpleNamespace(total=1)
+
+        service = FleetReadService(
+            config=FleetReadConfig(max_workers=3, printer_timeout=0.2),
+            session_factory=MagicMock
+        )
+
+        with patch("services.fleet_read_service.CounterService.read_printer_counters", side_effect=fake_read):
+            start = time.monotonic()
+            results = list(service.iter_read(_targets(3, read_users=False)))
+            elapsed = time.monotonic() - start
+
+        assert elapsed < 0.8
+        # Los resultados se entregan a medida que terminan: la impresora lenta queda al final
+        assert [r['printer_id'] for r in results][-1] == 1
+        slow = results[-1]
+        assert slow['success'] is False
+        assert slow['timed_out'] is True
+        assert "Tiempo límite" in slow['error']
+
+    def test_failure_is_reported_per_printer(self):
+        def fake_read(db, printer_id):
+            if printer_id == 2:
+                raise Exception("Connection refused")
+            return SimpleNamespace(total=10)
+
+        service = FleetReadService(config=FleetReadConfig(max_workers=2), session_factory=MagicMock)
+
+        with patch("services.fleet_read_service.CounterService.read_printer_counters", side_effect=fake_read):
+            summary = service.read_all(_targets(3, read_users=False))
+
+        assert summary['successful'] == 2
+        assert summary['failed'] == 1
+        failed = FleetReadService.to_summary(summary['results'][1])
+        assert failed['success'] is False
+        assert failed['error'] == "Connection refused"
+        ok = FleetReadService.to_summary(summary['results'][0])
+        assert ok['contador_total'] == 10
+        assert ok['usuarios_count'] == 0
+
+    def test_config_from_env(self, monkeypatch):
+        monkeypatch.setenv("FLEET_READ_MAX_WORKERS", "16")
+        monkeypatch.setenv("FLEET_READ_PRINTER_TIMEOUT", "45")
+        config = load_fleet_read_config_from_env()
+        assert config.max_workers == 16
+        assert config.printer_timeout == 45.0
+
+        monkeypatch.setenv("FLEET_READ_MAX_WORKERS", "0")
+        assert load_fleet_read_config_from_env().max_workers == 8
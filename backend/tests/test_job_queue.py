@@ -0,0 +1,256 @@
+"""
+Tests for the background job queue: enqueue and run with per-printer items,
+retry with backoff, recovery of jobs left running by a dead worker and the
+202 + GET /jobs/{id} flow of read-all and the printer deactivation job of
+deleted users
+"""
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from db.models import BackgroundJob, Printer, UserPrinterAssignment
+from db.repository import UserRepository
+from services.job_queue_service import (
+    DatabaseJobStore, JobError, JobQueue, JobQueueConfig, MemoryJobStore, RetryableJobError, job_handler
+)
+
+calls = []
+
+
+@job_handler('test.items')
+def _items_job(ctx, payload):
+    calls.append(ctx.attempt)
+    for printer_id in payload['printer_ids']:
+        ctx.item({'printer_id': printer_id, 'success': True})
+    return {'total': len(payload['printer_ids'])}
+
+
+@job_handler('test.busy_once')
+def _busy_once_job(ctx, payload):
+    calls.append(ctx.attempt)
+    for printer_id in payload['printer_ids']:
+        ctx.item({'printer_id': printer_id, 'success': printer_id != 2})
+    if 2 in payload['printer_ids']:
+        raise RetryableJobError("1 impresora(s) ocupada(s)", payload={'printer_ids': [2]})
+    return {'ok': True}
+
+
+@job_handler('test.invalid')
+def _invalid_job(ctx, payload):
+    calls.append(ctx.attempt)
+    raise JobError("payload inválido")
+
+
+blocking = {'started': threading.Event(), 'release': threading.Event()}
+
+
+@job_handler('test.blocking')
+def _blocking_job(ctx, payload):
+    blocking['started'].set()
+    blocking['release'].wait(5)
+    return {'ok': True}
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def _memory_queue(**config):
+    return JobQueue(JobQueueConfig(backend='memory', **config), store=MemoryJobStore())
+
+
+def _db_queue(db_engine, **config):
+    return JobQueue(JobQueueConfig(**config), store=DatabaseJobStore(),
+                    session_factory=sessionmaker(autocommit=False, autoflush=False, bind=db_engine))
+
+
+@pytest.mark.unit
+class TestJobQueue:
+
+    def test_job_runs_and_records_items_and_result(self):
+        queue = _memory_queue()
+        job = queue.enqueue(None, 'test.items', {'printer_ids': [1, 2, 3]})
+
+        assert asyncio.run(queue.run_once()) is True
+        done = queue.get(None, job['id'])
+
+        assert done['estado'] == 'succeeded'
+        assert done['resultado'] == {'total': 3}
+        assert [i['printer_id'] for i in done['items']] == [1, 2, 3]
+        assert done['progreso_actual'] == 3
+        assert asyncio.run(queue.run_once()) is False
+
+    def test_retryable_error_waits_backoff_and_retries_only_pending(self):
+        queue = _memory_queue(retry_delay=60, max_retry_delay=600)
+        job = queue.enqueue(None, 'test.busy_once', {'printer_ids': [1, 2]})
+
+        asyncio.run(queue.run_once())
+        pending = queue.get(None, job['id'])
+        assert pending['estado'] == 'pending'
+        assert pending['payload'] == {'printer_ids': [2]}
+        assert datetime.fromisoformat(pending['disponible_en']) > datetime.now(timezone.utc) + timedelta(seconds=50)
+        assert asyncio.run(queue.run_once()) is False
+
+        queue.store._jobs[job['id']]['disponible_en'] = datetime.now(timezone.utc)
+        queue.store._jobs[job['id']]['payload'] = {'printer_ids': [3]}
+        asyncio.run(queue.run_once())
+        done = queue.get(None, job['id'])
+
+        assert calls == [1, 2]
+        assert done['estado'] == 'succeeded'
+        assert [(i['printer_id'], i['intento']) for i in done['items']] == [(1, 1), (2, 1), (3, 2)]
+
+    def test_permanent_error_fails_without_retry(self):
+        queue = _memory_queue(retry_delay=0)
+        job = queue.enqueue(None, 'test.invalid', {})
+
+        asyncio.run(queue.run_once())
+        asyncio.run(queue.run_once())
+
+        failed = queue.get(None, job['id'])
+        assert calls == [1]
+        assert (failed['estado'], failed['error'], failed['intentos']) == ('failed', "payload inválido", 1)
+
+    def test_events_are_published_to_the_job_company_and_creator(self):
+        published = []
+
+        async def publish(event, audience=None):
+            published.append((event['job_status'], audience))
+
+        async def run():
+            queue = _memory_queue()
+            queue._loop, queue._publish = asyncio.get_running_loop(), publish
+            queue.enqueue(None, 'test.items', {'printer_ids': [1]}, creado_por=7, empresa_id=3)
+            await queue.run_once()
+            await asyncio.gather(*queue._pending_publish)
+
+        asyncio.run(run())
+
+        assert published
+        assert {status for status, _ in published} == {'pending', 'running', 'succeeded'}
+        assert all(audience == {'empresa_id': 3, 'user_id': 7} for _, audience in published)
+
+    def test_stop_keeps_a_job_whose_handler_thread_is_still_running(self):
+        blocking['started'].clear()
+        blocking['release'].clear()
+        queue = _memory_queue(workers=1, poll_interval=0.05)
+
+        async def run():
+            await queue.start()
+            job = queue.enqueue(None, 'test.blocking', {})
+            assert await asyncio.to_thread(blocking['started'].wait, 5)
+            await queue.stop()
+            estado = queue.get(None, job['id'])['estado']
+            blocking['release'].set()
+            return estado
+
+        try:
+            estado = asyncio.run(run())
+        finally:
+            blocking['release'].set()
+
+        # Devolverlo a la cola permitiría ejecutarlo otra vez mientras el hilo sigue corriendo
+        assert estado == 'running'
+
+    def test_unknown_job_type_is_rejected_on_enqueue(self):
+        with pytest.raises(ValueError):
+            _memory_queue().enqueue(None, 'test.missing', {})
+
+    def test_job_of_a_dead_worker_is_reclaimed_after_its_lease(self, db_session, db_engine):
+        crashed = _db_queue(db_engine)
+        job = crashed.enqueue(db_session, 'test.items', {'printer_ids': [7]})
+        now = datetime.now(timezone.utc)
+        # El worker reclama el trabajo y muere sin terminarlo ni renovar el lease
+        assert crashed.store.claim(db_session, 'dead:1#0', now, now - timedelta(minutes=5))
+
+        restarted = _db_queue(db_engine)
+        assert asyncio.run(restarted.run_once()) is True
+
+        db_session.expire_all()
+        row = db_session.get(BackgroundJob, job['id'])
+        assert (row.estado, row.intentos, row.resultado) == ('succeeded', 2, {'total': 1})
+
+    def test_job_that_keeps_crashing_fails_when_attempts_run_out(self, db_session, db_engine):
+        queue = _db_queue(db_engine, max_attempts=1)
+        job = queue.enqueue(db_session, 'test.items', {'printer_ids': [7]})
+        now = datetime.now(timezone.utc)
+        queue.store.claim(db_session, 'dead:1#0', now, now - timedelta(minutes=5))
+
+        asyncio.run(queue.run_once())
+
+        db_session.expire_all()
+        assert db_session.get(BackgroundJob, job['id']).estado == 'failed'
+        assert calls == []
+
+
+@pytest.fixture
+def as_admin(client, admin_user):
+    """Requests authenticated as the company admin"""
+    from main import app
+    from middleware.auth_middleware import get_current_user
+
+    app.dependency_overrides[get_current_user] = lambda: admin_user
+    yield client
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.mark.unit
+class TestJobEndpoints:
+
+    def test_background_read_all_returns_job_and_reports_progress(self, as_admin, db_session, db_engine, test_empresa):
+        printer = Printer(hostname="printer-jobs", ip_address="192.168.93.10", empresa_id=test_empresa.id,
+                          status="ONLINE", tiene_contador_usuario=False, usar_contador_ecologico=False)
+        db_session.add(printer)
+        db_session.commit()
+
+        response = as_admin.post("/api/counters/read-all?background=true")
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert as_admin.get(f"/jobs/{job_id}").json()["estado"] == "pending"
+
+        with patch("services.counter_service.CounterService.read_printer_counters",
+                   return_value=SimpleNamespace(total=1234)):
+            assert asyncio.run(_db_queue(db_engine).run_once()) is True
+
+        job = as_admin.get(f"/jobs/{job_id}").json()
+        assert job["estado"] == "succeeded"
+        assert job["resultado"]["successful"] == 1
+        assert [(i["printer_id"], i["contador_total"]) for i in job["items"]] == [(printer.id, 1234)]
+        assert [j["id"] for j in as_admin.get("/jobs").json()["jobs"]] == [job_id]
+
+    def test_jobs_of_other_companies_are_not_visible(self, as_admin, db_session, db_engine):
+        job = _db_queue(db_engine).enqueue(db_session, 'test.items', {'printer_ids': []})
+
+        response = as_admin.get(f"/jobs/{job['id']}")
+
+        assert response.status_code == 404
+
+    def test_deleted_user_deactivation_job_belongs_to_who_deleted_it(self, as_admin, admin_user, db_session,
+                                                                     test_empresa, caplog):
+        user = UserRepository.create(
+            db=db_session, name="Usuario Baja", codigo_de_usuario="7001",
+            network_username="reliteltda\\scaner", network_password_encrypted="encrypted",
+            smb_server="server", smb_port=21, smb_path="path"
+        )
+        printer = Printer(hostname="printer-baja", ip_address="192.168.93.11", empresa_id=test_empresa.id,
+                          status="ONLINE")
+        db_session.add(printer)
+        db_session.flush()
+        db_session.add(UserPrinterAssignment(user_id=user.id, printer_id=printer.id, entry_index="00001"))
+        db_session.commit()
+
+        with caplog.at_level("WARNING", logger="api.users"):
+            response = as_admin.delete(f"/users/{user.id}")
+
+        assert response.status_code == 200
+        assert "quedó en cola" in response.json()["message"]
+        assert "ENABLE_JOB_WORKER" in caplog.text
+        job = db_session.query(BackgroundJob).filter(BackgroundJob.tipo == 'users.deactivate_printers').one()
+        assert job.creado_por == admin_user.id
+        assert as_admin.get(f"/jobs/{job.id}").status_code == 200
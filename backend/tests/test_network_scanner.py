@@ -0,0 +1,148 @@
+"""
+Tests for NetworkScanner: concurrent port probes, dead-host short-circuit,
+multi-subnet ranges and the per-IP fingerprint cache
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from services.network_scanner import (
+    FingerprintCache,
+    NetworkScanner,
+    NetworkScannerConfig,
+    expand_ip_ranges,
+)
+
+MAINFRAME = "<html><title>RNP0026737FE8D1 - Web Image Monitor</title></html>"
+CONFIGURATION = "<table><tr><td>ID máquina: E174M210096</td></tr></table>"
+
+
+class FakeNetwork:
+    """Simula puertos TCP por host: abiertos, cerrados (rechazo) o sin respuesta"""
+
+    def __init__(self, hosts, delay=0.05):
+        self.hosts = hosts  # ip -> set de puertos abiertos; ausente = host apagado
+        self.delay = delay
+        self.probes = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def probe(self, ip, port, timeout):
+        self.probes.append((ip, port))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            if ip not in self.hosts:
+                await asyncio.sleep(timeout)
+                return None
+            await asyncio.sleep(self.delay)
+            return port in self.hosts[ip]
+        finally:
+            self.in_flight -= 1
+
+
+class FakeWeb:
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(f"{request.url.host}{request.url.path}")
+        if request.url.path.endswith("mainFrame.cgi"):
+            return httpx.Response(200, text=MAINFRAME)
+        if request.url.path.endswith("configuration.cgi"):
+            return httpx.Response(200, text=CONFIGURATION)
+        return httpx.Response(404)
+
+
+def _scanner(network, web=None, cache=None, **config):
+    scanner = NetworkScanner(
+        timeout=1.0,
+        enable_snmp=False,
+        config=NetworkScannerConfig(**{'liveness_timeout': 0.2, **config}),
+        cache=cache if cache is not None else FingerprintCache(ttl=600),
+        transport=httpx.MockTransport(web or FakeWeb())
+    )
+    scanner._probe_port = network.probe
+    return scanner
+
+
+@pytest.mark.unit
+class TestNetworkScannerProbes:
+
+    def test_ports_are_probed_concurrently_and_dead_hosts_cost_one_fast_round(self):
+        network = FakeNetwork({"10.0.0.1": {80, 9100}}, delay=0.1)
+        scanner = _scanner(network)
+
+        start = time.monotonic()
+        ports = asyncio.run(scanner.probe_ports("10.0.0.1"))
+        alive_elapsed = time.monotonic() - start
+
+        start = time.monotonic()
+        dead = asyncio.run(scanner.probe_ports("10.0.0.2"))
+        dead_elapsed = time.monotonic() - start
+
+        assert ports == {80: True, 443: False, 161: False, 9100: True}
+        assert alive_elapsed < 0.3  # 4 puertos en paralelo, no 4 x 0.1s
+        assert dead is None
+        assert dead_elapsed < 0.5  # un solo sondeo rápido, no 4 x timeout
+        assert network.peak == 4
+
+    def test_expand_ranges_supports_multiple_subnets_and_limit(self):
+        hosts = expand_ip_ranges("10.0.0.0/23, 10.0.1.0/24 10.0.5.7/32", max_addresses=1024)
+
+        assert len(hosts) == 510 + 1
+        assert hosts[0] == "10.0.0.1" and hosts[-1] == "10.0.5.7"
+        with pytest.raises(ValueError):
+            expand_ip_ranges("10.0.0.0/16", max_addresses=4096)
+
+
+@pytest.mark.unit
+class TestNetworkScannerScan:
+
+    def test_multi_subnet_scan_shares_one_concurrency_budget(self):
+        hosts = {f"10.0.{net}.{i}": set() for net in (1, 2) for i in range(1, 255)}
+        hosts["10.0.1.20"] = {80, 9100}
+        hosts["10.0.2.30"] = {80}
+        network = FakeNetwork(hosts, delay=0.01)
+        web = FakeWeb()
+        scanner = _scanner(network, web, max_concurrency=16)
+
+        devices = asyncio.run(scanner.scan_network("10.0.1.0/24,10.0.2.0/24"))
+
+        assert [d['ip_address'] for d in devices] == ["10.0.1.20"]
+        assert devices[0]['hostname'] == "RNP0026737FE8D1"
+        assert network.peak <= 16 * 4
+        assert scanner.last_scan_stats == {'hosts': 508, 'alive': 508, 'cached': 0,
+                                           'fingerprinted': 508, 'found': 1}
+        # Sólo los hosts con puerto web se consultan por HTTP
+        assert {r.split('/')[0] for r in web.requests} == {"10.0.1.20", "10.0.2.30"}
+
+    def test_repeated_scan_only_fingerprints_changed_hosts(self):
+        hosts = {"10.0.0.1": {80, 9100}, "10.0.0.2": {80, 9100}, "10.0.0.3": {80}}
+        network = FakeNetwork(hosts, delay=0.0)
+        web = FakeWeb()
+        cache = FingerprintCache(ttl=600)
+
+        first = asyncio.run(_scanner(network, web, cache=cache).scan_network("10.0.0.0/29"))
+        requests_after_first = len(web.requests)
+
+        hosts["10.0.0.3"] = {80, 9100}  # Ahora acepta impresión raw
+        scanner = _scanner(network, web, cache=cache)
+        second = asyncio.run(scanner.scan_network("10.0.0.0/29"))
+
+        assert [d['ip_address'] for d in first] == ["10.0.0.1", "10.0.0.2"]
+        assert [d['ip_address'] for d in second] == ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+        assert scanner.last_scan_stats['cached'] == 2
+        assert {r.split('/')[0] for r in web.requests[requests_after_first:]} == {"10.0.0.3"}
+
+    def test_cache_entries_expire(self):
+        cache = FingerprintCache(ttl=0.05)
+        cache.set("10.0.0.1", (80,), {"hostname": "RNP1"})
+
+        assert cache.get("10.0.0.1", (80,)) == (True, {"hostname": "RNP1"})
+        assert cache.get("10.0.0.1", (80, 9100)) == (False, None)
+        cache.set("10.0.0.1", (80,), {"hostname": "RNP1"})
+        time.sleep(0.06)
+        assert cache.get("10.0.0.1", (80,)) == (False, None)
@@ -0,0 +1,217 @@
+"""
+Tests for adaptive page size and pipelined pagination of user counters
+"""
+import math
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from services.counter_service import CounterService
+from services.parsers.page_fetcher import (
+    DEFAULT_PAGE_SIZE, PageFetchConfig, PagedCounterFetcher, page_fetch_metrics
+)
+from services.parsers.ricoh_session import RicohSessionConfig, RicohSessionManager
+from services.parsers.user_counter_parser import parse_user_counter_html
+
+
+class FakePrinter:
+    """getUserCounter.cgi that caps the page size like a real printer model"""
+
+    def __init__(self, total_users, max_page_size, paginated=True, delay=0.0, reject_above=None,
+                 fail_offsets=(), reported_pages=None):
+        self.total_users = total_users
+        self.max_page_size = max_page_size
+        self.paginated = paginated
+        self.delay = delay
+        self.reject_above = reject_above
+        self.fail_offsets = set(fail_offsets)
+        self.reported_pages = reported_pages
+        self.requests = []
+        self.sessions = set()
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, lease, offset, count):
+        with self._lock:
+            self.requests.append((offset, count))
+            self.sessions.add(id(lease.http))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+
+        if offset in self.fail_offsets:
+            raise ConnectionError("connection reset")
+        if self.reject_above and count > self.reject_above:
+            return SimpleNamespace(status_code=500, text="")
+
+        size = min(count, self.max_page_size)
+        rows = "".join(
+            f"<tr><td>{i + 1:04d}</td><td>USUARIO {i + 1}</td>" + "<td>1</td>" * 11 + "</tr>"
+            for i in range(offset, min(offset + size, self.total_users))
+        )
+        pager = ""
+        if self.paginated:
+            total_pages = self.reported_pages or max(1, math.ceil(self.total_users / size))
+            pager = (
+                f'<span id="span_currentPage">{offset // size + 1}</span>'
+                f'<span id="span_totalPage">{total_pages}</span>'
+            )
+        html = f'<html><body>{pager}<table class="tbl_border">{rows}</table></body></html>'
+        return SimpleNamespace(status_code=200, text=html)
+
+
+def _fetcher(printer, pipeline_depth=2, probe_page_size=100):
+    manager = RicohSessionManager(
+        config=RicohSessionConfig(max_sessions_per_printer=4),
+        login=MagicMock(),
+        session_factory=MagicMock
+    )
+    return PagedCounterFetcher(
+        "192.168.91.250",
+        request_page=printer,
+        parse_page=parse_user_counter_html,
+        config=PageFetchConfig(probe_page_size=probe_page_size, pipeline_depth=pipeline_depth),
+        session_manager=manager
+    )
+
+
+def _codes(pages):
+    return [user['codigo_usuario'] for page in pages for user in page]
+
+
+@pytest.mark.unit
+class TestPagedCounterFetcher:
+    """Page size learning, pipelining and ordering"""
+
+    def test_learns_printer_page_size(self):
+        printer = FakePrinter(total_users=230, max_page_size=50)
+
+        pages, stats = _fetcher(printer).fetch_all()
+
+        assert _codes(pages) == [f"{i:04d}" for i in range(1, 231)]
+        assert stats.learned_page_size == 50
+        assert stats.pages == 5
+        assert len(printer.requests) == 5
+        assert printer.requests[0] == (0, 100)
+        assert sorted(printer.requests[1:]) == [(50, 50), (100, 50), (150, 50), (200, 50)]
+
+    def test_uses_cached_page_size(self):
+        printer = FakePrinter(total_users=120, max_page_size=60)
+
+        pages, stats = _fetcher(printer).fetch_all(page_size=60)
+
+        assert printer.requests[0] == (0, 60)
+        assert len(_codes(pages)) == 120
+        assert stats.pages == 2
+
+    def test_remaining_pages_are_pipelined(self):
+        printer = FakePrinter(total_users=200, max_page_size=20, delay=0.05)
+
+        pages, _ = _fetcher(printer, pipeline_depth=3).fetch_all(page_size=20)
+
+        assert printer.peak == 3
+        assert _codes(pages) == [f"{i:04d}" for i in range(1, 201)]
+
+    def test_pipelined_pages_share_one_session(self):
+        printer = FakePrinter(total_users=200, max_page_size=20, delay=0.02)
+
+        pages, stats = _fetcher(printer, pipeline_depth=3).fetch_all(page_size=20)
+
+        assert len(_codes(pages)) == 200
+        assert len(printer.sessions) == 1
+        assert stats.incomplete is False
+
+    def test_failed_page_keeps_the_pages_before_it(self):
+        printer = FakePrinter(total_users=200, max_page_size=20, fail_offsets={100})
+
+        pages, stats = _fetcher(printer, pipeline_depth=3).fetch_all(page_size=20)
+
+        assert _codes(pages) == [f"{i:04d}" for i in range(1, 101)]
+        assert stats.pages == 5
+        assert stats.incomplete is True
+
+    def test_exaggerated_page_total_stops_at_the_last_page(self):
+        printer = FakePrinter(total_users=55, max_page_size=20, reported_pages=400)
+
+        pages, stats = _fetcher(printer, pipeline_depth=2).fetch_all(page_size=20)
+
+        assert len(_codes(pages)) == 55
+        assert len(printer.requests) <= 3 + 2
+        assert stats.incomplete is False
+
+    def test_empty_page_before_the_reported_total_is_incomplete(self):
+        printer = FakePrinter(total_users=60, max_page_size=20, reported_pages=5)
+
+        pages, stats = _fetcher(printer, pipeline_depth=2).fetch_all(page_size=20)
+
+        assert len(_codes(pages)) == 60
+        assert stats.incomplete is True
+
+    def test_failed_first_page_is_incomplete(self):
+        printer = FakePrinter(total_users=60, max_page_size=20, reject_above=1)
+
+        pages, stats = _fetcher(printer).fetch_all(page_size=20)
+
+        assert (pages, stats.incomplete) == ([], True)
+
+    def test_falls_back_when_probe_size_rejected(self):
+        printer = FakePrinter(total_users=45, max_page_size=20, reject_above=DEFAULT_PAGE_SIZE)
+
+        pages, stats = _fetcher(printer).fetch_all()
+
+        assert printer.requests[:2] == [(0, 100), (0, DEFAULT_PAGE_SIZE)]
+        assert len(_codes(pages)) == 45
+        assert stats.learned_page_size == DEFAULT_PAGE_SIZE
+
+    def test_single_page_does_not_learn_size(self):
+        printer = FakePrinter(total_users=7, max_page_size=50)
+
+        pages, stats = _fetcher(printer).fetch_all()
+
+        assert len(_codes(pages)) == 7
+        assert stats.learned_page_size is None
+        assert len(printer.requests) == 1
+
+    def test_without_pagination_reads_until_short_page(self):
+        printer = FakePrinter(total_users=65, max_page_size=30, paginated=False)
+
+        pages, stats = _fetcher(printer).fetch_all()
+
+        assert _codes(pages) == [f"{i:04d}" for i in range(1, 66)]
+        assert stats.page_size == 30
+        assert len(printer.requests) == 3
+
+    def test_records_pages_per_second(self):
+        printer = FakePrinter(total_users=100, max_page_size=25, delay=0.01)
+
+        _, stats = _fetcher(printer).fetch_all()
+        metrics = page_fetch_metrics.get_stats()["192.168.91.250"]
+
+        assert metrics['pages'] == stats.pages == 4
+        assert metrics['pages_per_second'] == stats.pages_per_second > 0
+
+
+@pytest.mark.unit
+def test_counter_service_caches_learned_page_size():
+    printer = SimpleNamespace(hostname="printer-250", tamano_pagina_contadores=None)
+
+    CounterService._remember_page_size(printer, SimpleNamespace(learned_page_size=50))
+    assert printer.tamano_pagina_contadores == 50
+
+    CounterService._remember_page_size(printer, SimpleNamespace(learned_page_size=None))
+    assert printer.tamano_pagina_contadores == 50
+
+
+@pytest.mark.unit
+def test_counter_service_rejects_an_incomplete_read():
+    printer = SimpleNamespace(hostname="printer-250")
+
+    CounterService._require_complete(printer, SimpleNamespace(incomplete=False))
+    with pytest.raises(ValueError, match="lectura incompleta"):
+        CounterService._require_complete(printer, SimpleNamespace(incomplete=True, pages=2, rows=40))
@@ -0,0 +1,185 @@
+"""
+Tests for the per-printer scheduler: one operation at a time per printer,
+printers in parallel, interactive work ahead of bulk reads, coalescing of
+duplicate queued reads, per-printer metrics and interactive endpoints
+running in the printer's queue
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from db.models import ContadorImpresora, Printer
+from services.counter_service import CounterService
+from services.printer_scheduler import (
+    PRIORITY_BULK, PRIORITY_INTERACTIVE, PrinterScheduler, PrinterSchedulerConfig
+)
+
+
+@pytest.fixture
+def scheduler():
+    return PrinterScheduler(PrinterSchedulerConfig(max_workers=8))
+
+
+def _blocker(scheduler, printer):
+    """Occupies the printer's actor until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    future = scheduler.submit(printer, block, priority=PRIORITY_INTERACTIVE)
+    assert started.wait(5)
+    return release, future
+
+
+@pytest.mark.unit
+class TestPrinterScheduler:
+
+    def test_operations_on_one_printer_never_overlap_but_printers_run_in_parallel(self, scheduler):
+        lock = threading.Lock()
+        active, peak = {}, {}
+
+        def op(printer):
+            with lock:
+                active[printer] = active.get(printer, 0) + 1
+                peak[printer] = max(peak.get(printer, 0), active[printer])
+            time.sleep(0.05)
+            with lock:
+                active[printer] -= 1
+            return printer
+
+        printers = ['10.0.0.1', '10.0.0.2', '10.0.0.3'] * 4
+        start = time.monotonic()
+        results = scheduler.map(printers, op, printers)
+        elapsed = time.monotonic() - start
+
+        assert results == printers
+        assert peak == {'10.0.0.1': 1, '10.0.0.2': 1, '10.0.0.3': 1}
+        assert elapsed < 0.45  # 4 rounds of 0.05s per printer, not 12 in series
+
+    def test_interactive_work_runs_before_queued_bulk_reads(self, scheduler):
+        release, first = _blocker(scheduler, '10.0.0.1')
+        order = []
+
+        bulk = [scheduler.submit('10.0.0.1', order.append, f'bulk-{i}', priority=PRIORITY_BULK) for i in range(3)]
+        interactive = scheduler.submit('10.0.0.1', order.append, 'interactive', priority=PRIORITY_INTERACTIVE)
+        release.set()
+        for future in [first, interactive, *bulk]:
+            future.result(5)
+
+        assert order == ['interactive', 'bulk-0', 'bulk-1', 'bulk-2']
+
+    def test_duplicate_queued_reads_are_coalesced(self, scheduler):
+        release, _ = _blocker(scheduler, '10.0.0.1')
+        calls = []
+
+        def read():
+            calls.append(1)
+            return {'total': 1234}
+
+        futures = [scheduler.submit('10.0.0.1', read, priority=PRIORITY_BULK, key='counters') for _ in range(3)]
+        release.set()
+
+        assert [f.result(5) for f in futures] == [{'total': 1234}] * 3
+        assert len(calls) == 1
+        stats = scheduler.get_stats()['printers']['10.0.0.1']
+        assert (stats['submitted'], stats['coalesced'], stats['completed']) == (4, 2, 2)
+
+    def test_coalesced_interactive_request_raises_the_task_priority(self, scheduler):
+        release, _ = _blocker(scheduler, '10.0.0.1')
+        order = []
+
+        other = scheduler.submit('10.0.0.1', order.append, 'other', priority=PRIORITY_BULK)
+        read = scheduler.submit('10.0.0.1', order.append, 'read', priority=PRIORITY_BULK, key='counters')
+        urgent = scheduler.submit('10.0.0.1', order.append, 'read', priority=PRIORITY_INTERACTIVE, key='counters')
+        release.set()
+        for future in (other, read, urgent):
+            future.result(5)
+
+        assert order == ['read', 'other']
+
+    def test_cancelling_one_waiter_does_not_cancel_coalesced_callers(self, scheduler):
+        release, _ = _blocker(scheduler, '10.0.0.1')
+        first = scheduler.submit('10.0.0.1', lambda: 'ok', key='jobs')
+        second = scheduler.submit('10.0.0.1', lambda: 'ok', key='jobs')
+
+        assert first.cancel()
+        release.set()
+
+        assert second.result(5) == 'ok'
+        assert first.cancelled()
+
+    def test_failures_reach_every_waiter_and_are_counted(self, scheduler):
+        def fail():
+            raise ConnectionError("printer offline")
+
+        with pytest.raises(ConnectionError):
+            scheduler.submit('10.0.0.9', fail).result(5)
+
+        assert scheduler.get_stats()['printers']['10.0.0.9']['failed'] == 1
+
+    def test_task_submitting_to_its_own_printer_runs_inline(self, scheduler):
+        def outer():
+            return scheduler.submit('10.0.0.1', lambda: 'inner').result(1)
+
+        assert scheduler.submit('10.0.0.1', outer).result(5) == 'inner'
+
+    def test_coroutines_run_on_the_callers_loop_through_the_printer_queue(self, scheduler):
+        async def read(value):
+            await asyncio.sleep(0.01)
+            return asyncio.get_running_loop(), value
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*(
+                scheduler.run('10.0.0.1', read, i, priority=PRIORITY_BULK) for i in range(3)
+            ))
+            return loop, results
+
+        loop, results = asyncio.run(main())
+
+        assert [value for _, value in results] == [0, 1, 2]
+        assert all(result_loop is loop for result_loop, _ in results)
+
+
+@pytest.mark.unit
+class TestInteractiveEndpoints:
+
+    def test_manual_read_runs_in_the_printer_queue_with_its_own_session(self, client, admin_user, db_session,
+                                                                        db_engine, test_empresa, monkeypatch):
+        from main import app
+        from middleware.auth_middleware import get_current_user
+
+        printer = Printer(hostname="printer-manual", ip_address="192.168.94.10", empresa_id=test_empresa.id,
+                          status="ONLINE", tiene_contador_usuario=False, usar_contador_ecologico=False)
+        db_session.add(printer)
+        db_session.commit()
+
+        reads = []
+
+        def read_printer_counters(db, printer_id):
+            reads.append((threading.current_thread().name, db is db_session))
+            contador = ContadorImpresora(printer_id=printer_id, total=1234, fecha_lectura=datetime(2026, 3, 2, 9, 0))
+            db.add(contador)
+            db.commit()
+            db.refresh(contador)
+            return contador
+
+        monkeypatch.setattr("api.counters.SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=db_engine))
+        monkeypatch.setattr(CounterService, "read_printer_counters", staticmethod(read_printer_counters))
+        app.dependency_overrides[get_current_user] = lambda: admin_user
+        try:
+            response = client.post(f"/api/counters/read/{printer.id}")
+        finally:
+            app.dependency_overrides.pop(get_current_user, None)
+
+        assert response.json()["success"] is True
+        assert response.json()["contador_total"]["total"] == 1234
+        [(thread_name, request_session)] = reads
+        assert thread_name.startswith("printer-actor")
+        assert request_session is False
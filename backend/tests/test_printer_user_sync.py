@@ -0,0 +1,157 @@
+"""
+Tests for PrinterUserSyncService: bounded concurrent address book reads and
+the single-transaction database merge
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from db.models import User, UserPrinterAssignment
+from db.repository import UserRepository
+from services.printer_user_sync_service import PrinterUserSyncConfig, PrinterUserSyncService
+
+NO_PERMISSIONS = {'copiadora': False, 'escaner': False, 'impresora': False,
+                  'document_server': False, 'fax': False, 'navegador': False}
+
+
+def _printer_user(codigo, entry_index, permisos=None):
+    return {'nombre': f"Usuario {codigo}", 'codigo': codigo, 'entry_index': entry_index, 'empresa': '',
+            'permisos': permisos or dict(NO_PERMISSIONS), 'carpeta': f"\\\\srv\\{codigo}", 'lazy': True}
+
+
+def _targets(n):
+    return [
+        {'printer_id': i, 'hostname': f"printer-{i}", 'ip_address': f"10.0.0.{i}",
+         'admin_password': None, 'skipped': False}
+        for i in range(1, n + 1)
+    ]
+
+
+def _result(printer_id, users, error=None):
+    return {'printer_id': printer_id, 'hostname': f"printer-{printer_id}", 'ip_address': f"10.0.0.{printer_id}",
+            'users': users, 'skipped': False, 'error': error, 'elapsed_seconds': 0.1}
+
+
+def _user(db, codigo, is_active=True):
+    user = UserRepository.create(
+        db=db,
+        name=f"Usuario {codigo}",
+        codigo_de_usuario=codigo,
+        network_username="reliteltda\\scaner",
+        network_password_encrypted="encrypted",
+        smb_server="192.168.91.5",
+        smb_port=21,
+        smb_path="\\\\192.168.91.5\\Escaner"
+    )
+    user.is_active = is_active
+    db.commit()
+    return user
+
+
+class FakeClient:
+    def __init__(self, delay=0.02, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.active = 0
+        self.peak = 0
+
+    async def read_users_from_printer(self, ip, fast_list=False, admin_password=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if ip in self.failing:
+                raise ConnectionError("sin respuesta")
+            return [_printer_user("1717", "00001")]
+        finally:
+            self.active -= 1
+
+
+@pytest.mark.unit
+class TestPrinterUserSyncRead:
+
+    def test_reads_are_concurrent_and_bounded(self):
+        client = FakeClient(failing={"10.0.0.4"})
+        service = PrinterUserSyncService(client=client, config=PrinterUserSyncConfig(max_concurrency=3))
+
+        results = asyncio.run(service.read_all(_targets(7)))
+
+        assert client.peak == 3
+        assert [r['printer_id'] for r in results] == list(range(1, 8))
+        assert results[3]['error'] == "sin respuesta" and results[3]['users'] == []
+        assert all(len(r['users']) == 1 for r in results if r['printer_id'] != 4)
+
+    def test_slow_printer_times_out_without_blocking_the_rest(self):
+        service = PrinterUserSyncService(
+            client=FakeClient(delay=1.0),
+            config=PrinterUserSyncConfig(max_concurrency=2, printer_timeout=0.05)
+        )
+
+        results = asyncio.run(service.read_all(_targets(2)))
+
+        assert all("Tiempo límite" in r['error'] for r in results)
+
+
+@pytest.mark.unit
+class TestPrinterUserSyncApply:
+
+    def test_merge_preloads_users_and_assignments_in_two_queries(self, db_session, test_empresa):
+        from db.models import Printer
+        printers = [Printer(hostname=f"printer-{i}", ip_address=f"10.0.0.{i}", empresa_id=test_empresa.id)
+                    for i in (1, 2, 3)]
+        db_session.add_all(printers)
+        db_session.commit()
+        known = _user(db_session, "1717", is_active=False)
+        other = _user(db_session, "2020")
+        db_session.add(UserPrinterAssignment(user_id=other.id, printer_id=printers[1].id,
+                                             entry_index="00009", is_active=False, func_fax=True))
+        db_session.commit()
+
+        results = [
+            _result(printers[0].id, [_printer_user("1717", "00001"), _printer_user("9999", "00002")]),
+            _result(printers[1].id, [_printer_user("1717", "00004"), _printer_user("2020", "00009")]),
+            _result(printers[2].id, [], error="sin respuesta"),
+        ]
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_session.bind, "before_cursor_execute", listener)
+        try:
+            sync = PrinterUserSyncService.apply(db_session, results)
+        finally:
+            event.remove(db_session.bind, "before_cursor_execute", listener)
+
+        selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+        assert len(selects) == 2
+
+        by_code = {u['codigo']: u for u in sync['users']}
+        assert by_code["1717"]['en_db'] and not by_code["9999"]['en_db']
+        assert [i['entry_index'] for i in by_code["1717"]['impresoras']] == ["00001", "00004"]
+        assert sync['errors'] == ["Error en printer-3 (10.0.0.3): sin respuesta"]
+
+        # Lista rápida: asignaciones nuevas con permisos básicos, existentes reactivadas sin tocar permisos
+        created = db_session.query(UserPrinterAssignment).filter_by(user_id=known.id).order_by(UserPrinterAssignment.printer_id).all()
+        assert [(a.printer_id, a.entry_index, a.func_copier) for a in created] == [
+            (printers[0].id, "00001", True), (printers[1].id, "00004", True)
+        ]
+        reactivated = db_session.query(UserPrinterAssignment).filter_by(user_id=other.id).one()
+        assert reactivated.is_active and reactivated.func_fax and not reactivated.func_copier
+        assert sync['stats'] == {'assignments_created': 2, 'assignments_updated': 1, 'users_reactivated': 0}
+
+    def test_specific_mode_writes_real_permissions(self, db_session, test_empresa):
+        from db.models import Printer
+        printer = Printer(hostname="printer-1", ip_address="10.0.0.1", empresa_id=test_empresa.id)
+        db_session.add(printer)
+        db_session.commit()
+        user = _user(db_session, "1717", is_active=False)
+
+        permisos = dict(NO_PERMISSIONS, escaner=True, impresora_color=True)
+        sync = PrinterUserSyncService.apply(
+            db_session, [_result(printer.id, [_printer_user("1717", "00003", permisos)])], user_code="1717"
+        )
+
+        assignment = db_session.query(UserPrinterAssignment).filter_by(user_id=user.id).one()
+        assert assignment.func_scanner and assignment.func_printer_color and not assignment.func_copier
+        assert assignment.is_active and db_session.get(User, user.id).is_active
+        assert sync['stats']['users_reactivated'] == 1
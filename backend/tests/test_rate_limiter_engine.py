@@ -0,0 +1,130 @@
+"""
+Tests for the sliding-window rate limiter engine shared by the API limiter,
+the DDoS burst detector and the WebSocket connection checks
+"""
+import pytest
+
+from services.rate_limiter_service import (
+    NS_PER_SECOND, RateLimiterService, SlidingWindowLimiter
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000 * NS_PER_SECOND
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += int(seconds * NS_PER_SECOND)
+
+
+class FakeScript:
+    """Script Lua registrado: responde allowed=1, remaining=limit-1, reset 60s"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        out = []
+        for i in range(len(keys)):
+            out += [1, args[1 + i * 2] - 1, 60000]
+        return out
+
+
+class FakeRedis:
+    def __init__(self):
+        self.script = FakeScript()
+
+    def register_script(self, source):
+        return self.script
+
+
+@pytest.mark.unit
+class TestSlidingWindow:
+
+    def test_previous_window_is_weighted_instead_of_resetting(self):
+        clock = FakeClock()
+        limiter = SlidingWindowLimiter(max_keys=10, shards=1, clock=clock)
+        assert all(limiter.hit("ip", 10, 60).allowed for _ in range(10))
+
+        # Recién iniciada la ventana siguiente, la anterior aún pesa 10 * 59/60
+        clock.advance(61)
+        assert [limiter.hit("ip", 10, 60).allowed for _ in range(2)] == [True, False]
+
+        # A mitad de la ventana solo cuenta la mitad de la anterior
+        clock.advance(29)
+        decisions = [limiter.hit("ip", 10, 60) for _ in range(5)]
+        assert [d.allowed for d in decisions] == [True] * 4 + [False]
+        assert decisions[3].remaining == 0
+
+    def test_busy_key_is_released_when_its_windows_pass(self):
+        clock = FakeClock()
+        limiter = SlidingWindowLimiter(max_keys=10, shards=1, clock=clock)
+        for _ in range(5):
+            limiter.hit("ws", 5, 10)
+
+        # Un hit rechazado por segundo no renueva la ventana
+        blocked = []
+        for _ in range(20):
+            clock.advance(1)
+            blocked.append(not limiter.hit("ws", 5, 10).allowed)
+
+        assert blocked[0] and not all(blocked)
+        clock.advance(20)
+        assert limiter.peek("ws", 5, 10).remaining == 5
+
+    def test_memory_is_bounded_by_lru_eviction(self):
+        clock = FakeClock()
+        limiter = SlidingWindowLimiter(max_keys=4, shards=1, clock=clock)
+        for key in ("a", "b", "c", "d"):
+            limiter.hit(key, 5, 60)
+        limiter.hit("a", 5, 60)  # "a" pasa a ser la más reciente
+        limiter.hit("e", 5, 60)
+        limiter.hit("f", 5, 60)
+
+        assert len(limiter) == 4
+        assert limiter.evictions == 2
+        assert "a" in limiter and "b" not in limiter and "c" not in limiter
+
+        clock.advance(120)
+        assert limiter.cleanup() == 4
+        assert len(limiter) == 0
+
+
+@pytest.mark.unit
+class TestRedisBackend:
+
+    def test_all_checks_run_in_one_script_call(self, monkeypatch):
+        fake = FakeRedis()
+        monkeypatch.setattr(RateLimiterService, "_initialized", True)
+        monkeypatch.setattr(RateLimiterService, "_storage_backend", "redis")
+        monkeypatch.setattr(RateLimiterService, "_redis_client", fake)
+        monkeypatch.setattr(RateLimiterService, "_redis_script", None)
+
+        results = RateLimiterService.check_rate_limits([("global:1.2.3.4", 100, 60), ("endpoint:1.2.3.4:/auth/login", 5, 300)])
+        remaining = RateLimiterService.get_remaining("global:1.2.3.4", 100, 60)
+
+        keys, args = fake.script.calls[0]
+        assert keys == ["ratelimit:sw:global:1.2.3.4", "ratelimit:sw:endpoint:1.2.3.4:/auth/login"]
+        assert args == [1, 100, 60000, 5, 300000]
+        assert [(r.allowed, r.remaining) for r in results] == [(True, 99), (True, 4)]
+        # La consulta de remaining usa el mismo script sin contar el hit
+        assert fake.script.calls[1][1][0] == 0 and remaining == 99
+
+
+@pytest.mark.unit
+class TestWebSocketConnectionRate:
+
+    def test_connection_rate_uses_shared_limiter(self):
+        from main import ConnectionManager, WS_RATE_LIMIT_CONNECTIONS
+
+        manager = ConnectionManager()
+        RateLimiterService.reset_counter("ws_connect:198.51.100.9")
+
+        allowed = [manager._check_connection_rate("198.51.100.9") for _ in range(WS_RATE_LIMIT_CONNECTIONS + 1)]
+
+        assert allowed == [True] * WS_RATE_LIMIT_CONNECTIONS + [False]
+        assert RateLimiterService.get_remaining("ws_connect:198.51.100.9", WS_RATE_LIMIT_CONNECTIONS, 60) == 0
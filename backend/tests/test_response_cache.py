@@ -0,0 +1,169 @@
+"""
+Tests for the tenant-aware, single-flight response cache
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services.redis_service import (
+    ResponseCache, cache_result, redis_service, response_cache, tenant_cache_key
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    redis_service.invalidate_pattern("test:*")
+    redis_service.invalidate_pattern("lock:test:*")
+    redis_service.cache_stats.reset()
+    yield
+    redis_service.invalidate_pattern("test:*")
+    redis_service.invalidate_pattern("lock:test:*")
+    redis_service.cache_stats.reset()
+
+
+def _user(empresa_id, rol="admin"):
+    # Objetos distintos en cada request, como el AdminUser de cada sesión
+    return SimpleNamespace(empresa_id=empresa_id, rol=rol)
+
+
+@pytest.mark.unit
+class TestTenantCacheKey:
+
+    def test_key_uses_tenant_role_and_params_not_object_identity(self):
+        calls = []
+
+        @cache_result("test:top", ttl=60, key=tenant_cache_key("limit"))
+        async def endpoint(limit: int = 5, db=None, current_user=None):
+            calls.append(limit)
+            return {"limit": limit, "empresa": current_user.empresa_id}
+
+        async def run():
+            return [
+                await endpoint(limit=5, db=object(), current_user=_user(1)),
+                await endpoint(limit=5, db=object(), current_user=_user(1)),
+                await endpoint(limit=5, db=object(), current_user=_user(2)),
+                await endpoint(limit=10, db=object(), current_user=_user(1)),
+                await endpoint(limit=5, db=object(), current_user=_user(None, "superadmin")),
+            ]
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 4
+        assert results[0] == results[1] == {"limit": 5, "empresa": 1}
+        assert results[2]["empresa"] == 2
+        assert redis_service.get("test:top:empresa=all:rol=superadmin:limit=5") is not None
+
+    def test_params_are_normalized(self):
+        from datetime import date
+        build = tenant_cache_key("desde", "codigos")
+        key = build({"current_user": _user(3), "desde": date(2026, 1, 31), "codigos": ["b", "a"]})
+        assert key == "empresa=3:rol=admin:desde=2026-01-31:codigos=a,b"
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+
+    def test_concurrent_misses_compute_once(self):
+        computes = []
+
+        async def compute():
+            computes.append(1)
+            await asyncio.sleep(0.05)
+            return {"total": 42}
+
+        async def run():
+            return await asyncio.gather(*[
+                response_cache.get_or_compute("test:kpis", "test:kpis:empresa=1", compute, ttl=60)
+                for _ in range(10)
+            ])
+
+        results = asyncio.run(run())
+
+        assert computes == [1]
+        assert all(r == {"total": 42} for r in results)
+        stats = redis_service.get_stats()["response_cache"]["test:kpis"]
+        assert (stats["misses"], stats["coalesced"], stats["recomputes"]) == (10, 9, 1)
+        assert stats["recompute_ms_avg"] >= 40
+
+    def test_waits_for_other_process_holding_the_lock(self):
+        cache = ResponseCache(redis_service, lock_timeout=2, poll_interval=0.01)
+        key = "test:kpis:empresa=1"
+        token = redis_service.acquire_lock(cache.LOCK_PREFIX + key, 2)
+
+        async def other_process_finishes():
+            await asyncio.sleep(0.05)
+            redis_service.set(key, {cache.VALUE_FIELD: "from-other", cache.STORED_AT_FIELD: time.time()}, 60)
+
+        async def compute():
+            raise AssertionError("should not recompute")
+
+        async def run():
+            waiter = asyncio.ensure_future(cache.get_or_compute("test:kpis", key, compute, ttl=60))
+            await other_process_finishes()
+            return await waiter
+
+        try:
+            assert asyncio.run(run()) == "from-other"
+        finally:
+            redis_service.release_lock(cache.LOCK_PREFIX + key, token)
+
+    def test_errors_reach_waiters_and_are_not_cached(self):
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db down")
+
+        async def run():
+            return await asyncio.gather(*[
+                response_cache.get_or_compute("test:kpis", "test:kpis:err", compute, ttl=60)
+                for _ in range(3)
+            ], return_exceptions=True)
+
+        results = asyncio.run(run())
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert redis_service.get("test:kpis:err") is None
+        assert redis_service.acquire_lock("lock:test:kpis:err", 1) is not None
+
+
+@pytest.mark.unit
+class TestStaleWhileRevalidate:
+
+    def test_stale_entry_served_while_one_request_revalidates(self):
+        key = "test:actividad:empresa=1"
+        redis_service.set(key, {
+            response_cache.VALUE_FIELD: "old",
+            response_cache.STORED_AT_FIELD: time.time() - 90
+        }, 120)
+        computes = []
+
+        async def compute():
+            computes.append(1)
+            await asyncio.sleep(0.05)
+            return "new"
+
+        async def run():
+            return await asyncio.gather(*[
+                response_cache.get_or_compute("test:actividad", key, compute, ttl=60, stale_ttl=60)
+                for _ in range(3)
+            ])
+
+        assert asyncio.run(run()) == ["new", "old", "old"]
+        assert computes == [1]
+        assert redis_service.get(key)[response_cache.VALUE_FIELD] == "new"
+        stats = redis_service.get_stats()["response_cache"]["test:actividad"]
+        assert (stats["stale_hits"], stats["recomputes"]) == (2, 1)
+
+    def test_entry_past_stale_window_is_a_miss(self):
+        key = "test:actividad:empresa=2"
+        redis_service.set(key, {
+            response_cache.VALUE_FIELD: "old",
+            response_cache.STORED_AT_FIELD: time.time() - 200
+        }, 300)
+
+        async def compute():
+            return "new"
+
+        assert asyncio.run(response_cache.get_or_compute("test:actividad", key, compute, ttl=60, stale_ttl=60)) == "new"
+        assert redis_service.get_stats()["response_cache"]["test:actividad"]["misses"] == 1
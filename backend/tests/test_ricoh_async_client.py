@@ -0,0 +1,156 @@
+"""
+Tests for AsyncRicohWebClient against an in-process Web Image Monitor fake
+(httpx.MockTransport)
+"""
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from services.ricoh_async_client import AsyncRicohWebClient, RicohAsyncClientConfig
+
+USER_FORM = """
+<form>
+  <input name="wimToken" value="555" />
+  <input name="availableFuncIn" type="checkbox" value="COPY_BW" checked />
+  <input name="availableFuncIn" type="checkbox" value="PRT_FC" checked />
+  <input name="availableFuncIn" type="checkbox" value="SCAN" />
+  <input name="folderPathNameIn" value="\\\\SERVER\\scan\\1717" />
+</form>
+"""
+
+JOBS_PAGE = """
+<table class="reportListCommon"><tr>
+  <td class="listData"><input type="checkbox" value="42" /></td><td class="listData">Stored</td>
+  <td class="listData"></td><td class="listData">1717</td><td class="listData">informe.pdf</td>
+  <td class="listData">2026/10/17 09:30</td><td class="listData"></td><td class="listData">3</td>
+  <td class="listData">---</td>
+</tr></table>
+"""
+
+
+def _entries(start, count):
+    rows = [f"[{i},1,'{i:05d}','USUARIO {i}','{1000 + i}','','','\\\\\\\\SERVER\\\\u{i}']" for i in range(start, start + count)]
+    return "[" + ",".join(rows) + "]"
+
+
+class FakeWIM:
+    """Simula el login de WIM, la libreta (51 usuarios) y storedJob.cgi por host"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.logins = {}
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.max_total = 0
+
+    async def __call__(self, request):
+        host = request.url.host
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        self.max_in_flight[host] = max(self.max_in_flight.get(host, 0), self.in_flight[host])
+        self.max_total = max(self.max_total, sum(self.in_flight.values()))
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            return self._route(request, host)
+        finally:
+            self.in_flight[host] -= 1
+
+    def _route(self, request, host):
+        path = request.url.path
+        logged_in = request.headers.get("cookie", "").find(f"wimsesid=s-{host}") >= 0
+        if path.endswith("authForm.cgi"):
+            return httpx.Response(200, text='<input name="wimToken" value="111" />')
+        if path.endswith("login.cgi"):
+            self.logins[host] = self.logins.get(host, 0) + 1
+            return httpx.Response(200, text="ok", headers={"set-cookie": f"wimsesid=s-{host}; path=/"})
+        if path.endswith("logout.cgi"):
+            return httpx.Response(200, text="bye")
+        if not logged_in:
+            return httpx.Response(302, headers={"location": "/web/guest/es/websys/webArch/authForm.cgi"})
+        if path.endswith("adrsList.cgi"):
+            return httpx.Response(200, text='<input name="wimToken" value="222" /> adrsList')
+        if path.endswith("adrsListLoadEntry.cgi"):
+            batch = int(dict(httpx.QueryParams(request.content.decode()))["getCountIn"])
+            return httpx.Response(200, text=_entries(1, 50) if batch == 1 else _entries(51, 1))
+        if path.endswith("adrsGetUser.cgi"):
+            return httpx.Response(200, text=USER_FORM)
+        if path.endswith("storedJob.cgi"):
+            return httpx.Response(200, text=JOBS_PAGE)
+        return httpx.Response(404)
+
+
+def _client(fake):
+    return AsyncRicohWebClient(
+        admin_password="secret",
+        config=RicohAsyncClientConfig(),
+        transport=httpx.MockTransport(fake)
+    )
+
+
+@pytest.mark.unit
+class TestAsyncRicohWebClient:
+
+    def test_reads_address_book_in_batches_and_logs_out(self):
+        fake = FakeWIM()
+        client = _client(fake)
+
+        async def run():
+            users = await client.read_users_from_printer("10.0.0.1", fast_list=True)
+            state = client._state("10.0.0.1")
+            authenticated_after = state.authenticated
+            await client.aclose()
+            return users, authenticated_after
+
+        users, authenticated_after = asyncio.run(run())
+
+        assert len(users) == 51
+        assert users[0]["codigo"] == "1001" and users[0]["lazy"] is True
+        assert users[-1]["carpeta"] == "\\\\SERVER\\u51"
+        assert fake.logins == {"10.0.0.1": 1}
+        assert authenticated_after is False
+
+    def test_find_specific_user_reads_real_permissions(self):
+        client = _client(FakeWIM())
+
+        async def run():
+            user = await client.find_specific_user("10.0.0.1", "1017")
+            await client.aclose()
+            return user
+
+        user = asyncio.run(run())
+
+        assert user["entry_index"] == "00017"
+        assert user["permisos"]["copiadora"] and user["permisos"]["impresora_color"]
+        assert not user["permisos"]["escaner"]
+        assert user["carpeta"] == "\\\\SERVER\\scan\\1717"
+        assert user["lazy"] is False
+
+    def test_fleet_fan_out_is_concurrent_across_printers_and_serial_per_printer(self):
+        fake = FakeWIM(delay=0.01)
+        client = _client(fake)
+        ips = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+
+        async def run():
+            results = await asyncio.gather(*(client.get_stored_jobs(ip) for ip in ips + ips))
+            await client.aclose()
+            return results
+
+        results = asyncio.run(run())
+
+        assert all(jobs == [{"job_id": "42", "tipo": "Stored", "usuario": "1717", "documento": "informe.pdf",
+                             "fecha": "2026/10/17 09:30", "paginas": 3, "copias": None}] for jobs in results)
+        assert fake.max_total > 1
+        assert set(fake.max_in_flight.values()) == {1}
+        # La segunda consulta de cada impresora reutiliza la sesión autenticada
+        assert fake.logins == {ip: 1 for ip in ips}
+
+    def test_write_flows_are_delegated_to_the_sync_client(self):
+        client = _client(FakeWIM())
+
+        with patch("services.ricoh_web_client.RicohWebClient.delete_stored_job", return_value=True) as mock_delete:
+            ok = asyncio.run(client.delete_stored_job("10.0.0.1", "42", admin_password="pw", job_type="locked"))
+
+        assert ok is True
+        mock_delete.assert_called_once_with("10.0.0.1", "42", admin_password="pw", job_type="locked")
@@ -0,0 +1,190 @@
+"""
+Tests for the single-parse Ricoh HTML parsing layer
+Fixtures in tests/fixtures/ricoh_html reproduce each printer format
+(.250/.251 standard and extended, .252 13-cell, .253 eco counter)
+"""
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+from bs4 import BeautifulSoup
+
+from services.parsers import counter_parser, eco_counter_parser, page_fetcher, user_counter_parser
+from services.parsers.html_parsing import (
+    LXML_AVAILABLE, extract_pagination, is_last_page, make_soup
+)
+from services.parsers.ricoh_session import RicohSessionConfig, RicohSessionManager
+
+FIXTURES = Path(__file__).parent / "fixtures" / "ricoh_html"
+
+
+def _fixture(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def _legacy_sections(html):
+    """Section detection as done before: find_all_previous per row"""
+    soup = BeautifulSoup(html, "html.parser")
+    sections = []
+    for row in soup.find_all("tr", class_="staticProp"):
+        previous = [
+            str(elem).strip()
+            for elem in row.find_all_previous(string=True, limit=20)
+            if str(elem).strip()
+        ]
+        sections.append(previous)
+    return sections
+
+
+def _html_parses(soup_spy):
+    """Calls to make_soup that actually parsed text (not reusing a tree)"""
+    return sum(1 for c in soup_spy.call_args_list if not isinstance(c.args[0], BeautifulSoup))
+
+
+def _fake_manager(pages):
+    """Session manager whose single HTTP session answers with the given pages"""
+    http = MagicMock()
+    http.request.side_effect = [MagicMock(status_code=200, text=page, url="") for page in pages]
+    return RicohSessionManager(
+        config=RicohSessionConfig(),
+        login=MagicMock(),
+        session_factory=lambda: http
+    )
+
+
+@pytest.mark.unit
+class TestPagination:
+    """Pagination is read from the already parsed tree"""
+
+    @pytest.mark.parametrize("name,expected", [
+        ("user_counter_250.html", {'current_page': 2, 'total_pages': 10, 'total_users': 183}),
+        ("user_counter_251.html", {'current_page': 1, 'total_pages': 12, 'total_users': 240}),
+        ("user_counter_252.html", {'current_page': 5, 'total_pages': 5, 'total_users': 97}),
+        ("eco_counter_253.html", {'current_page': 3, 'total_pages': 16, 'total_users': 312}),
+    ])
+    def test_extract_pagination(self, name, expected):
+        assert extract_pagination(make_soup(_fixture(name))) == expected
+
+    def test_missing_pagination_is_not_last_page(self):
+        pagination = extract_pagination(make_soup("<html><body></body></html>"))
+
+        assert pagination == {'current_page': None, 'total_pages': None, 'total_users': 0}
+        assert is_last_page(pagination) is False
+
+    def test_make_soup_reuses_parsed_tree(self):
+        soup = make_soup("<p>hola</p>")
+        assert make_soup(soup) is soup
+
+
+@pytest.mark.unit
+class TestUserCounterFormats:
+    """Each printer format keeps its column mapping"""
+
+    def test_standard_format_250(self):
+        users = user_counter_parser.parse_user_counter_html(_fixture("user_counter_250.html"))
+
+        assert len(users) == 20
+        assert users[0]['codigo_usuario'] == "0021"
+        assert users[0]['copiadora']['hojas_2_caras'] == 0
+        assert all(
+            u['total_paginas'] == u['total_impresiones']['bn'] + u['total_impresiones']['color']
+            for u in users
+        )
+
+    def test_extended_format_251(self):
+        html = _fixture("user_counter_251.html")
+        users = user_counter_parser.parse_user_counter_html(html)
+        soup = make_soup(html)
+        first_row = [
+            td.get_text(strip=True)
+            for td in soup.find('table', class_='adTable').find_all('td', class_='listData')[:22]
+        ]
+
+        assert len(users) == 20
+        assert users[0]['copiadora']['hojas_2_caras'] == int(first_row[8])
+        assert users[0]['revelado']['color_ymc'] == int(first_row[21])
+
+    def test_13_cell_format_252(self):
+        users = user_counter_parser.parse_user_counter_html(_fixture("user_counter_252.html"))
+
+        assert len(users) == 20
+        assert users[0]['codigo_usuario'] == "0081"
+        assert all(u['total_impresiones']['color'] == 0 for u in users)
+
+    def test_eco_format_253(self):
+        result = eco_counter_parser.parse_eco_counter_html(_fixture("eco_counter_253.html"))
+
+        assert len(result['users']) == 20
+        assert result['users'][0]['codigo_usuario'] == "0041"
+        assert result['device_total']['total_paginas_actual'] > 0
+
+
+@pytest.mark.unit
+class TestCounterSections:
+    """The linear walk sees the same context as the old per-row backwards search"""
+
+    def test_section_window_matches_find_all_previous(self):
+        html = _fixture("unification_counter.html")
+        soup = make_soup(html, "html.parser")
+
+        walked = [
+            [str(e).strip() for e in reversed(previous) if str(e).strip()]
+            for _, previous in counter_parser._iter_static_rows(soup)
+        ]
+
+        assert walked == _legacy_sections(html)
+
+    def test_counters_by_section(self):
+        counters = counter_parser.parse_counter_html(_fixture("unification_counter.html"))
+
+        assert counters['total'] == 1243067
+        assert counters['copiadora']['blanco_negro'] == 314066
+        assert counters['impresora']['color'] == 1274473
+        assert counters['fax']['blanco_negro'] == 1208869
+        assert counters['enviar_total']['color'] == 796424
+        assert counters['transmision_fax']['total'] == 2203020
+        assert counters['envio_escaner']['blanco_negro'] == 1884388
+        assert counters['otras_funciones']['duplex'] == 1388533
+
+    @pytest.mark.skipif(not LXML_AVAILABLE, reason="lxml no instalado")
+    @pytest.mark.parametrize("name,parse", [
+        ("unification_counter.html", counter_parser.parse_counter_html),
+        ("user_counter_250.html", user_counter_parser.parse_user_counter_html),
+        ("user_counter_251.html", user_counter_parser.parse_user_counter_html),
+        ("user_counter_252.html", user_counter_parser.parse_user_counter_html),
+        ("eco_counter_253.html", eco_counter_parser.parse_eco_counter_html),
+    ])
+    def test_lxml_matches_html_parser(self, name, parse):
+        html = _fixture(name)
+        assert parse(make_soup(html, "lxml")) == parse(make_soup(html, "html.parser"))
+
+
+@pytest.mark.unit
+class TestSingleParse:
+    """Each page fetched from the printer is parsed exactly once"""
+
+    def test_get_all_user_counters_parses_each_page_once(self):
+        page = _fixture("user_counter_252.html")  # Página 5 de 5
+        manager = _fake_manager([page])
+
+        soup_spy = MagicMock(wraps=make_soup)
+
+        with patch.object(user_counter_parser, "ricoh_session_manager", manager), \
+                patch.object(user_counter_parser, "make_soup", soup_spy), \
+                patch.object(page_fetcher, "make_soup", soup_spy):
+            users = user_counter_parser.get_all_user_counters("192.168.91.252")
+
+        assert len(users) == 20
+        assert _html_parses(soup_spy) == 1
+
+    def test_get_eco_counter_parses_once(self):
+        manager = _fake_manager([_fixture("eco_counter_253.html")])
+
+        with patch.object(eco_counter_parser, "ricoh_session_manager", manager), \
+                patch.object(eco_counter_parser, "make_soup", wraps=make_soup) as soup_spy:
+            result = eco_counter_parser.get_eco_counter("192.168.91.253", offset=40, count=20)
+
+        assert _html_parses(soup_spy) == 1
+        assert result['page_info']['total_users'] == 312
+        assert result['page_info']['current_page'] == 3
+        assert result['page_info']['users_in_page'] == 20
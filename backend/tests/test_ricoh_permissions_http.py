@@ -0,0 +1,105 @@
+"""
+Tests for user permission reads and writes over HTTP against the WIM simulator
+(tests/fixtures/wim_simulator.py): form-flow replay instead of the headless
+browser, concurrent across printers, BADFLOW recovery and the opt-in
+Selenium fallback, and the bounded batch scan of the replay
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from services.ricoh_selenium_client import RicohSeleniumClient, selenium_fallback_config
+from services.ricoh_web_client import ADDRESS_BOOK_BATCH_SIZE, ADDRESS_BOOK_MAX_ENTRIES, RicohWebClient
+from tests.fixtures.wim_simulator import WimPrinter, WimSimulator, address_book
+
+PERMISSIONS = {
+    'copiadora': True, 'copiadora_color': False, 'impresora': True, 'impresora_color': False,
+    'escaner': True, 'document_server': False, 'fax': False, 'navegador': False
+}
+
+
+@pytest.fixture(autouse=True)
+def no_browser(monkeypatch, tmp_path):
+    """Debug pages written to tmp_path; any attempt to start Chrome fails the test"""
+    monkeypatch.chdir(tmp_path)
+
+    def _init_driver(self):
+        raise AssertionError("Selenium driver started")
+
+    monkeypatch.setattr(RicohSeleniumClient, '_init_driver', _init_driver)
+    monkeypatch.setattr(selenium_fallback_config, 'enabled', False)
+
+
+@pytest.mark.unit
+class TestPermissionsOverHttp:
+
+    def test_reads_run_concurrently_across_printers_without_browser(self):
+        wim = {f"127.0.0.{i}": WimPrinter(address_book(120), latency=0.01) for i in range(2, 6)}
+        with WimSimulator(wim) as sim:
+            client = RicohSeleniumClient()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=len(wim)) as pool:
+                read = list(pool.map(
+                    lambda ip: client.get_user_permissions(sim.address(ip), "00075", admin_password=""), wim))
+            elapsed = time.perf_counter() - start
+
+        assert read == [PERMISSIONS] * len(wim)
+        assert elapsed < 1.0
+        assert client.driver is None
+
+    def test_badflow_is_recovered_by_replaying_the_list_flow(self):
+        printer = WimPrinter(address_book(60), strict_flow=True)
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            address = sim.address("127.0.0.2")
+            client = RicohSeleniumClient()
+
+            # La entrada 00050 está en el lote 1, no en el estimado por su índice (2)
+            before = client.get_user_permissions(address, "00050", admin_password="")
+            changed = client.set_user_permissions(address, "00050", {**PERMISSIONS, 'escaner': False, 'fax': True},
+                                                  admin_password="")
+
+        assert before == PERMISSIONS
+        assert changed is True
+        assert printer.entries["00050"]['functions'] == ['COPY_BW', 'PRT_BW', 'FAX']
+        assert printer.requests.count('adrsListLoadEntry.cgi') >= 4
+
+    @pytest.mark.parametrize("enabled", [False, True])
+    def test_browser_is_only_used_when_the_fallback_is_enabled(self, monkeypatch, enabled):
+        calls = []
+        monkeypatch.setattr(selenium_fallback_config, 'enabled', enabled)
+        monkeypatch.setattr(RicohWebClient, '_replay_user_form', lambda self, *args: None)
+        monkeypatch.setattr(RicohSeleniumClient, 'set_user_permissions_with_browser',
+                            lambda self, ip, index, permissions, *args, **kwargs: calls.append(index) or True)
+
+        printer = WimPrinter(address_book(60), strict_flow=True)
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            result = RicohWebClient(admin_password="").set_user_functions(
+                sim.address("127.0.0.2"), "00050", PERMISSIONS, set_password=False)
+
+        assert result is enabled
+        assert calls == (["00050"] if enabled else [])
+
+    def test_replay_scan_stops_at_the_last_possible_batch(self, monkeypatch):
+        loads = []
+
+        class FullBatches:
+            """Every batch is full and none holds the entry"""
+
+            def get(self, url, **kwargs):
+                return SimpleNamespace(text='')
+
+            def post(self, url, data=None, **kwargs):
+                loads.append(int(data['getCountIn']))
+                rows = [['', 1, f"9{i:04d}", 'OTRO', 1, 'AB', '', '', '1', '', '']
+                        for i in range(ADDRESS_BOOK_BATCH_SIZE)]
+                return SimpleNamespace(text=repr(rows))
+
+        session = FullBatches()
+        monkeypatch.setattr(RicohWebClient, 'session', property(lambda self: session))
+
+        assert RicohWebClient(admin_password="")._replay_user_form("127.0.0.2", "00075", {}, {}) is None
+        assert loads[:2] == [2, 1]
+        assert max(loads) == ADDRESS_BOOK_MAX_ENTRIES // ADDRESS_BOOK_BATCH_SIZE
+        assert len(loads) == ADDRESS_BOOK_MAX_ENTRIES // ADDRESS_BOOK_BATCH_SIZE
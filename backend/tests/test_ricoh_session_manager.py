@@ -0,0 +1,206 @@
+"""
+Tests for the pooled, authenticated Ricoh session manager
+"""
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.parsers import counter_parser, toner_parser, user_counter_parser
+from services.parsers.ricoh_session import (
+    RicohSessionConfig, RicohSessionExhausted, RicohSessionManager,
+    is_session_expired, load_ricoh_session_config_from_env
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "ricoh_html"
+PRINTER_IP = "192.168.91.250"
+
+
+def _response(text="", status_code=200, url=""):
+    return MagicMock(status_code=status_code, text=text, url=url)
+
+
+def _manager(responses=None, **config):
+    """Manager with a fake login and HTTP sessions answering `responses` in order"""
+    login = MagicMock()
+    sessions = []
+
+    def session_factory():
+        http = MagicMock()
+        if responses is not None:
+            http.request.side_effect = responses
+        sessions.append(http)
+        return http
+
+    manager = RicohSessionManager(
+        config=RicohSessionConfig(**config),
+        login=login,
+        session_factory=session_factory
+    )
+    return manager, login, sessions
+
+
+@pytest.mark.unit
+class TestRicohSessionManager:
+    """Session reuse, expiry and per-printer limits"""
+
+    def test_reuses_authenticated_session(self):
+        manager, login, sessions = _manager()
+
+        for _ in range(3):
+            with manager.session(PRINTER_IP) as lease:
+                lease.get(f"http://{PRINTER_IP}/", timeout=10)
+
+        stats = manager.get_stats()
+        assert login.call_count == 1
+        assert len(sessions) == 1
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+        assert stats['logins'] == 1
+        assert stats['logins_saved'] == 2
+
+    def test_relogin_after_idle_timeout(self):
+        manager, login, _ = _manager(idle_timeout=0.05)
+
+        with manager.session(PRINTER_IP):
+            pass
+        time.sleep(0.1)
+        with manager.session(PRINTER_IP):
+            pass
+
+        assert login.call_count == 2
+        assert manager.get_stats()['relogins'] == 1
+
+    def test_expired_response_reauthenticates_and_retries(self):
+        login_page = _response(url=f"http://{PRINTER_IP}/web/guest/es/websys/webArch/authForm.cgi")
+        counter_page = _response(text="ok")
+        manager, login, _ = _manager(responses=[login_page, counter_page])
+
+        with manager.session(PRINTER_IP) as lease:
+            resp = lease.post(f"http://{PRINTER_IP}/counter.cgi", data={}, timeout=10)
+
+        assert resp.text == "ok"
+        assert login.call_count == 2
+        assert manager.get_stats()['relogins'] == 1
+
+    def test_limits_concurrent_sessions_per_printer(self):
+        manager, _, _ = _manager(max_sessions_per_printer=2)
+        active = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def worker():
+            nonlocal active, peak
+            with manager.session(PRINTER_IP):
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                time.sleep(0.05)
+                with lock:
+                    active -= 1
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert peak == 2
+        assert manager.get_stats()['idle_sessions'] == 2
+
+    def test_acquire_timeout_raises(self):
+        manager, _, _ = _manager(max_sessions_per_printer=1, acquire_timeout=0.05)
+
+        with manager.session(PRINTER_IP):
+            with pytest.raises(RicohSessionExhausted):
+                with manager.session(PRINTER_IP):
+                    pass
+
+    def test_failed_login_releases_slot(self):
+        manager, login, _ = _manager(max_sessions_per_printer=1, acquire_timeout=0.05)
+        login.side_effect = [Exception("login failed"), None]
+
+        with pytest.raises(Exception, match="login failed"):
+            with manager.session(PRINTER_IP):
+                pass
+
+        with manager.session(PRINTER_IP):
+            pass
+
+        stats = manager.get_stats()
+        assert stats['login_errors'] == 1
+        assert stats['active_sessions'] == 0
+
+    def test_invalidate_forces_new_login(self):
+        manager, login, _ = _manager()
+
+        with manager.session(PRINTER_IP):
+            pass
+        manager.invalidate(PRINTER_IP)
+        with manager.session(PRINTER_IP):
+            pass
+
+        assert login.call_count == 2
+
+    def test_is_session_expired(self):
+        assert is_session_expired(_response(status_code=403))
+        assert is_session_expired(_response(url=f"http://{PRINTER_IP}/web/guest/es/websys/webArch/authForm.cgi"))
+        assert not is_session_expired(_response(url=f"http://{PRINTER_IP}/web/entry/es/websys/status/getUserCounter.cgi"))
+
+    def test_config_from_env(self, monkeypatch):
+        monkeypatch.setenv("RICOH_MAX_SESSIONS_PER_PRINTER", "0")
+        monkeypatch.setenv("RICOH_SESSION_IDLE_TIMEOUT", "90")
+
+        config = load_ricoh_session_config_from_env()
+
+        assert config.max_sessions_per_printer == 2
+        assert config.idle_timeout == 90.0
+
+
+@pytest.mark.unit
+class TestSharedAcrossParsers:
+    """A full printer read logs in once"""
+
+    def test_read_printer_logs_in_once(self):
+        pages = [
+            _response(text=(FIXTURES / "unification_counter.html").read_text(encoding="utf-8")),
+            _response(text=(FIXTURES / "user_counter_252.html").read_text(encoding="utf-8")),
+            _response(text='<img src="/images/deviceStTnBarK.gif" width="64">'),
+        ]
+        manager, login, _ = _manager(responses=pages)
+
+        with patch.object(counter_parser, "ricoh_session_manager", manager), \
+                patch.object(user_counter_parser, "ricoh_session_manager", manager), \
+                patch.object(toner_parser, "ricoh_session_manager", manager):
+            counters = counter_parser.get_printer_counters(PRINTER_IP)
+            users = user_counter_parser.get_all_user_counters(PRINTER_IP)
+            toner = toner_parser.get_printer_toner_levels(PRINTER_IP)
+
+        assert counters['total'] == 1243067
+        assert len(users) == 20
+        assert toner['black'] == 50
+        assert login.call_count == 1
+        assert manager.get_stats()['hits'] == 2
+
+    def test_web_client_adopts_pooled_session(self):
+        from services.ricoh_web_client import RicohWebClient
+
+        manager, _, sessions = _manager()
+        with manager.session(PRINTER_IP) as lease:
+            lease.http.cookies = {'wimsesid': 'abc'}
+
+        client = RicohWebClient(admin_password="test_password")
+        client_session = MagicMock()
+        client_session.get.return_value = _response(text='<input name="wimToken" value="1234">')
+
+        with patch("services.ricoh_web_client.ricoh_session_manager", manager), \
+                patch.object(RicohWebClient, "session", client_session):
+            assert client._authenticate(PRINTER_IP) is True
+            client._logout(PRINTER_IP)
+
+        client_session.cookies.update.assert_called_once_with({'wimsesid': 'abc'})
+        stats = manager.get_stats()
+        assert stats['shared'] == 1
+        assert stats['idle_sessions'] == 0  # Logout del cliente invalida la sesión compartida
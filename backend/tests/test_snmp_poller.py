@@ -0,0 +1,193 @@
+"""
+Tests for the SNMP stack: BER codec, RicohSNMPClient against the local agent
+simulator (tests/fixtures/snmp_simulator.py) and the fleet poller
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from db.models import Printer, PrinterStatus
+from services.snmp_client import RicohSNMPClient, SNMPTimeout
+from services.snmp_codec import (
+    COUNTER32,
+    GET_REQUEST,
+    SNMPMessage,
+    SNMPPdu,
+    SNMPValue,
+    decode_message,
+    encode_message,
+)
+from services.snmp_poller_service import SNMPPollerConfig, SNMPPollerService
+from tests.fixtures.snmp_simulator import SNMPSimulator, ricoh_printer_mib
+
+
+def _client(sim, **kwargs):
+    return RicohSNMPClient(port=sim.port, **{'community': "public", 'timeout': 0.3, 'retries': 1, **kwargs})
+
+
+@pytest.mark.unit
+class TestSNMPCodec:
+
+    def test_get_request_matches_reference_encoding(self):
+        message = SNMPMessage(1, b"public", SNMPPdu(GET_REQUEST, 0x01020304, 0, 0, [("1.3.6.1.2.1.1.1.0", None)]))
+
+        assert encode_message(message).hex() == (
+            "302902010104067075626c6963"  # v2c, community "public"
+            "a01c020401020304020100020100"  # GetRequest, request-id 0x01020304
+            "300e300c06082b060102010101000500"  # sysDescr.0 = NULL
+        )
+
+    def test_round_trip_of_typed_values(self):
+        varbinds = [
+            ("1.3.6.1.2.1.43.11.1.1.9.1.5", -3),
+            ("1.3.6.1.2.1.43.10.2.1.4.1.1", SNMPValue(COUNTER32, 0xFFFFFFF0)),
+            ("1.3.6.1.4.1.367.3.2.1.2.19.5.1.5.1", "Toner negro"),
+            ("1.3.6.1.2.1.25.3.5.1.2.1", b"\x08\x00"),
+        ]
+        message = SNMPMessage(1, b"public", SNMPPdu(GET_REQUEST, 7, 0, 0, varbinds))
+
+        decoded = decode_message(encode_message(message))
+
+        assert decoded.pdu.varbinds == [
+            ("1.3.6.1.2.1.43.11.1.1.9.1.5", -3),
+            ("1.3.6.1.2.1.43.10.2.1.4.1.1", 0xFFFFFFF0),
+            ("1.3.6.1.4.1.367.3.2.1.2.19.5.1.5.1", "Toner negro".encode()),
+            ("1.3.6.1.2.1.25.3.5.1.2.1", b"\x08\x00"),
+        ]
+
+
+@pytest.mark.unit
+class TestRicohSNMPClient:
+
+    def test_printer_info_from_printer_mib_with_getbulk(self):
+        async def run():
+            async with SNMPSimulator({
+                "127.0.0.2": ricoh_printer_mib(black=80, cyan=60, magenta=45, yellow=10, page_count=98765),
+                "127.0.0.3": ricoh_printer_mib(black=5, cyan=None, magenta=None, yellow=None, error_bits=b"\x18\x00"),
+            }) as sim:
+                client = _client(sim, max_repetitions=5)
+                color = await client.get_printer_info("127.0.0.2")
+                mono = await client.get_printer_info("127.0.0.3")
+                return color, mono, sim.agents["127.0.0.2"].requests
+
+        color, mono, requests = asyncio.run(run())
+
+        assert (color.toner_black, color.toner_cyan, color.toner_magenta, color.toner_yellow) == (80, 60, 45, 10)
+        assert color.page_count == 98765 and color.serial_number == "E174M210096"
+        assert color.model == "RICOH IM C3000" and color.status == "idle" and color.error_state is None
+        assert mono.toner_black == 5 and mono.toner_cyan is None
+        assert mono.error_state == "noToner,doorOpen"
+        # Un GET de escalares y las tablas en pocas vueltas GETBULK, no un GETNEXT por celda
+        assert requests[0] == 0xA0 and set(requests[1:]) == {0xA5} and len(requests) <= 4
+
+    def test_retries_dropped_requests_and_times_out_unanswered_ones(self):
+        async def run():
+            async with SNMPSimulator({"127.0.0.2": ricoh_printer_mib()}, drop={"127.0.0.2": 1}) as sim:
+                info = await _client(sim).get_printer_info("127.0.0.2")
+                start = time.monotonic()
+                with pytest.raises(SNMPTimeout):
+                    await _client(sim, community="private").get_printer_info("127.0.0.2")
+                return info, time.monotonic() - start
+
+        info, elapsed = asyncio.run(run())
+
+        assert info.toner_black == 80
+        assert 0.5 <= elapsed < 1.5  # 2 intentos de 0.3s
+
+
+@pytest.mark.unit
+class TestSNMPPollerService:
+
+    def test_fleet_is_polled_concurrently(self):
+        agents = {f"127.0.0.{i}": ricoh_printer_mib(black=i) for i in range(2, 22)}
+        targets = [{'printer_id': i, 'hostname': f"printer-{i}", 'ip_address': f"127.0.0.{i}",
+                    'status': PrinterStatus.ONLINE} for i in range(2, 23)]
+
+        async def run():
+            async with SNMPSimulator(agents, latency=0.05) as sim:
+                poller = SNMPPollerService(client=_client(sim, timeout=0.5, retries=0),
+                                           config=SNMPPollerConfig(max_concurrency=32))
+                start = time.monotonic()
+                results = await poller.poll_all(targets)
+                return results, time.monotonic() - start
+
+        results, elapsed = asyncio.run(run())
+
+        assert [r['info'].toner_black for r in results[:-1]] == list(range(2, 22))
+        assert results[-1]['info'] is None and results[-1]['error']
+        assert results[-1]['http_reachable'] is False
+        assert all(r['http_reachable'] is None for r in results[:-1])
+        # 20 impresoras x 3 requests x 50ms en serie serían 3s
+        assert elapsed < 1.5
+
+    def test_apply_writes_the_fleet_in_one_batched_update(self, db_session, test_empresa):
+        from services.snmp_client import PrinterSNMPInfo
+        printers = [Printer(hostname=f"printer-{i}", ip_address=f"10.0.0.{i}", empresa_id=test_empresa.id,
+                            status=PrinterStatus.ONLINE, toner_cyan=50)
+                    for i in range(1, 8)]
+        printers[5].status = PrinterStatus.MAINTENANCE
+        db_session.add_all(printers)
+        db_session.commit()
+
+        def info(black, **kwargs):
+            return PrinterSNMPInfo(toner_black=black, toner_cyan=None, page_count=1000 + black, **kwargs)
+
+        results = [
+            {**t, 'info': info(10 * n), 'error': None, 'elapsed_seconds': 0.1}
+            for n, t in enumerate(SNMPPollerService.build_targets(printers[:4]), start=1)
+        ]
+        results[3]['info'] = info(40, error_state="jammed")
+        results.append({**SNMPPollerService.build_targets([printers[4]])[0], 'info': None, 'error': "timeout",
+                        'http_reachable': False})
+        results.append({**SNMPPollerService.build_targets([printers[5]])[0], 'info': info(60), 'error': None})
+        results.append({**SNMPPollerService.build_targets([printers[6]])[0], 'info': None, 'error': "timeout",
+                        'http_reachable': True})
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db_session.bind, "before_cursor_execute", listener)
+        try:
+            stats = SNMPPollerService.apply(db_session, results)
+        finally:
+            event.remove(db_session.bind, "before_cursor_execute", listener)
+
+        updates = [s for s in statements if s.lstrip().upper().startswith("UPDATE")]
+        # Una sentencia por forma de fila (con lectura / sin respuesta / en mantenimiento / solo HTTP),
+        # no por impresora
+        assert len(updates) == 4
+        assert stats == {'updated': 7, 'online': 4, 'error': 1, 'offline': 1, 'http_only': 1}
+
+        db_session.expire_all()
+        by_host = {p.hostname: p for p in db_session.query(Printer).all()}
+        assert by_host["printer-1"].toner_black == 10 and by_host["printer-1"].toner_cyan == 50
+        assert by_host["printer-1"].page_count == 1010 and by_host["printer-1"].last_seen is not None
+        assert by_host["printer-4"].status == PrinterStatus.ERROR
+        assert by_host["printer-5"].status == PrinterStatus.OFFLINE and by_host["printer-5"].last_seen is None
+        assert by_host["printer-6"].status == PrinterStatus.MAINTENANCE and by_host["printer-6"].toner_black == 60
+        # Sin SNMP pero accesible por HTTP: sigue ONLINE (entra en lecturas y cierres masivos)
+        assert by_host["printer-7"].status == PrinterStatus.ONLINE and by_host["printer-7"].last_seen is not None
+        assert by_host["printer-7"].toner_cyan == 50
+
+    def test_printers_without_snmp_are_checked_over_http(self):
+        def web_image_monitor(request):
+            # Solo 127.0.0.3 responde por HTTP
+            if request.url.host != "127.0.0.3":
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200)
+
+        transport = httpx.MockTransport(web_image_monitor)
+        targets = [{'printer_id': i, 'hostname': f"printer-{i}", 'ip_address': f"127.0.0.{i}",
+                    'status': PrinterStatus.ONLINE} for i in (2, 3, 4)]
+
+        async def run():
+            async with SNMPSimulator({"127.0.0.2": ricoh_printer_mib()}) as sim:
+                poller = SNMPPollerService(client=_client(sim, timeout=0.2, retries=0), transport=transport)
+                return await poller.poll_all(targets)
+
+        results = asyncio.run(run())
+
+        assert [r['http_reachable'] for r in results] == [None, True, False]
+        assert [SNMPPollerService.to_summary(r)['http_reachable'] for r in results] == [None, True, False]
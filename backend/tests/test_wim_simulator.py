@@ -0,0 +1,106 @@
+"""
+Tests for the WIM simulator's read pages (tests/fixtures/wim_simulator.py):
+the real parsers read every counter table format across pages, plus the
+device counter, toner bars, stored jobs, busy printers and reads that lose
+a page
+"""
+import pytest
+
+from db.models import ContadorUsuario, LecturaContadorUsuario, Printer
+from services.counter_service import CounterService
+
+from services.parsers import fetch_all_eco_users, fetch_all_user_counters, get_printer_counters
+from services.parsers.ricoh_session import RicohSessionManager
+from services.parsers.toner_parser import get_printer_toner_levels
+from services.ricoh_web_client import parse_stored_jobs
+from tests.fixtures.wim_simulator import WimPrinter, WimSimulator, counter_users, stored_jobs
+
+
+@pytest.fixture(autouse=True)
+def session_manager(monkeypatch):
+    """Fresh session pool per test so logins are counted per printer"""
+    manager = RicohSessionManager()
+    for module in ('services.parsers.user_counter_parser', 'services.parsers.eco_counter_parser',
+                   'services.parsers.counter_parser', 'services.parsers.toner_parser'):
+        monkeypatch.setattr(f'{module}.ricoh_session_manager', manager)
+    yield manager
+    manager.close_all()
+
+
+@pytest.mark.unit
+class TestWimSimulator:
+
+    @pytest.mark.parametrize("counter_format, columns", [('250', 18), ('251', 22), ('252', 13)])
+    def test_user_counter_formats_are_read_across_pages(self, counter_format, columns):
+        users = counter_users(45)
+        printer = WimPrinter(users=users, counter_format=counter_format, page_size=20)
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            read, stats = fetch_all_user_counters(sim.address("127.0.0.2"))
+
+        assert [u['codigo_usuario'] for u in read] == [u['code'] for u in users]
+        assert (stats.pages, stats.learned_page_size) == (3, 20)
+        first = users[0]['counters']
+        assert read[0]['impresora']['blanco_negro'] == first['print_bw']
+        assert read[0]['total_impresiones']['bn'] == first['copy_bw'] + first['print_bw']
+        if columns == 22:
+            assert read[0]['copiadora']['hojas_2_caras'] == first['copy_duplex']
+
+    def test_eco_counter_and_device_counter_add_up(self):
+        printer = WimPrinter(users=counter_users(25), counter_format='253', page_size=10)
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            data, stats = fetch_all_eco_users(sim.address("127.0.0.2"))
+            device = get_printer_counters(sim.address("127.0.0.2"))
+
+        assert (len(data['users']), stats.pages) == (25, 3)
+        total = sum(u['total_paginas_actual'] for u in data['users'])
+        assert data['device_total']['total_paginas_actual'] == total == device['total']
+
+    def test_advance_changes_only_some_users(self):
+        printer = WimPrinter(users=counter_users(40))
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            before, _ = fetch_all_user_counters(sim.address("127.0.0.2"))
+            changed = printer.advance(fraction=0.25)
+            after, _ = fetch_all_user_counters(sim.address("127.0.0.2"))
+
+        assert changed == 10
+        assert sum(1 for b, a in zip(before, after) if b['total_paginas'] < a['total_paginas']) == 10
+
+    def test_toner_stored_jobs_and_busy_reads(self, session_manager):
+        printer = WimPrinter(toner={'cyan': 100, 'magenta': 50, 'yellow': 25, 'black': 0}, jobs=stored_jobs(3),
+                             busy_reads=1)
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            address = sim.address("127.0.0.2")
+            with pytest.raises(Exception, match="503"):
+                get_printer_counters(address)
+            toner = get_printer_toner_levels(address)
+            with session_manager.session(address) as lease:
+                jobs = parse_stored_jobs(lease.get(f"http://{address}/web/entry/es/webprinter/storedJob.cgi").text)
+
+        assert (toner['cyan'], toner['magenta'], toner['yellow'], toner['black']) == (100, 50, 25, 0)
+        assert [job['job_id'] for job in jobs] == ['100', '101', '102']
+
+    @pytest.mark.parametrize("counter_format", ['251', '253'])
+    def test_failed_second_page_marks_the_read_incomplete(self, counter_format):
+        printer = WimPrinter(users=counter_users(45), counter_format=counter_format, page_size=20,
+                             failing_counter_pages=[2])
+        fetch = fetch_all_eco_users if counter_format == '253' else fetch_all_user_counters
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            _, failed = fetch(sim.address("127.0.0.2"))
+            _, retried = fetch(sim.address("127.0.0.2"))
+
+        assert (failed.incomplete, failed.pages) == (True, 1)
+        assert (retried.incomplete, retried.pages) == (False, 3)
+
+    def test_counter_service_does_not_store_an_incomplete_read(self, db_session, test_empresa):
+        printer = WimPrinter(users=counter_users(45), page_size=20, failing_counter_pages=[2])
+        with WimSimulator({"127.0.0.2": printer}) as sim:
+            record = Printer(hostname="printer-pages", ip_address=sim.address("127.0.0.2"), empresa_id=test_empresa.id,
+                             status="ONLINE", tiene_contador_usuario=True, usar_contador_ecologico=False)
+            db_session.add(record)
+            db_session.commit()
+
+            with pytest.raises(Exception, match="lectura incompleta"):
+                CounterService.read_user_counters(db_session, record.id)
+
+        assert db_session.query(ContadorUsuario).count() == 0
+        assert db_session.query(LecturaContadorUsuario).count() == 0
@@ -0,0 +1,183 @@
+"""
+Tests for the WebSocket broadcast hub: per-client queues and bus fan-out
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from services.ws_broadcast_service import BroadcastHub, LocalBroadcastBus, WSBroadcastConfig
+
+
+class FakeWebSocket:
+    """Cliente con latencia configurable; `gate` bloquea los envíos hasta liberarlo"""
+
+    def __init__(self, delay=0.0, gate=None):
+        self.delay = delay
+        self.gate = gate
+        self.received = []
+        self.closed_with = None
+
+    async def send_json(self, message):
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(message)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+def _meta(username, rol="admin", user_id=1, empresa_id=None):
+    return {"user_id": user_id, "username": username, "rol": rol, "ip": "127.0.0.1",
+            "empresa_id": empresa_id, "connected_at": datetime.now(timezone.utc)}
+
+
+async def _drain():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.unit
+class TestClientQueues:
+
+    def test_slow_client_does_not_delay_others(self):
+        async def run():
+            hub = BroadcastHub(WSBroadcastConfig(queue_size=50, send_timeout=5), bus=LocalBroadcastBus())
+            await hub.start()
+            slow, fast = FakeWebSocket(delay=0.5), FakeWebSocket()
+            hub.register(slow, _meta("slow"))
+            hub.register(fast, _meta("fast"))
+
+            start = asyncio.get_running_loop().time()
+            for i in range(5):
+                await hub.publish({"n": i})
+            await _drain()
+            elapsed = asyncio.get_running_loop().time() - start
+
+            await hub.stop()
+            return elapsed, fast.received, slow.received
+
+        elapsed, fast_received, slow_received = asyncio.run(run())
+
+        assert elapsed < 0.2
+        assert [m["n"] for m in fast_received] == [0, 1, 2, 3, 4]
+        assert len(slow_received) < 5
+
+    def test_lagging_client_drops_oldest_and_gets_one_notice(self):
+        async def run():
+            hub = BroadcastHub(WSBroadcastConfig(queue_size=3, send_timeout=5), bus=LocalBroadcastBus())
+            await hub.start()
+            gate = asyncio.Event()
+            client = FakeWebSocket(gate=gate)
+            hub.register(client, _meta("lagging"))
+
+            await hub.publish({"n": 0})
+            await _drain()  # n=0 queda en vuelo, bloqueado en el envío
+            for i in range(1, 11):
+                await hub.publish({"n": i})
+            stats = hub.stats()
+
+            gate.set()
+            await _drain()
+            await hub.stop()
+            return stats, client.received
+
+        stats, received = asyncio.run(run())
+
+        connection = stats["connections"][0]
+        assert (connection["queue_depth"], connection["dropped"]) == (3, 7)
+        assert stats["total_dropped"] == 7
+        assert received[0] == {"n": 0}
+        assert received[1]["type"] == "warning" and received[1]["dropped"] == 7
+        assert [m["n"] for m in received[2:]] == [8, 9, 10]
+
+    def test_send_timeout_closes_and_reports_lost_client(self):
+        lost = []
+
+        async def run():
+            hub = BroadcastHub(WSBroadcastConfig(queue_size=5, send_timeout=0.05),
+                               bus=LocalBroadcastBus(), on_client_lost=lost.append)
+            await hub.start()
+            stuck = FakeWebSocket(gate=asyncio.Event())
+            hub.register(stuck, _meta("stuck"))
+            await hub.publish({"n": 1})
+            await asyncio.sleep(0.15)
+            stats = hub.stats()
+            await hub.stop()
+            return stuck, stats
+
+        stuck, stats = asyncio.run(run())
+
+        assert lost == [stuck]
+        assert stuck.closed_with == 1013
+        assert stats["connections"] == []
+
+
+@pytest.mark.unit
+class TestBusFanOut:
+
+    def test_events_reach_clients_of_every_worker_respecting_roles(self):
+        async def run():
+            bus = LocalBroadcastBus()
+            worker_a = BroadcastHub(WSBroadcastConfig(), bus=bus)
+            worker_b = BroadcastHub(WSBroadcastConfig(), bus=bus)
+            await worker_a.start()
+            await worker_b.start()
+
+            admin_a, admin_b, viewer_b = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+            worker_a.register(admin_a, _meta("a"))
+            worker_b.register(admin_b, _meta("b"))
+            worker_b.register(viewer_b, _meta("v", rol="viewer"))
+
+            await worker_a.publish({"message": "para todos", "at": datetime(2026, 1, 1)})
+            await worker_b.publish({"message": "solo admin"}, allowed_roles=["admin"])
+            await _drain()
+
+            await worker_a.stop()
+            await worker_b.stop()
+            return admin_a.received, admin_b.received, viewer_b.received
+
+        admin_a, admin_b, viewer_b = asyncio.run(run())
+
+        assert [m["message"] for m in admin_a] == ["para todos", "solo admin"]
+        assert admin_b == admin_a
+        assert [m["message"] for m in viewer_b] == ["para todos"]
+        assert admin_a[0]["at"] == "2026-01-01 00:00:00"
+
+    def test_audience_limits_events_to_company_creator_and_superadmins(self):
+        async def run():
+            bus = LocalBroadcastBus()
+            worker_a = BroadcastHub(WSBroadcastConfig(), bus=bus)
+            worker_b = BroadcastHub(WSBroadcastConfig(), bus=bus)
+            await worker_a.start()
+            await worker_b.start()
+
+            clients = {name: FakeWebSocket() for name in ("same", "creator", "other", "super")}
+            worker_a.register(clients["same"], _meta("same", user_id=2, empresa_id=10))
+            worker_b.register(clients["creator"], _meta("creator", user_id=3, empresa_id=None))
+            worker_b.register(clients["other"], _meta("other", user_id=4, empresa_id=20))
+            worker_a.register(clients["super"], _meta("super", rol="superadmin", user_id=5))
+
+            await worker_a.publish({"job_id": 1}, audience={"empresa_id": 10, "user_id": 3})
+            await worker_b.publish({"job_id": 2}, audience={"empresa_id": None, "user_id": 4})
+            await _drain()
+
+            await worker_a.stop()
+            await worker_b.stop()
+            return {name: [m["job_id"] for m in ws.received] for name, ws in clients.items()}
+
+        assert asyncio.run(run()) == {"same": [1], "creator": [1], "other": [2], "super": [1, 2]}
+
+    def test_publish_before_start_delivers_locally(self):
+        async def run():
+            hub = BroadcastHub(WSBroadcastConfig(), bus=LocalBroadcastBus())
+            client = FakeWebSocket()
+            hub.register(client, _meta("local"))
+            await hub.publish({"n": 1})
+            await _drain()
+            await hub.stop()
+            return client.received
+
+        assert asyncio.run(run()) == [{"n": 1}]